@@ -9,8 +9,6 @@ from fastapi import HTTPException, Depends, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import jwt
 import os
-from google.auth.transport import requests
-from google.oauth2 import id_token
 import logging
 
 logger = logging.getLogger(__name__)
@@ -89,7 +87,11 @@ def verify_google_token(token: str) -> Optional[dict]:
         if not GOOGLE_CLIENT_ID:
             logger.warning("Google Client ID not configured")
             return None
-            
+
+        # google-auth тянет requests/urllib3 — импортируем только при входе через Google
+        from google.auth.transport import requests
+        from google.oauth2 import id_token
+
         idinfo = id_token.verify_oauth2_token(
             token, requests.Request(), GOOGLE_CLIENT_ID)
             
@@ -0,0 +1,169 @@
+"""
+Утилиты начальной настройки базы при старте воркера: массовые upsert-ы,
+аренда (lease) на общие шаги и версия схемы, чтобы миграции выполнялись
+один раз на весь кластер, а не в каждом процессе uvicorn.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from pymongo import IndexModel, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+# Уникальный владелец аренды: хост, pid и случайный суффикс на случай повторного запуска в том же pid
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# (версия, название, корутина) — версии возрастают, применённая версия хранится в документе схемы
+Migration = Tuple[int, str, Callable[[], Awaitable[Any]]]
+
+
+def bootstrap_digest(*parts: Any) -> str:
+    """Отпечаток данных по умолчанию: при изменении набора индексов или сидов шаги повторяются"""
+    payload = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+async def upsert_defaults(
+    collection,
+    documents: Iterable[Dict[str, Any]],
+    key_fields: Sequence[str],
+    update_fields: Sequence[str] = (),
+) -> int:
+    """
+    Один bulk_write вместо find_one + insert_one на каждый документ.
+
+    Отсутствующие документы вставляются целиком ($setOnInsert), у существующих
+    перезаписываются только update_fields. Возвращает число вставленных документов.
+    """
+    operations = []
+    for document in documents:
+        key = {field: document[field] for field in key_fields}
+        update: Dict[str, Any] = {}
+        on_insert = {k: v for k, v in document.items() if k not in key and k not in update_fields}
+        if on_insert:
+            update["$setOnInsert"] = on_insert
+        refreshed = {k: document[k] for k in update_fields if k in document}
+        if refreshed:
+            update["$set"] = refreshed
+        operations.append(UpdateOne(key, update, upsert=True))
+    if not operations:
+        return 0
+    result = await collection.bulk_write(operations, ordered=False)
+    return result.upserted_count
+
+
+async def create_indexes(db, specs: Sequence[Tuple[str, List[Tuple[str, int]], Dict[str, Any]]]) -> None:
+    """Создаёт индексы одним create_indexes на коллекцию, коллекции — параллельно"""
+    by_collection: Dict[str, List[IndexModel]] = {}
+    for collection_name, keys, options in specs:
+        by_collection.setdefault(collection_name, []).append(IndexModel(keys, **options))
+    await asyncio.gather(*(
+        db[collection_name].create_indexes(models) for collection_name, models in by_collection.items()
+    ))
+
+
+async def acquire_lease(collection, lease_id: str, ttl_seconds: float, owner: str = WORKER_ID) -> bool:
+    """
+    Берёт аренду lease_id, если она свободна, истекла или уже принадлежит owner.
+    Конкурирующий upsert того же _id получает DuplicateKeyError — аренда занята.
+    """
+    now = datetime.utcnow()
+    try:
+        await collection.find_one_and_update(
+            {
+                "_id": lease_id,
+                "$or": [
+                    {"lease_expires_at": {"$lt": now}},
+                    {"lease_expires_at": None},
+                    {"lease_owner": owner},
+                ],
+            },
+            {"$set": {"lease_owner": owner, "lease_expires_at": now + timedelta(seconds=ttl_seconds)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+async def release_lease(collection, lease_id: str, owner: str = WORKER_ID) -> None:
+    await collection.update_one(
+        {"_id": lease_id, "lease_owner": owner},
+        {"$set": {"lease_owner": None, "lease_expires_at": None}}
+    )
+
+
+async def run_steps(steps: Dict[str, Awaitable[Any]]) -> Dict[str, Any]:
+    """Параллельно выполняет независимые шаги; ошибка одного шага не прерывает остальные"""
+    names = list(steps)
+    started = time.perf_counter()
+    results = await asyncio.gather(*steps.values(), return_exceptions=True)
+    outcome = {}
+    for name, result in zip(names, results):
+        if isinstance(result, Exception):
+            logger.error(f"Bootstrap step {name} failed: {result}")
+        outcome[name] = result
+    logger.info(f"Bootstrap steps {', '.join(names)} finished in {time.perf_counter() - started:.3f}s")
+    return outcome
+
+
+async def run_bootstrap(
+    collection,
+    digest: str,
+    seed_steps: Callable[[], Dict[str, Awaitable[Any]]],
+    migrations: Sequence[Migration],
+    lease_seconds: float = 120,
+    lease_id: str = "schema",
+) -> Optional[Dict[str, Any]]:
+    """
+    Начальная настройка под арендой.
+
+    Документ lease_id хранит применённую версию схемы и отпечаток сидов. Если оба актуальны,
+    воркер ограничивается одним чтением. Иначе шаги выполняет тот воркер, который взял
+    аренду; остальные не ждут его и стартуют сразу. Возвращает итог шагов или None, если
+    делать ничего не пришлось или работу выполняет другой воркер.
+    """
+    latest_version = max((version for version, _, _ in migrations), default=0)
+    state = await collection.find_one({"_id": lease_id}) or {}
+    if state.get("version", 0) >= latest_version and state.get("digest") == digest:
+        return None
+
+    if not await acquire_lease(collection, lease_id, lease_seconds):
+        logger.info(f"Bootstrap lease {lease_id} is held by {state.get('lease_owner')}, skipping")
+        return None
+
+    try:
+        # Перечитываем после взятия аренды: предыдущий владелец мог всё уже применить
+        state = await collection.find_one({"_id": lease_id}) or {}
+        outcome: Dict[str, Any] = {}
+
+        if state.get("digest") != digest:
+            outcome.update(await run_steps(seed_steps()))
+            if not any(isinstance(result, Exception) for result in outcome.values()):
+                await collection.update_one({"_id": lease_id}, {"$set": {"digest": digest, "updated_at": datetime.utcnow()}})
+
+        applied = state.get("version", 0)
+        for version, name, migrate in sorted(migrations, key=lambda migration: migration[0]):
+            if version <= applied:
+                continue
+            started = time.perf_counter()
+            outcome[name] = await migrate()
+            await collection.update_one(
+                {"_id": lease_id},
+                {"$set": {"version": version, "updated_at": datetime.utcnow()}}
+            )
+            logger.info(f"Schema migration {version} ({name}) applied in {time.perf_counter() - started:.3f}s")
+        return outcome
+    finally:
+        await release_lease(collection, lease_id)
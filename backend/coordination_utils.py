@@ -0,0 +1,205 @@
+"""
+Координация фоновых задач между воркерами uvicorn: выбор лидера на каждую роль
+через аренду с пульсом (MongoDB или Redis) и распределение ботов по воркерам
+консистентным хешированием.
+"""
+
+import asyncio
+import bisect
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from bootstrap_utils import WORKER_ID, acquire_lease, release_lease
+
+logger = logging.getLogger(__name__)
+
+LEASE_TTL_SECONDS = 15
+HEARTBEAT_SECONDS = 5
+RING_REPLICAS = 64
+
+# Продление и освобождение только своей аренды
+REDIS_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+REDIS_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class MongoLeaseBackend:
+    """Аренды в коллекции с TTL-индексом по lease_expires_at: один документ на роль"""
+
+    def __init__(self, collection, owner: str = WORKER_ID):
+        self.collection = collection
+        self.owner = owner
+
+    async def acquire(self, name: str, ttl_seconds: float) -> bool:
+        return await acquire_lease(self.collection, f"leader:{name}", ttl_seconds, self.owner)
+
+    async def release(self, name: str) -> None:
+        await release_lease(self.collection, f"leader:{name}", self.owner)
+
+    async def heartbeat_member(self, ttl_seconds: float) -> None:
+        await self.collection.update_one(
+            {"_id": f"member:{self.owner}"},
+            {"$set": {"kind": "member", "lease_owner": self.owner,
+                      "lease_expires_at": datetime.utcnow() + timedelta(seconds=ttl_seconds)}},
+            upsert=True
+        )
+
+    async def leave(self) -> None:
+        await self.collection.delete_one({"_id": f"member:{self.owner}"})
+
+    async def members(self) -> List[str]:
+        cursor = self.collection.find(
+            {"kind": "member", "lease_expires_at": {"$gt": datetime.utcnow()}}, {"_id": 0, "lease_owner": 1}
+        )
+        return sorted([doc["lease_owner"] async for doc in cursor])
+
+
+class RedisLeaseBackend:
+    """Аренды на ключах SET NX PX; живые воркеры — sorted set со временем истечения в score"""
+
+    def __init__(self, client, owner: str = WORKER_ID, prefix: str = "gemplay:"):
+        self.client = client
+        self.owner = owner
+        self.prefix = prefix
+
+    async def acquire(self, name: str, ttl_seconds: float) -> bool:
+        key = f"{self.prefix}leader:{name}"
+        ttl_ms = int(ttl_seconds * 1000)
+        if await self.client.set(key, self.owner, nx=True, px=ttl_ms):
+            return True
+        return bool(await self.client.eval(REDIS_RENEW_SCRIPT, 1, key, self.owner, ttl_ms))
+
+    async def release(self, name: str) -> None:
+        await self.client.eval(REDIS_RELEASE_SCRIPT, 1, f"{self.prefix}leader:{name}", self.owner)
+
+    async def heartbeat_member(self, ttl_seconds: float) -> None:
+        now = datetime.utcnow().timestamp()
+        key = f"{self.prefix}members"
+        await self.client.zadd(key, {self.owner: now + ttl_seconds})
+        await self.client.zremrangebyscore(key, "-inf", now)
+
+    async def leave(self) -> None:
+        await self.client.zrem(f"{self.prefix}members", self.owner)
+
+    async def members(self) -> List[str]:
+        now = datetime.utcnow().timestamp()
+        return sorted(await self.client.zrangebyscore(f"{self.prefix}members", now, "+inf"))
+
+
+class HashRing:
+    """Консистентное хеширование: при смене состава переезжает ~1/N ключей"""
+
+    def __init__(self, nodes: List[str], replicas: int = RING_REPLICAS):
+        self.nodes = list(nodes)
+        points = sorted((self._hash(f"{node}#{i}"), node) for node in self.nodes for i in range(replicas))
+        self._hashes = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, self._hash(key)) % len(self._hashes)
+        return self._owners[index]
+
+
+class WorkerCoordinator:
+    """
+    Запускает фоновые циклы только в воркере-лидере своей роли.
+
+    Лидер продлевает аренду каждые HEARTBEAT_SECONDS. Если продлить не удалось (сбой базы,
+    аренду перехватили), задача отменяется; если лидер умер, аренда истекает через
+    LEASE_TTL_SECONDS и её забирает другой воркер.
+    """
+
+    def __init__(self, backend, ttl_seconds: float = LEASE_TTL_SECONDS, heartbeat_seconds: float = HEARTBEAT_SECONDS):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.roles: Dict[str, bool] = {}
+        self.ring = HashRing([backend.owner])
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def worker_id(self) -> str:
+        return self.backend.owner
+
+    def run_as_leader(self, role: str, job: Callable[[], Awaitable[Any]]) -> None:
+        self.roles[role] = False
+        self._tasks.append(asyncio.create_task(self._lead(role, job)))
+
+    async def _lead(self, role: str, job: Callable[[], Awaitable[Any]]) -> None:
+        task: Optional[asyncio.Task] = None
+        try:
+            while True:
+                try:
+                    leader = await self.backend.acquire(role, self.ttl_seconds)
+                except Exception as e:
+                    logger.warning(f"Lease check for {role} failed: {e}")
+                    leader = False
+
+                if leader and task is None:
+                    logger.info(f"👑 Worker {self.worker_id} is leader for {role}")
+                    task = asyncio.create_task(job())
+                elif not leader and task is not None:
+                    logger.warning(f"Worker {self.worker_id} lost leadership for {role}")
+                    task.cancel()
+                    task = None
+                elif task is not None and task.done():
+                    if not task.cancelled() and task.exception():
+                        logger.error(f"Background job {role} crashed: {task.exception()}")
+                    task = asyncio.create_task(job())
+                self.roles[role] = task is not None
+                await asyncio.sleep(self.heartbeat_seconds)
+        finally:
+            if task is not None:
+                task.cancel()
+                try:
+                    await self.backend.release(role)
+                except Exception:
+                    pass
+
+    def start_membership(self) -> None:
+        """Пульс участия в кольце для шардирования ботов"""
+        self._tasks.append(asyncio.create_task(self._membership()))
+
+    async def _membership(self) -> None:
+        try:
+            while True:
+                try:
+                    await self.backend.heartbeat_member(self.ttl_seconds)
+                    members = sorted(set(await self.backend.members()) | {self.worker_id})
+                    if members != self.ring.nodes:
+                        logger.info(f"Bot shard ring: {len(members)} workers")
+                        self.ring = HashRing(members)
+                except Exception as e:
+                    logger.warning(f"Worker membership heartbeat failed: {e}")
+                await asyncio.sleep(self.heartbeat_seconds)
+        finally:
+            try:
+                await self.backend.leave()
+            except Exception:
+                pass
+
+    def owns(self, key: str) -> bool:
+        return self.ring.owner(key) == self.worker_id
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
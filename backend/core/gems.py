@@ -0,0 +1,59 @@
+"""
+Гемы: цены и проверка, можно ли собрать точную сумму из доступных гемов
+"""
+
+# Gem prices
+GEM_PRICES = {
+    "Ruby": 1.0,
+    "Amber": 2.0,
+    "Topaz": 5.0,
+    "Emerald": 10.0,
+    "Aquamarine": 25.0,
+    "Sapphire": 50.0,
+    "Magic": 100.0
+}
+
+
+def gems_value(gems: dict) -> float:
+    """Стоимость набора гемов {gem_type: quantity} по GEM_PRICES"""
+    return sum(quantity * GEM_PRICES.get(gem_type, 1.0) for gem_type, quantity in gems.items())
+
+
+def gem_combination_possible(available_gems: list, target_amount: float) -> bool:
+    """
+    Check if it's possible to form an exact combination of gems that equals target amount.
+    Uses dynamic programming approach for subset sum problem.
+    """
+    # Convert to cents to avoid floating point issues
+    target_cents = int(target_amount * 100)
+    
+    # Create a list of all individual gems with their values in cents
+    gem_values = []
+    for gem in available_gems:
+        gem_value_cents = int(gem["price"] * 100)
+        for _ in range(gem["available_quantity"]):
+            gem_values.append(gem_value_cents)
+    
+    # Edge cases
+    if target_cents == 0:
+        return True
+    if not gem_values or target_cents < 0:
+        return False
+    
+    # Dynamic programming approach
+    # dp[i] will be True if sum i is possible
+    dp = [False] * (target_cents + 1)
+    dp[0] = True  # Base case: sum 0 is always possible (select nothing)
+    
+    # For each gem value
+    for gem_value in gem_values:
+        # Traverse from right to left to avoid using same gem multiple times
+        for current_sum in range(target_cents, gem_value - 1, -1):
+            if dp[current_sum - gem_value]:
+                dp[current_sum] = True
+                
+                # Early exit if we found the target
+                if current_sum == target_cents:
+                    return True
+    
+    return dp[target_cents]
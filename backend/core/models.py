@@ -0,0 +1,934 @@
+"""
+Доменные модели: перечисления и pydantic-модели пользователей, игр, ботов и звуков
+"""
+
+import uuid
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, List, Optional, Union
+
+from pydantic import BaseModel, EmailStr, Field, computed_field, field_validator
+
+from search_utils import search_key
+from username_utils import sanitize_username, validate_username
+
+# ==============================================================================
+# ENUMS
+# ==============================================================================
+
+class UserRole(str, Enum):
+    USER = "USER"
+    MODERATOR = "MODERATOR"  
+    ADMIN = "ADMIN"
+    SUPER_ADMIN = "SUPER_ADMIN"
+
+class Permission(str, Enum):
+    # User permissions
+    VIEW_PROFILE = "VIEW_PROFILE"
+    EDIT_PROFILE = "EDIT_PROFILE"
+    
+    # Game permissions  
+    CREATE_GAME = "CREATE_GAME"
+    JOIN_GAME = "JOIN_GAME"
+    VIEW_GAMES = "VIEW_GAMES"
+    
+    # Admin permissions
+    VIEW_ADMIN_PANEL = "VIEW_ADMIN_PANEL"
+    MANAGE_USERS = "MANAGE_USERS"
+    MANAGE_GAMES = "MANAGE_GAMES"
+    MANAGE_BOTS = "MANAGE_BOTS"
+    MANAGE_ECONOMY = "MANAGE_ECONOMY"
+    VIEW_ANALYTICS = "VIEW_ANALYTICS"
+    MANAGE_SOUNDS = "MANAGE_SOUNDS"
+    
+    # Super admin permissions
+    MANAGE_ROLES = "MANAGE_ROLES"
+    SYSTEM_SETTINGS = "SYSTEM_SETTINGS"
+
+class Role(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: str
+    description: str
+    permissions: List[Permission] = []
+    is_system_role: bool = False  # System roles cannot be deleted
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class BotType(str, Enum):
+    REGULAR = "REGULAR"
+    HUMAN = "HUMAN"
+
+class HumanBotCharacter(str, Enum):
+    STABLE = "STABLE"           # Стабильный
+    AGGRESSIVE = "AGGRESSIVE"   # Агрессивный
+    CAUTIOUS = "CAUTIOUS"      # Осторожный
+    BALANCED = "BALANCED"       # Балансированный
+    IMPULSIVE = "IMPULSIVE"     # Импульсивный
+    ANALYST = "ANALYST"         # Аналитик
+    MIMIC = "MIMIC"            # Мимик
+
+class BotMode(str, Enum):
+    SIMPLE = "SIMPLE"      # Простой рандом
+    ALGORITHMIC = "ALGORITHMIC"  # С алгоритмом побед
+
+# Bot Settings model
+class BotSettings(BaseModel):
+    id: str = Field(default="bot_settings")
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class UpdateBotPauseRequest(BaseModel):
+    pause_between_cycles: int = Field(..., ge=1, le=3600, description="Пауза между циклами в секундах (1-3600)")
+    pause_between_bets: Optional[int] = Field(default=5, ge=1, le=3600, description="Пауза между ставками в секундах (1-3600)")
+
+# Removed legacy: UpdateBotWinPercentageRequest (win_percentage deprecated)
+
+
+
+# Interface Settings model
+class InterfaceSettings(BaseModel):
+    live_players: dict = Field(default={
+        "my_bets": 10,
+        "available_bets": 10,
+        "ongoing_battles": 10
+    })
+    bot_players: dict = Field(default={
+        "available_bots": 10,
+        "ongoing_bot_battles": 10
+    })
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+# Bot Queue Stats model
+class BotQueueStats(BaseModel):
+    totalActiveRegularBets: int = 0
+    totalQueuedBets: int = 0
+    totalRegularBots: int = 0
+    totalHumanBots: int = 0
+
+# Bot model
+class UserStatus(str, Enum):
+    ACTIVE = "ACTIVE"
+    BANNED = "BANNED"
+    EMAIL_PENDING = "EMAIL_PENDING"
+
+class GemType(str, Enum):
+    RUBY = "Ruby"
+    AMBER = "Amber"
+    TOPAZ = "Topaz"
+    EMERALD = "Emerald"
+    AQUAMARINE = "Aquamarine"
+    SAPPHIRE = "Sapphire"
+    MAGIC = "Magic"
+
+class GameStatus(str, Enum):
+    WAITING = "WAITING"
+    ACTIVE = "ACTIVE"
+    COMPLETED = "COMPLETED"
+    CANCELLED = "CANCELLED"
+    TIMEOUT = "TIMEOUT"  # Игра завершена по таймауту
+    FROZEN = "FROZEN"  # Игра заморожена (бот деактивирован)
+    RESERVED = "RESERVED"  # Игра зарезервирована игроком (60 сек)
+
+class GameMove(str, Enum):
+    ROCK = "rock"
+    PAPER = "paper"
+    SCISSORS = "scissors"
+
+class TransactionType(str, Enum):
+    DEPOSIT = "DEPOSIT"
+    WITHDRAWAL = "WITHDRAWAL"
+    PURCHASE = "PURCHASE"
+    SALE = "SALE"
+    GIFT = "GIFT"
+    COMMISSION = "COMMISSION"
+    BET = "BET"
+    WIN = "WIN"
+    REFUND = "REFUND"
+    DAILY_BONUS = "DAILY_BONUS"
+
+class SoundCategory(str, Enum):
+    GAMING = "GAMING"           # Игровые действия
+    UI = "UI"                   # UI элементы  
+    SYSTEM = "SYSTEM"           # Системные уведомления
+    BACKGROUND = "BACKGROUND"   # Фоновые звуки/музыка
+
+class GameType(str, Enum):
+    HUMAN_VS_HUMAN = "HUMAN_VS_HUMAN"
+    HUMAN_VS_BOT = "HUMAN_VS_BOT" 
+    ALL = "ALL"
+
+class SoundPriority(str, Enum):
+    LOW = "LOW"           # 1-2
+    MEDIUM = "MEDIUM"     # 3-5
+    HIGH = "HIGH"         # 6-8
+    CRITICAL = "CRITICAL" # 9-10
+
+# ==============================================================================
+# MODELS
+# ==============================================================================
+
+class User(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    username: str
+    email: EmailStr
+    password_hash: str
+    role: UserRole = UserRole.USER
+    status: UserStatus = UserStatus.EMAIL_PENDING
+    gender: str = "male"  # male/female for avatar
+    virtual_balance: float = 0.0
+    frozen_balance: float = 0.0
+    daily_limit_used: float = 0.0
+    daily_limit_max: float = 1000.0
+    last_daily_reset: datetime = Field(default_factory=datetime.utcnow)
+    
+    # Email verification
+    email_verification_token: Optional[str] = None
+    email_verified: bool = False
+    
+    # Password reset
+    password_reset_token: Optional[str] = None
+    password_reset_expires: Optional[datetime] = None
+    
+    # OAuth providers
+    google_id: Optional[str] = None
+    oauth_provider: Optional[str] = None  # 'google', etc.
+    
+    # Security
+    last_password_change: Optional[datetime] = None
+    failed_login_attempts: int = 0
+    locked_until: Optional[datetime] = None
+    
+    ban_reason: Optional[str] = None
+    ban_until: Optional[datetime] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    last_login: Optional[datetime] = None
+    last_login_ip: Optional[str] = None
+    
+    total_games_played: int = 0
+    total_games_won: int = 0
+    total_amount_wagered: float = 0.0
+    total_amount_won: float = 0.0
+    total_commission_paid: float = 0.0  # Общая сумма комиссий, оплаченных ботом
+    timezone_offset: int = 0  # UTC offset in hours (-12 to +12)
+
+class GemDefinition(BaseModel):
+    id: Optional[str] = Field(default_factory=lambda: str(uuid.uuid4()))
+    type: str  # Changed from GemType to allow custom gem types
+    name: str
+    price: int  # Changed to int for whole dollars only
+    color: str
+    icon: str
+    rarity: str
+    enabled: bool = True
+    is_default: bool = False  # For default 7 gems that can't be deleted
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+# Admin-specific gem models
+class CreateGemRequest(BaseModel):
+    name: str = Field(..., min_length=1, max_length=50)
+    price: int = Field(..., ge=1, le=10000)  # Only whole dollars
+    color: str = Field(..., pattern=r'^#[0-9A-Fa-f]{6}$')  # HEX color
+    icon: str = Field(..., description="Base64 encoded image")
+    rarity: str = Field(default="Common")
+
+class UpdateGemRequest(BaseModel):
+    name: Optional[str] = Field(None, min_length=1, max_length=50)
+    price: Optional[int] = Field(None, ge=1, le=10000)
+    color: Optional[str] = Field(None, pattern=r'^#[0-9A-Fa-f]{6}$')
+    icon: Optional[str] = None
+    rarity: Optional[str] = None
+    enabled: Optional[bool] = None
+
+class GemAdminResponse(BaseModel):
+    id: str
+    type: str
+    name: str
+    price: int
+    color: str
+    icon: str
+    rarity: str
+    enabled: bool
+    is_default: bool  # Can't be deleted if True
+    created_at: datetime
+
+class UserGem(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    gem_type: GemType
+    quantity: int = 0
+    frozen_quantity: int = 0  # количество заморожено в ставках
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class Game(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    creator_id: str
+    creator_type: str = "user"  # "user", "bot", "human_bot"
+    opponent_id: Optional[str] = None
+    opponent_type: Optional[str] = None  # "user", "bot", "human_bot"
+    creator_move: Optional[GameMove] = None
+    opponent_move: Optional[GameMove] = None
+    creator_move_hash: Optional[str] = None  # Для commit-reveal схемы
+    creator_salt: Optional[str] = None
+    bet_amount: float
+    bet_gems: Dict[str, int]  # {"Ruby": 5, "Emerald": 2} - Creator's gems
+    opponent_gems: Optional[Union[Dict[str, int], List[Dict[str, Any]]]] = None  # Support both formats
+    status: GameStatus = GameStatus.WAITING
+    winner_id: Optional[str] = None
+    commission_amount: float = 0.0
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    cancelled_at: Optional[datetime] = None
+    active_deadline: Optional[datetime] = None  # Крайний срок для завершения активной игры (1 минута)
+    joined_at: Optional[datetime] = None  # When opponent joined the game
+    updated_at: Optional[datetime] = None
+    is_bot_game: bool = False
+    bot_id: Optional[str] = None
+    bot_type: Optional[str] = None  # "REGULAR", "HUMAN"
+    is_regular_bot_game: bool = False  # Флаг для игр против обычных ботов (без комиссии)
+    metadata: Optional[Dict[str, Any]] = None  # Дополнительные метаданные игры
+    reserved_by: Optional[str] = None  # ID пользователя, который зарезервировал игру
+    reserved_at: Optional[datetime] = None  # Время резервирования
+    reservation_expires_at: Optional[datetime] = None  # Время истечения резервирования
+    version: int = 0  # Растёт на каждом переходе состояния (game_state_utils)
+
+class Transaction(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    transaction_type: TransactionType
+    amount: float
+    currency: str = "USD"  # USD для долларов, GEM для гемов
+    gem_type: Optional[GemType] = None
+    gem_quantity: Optional[int] = None
+    balance_before: float
+    balance_after: float
+    description: str
+    reference_id: Optional[str] = None  # ID игры, подарка и т.д.
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    admin_id: Optional[str] = None  # Если транзакция создана админом
+
+class ProfitEntry(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    entry_type: str  # "BET_COMMISSION", "HUMAN_BOT_COMMISSION", "GIFT_COMMISSION", "ADMIN_ADJUSTMENT"
+    amount: float
+    source_user_id: str  # Пользователь, с которого взята комиссия
+    reference_id: Optional[str] = None  # ID игры, подарка и т.д.
+    description: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    admin_id: Optional[str] = None  # Если создано админом
+
+class BotProfitAccumulator(BaseModel):
+    """Модель для накопления прибыли от ботов"""
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    bot_id: str
+    cycle_number: int
+    total_spent: float = 0.0  # ОСТАВЛЯЕМ: общая сумма ставок (выигрыши + поражения + ничьи)
+    # УДАЛЕНО: total_earned - используем прямой расчёт Выигрыши - Потери
+    wins_amount: float = 0.0  # Сумма выигрышных ставок
+    losses_amount: float = 0.0  # Сумма проигрышных ставок
+    draws_amount: float = 0.0  # Сумма ничейных ставок
+    games_completed: int  # Количество завершенных игр в цикле
+    games_won: int  # Количество выигранных игр
+    cycle_start_date: datetime
+    cycle_end_date: Optional[datetime] = None
+    is_cycle_completed: bool = False
+    profit_transferred: float = 0  # Сумма прибыли, переданная в "Доход от ботов"
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class FrozenBalance(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    amount: float
+    reason: str  # "BET_COMMISSION", "MAINTENANCE", etc.
+    reference_id: Optional[str] = None  # ID игры
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    released_at: Optional[datetime] = None
+    is_active: bool = True
+
+class CompletedCycle(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    bot_id: str
+    cycle_number: int
+    start_time: datetime
+    end_time: datetime
+    duration_seconds: int
+    total_bets: int
+    wins_count: int
+    losses_count: int
+    draws_count: int
+    total_bet_amount: float
+    total_winnings: float
+    total_losses: float
+    net_profit: float
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class Bot(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: str
+    bot_type: BotType
+    is_active: bool = True
+    
+    min_bet_amount: float = 1.0  # 1-10000
+    max_bet_amount: float = 100.0  # 1-10000
+    # НОВАЯ ЛОГИКА: Убираем win_percentage, добавляем баланс игр
+    wins_count: int = 7           # Баланс игр - количество побед (ИСПРАВЛЕНО: 7 вместо 6)
+    losses_count: int = 6         # Баланс игр - количество поражений  
+    draws_count: int = 3          # Баланс игр - количество ничьих (ИСПРАВЛЕНО: 3 вместо 4)
+    wins_percentage: float = 44.0  # Процент исходов - победы
+    losses_percentage: float = 36.0 # Процент исходов - поражения
+    draws_percentage: float = 20.0  # Процент исходов - ничьи
+    cycle_games: int = 16
+    current_cycle_games: int = 0
+    current_cycle_wins: int = 0
+    current_cycle_losses: int = 0  # Поражения в текущем цикле  
+    current_cycle_draws: int = 0  # Ничьи в текущем цикле
+    current_limit: Optional[int] = None  # 1-66 (по умолчанию = cycle_games)
+    
+    # Поля для системы циклов и прибыли
+    completed_cycles: int = 0  # Количество завершенных циклов
+    current_cycle_profit: float = 0.0  # Прибыль за текущий цикл
+    total_net_profit: float = 0.0  # Чистая прибыль за все циклы
+    
+    # Отслеживание сумм в цикле
+    current_cycle_gem_value_won: float = 0.0  # Сумма выигранных гемов в текущем цикле
+    current_cycle_gem_value_total: float = 0.0  # Общая сумма ставок в текущем цикле
+    
+    # Паузы (секунды)
+    pause_between_cycles: int = 5  # Пауза между циклами (по умолчанию 5 секунд)
+    pause_between_bets: int = 5    # Пауза между ставками (по умолчанию 5 секунд)
+    
+    # Реальная сумма цикла (вычисляется автоматически)
+    cycle_total_amount: float = 0.0  # Реальная сумма всех ставок в цикле
+    
+    last_game_time: Optional[datetime] = None
+    last_bet_time: Optional[datetime] = None
+    last_cycle_completed_at: Optional[datetime] = None  # Время завершения последнего цикла
+    has_completed_cycles: bool = False  # Флаг указывающий что бот уже имел завершенные циклы
+    current_cycle_start_time: Optional[datetime] = None  # Время начала текущего цикла
+    completed_cycles_count: int = 0  # Количество завершённых циклов
+    
+    avatar_gender: str = "male"
+    simple_mode: bool = False  # Для Human ботов - простой режим
+    
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    
+    @computed_field
+    @property
+    def name_key(self) -> str:
+        """Ключ поиска по префиксу имени (сохраняется вместе с документом)"""
+        return search_key(self.name)
+
+class AdminLog(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    admin_id: str
+    action: str
+    target_type: str  # user, bot, gem, etc.
+    target_id: str
+    details: Dict[str, Any]
+    ip_address: Optional[str] = None
+    user_agent: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class HumanBot(BaseModel):
+    """Модель для Human-ботов с характерами и настройками поведения"""
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: str  # Уникальное имя бота
+    character: HumanBotCharacter  # Тип характера (1 из 7)
+    gender: str = "male"  # male/female for avatar
+    is_active: bool = True
+    
+    min_bet: float = Field(ge=1.0, le=10000.0)  # 1-10000
+    max_bet: float = Field(ge=1.0, le=10000.0)  # 1-10000
+    
+    bet_limit: int = Field(default=12, ge=1, le=100)  # 1-100
+    bet_limit_amount: float = 300.0  # Maximum bet amount this bot can participate in as opponent
+    
+    win_percentage: float = Field(default=40.0, ge=0.0, le=100.0)
+    loss_percentage: float = Field(default=40.0, ge=0.0, le=100.0)
+    draw_percentage: float = Field(default=20.0, ge=0.0, le=100.0)
+    
+    min_delay: int = Field(default=30, ge=1, le=300)   # 1-300 секунд
+    max_delay: int = Field(default=120, ge=1, le=300)  # 1-300 секунд
+    
+    use_commit_reveal: bool = True
+    
+    logging_level: str = Field(default="INFO")  # INFO, DEBUG
+    
+    # Auto-play settings
+    can_play_with_other_bots: bool = Field(default=True)  # Can play with other bots automatically
+    can_play_with_players: bool = Field(default=True)  # Can play with live players
+    
+    # Bot creation activity control
+    is_bet_creation_active: bool = Field(default=True, description="Активность бота - создание новых ставок")
+    
+    # Individual delay settings for playing with other bots
+    bot_min_delay_seconds: int = Field(default=20, ge=1, le=12000, description="Минимальная задержка для игры с ботами (секунды)")
+    bot_max_delay_seconds: int = Field(default=800, ge=1, le=12000, description="Максимальная задержка для игры с ботами (секунды)")
+    
+    # Individual delay settings for playing with players
+    player_min_delay_seconds: int = Field(default=20, ge=1, le=12000, description="Минимальная задержка для игры с игроками (секунды)")  
+    player_max_delay_seconds: int = Field(default=800, ge=1, le=12000, description="Максимальная задержка для игры с игроками (секунды)")
+    
+    # Individual concurrent games limit
+    max_concurrent_games: int = Field(default=1, ge=1, le=3, description="Максимальное количество одновременных игр для бота")
+    
+    # Balance for Human-bot operations (commissions, etc.)
+    virtual_balance: float = Field(default=2000.0, description="Виртуальный баланс Human-бота")
+    
+    total_games_played: int = 0
+    total_games_won: int = 0  
+    total_amount_wagered: float = 0.0
+    total_amount_won: float = 0.0
+    total_commission_paid: float = 0.0  # Общая сумма комиссий, оплаченных ботом
+    
+    last_action_time: Optional[datetime] = None
+    last_bet_time: Optional[datetime] = None
+    
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    
+    @computed_field
+    @property
+    def name_key(self) -> str:
+        """Ключ поиска по префиксу имени (сохраняется вместе с документом)"""
+        return search_key(self.name)
+
+class HumanBotLog(BaseModel):
+    """Модель для логирования действий Human-ботов"""
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    human_bot_id: str
+    action_type: str  # "CREATE_BET", "JOIN_BET", "WIN", "LOSS", "DRAW"
+    description: str
+    game_id: Optional[str] = None
+    bet_amount: Optional[float] = None
+    outcome: Optional[str] = None  # "WIN", "LOSS", "DRAW"
+    move_played: Optional[str] = None  # "rock", "paper", "scissors"
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class SecurityAlert(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    alert_type: str  # RATE_LIMIT, SUSPICIOUS_PURCHASE, UNUSUAL_ACTIVITY, etc.
+    severity: str    # LOW, MEDIUM, HIGH, CRITICAL
+    description: str
+    ip_address: Optional[str] = None
+    user_agent: Optional[str] = None
+    request_data: Dict[str, Any] = {}
+    action_taken: Optional[str] = None
+    resolved: bool = False
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    resolved_at: Optional[datetime] = None
+    resolved_by: Optional[str] = None
+
+class SecurityMonitoring(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    ip_address: str
+    endpoint: str
+    request_count: int
+    time_window: str  # "1m", "1h", "1d"
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class SuspiciousActivity(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    activity_type: str
+    description: str
+    risk_score: int  # 1-100
+    ip_address: Optional[str] = None
+    evidence: Dict[str, Any] = {}
+    status: str = "OPEN"  # OPEN, INVESTIGATING, RESOLVED, FALSE_POSITIVE
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class EmailVerification(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    email: EmailStr
+    token: str
+    expires_at: datetime
+    used: bool = False
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class Notification(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    type: str  # ADMIN_ACTION, GIFT_RECEIVED, etc.
+    title: str
+    message: str
+    read: bool = False
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class Sound(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: str  # Название звука
+    category: SoundCategory  # Категория звука
+    event_trigger: str  # Событие-триггер (создание_ставки, победа, hover и т.д.)
+    game_type: GameType = GameType.ALL  # Тип игры
+    is_enabled: bool = True  # Включен/выключен
+    priority: int = Field(default=5, ge=1, le=10)  # Приоритет 1-10
+    volume: float = Field(default=0.5, ge=0.0, le=1.0)  # Громкость 0.0-1.0
+    delay: int = Field(default=0, ge=0)  # Задержка в миллисекундах
+    can_repeat: bool = True  # Можно ли воспроизводить повторно
+    audio_sha256: Optional[str] = None  # Хеш аудиофайла в хранилище звуков (SOUND_STORAGE_DIR)
+    file_format: Optional[str] = None  # mp3/wav/ogg
+    file_size: Optional[int] = None  # Размер файла в байтах
+    is_default: bool = False  # Дефолтный звук (программный)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+# ==============================================================================
+# RESPONSE MODELS
+# ==============================================================================
+
+class UserResponse(BaseModel):
+    id: str
+    username: str
+    email: str
+    role: UserRole
+    status: UserStatus
+    gender: str
+    virtual_balance: float
+    frozen_balance: float
+    daily_limit_used: float
+    daily_limit_max: float
+    email_verified: bool
+    created_at: datetime
+    last_login: Optional[datetime] = None
+    total_games_played: int
+    total_games_won: int
+    total_amount_wagered: float
+    total_amount_won: float
+    total_commission_paid: float  # Общая сумма комиссий, оплаченных ботом
+    timezone_offset: int = 0  # UTC offset in hours (-12 to +12)
+
+class Token(BaseModel):
+    access_token: str
+    token_type: str
+    user: UserResponse
+    refresh_token: Optional[str] = None
+
+class RefreshToken(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    token: str
+    expires_at: datetime
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    is_active: bool = True
+
+class GemResponse(BaseModel):
+    type: GemType
+    name: str
+    price: float
+    color: str
+    icon: str
+    rarity: str
+    quantity: int = 0
+    frozen_quantity: int = 0
+
+class CancelGameResponse(BaseModel):
+    success: bool
+    message: str
+    gems_returned: Dict[str, int]
+    commission_returned: float
+
+# Removed gem combination models - logic moved to frontend
+
+class AddBalanceRequest(BaseModel):
+    amount: float = Field(..., gt=0, le=1000, description="Amount to add to balance (max $1000)")
+
+# ==============================================================================
+# REQUEST MODELS
+# ==============================================================================
+
+class UserRegistration(BaseModel):
+    username: str = Field(..., min_length=3, max_length=15)
+    email: EmailStr
+    password: str
+    gender: str = "male"
+    
+    # Валидатор для username
+    @field_validator('username')
+    @classmethod
+    def validate_username_field(cls, v):
+        is_valid, errors = validate_username(v)
+        if not is_valid:
+            raise ValueError(f"Недопустимое имя пользователя: {'; '.join(errors)}")
+        return sanitize_username(v)
+
+class UserLogin(BaseModel):
+    email: EmailStr
+    password: str
+
+class PasswordResetRequest(BaseModel):
+    email: EmailStr
+
+class PasswordResetConfirm(BaseModel):
+    token: str
+    new_password: str = Field(..., min_length=8)
+
+class ResendVerificationRequest(BaseModel):
+    email: EmailStr
+
+class GoogleOAuthRequest(BaseModel):
+    token: str  # Google ID token
+
+class UpdateProfileRequest(BaseModel):
+    username: Optional[str] = Field(None, min_length=3, max_length=15)
+    gender: Optional[str] = Field(None, pattern=r'^(male|female)$')
+    timezone_offset: Optional[int] = Field(None, ge=-12, le=12)
+    
+    # Валидатор для username
+    @field_validator('username')
+    @classmethod
+    def validate_username_field(cls, v):
+        if v is not None:
+            is_valid, errors = validate_username(v)
+            if not is_valid:
+                raise ValueError(f"Недопустимое имя пользователя: {'; '.join(errors)}")
+            return sanitize_username(v)
+        return v
+
+class EmailVerificationRequest(BaseModel):
+    token: str
+
+class DailyBonusRequest(BaseModel):
+    pass
+
+class CreateGameRequest(BaseModel):
+    move: GameMove
+    bet_gems: Dict[str, int]
+
+class JoinGameRequest(BaseModel):
+    move: GameMove
+    gems: Dict[str, int]  # Player's selected gems combination
+
+# Human Bot Request Models
+class CreateHumanBotRequest(BaseModel):
+    name: str = Field(..., min_length=1, max_length=50)
+    character: HumanBotCharacter
+    gender: str = Field(default="male", pattern="^(male|female)$")  # Add gender field
+    min_bet: float = Field(..., ge=1.0, le=10000.0)
+    max_bet: float = Field(..., ge=1.0, le=10000.0)
+    bet_limit: int = Field(default=12, ge=1, le=100)
+    bet_limit_amount: float = Field(default=300.0, ge=1.0, le=100000.0)  # Maximum bet amount limit
+    win_percentage: float = Field(default=40.0, ge=0.0, le=100.0)
+    loss_percentage: float = Field(default=40.0, ge=0.0, le=100.0)
+    draw_percentage: float = Field(default=20.0, ge=0.0, le=100.0)
+    min_delay: int = Field(default=30, ge=1, le=300)
+    max_delay: int = Field(default=120, ge=1, le=300)
+    use_commit_reveal: bool = True
+    logging_level: str = Field(default="INFO")
+    can_play_with_other_bots: bool = Field(default=True, description="Can play with other bots automatically")
+    can_play_with_players: bool = Field(default=True, description="Can play with live players")
+    # Bot creation activity control
+    is_bet_creation_active: bool = Field(default=True, description="Активность бота - создание новых ставок")
+    # Individual delay settings for playing with other bots
+    bot_min_delay_seconds: int = Field(default=20, ge=1, le=12000, description="Минимальная задержка для игры с ботами (секунды)")
+    bot_max_delay_seconds: int = Field(default=800, ge=1, le=12000, description="Максимальная задержка для игры с ботами (секунды)")
+    # Individual delay settings for playing with players
+    player_min_delay_seconds: int = Field(default=20, ge=1, le=12000, description="Минимальная задержка для игры с игроками (секунды)")  
+    player_max_delay_seconds: int = Field(default=800, ge=1, le=12000, description="Максимальная задержка для игры с игроками (секунды)")
+    # Individual concurrent games limit
+    max_concurrent_games: int = Field(default=1, ge=1, le=3, description="Максимальное количество одновременных игр для бота")
+
+class UpdateHumanBotRequest(BaseModel):
+    name: Optional[str] = Field(None, min_length=1, max_length=50)
+    character: Optional[HumanBotCharacter] = None
+    gender: Optional[str] = Field(None, pattern="^(male|female)$")  # Add gender field
+    is_active: Optional[bool] = None
+    min_bet: Optional[float] = Field(None, ge=1.0, le=10000.0)
+    max_bet: Optional[float] = Field(None, ge=1.0, le=10000.0)
+    bet_limit: Optional[int] = Field(None, ge=1, le=100)
+    bet_limit_amount: Optional[float] = Field(None, ge=1.0, le=100000.0)  # Maximum bet amount limit
+    win_percentage: Optional[float] = Field(None, ge=0.0, le=100.0)
+    loss_percentage: Optional[float] = Field(None, ge=0.0, le=100.0)
+    draw_percentage: Optional[float] = Field(None, ge=0.0, le=100.0)
+    min_delay: Optional[int] = Field(None, ge=1, le=300)
+    max_delay: Optional[int] = Field(None, ge=1, le=300)
+    use_commit_reveal: Optional[bool] = None
+    logging_level: Optional[str] = None
+    can_play_with_other_bots: Optional[bool] = None
+    can_play_with_players: Optional[bool] = None
+    # Bot creation activity control
+    is_bet_creation_active: Optional[bool] = Field(None, description="Активность бота - создание новых ставок")
+    # Individual delay settings for playing with other bots
+    bot_min_delay_seconds: Optional[int] = Field(None, ge=1, le=12000, description="Минимальная задержка для игры с ботами (секунды)")
+    bot_max_delay_seconds: Optional[int] = Field(None, ge=1, le=12000, description="Максимальная задержка для игры с ботами (секунды)")
+    # Individual delay settings for playing with players
+    player_min_delay_seconds: Optional[int] = Field(None, ge=1, le=12000, description="Минимальная задержка для игры с игроками (секунды)")  
+    player_max_delay_seconds: Optional[int] = Field(None, ge=1, le=12000, description="Максимальная задержка для игры с игроками (секунды)")
+    # Individual concurrent games limit
+    max_concurrent_games: Optional[int] = Field(None, ge=1, le=3, description="Максимальное количество одновременных игр для бота")
+
+class ToggleAutoPlayRequest(BaseModel):
+    can_play_with_other_bots: bool
+
+class TogglePlayWithPlayersRequest(BaseModel):
+    can_play_with_players: bool
+
+class ToggleAllRequest(BaseModel):
+    activate: bool
+
+class BulkCreateHumanBotsRequest(BaseModel):
+    count: int = Field(..., ge=1, le=1000)  # Больше 50 ботов за раз — фоновой задачей
+    character: HumanBotCharacter
+    min_bet_range: List[float] = Field(..., min_length=2, max_length=2)  # [min, max]
+    max_bet_range: List[float] = Field(..., min_length=2, max_length=2)  # [min, max]  
+    bet_limit_range: List[int] = Field(default=[12, 12], min_length=2, max_length=2)  # [min, max] лимит ставок
+    win_percentage: float = Field(default=40.0, ge=0.0, le=100.0)
+    loss_percentage: float = Field(default=40.0, ge=0.0, le=100.0)
+    draw_percentage: float = Field(default=20.0, ge=0.0, le=100.0)
+    delay_range: List[int] = Field(default=[30, 120], min_length=2, max_length=2)  # [min, max] секунды
+    min_delay: Optional[int] = Field(default=30, ge=1, le=3600)  # Минимальная задержка
+    max_delay: Optional[int] = Field(default=120, ge=1, le=3600)  # Максимальная задержка
+    use_commit_reveal: bool = True
+    logging_level: str = Field(default="INFO")
+    # Auto-play settings for bulk creation
+    can_play_with_other_bots: bool = Field(default=True, description="Can play with other bots automatically")
+    can_play_with_players: bool = Field(default=True, description="Can play with live players")
+    # Bot creation activity control for bulk creation
+    is_bet_creation_active: bool = Field(default=True, description="Активность бота - создание новых ставок")
+    # Individual delay settings ranges for bulk creation
+    bot_min_delay_range: List[int] = Field(default=[20, 800], min_length=2, max_length=2, description="Диапазон минимальных задержек для игры с ботами")
+    bot_max_delay_range: List[int] = Field(default=[20, 800], min_length=2, max_length=2, description="Диапазон максимальных задержек для игры с ботами")
+    player_min_delay_range: List[int] = Field(default=[20, 800], min_length=2, max_length=2, description="Диапазон минимальных задержек для игры с игроками")
+    player_max_delay_range: List[int] = Field(default=[20, 800], min_length=2, max_length=2, description="Диапазон максимальных задержек для игры с игроками")
+    # Concurrent games range for bulk creation
+    max_concurrent_games_range: List[int] = Field(default=[1, 3], min_length=2, max_length=2, description="Диапазон максимального количества одновременных игр")
+    # Bet amount limit range for bulk creation  
+    bet_limit_amount_range: List[int] = Field(default=[100, 250], min_length=2, max_length=2, description="Диапазон ограничения суммы ставок для участия как оппонент")
+    bots: Optional[List[dict]] = Field(default=None)  # Данные отдельных ботов
+
+class CreateSoundRequest(BaseModel):
+    name: str = Field(..., min_length=1, max_length=100)
+    category: SoundCategory
+    event_trigger: str = Field(..., min_length=1, max_length=50)
+    game_type: GameType = GameType.ALL
+    is_enabled: bool = True
+    priority: int = Field(default=5, ge=1, le=10)
+    volume: float = Field(default=0.5, ge=0.0, le=1.0)
+    delay: int = Field(default=0, ge=0, le=5000)  # Max 5 seconds delay
+    can_repeat: bool = True
+
+class UpdateSoundRequest(BaseModel):
+    name: Optional[str] = Field(None, min_length=1, max_length=100)
+    category: Optional[SoundCategory] = None
+    event_trigger: Optional[str] = Field(None, min_length=1, max_length=50)
+    game_type: Optional[GameType] = None
+    is_enabled: Optional[bool] = None
+    priority: Optional[int] = Field(None, ge=1, le=10)
+    volume: Optional[float] = Field(None, ge=0.0, le=1.0)
+    delay: Optional[int] = Field(None, ge=0, le=5000)
+    can_repeat: Optional[bool] = None
+
+class UploadSoundFileRequest(BaseModel):
+    file_data: str  # Base64 encoded audio file
+    file_format: str = Field(..., pattern="^(mp3|wav|ogg)$")  # Only these formats
+    file_size: int = Field(..., gt=0, le=5242880)  # Max 5MB
+
+class ResendNotificationRequest(BaseModel):
+    notification_id: str
+
+class SoundResponse(BaseModel):
+    id: str
+    name: str
+    category: SoundCategory
+    event_trigger: str
+    game_type: GameType
+    is_enabled: bool
+    priority: int
+    volume: float
+    delay: int
+    can_repeat: bool
+    has_audio_file: bool  # Whether an audio asset is stored
+    file_format: Optional[str] = None
+    file_size: Optional[int] = None
+    is_default: bool
+    created_at: datetime
+    updated_at: datetime
+
+class HumanBotResponse(BaseModel):
+    id: str
+    name: str
+    character: HumanBotCharacter
+    gender: Optional[str] = "male"  # male/female for avatar, default to male
+    is_active: bool
+    min_bet: float
+    max_bet: float
+    bet_limit: int
+    bet_limit_amount: float  # Maximum bet amount this bot can participate in as opponent
+    win_percentage: float
+    loss_percentage: float
+    draw_percentage: float
+    min_delay: int
+    max_delay: int
+    use_commit_reveal: bool
+    logging_level: str
+    can_play_with_other_bots: bool
+    can_play_with_players: bool
+    # Bot creation activity control
+    is_bet_creation_active: bool
+    # Individual delay settings for playing with other bots
+    bot_min_delay_seconds: int
+    bot_max_delay_seconds: int
+    # Individual delay settings for playing with players
+    player_min_delay_seconds: int  
+    player_max_delay_seconds: int
+    # Individual concurrent games limit
+    max_concurrent_games: int
+    # Balance for Human-bot operations
+    virtual_balance: float
+    total_games_played: int
+    total_games_won: int
+    total_amount_wagered: float
+    average_bet_amount: float  # Average amount from active bets
+    total_amount_won: float
+    total_commission_paid: float  # Общая сумма комиссий, оплаченных ботом
+    win_rate: float  # Calculated field
+    last_action_time: Optional[datetime]
+    created_at: datetime
+    updated_at: datetime
+
+class HumanBotLogResponse(BaseModel):
+    id: str
+    human_bot_id: str
+    action_type: str
+    description: str
+    game_id: Optional[str]
+    bet_amount: Optional[float]
+    outcome: Optional[str]
+    move_played: Optional[str]
+    created_at: datetime
+
+class HumanBotsStatsResponse(BaseModel):
+    total_bots: int
+    active_bots: int
+    active_games: int
+    total_games_played: int  # Independent counter for "Всего Игр"
+    period_revenue: float  # Independent counter for "Доход за Период"
+    total_games_24h: int
+    total_bets: int
+    total_revenue_24h: float
+    avg_revenue_per_bot: float
+    most_active_bots: List[Dict[str, Any]]
+    character_distribution: Dict[str, int]
+
+class PaginationInfo(BaseModel):
+    current_page: int
+    total_pages: int
+    per_page: int
+    total_items: int
+    has_next: bool
+    has_prev: bool
+
+class HumanBotsListResponse(BaseModel):
+    success: bool
+    bots: List[Dict[str, Any]]
+    pagination: PaginationInfo
+    metadata: Optional[Dict[str, Any]] = None  # Add metadata for caching and performance info
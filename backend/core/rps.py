@@ -0,0 +1,42 @@
+"""
+Камень-ножницы-бумага: commit-reveal хэши ходов и определение победителя
+"""
+
+import hashlib
+from typing import Optional, Tuple
+
+from core.models import GameMove
+
+
+def hash_move_with_salt(move, salt: str) -> str:
+    """Hash game move with salt for commit-reveal scheme."""
+    # Handle both GameMove enum and string
+    move_str = move.value if hasattr(move, 'value') else move
+    combined = f"{move_str}:{salt}"
+    return hashlib.sha256(combined.encode()).hexdigest()
+
+
+def verify_move_hash(move: GameMove, salt: str, hash_value: str) -> bool:
+    """Verify game move hash."""
+    return hash_move_with_salt(move, salt) == hash_value
+
+
+def determine_rps_winner(creator_move: GameMove, opponent_move: GameMove, creator_id: str, opponent_id: str) -> Tuple[Optional[str], str]:
+    """Determine winner using rock-paper-scissors logic."""
+    winner_id = None
+    result_status = "draw"
+    
+    if creator_move == opponent_move:
+        result_status = "draw"
+    elif (
+        (creator_move == GameMove.ROCK and opponent_move == GameMove.SCISSORS) or
+        (creator_move == GameMove.SCISSORS and opponent_move == GameMove.PAPER) or
+        (creator_move == GameMove.PAPER and opponent_move == GameMove.ROCK)
+    ):
+        winner_id = creator_id
+        result_status = "creator_wins"
+    else:
+        winner_id = opponent_id
+        result_status = "opponent_wins"
+    
+    return winner_id, result_status
@@ -0,0 +1,21 @@
+"""
+Денежная математика расчёта игр: округление сумм и комиссии
+"""
+
+# Ставка комиссии по умолчанию, если в admin_settings ничего не задано (в процентах)
+DEFAULT_COMMISSION_RATE_PERCENT = 3.0
+
+
+def round_money(value: float) -> float:
+    try:
+        return float(f"{float(value):.2f}")
+    except Exception:
+        try:
+            return round(float(value), 2)
+        except Exception:
+            return 0.0
+
+
+def commission_for(amount: float, rate_fraction: float) -> float:
+    """Комиссия с суммы по ставке в долях (0.03 = 3%), округлённая до центов"""
+    return round_money(amount * rate_fraction)
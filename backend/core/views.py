@@ -0,0 +1,108 @@
+"""
+Лёгкие представления документов MongoDB для внутренних циклов.
+
+View — класс со __slots__ только для нужных полей модели: значения берутся из документа
+как есть, для отсутствующих подставляются умолчания pydantic-модели. Валидации и
+фабрик умолчаний для присутствующих полей нет, поэтому представление создаётся в разы
+быстрее Game(**doc) / HumanBot(**doc). Полная модель — to_model(), на границе API.
+
+Строковые перечисления (GameStatus, HumanBotCharacter) остаются строками и сравниваются
+с членами перечисления как раньше.
+"""
+
+from copy import copy
+from functools import partial
+from typing import Any, Callable, ClassVar, Dict, Iterable, Optional, Tuple, Type
+
+from pydantic import BaseModel
+from pydantic_core import PydanticUndefined
+
+from core.models import Bot, Game, HumanBot, User
+
+
+class DocumentView:
+    model: ClassVar[Type[BaseModel]]
+    fields: ClassVar[Tuple[str, ...]]
+    projection: ClassVar[Dict[str, int]]
+
+    __slots__ = ()
+
+    @classmethod
+    def from_doc(cls, doc: Dict[str, Any]):
+        raise NotImplementedError
+
+    @classmethod
+    def from_docs(cls, docs: Iterable[Dict[str, Any]]) -> list:
+        from_doc = cls.from_doc
+        return [from_doc(doc) for doc in docs]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.fields}
+
+    def to_model(self) -> BaseModel:
+        """Полная проверка pydantic — только там, где модель уходит наружу"""
+        return self.model(**self.to_dict())
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(id={getattr(self, 'id', None)!r})"
+
+
+def _missing(model: Type[BaseModel], name: str):
+    def fail(doc):
+        raise KeyError(f"{model.__name__} document {doc.get('id')} has no {name}")
+    return fail
+
+
+def _build_from_doc(model: Type[BaseModel], fields: Tuple[str, ...]) -> Callable:
+    """
+    Как dataclasses: from_doc собирается в линейный код без цикла по полям —
+    одно присваивание слота на поле.
+    """
+    namespace: Dict[str, Any] = {"_new": object.__new__}
+    lines = ["def from_doc(cls, doc):", "    view = _new(cls)"]
+    for index, name in enumerate(fields):
+        info = model.model_fields[name]
+        factory = info.default_factory
+        if factory is None and isinstance(info.default, (list, dict, set)):
+            # Изменяемое умолчание копируется, как это делает pydantic
+            factory = partial(copy, info.default)
+        if factory is not None:
+            namespace[f"_factory{index}"] = factory
+            lines.append(f"    view.{name} = doc[{name!r}] if {name!r} in doc else _factory{index}()")
+        elif info.default is PydanticUndefined:
+            namespace[f"_missing{index}"] = _missing(model, name)
+            lines.append(f"    view.{name} = doc[{name!r}] if {name!r} in doc else _missing{index}(doc)")
+        else:
+            namespace[f"_default{index}"] = info.default
+            lines.append(f"    view.{name} = doc.get({name!r}, _default{index})")
+    lines.append("    return view")
+    exec("\n".join(lines), namespace)
+    return classmethod(namespace["from_doc"])
+
+
+def document_view(model: Type[BaseModel], fields: Optional[Iterable[str]] = None, name: Optional[str] = None):
+    """Класс-представление модели; fields=None — все поля модели"""
+    fields = tuple(fields) if fields is not None else tuple(model.model_fields)
+    return type(name or f"{model.__name__}View", (DocumentView,), {
+        "__slots__": fields,
+        "model": model,
+        "fields": fields,
+        "projection": {"_id": 0, **{field_name: 1 for field_name in fields}},
+        "from_doc": _build_from_doc(model, fields),
+    })
+
+
+# Полные представления: по ним работают функции, которые раньше получали модель целиком
+HumanBotView = document_view(HumanBot)
+BotView = document_view(Bot)
+UserView = document_view(User)
+
+# Поля игры, нужные циклам таймаутов, присоединения и выбора хода
+GameView = document_view(Game, (
+    "id", "creator_id", "creator_type", "opponent_id", "opponent_type",
+    "creator_move", "opponent_move", "creator_move_hash", "creator_salt",
+    "bet_amount", "bet_gems", "opponent_gems", "status", "winner_id", "commission_amount",
+    "created_at", "started_at", "active_deadline", "joined_at",
+    "is_bot_game", "bot_id", "bot_type", "is_regular_bot_game", "metadata",
+    "reserved_by", "reserved_at", "reservation_expires_at", "version",
+))
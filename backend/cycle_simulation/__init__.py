@@ -0,0 +1,14 @@
+"""
+Оффлайн-симулятор экономики циклов обычных ботов по ROI-пресетам
+"""
+
+from .presets import DEFAULT_DRAWS_PERCENTAGE, ROI_PRESETS, roi_preset
+from .simulator import simulate_preset, simulate_presets
+
+__all__ = [
+    "DEFAULT_DRAWS_PERCENTAGE",
+    "ROI_PRESETS",
+    "roi_preset",
+    "simulate_preset",
+    "simulate_presets",
+]
@@ -0,0 +1,59 @@
+"""
+Запуск из каталога backend:
+
+    python -m cycle_simulation --cycles 1000000
+    python -m cycle_simulation --presets 5,10,15 --deviation 0.05 --json
+"""
+
+import argparse
+import json
+import time
+
+from .presets import ROI_PRESETS, roi_preset
+from .simulator import DEFAULT_CHUNK_SIZE, simulate_presets
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Оффлайн-симуляция экономики циклов по ROI-пресетам")
+    parser.add_argument("--cycles", type=int, default=100_000, help="циклов на пресет")
+    parser.add_argument("--presets", type=str, default="", help="ROI через запятую (по умолчанию 2–20)")
+    parser.add_argument("--min-bet", type=float, default=1.0)
+    parser.add_argument("--max-bet", type=float, default=100.0)
+    parser.add_argument("--games", type=int, default=16)
+    parser.add_argument("--counts", type=str, default="", help="баланс игр W,L,D (по умолчанию из процентов)")
+    parser.add_argument("--deviation", type=float, default=0.0, help="доля игр с исходом не по плану")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--json", action="store_true", help="вывести отчёт в JSON")
+    args = parser.parse_args()
+
+    presets = [roi_preset(int(roi)) for roi in args.presets.split(",")] if args.presets else ROI_PRESETS
+    started = time.perf_counter()
+    reports = simulate_presets(
+        presets, args.cycles, seed=args.seed,
+        min_bet=args.min_bet, max_bet=args.max_bet, cycle_games=args.games,
+        deviation=args.deviation, chunk_size=args.chunk_size,
+        counts=[int(c) for c in args.counts.split(",")] if args.counts else None
+    )
+    elapsed = time.perf_counter() - started
+
+    if args.json:
+        print(json.dumps(reports, ensure_ascii=False, indent=2))
+        return
+
+    print(f"Циклов на пресет: {args.cycles}, диапазон {args.min_bet:g}–{args.max_bet:g}, игр {args.games}, отклонение {args.deviation:.0%}")
+    print(f"{'пресет':<12}{'ROI план':>10}{'ROI ср.':>10}{'ROI p5':>9}{'ROI p95':>9}{'приб. план':>12}{'приб. ср.':>11}{'приб. std':>11}{'циклов/с':>12}")
+    for report in reports:
+        roi, profit = report["roi_percent"], report["profit"]
+        print(
+            f"{report['preset']:<12}{report['planned_roi_percent']:>10.2f}{roi['mean']:>10.2f}{roi['p5']:>9.2f}{roi['p95']:>9.2f}"
+            f"{report['planned_profit']:>12.2f}{profit['mean']:>11.2f}{profit['std']:>11.2f}{report['cycles_per_second']:>12,.0f}"
+        )
+    total_cycles = sum(report["cycles"] for report in reports)
+    total_bets = sum(report["bets"] for report in reports)
+    print(f"\nИтого: {total_cycles:,} циклов, {total_bets:,} ставок за {elapsed:.2f} с "
+          f"({total_cycles / elapsed:,.0f} циклов/с, {total_bets / elapsed:,.0f} ставок/с)")
+
+
+if __name__ == "__main__":
+    main()
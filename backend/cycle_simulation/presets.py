@@ -0,0 +1,23 @@
+"""
+ROI-пресеты (как generateDefaultPresets в RegularBotsManagement.js)
+"""
+
+from typing import Dict, List
+
+DEFAULT_DRAWS_PERCENTAGE = 28.0
+
+
+def roi_preset(roi: int, draws_percentage: float = DEFAULT_DRAWS_PERCENTAGE) -> Dict[str, float]:
+    """Пресет W/L/D в процентах для целевого ROI: W = active*(1+r)/2, L = active - W"""
+    active_share = 100.0 - draws_percentage
+    wins = active_share * (1 + roi / 100.0) / 2
+    return {
+        "name": "⭐ ROI 10%" if roi == 10 else f"ROI {roi}%",
+        "roi": roi,
+        "wins_percentage": round(wins, 2),
+        "losses_percentage": round(active_share - wins, 2),
+        "draws_percentage": draws_percentage,
+    }
+
+
+ROI_PRESETS: List[Dict[str, float]] = [roi_preset(roi) for roi in range(2, 21)]
@@ -0,0 +1,155 @@
+"""
+Векторизованная симуляция циклов: планы строятся тем же движком, что и в server.py
+"""
+
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from core.cycle_economics import (
+    compute_cycle_planned_profit, compute_planned_roi_percent, natural_cycle_plan_spec, plan_seed,
+    regular_bot_cycle_counts
+)
+from core.cycle_planning import (
+    OUTCOME_DRAW, OUTCOME_LOSS, OUTCOME_WIN, largest_remainder, plan_matrix, plan_noise, plan_rng
+)
+
+DEFAULT_CHUNK_SIZE = 100_000
+PERCENTILES = (5, 50, 95)
+
+
+def _distribution(values: np.ndarray) -> Dict[str, float]:
+    """Сводка распределения: среднее, стандартное отклонение, перцентили"""
+    summary = {
+        "mean": round(float(values.mean()), 4),
+        "std": round(float(values.std()), 4),
+        "min": round(float(values.min()), 4),
+        "max": round(float(values.max()), 4),
+    }
+    for percentile, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        summary[f"p{percentile}"] = round(float(value), 4)
+    return summary
+
+
+def _cycle_groups(bot_doc: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Спецификации нечётного и чётного цикла: баланс W/L/D чередуется по номеру цикла,
+    суммы по категориям считаются так же, как при создании цикла в create_full_bot_cycle.
+    Seed спецификации детерминированный: сами ставки симуляция берёт из своего генератора.
+    """
+    groups = []
+    for cycle_number in (1, 2):
+        counts = regular_bot_cycle_counts(bot_doc, cycle_number)
+        groups.append(natural_cycle_plan_spec(
+            "simulation",
+            bot_doc["min_bet_amount"],
+            bot_doc["max_bet_amount"],
+            bot_doc["cycle_games"],
+            *counts,
+            bot_doc["wins_percentage"],
+            bot_doc["losses_percentage"],
+            bot_doc["draws_percentage"],
+            cycle_number,
+            plan_seed("simulation", cycle_number)
+        ))
+    return groups
+
+
+def simulate_preset(
+    preset: Dict[str, Any],
+    cycles: int,
+    min_bet: float = 1.0,
+    max_bet: float = 100.0,
+    cycle_games: int = 16,
+    deviation: float = 0.0,
+    counts: Optional[Sequence[int]] = None,
+    seed: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Dict[str, Any]:
+    """
+    Симулирует cycles циклов одного пресета.
+
+    counts — баланс игр (W, L, D) бота; по умолчанию делится пропорционально процентам пресета.
+    Для 16 игр баланс всё равно задаётся правилом ROI_set, как в create_full_bot_cycle.
+
+    deviation — вероятность, что игра завершится не по плану (исход выбирается случайно),
+    например из-за таймаута или отмены. При deviation=0 реализованная прибыль совпадает с планом
+    генератора, и отчёт показывает расхождение плана с калькулятором ROI на фронтенде.
+    """
+    if counts is None:
+        shares = np.array([preset["wins_percentage"], preset["losses_percentage"], preset["draws_percentage"]])
+        counts = largest_remainder(cycle_games * shares / shares.sum(), [cycle_games])[0].tolist()
+    bot_doc = {
+        "wins_count": counts[0],
+        "losses_count": counts[1],
+        "draws_count": counts[2],
+        "min_bet_amount": min_bet,
+        "max_bet_amount": max_bet,
+        "cycle_games": cycle_games,
+        "wins_percentage": preset["wins_percentage"],
+        "losses_percentage": preset["losses_percentage"],
+        "draws_percentage": preset["draws_percentage"],
+    }
+    rng = plan_rng(seed)
+    profits, rois, active_pools = [], [], []
+    generated_bets = 0
+    started = time.perf_counter()
+
+    # Нечётные циклы — первая группа, чётные — вторая
+    for parity, spec in enumerate(_cycle_groups(bot_doc)):
+        remaining = (cycles + 1 - parity) // 2
+        while remaining > 0:
+            rows = min(chunk_size, remaining)
+            remaining -= rows
+            noise = plan_noise(rng, rows, sum(spec["counts"]))
+            amounts, outcomes = plan_matrix(
+                noise, spec["counts"], spec["min_bet"], spec["max_bet"],
+                sums=np.tile(spec["sums"], (rows, 1))
+            )
+            if deviation > 0:
+                deviated = rng.random(outcomes.shape) < deviation
+                outcomes = np.where(deviated, rng.integers(OUTCOME_WIN, OUTCOME_DRAW + 1, outcomes.shape), outcomes)
+
+            wins = (amounts * (outcomes == OUTCOME_WIN)).sum(axis=1)
+            losses = (amounts * (outcomes == OUTCOME_LOSS)).sum(axis=1)
+            active = wins + losses
+            profits.append(wins - losses)
+            active_pools.append(active)
+            rois.append(np.divide((wins - losses) * 100.0, active, out=np.zeros(rows), where=active > 0))
+            generated_bets += amounts.size
+
+    elapsed = time.perf_counter() - started
+    profit = np.concatenate(profits)
+    roi = np.concatenate(rois)
+    odd_spec, even_spec = _cycle_groups(bot_doc)
+
+    return {
+        "preset": preset["name"],
+        "cycles": int(profit.size),
+        "bets": generated_bets,
+        "planned_roi_percent": compute_planned_roi_percent(
+            min_bet, max_bet, cycle_games,
+            preset["wins_percentage"], preset["losses_percentage"], preset["draws_percentage"]
+        ),
+        "planned_profit": compute_cycle_planned_profit(
+            min_bet, max_bet, cycle_games,
+            preset["wins_percentage"], preset["losses_percentage"], preset["draws_percentage"]
+        ),
+        "plan_sums": {"odd_cycle": list(odd_spec["sums"]), "even_cycle": list(even_spec["sums"])},
+        "profit": _distribution(profit),
+        "roi_percent": _distribution(roi),
+        "active_pool": _distribution(np.concatenate(active_pools)),
+        "elapsed_seconds": round(elapsed, 4),
+        "cycles_per_second": round(profit.size / elapsed, 1) if elapsed > 0 else None,
+        "bets_per_second": round(generated_bets / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+def simulate_presets(presets: Sequence[Dict[str, Any]], cycles: int, seed: Optional[int] = None, **options: Any) -> List[Dict[str, Any]]:
+    """Симуляция всех пресетов; каждый пресет получает свой поток случайных чисел от seed"""
+    seeds = np.random.SeedSequence(seed).spawn(len(presets))
+    return [
+        simulate_preset(preset, cycles, seed=preset_seed, **options)
+        for preset, preset_seed in zip(presets, seeds)
+    ]
@@ -1,13 +1,15 @@
 """
 Утилиты для отправки email уведомлений
 """
+import asyncio
 import smtplib
 import os
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from typing import Optional
+from contextlib import asynccontextmanager
+from email.message import EmailMessage
+from functools import lru_cache
+from typing import Dict, List, Optional
 import logging
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemLoader, Template, select_autoescape
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
@@ -17,192 +19,188 @@ SMTP_HOST = os.getenv('SMTP_HOST', 'smtp.gmail.com')
 SMTP_PORT = int(os.getenv('SMTP_PORT', '587'))
 SMTP_USER = os.getenv('SMTP_USER', '')
 SMTP_PASSWORD = os.getenv('SMTP_PASSWORD', '')
+SMTP_STARTTLS = os.getenv('SMTP_STARTTLS', 'true').lower() in ('1', 'true', 'yes')
+SMTP_POOL_SIZE = int(os.getenv('SMTP_POOL_SIZE', '3'))
+SMTP_TIMEOUT = float(os.getenv('SMTP_TIMEOUT', '30'))
 FROM_EMAIL = os.getenv('FROM_EMAIL', SMTP_USER)
 FRONTEND_URL = os.getenv('REACT_APP_BACKEND_URL', 'http://localhost:3000').replace('/api', '')
 
-# Initialize Jinja2 environment
+# Initialize Jinja2 environment: templates are compiled once and never re-checked on disk
 template_dir = Path(__file__).parent / 'email_templates'
-template_dir.mkdir(exist_ok=True)
-jinja_env = Environment(loader=FileSystemLoader(str(template_dir)))
+jinja_env = Environment(
+    loader=FileSystemLoader(str(template_dir)),
+    autoescape=select_autoescape(['html']),
+    auto_reload=False
+)
+
+EMAIL_SUBJECTS = {
+    "email_verification": "GemPlay - Подтверждение email адреса",
+    "password_reset": "GemPlay - Сброс пароля",
+}
+
+
+@lru_cache(maxsize=None)
+def get_template(name: str) -> Template:
+    return jinja_env.get_template(name)
+
+
+def render_email(template: str, **context) -> Dict[str, str]:
+    """Тема, HTML и текстовая версия письма из email_templates/<template>.html|.txt"""
+    return {
+        "subject": EMAIL_SUBJECTS[template],
+        "html": get_template(f"{template}.html").render(**context),
+        "text": get_template(f"{template}.txt").render(**context),
+    }
+
+
+def verification_email(to_email: str, username: str, verification_token: str) -> Dict[str, str]:
+    verification_url = f"{FRONTEND_URL}/verify-email?token={verification_token}"
+    return {"to": to_email, **render_email("email_verification", username=username, verification_url=verification_url)}
+
+
+def password_reset_email(to_email: str, username: str, reset_token: str) -> Dict[str, str]:
+    reset_url = f"{FRONTEND_URL}/reset-password?token={reset_token}"
+    return {"to": to_email, **render_email("password_reset", username=username, reset_url=reset_url)}
+
+
+def build_message(from_email: str, email: Dict[str, str]) -> EmailMessage:
+    message = EmailMessage()
+    message['From'] = from_email
+    message['To'] = email["to"]
+    message['Subject'] = email["subject"]
+    message.set_content(email.get("text") or "", charset='utf-8')
+    message.add_alternative(email["html"], subtype='html', charset='utf-8')
+    return message
+
+
+class SMTPPool:
+    """
+    Небольшой пул SMTP-соединений, уже прошедших STARTTLS и авторизацию.
+    Соединение возвращается в пул после успешной отправки и закрывается после ошибки.
+    """
+
+    def __init__(
+        self,
+        host: str = SMTP_HOST,
+        port: int = SMTP_PORT,
+        user: str = SMTP_USER,
+        password: str = SMTP_PASSWORD,
+        size: int = SMTP_POOL_SIZE,
+        start_tls: bool = SMTP_STARTTLS,
+        timeout: float = SMTP_TIMEOUT,
+    ):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.size = size
+        self.start_tls = start_tls
+        self.timeout = timeout
+        self._idle: List = []
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def _connect(self):
+        import aiosmtplib
+
+        client = aiosmtplib.SMTP(
+            hostname=self.host, port=self.port, timeout=self.timeout, start_tls=self.start_tls
+        )
+        await client.connect()
+        if self.user:
+            await client.login(self.user, self.password)
+        return client
+
+    @asynccontextmanager
+    async def connection(self):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+        async with self._slots:
+            client = None
+            while self._idle and client is None:
+                client = self._idle.pop()
+                if not client.is_connected:
+                    client = None
+            if client is None:
+                client = await self._connect()
+            try:
+                yield client
+            except Exception:
+                client.close()
+                raise
+            self._idle.append(client)
+
+    async def send(self, message: EmailMessage) -> None:
+        import aiosmtplib
+
+        try:
+            async with self.connection() as client:
+                await client.send_message(message)
+        except aiosmtplib.SMTPServerDisconnected:
+            # Сервер закрыл простаивавшее соединение — одна попытка на новом
+            async with self.connection() as client:
+                await client.send_message(message)
+
+    async def close(self) -> None:
+        idle, self._idle = self._idle, []
+        for client in idle:
+            try:
+                await client.quit()
+            except Exception:
+                client.close()
+
+
+smtp_pool = SMTPPool()
+
+
+async def deliver_email(email: Dict[str, str]) -> bool:
+    """
+    Отправка готового письма через пул. Ошибки SMTP пробрасываются, чтобы очередь
+    повторила отправку; без настроенного SMTP письмо пропускается.
+    """
+    if not SMTP_USER or not SMTP_PASSWORD:
+        logger.warning(f"Email не отправлен {email['to']}: SMTP не настроен")
+        return False
+    await smtp_pool.send(build_message(FROM_EMAIL, email))
+    logger.info(f"Email отправлен на {email['to']}: {email['subject']}")
+    return True
+
 
 class EmailService:
-    """Service for sending emails"""
-    
+    """Синхронная отправка одного письма на отдельном соединении (для скриптов вне event loop)"""
+
     def __init__(self):
         self.smtp_host = SMTP_HOST
         self.smtp_port = SMTP_PORT
         self.smtp_user = SMTP_USER
         self.smtp_password = SMTP_PASSWORD
         self.from_email = FROM_EMAIL
-        
-    def _send_email(self, to_email: str, subject: str, html_body: str, text_body: Optional[str] = None):
+
+    def _send_email(self, email: Dict[str, str]) -> bool:
         """Send email using SMTP"""
         if not self.smtp_user or not self.smtp_password:
-            logger.warning(f"Email не отправлен {to_email}: SMTP не настроен")
+            logger.warning(f"Email не отправлен {email['to']}: SMTP не настроен")
             return False
-            
+
         try:
-            # Create message
-            msg = MIMEMultipart('alternative')
-            msg['From'] = self.from_email
-            msg['To'] = to_email
-            msg['Subject'] = subject
-            
-            # Add text body if provided
-            if text_body:
-                text_part = MIMEText(text_body, 'plain', 'utf-8')
-                msg.attach(text_part)
-            
-            # Add HTML body
-            html_part = MIMEText(html_body, 'html', 'utf-8')
-            msg.attach(html_part)
-            
-            # Send email
             with smtplib.SMTP(self.smtp_host, self.smtp_port) as server:
                 server.starttls()
                 server.login(self.smtp_user, self.smtp_password)
-                server.send_message(msg)
-                
-            logger.info(f"Email отправлен на {to_email}: {subject}")
+                server.send_message(build_message(self.from_email, email))
+
+            logger.info(f"Email отправлен на {email['to']}: {email['subject']}")
             return True
-            
+
         except Exception as e:
-            logger.error(f"Ошибка отправки email на {to_email}: {e}")
+            logger.error(f"Ошибка отправки email на {email['to']}: {e}")
             return False
-    
+
     def send_email_verification(self, to_email: str, username: str, verification_token: str) -> bool:
         """Send email verification email"""
-        verification_url = f"{FRONTEND_URL}/verify-email?token={verification_token}"
-        
-        subject = "GemPlay - Подтверждение email адреса"
-        
-        html_body = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="utf-8">
-            <title>Подтверждение email</title>
-        </head>
-        <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px;">
-            <div style="text-align: center; margin-bottom: 30px;">
-                <h1 style="color: #10B981;">GemPlay</h1>
-                <p style="color: #6B7280;">PvP NFT Gem Battle Game</p>
-            </div>
-            
-            <div style="background: #F9FAFB; padding: 30px; border-radius: 10px;">
-                <h2 style="color: #1F2937; margin-bottom: 20px;">Добро пожаловать, {username}!</h2>
-                
-                <p style="color: #4B5563; line-height: 1.6; margin-bottom: 25px;">
-                    Спасибо за регистрацию в GemPlay! Для завершения создания аккаунта, 
-                    пожалуйста, подтвердите ваш email адрес.
-                </p>
-                
-                <div style="text-align: center; margin: 30px 0;">
-                    <a href="{verification_url}" 
-                       style="background: #10B981; color: white; padding: 12px 30px; 
-                              text-decoration: none; border-radius: 8px; font-weight: bold;
-                              display: inline-block;">
-                        Подтвердить Email
-                    </a>
-                </div>
-                
-                <p style="color: #6B7280; font-size: 14px; line-height: 1.4;">
-                    Если кнопка не работает, скопируйте и вставьте эту ссылку в браузер:<br>
-                    <a href="{verification_url}" style="color: #10B981; word-break: break-all;">
-                        {verification_url}
-                    </a>
-                </p>
-                
-                <p style="color: #9CA3AF; font-size: 12px; margin-top: 20px;">
-                    Если вы не создавали аккаунт в GemPlay, проигнорируйте это письмо.
-                </p>
-            </div>
-        </body>
-        </html>
-        """
-        
-        text_body = f"""
-        Добро пожаловать в GemPlay, {username}!
-        
-        Для подтверждения email адреса перейдите по ссылке:
-        {verification_url}
-        
-        Если вы не создавали аккаунт в GemPlay, проигнорируйте это письмо.
-        """
-        
-        return self._send_email(to_email, subject, html_body, text_body)
-    
+        return self._send_email(verification_email(to_email, username, verification_token))
+
     def send_password_reset(self, to_email: str, username: str, reset_token: str) -> bool:
         """Send password reset email"""
-        reset_url = f"{FRONTEND_URL}/reset-password?token={reset_token}"
-        
-        subject = "GemPlay - Сброс пароля"
-        
-        html_body = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="utf-8">
-            <title>Сброс пароля</title>
-        </head>
-        <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px;">
-            <div style="text-align: center; margin-bottom: 30px;">
-                <h1 style="color: #10B981;">GemPlay</h1>
-                <p style="color: #6B7280;">PvP NFT Gem Battle Game</p>
-            </div>
-            
-            <div style="background: #FEF3F2; padding: 30px; border-radius: 10px; border: 1px solid #FCA5A5;">
-                <h2 style="color: #DC2626; margin-bottom: 20px;">🔒 Сброс пароля</h2>
-                
-                <p style="color: #4B5563; line-height: 1.6; margin-bottom: 25px;">
-                    Привет, {username}! Мы получили запрос на сброс пароля для вашего аккаунта GemPlay.
-                </p>
-                
-                <div style="text-align: center; margin: 30px 0;">
-                    <a href="{reset_url}" 
-                       style="background: #DC2626; color: white; padding: 12px 30px; 
-                              text-decoration: none; border-radius: 8px; font-weight: bold;
-                              display: inline-block;">
-                        Сбросить Пароль
-                    </a>
-                </div>
-                
-                <p style="color: #6B7280; font-size: 14px; line-height: 1.4;">
-                    Если кнопка не работает, скопируйте и вставьте эту ссылку в браузер:<br>
-                    <a href="{reset_url}" style="color: #DC2626; word-break: break-all;">
-                        {reset_url}
-                    </a>
-                </p>
-                
-                <div style="background: #FEF9C3; padding: 15px; border-radius: 8px; margin: 20px 0; border: 1px solid #FDE047;">
-                    <p style="color: #854D0E; font-size: 14px; margin: 0; font-weight: bold;">
-                        ⚠️ Важно: Ссылка действительна только 1 час
-                    </p>
-                </div>
-                
-                <p style="color: #9CA3AF; font-size: 12px; margin-top: 20px;">
-                    Если вы не запрашивали сброс пароля, проигнорируйте это письмо. 
-                    Ваш пароль останется неизменным.
-                </p>
-            </div>
-        </body>
-        </html>
-        """
-        
-        text_body = f"""
-        Сброс пароля - GemPlay
-        
-        Привет, {username}!
-        
-        Мы получили запрос на сброс пароля для вашего аккаунта.
-        Для сброса пароля перейдите по ссылке (действительна 1 час):
-        
-        {reset_url}
-        
-        Если вы не запрашивали сброс пароля, проигнорируйте это письмо.
-        """
-        
-        return self._send_email(to_email, subject, html_body, text_body)
+        return self._send_email(password_reset_email(to_email, username, reset_token))
 
 # Global email service instance
 email_service = EmailService()
@@ -213,4 +211,4 @@ def send_verification_email(to_email: str, username: str, verification_token: st
 
 def send_password_reset_email(to_email: str, username: str, reset_token: str) -> bool:
     """Send password reset email"""
-    return email_service.send_password_reset(to_email, username, reset_token)
\ No newline at end of file
+    return email_service.send_password_reset(to_email, username, reset_token)
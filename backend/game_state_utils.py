@@ -0,0 +1,87 @@
+"""
+Переходы состояния игры условными атомарными обновлениями.
+
+Каждый переход — один find_one_and_update: в фильтре предусловия (статус, соперник,
+резерв) и версия документа, которую видел вызывающий; в обновлении — новое состояние
+и $inc версии. Из конкурирующих запросов проходит ровно один, остальные получают None,
+ничего не записав, поэтому проигравшим нечего компенсировать. Побочные эффекты
+(заморозка и возврат гемов и комиссии) выполняются только после выигранного перехода.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Optional, Sequence
+
+from pymongo import ReturnDocument
+
+from core.models import GameStatus
+
+VERSION_FIELD = "version"
+
+# Версию не проверять: переход защищён только предусловиями
+ANY_VERSION = object()
+
+
+def seen_version(game: Dict[str, Any]) -> Optional[int]:
+    """Версия прочитанного документа; у игр до появления версии — None (в фильтре совпадает с отсутствием поля)"""
+    return game.get(VERSION_FIELD)
+
+
+def reservable(user_id: str, now: datetime) -> Dict[str, Any]:
+    """Свободная игра чужого создателя, не зарезервированная другим (или с истёкшим резервом)"""
+    return {
+        "status": GameStatus.WAITING,
+        "opponent_id": None,
+        "creator_id": {"$ne": user_id},
+        "$or": [
+            {"reserved_by": None},
+            {"reserved_by": user_id},
+            {"reservation_expires_at": {"$lt": now}},
+        ],
+    }
+
+
+def joinable(user_id: str) -> Dict[str, Any]:
+    return {
+        "opponent_id": None,
+        "creator_id": {"$ne": user_id},
+        "$or": [
+            {"status": GameStatus.WAITING},
+            {"status": GameStatus.RESERVED, "reserved_by": user_id},
+        ],
+    }
+
+
+def cancellable(creator_id: str) -> Dict[str, Any]:
+    return {"status": GameStatus.WAITING, "creator_id": creator_id}
+
+
+def leavable(opponent_id: str) -> Dict[str, Any]:
+    return {"status": GameStatus.ACTIVE, "opponent_id": opponent_id}
+
+
+async def transition(
+    collection,
+    game_id: str,
+    preconditions: Dict[str, Any],
+    changes: Dict[str, Any],
+    version: Any = ANY_VERSION,
+    projection: Optional[Dict[str, Any]] = None,
+    unset: Sequence[str] = (),
+) -> Optional[Dict[str, Any]]:
+    """
+    Применяет changes, если игра всё ещё удовлетворяет preconditions (и имеет версию
+    version). Возвращает документ после перехода или None, если переход проигран.
+    unset — поля, которые переход снимает (например, метку задачи обслуживания).
+    """
+    query = {"id": game_id, **preconditions}
+    if version is not ANY_VERSION:
+        query[VERSION_FIELD] = version
+    update = {"$set": changes, "$inc": {VERSION_FIELD: 1}}
+    if unset:
+        update["$unset"] = {field: "" for field in unset}
+    return await collection.find_one_and_update(
+        query,
+        update,
+        projection=projection,
+        return_document=ReturnDocument.AFTER,
+    )
@@ -0,0 +1,322 @@
+"""
+Инвентарь гемов: один документ на пользователя вместо строки на (пользователь, тип гема).
+
+    {"user_id": ..., "quantity": {"Ruby": 10, ...}, "frozen": {"Ruby": 2, ...},
+     "created_at": ..., "updated_at": ...}
+
+Карты quantity и frozen рассчитаны на все семь типов GEM_TYPES; отсутствующий ключ
+читается как 0. Заморозка и списание набора гемов — один условный update_one: $inc
+под $expr-проверкой quantity - frozen >= n по каждому типу набора, так что проверка
+доступности и запись не разделены гонкой. Снятие заморозки и расчёт игры —
+pipeline-обновления, которые не опускают заморозку ниже нуля.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo import ReplaceOne
+
+from core.gems import GEM_PRICES
+
+GEM_TYPES = tuple(GEM_PRICES)
+
+# (collection, keys, options) для BOOTSTRAP_INDEXES
+GEM_INVENTORY_INDEXES = [
+    ("gem_inventories", [("user_id", 1)], {"unique": True}),
+]
+
+_PROJECTION = {"_id": 0, "user_id": 1, "quantity": 1, "frozen": 1, "updated_at": 1}
+
+
+def normalize_gems(gems: Any) -> Dict[str, int]:
+    """
+    {gem_type: n} из словаря или из старого списочного формата
+    [{"gem_type"/"name": ..., "quantity"/"count": n}]; нулевые и отрицательные количества отбрасываются.
+    """
+    if isinstance(gems, dict):
+        items = gems.items()
+    elif isinstance(gems, list):
+        items = [
+            (item.get("gem_type", item.get("name")), item.get("quantity", item.get("count", 0)))
+            for item in gems if isinstance(item, dict)
+        ]
+    else:
+        return {}
+    result: Dict[str, int] = {}
+    for gem_type, quantity in items:
+        if gem_type and quantity and quantity > 0:
+            gem_type = getattr(gem_type, "value", gem_type)  # GemType -> "Ruby"
+            result[gem_type] = result.get(gem_type, 0) + int(quantity)
+    return result
+
+
+def zero_counts() -> Dict[str, int]:
+    return {gem_type: 0 for gem_type in GEM_TYPES}
+
+
+def counts(doc: Optional[Dict[str, Any]], kind: str) -> Dict[str, int]:
+    """Карта kind ("quantity" или "frozen") документа с нулями для отсутствующих типов"""
+    stored = (doc or {}).get(kind) or {}
+    return {gem_type: stored.get(gem_type, 0) for gem_type in GEM_TYPES}
+
+
+def available(doc: Optional[Dict[str, Any]]) -> Dict[str, int]:
+    quantity, frozen = counts(doc, "quantity"), counts(doc, "frozen")
+    return {gem_type: quantity[gem_type] - frozen[gem_type] for gem_type in GEM_TYPES}
+
+
+def inventory_rows(doc: Optional[Dict[str, Any]], user_id: str) -> List[Dict[str, Any]]:
+    """Строки в прежнем формате user_gems (только типы, которые есть у пользователя)"""
+    quantity, frozen = counts(doc, "quantity"), counts(doc, "frozen")
+    updated_at = (doc or {}).get("updated_at")
+    return [
+        {
+            "user_id": user_id,
+            "gem_type": gem_type,
+            "quantity": quantity[gem_type],
+            "frozen_quantity": frozen[gem_type],
+            "updated_at": updated_at,
+        }
+        for gem_type in GEM_TYPES
+        if quantity[gem_type] or frozen[gem_type]
+    ]
+
+
+def inventory_value(doc: Optional[Dict[str, Any]], prices: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """Стоимость всех и доступных (незамороженных) гемов"""
+    prices = prices or GEM_PRICES
+    quantity, free = counts(doc, "quantity"), available(doc)
+    return {
+        "total": sum(quantity[gem_type] * prices.get(gem_type, 0) for gem_type in GEM_TYPES),
+        "available": sum(free[gem_type] * prices.get(gem_type, 0) for gem_type in GEM_TYPES),
+    }
+
+
+def _current(kind: str, gem_type: str) -> Dict[str, Any]:
+    return {"$ifNull": [f"${kind}.{gem_type}", 0]}
+
+
+def _clamped(kind: str, gem_type: str, delta: int) -> Dict[str, Any]:
+    return {"$max": [0, {"$add": [_current(kind, gem_type), delta]}]}
+
+
+def _enough(gems: Dict[str, int]) -> Dict[str, Any]:
+    """$expr: по каждому типу набора доступно (quantity - frozen) не меньше нужного"""
+    return {"$and": [
+        {"$gte": [{"$subtract": [_current("quantity", gem_type), _current("frozen", gem_type)]}, quantity]}
+        for gem_type, quantity in gems.items()
+    ]}
+
+
+def inventory_update(
+    delta: Optional[Dict[str, int]] = None, release: Any = None, extra: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Pipeline-обновление инвентаря: quantity меняется на delta (±), набор release снимается
+    с заморозки, заморозка не опускается ниже нуля. Пустой список — менять нечего.
+    """
+    fields: Dict[str, Any] = {}
+    for gem_type, amount in normalize_gems(release or {}).items():
+        fields[f"frozen.{gem_type}"] = _clamped("frozen", gem_type, -amount)
+    for gem_type, amount in (delta or {}).items():
+        if amount:
+            fields[f"quantity.{gem_type}"] = {"$add": [_current("quantity", gem_type), amount]}
+    if not fields:
+        return []
+    now = datetime.utcnow()
+    fields.update(extra or {})
+    fields["updated_at"] = now
+    fields["created_at"] = {"$ifNull": ["$created_at", now]}
+    return [{"$set": fields}]
+
+
+class GemInventoryStore:
+    def __init__(self, collection):
+        self.collection = collection
+
+    # --- чтение ---
+
+    async def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"user_id": user_id}, _PROJECTION)
+
+    async def get_many(self, user_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        cursor = self.collection.find({"user_id": {"$in": list(user_ids)}}, _PROJECTION)
+        return {doc["user_id"]: doc async for doc in cursor}
+
+    async def rows(self, user_id: str) -> List[Dict[str, Any]]:
+        return inventory_rows(await self.get(user_id), user_id)
+
+    # --- запись ---
+
+    async def create(self, user_id: str, gems: Optional[Dict[str, int]] = None) -> None:
+        """Новый (или сброшенный) инвентарь с заданным количеством и без заморозки"""
+        await self.collection.replace_one({"user_id": user_id}, self._fresh(user_id, gems), upsert=True)
+
+    async def create_many(self, user_ids: Iterable[str], gems: Optional[Dict[str, int]] = None) -> None:
+        operations = [ReplaceOne({"user_id": user_id}, self._fresh(user_id, gems), upsert=True) for user_id in user_ids]
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
+
+    async def insert_many(self, user_ids: Iterable[str], gems: Optional[Dict[str, int]] = None) -> int:
+        """Инвентари для новых пользователей одним insert_many; уже существующие не трогаются"""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return 0
+        present = {
+            document["user_id"]
+            async for document in self.collection.find({"user_id": {"$in": user_ids}}, {"_id": 0, "user_id": 1})
+        }
+        documents = [self._fresh(user_id, gems) for user_id in user_ids if user_id not in present]
+        if documents:
+            await self.collection.insert_many(documents, ordered=False)
+        return len(documents)
+
+    @staticmethod
+    def _fresh(user_id: str, gems: Optional[Dict[str, int]]) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        return {
+            "user_id": user_id,
+            "quantity": {**zero_counts(), **normalize_gems(gems or {})},
+            "frozen": zero_counts(),
+            "created_at": now,
+            "updated_at": now,
+        }
+
+    async def add(self, user_id: str, gems: Any) -> None:
+        """Начисление гемов; инвентарь создаётся при первой записи"""
+        gems = normalize_gems(gems)
+        if not gems:
+            return
+        now = datetime.utcnow()
+        await self.collection.update_one(
+            {"user_id": user_id},
+            {
+                "$inc": {f"quantity.{gem_type}": quantity for gem_type, quantity in gems.items()},
+                "$set": {"updated_at": now},
+                "$setOnInsert": {"created_at": now},
+            },
+            upsert=True,
+        )
+
+    async def freeze(self, user_id: str, gems: Any) -> bool:
+        """Замораживает весь набор или ничего; False — каких-то гемов не хватает"""
+        gems = normalize_gems(gems)
+        if not gems:
+            return True
+        result = await self.collection.update_one(
+            {"user_id": user_id, "$expr": _enough(gems)},
+            {
+                "$inc": {f"frozen.{gem_type}": quantity for gem_type, quantity in gems.items()},
+                "$set": {"updated_at": datetime.utcnow()},
+            },
+        )
+        return result.modified_count == 1
+
+    async def remove(self, user_id: str, gems: Any) -> bool:
+        """Списывает незамороженные гемы (продажа, подарок); False — не хватает доступных"""
+        gems = normalize_gems(gems)
+        if not gems:
+            return True
+        result = await self.collection.update_one(
+            {"user_id": user_id, "$expr": _enough(gems)},
+            {
+                "$inc": {f"quantity.{gem_type}": -quantity for gem_type, quantity in gems.items()},
+                "$set": {"updated_at": datetime.utcnow()},
+            },
+        )
+        return result.modified_count == 1
+
+    async def unfreeze(self, user_id: str, gems: Any) -> None:
+        await self.apply(user_id, release=gems, upsert=False)
+
+    async def apply(self, user_id: str, delta: Optional[Dict[str, int]] = None, release: Any = None, upsert: bool = True) -> None:
+        """Одно обновление на пользователя (см. inventory_update)"""
+        update = inventory_update(delta, release)
+        if update:
+            await self.collection.update_one({"user_id": user_id}, update, upsert=upsert)
+
+    async def top_up(self, user_id: str, minimums: Dict[str, int], target: Optional[Dict[str, int]] = None) -> None:
+        """Поднимает quantity типа до target (по умолчанию minimum), если оно ниже minimum"""
+        target = target or minimums
+        now = datetime.utcnow()
+        fields: Dict[str, Any] = {
+            f"quantity.{gem_type}": {"$cond": [
+                {"$lt": [_current("quantity", gem_type), minimum]},
+                target.get(gem_type, minimum),
+                _current("quantity", gem_type),
+            ]}
+            for gem_type, minimum in minimums.items()
+        }
+        fields["updated_at"] = now
+        fields["created_at"] = {"$ifNull": ["$created_at", now]}
+        await self.collection.update_one({"user_id": user_id}, [{"$set": fields}], upsert=True)
+
+    async def delete(self, user_id: str) -> None:
+        await self.collection.delete_one({"user_id": user_id})
+
+    async def zero_all(self) -> int:
+        """Обнуляет количество и заморозку во всех инвентарях"""
+        result = await self.collection.update_many(
+            {}, {"$set": {"quantity": zero_counts(), "frozen": zero_counts(), "updated_at": datetime.utcnow()}}
+        )
+        return result.modified_count
+
+    async def unfreeze_all(self) -> int:
+        result = await self.collection.update_many(
+            {"$or": [{f"frozen.{gem_type}": {"$gt": 0}} for gem_type in GEM_TYPES]},
+            {"$set": {"frozen": zero_counts(), "updated_at": datetime.utcnow()}},
+        )
+        return result.modified_count
+
+    async def migrate_from_rows(self, legacy_collection) -> Dict[str, int]:
+        """
+        Переносит строки user_gems в инвентари одним $merge на стороне сервера.
+
+        Инвентарь мог появиться раньше миграции (покупка или подарок на воркере,
+        который уже обслуживает запросы), поэтому к существующему документу старые
+        количества прибавляются. Метка legacy_migrated делает повторный запуск
+        после сбоя безопасным; старая коллекция остаётся как есть.
+        """
+        # Для уже существующего инвентаря: сумма по типам, если он ещё не получал старые строки
+        pending = {"$ne": ["$legacy_migrated", True]}
+        merged = {
+            kind: {
+                gem_type: {"$add": [
+                    {"$ifNull": [f"${kind}.{gem_type}", 0]},
+                    {"$cond": [pending, {"$ifNull": [f"$$new.{kind}.{gem_type}", 0]}, 0]},
+                ]}
+                for gem_type in GEM_TYPES
+            }
+            for kind in ("quantity", "frozen")
+        }
+        merged["updated_at"] = {"$cond": [pending, "$$NOW", "$updated_at"]}
+        merged["legacy_migrated"] = {"$literal": True}
+
+        before = await self.collection.estimated_document_count()
+        await legacy_collection.aggregate([
+            {"$match": {"gem_type": {"$in": list(GEM_TYPES)}}},
+            {"$group": {
+                "_id": {"user_id": "$user_id", "gem_type": "$gem_type"},
+                "quantity": {"$sum": {"$ifNull": ["$quantity", 0]}},
+                "frozen": {"$sum": {"$ifNull": ["$frozen_quantity", 0]}},
+                "updated_at": {"$max": "$updated_at"},
+            }},
+            {"$group": {
+                "_id": "$_id.user_id",
+                "quantity": {"$push": {"k": "$_id.gem_type", "v": {"$max": [0, "$quantity"]}}},
+                "frozen": {"$push": {"k": "$_id.gem_type", "v": {"$max": [0, "$frozen"]}}},
+                "updated_at": {"$max": "$updated_at"},
+            }},
+            {"$project": {
+                "_id": 0,
+                "user_id": "$_id",
+                "quantity": {"$mergeObjects": [zero_counts(), {"$arrayToObject": "$quantity"}]},
+                "frozen": {"$mergeObjects": [zero_counts(), {"$arrayToObject": "$frozen"}]},
+                "created_at": "$$NOW",
+                "updated_at": {"$ifNull": ["$updated_at", "$$NOW"]},
+                "legacy_migrated": {"$literal": True},
+            }},
+            {"$merge": {"into": self.collection.name, "on": "user_id", "whenMatched": [{"$set": merged}], "whenNotMatched": "insert"}},
+        ]).to_list(None)
+        after = await self.collection.estimated_document_count()
+        return {"inventories_created": after - before}
@@ -0,0 +1,78 @@
+"""
+Массовое создание Human-ботов.
+
+Прежде каждый бот создавался отдельно: для имени перечитывались все имена ботов
+(to_list(None)), затем insert_one бота и настройка гемов несколькими запросами.
+Здесь имена резервируются за один проход по множеству уже занятых, документы
+готовятся заранее, а запись идёт пачками insert_many по каждой коллекции.
+
+Пачка вставляет только документы, которых ещё нет (по ключу), поэтому
+возобновлённая задача повторяет свой план без дублей.
+"""
+
+import random
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set
+
+PROVISIONING_CHUNK_SIZE = 500
+
+
+async def load_names(collection) -> Set[str]:
+    """Все занятые имена одним курсором, только поле name"""
+    return {document["name"] async for document in collection.find({}, {"_id": 0, "name": 1}) if document.get("name")}
+
+
+def reserve_names(
+    requested: Sequence[Optional[str]],
+    existing: Iterable[str],
+    pool: Sequence[str],
+    rng: random.Random = random,
+) -> List[str]:
+    """
+    Имена для всех ботов за один проход. requested[i] — желаемое имя или None.
+
+    Занятое желаемое имя получает суффикс _1, _2...; без желаемого имени берётся
+    случайное свободное из pool, а когда они кончились — PlayerN.
+    """
+    taken = set(existing)
+    available = [name for name in dict.fromkeys(pool) if name not in taken]
+    rng.shuffle(available)
+    player_counter = 1
+    names = []
+    for name in requested:
+        name = (name or "").strip()
+        if name:
+            candidate, counter = name, 1
+            while candidate in taken:
+                candidate = f"{name}_{counter}"
+                counter += 1
+        else:
+            while available and available[-1] in taken:
+                available.pop()
+            if available:
+                candidate = available.pop()
+            else:
+                while f"Player{player_counter}" in taken:
+                    player_counter += 1
+                candidate = f"Player{player_counter}"
+        taken.add(candidate)
+        names.append(candidate)
+    return names
+
+
+def chunked(items: Sequence[Any], size: int = PROVISIONING_CHUNK_SIZE, start: int = 0) -> Iterator[Sequence[Any]]:
+    for offset in range(start, len(items), size):
+        yield items[offset:offset + size]
+
+
+async def insert_new(collection, documents: Sequence[Dict[str, Any]], key: str = "id") -> int:
+    """insert_many документов, ключа которых ещё нет в коллекции; возвращает число вставленных"""
+    if not documents:
+        return 0
+    present = {
+        document[key]
+        async for document in collection.find({key: {"$in": [document[key] for document in documents]}}, {"_id": 0, key: 1})
+    }
+    missing = [dict(document) for document in documents if document[key] not in present]
+    if missing:
+        await collection.insert_many(missing, ordered=False)
+    return len(missing)
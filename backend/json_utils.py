@@ -0,0 +1,49 @@
+"""
+Сериализация ответов API через orjson.
+
+ObjectId, Decimal, pydantic-модели и множества кодируются на лету в default,
+datetime/date/UUID/Enum orjson пишет сам — без предварительного рекурсивного
+копирования словарей (как делали jsonable_encoder и serialize_object_ids).
+"""
+
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def mongo_default(obj: Any) -> Any:
+    """Типы, которые orjson не знает: вызывается только для них"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode()
+    if hasattr(obj, '__dict__'):
+        return vars(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=mongo_default, option=ORJSON_OPTIONS)
+
+
+class MongoJSONResponse(ORJSONResponse):
+    """
+    Ответ по умолчанию для приложения. Если эндпоинт возвращает его напрямую,
+    FastAPI пропускает проверку response_model и jsonable_encoder — так отдаются
+    большие списки, собранные из доверенных документов базы.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,469 @@
+"""
+Лидерборды поверх агрегатов игроков.
+
+player_stats — один документ на игрока, который при расчёте игры меняется одним $inc
+(result_update). Чтение лидерборда и ранга игрока не сканирует базу: по каждой категории
+ведётся отсортированное множество — zset в Redis, если он подключён, иначе skiplist в
+памяти процесса (SortedSet, как zset в Redis: вставка, удаление и ранг за O(log n)).
+Множества в памяти каждого воркера догоняют базу по updated_at (Leaderboard.sync):
+первый вызов загружает снимок целиком, дальше — только изменённые документы.
+"""
+
+import asyncio
+import json
+import logging
+import random
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from gem_inventory_utils import GEM_TYPES, normalize_gems
+from outbox_utils import apply_once
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_CATEGORIES = ("winnings", "wins", "winrate", "games")
+LEADERBOARD_SIZE = 100
+
+# (collection, keys, options) для BOOTSTRAP_INDEXES
+PLAYER_STATS_INDEXES = [
+    ("player_stats", [("user_id", 1)], {"unique": True}),
+    ("player_stats", [("updated_at", 1)], {}),
+]
+
+# Часы воркеров расходятся: синхронизация перечитывает небольшой хвост до прошлой отметки
+SYNC_OVERLAP = timedelta(seconds=10)
+SYNC_BATCH = 1000
+
+SKIPLIST_MAX_LEVEL = 32
+SKIPLIST_P = 0.25
+
+_PROJECTION = {
+    "_id": 0, "user_id": 1, "username": 1, "games_played": 1, "games_won": 1, "games_lost": 1,
+    "games_draw": 1, "amount_won": 1, "amount_lost": 1, "gems_played": 1, "updated_at": 1,
+}
+
+
+def win_rate(stats: Dict[str, Any]) -> float:
+    played = stats.get("games_played", 0)
+    return round(stats.get("games_won", 0) / played * 100, 1) if played else 0.0
+
+
+def favorite_gem(stats: Dict[str, Any]) -> Optional[str]:
+    """Тип гема, которого поставлено больше всего"""
+    gems_played = stats.get("gems_played") or {}
+    played = [(gems_played.get(gem_type, 0), gem_type) for gem_type in GEM_TYPES if gems_played.get(gem_type, 0) > 0]
+    return max(played)[1] if played else None
+
+
+def score(category: str, stats: Dict[str, Any]) -> float:
+    if category == "winnings":
+        return float(stats.get("amount_won", 0))
+    if category == "wins":
+        return float(stats.get("games_won", 0))
+    if category == "games":
+        return float(stats.get("games_played", 0))
+    # winrate: при равном проценте выше тот, кто сыграл больше
+    return win_rate(stats) * 1_000_000 + min(stats.get("games_played", 0), 999_999)
+
+
+def profile(stats: Dict[str, Any]) -> Dict[str, Any]:
+    """Строка лидерборда без ранга"""
+    games_played = stats.get("games_played", 0)
+    return {
+        "user_id": stats["user_id"],
+        "username": stats.get("username"),
+        "total_winnings": stats.get("amount_won", 0),
+        "games_won": stats.get("games_won", 0),
+        "games_played": games_played,
+        "win_rate": win_rate(stats),
+        "level": min(games_played // 10 + 1, 50),
+        "favorite_gem": favorite_gem(stats),
+    }
+
+
+def result_update(game: Dict[str, Any], user_id: str, winner_id: Optional[str], username: Optional[str], now: datetime) -> Dict[str, Any]:
+    """$inc агрегатов игрока по итогу одной игры"""
+    bet_amount = game.get("bet_amount", 0)
+    inc: Dict[str, Any] = {"games_played": 1}
+    if not winner_id:
+        inc["games_draw"] = 1
+    elif winner_id == user_id:
+        inc["games_won"] = 1
+        inc["amount_won"] = bet_amount * 2
+    else:
+        inc["games_lost"] = 1
+        inc["amount_lost"] = bet_amount
+    for gem_type, quantity in normalize_gems(game.get("bet_gems")).items():
+        inc[f"gems_played.{gem_type}"] = quantity
+    return {"$inc": inc, "$set": {"username": username, "updated_at": now}, "$setOnInsert": {"created_at": now}}
+
+
+class _Node:
+    __slots__ = ("key", "member", "forward", "span")
+
+    def __init__(self, key: Optional[Tuple[float, str]], member: Optional[str], level: int):
+        self.key = key
+        self.member = member
+        self.forward: List[Optional["_Node"]] = [None] * level
+        self.span = [0] * level
+
+
+class SortedSet:
+    """
+    Skiplist с длинами шагов (span), как zset в Redis. Порядок — по убыванию score,
+    при равном score — по member. Ранги 0-based.
+    """
+
+    def __init__(self):
+        self._head = _Node(None, None, SKIPLIST_MAX_LEVEL)
+        self._level = 1
+        self._length = 0
+        self._scores: Dict[str, float] = {}
+        self._random = random.Random()
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __contains__(self, member: str) -> bool:
+        return member in self._scores
+
+    def score(self, member: str) -> Optional[float]:
+        return self._scores.get(member)
+
+    @staticmethod
+    def _key(member: str, score: float) -> Tuple[float, str]:
+        return (-score, member)
+
+    def _random_level(self) -> int:
+        level = 1
+        while level < SKIPLIST_MAX_LEVEL and self._random.random() < SKIPLIST_P:
+            level += 1
+        return level
+
+    def add(self, member: str, score: float) -> None:
+        current = self._scores.get(member)
+        if current == score:
+            return
+        if current is not None:
+            self._delete(self._key(member, current))
+        self._insert(self._key(member, score), member)
+        self._scores[member] = score
+
+    def remove(self, member: str) -> bool:
+        current = self._scores.pop(member, None)
+        if current is None:
+            return False
+        self._delete(self._key(member, current))
+        return True
+
+    def _insert(self, key: Tuple[float, str], member: str) -> None:
+        update: List[_Node] = [self._head] * SKIPLIST_MAX_LEVEL
+        rank = [0] * SKIPLIST_MAX_LEVEL
+        node = self._head
+        for i in range(self._level - 1, -1, -1):
+            rank[i] = 0 if i == self._level - 1 else rank[i + 1]
+            while node.forward[i] is not None and node.forward[i].key < key:
+                rank[i] += node.span[i]
+                node = node.forward[i]
+            update[i] = node
+        level = self._random_level()
+        if level > self._level:
+            for i in range(self._level, level):
+                rank[i] = 0
+                update[i] = self._head
+                self._head.span[i] = self._length
+            self._level = level
+        new = _Node(key, member, level)
+        for i in range(level):
+            new.forward[i] = update[i].forward[i]
+            update[i].forward[i] = new
+            new.span[i] = update[i].span[i] - (rank[0] - rank[i])
+            update[i].span[i] = rank[0] - rank[i] + 1
+        for i in range(level, self._level):
+            update[i].span[i] += 1
+        self._length += 1
+
+    def _delete(self, key: Tuple[float, str]) -> None:
+        update: List[_Node] = [self._head] * SKIPLIST_MAX_LEVEL
+        node = self._head
+        for i in range(self._level - 1, -1, -1):
+            while node.forward[i] is not None and node.forward[i].key < key:
+                node = node.forward[i]
+            update[i] = node
+        node = node.forward[0]
+        if node is None or node.key != key:
+            return
+        for i in range(self._level):
+            if update[i].forward[i] is node:
+                update[i].span[i] += node.span[i] - 1
+                update[i].forward[i] = node.forward[i]
+            else:
+                update[i].span[i] -= 1
+        while self._level > 1 and self._head.forward[self._level - 1] is None:
+            self._level -= 1
+        self._length -= 1
+
+    def rank(self, member: str) -> Optional[int]:
+        score = self._scores.get(member)
+        if score is None:
+            return None
+        key = self._key(member, score)
+        traversed = 0
+        node = self._head
+        for i in range(self._level - 1, -1, -1):
+            while node.forward[i] is not None and node.forward[i].key <= key:
+                traversed += node.span[i]
+                node = node.forward[i]
+            if node.key == key:
+                return traversed - 1
+        return None
+
+    def range(self, start: int, stop: int) -> List[Tuple[str, float]]:
+        """Элементы с рангами [start, stop)"""
+        if start < 0 or start >= self._length or stop <= start:
+            return []
+        traversed = 0
+        node = self._head
+        for i in range(self._level - 1, -1, -1):
+            while node.forward[i] is not None and traversed + node.span[i] <= start:
+                traversed += node.span[i]
+                node = node.forward[i]
+        node = node.forward[0]
+        result = []
+        while node is not None and len(result) < stop - start:
+            result.append((node.member, -node.key[0]))
+            node = node.forward[0]
+        return result
+
+
+class MemoryLeaderboardBackend:
+    """Множества в памяти процесса: у каждого воркера свои, догоняются через Leaderboard.sync"""
+
+    def __init__(self):
+        self.boards = {category: SortedSet() for category in LEADERBOARD_CATEGORIES}
+        self.profiles: Dict[str, Dict[str, Any]] = {}
+
+    async def put(self, stats_docs: Iterable[Dict[str, Any]]) -> None:
+        for stats in stats_docs:
+            user_id = stats["user_id"]
+            self.profiles[user_id] = profile(stats)
+            for category, board in self.boards.items():
+                board.add(user_id, score(category, stats))
+
+    async def remove(self, user_id: str) -> None:
+        self.profiles.pop(user_id, None)
+        for board in self.boards.values():
+            board.remove(user_id)
+
+    async def top(self, category: str, limit: int) -> List[Dict[str, Any]]:
+        return [self.profiles[member] for member, _ in self.boards[category].range(0, limit)]
+
+    async def rank(self, category: str, user_id: str) -> Optional[int]:
+        return self.boards[category].rank(user_id)
+
+    async def size(self) -> int:
+        return len(self.profiles)
+
+    async def clear(self) -> None:
+        self.boards = {category: SortedSet() for category in LEADERBOARD_CATEGORIES}
+        self.profiles = {}
+
+
+class RedisLeaderboardBackend:
+    """zset на категорию и хеш со строками лидерборда; общие для всех воркеров"""
+
+    def __init__(self, client, prefix: str = "gemplay:"):
+        self.client = client
+        self.prefix = prefix
+
+    def _board(self, category: str) -> str:
+        return f"{self.prefix}leaderboard:{category}"
+
+    @property
+    def _profiles(self) -> str:
+        return f"{self.prefix}leaderboard:profiles"
+
+    async def put(self, stats_docs: Iterable[Dict[str, Any]]) -> None:
+        pipe = self.client.pipeline(transaction=False)
+        for stats in stats_docs:
+            user_id = stats["user_id"]
+            pipe.hset(self._profiles, user_id, json.dumps(profile(stats)))
+            for category in LEADERBOARD_CATEGORIES:
+                pipe.zadd(self._board(category), {user_id: score(category, stats)})
+        await pipe.execute()
+
+    async def remove(self, user_id: str) -> None:
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hdel(self._profiles, user_id)
+        for category in LEADERBOARD_CATEGORIES:
+            pipe.zrem(self._board(category), user_id)
+        await pipe.execute()
+
+    async def top(self, category: str, limit: int) -> List[Dict[str, Any]]:
+        members = await self.client.zrevrange(self._board(category), 0, limit - 1)
+        if not members:
+            return []
+        return [json.loads(raw) for raw in await self.client.hmget(self._profiles, members) if raw]
+
+    async def rank(self, category: str, user_id: str) -> Optional[int]:
+        return await self.client.zrevrank(self._board(category), user_id)
+
+    async def size(self) -> int:
+        return await self.client.hlen(self._profiles)
+
+    async def clear(self) -> None:
+        await self.client.delete(self._profiles, *(self._board(category) for category in LEADERBOARD_CATEGORIES))
+
+
+class Leaderboard:
+    def __init__(self, collection, backend=None):
+        self.collection = collection
+        self.backend = backend or MemoryLeaderboardBackend()
+        self._synced_at: Optional[datetime] = None
+
+    def use_backend(self, backend) -> None:
+        self.backend = backend
+        self._synced_at = None
+
+    async def reset(self) -> int:
+        """После массового удаления player_stats: очищает множества и загружает оставшиеся агрегаты заново"""
+        await self.backend.clear()
+        self._synced_at = None
+        return await self.sync()
+
+    async def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"user_id": user_id}, _PROJECTION)
+
+    async def record_game(self, game: Dict[str, Any], winner_id: Optional[str], players: Dict[str, Optional[str]]) -> None:
+        """
+        Агрегаты участников игры (players: user_id -> username; боты сюда не входят).
+        Игра учитывается у каждого игрока один раз, поэтому повтор после сбоя безопасен.
+        """
+        if not players:
+            return
+        now = datetime.utcnow()
+        operations = []
+        for user_id, username in players.items():
+            query, update = apply_once({"user_id": user_id}, result_update(game, user_id, winner_id, username, now), game["id"])
+            operations.append(UpdateOne(query, update, upsert=True))
+        try:
+            await self.collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            # Дубликат user_id — у этого игрока игра уже учтена
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+        await self.backend.put(await self.collection.find({"user_id": {"$in": list(players)}}, _PROJECTION).to_list(None))
+
+    async def remove(self, user_id: str) -> None:
+        await self.collection.delete_one({"user_id": user_id})
+        await self.backend.remove(user_id)
+
+    async def top(self, category: str, limit: int = LEADERBOARD_SIZE) -> List[Dict[str, Any]]:
+        return [{"rank": position, **row} for position, row in enumerate(await self.backend.top(category, limit), start=1)]
+
+    async def rank(self, category: str, user_id: str) -> Optional[int]:
+        """Место игрока (с 1) или None, если он ещё не сыграл ни одной игры"""
+        rank = await self.backend.rank(category, user_id)
+        return None if rank is None else rank + 1
+
+    async def sync(self) -> int:
+        """Загружает изменённые с прошлого вызова агрегаты (при первом вызове — все)"""
+        started = datetime.utcnow()
+        query = {} if self._synced_at is None else {"updated_at": {"$gte": self._synced_at - SYNC_OVERLAP}}
+        loaded = 0
+        batch: List[Dict[str, Any]] = []
+        async for stats in self.collection.find(query, _PROJECTION):
+            batch.append(stats)
+            if len(batch) >= SYNC_BATCH:
+                await self.backend.put(batch)
+                loaded += len(batch)
+                batch = []
+        if batch:
+            await self.backend.put(batch)
+            loaded += len(batch)
+        self._synced_at = started
+        return loaded
+
+    async def run_sync(self, interval: float) -> None:
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error(f"Error syncing leaderboard: {e}")
+            await asyncio.sleep(interval)
+
+    async def rebuild_from_games(self, games_collection, users_collection, recorded_flag: Optional[str] = None) -> Dict[str, int]:
+        """
+        Пересчитывает player_stats из завершённых игр на стороне сервера ($merge).
+        В агрегаты попадают только пользователи из users (боты пропускаются).
+
+        Сначала все завершённые игры отмечаются полем recorded_flag, чтобы задачи
+        outbox, ещё не применённые к этим играм, их пропустили. Агрегаты сливаются
+        с документом (merge, а не replace), поэтому отметки applied_games остаются
+        и повтор уже применённой задачи после пересчёта не учтёт игру дважды.
+        """
+        if recorded_flag:
+            await games_collection.update_many(
+                {"status": "COMPLETED", recorded_flag: {"$ne": True}}, {"$set": {recorded_flag: True}}
+            )
+        players = [
+            {"$match": {"status": "COMPLETED"}},
+            {"$project": {
+                "_id": 0, "winner_id": 1, "bet_amount": 1, "bet_gems": 1,
+                "player": ["$creator_id", "$opponent_id"],
+            }},
+            {"$unwind": "$player"},
+            {"$match": {"player": {"$type": "string"}}},
+        ]
+        known_user = [
+            {"$lookup": {"from": users_collection.name, "localField": "_id", "foreignField": "id", "as": "_user"}},
+            {"$match": {"_user.0": {"$exists": True}}},
+        ]
+        is_winner = {"$eq": ["$winner_id", "$player"]}
+        is_draw = {"$eq": [{"$ifNull": ["$winner_id", None]}, None]}
+        await games_collection.aggregate([
+            *players,
+            {"$group": {
+                "_id": "$player",
+                "games_played": {"$sum": 1},
+                "games_won": {"$sum": {"$cond": [is_winner, 1, 0]}},
+                "games_draw": {"$sum": {"$cond": [is_draw, 1, 0]}},
+                "amount_won": {"$sum": {"$cond": [is_winner, {"$multiply": ["$bet_amount", 2]}, 0]}},
+                "amount_lost": {"$sum": {"$cond": [
+                    {"$or": [is_winner, is_draw]}, 0, {"$ifNull": ["$bet_amount", 0]}
+                ]}},
+            }},
+            *known_user,
+            {"$project": {
+                "_id": 0,
+                "user_id": "$_id",
+                "username": {"$arrayElemAt": ["$_user.username", 0]},
+                "games_played": 1,
+                "games_won": 1,
+                "games_draw": 1,
+                "games_lost": {"$subtract": ["$games_played", {"$add": ["$games_won", "$games_draw"]}]},
+                "amount_won": 1,
+                "amount_lost": 1,
+                "gems_played": {"$literal": {}},
+                "created_at": "$$NOW",
+                "updated_at": "$$NOW",
+            }},
+            {"$merge": {"into": self.collection.name, "on": "user_id", "whenMatched": "merge", "whenNotMatched": "insert"}},
+        ]).to_list(None)
+        # Второй проход: поставленные гемы (bet_gems старых игр может быть списком — такие пропускаются)
+        await games_collection.aggregate([
+            *players,
+            {"$match": {"bet_gems": {"$type": "object"}}},
+            {"$project": {"player": 1, "gem": {"$objectToArray": "$bet_gems"}}},
+            {"$unwind": "$gem"},
+            {"$match": {"gem.k": {"$in": list(GEM_TYPES)}}},
+            {"$group": {"_id": {"player": "$player", "gem_type": "$gem.k"}, "quantity": {"$sum": "$gem.v"}}},
+            {"$group": {"_id": "$_id.player", "gems_played": {"$push": {"k": "$_id.gem_type", "v": "$quantity"}}}},
+            {"$project": {"_id": 0, "user_id": "$_id", "gems_played": {"$arrayToObject": "$gems_played"}}},
+            {"$merge": {"into": self.collection.name, "on": "user_id", "whenMatched": "merge", "whenNotMatched": "discard"}},
+        ]).to_list(None)
+        self._synced_at = None
+        return {"players": await self.collection.count_documents({})}
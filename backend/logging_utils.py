@@ -0,0 +1,180 @@
+"""
+Настройка логирования: запись в отдельном потоке через QueueHandler/QueueListener,
+JSON-формат, ограничение частоты по месту вызова и понижение «отладочных»
+сообщений горячих путей до DEBUG.
+
+Переменные окружения:
+    LOG_LEVEL            уровень корневого логгера (INFO)
+    LOG_FORMAT           text | json (text)
+    LOG_RATE_LIMIT       сообщений с одного места вызова за LOG_RATE_WINDOW секунд, 0 — без лимита (20)
+    LOG_RATE_WINDOW      окно лимита в секундах (10)
+    LOG_DEMOTE_HOT_PATH  1 — hot_logger.info() пишет как DEBUG (по умолчанию выключено)
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Стандартные атрибуты LogRecord: всё остальное в record.__dict__ пришло из extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "suppressed"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись; поля из extra= попадают в объект как есть"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        return f"{text} (+{suppressed} similar suppressed)" if suppressed else text
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Не больше limit записей уровня INFO и ниже с одного места вызова (файл, строка) за window секунд.
+    Число отброшенных записей прикрепляется к следующей пропущенной записи с того же места.
+    """
+
+    def __init__(self, limit: int, window: float):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._sites: Dict[Tuple[str, int], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.limit <= 0 or record.levelno > logging.INFO:
+            return True
+        site = (record.pathname, record.lineno)
+        now = record.created
+        with self._lock:
+            state = self._sites.get(site)
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state else 0
+                self._sites[site] = [now, 1, 0]
+            elif state[1] < self.limit:
+                state[1] += 1
+                suppressed = 0
+            else:
+                state[2] += 1
+                return False
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class LoopQueueHandler(logging.handlers.QueueHandler):
+    """
+    В потоке вызывающего только подставляет аргументы в сообщение;
+    форматирование (время, JSON, traceback) и запись выполняет поток QueueListener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class HotPathLogger(logging.LoggerAdapter):
+    """
+    Логгер для сообщений горячих путей (циклы ботов, расчёт игр): при LOG_DEMOTE_HOT_PATH
+    их info() пишется как DEBUG и при обычном уровне INFO отбрасывается без форматирования.
+    """
+
+    def __init__(self, logger: logging.Logger, demote: bool = False):
+        super().__init__(logger, {})
+        self.demote = demote
+
+    def info(self, msg, *args, **kwargs):
+        kwargs.setdefault("stacklevel", 2)
+        self.log(logging.DEBUG if self.demote else logging.INFO, msg, *args, **kwargs)
+
+    def process(self, msg, kwargs):
+        return msg, kwargs
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def env_flag(name: str, default: str = "") -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+def configure_logging(
+    level: Optional[str] = None,
+    json_output: Optional[bool] = None,
+    rate_limit: Optional[int] = None,
+    rate_window: Optional[float] = None,
+    stream=None,
+) -> logging.handlers.QueueListener:
+    """Ставит очередь на корневой логгер; повторный вызов перенастраивает конвейер"""
+    global _listener
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+    json_output = os.getenv("LOG_FORMAT", "text").lower() == "json" if json_output is None else json_output
+    rate_limit = int(os.getenv("LOG_RATE_LIMIT", "20")) if rate_limit is None else rate_limit
+    rate_window = float(os.getenv("LOG_RATE_WINDOW", "10")) if rate_window is None else rate_window
+
+    if _listener is not None:
+        _listener.stop()
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if json_output else TextFormatter(TEXT_FORMAT))
+
+    handler = LoopQueueHandler(queue.SimpleQueue())
+    handler.addFilter(RateLimitFilter(rate_limit, rate_window))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+
+    _listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging() -> None:
+    """Дописывает очередь перед выходом процесса"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
+
+
+def hot_path_logger(name: str) -> HotPathLogger:
+    return HotPathLogger(logging.getLogger(name), demote=env_flag("LOG_DEMOTE_HOT_PATH"))
@@ -0,0 +1,207 @@
+"""
+Очередь исходящих задач (outbox) для побочных эффектов после расчёта игры:
+уведомления, счётчики, накопление прибыли ботов.
+
+Расчёт игры пишет задачу в коллекцию с уникальным ключом идемпотентности и сразу
+отвечает игроку; пул асинхронных обработчиков забирает задачи пачками, повторяет
+упавшие с экспоненциальной задержкой и подбирает задачи воркеров, умерших посреди работы.
+"""
+
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_CONCURRENCY = 4
+OUTBOX_POLL_SECONDS = 2.0
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_CLAIM_TIMEOUT_SECONDS = 120
+
+OUTBOX_PENDING = "pending"
+OUTBOX_RUNNING = "running"
+OUTBOX_DONE = "done"
+OUTBOX_FAILED = "failed"
+
+
+def outbox_task(kind: str, key: str, payload: Dict[str, Any], partition: Optional[str] = None) -> Dict[str, Any]:
+    """Документ задачи; key уникален — повторная постановка того же эффекта игнорируется"""
+    now = datetime.utcnow()
+    return {
+        "key": f"{kind}:{key}",
+        "kind": kind,
+        "partition": partition,
+        "payload": payload,
+        "status": OUTBOX_PENDING,
+        "attempts": 0,
+        "available_at": now,
+        "created_at": now,
+    }
+
+
+def retry_delay_seconds(attempts: int) -> float:
+    return min(2 ** attempts, 300)
+
+
+# Отметок на документ: с запасом больше, чем игр одного бота/игрока успевает пройти за все повторы задачи
+APPLIED_KEYS_WINDOW = 100
+
+
+def apply_once(
+    query: Dict[str, Any],
+    update: Dict[str, Any],
+    key: str,
+    field: str = "applied_games",
+    window: int = APPLIED_KEYS_WINDOW,
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Фильтр и обновление, которые применяют update к документу не более одного раза на key
+    (id игры): отметка пишется той же записью, что и $inc, поэтому повтор задачи после
+    сбоя досчитывает только недописанные документы. Хранятся последние window отметок.
+
+    С upsert повтор по уже отмеченному документу падает с DuplicateKeyError на уникальном
+    индексе — это значит «уже применено»; без уникального индекса upsert не использовать.
+    """
+    return (
+        {**query, field: {"$ne": key}},
+        {**update, "$push": {field: {"$each": [key], "$slice": -window}}},
+    )
+
+
+class Outbox:
+    """
+    Обработчики регистрируются по kind: async handler(payload). Задачи одной partition
+    внутри пачки выполняются последовательно, разные partition — параллельно.
+    discard_payload убирает payload у выполненных задач (например, письма со ссылками-токенами).
+    """
+
+    def __init__(
+        self,
+        collection,
+        concurrency: int = OUTBOX_CONCURRENCY,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        discard_payload: bool = False,
+    ):
+        self.collection = collection
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.discard_payload = discard_payload
+        self.handlers: Dict[str, Callable[[Dict[str, Any]], Awaitable[Any]]] = {}
+        self._wakeup = asyncio.Event()
+
+    def handler(self, kind: str):
+        def register(func):
+            self.handlers[kind] = func
+            return func
+        return register
+
+    async def enqueue(self, tasks: Iterable[Dict[str, Any]]) -> int:
+        documents = list(tasks)
+        if not documents:
+            return 0
+        try:
+            result = await self.collection.insert_many(documents, ordered=False)
+            inserted = len(result.inserted_ids)
+        except BulkWriteError as e:
+            # Дубликаты ключей — эффект уже поставлен в очередь
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+            inserted = e.details.get("nInserted", 0)
+        self._wakeup.set()
+        return inserted
+
+    async def claim_batch(self) -> List[Dict[str, Any]]:
+        now = datetime.utcnow()
+        ready = await self.collection.find(
+            {"$or": [
+                {"status": OUTBOX_PENDING, "available_at": {"$lte": now}},
+                {"status": OUTBOX_RUNNING, "claimed_at": {"$lt": now - timedelta(seconds=OUTBOX_CLAIM_TIMEOUT_SECONDS)}},
+            ]},
+            {"_id": 1, "status": 1}
+        ).sort("available_at", 1).limit(self.batch_size).to_list(self.batch_size)
+        if not ready:
+            return []
+        token = uuid.uuid4().hex
+        # Статус в фильтре повторно проверяется для каждого документа: задачу забирает один воркер
+        for status in (OUTBOX_PENDING, OUTBOX_RUNNING):
+            ids = [task["_id"] for task in ready if task["status"] == status]
+            if ids:
+                query = {"_id": {"$in": ids}, "status": status}
+                if status == OUTBOX_RUNNING:
+                    query["claimed_at"] = {"$lt": now - timedelta(seconds=OUTBOX_CLAIM_TIMEOUT_SECONDS)}
+                await self.collection.update_many(
+                    query, {"$set": {"status": OUTBOX_RUNNING, "claim": token, "claimed_at": now}}
+                )
+        return await self.collection.find({"claim": token, "status": OUTBOX_RUNNING}).sort("created_at", 1).to_list(None)
+
+    async def _run_task(self, task: Dict[str, Any]) -> None:
+        handler = self.handlers.get(task["kind"])
+        try:
+            if handler is None:
+                raise LookupError(f"No outbox handler for {task['kind']}")
+            await handler(task["payload"])
+        except Exception as e:
+            attempts = task.get("attempts", 0) + 1
+            failed = attempts >= OUTBOX_MAX_ATTEMPTS
+            logger.error(f"Outbox task {task['key']} failed (attempt {attempts}): {e}")
+            await self.collection.update_one(
+                {"_id": task["_id"], "claim": task["claim"]},
+                {"$set": {
+                    "status": OUTBOX_FAILED if failed else OUTBOX_PENDING,
+                    "attempts": attempts,
+                    "last_error": str(e)[:500],
+                    "available_at": datetime.utcnow() + timedelta(seconds=retry_delay_seconds(attempts)),
+                }}
+            )
+            return
+        unset = {"claim": ""}
+        if self.discard_payload:
+            unset["payload"] = ""
+        await self.collection.update_one(
+            {"_id": task["_id"], "claim": task["claim"]},
+            {"$set": {"status": OUTBOX_DONE, "done_at": datetime.utcnow()}, "$unset": unset}
+        )
+
+    async def _run_partition(self, tasks: List[Dict[str, Any]]) -> None:
+        for task in tasks:
+            await self._run_task(task)
+
+    async def process_batch(self) -> int:
+        tasks = await self.claim_batch()
+        if not tasks:
+            return 0
+        partitions: Dict[Any, List[Dict[str, Any]]] = {}
+        for task in tasks:
+            partitions.setdefault(task.get("partition") or task["_id"], []).append(task)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(group):
+            async with semaphore:
+                await self._run_partition(group)
+
+        await asyncio.gather(*(run(group) for group in partitions.values()))
+        return len(tasks)
+
+    async def run(self) -> None:
+        """Цикл обработки: разбор пачками, между пачками — ожидание новой задачи или таймаута"""
+        while True:
+            self._wakeup.clear()
+            try:
+                if await self.process_batch():
+                    continue
+            except Exception as e:
+                logger.error(f"Outbox dispatcher error: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=OUTBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def pending_count(self, partition: str) -> int:
+        return await self.collection.count_documents(
+            {"partition": partition, "status": {"$in": [OUTBOX_PENDING, OUTBOX_RUNNING]}}
+        )
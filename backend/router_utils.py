@@ -0,0 +1,42 @@
+"""
+Утилиты для ленивой регистрации маршрутов FastAPI
+"""
+
+from typing import Any, Callable, Dict, List, Tuple
+
+from fastapi import APIRouter, FastAPI
+
+
+class LazyAPIRouter(APIRouter):
+    """
+    APIRouter, который только запоминает HTTP-маршруты при объявлении.
+
+    Построение APIRoute (граф зависимостей, модели ответов) — самая дорогая часть
+    импорта server.py. Маршруты строятся один раз прямо в приложении при include_into(),
+    без промежуточной копии в самом роутере, как это делает app.include_router().
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._pending: List[Tuple[str, Callable[..., Any], Dict[str, Any]]] = []
+        self._included = False
+
+    def add_api_route(self, path: str, endpoint: Callable[..., Any], **kwargs: Any) -> None:
+        self._pending.append((path, endpoint, kwargs))
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def include_into(self, app: FastAPI) -> None:
+        """Строит отложенные маршруты в app (идемпотентно)"""
+        pending, self._pending = self._pending, []
+        for path, endpoint, kwargs in pending:
+            kwargs = dict(kwargs)
+            kwargs["tags"] = list(self.tags) + list(kwargs.get("tags") or [])
+            kwargs["dependencies"] = list(self.dependencies) + list(kwargs.get("dependencies") or [])
+            app.router.add_api_route(self.prefix + path, endpoint, **kwargs)
+        # WebSocket и прочие маршруты регистрируются обычным путём
+        if self.routes and not self._included:
+            app.include_router(self)
+        self._included = True
@@ -0,0 +1,78 @@
+"""
+Поиск по префиксу на индексах.
+
+Ключ поиска — текст в нижнем регистре, транслитерированный в латиницу
+(transliterate_to_latin), с одиночными пробелами. Он хранится рядом с исходным полем
+и пишется вместе с ним (name_key у ботов и Human-ботов; username_lower/email_lower у
+пользователей — имена пользователей и так латинские после sanitize_username).
+Запрос приводится к тому же ключу и превращается в диапазон [key, следующий ключ):
+якорный префикс, который MongoDB отвечает по индексу, в отличие от $regex с "i".
+
+Поиск по мере набора повторяет почти одинаковые запросы, поэтому результаты кэшируются
+на несколько секунд: если результат для более короткого префикса полный (строк меньше
+лимита), более длинный префикс фильтруется из него без запроса к базе.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from username_utils import transliterate_to_latin
+
+# (collection, keys, options) для BOOTSTRAP_INDEXES
+SEARCH_KEY_INDEXES = [
+    ("human_bots", [("name_key", 1)], {}),
+    ("bots", [("name_key", 1)], {}),
+]
+
+SEARCH_CACHE_TTL = 3.0  # секунды
+SEARCH_CACHE_SIZE = 4096
+
+
+def search_key(text: Optional[str]) -> str:
+    return " ".join(transliterate_to_latin(text or "").lower().split())
+
+
+def prefix_range(query: Optional[str]) -> Optional[Dict[str, str]]:
+    """Условие «ключ начинается с query» для индекса; None — пустой запрос"""
+    key = search_key(query)
+    if not key:
+        return None
+    return {"$gte": key, "$lt": key[:-1] + chr(ord(key[-1]) + 1)}
+
+
+class PrefixSearchCache:
+    """Результаты поиска по (scope, ключ) на ttl секунд; старые записи вытесняются по LRU"""
+
+    def __init__(self, ttl: float = SEARCH_CACHE_TTL, max_entries: int = SEARCH_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, List[Dict[str, Any]], bool]]" = OrderedDict()
+
+    def get(self, scope: str, key: str, matches: Callable[[Dict[str, Any]], bool]) -> Optional[List[Dict[str, Any]]]:
+        """
+        Точное попадание или полный результат одного из более коротких префиксов,
+        отфильтрованный matches; None — нужно идти в базу.
+        """
+        now = time.monotonic()
+        for length in range(len(key), 0, -1):
+            entry = self._entries.get((scope, key[:length]))
+            if entry is None:
+                continue
+            stored_at, rows, complete = entry
+            if now - stored_at > self.ttl:
+                del self._entries[(scope, key[:length])]
+                continue
+            if length == len(key):
+                self._entries.move_to_end((scope, key))
+                return rows
+            if complete:
+                return [row for row in rows if matches(row)]
+        return None
+
+    def put(self, scope: str, key: str, rows: Iterable[Dict[str, Any]], complete: bool) -> None:
+        """complete — в базе нет других строк под этим префиксом (результат не обрезан лимитом)"""
+        self._entries[(scope, key)] = (time.monotonic(), list(rows), complete)
+        self._entries.move_to_end((scope, key))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
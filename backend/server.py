@@ -1,13 +1,14 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, BackgroundTasks, Request, Query, Body
+from fastapi import FastAPI, HTTPException, Depends, status, BackgroundTasks, Request, Query, Body, WebSocket, WebSocketDisconnect
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from dotenv import load_dotenv
 from motor.motor_asyncio import AsyncIOMotorClient
-from bson import ObjectId
-from pymongo.errors import ServerSelectionTimeoutError, NetworkTimeout, AutoReconnect
+from bson import ObjectId, json_util
+from pymongo import UpdateOne, ReplaceOne, ReturnDocument
+from pymongo.errors import ServerSelectionTimeoutError, NetworkTimeout, AutoReconnect, BulkWriteError, DuplicateKeyError
 from pydantic import BaseModel, Field, EmailStr, field_validator, field_validator
-from typing import List, Optional, Dict, Any, Union
+from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
 from passlib.context import CryptContext
 from jose import JWTError, jwt
@@ -20,9 +21,7 @@ import math
 from pathlib import Path
 from enum import Enum
 import pytz
-import schedule
 import time
-from threading import Thread
 import hashlib
 import json
 import secrets
@@ -32,15 +31,55 @@ import bcrypt
 import gc
 import tempfile
 import glob
+import base64
+import csv
+import io
+import zlib
 from cachetools import TTLCache, LRUCache
+from router_utils import LazyAPIRouter
+from logging_utils import configure_logging, hot_path_logger
+from json_utils import MongoJSONResponse
+from coordination_utils import MongoLeaseBackend, RedisLeaseBackend, WorkerCoordinator
+from outbox_utils import Outbox, apply_once, outbox_task
+from token_store_utils import REFRESH_TOKEN_INDEXES, RefreshTokenStore
+from gem_inventory_utils import GEM_INVENTORY_INDEXES, GEM_TYPES, GemInventoryStore, available, counts, inventory_update, inventory_value, normalize_gems
+from leaderboard_utils import LEADERBOARD_CATEGORIES, PLAYER_STATS_INDEXES, Leaderboard, RedisLeaderboardBackend, favorite_gem
+from search_utils import SEARCH_KEY_INDEXES, PrefixSearchCache, prefix_range, search_key
+from human_bot_provisioning_utils import chunked, insert_new, load_names, reserve_names
+from game_state_utils import cancellable, joinable, leavable, reservable, seen_version, transition
+from bootstrap_utils import acquire_lease, bootstrap_digest, create_indexes, run_bootstrap, upsert_defaults
 from username_utils import process_username, validate_username, sanitize_username
-from email_utils import send_verification_email, send_password_reset_email
+from email_utils import SMTP_POOL_SIZE, deliver_email, password_reset_email, smtp_pool, verification_email
 from auth_utils import (
-    generate_secure_token, hash_token, create_access_token, create_refresh_token,
+    generate_secure_token, hash_token, create_access_token,
     verify_token, verify_google_token, check_account_lockout, should_lock_account,
     calculate_lockout_time, has_permission, get_current_user, get_current_admin_user,
     get_current_super_admin, get_user_permissions, get_client_ip, ROLE_PERMISSIONS
 )
+from core.models import (
+    UserRole, BotType, HumanBotCharacter, UpdateBotPauseRequest, UserStatus, GemType, GameStatus,
+    GameMove, TransactionType, SoundCategory, GameType, User, GemDefinition,
+    CreateGemRequest, UpdateGemRequest, GemAdminResponse, Game, Transaction,
+    ProfitEntry, Bot, AdminLog, HumanBot,
+    HumanBotLog, SecurityAlert, SecurityMonitoring, SuspiciousActivity, EmailVerification,
+    Notification, Sound, UserResponse, Token, GemResponse, CancelGameResponse,
+    AddBalanceRequest, UserRegistration, UserLogin, PasswordResetRequest, PasswordResetConfirm,
+    ResendVerificationRequest, GoogleOAuthRequest, UpdateProfileRequest,
+    EmailVerificationRequest, CreateGameRequest, JoinGameRequest,
+    CreateHumanBotRequest, UpdateHumanBotRequest, ToggleAutoPlayRequest,
+    TogglePlayWithPlayersRequest, ToggleAllRequest, BulkCreateHumanBotsRequest,
+    CreateSoundRequest, UpdateSoundRequest, UploadSoundFileRequest, ResendNotificationRequest,
+    SoundResponse, HumanBotResponse, HumanBotsStatsResponse,
+    PaginationInfo, HumanBotsListResponse
+)
+from core.gems import GEM_PRICES, gems_value, gem_combination_possible
+from core.views import BotView, GameView, HumanBotView
+from core.rps import hash_move_with_salt, verify_move_hash, determine_rps_winner
+from core.settlement import DEFAULT_COMMISSION_RATE_PERCENT, round_money, commission_for
+from core.cycle_economics import (
+    new_plan_seed, compute_cycle_planned_profit, compute_planned_roi_percent,
+    natural_cycle_plan_spec, regular_bot_cycle_counts
+)
 
 # Load environment variables
 ROOT_DIR = Path(__file__).parent
@@ -62,6 +101,12 @@ client = AsyncIOMotorClient(
 )
 db = client[os.environ.get('DB_NAME', 'gemplay_db')]
 
+# One inventory document per user: multi-gem freezes are a single conditional update
+gem_inventory = GemInventoryStore(db.gem_inventories)
+
+# Per-player aggregates (player_stats) with sorted sets for leaderboard ranks
+leaderboard = Leaderboard(db.player_stats)
+
 # Security
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
@@ -80,16 +125,6 @@ SUSPICIOUS_ACTIVITY_THRESHOLDS = {
     "max_balance_change_per_hour": 5000,
     "unusual_login_locations": True
 }
-# Gem prices
-GEM_PRICES = {
-    "Ruby": 1.0,
-    "Amber": 2.0,
-    "Topaz": 5.0,
-    "Emerald": 10.0,
-    "Aquamarine": 25.0,
-    "Sapphire": 50.0,
-    "Magic": 100.0
-}
 
 # In-memory rate limiting (in production, use Redis)
 request_counts = defaultdict(lambda: defaultdict(int))
@@ -108,11 +143,20 @@ system_metrics_cache = TTLCache(maxsize=50, ttl=120)    # 2 minutes TTL for syst
 # Redis connection (optional, will be initialized if available)
 redis_client = None
 
+# Background loop leader election (Redis leases when available, else Mongo); set on startup
+coordinator: Optional[WorkerCoordinator] = None
+# Post-game side effects (notifications, counters, bot profit) processed by every worker
+outbox = Outbox(db.outbox)
+# Verification and password-reset mail, sent through a pool of authenticated SMTP connections
+email_outbox = Outbox(db.email_outbox, concurrency=SMTP_POOL_SIZE, discard_payload=True)
+# Split regular bots across all workers by consistent hashing instead of one leader running them all
+BOT_SHARDING_ENABLED = os.environ.get('BOT_SHARDING', '').lower() in ('1', 'true', 'yes')
+
 # Timezone
 TIMEZONE = pytz.timezone(os.environ.get('TIMEZONE', 'Asia/Almaty'))
 
 # Create the main app
-app = FastAPI(title="GemPlay API", version="1.0.0")
+app = FastAPI(title="GemPlay API", version="1.0.0", default_response_class=MongoJSONResponse)
 
 # CORS middleware
 app.add_middleware(
@@ -179,30 +223,16 @@ async def init_redis():
         redis_client = None
         return False
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Configure logging: records are formatted and written by a listener thread, not the event loop
+configure_logging()
 logger = logging.getLogger(__name__)
+# Per-game / per-bot chatter; LOG_DEMOTE_HOT_PATH=1 turns it into DEBUG
+hot_logger = hot_path_logger(__name__)
 
 # ==============================================================================
 # UTILITY FUNCTIONS
 # ==============================================================================
 
-def serialize_object_ids(obj):
-    """Convert ObjectId fields to strings in a dictionary/object recursively"""
-    if isinstance(obj, dict):
-        return {k: serialize_object_ids(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [serialize_object_ids(item) for item in obj]
-    elif isinstance(obj, ObjectId):
-        return str(obj)
-    elif hasattr(obj, '__dict__'):
-        return {k: serialize_object_ids(v) for k, v in obj.__dict__.items()}
-    else:
-        return obj
-
 def get_user_online_status(user_data):
     """
     Определяет онлайн статус пользователя на основе времени последней активности.
@@ -235,914 +265,6 @@ def get_user_online_status(user_data):
     else:
         return "OFFLINE"
 
-# ==============================================================================
-# ENUMS
-# ==============================================================================
-
-class UserRole(str, Enum):
-    USER = "USER"
-    MODERATOR = "MODERATOR"  
-    ADMIN = "ADMIN"
-    SUPER_ADMIN = "SUPER_ADMIN"
-
-class Permission(str, Enum):
-    # User permissions
-    VIEW_PROFILE = "VIEW_PROFILE"
-    EDIT_PROFILE = "EDIT_PROFILE"
-    
-    # Game permissions  
-    CREATE_GAME = "CREATE_GAME"
-    JOIN_GAME = "JOIN_GAME"
-    VIEW_GAMES = "VIEW_GAMES"
-    
-    # Admin permissions
-    VIEW_ADMIN_PANEL = "VIEW_ADMIN_PANEL"
-    MANAGE_USERS = "MANAGE_USERS"
-    MANAGE_GAMES = "MANAGE_GAMES"
-    MANAGE_BOTS = "MANAGE_BOTS"
-    MANAGE_ECONOMY = "MANAGE_ECONOMY"
-    VIEW_ANALYTICS = "VIEW_ANALYTICS"
-    MANAGE_SOUNDS = "MANAGE_SOUNDS"
-    
-    # Super admin permissions
-    MANAGE_ROLES = "MANAGE_ROLES"
-    SYSTEM_SETTINGS = "SYSTEM_SETTINGS"
-
-class Role(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    name: str
-    description: str
-    permissions: List[Permission] = []
-    is_system_role: bool = False  # System roles cannot be deleted
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
-
-class BotType(str, Enum):
-    REGULAR = "REGULAR"
-    HUMAN = "HUMAN"
-
-class HumanBotCharacter(str, Enum):
-    STABLE = "STABLE"           # Стабильный
-    AGGRESSIVE = "AGGRESSIVE"   # Агрессивный
-    CAUTIOUS = "CAUTIOUS"      # Осторожный
-    BALANCED = "BALANCED"       # Балансированный
-    IMPULSIVE = "IMPULSIVE"     # Импульсивный
-    ANALYST = "ANALYST"         # Аналитик
-    MIMIC = "MIMIC"            # Мимик
-
-class BotMode(str, Enum):
-    SIMPLE = "SIMPLE"      # Простой рандом
-    ALGORITHMIC = "ALGORITHMIC"  # С алгоритмом побед
-
-# Bot Settings model
-class BotSettings(BaseModel):
-    id: str = Field(default="bot_settings")
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
-
-class UpdateBotPauseRequest(BaseModel):
-    pause_between_cycles: int = Field(..., ge=1, le=3600, description="Пауза между циклами в секундах (1-3600)")
-    pause_between_bets: Optional[int] = Field(default=5, ge=1, le=3600, description="Пауза между ставками в секундах (1-3600)")
-
-# Removed legacy: UpdateBotWinPercentageRequest (win_percentage deprecated)
-
-
-
-# Interface Settings model
-class InterfaceSettings(BaseModel):
-    live_players: dict = Field(default={
-        "my_bets": 10,
-        "available_bets": 10,
-        "ongoing_battles": 10
-    })
-    bot_players: dict = Field(default={
-        "available_bots": 10,
-        "ongoing_bot_battles": 10
-    })
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
-
-# Bot Queue Stats model
-class BotQueueStats(BaseModel):
-    totalActiveRegularBets: int = 0
-    totalQueuedBets: int = 0
-    totalRegularBots: int = 0
-    totalHumanBots: int = 0
-
-# Bot model
-class UserStatus(str, Enum):
-    ACTIVE = "ACTIVE"
-    BANNED = "BANNED"
-    EMAIL_PENDING = "EMAIL_PENDING"
-
-class GemType(str, Enum):
-    RUBY = "Ruby"
-    AMBER = "Amber"
-    TOPAZ = "Topaz"
-    EMERALD = "Emerald"
-    AQUAMARINE = "Aquamarine"
-    SAPPHIRE = "Sapphire"
-    MAGIC = "Magic"
-
-class GameStatus(str, Enum):
-    WAITING = "WAITING"
-    ACTIVE = "ACTIVE"
-    COMPLETED = "COMPLETED"
-    CANCELLED = "CANCELLED"
-    TIMEOUT = "TIMEOUT"  # Игра завершена по таймауту
-    FROZEN = "FROZEN"  # Игра заморожена (бот деактивирован)
-    RESERVED = "RESERVED"  # Игра зарезервирована игроком (60 сек)
-
-class GameMove(str, Enum):
-    ROCK = "rock"
-    PAPER = "paper"
-    SCISSORS = "scissors"
-
-class TransactionType(str, Enum):
-    DEPOSIT = "DEPOSIT"
-    WITHDRAWAL = "WITHDRAWAL"
-    PURCHASE = "PURCHASE"
-    SALE = "SALE"
-    GIFT = "GIFT"
-    COMMISSION = "COMMISSION"
-    BET = "BET"
-    WIN = "WIN"
-    REFUND = "REFUND"
-    DAILY_BONUS = "DAILY_BONUS"
-
-class SoundCategory(str, Enum):
-    GAMING = "GAMING"           # Игровые действия
-    UI = "UI"                   # UI элементы  
-    SYSTEM = "SYSTEM"           # Системные уведомления
-    BACKGROUND = "BACKGROUND"   # Фоновые звуки/музыка
-
-class GameType(str, Enum):
-    HUMAN_VS_HUMAN = "HUMAN_VS_HUMAN"
-    HUMAN_VS_BOT = "HUMAN_VS_BOT" 
-    ALL = "ALL"
-
-class SoundPriority(str, Enum):
-    LOW = "LOW"           # 1-2
-    MEDIUM = "MEDIUM"     # 3-5
-    HIGH = "HIGH"         # 6-8
-    CRITICAL = "CRITICAL" # 9-10
-
-# ==============================================================================
-# MODELS
-# ==============================================================================
-
-class User(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    username: str
-    email: EmailStr
-    password_hash: str
-    role: UserRole = UserRole.USER
-    status: UserStatus = UserStatus.EMAIL_PENDING
-    gender: str = "male"  # male/female for avatar
-    virtual_balance: float = 0.0
-    frozen_balance: float = 0.0
-    daily_limit_used: float = 0.0
-    daily_limit_max: float = 1000.0
-    last_daily_reset: datetime = Field(default_factory=datetime.utcnow)
-    
-    # Email verification
-    email_verification_token: Optional[str] = None
-    email_verified: bool = False
-    
-    # Password reset
-    password_reset_token: Optional[str] = None
-    password_reset_expires: Optional[datetime] = None
-    
-    # OAuth providers
-    google_id: Optional[str] = None
-    oauth_provider: Optional[str] = None  # 'google', etc.
-    
-    # Security
-    last_password_change: Optional[datetime] = None
-    failed_login_attempts: int = 0
-    locked_until: Optional[datetime] = None
-    
-    ban_reason: Optional[str] = None
-    ban_until: Optional[datetime] = None
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
-    last_login: Optional[datetime] = None
-    last_login_ip: Optional[str] = None
-    
-    total_games_played: int = 0
-    total_games_won: int = 0
-    total_amount_wagered: float = 0.0
-    total_amount_won: float = 0.0
-    total_commission_paid: float = 0.0  # Общая сумма комиссий, оплаченных ботом
-    timezone_offset: int = 0  # UTC offset in hours (-12 to +12)
-
-class GemDefinition(BaseModel):
-    id: Optional[str] = Field(default_factory=lambda: str(uuid.uuid4()))
-    type: str  # Changed from GemType to allow custom gem types
-    name: str
-    price: int  # Changed to int for whole dollars only
-    color: str
-    icon: str
-    rarity: str
-    enabled: bool = True
-    is_default: bool = False  # For default 7 gems that can't be deleted
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-
-# Admin-specific gem models
-class CreateGemRequest(BaseModel):
-    name: str = Field(..., min_length=1, max_length=50)
-    price: int = Field(..., ge=1, le=10000)  # Only whole dollars
-    color: str = Field(..., pattern=r'^#[0-9A-Fa-f]{6}$')  # HEX color
-    icon: str = Field(..., description="Base64 encoded image")
-    rarity: str = Field(default="Common")
-
-class UpdateGemRequest(BaseModel):
-    name: Optional[str] = Field(None, min_length=1, max_length=50)
-    price: Optional[int] = Field(None, ge=1, le=10000)
-    color: Optional[str] = Field(None, pattern=r'^#[0-9A-Fa-f]{6}$')
-    icon: Optional[str] = None
-    rarity: Optional[str] = None
-    enabled: Optional[bool] = None
-
-class GemAdminResponse(BaseModel):
-    id: str
-    type: str
-    name: str
-    price: int
-    color: str
-    icon: str
-    rarity: str
-    enabled: bool
-    is_default: bool  # Can't be deleted if True
-    created_at: datetime
-
-class UserGem(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    user_id: str
-    gem_type: GemType
-    quantity: int = 0
-    frozen_quantity: int = 0  # количество заморожено в ставках
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
-
-class Game(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    creator_id: str
-    creator_type: str = "user"  # "user", "bot", "human_bot"
-    opponent_id: Optional[str] = None
-    opponent_type: Optional[str] = None  # "user", "bot", "human_bot"
-    creator_move: Optional[GameMove] = None
-    opponent_move: Optional[GameMove] = None
-    creator_move_hash: Optional[str] = None  # Для commit-reveal схемы
-    creator_salt: Optional[str] = None
-    bet_amount: float
-    bet_gems: Dict[str, int]  # {"Ruby": 5, "Emerald": 2} - Creator's gems
-    opponent_gems: Optional[Union[Dict[str, int], List[Dict[str, Any]]]] = None  # Support both formats
-    status: GameStatus = GameStatus.WAITING
-    winner_id: Optional[str] = None
-    commission_amount: float = 0.0
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    started_at: Optional[datetime] = None
-    completed_at: Optional[datetime] = None
-    cancelled_at: Optional[datetime] = None
-    active_deadline: Optional[datetime] = None  # Крайний срок для завершения активной игры (1 минута)
-    joined_at: Optional[datetime] = None  # When opponent joined the game
-    updated_at: Optional[datetime] = None
-    is_bot_game: bool = False
-    bot_id: Optional[str] = None
-    bot_type: Optional[str] = None  # "REGULAR", "HUMAN"
-    is_regular_bot_game: bool = False  # Флаг для игр против обычных ботов (без комиссии)
-    metadata: Optional[Dict[str, Any]] = None  # Дополнительные метаданные игры
-    reserved_by: Optional[str] = None  # ID пользователя, который зарезервировал игру
-    reserved_at: Optional[datetime] = None  # Время резервирования
-    reservation_expires_at: Optional[datetime] = None  # Время истечения резервирования
-
-class Transaction(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    user_id: str
-    transaction_type: TransactionType
-    amount: float
-    currency: str = "USD"  # USD для долларов, GEM для гемов
-    gem_type: Optional[GemType] = None
-    gem_quantity: Optional[int] = None
-    balance_before: float
-    balance_after: float
-    description: str
-    reference_id: Optional[str] = None  # ID игры, подарка и т.д.
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    admin_id: Optional[str] = None  # Если транзакция создана админом
-
-class ProfitEntry(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    entry_type: str  # "BET_COMMISSION", "HUMAN_BOT_COMMISSION", "GIFT_COMMISSION", "ADMIN_ADJUSTMENT"
-    amount: float
-    source_user_id: str  # Пользователь, с которого взята комиссия
-    reference_id: Optional[str] = None  # ID игры, подарка и т.д.
-    description: str
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    admin_id: Optional[str] = None  # Если создано админом
-
-class BotProfitAccumulator(BaseModel):
-    """Модель для накопления прибыли от ботов"""
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    bot_id: str
-    cycle_number: int
-    total_spent: float = 0.0  # ОСТАВЛЯЕМ: общая сумма ставок (выигрыши + поражения + ничьи)
-    # УДАЛЕНО: total_earned - используем прямой расчёт Выигрыши - Потери
-    wins_amount: float = 0.0  # Сумма выигрышных ставок
-    losses_amount: float = 0.0  # Сумма проигрышных ставок
-    draws_amount: float = 0.0  # Сумма ничейных ставок
-    games_completed: int  # Количество завершенных игр в цикле
-    games_won: int  # Количество выигранных игр
-    cycle_start_date: datetime
-    cycle_end_date: Optional[datetime] = None
-    is_cycle_completed: bool = False
-    profit_transferred: float = 0  # Сумма прибыли, переданная в "Доход от ботов"
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
-
-class FrozenBalance(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    user_id: str
-    amount: float
-    reason: str  # "BET_COMMISSION", "MAINTENANCE", etc.
-    reference_id: Optional[str] = None  # ID игры
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    released_at: Optional[datetime] = None
-    is_active: bool = True
-
-class CompletedCycle(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    bot_id: str
-    cycle_number: int
-    start_time: datetime
-    end_time: datetime
-    duration_seconds: int
-    total_bets: int
-    wins_count: int
-    losses_count: int
-    draws_count: int
-    total_bet_amount: float
-    total_winnings: float
-    total_losses: float
-    net_profit: float
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-
-class Bot(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    name: str
-    bot_type: BotType
-    is_active: bool = True
-    
-    min_bet_amount: float = 1.0  # 1-10000
-    max_bet_amount: float = 100.0  # 1-10000
-    # НОВАЯ ЛОГИКА: Убираем win_percentage, добавляем баланс игр
-    wins_count: int = 7           # Баланс игр - количество побед (ИСПРАВЛЕНО: 7 вместо 6)
-    losses_count: int = 6         # Баланс игр - количество поражений  
-    draws_count: int = 3          # Баланс игр - количество ничьих (ИСПРАВЛЕНО: 3 вместо 4)
-    wins_percentage: float = 44.0  # Процент исходов - победы
-    losses_percentage: float = 36.0 # Процент исходов - поражения
-    draws_percentage: float = 20.0  # Процент исходов - ничьи
-    cycle_games: int = 16
-    current_cycle_games: int = 0
-    current_cycle_wins: int = 0
-    current_cycle_losses: int = 0  # Поражения в текущем цикле  
-    current_cycle_draws: int = 0  # Ничьи в текущем цикле
-    current_limit: Optional[int] = None  # 1-66 (по умолчанию = cycle_games)
-    
-    # Поля для системы циклов и прибыли
-    completed_cycles: int = 0  # Количество завершенных циклов
-    current_cycle_profit: float = 0.0  # Прибыль за текущий цикл
-    total_net_profit: float = 0.0  # Чистая прибыль за все циклы
-    
-    # Отслеживание сумм в цикле
-    current_cycle_gem_value_won: float = 0.0  # Сумма выигранных гемов в текущем цикле
-    current_cycle_gem_value_total: float = 0.0  # Общая сумма ставок в текущем цикле
-    
-    # Паузы (секунды)
-    pause_between_cycles: int = 5  # Пауза между циклами (по умолчанию 5 секунд)
-    pause_between_bets: int = 5    # Пауза между ставками (по умолчанию 5 секунд)
-    
-    # Реальная сумма цикла (вычисляется автоматически)
-    cycle_total_amount: float = 0.0  # Реальная сумма всех ставок в цикле
-    
-    last_game_time: Optional[datetime] = None
-    last_bet_time: Optional[datetime] = None
-    last_cycle_completed_at: Optional[datetime] = None  # Время завершения последнего цикла
-    has_completed_cycles: bool = False  # Флаг указывающий что бот уже имел завершенные циклы
-    current_cycle_start_time: Optional[datetime] = None  # Время начала текущего цикла
-    completed_cycles_count: int = 0  # Количество завершённых циклов
-    
-    avatar_gender: str = "male"
-    simple_mode: bool = False  # Для Human ботов - простой режим
-    
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
-
-class AdminLog(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    admin_id: str
-    action: str
-    target_type: str  # user, bot, gem, etc.
-    target_id: str
-    details: Dict[str, Any]
-    ip_address: Optional[str] = None
-    user_agent: Optional[str] = None
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-
-class HumanBot(BaseModel):
-    """Модель для Human-ботов с характерами и настройками поведения"""
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    name: str  # Уникальное имя бота
-    character: HumanBotCharacter  # Тип характера (1 из 7)
-    gender: str = "male"  # male/female for avatar
-    is_active: bool = True
-    
-    min_bet: float = Field(ge=1.0, le=10000.0)  # 1-10000
-    max_bet: float = Field(ge=1.0, le=10000.0)  # 1-10000
-    
-    bet_limit: int = Field(default=12, ge=1, le=100)  # 1-100
-    bet_limit_amount: float = 300.0  # Maximum bet amount this bot can participate in as opponent
-    
-    win_percentage: float = Field(default=40.0, ge=0.0, le=100.0)
-    loss_percentage: float = Field(default=40.0, ge=0.0, le=100.0)
-    draw_percentage: float = Field(default=20.0, ge=0.0, le=100.0)
-    
-    min_delay: int = Field(default=30, ge=1, le=300)   # 1-300 секунд
-    max_delay: int = Field(default=120, ge=1, le=300)  # 1-300 секунд
-    
-    use_commit_reveal: bool = True
-    
-    logging_level: str = Field(default="INFO")  # INFO, DEBUG
-    
-    # Auto-play settings
-    can_play_with_other_bots: bool = Field(default=True)  # Can play with other bots automatically
-    can_play_with_players: bool = Field(default=True)  # Can play with live players
-    
-    # Bot creation activity control
-    is_bet_creation_active: bool = Field(default=True, description="Активность бота - создание новых ставок")
-    
-    # Individual delay settings for playing with other bots
-    bot_min_delay_seconds: int = Field(default=20, ge=1, le=12000, description="Минимальная задержка для игры с ботами (секунды)")
-    bot_max_delay_seconds: int = Field(default=800, ge=1, le=12000, description="Максимальная задержка для игры с ботами (секунды)")
-    
-    # Individual delay settings for playing with players
-    player_min_delay_seconds: int = Field(default=20, ge=1, le=12000, description="Минимальная задержка для игры с игроками (секунды)")  
-    player_max_delay_seconds: int = Field(default=800, ge=1, le=12000, description="Максимальная задержка для игры с игроками (секунды)")
-    
-    # Individual concurrent games limit
-    max_concurrent_games: int = Field(default=1, ge=1, le=3, description="Максимальное количество одновременных игр для бота")
-    
-    # Balance for Human-bot operations (commissions, etc.)
-    virtual_balance: float = Field(default=2000.0, description="Виртуальный баланс Human-бота")
-    
-    total_games_played: int = 0
-    total_games_won: int = 0  
-    total_amount_wagered: float = 0.0
-    total_amount_won: float = 0.0
-    total_commission_paid: float = 0.0  # Общая сумма комиссий, оплаченных ботом
-    
-    last_action_time: Optional[datetime] = None
-    last_bet_time: Optional[datetime] = None
-    
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
-
-class HumanBotLog(BaseModel):
-    """Модель для логирования действий Human-ботов"""
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    human_bot_id: str
-    action_type: str  # "CREATE_BET", "JOIN_BET", "WIN", "LOSS", "DRAW"
-    description: str
-    game_id: Optional[str] = None
-    bet_amount: Optional[float] = None
-    outcome: Optional[str] = None  # "WIN", "LOSS", "DRAW"
-    move_played: Optional[str] = None  # "rock", "paper", "scissors"
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-
-class SecurityAlert(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    user_id: str
-    alert_type: str  # RATE_LIMIT, SUSPICIOUS_PURCHASE, UNUSUAL_ACTIVITY, etc.
-    severity: str    # LOW, MEDIUM, HIGH, CRITICAL
-    description: str
-    ip_address: Optional[str] = None
-    user_agent: Optional[str] = None
-    request_data: Dict[str, Any] = {}
-    action_taken: Optional[str] = None
-    resolved: bool = False
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    resolved_at: Optional[datetime] = None
-    resolved_by: Optional[str] = None
-
-class SecurityMonitoring(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    user_id: str
-    ip_address: str
-    endpoint: str
-    request_count: int
-    time_window: str  # "1m", "1h", "1d"
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-
-class SuspiciousActivity(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    user_id: str
-    activity_type: str
-    description: str
-    risk_score: int  # 1-100
-    ip_address: Optional[str] = None
-    evidence: Dict[str, Any] = {}
-    status: str = "OPEN"  # OPEN, INVESTIGATING, RESOLVED, FALSE_POSITIVE
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
-
-class EmailVerification(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    user_id: str
-    email: EmailStr
-    token: str
-    expires_at: datetime
-    used: bool = False
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-
-class Notification(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    user_id: str
-    type: str  # ADMIN_ACTION, GIFT_RECEIVED, etc.
-    title: str
-    message: str
-    read: bool = False
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-
-class Sound(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    name: str  # Название звука
-    category: SoundCategory  # Категория звука
-    event_trigger: str  # Событие-триггер (создание_ставки, победа, hover и т.д.)
-    game_type: GameType = GameType.ALL  # Тип игры
-    is_enabled: bool = True  # Включен/выключен
-    priority: int = Field(default=5, ge=1, le=10)  # Приоритет 1-10
-    volume: float = Field(default=0.5, ge=0.0, le=1.0)  # Громкость 0.0-1.0
-    delay: int = Field(default=0, ge=0)  # Задержка в миллисекундах
-    can_repeat: bool = True  # Можно ли воспроизводить повторно
-    audio_data: Optional[str] = None  # Base64 данные аудиофайла
-    file_format: Optional[str] = None  # mp3/wav/ogg
-    file_size: Optional[int] = None  # Размер файла в байтах
-    is_default: bool = False  # Дефолтный звук (программный)
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
-
-# ==============================================================================
-# RESPONSE MODELS
-# ==============================================================================
-
-class UserResponse(BaseModel):
-    id: str
-    username: str
-    email: str
-    role: UserRole
-    status: UserStatus
-    gender: str
-    virtual_balance: float
-    frozen_balance: float
-    daily_limit_used: float
-    daily_limit_max: float
-    email_verified: bool
-    created_at: datetime
-    last_login: Optional[datetime] = None
-    total_games_played: int
-    total_games_won: int
-    total_amount_wagered: float
-    total_amount_won: float
-    total_commission_paid: float  # Общая сумма комиссий, оплаченных ботом
-    timezone_offset: int = 0  # UTC offset in hours (-12 to +12)
-
-class Token(BaseModel):
-    access_token: str
-    token_type: str
-    user: UserResponse
-    refresh_token: Optional[str] = None
-
-class RefreshToken(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    user_id: str
-    token: str
-    expires_at: datetime
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    is_active: bool = True
-
-class GemResponse(BaseModel):
-    type: GemType
-    name: str
-    price: float
-    color: str
-    icon: str
-    rarity: str
-    quantity: int = 0
-    frozen_quantity: int = 0
-
-class CancelGameResponse(BaseModel):
-    success: bool
-    message: str
-    gems_returned: Dict[str, int]
-    commission_returned: float
-
-# Removed gem combination models - logic moved to frontend
-
-class AddBalanceRequest(BaseModel):
-    amount: float = Field(..., gt=0, le=1000, description="Amount to add to balance (max $1000)")
-
-# ==============================================================================
-# REQUEST MODELS
-# ==============================================================================
-
-class UserRegistration(BaseModel):
-    username: str = Field(..., min_length=3, max_length=15)
-    email: EmailStr
-    password: str
-    gender: str = "male"
-    
-    # Валидатор для username
-    @field_validator('username')
-    @classmethod
-    def validate_username_field(cls, v):
-        is_valid, errors = validate_username(v)
-        if not is_valid:
-            raise ValueError(f"Недопустимое имя пользователя: {'; '.join(errors)}")
-        return sanitize_username(v)
-
-class UserLogin(BaseModel):
-    email: EmailStr
-    password: str
-
-class PasswordResetRequest(BaseModel):
-    email: EmailStr
-
-class PasswordResetConfirm(BaseModel):
-    token: str
-    new_password: str = Field(..., min_length=8)
-
-class ResendVerificationRequest(BaseModel):
-    email: EmailStr
-
-class GoogleOAuthRequest(BaseModel):
-    token: str  # Google ID token
-
-class UpdateProfileRequest(BaseModel):
-    username: Optional[str] = Field(None, min_length=3, max_length=15)
-    gender: Optional[str] = Field(None, pattern=r'^(male|female)$')
-    timezone_offset: Optional[int] = Field(None, ge=-12, le=12)
-    
-    # Валидатор для username
-    @field_validator('username')
-    @classmethod
-    def validate_username_field(cls, v):
-        if v is not None:
-            is_valid, errors = validate_username(v)
-            if not is_valid:
-                raise ValueError(f"Недопустимое имя пользователя: {'; '.join(errors)}")
-            return sanitize_username(v)
-        return v
-
-class EmailVerificationRequest(BaseModel):
-    token: str
-
-class DailyBonusRequest(BaseModel):
-    pass
-
-class CreateGameRequest(BaseModel):
-    move: GameMove
-    bet_gems: Dict[str, int]
-
-class JoinGameRequest(BaseModel):
-    move: GameMove
-    gems: Dict[str, int]  # Player's selected gems combination
-
-# Human Bot Request Models
-class CreateHumanBotRequest(BaseModel):
-    name: str = Field(..., min_length=1, max_length=50)
-    character: HumanBotCharacter
-    gender: str = Field(default="male", pattern="^(male|female)$")  # Add gender field
-    min_bet: float = Field(..., ge=1.0, le=10000.0)
-    max_bet: float = Field(..., ge=1.0, le=10000.0)
-    bet_limit: int = Field(default=12, ge=1, le=100)
-    bet_limit_amount: float = Field(default=300.0, ge=1.0, le=100000.0)  # Maximum bet amount limit
-    win_percentage: float = Field(default=40.0, ge=0.0, le=100.0)
-    loss_percentage: float = Field(default=40.0, ge=0.0, le=100.0)
-    draw_percentage: float = Field(default=20.0, ge=0.0, le=100.0)
-    min_delay: int = Field(default=30, ge=1, le=300)
-    max_delay: int = Field(default=120, ge=1, le=300)
-    use_commit_reveal: bool = True
-    logging_level: str = Field(default="INFO")
-    can_play_with_other_bots: bool = Field(default=True, description="Can play with other bots automatically")
-    can_play_with_players: bool = Field(default=True, description="Can play with live players")
-    # Bot creation activity control
-    is_bet_creation_active: bool = Field(default=True, description="Активность бота - создание новых ставок")
-    # Individual delay settings for playing with other bots
-    bot_min_delay_seconds: int = Field(default=20, ge=1, le=12000, description="Минимальная задержка для игры с ботами (секунды)")
-    bot_max_delay_seconds: int = Field(default=800, ge=1, le=12000, description="Максимальная задержка для игры с ботами (секунды)")
-    # Individual delay settings for playing with players
-    player_min_delay_seconds: int = Field(default=20, ge=1, le=12000, description="Минимальная задержка для игры с игроками (секунды)")  
-    player_max_delay_seconds: int = Field(default=800, ge=1, le=12000, description="Максимальная задержка для игры с игроками (секунды)")
-    # Individual concurrent games limit
-    max_concurrent_games: int = Field(default=1, ge=1, le=3, description="Максимальное количество одновременных игр для бота")
-
-class UpdateHumanBotRequest(BaseModel):
-    name: Optional[str] = Field(None, min_length=1, max_length=50)
-    character: Optional[HumanBotCharacter] = None
-    gender: Optional[str] = Field(None, pattern="^(male|female)$")  # Add gender field
-    is_active: Optional[bool] = None
-    min_bet: Optional[float] = Field(None, ge=1.0, le=10000.0)
-    max_bet: Optional[float] = Field(None, ge=1.0, le=10000.0)
-    bet_limit: Optional[int] = Field(None, ge=1, le=100)
-    bet_limit_amount: Optional[float] = Field(None, ge=1.0, le=100000.0)  # Maximum bet amount limit
-    win_percentage: Optional[float] = Field(None, ge=0.0, le=100.0)
-    loss_percentage: Optional[float] = Field(None, ge=0.0, le=100.0)
-    draw_percentage: Optional[float] = Field(None, ge=0.0, le=100.0)
-    min_delay: Optional[int] = Field(None, ge=1, le=300)
-    max_delay: Optional[int] = Field(None, ge=1, le=300)
-    use_commit_reveal: Optional[bool] = None
-    logging_level: Optional[str] = None
-    can_play_with_other_bots: Optional[bool] = None
-    can_play_with_players: Optional[bool] = None
-    # Bot creation activity control
-    is_bet_creation_active: Optional[bool] = Field(None, description="Активность бота - создание новых ставок")
-    # Individual delay settings for playing with other bots
-    bot_min_delay_seconds: Optional[int] = Field(None, ge=1, le=12000, description="Минимальная задержка для игры с ботами (секунды)")
-    bot_max_delay_seconds: Optional[int] = Field(None, ge=1, le=12000, description="Максимальная задержка для игры с ботами (секунды)")
-    # Individual delay settings for playing with players
-    player_min_delay_seconds: Optional[int] = Field(None, ge=1, le=12000, description="Минимальная задержка для игры с игроками (секунды)")  
-    player_max_delay_seconds: Optional[int] = Field(None, ge=1, le=12000, description="Максимальная задержка для игры с игроками (секунды)")
-    # Individual concurrent games limit
-    max_concurrent_games: Optional[int] = Field(None, ge=1, le=3, description="Максимальное количество одновременных игр для бота")
-
-class ToggleAutoPlayRequest(BaseModel):
-    can_play_with_other_bots: bool
-
-class TogglePlayWithPlayersRequest(BaseModel):
-    can_play_with_players: bool
-
-class ToggleAllRequest(BaseModel):
-    activate: bool
-
-class BulkCreateHumanBotsRequest(BaseModel):
-    count: int = Field(..., ge=1, le=50)  # Максимум 50 ботов за раз
-    character: HumanBotCharacter
-    min_bet_range: List[float] = Field(..., min_length=2, max_length=2)  # [min, max]
-    max_bet_range: List[float] = Field(..., min_length=2, max_length=2)  # [min, max]  
-    bet_limit_range: List[int] = Field(default=[12, 12], min_length=2, max_length=2)  # [min, max] лимит ставок
-    win_percentage: float = Field(default=40.0, ge=0.0, le=100.0)
-    loss_percentage: float = Field(default=40.0, ge=0.0, le=100.0)
-    draw_percentage: float = Field(default=20.0, ge=0.0, le=100.0)
-    delay_range: List[int] = Field(default=[30, 120], min_length=2, max_length=2)  # [min, max] секунды
-    min_delay: Optional[int] = Field(default=30, ge=1, le=3600)  # Минимальная задержка
-    max_delay: Optional[int] = Field(default=120, ge=1, le=3600)  # Максимальная задержка
-    use_commit_reveal: bool = True
-    logging_level: str = Field(default="INFO")
-    # Auto-play settings for bulk creation
-    can_play_with_other_bots: bool = Field(default=True, description="Can play with other bots automatically")
-    can_play_with_players: bool = Field(default=True, description="Can play with live players")
-    # Bot creation activity control for bulk creation
-    is_bet_creation_active: bool = Field(default=True, description="Активность бота - создание новых ставок")
-    # Individual delay settings ranges for bulk creation
-    bot_min_delay_range: List[int] = Field(default=[20, 800], min_length=2, max_length=2, description="Диапазон минимальных задержек для игры с ботами")
-    bot_max_delay_range: List[int] = Field(default=[20, 800], min_length=2, max_length=2, description="Диапазон максимальных задержек для игры с ботами")
-    player_min_delay_range: List[int] = Field(default=[20, 800], min_length=2, max_length=2, description="Диапазон минимальных задержек для игры с игроками")
-    player_max_delay_range: List[int] = Field(default=[20, 800], min_length=2, max_length=2, description="Диапазон максимальных задержек для игры с игроками")
-    # Concurrent games range for bulk creation
-    max_concurrent_games_range: List[int] = Field(default=[1, 3], min_length=2, max_length=2, description="Диапазон максимального количества одновременных игр")
-    # Bet amount limit range for bulk creation  
-    bet_limit_amount_range: List[int] = Field(default=[100, 250], min_length=2, max_length=2, description="Диапазон ограничения суммы ставок для участия как оппонент")
-    bots: Optional[List[dict]] = Field(default=None)  # Данные отдельных ботов
-
-class CreateSoundRequest(BaseModel):
-    name: str = Field(..., min_length=1, max_length=100)
-    category: SoundCategory
-    event_trigger: str = Field(..., min_length=1, max_length=50)
-    game_type: GameType = GameType.ALL
-    is_enabled: bool = True
-    priority: int = Field(default=5, ge=1, le=10)
-    volume: float = Field(default=0.5, ge=0.0, le=1.0)
-    delay: int = Field(default=0, ge=0, le=5000)  # Max 5 seconds delay
-    can_repeat: bool = True
-
-class UpdateSoundRequest(BaseModel):
-    name: Optional[str] = Field(None, min_length=1, max_length=100)
-    category: Optional[SoundCategory] = None
-    event_trigger: Optional[str] = Field(None, min_length=1, max_length=50)
-    game_type: Optional[GameType] = None
-    is_enabled: Optional[bool] = None
-    priority: Optional[int] = Field(None, ge=1, le=10)
-    volume: Optional[float] = Field(None, ge=0.0, le=1.0)
-    delay: Optional[int] = Field(None, ge=0, le=5000)
-    can_repeat: Optional[bool] = None
-
-class UploadSoundFileRequest(BaseModel):
-    file_data: str  # Base64 encoded audio file
-    file_format: str = Field(..., pattern="^(mp3|wav|ogg)$")  # Only these formats
-    file_size: int = Field(..., gt=0, le=5242880)  # Max 5MB
-
-class ResendNotificationRequest(BaseModel):
-    notification_id: str
-
-class SoundResponse(BaseModel):
-    id: str
-    name: str
-    category: SoundCategory
-    event_trigger: str
-    game_type: GameType
-    is_enabled: bool
-    priority: int
-    volume: float
-    delay: int
-    can_repeat: bool
-    has_audio_file: bool  # Whether audio_data exists
-    file_format: Optional[str] = None
-    file_size: Optional[int] = None
-    is_default: bool
-    created_at: datetime
-    updated_at: datetime
-
-class HumanBotResponse(BaseModel):
-    id: str
-    name: str
-    character: HumanBotCharacter
-    gender: Optional[str] = "male"  # male/female for avatar, default to male
-    is_active: bool
-    min_bet: float
-    max_bet: float
-    bet_limit: int
-    bet_limit_amount: float  # Maximum bet amount this bot can participate in as opponent
-    win_percentage: float
-    loss_percentage: float
-    draw_percentage: float
-    min_delay: int
-    max_delay: int
-    use_commit_reveal: bool
-    logging_level: str
-    can_play_with_other_bots: bool
-    can_play_with_players: bool
-    # Bot creation activity control
-    is_bet_creation_active: bool
-    # Individual delay settings for playing with other bots
-    bot_min_delay_seconds: int
-    bot_max_delay_seconds: int
-    # Individual delay settings for playing with players
-    player_min_delay_seconds: int  
-    player_max_delay_seconds: int
-    # Individual concurrent games limit
-    max_concurrent_games: int
-    # Balance for Human-bot operations
-    virtual_balance: float
-    total_games_played: int
-    total_games_won: int
-    total_amount_wagered: float
-    average_bet_amount: float  # Average amount from active bets
-    total_amount_won: float
-    total_commission_paid: float  # Общая сумма комиссий, оплаченных ботом
-    win_rate: float  # Calculated field
-    last_action_time: Optional[datetime]
-    created_at: datetime
-    updated_at: datetime
-
-class HumanBotLogResponse(BaseModel):
-    id: str
-    human_bot_id: str
-    action_type: str
-    description: str
-    game_id: Optional[str]
-    bet_amount: Optional[float]
-    outcome: Optional[str]
-    move_played: Optional[str]
-    created_at: datetime
-
-class HumanBotsStatsResponse(BaseModel):
-    total_bots: int
-    active_bots: int
-    active_games: int
-    total_games_played: int  # Independent counter for "Всего Игр"
-    period_revenue: float  # Independent counter for "Доход за Период"
-    total_games_24h: int
-    total_bets: int
-    total_revenue_24h: float
-    avg_revenue_per_bot: float
-    most_active_bots: List[Dict[str, Any]]
-    character_distribution: Dict[str, int]
-
-class PaginationInfo(BaseModel):
-    current_page: int
-    total_pages: int
-    per_page: int
-    total_items: int
-    has_next: bool
-    has_prev: bool
-
-class HumanBotsListResponse(BaseModel):
-    success: bool
-    bots: List[Dict[str, Any]]
-    pagination: PaginationInfo
-    metadata: Optional[Dict[str, Any]] = None  # Add metadata for caching and performance info
-
 # ==============================================================================
 # UTILITY FUNCTIONS
 # ==============================================================================
@@ -1166,26 +288,16 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def create_refresh_token(user_id: str) -> str:
-    """Create and store refresh token."""
-    refresh_token = secrets.token_urlsafe(32)
-    expires_at = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-    
-    # Deactivate old refresh tokens for this user
-    await db.refresh_tokens.update_many(
-        {"user_id": user_id, "is_active": True},
-        {"$set": {"is_active": False}}
-    )
-    
-    # Create new refresh token
-    token_obj = RefreshToken(
-        user_id=user_id,
-        token=refresh_token,
-        expires_at=expires_at
-    )
-    await db.refresh_tokens.insert_one(token_obj.dict())
-    
-    return refresh_token
+# Refresh tokens are stored hashed together with the auth fields /auth/refresh checks
+refresh_token_store = RefreshTokenStore(db.refresh_tokens, REFRESH_TOKEN_EXPIRE_DAYS)
+
+# The principal holds only auth fields that admin/profile edits keep in sync; balances and
+# stats in the refresh response come from a projected read so they are never stale
+PRINCIPAL_SYNC_FIELDS = ("role", "status", "email_verified")
+USER_RESPONSE_PROJECTION = {"_id": 0, **{field: 1 for field in UserResponse.model_fields}}
+
+def principal_snapshot(user: dict) -> dict:
+    return {"id": user["id"], **{field: user.get(field) for field in PRINCIPAL_SYNC_FIELDS}}
 
 def generate_verification_token() -> str:
     """Generate email verification token."""
@@ -1205,24 +317,7 @@ HUMAN_BOT_NAMES = [
 
 async def generate_unique_human_bot_name() -> str:
     """Generate unique human bot name from predefined list."""
-    # Get all existing Human-bot names
-    existing_bots = await db.human_bots.find({}, {"name": 1}).to_list(None)
-    existing_names = {bot["name"] for bot in existing_bots}
-    
-    # Find available names from the list
-    available_names = [name for name in HUMAN_BOT_NAMES if name not in existing_names]
-    
-    if available_names:
-        # Return random name from available ones
-        return random.choice(available_names)
-    else:
-        # If all names are used, fall back to Player format
-        counter = 1
-        while True:
-            bot_name = f"Player{counter}"
-            if bot_name not in existing_names:
-                return bot_name
-            counter += 1
+    return reserve_names([None], await load_names(db.human_bots), HUMAN_BOT_NAMES)[0]
 
 # ==============================================================================
 # HUMAN BOT BEHAVIOR ALGORITHMS
@@ -1352,181 +447,50 @@ class HumanBotBehavior:
         else:
             return random.randint(min_delay, max_delay)
 
-def generate_uniform_bet_amounts(min_bet: float, max_bet: float, count: int) -> List[float]:
+def generate_uniform_bet_amounts(min_bet: float, max_bet: float, count: int, seed: Optional[int] = None) -> List[int]:
     """
     НОВАЯ ФОРМУЛА: Генерирует ИСТИННО равномерно распределенные ставки по всему диапазону.
-    Обеспечивает покрытие малых (1-15), средних (16-35) и больших (36-50) ставок.
+    Стратифицированная выборка (core.cycle_planning) гарантирует покрытие малых, средних и больших ставок.
     Возвращает естественную сумму без принудительной нормализации.
     """
-    if count <= 0:
-        return []
-    
-    amounts = []
-    range_size = max_bet - min_bet
-    
-    if count == 1:
-        # Одна ставка - случайное значение из диапазона
-        amounts.append(random.uniform(min_bet, max_bet))
-    elif count == 2:
-        # Две ставки - одну из нижней трети, одну из верхней трети
-        amounts.append(random.uniform(min_bet, min_bet + range_size * 0.33))
-        amounts.append(random.uniform(min_bet + range_size * 0.67, max_bet))
-    else:
-        # Для 3+ ставок используем стратифицированную выборку
-        
-        # Разделяем диапазон на сегменты для равномерного покрытия
-        segments = min(count, 5)  # Максимум 5 сегментов для лучшего покрытия
-        segment_size = range_size / segments
-        
-        # Гарантируем по крайней мере одну ставку из каждого сегмента
-        for i in range(segments):
-            segment_start = min_bet + i * segment_size
-            segment_end = min_bet + (i + 1) * segment_size
-            amounts.append(random.uniform(segment_start, segment_end))
-        
-        # Оставшиеся ставки распределяем случайно с акцентом на покрытие
-        remaining_count = count - segments
-        for _ in range(remaining_count):
-            # 30% малые ставки (1-30% диапазона)
-            # 40% средние ставки (30-70% диапазона) 
-            # 30% большие ставки (70-100% диапазона)
-            rand_val = random.random()
-            if rand_val < 0.3:
-                amounts.append(random.uniform(min_bet, min_bet + range_size * 0.3))
-            elif rand_val < 0.7:
-                amounts.append(random.uniform(min_bet + range_size * 0.3, min_bet + range_size * 0.7))
-            else:
-                amounts.append(random.uniform(min_bet + range_size * 0.7, max_bet))
-    
-    # Округляем до целых чисел без принудительной нормализации
-    final_amounts = []
-    for amount in amounts:
-        # Небольшая случайная вариация (±2%) для естественности
-        variation = random.uniform(0.98, 1.02)
-        amount = amount * variation
-        # Обеспечиваем границы и округляем
-        amount = max(min_bet, min(max_bet, amount))
-        final_amounts.append(round(amount))
-    
-    # Убедимся что есть представители всех частей диапазона
-    final_amounts = ensure_range_coverage(final_amounts, min_bet, max_bet, count)
-    
-    total_sum = sum(final_amounts)
-    logger.info(f"🎯 Generated TRUE uniform bets: {sorted(final_amounts)}")
-    logger.info(f"    Range: {min_bet}-{max_bet}, Count: {count}, Natural sum: {total_sum}")
-    
+    from core.cycle_planning import uniform_bet_amounts
+    final_amounts = uniform_bet_amounts(count, min_bet, max_bet, seed)
+    if final_amounts:
+        logger.info(f"🎯 Generated TRUE uniform bets: {sorted(final_amounts)}")
+        logger.info(f"    Range: {min_bet}-{max_bet}, Count: {count}, Natural sum: {sum(final_amounts)}")
     return final_amounts
 
-def ensure_range_coverage(amounts: List[float], min_bet: float, max_bet: float, count: int) -> List[float]:
-    """
-    Обеспечивает, что в списке ставок есть представители всех частей диапазона.
-    """
-    if count < 3:
-        return amounts
-        
-    range_size = max_bet - min_bet
-    low_threshold = min_bet + range_size * 0.33
-    high_threshold = min_bet + range_size * 0.67
-    
-    # Проверяем покрытие
-    has_low = any(amount <= low_threshold for amount in amounts)
-    has_high = any(amount >= high_threshold for amount in amounts)
-    
-    # Если не хватает покрытия, заменяем некоторые ставки
-    if not has_low:
-        # Заменяем самую маленькую ставку на действительно малую
-        min_idx = amounts.index(min(amounts))
-        amounts[min_idx] = random.uniform(min_bet, low_threshold)
-        
-    if not has_high:
-        # Заменяем самую большую ставку на действительно большую
-        max_idx = amounts.index(max(amounts))
-        amounts[max_idx] = random.uniform(high_threshold, max_bet)
-    
-    return amounts
-
-def distribute_sum_to_bets(target_sum: float, bet_count: int, min_bet: float, max_bet: float) -> List[float]:
+def distribute_sum_to_bets(target_sum: float, bet_count: int, min_bet: float, max_bet: float, seed: Optional[int] = None) -> List[float]:
     """
     НОВАЯ ФОРМУЛА 2.0: Распределяет целевую сумму на N ставок в диапазоне [min_bet, max_bet].
-    Обеспечивает равномерное покрытие диапазона с точной суммой.
+    Обеспечивает равномерное покрытие диапазона с точной суммой (с точностью до цента).
     
     Args:
         target_sum: Целевая сумма для распределения
         bet_count: Количество ставок
         min_bet: Минимальная ставка  
         max_bet: Максимальная ставка
+        seed: Seed генератора для воспроизводимого распределения
         
     Returns:
         List[float]: Список ставок суммой target_sum
     """
+    from core.cycle_planning import fit_exact_sum, plan_rng, stratified_amounts
     if bet_count <= 0:
         return []
     
-    # Проверяем достижимость целевой суммы
     min_possible = bet_count * min_bet
     max_possible = bet_count * max_bet
+    if not min_possible <= target_sum <= max_possible:
+        logger.warning(f"Target sum {target_sum} out of reach for {bet_count} bets [{min_bet}-{max_bet}], clamping")
     
-    if target_sum < min_possible:
-        logger.warning(f"Target sum {target_sum} too small for {bet_count} bets [{min_bet}-{max_bet}], using minimum")
-        target_sum = min_possible
-    elif target_sum > max_possible:
-        logger.warning(f"Target sum {target_sum} too large for {bet_count} bets [{min_bet}-{max_bet}], using maximum")  
-        target_sum = max_possible
-    
-    # 1. Генерируем случайные веса для равномерного распределения
-    weights = []
-    range_size = max_bet - min_bet
-    
-    # Обеспечиваем покрытие всего диапазона
-    for i in range(bet_count):
-        if bet_count <= 3:
-            # Для малого количества ставок - равномерно по диапазону
-            weight = random.uniform(0.5, 1.5)
-        else:
-            # Для большего количества - стратифицированная выборка
-            segment = i / bet_count  # 0 to 1
-            base_weight = 0.3 + segment * 0.7  # от 0.3 до 1.0
-            weight = base_weight + random.uniform(-0.2, 0.2)
-        weights.append(max(0.1, weight))
-    
-    total_weight = sum(weights)
-    
-    # 2. Рассчитываем пропорциональные суммы
-    amounts = []
-    for weight in weights:
-        proportional_amount = (weight / total_weight) * target_sum
-        # Приводим в рамки диапазона
-        amount = max(min_bet, min(max_bet, proportional_amount))
-        amounts.append(round(amount, 2))
-    
-    # 3. "Докрутчик" - точная подгонка к целевой сумме
-    current_sum = sum(amounts)
-    diff = target_sum - current_sum
-    
-    # Корректируем по 0.01 за раз, пока не достигнем точной суммы
-    attempts = 0
-    max_attempts = 1000
-    
-    while abs(diff) >= 0.01 and attempts < max_attempts:
-        # Выбираем случайную ставку для корректировки
-        idx = random.randint(0, len(amounts) - 1)
-        
-        if diff > 0 and amounts[idx] < max_bet:
-            # Увеличиваем ставку
-            adjustment = min(0.01, diff, max_bet - amounts[idx])
-            amounts[idx] = round(amounts[idx] + adjustment, 2)
-        elif diff < 0 and amounts[idx] > min_bet:
-            # Уменьшаем ставку
-            adjustment = min(0.01, abs(diff), amounts[idx] - min_bet)
-            amounts[idx] = round(amounts[idx] - adjustment, 2)
-        
-        current_sum = sum(amounts)
-        diff = target_sum - current_sum
-        attempts += 1
+    # Стратифицированные веса и точная подгонка в центах методом наибольших остатков
+    jitter = plan_rng(seed).random((1, bet_count))
+    base = stratified_amounts(jitter, [min_bet * 100], [max_bet * 100])
+    cents = fit_exact_sum(base, [target_sum * 100], [math.ceil(min_bet * 100)], [math.floor(max_bet * 100)])[0]
+    amounts = [round(int(c) / 100, 2) for c in cents]
     
     logger.info(f"    Distributed {target_sum} across {bet_count} bets: {amounts}")
-    logger.info(f"    Final sum: {sum(amounts)}, diff: {diff:.3f}")
-    
     return amounts
 
 async def generate_unique_bot_name() -> str:
@@ -1711,30 +675,19 @@ async def validate_transaction_integrity(user_id: str, operation: str, amount: f
             return False
     
     if operation == "sell" and gem_quantity and gem_type:
-        user_gems = await db.user_gems.find_one({"user_id": user_id, "gem_type": gem_type})
-        if not user_gems or user_gems["quantity"] < gem_quantity:
+        owned = counts(await gem_inventory.get(user_id), "quantity").get(gem_type, 0)
+        if owned < gem_quantity:
             await create_security_alert(
                 user_id=user_id,
                 alert_type="INSUFFICIENT_GEMS_ATTEMPT",
                 severity="LOW",
                 description=f"Attempted sale with insufficient gems: {gem_quantity} {gem_type} requested",
-                request_data={"requested_quantity": gem_quantity, "gem_type": gem_type, "available_quantity": user_gems["quantity"] if user_gems else 0}
+                request_data={"requested_quantity": gem_quantity, "gem_type": gem_type, "available_quantity": owned}
             )
             return False
     
     return True
 
-def hash_move_with_salt(move, salt: str) -> str:
-    """Hash game move with salt for commit-reveal scheme."""
-    # Handle both GameMove enum and string
-    move_str = move.value if hasattr(move, 'value') else move
-    combined = f"{move_str}:{salt}"
-    return hashlib.sha256(combined.encode()).hexdigest()
-
-def verify_move_hash(move: GameMove, salt: str, hash_value: str) -> bool:
-    """Verify game move hash."""
-    return hash_move_with_salt(move, salt) == hash_value
-
 # ==============================================================================
 # DEPENDENCY FUNCTIONS
 # ==============================================================================
@@ -1828,116 +781,158 @@ async def get_current_super_admin(current_user: User = Depends(get_current_user)
 # STARTUP AND BACKGROUND TASKS
 # ==============================================================================
 
-async def initialize_default_gems():
-    """Initialize default gem definitions in the database."""
-    logger.info("Initializing default gems with updated icons...")
-    
-    # Delete existing gems with the same names to reinitialize with correct icons
-    default_gem_names = ["Ruby", "Amber", "Topaz", "Emerald", "Aquamarine", "Sapphire", "Magic"]
-    delete_result = await db.gem_definitions.delete_many({"name": {"$in": default_gem_names}})
-    logger.info(f"Deleted {delete_result.deleted_count} existing gems")
-    
-    default_gems = [
-        {
-            "type": GemType.RUBY, 
-            "name": "Ruby", 
-            "price": 1, 
-            "color": "#FF0000", 
-            "icon": "data:image/svg+xml;base64,PD94bWwgdmVyc2lvbj0iMS4wIiBlbmNvZGluZz0iVVRGLTgiPz4KPHN2ZyBpZD0iT2JqZWN0cyIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIiB4bWxuczp4bGluaz0iaHR0cDovL3d3dy53My5vcmcvMTk5OS94bGluayIgdmlld0JveD0iMCAwIDI1NS42NSAyNTUuNjUiPgogIDxkZWZzPgogICAgPHN0eWxlPgogICAgICAuY2xzLTEgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTUpOwogICAgICB9CgogICAgICAuY2xzLTIgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTYpOwogICAgICB9CgogICAgICAuY2xzLTMgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTQpOwogICAgICB9CgogICAgICAuY2xzLTQgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTMpOwogICAgICB9CgogICAgICAuY2xzLTUgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTIpOwogICAgICB9CgogICAgICAuY2xzLTYgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50KTsKICAgICAgfQogICAgPC9zdHlsZT4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50IiB4MT0iMTQ5LjY1IiB5MT0iNzcuODYiIHgyPSIyMTAuMTIiIHkyPSIyOC4zIiBncmFkaWVudFVuaXRzPSJ1c2VyU3BhY2VPblVzZSI+CiAgICAgIDxzdG9wIG9mZnNldD0iMCIgc3RvcC1jb2xvcj0iI2NjMDAwMCIvPgogICAgICA8c3RvcCBvZmZzZXQ9IjEiIHN0b3AtY29sb3I9IiNmZjNiM2IiLz4KICAgIDwvbGluZWFyR3JhZGllbnQ+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC0yIiB4MT0iMTczLjU5IiB5MT0iMTkwLjMiIHgyPSIyNjcuNDYiIHkyPSIxMTMuMzciIGdyYWRpZW50VW5pdHM9InVzZXJTcGFjZU9uVXNlIj4KICAgICAgPHN0b3Agb2Zmc2V0PSIwIiBzdG9wLWNvbG9yPSIjY2MwMDAwIi8+CiAgICAgIDxzdG9wIG9mZnNldD0iMSIgc3RvcC1jb2xvcj0iI2IzMDAwMCIvPgogICAgPC9saW5lYXJHcmFkaWVudD4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50LTMiIHgxPSIxNC43OSIgeTE9IjEwMC44MiIgeDI9IjEzMS4yOSIgeTI9IjUuMzMiIGdyYWRpZW50VW5pdHM9InVzZXJTcGFjZU9uVXNlIj4KICAgICAgPHN0b3Agb2Zmc2V0PSIwIiBzdG9wLWNvbG9yPSIjZmYxYTFhIi8+CiAgICAgIDxzdG9wIG9mZnNldD0iMSIgc3RvcC1jb2xvcj0iI2ZmNjY2NiIvPgogICAgPC9saW5lYXJHcmFkaWVudD4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50LTQiIHgxPSIxMzcuODUiIHkxPSIzOC4xIiB4Mj0iMTEwLjA0IiB5Mj0iMjMzLjEzIiBncmFkaWVudFVuaXRzPSJ1c2VyU3BhY2VPblVzZSI+CiAgICAgIDxzdG9wIG9mZnNldD0iMCIgc3RvcC1jb2xvcj0iI2ZmNzc3NyIvPgogICAgICA8c3RvcCBvZmZzZXQ9Ii41MyIgc3RvcC1jb2xvcj0iI2ZmYWFhYSIvPgogICAgICA8c3RvcCBvZmZzZXQ9IjEiIHN0b3AtY29sb3I9IiNmZjQ0NDQiLz4KICAgIDwvbGluZWFyR3JhZGllbnQ+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC01IiB4MT0iNzguOTEiIHkxPSIyNjIuNTMiIHgyPSIxNzEuMSIgeTI9IjE4Ni45NyIgeGxpbms6aHJlZj0iI2xpbmVhci1ncmFkaWVudC0zIi8+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC02IiB4MT0iNS43NSIgeTE9IjE3OC43OCIgeDI9IjcyLjMiIHkyPSIxMjQuMjQiIHhsaW5rOmhyZWY9IiNsaW5lYXItZ3JhZGllbnQiLz4KICA8L2RlZnM+CiAgPHBhdGggY2xhc3M9ImNscy02IiBkPSJNMTI3LjgzLDEuMWM1Ny4xNy0uMDEsMTA1LjUxLDM3Ljg2LDEyMS4yOCw4OS44OGwtNDguNTYsMTMuMzYtNzIuMTYtNTIuNDItLjU2LTUwLjgyWiIvPgogIDxwYXRoIGNsYXNzPSJjbHMtNSIgZD0iTTIwMC41NSwxMDQuMzRsNDguNTYtMTMuMzZjMy41NCwxMS42NSw1LjQ1LDI0LjAyLDUuNDQsMzYuODQsMCw0MC45NS0xOS40Miw3Ny4zNi00OS41NSwxMDAuNTJsLTMyLjA5LTM4Ljg4aC4xNXMyNy42NC04NS4wMiwyNy42NC04NS4wMmwtLjE1LS4xMVoiLz4KICA8cGF0aCBjbGFzcz0iY2xzLTQiIGQ9Ik0xMjcuODMsMS4xbC41Niw1MC44Mi03Mi4zMiw1Mi41Mi00OS40OC0xMy42MkMyMi40MiwzOC44OCw3MC43MSwxLjA5LDEyNy44MywxLjFaIi8+CiAgPHBvbHlnb24gY2xhc3M9ImNscy0zIiBwb2ludHM9IjIwMC41NSAxMDQuMzQgMjAwLjcgMTA0LjQ1IDE3My4wNiAxODkuNDcgMTcyLjkxIDE4OS40NiA4My43IDE4OS40NiA1Ni4wNyAxMDQuNDQgMTI4LjM5IDUxLjkyIDIwMC41NSAxMDQuMzQiLz4KICA8cGF0aCBjbGFzcz0iY2xzLTEiIGQ9Ik0xNzIuOTEsMTg5LjQ2bDMyLjA5LDM4Ljg4Yy0yMS4zOCwxNi40My00OC4xNCwyNi4yLTc3LjE3LDI2LjItMjguNzksMC01NS4zMy05LjU4LTc2LjU5LTI1Ljc3bDMyLjQ2LTM5LjMxaDg5LjIxWiIvPgogIDxwYXRoIGNsYXNzPSJjbHMtMiIgZD0iTTYuNTksOTAuODJsNDkuNDgsMTMuNjIsMjcuNjIsODUuMDItMzIuNDYsMzkuMzFDMjAuNzcsMjA1LjY0LDEuMTEsMTY5LjAyLDEuMSwxMjcuODJjMC0xMi44NywxLjkyLTI1LjI5LDUuNDktMzdaIi8+Cjwvc3ZnPgo=", 
-            "rarity": "Common",
-            "is_default": True
-        },
-        {
-            "type": GemType.AMBER, 
-            "name": "Amber", 
-            "price": 2, 
-            "color": "#FFA500", 
-            "icon": "data:image/svg+xml;base64,PD94bWwgdmVyc2lvbj0iMS4wIiBlbmNvZGluZz0iVVRGLTgiPz4KPHN2ZyBpZD0iT2JqZWN0cyIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIiB4bWxuczp4bGluaz0iaHR0cDovL3d3dy53My5vcmcvMTk5OS94bGluayIgdmlld0JveD0iMCAwIDI1NS42NSAyNTUuNjUiPgogIDxkZWZzPgogICAgPHN0eWxlPgogICAgICAuY2xzLTEgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTUpOwogICAgICB9CgogICAgICAuY2xzLTIgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTYpOwogICAgICB9CgogICAgICAuY2xzLTMgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTQpOwogICAgICB9CgogICAgICAuY2xzLTQgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTMpOwogICAgICB9CgogICAgICAuY2xzLTUgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTIpOwogICAgICB9CgogICAgICAuY2xzLTYgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50KTsKICAgICAgfQogICAgPC9zdHlsZT4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50IiB4MT0iMTQ5LjY1IiB5MT0iNzcuODYiIHgyPSIyMTAuMTIiIHkyPSIyOC4zIiBncmFkaWVudFVuaXRzPSJ1c2VyU3BhY2VPblVzZSI+CiAgICAgIDxzdG9wIG9mZnNldD0iMCIgc3RvcC1jb2xvcj0iI2NjNjYwMCIvPgogICAgICA8c3RvcCBvZmZzZXQ9IjEiIHN0b3AtY29sb3I9IiNmZjk1MDAiLz4KICAgIDwvbGluZWFyR3JhZGllbnQ+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC0yIiB4MT0iMTczLjU5IiB5MT0iMTkwLjMiIHgyPSIyNjcuNDYiIHkyPSIxMTMuMzciIGdyYWRpZW50VW5pdHM9InVzZXJTcGFjZU9uVXNlIj4KICAgICAgPHN0b3Agb2Zmc2V0PSIwIiBzdG9wLWNvbG9yPSIjY2M2NjAwIi8+CiAgICAgIDxzdG9wIG9mZnNldD0iMSIgc3RvcC1jb2xvcj0iI2IzNTkwMCIvPgogICAgPC9saW5lYXJHcmFkaWVudD4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50LTMiIHgxPSIxNC43OSIgeTE9IjEwMC44MiIgeDI9IjEzMS4yOSIgeTI9IjUuMzMiIGdyYWRpZW50VW5pdHM9InVzZXJTcGFjZU9uVXNlIj4KICAgICAgPHN0b3Agb2Zmc2V0PSIwIiBzdG9wLWNvbG9yPSIjZmZhYTAwIi8+CiAgICAgIDxzdG9wIG9mZnNldD0iMSIgc3RvcC1jb2xvcj0iI2ZmYmIzMyIvPgogICAgPC9saW5lYXJHcmFkaWVudD4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50LTQiIHgxPSIxMzcuODUiIHkxPSIzOC4xIiB4Mj0iMTEwLjA0IiB5Mj0iMjMzLjEzIiBncmFkaWVudFVuaXRzPSJ1c2VyU3BhY2VPblVzZSI+CiAgICAgIDxzdG9wIG9mZnNldD0iMCIgc3RvcC1jb2xvcj0iI2ZmYmI2NiIvPgogICAgICA8c3RvcCBvZmZzZXQ9Ii41MyIgc3RvcC1jb2xvcj0iI2ZmZGQ5OSIvPgogICAgICA8c3RvcCBvZmZzZXQ9IjEiIHN0b3AtY29sb3I9IiNmZjk5MDAiLz4KICAgIDwvbGluZWFyR3JhZGllbnQ+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC01IiB4MT0iNzguOTEiIHkxPSIyNjIuNTMiIHgyPSIxNzEuMSIgeTI9IjE4Ni45NyIgeGxpbms6aHJlZj0iI2xpbmVhci1ncmFkaWVudC0zIi8+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC02IiB4MT0iNS43NSIgeTE9IjE3OC43OCIgeDI9IjcyLjMiIHkyPSIxMjQuMjQiIHhsaW5rOmhyZWY9IiNsaW5lYXItZ3JhZGllbnQiLz4KICA8L2RlZnM+CiAgPHBhdGggY2xhc3M9ImNscy02IiBkPSJNMTI3LjgzLDEuMWM1Ny4xNy0uMDEsMTA1LjUxLDM3Ljg2LDEyMS4yOCw4OS44OGwtNDguNTYsMTMuMzYtNzIuMTYtNTIuNDItLjU2LTUwLjgyWiIvPgogIDxwYXRoIGNsYXNzPSJjbHMtNSIgZD0iTTIwMC41NSwxMDQuMzRsNDguNTYtMTMuMzZjMy41NCwxMS42NSw1LjQ1LDI0LjAyLDUuNDQsMzYuODQsMCw0MC45NS0xOS40Miw3Ny4zNi00OS41NSwxMDAuNTJsLTMyLjA5LTM4Ljg4aC4xNXMyNy42NC04NS4wMiwyNy42NC04NS4wMmwtLjE1LS4xMVoiLz4KICA8cGF0aCBjbGFzcz0iY2xzLTQiIGQ9Ik0xMjcuODMsMS4xbC41Niw1MC44Mi03Mi4zMiw1Mi41Mi00OS40OC0xMy42MkMyMi40MiwzOC44OCw3MC43MSwxLjA5LDEyNy44MywxLjFaIi8+CiAgPHBvbHlnb24gY2xhc3M9ImNscy0zIiBwb2ludHM9IjIwMC41NSAxMDQuMzQgMjAwLjcgMTA0LjQ1IDE3My4wNiAxODkuNDcgMTcyLjkxIDE4OS40NiA4My43IDE4OS40NiA1Ni4wNyAxMDQuNDQgMTI4LjM5IDUxLjkyIDIwMC41NSAxMDQuMzQiLz4KICA8cGF0aCBjbGFzcz0iY2xzLTEiIGQ9Ik0xNzIuOTEsMTg5LjQ2bDMyLjA5LDM4Ljg4Yy0yMS4zOCwxNi40My00OC4xNCwyNi4yLTc3LjE3LDI2LjItMjguNzksMC01NS4zMy05LjU4LTc2LjU5LTI1Ljc3bDMyLjQ2LTM5LjMxaDg5LjIxWiIvPgogIDxwYXRoIGNsYXNzPSJjbHMtMiIgZD0iTTYuNTksOTAuODJsNDkuNDgsMTMuNjIsMjcuNjIsODUuMDItMzIuNDYsMzkuMzFDMjAuNzcsMjA1LjY0LDEuMTEsMTY5LjAyLDEuMSwxMjcuODJjMC0xMi44NywxLjkyLTI1LjI5LDUuNDktMzdaIi8+Cjwvc3ZnPgo=", 
-            "rarity": "Common",
-            "is_default": True
-        },
-        {
-            "type": GemType.TOPAZ, 
-            "name": "Topaz", 
-            "price": 5, 
-            "color": "#FFFF00", 
-            "icon": "data:image/svg+xml;base64,PD94bWwgdmVyc2lvbj0iMS4wIiBlbmNvZGluZz0iVVRGLTgiPz4KPHN2ZyBpZD0iT2JqZWN0cyIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIiB4bWxuczp4bGluaz0iaHR0cDovL3d3dy53My5vcmcvMTk5OS94bGluayIgdmlld0JveD0iMCAwIDI1NS42NSAyNTUuNjUiPgogIDxkZWZzPgogICAgPHN0eWxlPgogICAgICAuY2xzLTEgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTUpOwogICAgICB9CgogICAgICAuY2xzLTIgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTYpOwogICAgICB9CgogICAgICAuY2xzLTMgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTQpOwogICAgICB9CgogICAgICAuY2xzLTQgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTMpOwogICAgICB9CgogICAgICAuY2xzLTUgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTIpOwogICAgICB9CgogICAgICAuY2xzLTYgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50KTsKICAgICAgfQogICAgPC9zdHlsZT4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50IiB4MT0iMTQ5LjY1IiB5MT0iNzcuODYiIHgyPSIyMTAuMTIiIHkyPSIyOC4zIiBncmFkaWVudFVuaXRzPSJ1c2VyU3BhY2VPblVzZSI+CiAgICAgIDxzdG9wIG9mZnNldD0iMCIgc3RvcC1jb2xvcj0iI2NjOTkwMCIvPgogICAgICA8c3RvcCBvZmZzZXQ9IjEiIHN0b3AtY29sb3I9IiNmZmNjMDAiLz4KICAgIDwvbGluZWFyR3JhZGllbnQ+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC0yIiB4MT0iMTczLjU5IiB5MT0iMTkwLjMiIHgyPSIyNjcuNDYiIHkyPSIxMTMuMzciIGdyYWRpZW50VW5pdHM9InVzZXJTcGFjZU9uVXNlIj4KICAgICAgPHN0b3Agb2Zmc2V0PSIwIiBzdG9wLWNvbG9yPSIjY2M5OTAwIi8+CiAgICAgIDxzdG9wIG9mZnNldD0iMSIgc3RvcC1jb2xvcj0iI2IzODgwMCIvPgogICAgPC9saW5lYXJHcmFkaWVudD4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50LTMiIHgxPSIxNC43OSIgeTE9IjEwMC44MiIgeDI9IjEzMS4yOSIgeTI9IjUuMzMiIGdyYWRpZW50VW5pdHM9InVzZXJTcGFjZU9uVXNlIj4KICAgICAgPHN0b3Agb2Zmc2V0PSIwIiBzdG9wLWNvbG9yPSIjZmZkZDAwIi8+CiAgICAgIDxzdG9wIG9mZnNldD0iMSIgc3RvcC1jb2xvcj0iI2ZmZWUzMyIvPgogICAgPC9saW5lYXJHcmFkaWVudD4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50LTQiIHgxPSIxMzcuODUiIHkxPSIzOC4xIiB4Mj0iMTEwLjA0IiB5Mj0iMjMzLjEzIiBncmFkaWVudFVuaXRzPSJ1c2VyU3BhY2VPblVzZSI+CiAgICAgIDxzdG9wIG9mZnNldD0iMCIgc3RvcC1jb2xvcj0iI2ZmZWU2NiIvPgogICAgICA8c3RvcCBvZmZzZXQ9Ii41MyIgc3RvcC1jb2xvcj0iI2ZmZmY5OSIvPgogICAgICA8c3RvcCBvZmZzZXQ9IjEiIHN0b3AtY29sb3I9IiNmZmNjMDAiLz4KICAgIDwvbGluZWFyR3JhZGllbnQ+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC01IiB4MT0iNzguOTEiIHkxPSIyNjIuNTMiIHgyPSIxNzEuMSIgeTI9IjE4Ni45NyIgeGxpbms6aHJlZj0iI2xpbmVhci1ncmFkaWVudC0zIi8+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC02IiB4MT0iNS43NSIgeTE9IjE3OC43OCIgeDI9IjcyLjMiIHkyPSIxMjQuMjQiIHhsaW5rOmhyZWY9IiNsaW5lYXItZ3JhZGllbnQiLz4KICA8L2RlZnM+CiAgPHBhdGggY2xhc3M9ImNscy02IiBkPSJNMTI3LjgzLDEuMWM1Ny4xNy0uMDEsMTA1LjUxLDM3Ljg2LDEyMS4yOCw4OS44OGwtNDguNTYsMTMuMzYtNzIuMTYtNTIuNDItLjU2LTUwLjgyWiIvPgogIDxwYXRoIGNsYXNzPSJjbHMtNSIgZD0iTTIwMC41NSwxMDQuMzRsNDguNTYtMTMuMzZjMy41NCwxMS42NSw1LjQ1LDI0LjAyLDUuNDQsMzYuODQsMCw0MC45NS0xOS40Miw3Ny4zNi00OS41NSwxMDAuNTJsLTMyLjA5LTM4Ljg4aC4xNXMyNy42NC04NS4wMiwyNy42NC04NS4wMmwtLjE1LS4xMVoiLz4KICA8cGF0aCBjbGFzcz0iY2xzLTQiIGQ9Ik0xMjcuODMsMS4xbC41Niw1MC44Mi03Mi4zMiw1Mi41Mi00OS40OC0xMy42MkMyMi40MiwzOC44OCw3MC43MSwxLjA5LDEyNy44MywxLjFaIi8+CiAgPHBvbHlnb24gY2xhc3M9ImNscy0zIiBwb2ludHM9IjIwMC41NSAxMDQuMzQgMjAwLjcgMTA0LjQ1IDE3My4wNiAxODkuNDcgMTcyLjkxIDE4OS40NiA4My43IDE4OS40NiA1Ni4wNyAxMDQuNDQgMTI4LjM5IDUxLjkyIDIwMC41NSAxMDQuMzQiLz4KICA8cGF0aCBjbGFzcz0iY2xzLTEiIGQ9Ik0xNzIuOTEsMTg5LjQ2bDMyLjA5LDM4Ljg4Yy0yMS4zOCwxNi40My00OC4xNCwyNi4yLTc3LjE3LDI2LjItMjguNzksMC01NS4zMy05LjU4LTc2LjU5LTI1Ljc3bDMyLjQ2LTM5LjMxaDg5LjIxWiIvPgogIDxwYXRoIGNsYXNzPSJjbHMtMiIgZD0iTTYuNTksOTAuODJsNDkuNDgsMTMuNjIsMjcuNjIsODUuMDItMzIuNDYsMzkuMzFDMjAuNzcsMjA1LjY0LDEuMTEsMTY5LjAyLDEuMSwxMjcuODJjMC0xMi44NywxLjkyLTI1LjI5LDUuNDktMzdaIi8+Cjwvc3ZnPgo=", 
-            "rarity": "Uncommon",
-            "is_default": True
-        },
-        {
-            "type": GemType.EMERALD, 
-            "name": "Emerald", 
-            "price": 10, 
-            "color": "#00FF00", 
-            "icon": "data:image/svg+xml;base64,PD94bWwgdmVyc2lvbj0iMS4wIiBlbmNvZGluZz0iVVRGLTgiPz4KPHN2ZyBpZD0iT2JqZWN0cyIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIiB4bWxuczp4bGluaz0iaHR0cDovL3d3dy53My5vcmcvMTk5OS94bGluayIgdmlld0JveD0iMCAwIDI1NS42NSAyNTUuNjUiPgogIDxkZWZzPgogICAgPHN0eWxlPgogICAgICAuY2xzLTEgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTUpOwogICAgICB9CgogICAgICAuY2xzLTIgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTYpOwogICAgICB9CgogICAgICAuY2xzLTMgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTQpOwogICAgICB9CgogICAgICAuY2xzLTQgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTMpOwogICAgICB9CgogICAgICAuY2xzLTUgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTIpOwogICAgICB9CgogICAgICAuY2xzLTYgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50KTsKICAgICAgfQogICAgPC9zdHlsZT4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50IiB4MT0iMTQ5LjY1IiB5MT0iNzcuODYiIHgyPSIyMTAuMTIiIHkyPSIyOC4zIiBncmFkaWVudFVuaXRzPSJ1c2VyU3BhY2VPblVzZSI+CiAgICAgIDxzdG9wIG9mZnNldD0iMCIgc3RvcC1jb2xvcj0iIzIyOEIyMiIvPgogICAgICA8c3RvcCBvZmZzZXQ9IjEiIHN0b3AtY29sb3I9IiMzNGM3NTkiLz4KICAgIDwvbGluZWFyR3JhZGllbnQ+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC0yIiB4MT0iMTczLjU5IiB5MT0iMTkwLjMiIHgyPSIyNjcuNDYiIHkyPSIxMTMuMzciIGdyYWRpZW50VW5pdHM9InVzZXJTcGFjZU9uVXNlIj4KICAgICAgPHN0b3Agb2Zmc2V0PSIwIiBzdG9wLWNvbG9yPSIjMjI4QjIyIi8+CiAgICAgIDxzdG9wIG9mZnNldD0iMSIgc3RvcC1jb2xvcj0iIzFGN0ExRiIvPgogICAgPC9saW5lYXJHcmFkaWVudD4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50LTMiIHgxPSIxNC43OSIgeTE9IjEwMC44MiIgeDI9IjEzMS4yOSIgeTI9IjUuMzMiIGdyYWRpZW50VW5pdHM9InVzZXJTcGFjZU9uVXNlIj4KICAgICAgPHN0b3Agb2Zmc2V0PSIwIiBzdG9wLWNvbG9yPSIjNDBFMDQwIi8+CiAgICAgIDxzdG9wIG9mZnNldD0iMSIgc3RvcC1jb2xvcj0iIzYwRkY2MCIvPgogICAgPC9saW5lYXJHcmFkaWVudD4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50LTQiIHgxPSIxMzcuODUiIHkxPSIzOC4xIiB4Mj0iMTEwLjA0IiB5Mj0iMjMzLjEzIiBncmFkaWVudFVuaXRzPSJ1c2VyU3BhY2VPblVzZSI+CiAgICAgIDxzdG9wIG9mZnNldD0iMCIgc3RvcC1jb2xvcj0iIzcwRkY3MCIvPgogICAgICA8c3RvcCBvZmZzZXQ9Ii41MyIgc3RvcC1jb2xvcj0iI0EwRkZBMCIvPgogICAgICA8c3RvcCBvZmZzZXQ9IjEiIHN0b3AtY29sb3I9IiMzNGM3NTkiLz4KICAgIDwvbGluZWFyR3JhZGllbnQ+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC01IiB4MT0iNzguOTEiIHkxPSIyNjIuNTMiIHgyPSIxNzEuMSIgeTI9IjE4Ni45NyIgeGxpbms6aHJlZj0iI2xpbmVhci1ncmFkaWVudC0zIi8+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC02IiB4MT0iNS43NSIgeTE9IjE3OC43OCIgeDI9IjcyLjMiIHkyPSIxMjQuMjQiIHhsaW5rOmhyZWY9IiNsaW5lYXItZ3JhZGllbnQiLz4KICA8L2RlZnM+CiAgPHBhdGggY2xhc3M9ImNscy02IiBkPSJNMTI3LjgzLDEuMWM1Ny4xNy0uMDEsMTA1LjUxLDM3Ljg2LDEyMS4yOCw4OS44OGwtNDguNTYsMTMuMzYtNzIuMTYtNTIuNDItLjU2LTUwLjgyWiIvPgogIDxwYXRoIGNsYXNzPSJjbHMtNSIgZD0iTTIwMC41NSwxMDQuMzRsNDguNTYtMTMuMzZjMy41NCwxMS42NSw1LjQ1LDI0LjAyLDUuNDQsMzYuODQsMCw0MC45NS0xOS40Miw3Ny4zNi00OS41NSwxMDAuNTJsLTMyLjA5LTM4Ljg4aC4xNXMyNy42NC04NS4wMiwyNy42NC04NS4wMmwtLjE1LS4xMVoiLz4KICA8cGF0aCBjbGFzcz0iY2xzLTQiIGQ9Ik0xMjcuODMsMS4xbC41Niw1MC44Mi03Mi4zMiw1Mi41Mi00OS40OC0xMy42MkMyMi40MiwzOC44OCw3MC43MSwxLjA5LDEyNy44MywxLjFaIi8+CiAgPHBvbHlnb24gY2xhc3M9ImNscy0zIiBwb2ludHM9IjIwMC41NSAxMDQuMzQgMjAwLjcgMTA0LjQ1IDE3My4wNiAxODkuNDcgMTcyLjkxIDE4OS40NiA4My43IDE4OS40NiA1Ni4wNyAxMDQuNDQgMTI4LjM5IDUxLjkyIDIwMC41NSAxMDQuMzQiLz4KICA8cGF0aCBjbGFzcz0iY2xzLTEiIGQ9Ik0xNzIuOTEsMTg5LjQ2bDMyLjA5LDM4Ljg4Yy0yMS4zOCwxNi40My00OC4xNCwyNi4yLTc3LjE3LDI2LjItMjguNzksMC01NS4zMy05LjU4LTc2LjU5LTI1Ljc3bDMyLjQ2LTM5LjMxaDg5LjIxWiIvPgogIDxwYXRoIGNsYXNzPSJjbHMtMiIgZD0iTTYuNTksOTAuODJsNDkuNDgsMTMuNjIsMjcuNjIsODUuMDItMzIuNDYsMzkuMzFDMjAuNzcsMjA1LjY0LDEuMTEsMTY5LjAyLDEuMSwxMjcuODJjMC0xMi44NywxLjkyLTI1LjI5LDUuNDktMzdaIi8+Cjwvc3ZnPgo=", 
-            "rarity": "Rare",
-            "is_default": True
-        },
-        {
-            "type": GemType.AQUAMARINE, 
-            "name": "Aquamarine", 
-            "price": 25, 
-            "color": "#00FFFF", 
-            "icon": "data:image/svg+xml;base64,PD94bWwgdmVyc2lvbj0iMS4wIiBlbmNvZGluZz0iVVRGLTgiPz4KPHN2ZyBpZD0iT2JqZWN0cyIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIiB4bWxuczp4bGluaz0iaHR0cDovL3d3dy53My5vcmcvMTk5OS94bGluayIgdmlld0JveD0iMCAwIDI1NS42NSAyNTUuNjUiPgogIDxkZWZzPgogICAgPHN0eWxlPgogICAgICAuY2xzLTEgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTUpOwogICAgICB9CgogICAgICAuY2xzLTIgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTYpOwogICAgICB9CgogICAgICAuY2xzLTMgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTQpOwogICAgICB9CgogICAgICAuY2xzLTQgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTMpOwogICAgICB9CgogICAgICAuY2xzLTUgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTIpOwogICAgICB9CgogICAgICAuY2xzLTYgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50KTsKICAgICAgfQogICAgPC9zdHlsZT4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50IiB4MT0iMTQ5LjY1IiB5MT0iNzcuODYiIHgyPSIyMTAuMTIiIHkyPSIyOC4zIiBncmFkaWVudFVuaXRzPSJ1c2VyU3BhY2VPblVzZSI+CiAgICAgIDxzdG9wIG9mZnNldD0iMCIgc3RvcC1jb2xvcj0iIzAwNzdjYyIvPgogICAgICA8c3RvcCBvZmZzZXQ9IjEiIHN0b3AtY29sb3I9IiMwMGE5ZmYiLz4KICAgIDwvbGluZWFyR3JhZGllbnQ+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC0yIiB4MT0iMTczLjU5IiB5MT0iMTkwLjMiIHgyPSIyNjcuNDYiIHkyPSIxMTMuMzciIGdyYWRpZW50VW5pdHM9InVzZXJTcGFjZU9uVXNlIj4KICAgICAgPHN0b3Agb2Zmc2V0PSIwIiBzdG9wLWNvbG9yPSIjMDA3N2NjIi8+CiAgICAgIDxzdG9wIG9mZnNldD0iMSIgc3RvcC1jb2xvcj0iIzAwNjZiMyIvPgogICAgPC9saW5lYXJHcmFkaWVudD4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50LTMiIHgxPSIxNC43OSIgeTE9IjEwMC44MiIgeDI9IjEzMS4yOSIgeTI9IjUuMzMiIGdyYWRpZW50VW5pdHM9InVzZXJTcGFjZU9uVXNlIj4KICAgICAgPHN0b3Agb2Zmc2V0PSIwIiBzdG9wLWNvbG9yPSIjMDBiYmZmIi8+CiAgICAgIDxzdG9wIG9mZnNldD0iMSIgc3RvcC1jb2xvcj0iIzMzY2NmZiIvPgogICAgPC9saW5lYXJHcmFkaWVudD4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50LTQiIHgxPSIxMzcuODUiIHkxPSIzOC4xIiB4Mj0iMTEwLjA0IiB5Mj0iMjMzLjEzIiBncmFkaWVudFVuaXRzPSJ1c2VyU3BhY2VPblVzZSI+CiAgICAgIDxzdG9wIG9mZnNldD0iMCIgc3RvcC1jb2xvcj0iIzY2ZGRmZiIvPgogICAgICA8c3RvcCBvZmZzZXQ9Ii41MyIgc3RvcC1jb2xvcj0iIzk5ZWVmZiIvPgogICAgICA8c3RvcCBvZmZzZXQ9IjEiIHN0b3AtY29sb3I9IiMwMGE5ZmYiLz4KICAgIDwvbGluZWFyR3JhZGllbnQ+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC01IiB4MT0iNzguOTEiIHkxPSIyNjIuNTMiIHgyPSIxNzEuMSIgeTI9IjE4Ni45NyIgeGxpbms6aHJlZj0iI2xpbmVhci1ncmFkaWVudC0zIi8+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC02IiB4MT0iNS43NSIgeTE9IjE3OC43OCIgeDI9IjcyLjMiIHkyPSIxMjQuMjQiIHhsaW5rOmhyZWY9IiNsaW5lYXItZ3JhZGllbnQiLz4KICA8L2RlZnM+CiAgPHBhdGggY2xhc3M9ImNscy02IiBkPSJNMTI3LjgzLDEuMWM1Ny4xNy0uMDEsMTA1LjUxLDM3Ljg2LDEyMS4yOCw4OS44OGwtNDguNTYsMTMuMzYtNzIuMTYtNTIuNDItLjU2LTUwLjgyWiIvPgogIDxwYXRoIGNsYXNzPSJjbHMtNSIgZD0iTTIwMC41NSwxMDQuMzRsNDguNTYtMTMuMzZjMy41NCwxMS42NSw1LjQ1LDI0LjAyLDUuNDQsMzYuODQsMCw0MC45NS0xOS40Miw3Ny4zNi00OS41NSwxMDAuNTJsLTMyLjA5LTM4Ljg4aC4xNXMyNy42NC04NS4wMiwyNy42NC04NS4wMmwtLjE1LS4xMVoiLz4KICA8cGF0aCBjbGFzcz0iY2xzLTQiIGQ9Ik0xMjcuODMsMS4xbC41Niw1MC44Mi03Mi4zMiw1Mi41Mi00OS40OC0xMy42MkMyMi40MiwzOC44OCw3MC43MSwxLjA5LDEyNy44MywxLjFaIi8+CiAgPHBvbHlnb24gY2xhc3M9ImNscy0zIiBwb2ludHM9IjIwMC41NSAxMDQuMzQgMjAwLjcgMTA0LjQ1IDE3My4wNiAxODkuNDcgMTcyLjkxIDE4OS40NiA4My43IDE4OS40NiA1Ni4wNyAxMDQuNDQgMTI4LjM5IDUxLjkyIDIwMC41NSAxMDQuMzQiLz4KICA8cGF0aCBjbGFzcz0iY2xzLTEiIGQ9Ik0xNzIuOTEsMTg5LjQ2bDMyLjA5LDM4Ljg4Yy0yMS4zOCwxNi40My00OC4xNCwyNi4yLTc3LjE3LDI2LjItMjguNzksMC01NS4zMy05LjU4LTc2LjU5LTI1Ljc3bDMyLjQ2LTM5LjMxaDg5LjIxWiIvPgogIDxwYXRoIGNsYXNzPSJjbHMtMiIgZD0iTTYuNTksOTAuODJsNDkuNDgsMTMuNjIsMjcuNjIsODUuMDItMzIuNDYsMzkuMzFDMjAuNzcsMjA1LjY0LDEuMTEsMTY5LjAyLDEuMSwxMjcuODJjMC0xMi44NywxLjkyLTI1LjI5LDUuNDktMzdaIi8+Cjwvc3ZnPgo=", 
-            "rarity": "Epic",
-            "is_default": True
-        },
-        {
-            "type": GemType.SAPPHIRE, 
-            "name": "Sapphire", 
-            "price": 50, 
-            "color": "#0000FF", 
-            "icon": "data:image/svg+xml;base64,PD94bWwgdmVyc2lvbj0iMS4wIiBlbmNvZGluZz0iVVRGLTgiPz4KPHN2ZyBpZD0iT2JqZWN0cyIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIiB4bWxuczp4bGluaz0iaHR0cDovL3d3dy53My5vcmcvMTk5OS94bGluayIgdmlld0JveD0iMCAwIDI1NS42NSAyNTUuNjUiPgogIDxkZWZzPgogICAgPHN0eWxlPgogICAgICAuY2xzLTEgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTUpOwogICAgICB9CgogICAgICAuY2xzLTIgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTYpOwogICAgICB9CgogICAgICAuY2xzLTMgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTQpOwogICAgICB9CgogICAgICAuY2xzLTQgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTMpOwogICAgICB9CgogICAgICAuY2xzLTUgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTIpOwogICAgICB9CgogICAgICAuY2xzLTYgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50KTsKICAgICAgfQogICAgPC9zdHlsZT4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50IiB4MT0iMTQ5LjY1IiB5MT0iNzcuODYiIHgyPSIyMTAuMTIiIHkyPSIyOC4zIiBncmFkaWVudFVuaXRzPSJ1c2VyU3BhY2VPblVzZSI+CiAgICAgIDxzdG9wIG9mZnNldD0iMCIgc3RvcC1jb2xvcj0iIzMzMzNjYyIvPgogICAgICA8c3RvcCBvZmZzZXQ9IjEiIHN0b3AtY29sb3I9IiM1ODU2ZDYiLz4KICAgIDwvbGluZWFyR3JhZGllbnQ+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC0yIiB4MT0iMTczLjU5IiB5MT0iMTkwLjMiIHgyPSIyNjcuNDYiIHkyPSIxMTMuMzciIGdyYWRpZW50VW5pdHM9InVzZXJTcGFjZU9uVXNlIj4KICAgICAgPHN0b3Agb2Zmc2V0PSIwIiBzdG9wLWNvbG9yPSIjMzMzM2NjIi8+CiAgICAgIDxzdG9wIG9mZnNldD0iMSIgc3RvcC1jb2xvcj0iIzI5MjliMyIvPgogICAgPC9saW5lYXJHcmFkaWVudD4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50LTMiIHgxPSIxNC43OSIgeTE9IjEwMC44MiIgeDI9IjEzMS4yOSIgeTI9IjUuMzMiIGdyYWRpZW50VW5pdHM9InVzZXJTcGFjZU9uVXNlIj4KICAgICAgPHN0b3Agb2Zmc2V0PSIwIiBzdG9wLWNvbG9yPSIjNjY2NmZmIi8+CiAgICAgIDxzdG9wIG9mZnNldD0iMSIgc3RvcC1jb2xvcj0iIzg4ODhmZiIvPgogICAgPC9saW5lYXJHcmFkaWVudD4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50LTQiIHgxPSIxMzcuODUiIHkxPSIzOC4xIiB4Mj0iMTEwLjA0IiB5Mj0iMjMzLjEzIiBncmFkaWVudFVuaXRzPSJ1c2VyU3BhY2VPblVzZSI+CiAgICAgIDxzdG9wIG9mZnNldD0iMCIgc3RvcC1jb2xvcj0iIzk5OTlmZiIvPgogICAgICA8c3RvcCBvZmZzZXQ9Ii41MyIgc3RvcC1jb2xvcj0iI2JiYmJmZiIvPgogICAgICA8c3RvcCBvZmZzZXQ9IjEiIHN0b3AtY29sb3I9IiM1ODU2ZDYiLz4KICAgIDwvbGluZWFyR3JhZGllbnQ+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC01IiB4MT0iNzguOTEiIHkxPSIyNjIuNTMiIHgyPSIxNzEuMSIgeTI9IjE4Ni45NyIgeGxpbms6aHJlZj0iI2xpbmVhci1ncmFkaWVudC0zIi8+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC02IiB4MT0iNS43NSIgeTE9IjE3OC43OCIgeDI9IjcyLjMiIHkyPSIxMjQuMjQiIHhsaW5rOmhyZWY9IiNsaW5lYXItZ3JhZGllbnQiLz4KICA8L2RlZnM+CiAgPHBhdGggY2xhc3M9ImNscy02IiBkPSJNMTI3LjgzLDEuMWM1Ny4xNy0uMDEsMTA1LjUxLDM3Ljg2LDEyMS4yOCw4OS44OGwtNDguNTYsMTMuMzYtNzIuMTYtNTIuNDItLjU2LTUwLjgyWiIvPgogIDxwYXRoIGNsYXNzPSJjbHMtNSIgZD0iTTIwMC41NSwxMDQuMzRsNDguNTYtMTMuMzZjMy41NCwxMS42NSw1LjQ1LDI0LjAyLDUuNDQsMzYuODQsMCw0MC45NS0xOS40Miw3Ny4zNi00OS41NSwxMDAuNTJsLTMyLjA5LTM4Ljg4aC4xNXMyNy42NC04NS4wMiwyNy42NC04NS4wMmwtLjE1LS4xMVoiLz4KICA8cGF0aCBjbGFzcz0iY2xzLTQiIGQ9Ik0xMjcuODMsMS4xbC41Niw1MC44Mi03Mi4zMiw1Mi41Mi00OS40OC0xMy42MkMyMi40MiwzOC44OCw3MC43MSwxLjA5LDEyNy44MywxLjFaIi8+CiAgPHBvbHlnb24gY2xhc3M9ImNscy0zIiBwb2ludHM9IjIwMC41NSAxMDQuMzQgMjAwLjcgMTA0LjQ1IDE3My4wNiAxODkuNDcgMTcyLjkxIDE4OS40NiA4My43IDE4OS40NiA1Ni4wNyAxMDQuNDQgMTI4LjM5IDUxLjkyIDIwMC41NSAxMDQuMzQiLz4KICA8cGF0aCBjbGFzcz0iY2xzLTEiIGQ9Ik0xNzIuOTEsMTg5LjQ2bDMyLjA5LDM4Ljg4Yy0yMS4zOCwxNi40My00OC4xNCwyNi4yLTc3LjE3LDI2LjItMjguNzksMC01NS4zMy05LjU4LTc2LjU5LTI1Ljc3bDMyLjQ2LTM5LjMxaDg5LjIxWiIvPgogIDxwYXRoIGNsYXNzPSJjbHMtMiIgZD0iTTYuNTksOTAuODJsNDkuNDgsMTMuNjIsMjcuNjIsODUuMDItMzIuNDYsMzkuMzFDMjAuNzcsMjA1LjY0LDEuMTEsMTY5LjAyLDEuMSwxMjcuODJjMC0xMi44NywxLjkyLTI1LjI5LDUuNDktMzdaIi8+Cjwvc3ZnPgo=", 
-            "rarity": "Legendary",
-            "is_default": True
-        },
-        {
-            "type": GemType.MAGIC, 
-            "name": "Magic", 
-            "price": 100, 
-            "color": "#FF00FF", 
-            "icon": "data:image/svg+xml;base64,PD94bWwgdmVyc2lvbj0iMS4wIiBlbmNvZGluZz0iVVRGLTgiPz4KPHN2ZyBpZD0iT2JqZWN0cyIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIiB4bWxuczp4bGluaz0iaHR0cDovL3d3dy53My5vcmcvMTk5OS94bGluayIgdmlld0JveD0iMCAwIDI1NS42NSAyNTUuNjUiPgogIDxkZWZzPgogICAgPHN0eWxlPgogICAgICAuY2xzLTEgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTUpOwogICAgICB9CgogICAgICAuY2xzLTIgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTYpOwogICAgICB9CgogICAgICAuY2xzLTMgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTQpOwogICAgICB9CgogICAgICAuY2xzLTQgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTMpOwogICAgICB9CgogICAgICAuY2xzLTUgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTIpOwogICAgICB9CgogICAgICAuY2xzLTYgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50KTsKICAgICAgfQogICAgPC9zdHlsZT4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50IiB4MT0iMTQ5LjY1IiB5MT0iNzcuODYiIHgyPSIyMTAuMTIiIHkyPSIyOC4zIiBncmFkaWVudFVuaXRzPSJ1c2VyU3BhY2VPblVzZSI+CiAgICAgIDxzdG9wIG9mZnNldD0iMCIgc3RvcC1jb2xvcj0iIzc3MzNjYyIvPgogICAgICA8c3RvcCBvZmZzZXQ9IjEiIHN0b3AtY29sb3I9IiNhZjUyZGUiLz4KICAgIDwvbGluZWFyR3JhZGllbnQ+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC0yIiB4MT0iMTczLjU5IiB5MT0iMTkwLjMiIHgyPSIyNjcuNDYiIHkyPSIxMTMuMzciIGdyYWRpZW50VW5pdHM9InVzZXJTcGFjZU9uVXNlIj4KICAgICAgPHN0b3Agb2Zmc2V0PSIwIiBzdG9wLWNvbG9yPSIjNzczM2NjIi8+CiAgICAgIDxzdG9wIG9mZnNldD0iMSIgc3RvcC1jb2xvcj0iIzY2MjliMyIvPgogICAgPC9saW5lYXJHcmFkaWVudD4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50LTMiIHgxPSIxNC43OSIgeTE9IjEwMC44MiIgeDI9IjEzMS4yOSIgeTI9IjUuMzMiIGdyYWRpZW50VW5pdHM9InVzZXJTcGFjZU9uVXNlIj4KICAgICAgPHN0b3Agb2Zmc2V0PSIwIiBzdG9wLWNvbG9yPSIjYmI2NmZmIi8+CiAgICAgIDxzdG9wIG9mZnNldD0iMSIgc3RvcC1jb2xvcj0iI2NjODhmZiIvPgogICAgPC9saW5lYXJHcmFkaWVudD4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50LTQiIHgxPSIxMzcuODUiIHkxPSIzOC4xIiB4Mj0iMTEwLjA0IiB5Mj0iMjMzLjEzIiBncmFkaWVudFVuaXRzPSJ1c2VyU3BhY2VPblVzZSI+CiAgICAgIDxzdG9wIG9mZnNldD0iMCIgc3RvcC1jb2xvcj0iI2RkOTlmZiIvPgogICAgICA8c3RvcCBvZmZzZXQ9Ii41MyIgc3RvcC1jb2xvcj0iI2VlY2NmZiIvPgogICAgICA8c3RvcCBvZmZzZXQ9IjEiIHN0b3AtY29sb3I9IiNhZjUyZGUiLz4KICAgIDwvbGluZWFyR3JhZGllbnQ+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC01IiB4MT0iNzguOTEiIHkxPSIyNjIuNTMiIHgyPSIxNzEuMSIgeTI9IjE4Ni45NyIgeGxpbms6aHJlZj0iI2xpbmVhci1ncmFkaWVudC0zIi8+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC02IiB4MT0iNS43NSIgeTE9IjE3OC43OCIgeDI9IjcyLjMiIHkyPSIxMjQuMjQiIHhsaW5rOmhyZWY9IiNsaW5lYXItZ3JhZGllbnQiLz4KICA8L2RlZnM+CiAgPHBhdGggY2xhc3M9ImNscy02IiBkPSJNMTI3LjgzLDEuMWM1Ny4xNy0uMDEsMTA1LjUxLDM3Ljg2LDEyMS4yOCw4OS44OGwtNDguNTYsMTMuMzYtNzIuMTYtNTIuNDItLjU2LTUwLjgyWiIvPgogIDxwYXRoIGNsYXNzPSJjbHMtNSIgZD0iTTIwMC41NSwxMDQuMzRsNDguNTYtMTMuMzZjMy41NCwxMS42NSw1LjQ1LDI0LjAyLDUuNDQsMzYuODQsMCw0MC45NS0xOS40Miw3Ny4zNi00OS41NSwxMDAuNTJsLTMyLjA5LTM4Ljg4aC4xNXMyNy42NC04NS4wMiwyNy42NC04NS4wMmwtLjE1LS4xMVoiLz4KICA8cGF0aCBjbGFzcz0iY2xzLTQiIGQ9Ik0xMjcuODMsMS4xbC41Niw1MC44Mi03Mi4zMiw1Mi41Mi00OS40OC0xMy42MkMyMi40MiwzOC44OCw3MC43MSwxLjA5LDEyNy44MywxLjFaIi8+CiAgPHBvbHlnb24gY2xhc3M9ImNscy0zIiBwb2ludHM9IjIwMC41NSAxMDQuMzQgMjAwLjcgMTA0LjQ1IDE3My4wNiAxODkuNDcgMTcyLjkxIDE4OS40NiA4My43IDE4OS40NiA1Ni4wNyAxMDQuNDQgMTI4LjM5IDUxLjkyIDIwMC41NSAxMDQuMzQiLz4KICA8cGF0aCBjbGFzcz0iY2xzLTEiIGQ9Ik0xNzIuOTEsMTg5LjQ2bDMyLjA5LDM4Ljg4Yy0yMS4zOCwxNi40My00OC4xNCwyNi4yLTc3LjE3LDI2LjItMjguNzksMC01NS4zMy05LjU4LTc2LjU5LTI1Ljc3bDMyLjQ2LTM5LjMxaDg5LjIxWiIvPgogIDxwYXRoIGNsYXNzPSJjbHMtMiIgZD0iTTYuNTksOTAuODJsNDkuNDgsMTMuNjIsMjcuNjIsODUuMDItMzIuNDYsMzkuMzFDMjAuNzcsMjA1LjY0LDEuMTEsMTY5LjAyLDEuMSwxMjcuODJjMC0xMi44NywxLjkyLTI1LjI5LDUuNDktMzdaIi8+Cjwvc3ZnPgo=", 
-            "rarity": "Mythic",
-            "is_default": True
-        },
-    ]
-    
-    for gem_data in default_gems:
-        existing = await db.gem_definitions.find_one({"type": gem_data["type"]})
-        if not existing:
-            gem_def = GemDefinition(**gem_data)
-            await db.gem_definitions.insert_one(gem_def.dict())
+DEFAULT_GEM_DEFINITIONS = [
+    {
+        "type": GemType.RUBY, 
+        "name": "Ruby", 
+        "price": 1, 
+        "color": "#FF0000", 
+        "icon": "data:image/svg+xml;base64,PD94bWwgdmVyc2lvbj0iMS4wIiBlbmNvZGluZz0iVVRGLTgiPz4KPHN2ZyBpZD0iT2JqZWN0cyIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIiB4bWxuczp4bGluaz0iaHR0cDovL3d3dy53My5vcmcvMTk5OS94bGluayIgdmlld0JveD0iMCAwIDI1NS42NSAyNTUuNjUiPgogIDxkZWZzPgogICAgPHN0eWxlPgogICAgICAuY2xzLTEgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTUpOwogICAgICB9CgogICAgICAuY2xzLTIgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTYpOwogICAgICB9CgogICAgICAuY2xzLTMgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTQpOwogICAgICB9CgogICAgICAuY2xzLTQgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTMpOwogICAgICB9CgogICAgICAuY2xzLTUgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTIpOwogICAgICB9CgogICAgICAuY2xzLTYgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50KTsKICAgICAgfQogICAgPC9zdHlsZT4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50IiB4MT0iMTQ5LjY1IiB5MT0iNzcuODYiIHgyPSIyMTAuMTIiIHkyPSIyOC4zIiBncmFkaWVudFVuaXRzPSJ1c2VyU3BhY2VPblVzZSI+CiAgICAgIDxzdG9wIG9mZnNldD0iMCIgc3RvcC1jb2xvcj0iI2NjMDAwMCIvPgogICAgICA8c3RvcCBvZmZzZXQ9IjEiIHN0b3AtY29sb3I9IiNmZjNiM2IiLz4KICAgIDwvbGluZWFyR3JhZGllbnQ+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC0yIiB4MT0iMTczLjU5IiB5MT0iMTkwLjMiIHgyPSIyNjcuNDYiIHkyPSIxMTMuMzciIGdyYWRpZW50VW5pdHM9InVzZXJTcGFjZU9uVXNlIj4KICAgICAgPHN0b3Agb2Zmc2V0PSIwIiBzdG9wLWNvbG9yPSIjY2MwMDAwIi8+CiAgICAgIDxzdG9wIG9mZnNldD0iMSIgc3RvcC1jb2xvcj0iI2IzMDAwMCIvPgogICAgPC9saW5lYXJHcmFkaWVudD4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50LTMiIHgxPSIxNC43OSIgeTE9IjEwMC44MiIgeDI9IjEzMS4yOSIgeTI9IjUuMzMiIGdyYWRpZW50VW5pdHM9InVzZXJTcGFjZU9uVXNlIj4KICAgICAgPHN0b3Agb2Zmc2V0PSIwIiBzdG9wLWNvbG9yPSIjZmYxYTFhIi8+CiAgICAgIDxzdG9wIG9mZnNldD0iMSIgc3RvcC1jb2xvcj0iI2ZmNjY2NiIvPgogICAgPC9saW5lYXJHcmFkaWVudD4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50LTQiIHgxPSIxMzcuODUiIHkxPSIzOC4xIiB4Mj0iMTEwLjA0IiB5Mj0iMjMzLjEzIiBncmFkaWVudFVuaXRzPSJ1c2VyU3BhY2VPblVzZSI+CiAgICAgIDxzdG9wIG9mZnNldD0iMCIgc3RvcC1jb2xvcj0iI2ZmNzc3NyIvPgogICAgICA8c3RvcCBvZmZzZXQ9Ii41MyIgc3RvcC1jb2xvcj0iI2ZmYWFhYSIvPgogICAgICA8c3RvcCBvZmZzZXQ9IjEiIHN0b3AtY29sb3I9IiNmZjQ0NDQiLz4KICAgIDwvbGluZWFyR3JhZGllbnQ+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC01IiB4MT0iNzguOTEiIHkxPSIyNjIuNTMiIHgyPSIxNzEuMSIgeTI9IjE4Ni45NyIgeGxpbms6aHJlZj0iI2xpbmVhci1ncmFkaWVudC0zIi8+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC02IiB4MT0iNS43NSIgeTE9IjE3OC43OCIgeDI9IjcyLjMiIHkyPSIxMjQuMjQiIHhsaW5rOmhyZWY9IiNsaW5lYXItZ3JhZGllbnQiLz4KICA8L2RlZnM+CiAgPHBhdGggY2xhc3M9ImNscy02IiBkPSJNMTI3LjgzLDEuMWM1Ny4xNy0uMDEsMTA1LjUxLDM3Ljg2LDEyMS4yOCw4OS44OGwtNDguNTYsMTMuMzYtNzIuMTYtNTIuNDItLjU2LTUwLjgyWiIvPgogIDxwYXRoIGNsYXNzPSJjbHMtNSIgZD0iTTIwMC41NSwxMDQuMzRsNDguNTYtMTMuMzZjMy41NCwxMS42NSw1LjQ1LDI0LjAyLDUuNDQsMzYuODQsMCw0MC45NS0xOS40Miw3Ny4zNi00OS41NSwxMDAuNTJsLTMyLjA5LTM4Ljg4aC4xNXMyNy42NC04NS4wMiwyNy42NC04NS4wMmwtLjE1LS4xMVoiLz4KICA8cGF0aCBjbGFzcz0iY2xzLTQiIGQ9Ik0xMjcuODMsMS4xbC41Niw1MC44Mi03Mi4zMiw1Mi41Mi00OS40OC0xMy42MkMyMi40MiwzOC44OCw3MC43MSwxLjA5LDEyNy44MywxLjFaIi8+CiAgPHBvbHlnb24gY2xhc3M9ImNscy0zIiBwb2ludHM9IjIwMC41NSAxMDQuMzQgMjAwLjcgMTA0LjQ1IDE3My4wNiAxODkuNDcgMTcyLjkxIDE4OS40NiA4My43IDE4OS40NiA1Ni4wNyAxMDQuNDQgMTI4LjM5IDUxLjkyIDIwMC41NSAxMDQuMzQiLz4KICA8cGF0aCBjbGFzcz0iY2xzLTEiIGQ9Ik0xNzIuOTEsMTg5LjQ2bDMyLjA5LDM4Ljg4Yy0yMS4zOCwxNi40My00OC4xNCwyNi4yLTc3LjE3LDI2LjItMjguNzksMC01NS4zMy05LjU4LTc2LjU5LTI1Ljc3bDMyLjQ2LTM5LjMxaDg5LjIxWiIvPgogIDxwYXRoIGNsYXNzPSJjbHMtMiIgZD0iTTYuNTksOTAuODJsNDkuNDgsMTMuNjIsMjcuNjIsODUuMDItMzIuNDYsMzkuMzFDMjAuNzcsMjA1LjY0LDEuMTEsMTY5LjAyLDEuMSwxMjcuODJjMC0xMi44NywxLjkyLTI1LjI5LDUuNDktMzdaIi8+Cjwvc3ZnPgo=", 
+        "rarity": "Common",
+        "is_default": True
+    },
+    {
+        "type": GemType.AMBER, 
+        "name": "Amber", 
+        "price": 2, 
+        "color": "#FFA500", 
+        "icon": "data:image/svg+xml;base64,PD94bWwgdmVyc2lvbj0iMS4wIiBlbmNvZGluZz0iVVRGLTgiPz4KPHN2ZyBpZD0iT2JqZWN0cyIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIiB4bWxuczp4bGluaz0iaHR0cDovL3d3dy53My5vcmcvMTk5OS94bGluayIgdmlld0JveD0iMCAwIDI1NS42NSAyNTUuNjUiPgogIDxkZWZzPgogICAgPHN0eWxlPgogICAgICAuY2xzLTEgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTUpOwogICAgICB9CgogICAgICAuY2xzLTIgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTYpOwogICAgICB9CgogICAgICAuY2xzLTMgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTQpOwogICAgICB9CgogICAgICAuY2xzLTQgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTMpOwogICAgICB9CgogICAgICAuY2xzLTUgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTIpOwogICAgICB9CgogICAgICAuY2xzLTYgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50KTsKICAgICAgfQogICAgPC9zdHlsZT4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50IiB4MT0iMTQ5LjY1IiB5MT0iNzcuODYiIHgyPSIyMTAuMTIiIHkyPSIyOC4zIiBncmFkaWVudFVuaXRzPSJ1c2VyU3BhY2VPblVzZSI+CiAgICAgIDxzdG9wIG9mZnNldD0iMCIgc3RvcC1jb2xvcj0iI2NjNjYwMCIvPgogICAgICA8c3RvcCBvZmZzZXQ9IjEiIHN0b3AtY29sb3I9IiNmZjk1MDAiLz4KICAgIDwvbGluZWFyR3JhZGllbnQ+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC0yIiB4MT0iMTczLjU5IiB5MT0iMTkwLjMiIHgyPSIyNjcuNDYiIHkyPSIxMTMuMzciIGdyYWRpZW50VW5pdHM9InVzZXJTcGFjZU9uVXNlIj4KICAgICAgPHN0b3Agb2Zmc2V0PSIwIiBzdG9wLWNvbG9yPSIjY2M2NjAwIi8+CiAgICAgIDxzdG9wIG9mZnNldD0iMSIgc3RvcC1jb2xvcj0iI2IzNTkwMCIvPgogICAgPC9saW5lYXJHcmFkaWVudD4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50LTMiIHgxPSIxNC43OSIgeTE9IjEwMC44MiIgeDI9IjEzMS4yOSIgeTI9IjUuMzMiIGdyYWRpZW50VW5pdHM9InVzZXJTcGFjZU9uVXNlIj4KICAgICAgPHN0b3Agb2Zmc2V0PSIwIiBzdG9wLWNvbG9yPSIjZmZhYTAwIi8+CiAgICAgIDxzdG9wIG9mZnNldD0iMSIgc3RvcC1jb2xvcj0iI2ZmYmIzMyIvPgogICAgPC9saW5lYXJHcmFkaWVudD4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50LTQiIHgxPSIxMzcuODUiIHkxPSIzOC4xIiB4Mj0iMTEwLjA0IiB5Mj0iMjMzLjEzIiBncmFkaWVudFVuaXRzPSJ1c2VyU3BhY2VPblVzZSI+CiAgICAgIDxzdG9wIG9mZnNldD0iMCIgc3RvcC1jb2xvcj0iI2ZmYmI2NiIvPgogICAgICA8c3RvcCBvZmZzZXQ9Ii41MyIgc3RvcC1jb2xvcj0iI2ZmZGQ5OSIvPgogICAgICA8c3RvcCBvZmZzZXQ9IjEiIHN0b3AtY29sb3I9IiNmZjk5MDAiLz4KICAgIDwvbGluZWFyR3JhZGllbnQ+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC01IiB4MT0iNzguOTEiIHkxPSIyNjIuNTMiIHgyPSIxNzEuMSIgeTI9IjE4Ni45NyIgeGxpbms6aHJlZj0iI2xpbmVhci1ncmFkaWVudC0zIi8+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC02IiB4MT0iNS43NSIgeTE9IjE3OC43OCIgeDI9IjcyLjMiIHkyPSIxMjQuMjQiIHhsaW5rOmhyZWY9IiNsaW5lYXItZ3JhZGllbnQiLz4KICA8L2RlZnM+CiAgPHBhdGggY2xhc3M9ImNscy02IiBkPSJNMTI3LjgzLDEuMWM1Ny4xNy0uMDEsMTA1LjUxLDM3Ljg2LDEyMS4yOCw4OS44OGwtNDguNTYsMTMuMzYtNzIuMTYtNTIuNDItLjU2LTUwLjgyWiIvPgogIDxwYXRoIGNsYXNzPSJjbHMtNSIgZD0iTTIwMC41NSwxMDQuMzRsNDguNTYtMTMuMzZjMy41NCwxMS42NSw1LjQ1LDI0LjAyLDUuNDQsMzYuODQsMCw0MC45NS0xOS40Miw3Ny4zNi00OS41NSwxMDAuNTJsLTMyLjA5LTM4Ljg4aC4xNXMyNy42NC04NS4wMiwyNy42NC04NS4wMmwtLjE1LS4xMVoiLz4KICA8cGF0aCBjbGFzcz0iY2xzLTQiIGQ9Ik0xMjcuODMsMS4xbC41Niw1MC44Mi03Mi4zMiw1Mi41Mi00OS40OC0xMy42MkMyMi40MiwzOC44OCw3MC43MSwxLjA5LDEyNy44MywxLjFaIi8+CiAgPHBvbHlnb24gY2xhc3M9ImNscy0zIiBwb2ludHM9IjIwMC41NSAxMDQuMzQgMjAwLjcgMTA0LjQ1IDE3My4wNiAxODkuNDcgMTcyLjkxIDE4OS40NiA4My43IDE4OS40NiA1Ni4wNyAxMDQuNDQgMTI4LjM5IDUxLjkyIDIwMC41NSAxMDQuMzQiLz4KICA8cGF0aCBjbGFzcz0iY2xzLTEiIGQ9Ik0xNzIuOTEsMTg5LjQ2bDMyLjA5LDM4Ljg4Yy0yMS4zOCwxNi40My00OC4xNCwyNi4yLTc3LjE3LDI2LjItMjguNzksMC01NS4zMy05LjU4LTc2LjU5LTI1Ljc3bDMyLjQ2LTM5LjMxaDg5LjIxWiIvPgogIDxwYXRoIGNsYXNzPSJjbHMtMiIgZD0iTTYuNTksOTAuODJsNDkuNDgsMTMuNjIsMjcuNjIsODUuMDItMzIuNDYsMzkuMzFDMjAuNzcsMjA1LjY0LDEuMTEsMTY5LjAyLDEuMSwxMjcuODJjMC0xMi44NywxLjkyLTI1LjI5LDUuNDktMzdaIi8+Cjwvc3ZnPgo=", 
+        "rarity": "Common",
+        "is_default": True
+    },
+    {
+        "type": GemType.TOPAZ, 
+        "name": "Topaz", 
+        "price": 5, 
+        "color": "#FFFF00", 
+        "icon": "data:image/svg+xml;base64,PD94bWwgdmVyc2lvbj0iMS4wIiBlbmNvZGluZz0iVVRGLTgiPz4KPHN2ZyBpZD0iT2JqZWN0cyIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIiB4bWxuczp4bGluaz0iaHR0cDovL3d3dy53My5vcmcvMTk5OS94bGluayIgdmlld0JveD0iMCAwIDI1NS42NSAyNTUuNjUiPgogIDxkZWZzPgogICAgPHN0eWxlPgogICAgICAuY2xzLTEgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTUpOwogICAgICB9CgogICAgICAuY2xzLTIgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTYpOwogICAgICB9CgogICAgICAuY2xzLTMgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTQpOwogICAgICB9CgogICAgICAuY2xzLTQgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTMpOwogICAgICB9CgogICAgICAuY2xzLTUgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTIpOwogICAgICB9CgogICAgICAuY2xzLTYgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50KTsKICAgICAgfQogICAgPC9zdHlsZT4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50IiB4MT0iMTQ5LjY1IiB5MT0iNzcuODYiIHgyPSIyMTAuMTIiIHkyPSIyOC4zIiBncmFkaWVudFVuaXRzPSJ1c2VyU3BhY2VPblVzZSI+CiAgICAgIDxzdG9wIG9mZnNldD0iMCIgc3RvcC1jb2xvcj0iI2NjOTkwMCIvPgogICAgICA8c3RvcCBvZmZzZXQ9IjEiIHN0b3AtY29sb3I9IiNmZmNjMDAiLz4KICAgIDwvbGluZWFyR3JhZGllbnQ+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC0yIiB4MT0iMTczLjU5IiB5MT0iMTkwLjMiIHgyPSIyNjcuNDYiIHkyPSIxMTMuMzciIGdyYWRpZW50VW5pdHM9InVzZXJTcGFjZU9uVXNlIj4KICAgICAgPHN0b3Agb2Zmc2V0PSIwIiBzdG9wLWNvbG9yPSIjY2M5OTAwIi8+CiAgICAgIDxzdG9wIG9mZnNldD0iMSIgc3RvcC1jb2xvcj0iI2IzODgwMCIvPgogICAgPC9saW5lYXJHcmFkaWVudD4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50LTMiIHgxPSIxNC43OSIgeTE9IjEwMC44MiIgeDI9IjEzMS4yOSIgeTI9IjUuMzMiIGdyYWRpZW50VW5pdHM9InVzZXJTcGFjZU9uVXNlIj4KICAgICAgPHN0b3Agb2Zmc2V0PSIwIiBzdG9wLWNvbG9yPSIjZmZkZDAwIi8+CiAgICAgIDxzdG9wIG9mZnNldD0iMSIgc3RvcC1jb2xvcj0iI2ZmZWUzMyIvPgogICAgPC9saW5lYXJHcmFkaWVudD4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50LTQiIHgxPSIxMzcuODUiIHkxPSIzOC4xIiB4Mj0iMTEwLjA0IiB5Mj0iMjMzLjEzIiBncmFkaWVudFVuaXRzPSJ1c2VyU3BhY2VPblVzZSI+CiAgICAgIDxzdG9wIG9mZnNldD0iMCIgc3RvcC1jb2xvcj0iI2ZmZWU2NiIvPgogICAgICA8c3RvcCBvZmZzZXQ9Ii41MyIgc3RvcC1jb2xvcj0iI2ZmZmY5OSIvPgogICAgICA8c3RvcCBvZmZzZXQ9IjEiIHN0b3AtY29sb3I9IiNmZmNjMDAiLz4KICAgIDwvbGluZWFyR3JhZGllbnQ+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC01IiB4MT0iNzguOTEiIHkxPSIyNjIuNTMiIHgyPSIxNzEuMSIgeTI9IjE4Ni45NyIgeGxpbms6aHJlZj0iI2xpbmVhci1ncmFkaWVudC0zIi8+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC02IiB4MT0iNS43NSIgeTE9IjE3OC43OCIgeDI9IjcyLjMiIHkyPSIxMjQuMjQiIHhsaW5rOmhyZWY9IiNsaW5lYXItZ3JhZGllbnQiLz4KICA8L2RlZnM+CiAgPHBhdGggY2xhc3M9ImNscy02IiBkPSJNMTI3LjgzLDEuMWM1Ny4xNy0uMDEsMTA1LjUxLDM3Ljg2LDEyMS4yOCw4OS44OGwtNDguNTYsMTMuMzYtNzIuMTYtNTIuNDItLjU2LTUwLjgyWiIvPgogIDxwYXRoIGNsYXNzPSJjbHMtNSIgZD0iTTIwMC41NSwxMDQuMzRsNDguNTYtMTMuMzZjMy41NCwxMS42NSw1LjQ1LDI0LjAyLDUuNDQsMzYuODQsMCw0MC45NS0xOS40Miw3Ny4zNi00OS41NSwxMDAuNTJsLTMyLjA5LTM4Ljg4aC4xNXMyNy42NC04NS4wMiwyNy42NC04NS4wMmwtLjE1LS4xMVoiLz4KICA8cGF0aCBjbGFzcz0iY2xzLTQiIGQ9Ik0xMjcuODMsMS4xbC41Niw1MC44Mi03Mi4zMiw1Mi41Mi00OS40OC0xMy42MkMyMi40MiwzOC44OCw3MC43MSwxLjA5LDEyNy44MywxLjFaIi8+CiAgPHBvbHlnb24gY2xhc3M9ImNscy0zIiBwb2ludHM9IjIwMC41NSAxMDQuMzQgMjAwLjcgMTA0LjQ1IDE3My4wNiAxODkuNDcgMTcyLjkxIDE4OS40NiA4My43IDE4OS40NiA1Ni4wNyAxMDQuNDQgMTI4LjM5IDUxLjkyIDIwMC41NSAxMDQuMzQiLz4KICA8cGF0aCBjbGFzcz0iY2xzLTEiIGQ9Ik0xNzIuOTEsMTg5LjQ2bDMyLjA5LDM4Ljg4Yy0yMS4zOCwxNi40My00OC4xNCwyNi4yLTc3LjE3LDI2LjItMjguNzksMC01NS4zMy05LjU4LTc2LjU5LTI1Ljc3bDMyLjQ2LTM5LjMxaDg5LjIxWiIvPgogIDxwYXRoIGNsYXNzPSJjbHMtMiIgZD0iTTYuNTksOTAuODJsNDkuNDgsMTMuNjIsMjcuNjIsODUuMDItMzIuNDYsMzkuMzFDMjAuNzcsMjA1LjY0LDEuMTEsMTY5LjAyLDEuMSwxMjcuODJjMC0xMi44NywxLjkyLTI1LjI5LDUuNDktMzdaIi8+Cjwvc3ZnPgo=", 
+        "rarity": "Uncommon",
+        "is_default": True
+    },
+    {
+        "type": GemType.EMERALD, 
+        "name": "Emerald", 
+        "price": 10, 
+        "color": "#00FF00", 
+        "icon": "data:image/svg+xml;base64,PD94bWwgdmVyc2lvbj0iMS4wIiBlbmNvZGluZz0iVVRGLTgiPz4KPHN2ZyBpZD0iT2JqZWN0cyIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIiB4bWxuczp4bGluaz0iaHR0cDovL3d3dy53My5vcmcvMTk5OS94bGluayIgdmlld0JveD0iMCAwIDI1NS42NSAyNTUuNjUiPgogIDxkZWZzPgogICAgPHN0eWxlPgogICAgICAuY2xzLTEgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTUpOwogICAgICB9CgogICAgICAuY2xzLTIgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTYpOwogICAgICB9CgogICAgICAuY2xzLTMgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTQpOwogICAgICB9CgogICAgICAuY2xzLTQgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTMpOwogICAgICB9CgogICAgICAuY2xzLTUgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTIpOwogICAgICB9CgogICAgICAuY2xzLTYgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50KTsKICAgICAgfQogICAgPC9zdHlsZT4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50IiB4MT0iMTQ5LjY1IiB5MT0iNzcuODYiIHgyPSIyMTAuMTIiIHkyPSIyOC4zIiBncmFkaWVudFVuaXRzPSJ1c2VyU3BhY2VPblVzZSI+CiAgICAgIDxzdG9wIG9mZnNldD0iMCIgc3RvcC1jb2xvcj0iIzIyOEIyMiIvPgogICAgICA8c3RvcCBvZmZzZXQ9IjEiIHN0b3AtY29sb3I9IiMzNGM3NTkiLz4KICAgIDwvbGluZWFyR3JhZGllbnQ+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC0yIiB4MT0iMTczLjU5IiB5MT0iMTkwLjMiIHgyPSIyNjcuNDYiIHkyPSIxMTMuMzciIGdyYWRpZW50VW5pdHM9InVzZXJTcGFjZU9uVXNlIj4KICAgICAgPHN0b3Agb2Zmc2V0PSIwIiBzdG9wLWNvbG9yPSIjMjI4QjIyIi8+CiAgICAgIDxzdG9wIG9mZnNldD0iMSIgc3RvcC1jb2xvcj0iIzFGN0ExRiIvPgogICAgPC9saW5lYXJHcmFkaWVudD4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50LTMiIHgxPSIxNC43OSIgeTE9IjEwMC44MiIgeDI9IjEzMS4yOSIgeTI9IjUuMzMiIGdyYWRpZW50VW5pdHM9InVzZXJTcGFjZU9uVXNlIj4KICAgICAgPHN0b3Agb2Zmc2V0PSIwIiBzdG9wLWNvbG9yPSIjNDBFMDQwIi8+CiAgICAgIDxzdG9wIG9mZnNldD0iMSIgc3RvcC1jb2xvcj0iIzYwRkY2MCIvPgogICAgPC9saW5lYXJHcmFkaWVudD4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50LTQiIHgxPSIxMzcuODUiIHkxPSIzOC4xIiB4Mj0iMTEwLjA0IiB5Mj0iMjMzLjEzIiBncmFkaWVudFVuaXRzPSJ1c2VyU3BhY2VPblVzZSI+CiAgICAgIDxzdG9wIG9mZnNldD0iMCIgc3RvcC1jb2xvcj0iIzcwRkY3MCIvPgogICAgICA8c3RvcCBvZmZzZXQ9Ii41MyIgc3RvcC1jb2xvcj0iI0EwRkZBMCIvPgogICAgICA8c3RvcCBvZmZzZXQ9IjEiIHN0b3AtY29sb3I9IiMzNGM3NTkiLz4KICAgIDwvbGluZWFyR3JhZGllbnQ+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC01IiB4MT0iNzguOTEiIHkxPSIyNjIuNTMiIHgyPSIxNzEuMSIgeTI9IjE4Ni45NyIgeGxpbms6aHJlZj0iI2xpbmVhci1ncmFkaWVudC0zIi8+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC02IiB4MT0iNS43NSIgeTE9IjE3OC43OCIgeDI9IjcyLjMiIHkyPSIxMjQuMjQiIHhsaW5rOmhyZWY9IiNsaW5lYXItZ3JhZGllbnQiLz4KICA8L2RlZnM+CiAgPHBhdGggY2xhc3M9ImNscy02IiBkPSJNMTI3LjgzLDEuMWM1Ny4xNy0uMDEsMTA1LjUxLDM3Ljg2LDEyMS4yOCw4OS44OGwtNDguNTYsMTMuMzYtNzIuMTYtNTIuNDItLjU2LTUwLjgyWiIvPgogIDxwYXRoIGNsYXNzPSJjbHMtNSIgZD0iTTIwMC41NSwxMDQuMzRsNDguNTYtMTMuMzZjMy41NCwxMS42NSw1LjQ1LDI0LjAyLDUuNDQsMzYuODQsMCw0MC45NS0xOS40Miw3Ny4zNi00OS41NSwxMDAuNTJsLTMyLjA5LTM4Ljg4aC4xNXMyNy42NC04NS4wMiwyNy42NC04NS4wMmwtLjE1LS4xMVoiLz4KICA8cGF0aCBjbGFzcz0iY2xzLTQiIGQ9Ik0xMjcuODMsMS4xbC41Niw1MC44Mi03Mi4zMiw1Mi41Mi00OS40OC0xMy42MkMyMi40MiwzOC44OCw3MC43MSwxLjA5LDEyNy44MywxLjFaIi8+CiAgPHBvbHlnb24gY2xhc3M9ImNscy0zIiBwb2ludHM9IjIwMC41NSAxMDQuMzQgMjAwLjcgMTA0LjQ1IDE3My4wNiAxODkuNDcgMTcyLjkxIDE4OS40NiA4My43IDE4OS40NiA1Ni4wNyAxMDQuNDQgMTI4LjM5IDUxLjkyIDIwMC41NSAxMDQuMzQiLz4KICA8cGF0aCBjbGFzcz0iY2xzLTEiIGQ9Ik0xNzIuOTEsMTg5LjQ2bDMyLjA5LDM4Ljg4Yy0yMS4zOCwxNi40My00OC4xNCwyNi4yLTc3LjE3LDI2LjItMjguNzksMC01NS4zMy05LjU4LTc2LjU5LTI1Ljc3bDMyLjQ2LTM5LjMxaDg5LjIxWiIvPgogIDxwYXRoIGNsYXNzPSJjbHMtMiIgZD0iTTYuNTksOTAuODJsNDkuNDgsMTMuNjIsMjcuNjIsODUuMDItMzIuNDYsMzkuMzFDMjAuNzcsMjA1LjY0LDEuMTEsMTY5LjAyLDEuMSwxMjcuODJjMC0xMi44NywxLjkyLTI1LjI5LDUuNDktMzdaIi8+Cjwvc3ZnPgo=", 
+        "rarity": "Rare",
+        "is_default": True
+    },
+    {
+        "type": GemType.AQUAMARINE, 
+        "name": "Aquamarine", 
+        "price": 25, 
+        "color": "#00FFFF", 
+        "icon": "data:image/svg+xml;base64,PD94bWwgdmVyc2lvbj0iMS4wIiBlbmNvZGluZz0iVVRGLTgiPz4KPHN2ZyBpZD0iT2JqZWN0cyIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIiB4bWxuczp4bGluaz0iaHR0cDovL3d3dy53My5vcmcvMTk5OS94bGluayIgdmlld0JveD0iMCAwIDI1NS42NSAyNTUuNjUiPgogIDxkZWZzPgogICAgPHN0eWxlPgogICAgICAuY2xzLTEgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTUpOwogICAgICB9CgogICAgICAuY2xzLTIgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTYpOwogICAgICB9CgogICAgICAuY2xzLTMgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTQpOwogICAgICB9CgogICAgICAuY2xzLTQgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTMpOwogICAgICB9CgogICAgICAuY2xzLTUgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTIpOwogICAgICB9CgogICAgICAuY2xzLTYgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50KTsKICAgICAgfQogICAgPC9zdHlsZT4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50IiB4MT0iMTQ5LjY1IiB5MT0iNzcuODYiIHgyPSIyMTAuMTIiIHkyPSIyOC4zIiBncmFkaWVudFVuaXRzPSJ1c2VyU3BhY2VPblVzZSI+CiAgICAgIDxzdG9wIG9mZnNldD0iMCIgc3RvcC1jb2xvcj0iIzAwNzdjYyIvPgogICAgICA8c3RvcCBvZmZzZXQ9IjEiIHN0b3AtY29sb3I9IiMwMGE5ZmYiLz4KICAgIDwvbGluZWFyR3JhZGllbnQ+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC0yIiB4MT0iMTczLjU5IiB5MT0iMTkwLjMiIHgyPSIyNjcuNDYiIHkyPSIxMTMuMzciIGdyYWRpZW50VW5pdHM9InVzZXJTcGFjZU9uVXNlIj4KICAgICAgPHN0b3Agb2Zmc2V0PSIwIiBzdG9wLWNvbG9yPSIjMDA3N2NjIi8+CiAgICAgIDxzdG9wIG9mZnNldD0iMSIgc3RvcC1jb2xvcj0iIzAwNjZiMyIvPgogICAgPC9saW5lYXJHcmFkaWVudD4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50LTMiIHgxPSIxNC43OSIgeTE9IjEwMC44MiIgeDI9IjEzMS4yOSIgeTI9IjUuMzMiIGdyYWRpZW50VW5pdHM9InVzZXJTcGFjZU9uVXNlIj4KICAgICAgPHN0b3Agb2Zmc2V0PSIwIiBzdG9wLWNvbG9yPSIjMDBiYmZmIi8+CiAgICAgIDxzdG9wIG9mZnNldD0iMSIgc3RvcC1jb2xvcj0iIzMzY2NmZiIvPgogICAgPC9saW5lYXJHcmFkaWVudD4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50LTQiIHgxPSIxMzcuODUiIHkxPSIzOC4xIiB4Mj0iMTEwLjA0IiB5Mj0iMjMzLjEzIiBncmFkaWVudFVuaXRzPSJ1c2VyU3BhY2VPblVzZSI+CiAgICAgIDxzdG9wIG9mZnNldD0iMCIgc3RvcC1jb2xvcj0iIzY2ZGRmZiIvPgogICAgICA8c3RvcCBvZmZzZXQ9Ii41MyIgc3RvcC1jb2xvcj0iIzk5ZWVmZiIvPgogICAgICA8c3RvcCBvZmZzZXQ9IjEiIHN0b3AtY29sb3I9IiMwMGE5ZmYiLz4KICAgIDwvbGluZWFyR3JhZGllbnQ+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC01IiB4MT0iNzguOTEiIHkxPSIyNjIuNTMiIHgyPSIxNzEuMSIgeTI9IjE4Ni45NyIgeGxpbms6aHJlZj0iI2xpbmVhci1ncmFkaWVudC0zIi8+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC02IiB4MT0iNS43NSIgeTE9IjE3OC43OCIgeDI9IjcyLjMiIHkyPSIxMjQuMjQiIHhsaW5rOmhyZWY9IiNsaW5lYXItZ3JhZGllbnQiLz4KICA8L2RlZnM+CiAgPHBhdGggY2xhc3M9ImNscy02IiBkPSJNMTI3LjgzLDEuMWM1Ny4xNy0uMDEsMTA1LjUxLDM3Ljg2LDEyMS4yOCw4OS44OGwtNDguNTYsMTMuMzYtNzIuMTYtNTIuNDItLjU2LTUwLjgyWiIvPgogIDxwYXRoIGNsYXNzPSJjbHMtNSIgZD0iTTIwMC41NSwxMDQuMzRsNDguNTYtMTMuMzZjMy41NCwxMS42NSw1LjQ1LDI0LjAyLDUuNDQsMzYuODQsMCw0MC45NS0xOS40Miw3Ny4zNi00OS41NSwxMDAuNTJsLTMyLjA5LTM4Ljg4aC4xNXMyNy42NC04NS4wMiwyNy42NC04NS4wMmwtLjE1LS4xMVoiLz4KICA8cGF0aCBjbGFzcz0iY2xzLTQiIGQ9Ik0xMjcuODMsMS4xbC41Niw1MC44Mi03Mi4zMiw1Mi41Mi00OS40OC0xMy42MkMyMi40MiwzOC44OCw3MC43MSwxLjA5LDEyNy44MywxLjFaIi8+CiAgPHBvbHlnb24gY2xhc3M9ImNscy0zIiBwb2ludHM9IjIwMC41NSAxMDQuMzQgMjAwLjcgMTA0LjQ1IDE3My4wNiAxODkuNDcgMTcyLjkxIDE4OS40NiA4My43IDE4OS40NiA1Ni4wNyAxMDQuNDQgMTI4LjM5IDUxLjkyIDIwMC41NSAxMDQuMzQiLz4KICA8cGF0aCBjbGFzcz0iY2xzLTEiIGQ9Ik0xNzIuOTEsMTg5LjQ2bDMyLjA5LDM4Ljg4Yy0yMS4zOCwxNi40My00OC4xNCwyNi4yLTc3LjE3LDI2LjItMjguNzksMC01NS4zMy05LjU4LTc2LjU5LTI1Ljc3bDMyLjQ2LTM5LjMxaDg5LjIxWiIvPgogIDxwYXRoIGNsYXNzPSJjbHMtMiIgZD0iTTYuNTksOTAuODJsNDkuNDgsMTMuNjIsMjcuNjIsODUuMDItMzIuNDYsMzkuMzFDMjAuNzcsMjA1LjY0LDEuMTEsMTY5LjAyLDEuMSwxMjcuODJjMC0xMi44NywxLjkyLTI1LjI5LDUuNDktMzdaIi8+Cjwvc3ZnPgo=", 
+        "rarity": "Epic",
+        "is_default": True
+    },
+    {
+        "type": GemType.SAPPHIRE, 
+        "name": "Sapphire", 
+        "price": 50, 
+        "color": "#0000FF", 
+        "icon": "data:image/svg+xml;base64,PD94bWwgdmVyc2lvbj0iMS4wIiBlbmNvZGluZz0iVVRGLTgiPz4KPHN2ZyBpZD0iT2JqZWN0cyIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIiB4bWxuczp4bGluaz0iaHR0cDovL3d3dy53My5vcmcvMTk5OS94bGluayIgdmlld0JveD0iMCAwIDI1NS42NSAyNTUuNjUiPgogIDxkZWZzPgogICAgPHN0eWxlPgogICAgICAuY2xzLTEgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTUpOwogICAgICB9CgogICAgICAuY2xzLTIgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTYpOwogICAgICB9CgogICAgICAuY2xzLTMgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTQpOwogICAgICB9CgogICAgICAuY2xzLTQgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTMpOwogICAgICB9CgogICAgICAuY2xzLTUgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTIpOwogICAgICB9CgogICAgICAuY2xzLTYgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50KTsKICAgICAgfQogICAgPC9zdHlsZT4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50IiB4MT0iMTQ5LjY1IiB5MT0iNzcuODYiIHgyPSIyMTAuMTIiIHkyPSIyOC4zIiBncmFkaWVudFVuaXRzPSJ1c2VyU3BhY2VPblVzZSI+CiAgICAgIDxzdG9wIG9mZnNldD0iMCIgc3RvcC1jb2xvcj0iIzMzMzNjYyIvPgogICAgICA8c3RvcCBvZmZzZXQ9IjEiIHN0b3AtY29sb3I9IiM1ODU2ZDYiLz4KICAgIDwvbGluZWFyR3JhZGllbnQ+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC0yIiB4MT0iMTczLjU5IiB5MT0iMTkwLjMiIHgyPSIyNjcuNDYiIHkyPSIxMTMuMzciIGdyYWRpZW50VW5pdHM9InVzZXJTcGFjZU9uVXNlIj4KICAgICAgPHN0b3Agb2Zmc2V0PSIwIiBzdG9wLWNvbG9yPSIjMzMzM2NjIi8+CiAgICAgIDxzdG9wIG9mZnNldD0iMSIgc3RvcC1jb2xvcj0iIzI5MjliMyIvPgogICAgPC9saW5lYXJHcmFkaWVudD4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50LTMiIHgxPSIxNC43OSIgeTE9IjEwMC44MiIgeDI9IjEzMS4yOSIgeTI9IjUuMzMiIGdyYWRpZW50VW5pdHM9InVzZXJTcGFjZU9uVXNlIj4KICAgICAgPHN0b3Agb2Zmc2V0PSIwIiBzdG9wLWNvbG9yPSIjNjY2NmZmIi8+CiAgICAgIDxzdG9wIG9mZnNldD0iMSIgc3RvcC1jb2xvcj0iIzg4ODhmZiIvPgogICAgPC9saW5lYXJHcmFkaWVudD4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50LTQiIHgxPSIxMzcuODUiIHkxPSIzOC4xIiB4Mj0iMTEwLjA0IiB5Mj0iMjMzLjEzIiBncmFkaWVudFVuaXRzPSJ1c2VyU3BhY2VPblVzZSI+CiAgICAgIDxzdG9wIG9mZnNldD0iMCIgc3RvcC1jb2xvcj0iIzk5OTlmZiIvPgogICAgICA8c3RvcCBvZmZzZXQ9Ii41MyIgc3RvcC1jb2xvcj0iI2JiYmJmZiIvPgogICAgICA8c3RvcCBvZmZzZXQ9IjEiIHN0b3AtY29sb3I9IiM1ODU2ZDYiLz4KICAgIDwvbGluZWFyR3JhZGllbnQ+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC01IiB4MT0iNzguOTEiIHkxPSIyNjIuNTMiIHgyPSIxNzEuMSIgeTI9IjE4Ni45NyIgeGxpbms6aHJlZj0iI2xpbmVhci1ncmFkaWVudC0zIi8+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC02IiB4MT0iNS43NSIgeTE9IjE3OC43OCIgeDI9IjcyLjMiIHkyPSIxMjQuMjQiIHhsaW5rOmhyZWY9IiNsaW5lYXItZ3JhZGllbnQiLz4KICA8L2RlZnM+CiAgPHBhdGggY2xhc3M9ImNscy02IiBkPSJNMTI3LjgzLDEuMWM1Ny4xNy0uMDEsMTA1LjUxLDM3Ljg2LDEyMS4yOCw4OS44OGwtNDguNTYsMTMuMzYtNzIuMTYtNTIuNDItLjU2LTUwLjgyWiIvPgogIDxwYXRoIGNsYXNzPSJjbHMtNSIgZD0iTTIwMC41NSwxMDQuMzRsNDguNTYtMTMuMzZjMy41NCwxMS42NSw1LjQ1LDI0LjAyLDUuNDQsMzYuODQsMCw0MC45NS0xOS40Miw3Ny4zNi00OS41NSwxMDAuNTJsLTMyLjA5LTM4Ljg4aC4xNXMyNy42NC04NS4wMiwyNy42NC04NS4wMmwtLjE1LS4xMVoiLz4KICA8cGF0aCBjbGFzcz0iY2xzLTQiIGQ9Ik0xMjcuODMsMS4xbC41Niw1MC44Mi03Mi4zMiw1Mi41Mi00OS40OC0xMy42MkMyMi40MiwzOC44OCw3MC43MSwxLjA5LDEyNy44MywxLjFaIi8+CiAgPHBvbHlnb24gY2xhc3M9ImNscy0zIiBwb2ludHM9IjIwMC41NSAxMDQuMzQgMjAwLjcgMTA0LjQ1IDE3My4wNiAxODkuNDcgMTcyLjkxIDE4OS40NiA4My43IDE4OS40NiA1Ni4wNyAxMDQuNDQgMTI4LjM5IDUxLjkyIDIwMC41NSAxMDQuMzQiLz4KICA8cGF0aCBjbGFzcz0iY2xzLTEiIGQ9Ik0xNzIuOTEsMTg5LjQ2bDMyLjA5LDM4Ljg4Yy0yMS4zOCwxNi40My00OC4xNCwyNi4yLTc3LjE3LDI2LjItMjguNzksMC01NS4zMy05LjU4LTc2LjU5LTI1Ljc3bDMyLjQ2LTM5LjMxaDg5LjIxWiIvPgogIDxwYXRoIGNsYXNzPSJjbHMtMiIgZD0iTTYuNTksOTAuODJsNDkuNDgsMTMuNjIsMjcuNjIsODUuMDItMzIuNDYsMzkuMzFDMjAuNzcsMjA1LjY0LDEuMTEsMTY5LjAyLDEuMSwxMjcuODJjMC0xMi44NywxLjkyLTI1LjI5LDUuNDktMzdaIi8+Cjwvc3ZnPgo=", 
+        "rarity": "Legendary",
+        "is_default": True
+    },
+    {
+        "type": GemType.MAGIC, 
+        "name": "Magic", 
+        "price": 100, 
+        "color": "#FF00FF", 
+        "icon": "data:image/svg+xml;base64,PD94bWwgdmVyc2lvbj0iMS4wIiBlbmNvZGluZz0iVVRGLTgiPz4KPHN2ZyBpZD0iT2JqZWN0cyIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIiB4bWxuczp4bGluaz0iaHR0cDovL3d3dy53My5vcmcvMTk5OS94bGluayIgdmlld0JveD0iMCAwIDI1NS42NSAyNTUuNjUiPgogIDxkZWZzPgogICAgPHN0eWxlPgogICAgICAuY2xzLTEgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTUpOwogICAgICB9CgogICAgICAuY2xzLTIgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTYpOwogICAgICB9CgogICAgICAuY2xzLTMgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTQpOwogICAgICB9CgogICAgICAuY2xzLTQgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTMpOwogICAgICB9CgogICAgICAuY2xzLTUgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50LTIpOwogICAgICB9CgogICAgICAuY2xzLTYgewogICAgICAgIGZpbGw6IHVybCgjbGluZWFyLWdyYWRpZW50KTsKICAgICAgfQogICAgPC9zdHlsZT4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50IiB4MT0iMTQ5LjY1IiB5MT0iNzcuODYiIHgyPSIyMTAuMTIiIHkyPSIyOC4zIiBncmFkaWVudFVuaXRzPSJ1c2VyU3BhY2VPblVzZSI+CiAgICAgIDxzdG9wIG9mZnNldD0iMCIgc3RvcC1jb2xvcj0iIzc3MzNjYyIvPgogICAgICA8c3RvcCBvZmZzZXQ9IjEiIHN0b3AtY29sb3I9IiNhZjUyZGUiLz4KICAgIDwvbGluZWFyR3JhZGllbnQ+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC0yIiB4MT0iMTczLjU5IiB5MT0iMTkwLjMiIHgyPSIyNjcuNDYiIHkyPSIxMTMuMzciIGdyYWRpZW50VW5pdHM9InVzZXJTcGFjZU9uVXNlIj4KICAgICAgPHN0b3Agb2Zmc2V0PSIwIiBzdG9wLWNvbG9yPSIjNzczM2NjIi8+CiAgICAgIDxzdG9wIG9mZnNldD0iMSIgc3RvcC1jb2xvcj0iIzY2MjliMyIvPgogICAgPC9saW5lYXJHcmFkaWVudD4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50LTMiIHgxPSIxNC43OSIgeTE9IjEwMC44MiIgeDI9IjEzMS4yOSIgeTI9IjUuMzMiIGdyYWRpZW50VW5pdHM9InVzZXJTcGFjZU9uVXNlIj4KICAgICAgPHN0b3Agb2Zmc2V0PSIwIiBzdG9wLWNvbG9yPSIjYmI2NmZmIi8+CiAgICAgIDxzdG9wIG9mZnNldD0iMSIgc3RvcC1jb2xvcj0iI2NjODhmZiIvPgogICAgPC9saW5lYXJHcmFkaWVudD4KICAgIDxsaW5lYXJHcmFkaWVudCBpZD0ibGluZWFyLWdyYWRpZW50LTQiIHgxPSIxMzcuODUiIHkxPSIzOC4xIiB4Mj0iMTEwLjA0IiB5Mj0iMjMzLjEzIiBncmFkaWVudFVuaXRzPSJ1c2VyU3BhY2VPblVzZSI+CiAgICAgIDxzdG9wIG9mZnNldD0iMCIgc3RvcC1jb2xvcj0iI2RkOTlmZiIvPgogICAgICA8c3RvcCBvZmZzZXQ9Ii41MyIgc3RvcC1jb2xvcj0iI2VlY2NmZiIvPgogICAgICA8c3RvcCBvZmZzZXQ9IjEiIHN0b3AtY29sb3I9IiNhZjUyZGUiLz4KICAgIDwvbGluZWFyR3JhZGllbnQ+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC01IiB4MT0iNzguOTEiIHkxPSIyNjIuNTMiIHgyPSIxNzEuMSIgeTI9IjE4Ni45NyIgeGxpbms6aHJlZj0iI2xpbmVhci1ncmFkaWVudC0zIi8+CiAgICA8bGluZWFyR3JhZGllbnQgaWQ9ImxpbmVhci1ncmFkaWVudC02IiB4MT0iNS43NSIgeTE9IjE3OC43OCIgeDI9IjcyLjMiIHkyPSIxMjQuMjQiIHhsaW5rOmhyZWY9IiNsaW5lYXItZ3JhZGllbnQiLz4KICA8L2RlZnM+CiAgPHBhdGggY2xhc3M9ImNscy02IiBkPSJNMTI3LjgzLDEuMWM1Ny4xNy0uMDEsMTA1LjUxLDM3Ljg2LDEyMS4yOCw4OS44OGwtNDguNTYsMTMuMzYtNzIuMTYtNTIuNDItLjU2LTUwLjgyWiIvPgogIDxwYXRoIGNsYXNzPSJjbHMtNSIgZD0iTTIwMC41NSwxMDQuMzRsNDguNTYtMTMuMzZjMy41NCwxMS42NSw1LjQ1LDI0LjAyLDUuNDQsMzYuODQsMCw0MC45NS0xOS40Miw3Ny4zNi00OS41NSwxMDAuNTJsLTMyLjA5LTM4Ljg4aC4xNXMyNy42NC04NS4wMiwyNy42NC04NS4wMmwtLjE1LS4xMVoiLz4KICA8cGF0aCBjbGFzcz0iY2xzLTQiIGQ9Ik0xMjcuODMsMS4xbC41Niw1MC44Mi03Mi4zMiw1Mi41Mi00OS40OC0xMy42MkMyMi40MiwzOC44OCw3MC43MSwxLjA5LDEyNy44MywxLjFaIi8+CiAgPHBvbHlnb24gY2xhc3M9ImNscy0zIiBwb2ludHM9IjIwMC41NSAxMDQuMzQgMjAwLjcgMTA0LjQ1IDE3My4wNiAxODkuNDcgMTcyLjkxIDE4OS40NiA4My43IDE4OS40NiA1Ni4wNyAxMDQuNDQgMTI4LjM5IDUxLjkyIDIwMC41NSAxMDQuMzQiLz4KICA8cGF0aCBjbGFzcz0iY2xzLTEiIGQ9Ik0xNzIuOTEsMTg5LjQ2bDMyLjA5LDM4Ljg4Yy0yMS4zOCwxNi40My00OC4xNCwyNi4yLTc3LjE3LDI2LjItMjguNzksMC01NS4zMy05LjU4LTc2LjU5LTI1Ljc3bDMyLjQ2LTM5LjMxaDg5LjIxWiIvPgogIDxwYXRoIGNsYXNzPSJjbHMtMiIgZD0iTTYuNTksOTAuODJsNDkuNDgsMTMuNjIsMjcuNjIsODUuMDItMzIuNDYsMzkuMzFDMjAuNzcsMjA1LjY0LDEuMTEsMTY5LjAyLDEuMSwxMjcuODJjMC0xMi44NywxLjkyLTI1LjI5LDUuNDktMzdaIi8+Cjwvc3ZnPgo=", 
+        "rarity": "Mythic",
+        "is_default": True
+    },
+]
+DEFAULT_SOUNDS = [
+    # Gaming sounds
+    {"name": "Создание ставки", "category": SoundCategory.GAMING, "event_trigger": "создание_ставки", "game_type": GameType.ALL, "priority": 7, "is_default": True},
+    {"name": "Принятие ставки", "category": SoundCategory.GAMING, "event_trigger": "принятие_ставки", "game_type": GameType.ALL, "priority": 6, "is_default": True},
+    {"name": "Выбор хода", "category": SoundCategory.GAMING, "event_trigger": "выбор_хода", "game_type": GameType.ALL, "priority": 5, "is_default": True},
+    {"name": "Раскрытие хода", "category": SoundCategory.GAMING, "event_trigger": "reveal", "game_type": GameType.ALL, "priority": 8, "is_default": True},
+    {"name": "Победа (Human vs Human)", "category": SoundCategory.GAMING, "event_trigger": "победа", "game_type": GameType.HUMAN_VS_HUMAN, "priority": 9, "volume": 0.8, "is_default": True},
+    {"name": "Победа (Human vs Bot)", "category": SoundCategory.GAMING, "event_trigger": "победа", "game_type": GameType.HUMAN_VS_BOT, "priority": 8, "volume": 0.7, "is_default": True},
+    {"name": "Поражение (Human vs Human)", "category": SoundCategory.GAMING, "event_trigger": "поражение", "game_type": GameType.HUMAN_VS_HUMAN, "priority": 6, "volume": 0.4, "is_default": True},
+    {"name": "Поражение (Human vs Bot)", "category": SoundCategory.GAMING, "event_trigger": "поражение", "game_type": GameType.HUMAN_VS_BOT, "priority": 5, "volume": 0.3, "is_default": True},
+    {"name": "Ничья", "category": SoundCategory.GAMING, "event_trigger": "ничья", "game_type": GameType.ALL, "priority": 4, "volume": 0.5, "is_default": True},
+    
+    # Gems sounds  
+    {"name": "Покупка гема", "category": SoundCategory.GAMING, "event_trigger": "покупка_гема", "game_type": GameType.ALL, "priority": 6, "is_default": True},
+    {"name": "Продажа гема", "category": SoundCategory.GAMING, "event_trigger": "продажа_гема", "game_type": GameType.ALL, "priority": 5, "is_default": True},
+    {"name": "Подарок гемов", "category": SoundCategory.GAMING, "event_trigger": "подарок_гемов", "game_type": GameType.ALL, "priority": 7, "volume": 0.7, "is_default": True},
+    
+    # UI sounds
+    {"name": "Hover эффект", "category": SoundCategory.UI, "event_trigger": "hover", "game_type": GameType.ALL, "priority": 2, "volume": 0.3, "can_repeat": False, "is_default": True},
+    {"name": "Открытие модального окна", "category": SoundCategory.UI, "event_trigger": "открытие_модала", "game_type": GameType.ALL, "priority": 3, "volume": 0.4, "is_default": True},
+    {"name": "Закрытие модального окна", "category": SoundCategory.UI, "event_trigger": "закрытие_модала", "game_type": GameType.ALL, "priority": 3, "volume": 0.4, "is_default": True},
+    
+    # System sounds
+    {"name": "Системное уведомление", "category": SoundCategory.SYSTEM, "event_trigger": "уведомление", "game_type": GameType.ALL, "priority": 6, "volume": 0.6, "is_default": True},
+    {"name": "Ошибка", "category": SoundCategory.SYSTEM, "event_trigger": "ошибка", "game_type": GameType.ALL, "priority": 8, "volume": 0.5, "is_default": True},
+    {"name": "Таймер истекает", "category": SoundCategory.SYSTEM, "event_trigger": "таймер_reveal", "game_type": GameType.ALL, "priority": 9, "volume": 0.7, "is_default": True},
+    {"name": "Получение награды", "category": SoundCategory.SYSTEM, "event_trigger": "награда", "game_type": GameType.ALL, "priority": 8, "volume": 0.8, "is_default": True}
+]
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize database and create default data."""
-    logger.info("Starting GemPlay API...")
-    
-    # Initialize default gem definitions
-    await initialize_default_gems()
-    
-    # Create indexes for optimization
-    logger.info("Creating database indexes...")
-    
+# Collection for the schema version and bootstrap leases
+bootstrap_state = db.bootstrap_state
+
+# (collection, keys, options). Changing this list re-runs index creation on the next start.
+BOOTSTRAP_INDEXES = [
     # Indexes for cycle_games collection
-    await db.cycle_games.create_index([("cycle_id", 1), ("bot_id", 1)])
-    await db.cycle_games.create_index([("game_id", 1)])
-    
+    ("cycle_games", [("cycle_id", 1), ("bot_id", 1)], {}),
+    ("cycle_games", [("game_id", 1)], {}),
     # Indexes for completed_cycles collection
-    await db.completed_cycles.create_index([("bot_id", 1)])
-    await db.completed_cycles.create_index([("cycle_number", -1)])
+    ("completed_cycles", [("bot_id", 1)], {}),
+    ("completed_cycles", [("cycle_number", -1)], {}),
     # ИСПРАВЛЕНО: Добавляем уникальный составной индекс для предотвращения дублей
-    await db.completed_cycles.create_index(
-        [("bot_id", 1), ("cycle_number", 1)], 
-        unique=True,
-        name="unique_bot_cycle"
-    )
-    
-    logger.info("Database indexes created")
-    
-    # Create default admin users
-    admin_users = [
+    ("completed_cycles", [("bot_id", 1), ("cycle_number", 1)], {"unique": True, "name": "unique_bot_cycle"}),
+    ("bot_stats", [("bot_id", 1)], {"unique": True}),
+    # Indexes for the profit ledger and its daily rollups
+    ("profit_entries", [("entry_type", 1), ("created_at", -1)], {}),
+    ("profit_entries", [("created_at", -1)], {}),
+    ("completed_cycles", [("end_time", -1)], {}),
+    ("profit_rollups", [("day", 1), ("entry_type", 1)], {}),
+    # Indexes for maintenance jobs
+    ("maintenance_jobs", [("id", 1)], {"unique": True}),
+    ("maintenance_jobs", [("created_at", -1)], {}),
+    ("games", [("maintenance_job_id", 1)], {"sparse": True}),
+    # Indexes for the frozen funds ledger
+    ("frozen_funds", [("game_id", 1)], {"unique": True}),
+    ("frozen_funds", [("user_ids", 1), ("created_at", -1)], {}),
+    ("frozen_funds", [("frozen_commission", -1), ("game_id", 1)], {}),
+    ("frozen_funds", [("created_at", -1)], {}),
+    # Indexes for notifications (receipts) and shared broadcast bodies
+    ("notifications", [("user_id", 1), ("created_at", -1)], {}),
+    ("notifications", [("body_id", 1)], {"sparse": True}),
+    ("notifications", [("dedupe_key", 1)], {"unique": True, "sparse": True}),
+    ("notification_bodies", [("id", 1)], {"unique": True}),
+    ("notification_bodies", [("created_at", -1)], {}),
+    # Post-game outbox: idempotency key, claim scan, per-bot backlog, cleanup of done tasks
+    ("outbox", [("key", 1)], {"unique": True}),
+    ("outbox", [("status", 1), ("available_at", 1)], {}),
+    ("outbox", [("partition", 1), ("status", 1)], {"sparse": True}),
+    ("outbox", [("claim", 1)], {"sparse": True}),
+    ("outbox", [("done_at", 1)], {"expireAfterSeconds": 86400}),
+    ("email_outbox", [("key", 1)], {"unique": True}),
+    ("email_outbox", [("status", 1), ("available_at", 1)], {}),
+    ("email_outbox", [("claim", 1)], {"sparse": True}),
+    ("email_outbox", [("done_at", 1)], {"expireAfterSeconds": 86400}),
+    # Background loop leases and worker heartbeats expire on their own
+    ("worker_leases", [("lease_expires_at", 1)], {"expireAfterSeconds": 0}),
+    # Hashed refresh tokens: lookup by digest, revoke by user, TTL purge
+    *REFRESH_TOKEN_INDEXES,
+    # One gem inventory document per user
+    *GEM_INVENTORY_INDEXES,
+    # Per-player aggregates behind the leaderboard
+    *PLAYER_STATS_INDEXES,
+    # Prefix search keys for bot and Human-bot names
+    *SEARCH_KEY_INDEXES,
+]
+
+def default_admin_users() -> List[dict]:
+    return [
         {
             "username": "admin",
             "email": os.environ.get('ADMIN_EMAIL', 'admin@gemplay.com'),
@@ -1951,95 +946,152 @@ async def startup_event():
             "role": UserRole.SUPER_ADMIN
         }
     ]
-    
+
+async def initialize_default_gems():
+    """Upsert default gem definitions; catalog fields are refreshed, ids stay stable."""
+    documents = [GemDefinition(**gem_data).dict() for gem_data in DEFAULT_GEM_DEFINITIONS]
+    created = await upsert_defaults(
+        db.gem_definitions, documents, ["type"],
+        update_fields=["name", "price", "color", "icon", "rarity", "is_default"]
+    )
+    logger.info(f"Default gems synced ({created} created)")
+
+async def seed_default_admins():
+    """Create missing admin users; passwords are hashed only for admins that don't exist yet."""
+    admin_users = default_admin_users()
+    existing = {
+        user["email"] async for user in db.users.find(
+            {"email": {"$in": [admin_data["email"] for admin_data in admin_users]}}, {"_id": 0, "email": 1}
+        )
+    }
+    documents = []
     for admin_data in admin_users:
-        existing = await db.users.find_one({"email": admin_data["email"]})
-        if not existing:
-            admin_user = User(
-                username=admin_data["username"],
-                email=admin_data["email"],
-                password_hash=get_password_hash(admin_data["password"]),
-                role=admin_data["role"],
-                status=UserStatus.ACTIVE,
-                email_verified=True,
-                virtual_balance=10000.0  # Give admins some balance
-            )
-            await db.users.insert_one(admin_user.dict())
-    
-    # Create default sounds if they don't exist
-    default_sounds = [
-        # Gaming sounds
-        {"name": "Создание ставки", "category": SoundCategory.GAMING, "event_trigger": "создание_ставки", "game_type": GameType.ALL, "priority": 7, "is_default": True},
-        {"name": "Принятие ставки", "category": SoundCategory.GAMING, "event_trigger": "принятие_ставки", "game_type": GameType.ALL, "priority": 6, "is_default": True},
-        {"name": "Выбор хода", "category": SoundCategory.GAMING, "event_trigger": "выбор_хода", "game_type": GameType.ALL, "priority": 5, "is_default": True},
-        {"name": "Раскрытие хода", "category": SoundCategory.GAMING, "event_trigger": "reveal", "game_type": GameType.ALL, "priority": 8, "is_default": True},
-        {"name": "Победа (Human vs Human)", "category": SoundCategory.GAMING, "event_trigger": "победа", "game_type": GameType.HUMAN_VS_HUMAN, "priority": 9, "volume": 0.8, "is_default": True},
-        {"name": "Победа (Human vs Bot)", "category": SoundCategory.GAMING, "event_trigger": "победа", "game_type": GameType.HUMAN_VS_BOT, "priority": 8, "volume": 0.7, "is_default": True},
-        {"name": "Поражение (Human vs Human)", "category": SoundCategory.GAMING, "event_trigger": "поражение", "game_type": GameType.HUMAN_VS_HUMAN, "priority": 6, "volume": 0.4, "is_default": True},
-        {"name": "Поражение (Human vs Bot)", "category": SoundCategory.GAMING, "event_trigger": "поражение", "game_type": GameType.HUMAN_VS_BOT, "priority": 5, "volume": 0.3, "is_default": True},
-        {"name": "Ничья", "category": SoundCategory.GAMING, "event_trigger": "ничья", "game_type": GameType.ALL, "priority": 4, "volume": 0.5, "is_default": True},
-        
-        # Gems sounds  
-        {"name": "Покупка гема", "category": SoundCategory.GAMING, "event_trigger": "покупка_гема", "game_type": GameType.ALL, "priority": 6, "is_default": True},
-        {"name": "Продажа гема", "category": SoundCategory.GAMING, "event_trigger": "продажа_гема", "game_type": GameType.ALL, "priority": 5, "is_default": True},
-        {"name": "Подарок гемов", "category": SoundCategory.GAMING, "event_trigger": "подарок_гемов", "game_type": GameType.ALL, "priority": 7, "volume": 0.7, "is_default": True},
-        
-        # UI sounds
-        {"name": "Hover эффект", "category": SoundCategory.UI, "event_trigger": "hover", "game_type": GameType.ALL, "priority": 2, "volume": 0.3, "can_repeat": False, "is_default": True},
-        {"name": "Открытие модального окна", "category": SoundCategory.UI, "event_trigger": "открытие_модала", "game_type": GameType.ALL, "priority": 3, "volume": 0.4, "is_default": True},
-        {"name": "Закрытие модального окна", "category": SoundCategory.UI, "event_trigger": "закрытие_модала", "game_type": GameType.ALL, "priority": 3, "volume": 0.4, "is_default": True},
-        
-        # System sounds
-        {"name": "Системное уведомление", "category": SoundCategory.SYSTEM, "event_trigger": "уведомление", "game_type": GameType.ALL, "priority": 6, "volume": 0.6, "is_default": True},
-        {"name": "Ошибка", "category": SoundCategory.SYSTEM, "event_trigger": "ошибка", "game_type": GameType.ALL, "priority": 8, "volume": 0.5, "is_default": True},
-        {"name": "Таймер истекает", "category": SoundCategory.SYSTEM, "event_trigger": "таймер_reveal", "game_type": GameType.ALL, "priority": 9, "volume": 0.7, "is_default": True},
-        {"name": "Получение награды", "category": SoundCategory.SYSTEM, "event_trigger": "награда", "game_type": GameType.ALL, "priority": 8, "volume": 0.8, "is_default": True}
+        if admin_data["email"] in existing:
+            continue
+        admin_user = User(
+            username=admin_data["username"],
+            email=admin_data["email"],
+            password_hash=await asyncio.to_thread(get_password_hash, admin_data["password"]),
+            role=admin_data["role"],
+            status=UserStatus.ACTIVE,
+            email_verified=True,
+            virtual_balance=10000.0  # Give admins some balance
+        )
+        documents.append(admin_user.dict())
+    return await upsert_defaults(db.users, documents, ["email"])
+
+async def seed_default_sounds():
+    """Create missing default sounds in one bulk write."""
+    documents = [Sound(**sound_data).dict() for sound_data in DEFAULT_SOUNDS]
+    for document in documents:
+        document["is_default"] = True
+    created = await upsert_defaults(db.sounds, documents, ["event_trigger", "game_type", "is_default"])
+    if created:
+        logger.info(f"Created {created} default sounds")
+    return created
+
+def bootstrap_seed_steps() -> dict:
+    """Independent seeding steps, executed concurrently."""
+    return {
+        "indexes": create_indexes(db, BOOTSTRAP_INDEXES),
+        "user_directory_indexes": ensure_user_directory_indexes(),
+        "gems": initialize_default_gems(),
+        "admins": seed_default_admins(),
+        "sounds": seed_default_sounds(),
+    }
+
+async def migrate_gem_inventories():
+    """Copy per-gem user_gems rows into per-user inventory documents; the legacy collection is left in place."""
+    return await gem_inventory.migrate_from_rows(db.user_gems)
+
+async def migrate_player_stats():
+    """Build player_stats from completed games; from now on settlement keeps them current."""
+    return await leaderboard.rebuild_from_games(db.games, db.users, recorded_flag="player_stats_recorded")
+
+async def migrate_name_search_keys():
+    """Store name_key on existing bots and Human-bots; transliteration runs in Python, not in MongoDB."""
+    updated = 0
+    for collection in (db.bots, db.human_bots):
+        operations = [
+            UpdateOne({"_id": doc["_id"]}, {"$set": {"name_key": search_key(doc.get("name"))}})
+            async for doc in collection.find({}, {"_id": 1, "name": 1})
+        ]
+        if operations:
+            await collection.bulk_write(operations, ordered=False)
+            updated += len(operations)
+    return {"updated": updated}
+
+def schema_migrations() -> list:
+    """Versioned data migrations, applied once cluster-wide. Append new ones with the next version."""
+    return [
+        (1, "human_bots_fields", migrate_human_bots_fields),
+        (2, "inline_sound_audio", migrate_inline_sound_audio),
+        (3, "hashed_refresh_tokens", refresh_token_store.migrate_plaintext_tokens),
+        (4, "gem_inventories", migrate_gem_inventories),
+        (5, "player_stats", migrate_player_stats),
+        (6, "name_search_keys", migrate_name_search_keys),
     ]
-    
-    # Insert default sounds
-    for sound_data in default_sounds:
-        existing = await db.sounds.find_one({
-            "event_trigger": sound_data["event_trigger"], 
-            "game_type": sound_data["game_type"],
-            "is_default": True
-        })
-        if not existing:
-            sound = Sound(**sound_data)
-            await db.sounds.insert_one(sound.dict())
-            logger.info(f"Created default sound: {sound_data['name']}")
-    
-    # Start background tasks (НЕ включает bot_automation_loop - он запускается позже)
-    start_background_scheduler()
-    
-    logger.info("GemPlay API started successfully with background tasks!")
 
-def start_background_scheduler():
-    """Start background scheduler for daily bonuses and bot automation."""
-    def run_scheduler():
-        schedule.every().day.at("00:00").do(reset_daily_limits)
-        while True:
-            schedule.run_pending()
-            time.sleep(60)
+async def bootstrap_database():
+    """Seed defaults and apply migrations under the bootstrap lease; a no-op when the schema is current."""
+    started = time.perf_counter()
+    digest = bootstrap_digest(
+        BOOTSTRAP_INDEXES, DEFAULT_GEM_DEFINITIONS, DEFAULT_SOUNDS,
+        [(admin_data["username"], admin_data["email"]) for admin_data in default_admin_users()]
+    )
+    outcome = await run_bootstrap(bootstrap_state, digest, bootstrap_seed_steps, schema_migrations())
+    logger.info(f"Database bootstrap {'completed' if outcome is not None else 'not needed'} in {time.perf_counter() - started:.3f}s")
+    return outcome
+
+@app.on_event("startup")
+async def startup_event():
+    """Initialize database and create default data."""
+    logger.info("Starting GemPlay API...")
     
-    # Start daily scheduler
-    scheduler_thread = Thread(target=run_scheduler, daemon=True)
-    scheduler_thread.start()
+    try:
+        await bootstrap_database()
+    except Exception as e:
+        logger.error(f"Database bootstrap failed: {e}")
     
-    # ПЕРЕНЕСЕНО: bot_automation_loop() теперь запускается в startup_event_secondary()
-    # asyncio.create_task(bot_automation_loop())  # ПЕРЕНЕСЕНО
+    # Background tasks start in startup_event_secondary() once Redis is probed
+    logger.info("GemPlay API started successfully!")
+
+def start_background_scheduler(redis_available: bool = False):
+    """
+    Start background loops. Each role runs in exactly one worker at a time: the worker holding
+    the role's lease. With BOT_SHARDING every worker runs bot automation for its share of bots.
+    """
+    global coordinator
+    backend = RedisLeaseBackend(redis_client) if redis_available else MongoLeaseBackend(db.worker_leases)
+    coordinator = WorkerCoordinator(backend)
     
     # DISABLED: Conflicting automation loops that cause race conditions
     # asyncio.create_task(new_bot_automation_task())  # DISABLED to prevent duplicate bet creation
     # asyncio.create_task(bot_automation_task())      # DISABLED to prevent race conditions
     
-    # Start human bot simulation background task
-    asyncio.create_task(human_bot_simulation_task())
+    coordinator.run_as_leader("daily_limits", daily_limits_reset_task)
+    coordinator.run_as_leader("human_bot_simulation", human_bot_simulation_task)
+    coordinator.run_as_leader("timeout_checker", timeout_checker_task)
+    coordinator.run_as_leader("expired_reservations", cleanup_expired_reservations)
+    coordinator.run_as_leader("profit_rollups", profit_rollup_compactor_task)
+    coordinator.run_as_leader("frozen_funds", frozen_funds_sweeper_task)
+    coordinator.run_as_leader("user_directory_sweep", user_directory_sweep_task)
+    
+    # Leaderboard sorted sets: shared in Redis (one worker re-syncs them), otherwise one copy per worker
+    if redis_available:
+        coordinator.run_as_leader("leaderboard_sync", lambda: leaderboard.run_sync(LEADERBOARD_SYNC_INTERVAL))
+    else:
+        asyncio.create_task(leaderboard.run_sync(LEADERBOARD_SYNC_INTERVAL))
     
-    # Start game timeout checker task
-    asyncio.create_task(timeout_checker_task())
+    if BOT_SHARDING_ENABLED:
+        coordinator.start_membership()
+        asyncio.create_task(bot_automation_loop())
+    else:
+        coordinator.run_as_leader("bot_automation", bot_automation_loop)
     
-    # Clean up stuck games from previous runs
-    asyncio.create_task(cleanup_stuck_games())
+    # Clean up stuck games from previous runs (one worker per restart window)
+    asyncio.create_task(cleanup_stuck_games_once())
+    logger.info(f"✅ Background loops scheduled on worker {coordinator.worker_id} (bot sharding: {BOT_SHARDING_ENABLED})")
 
 async def bot_automation_loop():
     """Run bot automation loop every 5 seconds."""
@@ -2069,10 +1121,13 @@ async def maintain_all_bots_active_bets():
             "bot_type": "REGULAR"
         }).to_list(1000)
         
+        if BOT_SHARDING_ENABLED and coordinator is not None:
+            active_bots = [bot for bot in active_bots if coordinator.owns(bot.get("id") or "")]
+        
         if not active_bots:
             return
             
-        logger.info(f"🤖 Checking {len(active_bots)} active bots for cycle management")
+        hot_logger.info("🤖 Checking %s active bots for cycle management", len(active_bots))
         
         if len(active_bots) == 0:
             logger.debug("📭 No active bots found")
@@ -2129,17 +1184,17 @@ async def maintain_all_bots_active_bets():
                 needs_initial_cycle = total_games_in_cycle == 0
                 
                 bot_name = fresh_bot_doc.get('name', 'Unknown')
-                logger.info(f"🔍 Bot {bot_name}: cycle status - total_games={total_games_in_cycle}, active={active_games}, completed={completed_games}, target={cycle_games_target}")
-                logger.info(f"   Conditions: needs_initial_cycle={needs_initial_cycle}, cycle_fully_completed={cycle_fully_completed}")
+                hot_logger.info("🔍 Bot %s: cycle status - total_games=%s, active=%s, completed=%s, target=%s", bot_name, total_games_in_cycle, active_games, completed_games, cycle_games_target)
+                hot_logger.info("   Conditions: needs_initial_cycle=%s, cycle_fully_completed=%s", needs_initial_cycle, cycle_fully_completed)
                 
                 # ИСПРАВЛЕНО: ПРАВИЛЬНАЯ ЛОГИКА ПРИНЯТИЯ РЕШЕНИЙ
                 if needs_initial_cycle:
                     # Нет игр вообще - создаем цикл (независимо от has_completed_cycles)
-                    logger.info(f"🎯 Bot {fresh_bot_doc.get('name', 'Unknown')}: no games found, starting new cycle")
+                    hot_logger.info("🎯 Bot %s: no games found, starting new cycle", fresh_bot_doc.get('name', 'Unknown'))
                     
                     success = await create_full_bot_cycle(fresh_bot_doc)
                     if success:
-                        logger.info(f"✅ Bot {fresh_bot_doc.get('name', 'Unknown')} created cycle of {cycle_games_target} bets")
+                        hot_logger.info("✅ Bot %s created cycle of %s bets", fresh_bot_doc.get('name', 'Unknown'), cycle_games_target)
                         
                         # Отмечаем что у бота есть циклы (для статистики)
                         await db.bots.update_one(
@@ -2147,19 +1202,23 @@ async def maintain_all_bots_active_bets():
                             {"$set": {"has_completed_cycles": True}}
                         )
                     else:
-                        logger.warning(f"❌ Failed to create cycle for bot {fresh_bot_doc.get('name', 'Unknown')}")
+                        logger.warning("❌ Failed to create cycle for bot %s", fresh_bot_doc.get('name', 'Unknown'))
                 
                 elif cycle_fully_completed:
                     # Цикл ПОЛНОСТЬЮ завершен - проверяем паузу
-                    logger.info(f"🏁 Bot {fresh_bot_doc.get('name', 'Unknown')}: cycle fully completed, checking pause")
+                    hot_logger.info("🏁 Bot %s: cycle fully completed, checking pause", fresh_bot_doc.get('name', 'Unknown'))
                     
                     last_cycle_completed_at = fresh_bot_doc.get("last_cycle_completed_at")
                     pause_between_cycles = fresh_bot_doc.get("pause_between_cycles", 5)
                     
                     if last_cycle_completed_at is None:
+                        # Ждём, пока outbox доначислит аккумулятор по последним играм цикла
+                        if await outbox.pending_count(bot_id):
+                            continue
+                        
                         # Цикл только что завершился - ПРАВИЛЬНО завершаем через аккумуляторы
                         cycle_completion_time = datetime.utcnow()
-                        logger.info(f"🏁 Bot {fresh_bot_doc.get('name', 'Unknown')}: cycle fully completed, finalizing through accumulators")
+                        hot_logger.info("🏁 Bot %s: cycle fully completed, finalizing through accumulators", fresh_bot_doc.get('name', 'Unknown'))
                         
                         # ИСПРАВЛЕНО: Теперь правильно завершаем цикл через аккумуляторы
                         # когда цикл ДЕЙСТВИТЕЛЬНО завершен (все игры сыграны)
@@ -2171,12 +1230,12 @@ async def maintain_all_bots_active_bets():
                         if accumulator:
                             # ИСПРАВЛЕНО: Убираем total_spent/total_earned, используем прямой расчёт
                             await complete_bot_cycle(accumulator["id"], bot_id)
-                            logger.info(f"✅ Bot {fresh_bot_doc.get('name', 'Unknown')}: cycle finalized through accumulators")
+                            hot_logger.info("✅ Bot %s: cycle finalized through accumulators", fresh_bot_doc.get('name', 'Unknown'))
                         else:
-                            logger.warning(f"⚠️ Bot {fresh_bot_doc.get('name', 'Unknown')}: cycle completed but no accumulator found")
+                            logger.warning("⚠️ Bot %s: cycle completed but no accumulator found", fresh_bot_doc.get('name', 'Unknown'))
                         
                         # Начинаем паузу
-                        logger.info(f"⏱️ Bot {fresh_bot_doc.get('name', 'Unknown')}: starting pause of {pause_between_cycles}s")
+                        hot_logger.info("⏱️ Bot %s: starting pause of %ss", fresh_bot_doc.get('name', 'Unknown'), pause_between_cycles)
                         
                         await db.bots.update_one(
                             {"id": bot_id},
@@ -2189,19 +1248,19 @@ async def maintain_all_bots_active_bets():
                         
                         if time_since_completion >= pause_between_cycles:
                             # Пауза завершена - создаем новый цикл
-                            logger.info(f"✅ Bot {fresh_bot_doc.get('name', 'Unknown')}: pause completed ({time_since_completion:.1f}s), creating new cycle")
+                            hot_logger.info("✅ Bot %s: pause completed (%.1fs), creating new cycle", fresh_bot_doc.get('name', 'Unknown'), time_since_completion)
                             
                             # Удаляем завершенные игры
                             deleted_result = await db.games.delete_many({
                                 "creator_id": bot_id,
                                 "status": "COMPLETED"
                             })
-                            logger.info(f"🗑️ Bot {fresh_bot_doc.get('name', 'Unknown')}: deleted {deleted_result.deleted_count} completed games")
+                            hot_logger.info("🗑️ Bot %s: deleted %s completed games", fresh_bot_doc.get('name', 'Unknown'), deleted_result.deleted_count)
                             
                             # Создаем новый цикл
                             success = await create_full_bot_cycle(fresh_bot_doc)
                             if success:
-                                logger.info(f"✅ Bot {fresh_bot_doc.get('name', 'Unknown')} created new cycle of {cycle_games_target} bets")
+                                hot_logger.info("✅ Bot %s created new cycle of %s bets", fresh_bot_doc.get('name', 'Unknown'), cycle_games_target)
                                 
                                 # Сбрасываем пауз у и статистику
                                 await db.bots.update_one(
@@ -2217,23 +1276,23 @@ async def maintain_all_bots_active_bets():
                                     }
                                 )
                             else:
-                                logger.warning(f"❌ Failed to create new cycle for bot {fresh_bot_doc.get('name', 'Unknown')}")
+                                logger.warning("❌ Failed to create new cycle for bot %s", fresh_bot_doc.get('name', 'Unknown'))
                         else:
                             # Пауза еще продолжается
                             remaining_pause = pause_between_cycles - time_since_completion
-                            logger.debug(f"⏳ Bot {fresh_bot_doc.get('name', 'Unknown')}: pause in progress, {remaining_pause:.1f}s remaining")
+                            hot_logger.debug("⏳ Bot %s: pause in progress, %.1fs remaining", fresh_bot_doc.get('name', 'Unknown'), remaining_pause)
                 
                 elif active_games > 0:
                     # Есть активные игры - ничего не делаем
-                    logger.debug(f"🎮 Bot {fresh_bot_doc.get('name', 'Unknown')}: {active_games} games still active, waiting for completion")
+                    hot_logger.debug("🎮 Bot %s: %s games still active, waiting for completion", fresh_bot_doc.get('name', 'Unknown'), active_games)
                 
                 elif total_games_in_cycle < cycle_games_target:
                     # Нужно добавить еще игр в цикл (но это не должно происходить в нормальных условиях)
-                    logger.debug(f"📊 Bot {fresh_bot_doc.get('name', 'Unknown')}: cycle incomplete ({total_games_in_cycle}/{cycle_games_target}), no action needed")
+                    hot_logger.debug("📊 Bot %s: cycle incomplete (%s/%s), no action needed", fresh_bot_doc.get('name', 'Unknown'), total_games_in_cycle, cycle_games_target)
                 
                 else:
                     # Неопределенное состояние - логируем для отладки
-                    logger.warning(f"❓ Bot {fresh_bot_doc.get('name', 'Unknown')}: undefined state - total={total_games_in_cycle}, active={active_games}, completed={completed_games}, target={cycle_games_target}")
+                    logger.warning("❓ Bot %s: undefined state - total=%s, active=%s, completed=%s, target=%s", fresh_bot_doc.get('name', 'Unknown'), total_games_in_cycle, active_games, completed_games, cycle_games_target)
                         
                 # НОВАЯ ЛОГИКА ЗАВЕРШЕНА - старая логика полностью удалена
                     
@@ -2246,11 +1305,31 @@ async def maintain_all_bots_active_bets():
                         bot_name = bot_doc.get('name', 'unknown')
                 except:
                     pass
-                logger.error(f"Error maintaining bets for bot {bot_name}: {e}")
+                logger.error("Error maintaining bets for bot %s: %s", bot_name, e)
                 continue
                 
     except Exception as e:
-        logger.error(f"Error in maintain_all_bots_active_bets: {e}")
+        logger.error("Error in maintain_all_bots_active_bets: %s", e)
+
+async def reserve_next_cycle_plan_seed(bot_doc: dict) -> int:
+    """Secret seed of the bot's next cycle plan, drawn once and kept on the bot until that cycle is created."""
+    seed = bot_doc.get("next_cycle_plan_seed")
+    if seed is None:
+        updated = await db.bots.find_one_and_update(
+            {"id": bot_doc["id"], "next_cycle_plan_seed": None},
+            {"$set": {"next_cycle_plan_seed": new_plan_seed()}},
+            projection={"_id": 0, "next_cycle_plan_seed": 1},
+            return_document=ReturnDocument.AFTER
+        ) or await db.bots.find_one({"id": bot_doc["id"]}, {"_id": 0, "next_cycle_plan_seed": 1})
+        seed = bot_doc["next_cycle_plan_seed"] = updated["next_cycle_plan_seed"]
+    return seed
+
+async def start_cycle_plan(bot_id: str, seed: int, fields: Optional[dict] = None) -> None:
+    """Record the seed the current cycle was planned with so the plan can be replayed for audit."""
+    await db.bots.update_one(
+        {"id": bot_id},
+        {"$set": {**(fields or {}), "cycle_plan_seed": seed}, "$unset": {"next_cycle_plan_seed": ""}}
+    )
 
 async def create_full_bot_cycle(bot_doc: dict) -> bool:
     """
@@ -2283,39 +1362,12 @@ async def create_full_bot_cycle(bot_doc: dict) -> bool:
             {"$set": {"current_cycle_start_time": cycle_start_time}}
         )
         
-        # Получаем проценты исходов от бота (ИСПРАВЛЕНО: правильные значения по умолчанию)
-        wins_percentage = bot_doc.get("wins_percentage", 44)  # ИСПРАВЛЕНО: 44% вместо 35%
-        losses_percentage = bot_doc.get("losses_percentage", 36)  # ИСПРАВЛЕНО: 36% вместо 35%
-        draws_percentage = bot_doc.get("draws_percentage", 20)  # ИСПРАВЛЕНО: 20% вместо 30%
-        
-        # ИСПРАВЛЕНО: Правильные значения баланса игр по умолчанию (7/6/3)
-        wins_count = bot_doc.get("wins_count", 7)  # ИСПРАВЛЕНО: 7 вместо 6
-        losses_count = bot_doc.get("losses_count", 6)  # ✅ Остается 6
-        draws_count = bot_doc.get("draws_count", 3)  # ИСПРАВЛЕНО: 3 вместо 4
-        
-        # Определяем ROI_set (целое 2–30) и выбираем W/L/D по количеству
-        try:
-            # Плановые суммы по текущим % от базовой суммы exact_total_amount
-            tmp_total = float(exact_total_amount)
-            w_sum_planned = int(round(tmp_total * (float(wins_percentage) / 100.0)))
-            l_sum_planned = int(round(tmp_total * (float(losses_percentage) / 100.0)))
-            active_planned = w_sum_planned + l_sum_planned
-            roi_plan = (float(w_sum_planned - l_sum_planned) / active_planned * 100.0) if active_planned > 0 else 0.0
-            roi_set = max(2, min(30, int(round(roi_plan))))
-        except Exception:
-            roi_set = 10
-        # D_count фиксировано 4 для 16 игр, W/L зависят от ROI_set и номера цикла
-        if int(cycle_games) == 16:
-            draws_count = 4
-            if roi_set <= 10:
-                # Чередование "через раз": нечётные циклы 5/7/4, чётные 6/6/4
-                if (cycle_number % 2) == 1:
-                    wins_count, losses_count = 5, 7
-                else:
-                    wins_count, losses_count = 6, 6
-            else:
-                # ROI 11–30 → всегда 5/7/4
-                wins_count, losses_count = 5, 7
+        wins_percentage = bot_doc.get("wins_percentage", 44)
+        losses_percentage = bot_doc.get("losses_percentage", 36)
+        draws_percentage = bot_doc.get("draws_percentage", 20)
+        cycle_number = int(bot_doc.get("completed_cycles", 0) or 0) + 1
+        wins_count, losses_count, draws_count = regular_bot_cycle_counts(bot_doc, cycle_number)
+        seed = await reserve_next_cycle_plan_seed(bot_doc)
         
         all_cycle_bets = await generate_cycle_bets_natural_distribution(
             bot_id=bot_id,
@@ -2327,8 +1379,11 @@ async def create_full_bot_cycle(bot_doc: dict) -> bool:
             draws_count=draws_count,
             wins_percentage=wins_percentage,
             losses_percentage=losses_percentage,  
-            draws_percentage=draws_percentage
+            draws_percentage=draws_percentage,
+            cycle_number=cycle_number,
+            seed=seed
         )
+        await start_cycle_plan(bot_id, seed)
         
         # Создаем все игры в базе данных
         created_count = 0
@@ -2649,9 +1704,13 @@ async def get_bot_cycle_statistics():
         logger.error(f"Error getting bot cycle statistics: {e}")
         return []
 
-def reset_daily_limits():
-    """Reset daily limits for all users."""
-    asyncio.create_task(reset_daily_limits_async())
+async def daily_limits_reset_task():
+    """Reset daily limits at midnight in TIMEZONE."""
+    while True:
+        now = datetime.now(TIMEZONE)
+        next_midnight = TIMEZONE.localize(datetime.combine(now.date() + timedelta(days=1), datetime.min.time()))
+        await asyncio.sleep((next_midnight - now).total_seconds())
+        await reset_daily_limits_async()
 
 async def reset_daily_limits_async():
     """Reset daily limits for all users (async)."""
@@ -2673,6 +1732,9 @@ async def reset_daily_limits_async():
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown."""
+    if coordinator is not None:
+        await coordinator.stop()
+    await smtp_pool.close()
     client.close()
     logger.info("GemPlay API shutdown complete")
 
@@ -2691,18 +1753,18 @@ async def human_bot_simulation_task():
             auto_play_enabled = settings.get("auto_play_enabled", False) if settings else False
             
             # Get active human bots
-            active_human_bots = await db.human_bots.find({"is_active": True}).to_list(100)
+            active_human_bots = await db.human_bots.find({"is_active": True}, HumanBotView.projection).to_list(100)
             
             if not active_human_bots:
                 await asyncio.sleep(60)  # No active bots, wait 1 minute
                 continue
             
-            logger.info(f"🤖 Checking {len(active_human_bots)} active Human bots for actions")
+            hot_logger.info("🤖 Checking %s active Human bots for actions", len(active_human_bots))
             
             # Process regular bot actions (create/join individual bets)
             for bot_data in active_human_bots:
                 try:
-                    human_bot = HumanBot(**bot_data)
+                    human_bot = HumanBotView.from_doc(bot_data)
                     
                     # Check if bot should take action based on delay
                     if await should_human_bot_take_action(human_bot):
@@ -2714,13 +1776,13 @@ async def human_bot_simulation_task():
                             if human_bot.is_bet_creation_active:
                                 await create_human_bot_bet(human_bot)
                             else:
-                                logger.debug(f"🚫 Bot {human_bot.name} skipped bet creation - activity disabled")
+                                hot_logger.debug("🚫 Bot %s skipped bet creation - activity disabled", human_bot.name)
                         else:
                             # Join existing bet - check play modes (keep existing logic)
                             if human_bot.can_play_with_other_bots or human_bot.can_play_with_players:
                                 await join_human_bot_bet(human_bot)
                             else:
-                                logger.debug(f"🚫 Bot {human_bot.name} skipped joining - both play modes disabled")
+                                hot_logger.debug("🚫 Bot %s skipped joining - both play modes disabled", human_bot.name)
                         
                         # Log action
                         await log_human_bot_action(
@@ -2734,7 +1796,7 @@ async def human_bot_simulation_task():
                         )
                 
                 except Exception as e:
-                    logger.error(f"Error processing human bot {bot_data.get('id')}: {e}")
+                    logger.error("Error processing human bot %s: %s", bot_data.get('id'), e)
             
             # Process auto-play and joining available bets  
             await process_human_bot_game_joining(active_human_bots, settings)
@@ -2743,7 +1805,7 @@ async def human_bot_simulation_task():
             await asyncio.sleep(5)  # Check every 5 seconds for faster response
             
         except Exception as e:
-            logger.error(f"Error in human bot simulation task: {e}")
+            logger.error("Error in human bot simulation task: %s", e)
             await asyncio.sleep(60)  # Wait longer if error occurred
 
 async def should_human_bot_take_action(human_bot: HumanBot) -> bool:
@@ -2934,29 +1996,17 @@ async def join_human_bot_bet(human_bot: HumanBot):
         # Ensure bot has required gems
         await setup_human_bot_gems(human_bot.id)
         
-        # Check if bot has enough gems
-        for gem_type, quantity in selected_game.bet_gems.items():
-            bot_gems = await db.user_gems.find_one({"user_id": human_bot.id, "gem_type": gem_type})
-            if not bot_gems or bot_gems["quantity"] < quantity:
-                logger.info(f"🤖 Human bot {human_bot.name} doesn't have enough {gem_type} gems")
-                return
-        
-        # Freeze bot's gems
-        for gem_type, quantity in selected_game.bet_gems.items():
-            await db.user_gems.update_one(
-                {"user_id": human_bot.id, "gem_type": gem_type},
-                {
-                    "$inc": {"frozen_quantity": quantity},
-                    "$set": {"updated_at": datetime.utcnow()}
-                }
-            )
+        # Freeze bot's gems (all or nothing)
+        if not await gem_inventory.freeze(human_bot.id, selected_game.bet_gems):
+            logger.info(f"🤖 Human bot {human_bot.name} doesn't have enough gems for game {selected_game.id}")
+            return
         
         # Generate bot's move based on character
         bot_move = HumanBotBehavior.get_move_choice(human_bot.character)
         
         # Freeze commission (for human bots, commission applies)
         commission_rate = await get_bet_commission_rate_fraction()
-        commission_amount = round_money(selected_game.bet_amount * commission_rate)  # commission from winner only
+        commission_amount = commission_for(selected_game.bet_amount, commission_rate)  # commission from winner only
         
         # Check if human bot has enough balance for commission
         bot_record = await db.human_bots.find_one({"id": human_bot.id})
@@ -3040,37 +2090,14 @@ async def join_human_bot_bet(human_bot: HumanBot):
     except Exception as e:
         logger.error(f"Error joining human bot bet: {e}")
 
+# Minimum quantities for each gem type; below the minimum the bot gets double the minimum
+HUMAN_BOT_GEM_MINIMUMS = {"Ruby": 50, "Amber": 25, "Topaz": 10, "Emerald": 5, "Aquamarine": 2, "Sapphire": 1, "Magic": 1}
+HUMAN_BOT_STARTING_GEMS = {gem_type: min_qty * 2 for gem_type, min_qty in HUMAN_BOT_GEM_MINIMUMS.items()}
+
 async def setup_human_bot_gems(human_bot_id: str):
     """Ensure human bot has adequate gems for betting."""
     try:
-        # Define gem types and minimum quantities
-        gem_types = ["Ruby", "Amber", "Topaz", "Emerald", "Aquamarine", "Sapphire", "Magic"]
-        min_quantities = [50, 25, 10, 5, 2, 1, 1]  # Minimum quantities for each gem type
-        
-        for gem_type, min_qty in zip(gem_types, min_quantities):
-            # Check current gem quantity
-            user_gem = await db.user_gems.find_one({
-                "user_id": human_bot_id,
-                "gem_type": gem_type
-            })
-            
-            if not user_gem:
-                # Create new gem entry
-                new_gem = UserGem(
-                    user_id=human_bot_id,
-                    gem_type=GemType(gem_type),
-                    quantity=min_qty * 2  # Give double the minimum
-                )
-                await db.user_gems.insert_one(new_gem.dict())
-            elif user_gem["quantity"] < min_qty:
-                # Top up gems if below minimum
-                await db.user_gems.update_one(
-                    {"user_id": human_bot_id, "gem_type": gem_type},
-                    {
-                        "$inc": {"quantity": min_qty * 2 - user_gem["quantity"]},
-                        "$set": {"updated_at": datetime.utcnow()}
-                    }
-                )
+        await gem_inventory.top_up(human_bot_id, HUMAN_BOT_GEM_MINIMUMS, HUMAN_BOT_STARTING_GEMS)
         
     except Exception as e:
         logger.error(f"Error setting up human bot gems: {e}")
@@ -3357,26 +2384,6 @@ async def apply_human_bot_outcome(game_obj: Game) -> Optional[Dict[str, str]]:
         logger.error(f"Error traceback:", exc_info=True)
         return None
 
-def determine_rps_winner(creator_move: GameMove, opponent_move: GameMove, creator_id: str, opponent_id: str) -> tuple:
-    """Determine winner using rock-paper-scissors logic."""
-    winner_id = None
-    result_status = "draw"
-    
-    if creator_move == opponent_move:
-        result_status = "draw"
-    elif (
-        (creator_move == GameMove.ROCK and opponent_move == GameMove.SCISSORS) or
-        (creator_move == GameMove.SCISSORS and opponent_move == GameMove.PAPER) or
-        (creator_move == GameMove.PAPER and opponent_move == GameMove.ROCK)
-    ):
-        winner_id = creator_id
-        result_status = "creator_wins"
-    else:
-        winner_id = opponent_id
-        result_status = "opponent_wins"
-    
-    return winner_id, result_status
-
 async def get_player_info(player_id: str) -> Dict[str, str]:
     """Get player information (user, bot, or human bot)."""
     # Try to find as user first
@@ -3439,8 +2446,9 @@ async def process_human_bot_game_outcome(game_id: str, winner_id: Optional[str])
             elif winner_id and winner_id != bot_id:
                 outcome = "LOSS"
             
-            # Update human bot statistics
-            update_data = {"updated_at": datetime.utcnow()}
+            # Update human bot statistics; the game id is recorded in the same write,
+            # so a retried outbox task skips bots it already updated
+            update_data = {"$set": {"updated_at": datetime.utcnow()}}
             
             if outcome == "WIN":
                 update_data["$inc"] = {
@@ -3448,10 +2456,9 @@ async def process_human_bot_game_outcome(game_id: str, winner_id: Optional[str])
                     "total_amount_won": game["bet_amount"] * 2  # Winner takes all
                 }
             
-            await db.human_bots.update_one(
-                {"id": bot_id},
-                {"$set": update_data}
-            )
+            result = await db.human_bots.update_one(*apply_once({"id": bot_id}, update_data, game_id))
+            if not result.matched_count:
+                continue
             
             # Log the outcome
             await log_human_bot_action(
@@ -3468,6 +2475,7 @@ async def process_human_bot_game_outcome(game_id: str, winner_id: Optional[str])
         
     except Exception as e:
         logger.error(f"Error processing human bot game outcome: {e}")
+        raise
 
 async def process_human_bot_game_joining(active_human_bots: list, settings: dict):
     """Combined function to process auto-play and joining available bets for human bots."""
@@ -3480,7 +2488,7 @@ async def process_human_bot_game_joining(active_human_bots: list, settings: dict
         # Process each bot individually
         for bot_data in active_human_bots:
             try:
-                bot = HumanBot(**bot_data)
+                bot = HumanBotView.from_doc(bot_data)
                 current_time = datetime.utcnow()
                 
                 # Check if bot should look for available bets
@@ -3638,6 +2646,10 @@ async def create_auto_play_game_between_bots(bot1: HumanBot, bot2: HumanBot):
         
         # Save game
         await db.games.insert_one(game.dict())
+        try:
+            await record_bot_game_settlement(game.dict())
+        except Exception:
+            pass  # Logged there; the game stays unflagged for rebuild_bot_stats
         
         # Update bot statistics
         await update_human_bot_stats_after_auto_play(bot1, bot2, game)
@@ -3848,56 +2860,31 @@ async def join_available_bet_as_human_bot(bot: HumanBot, bet_game: dict):
         random_completion_seconds = random.randint(15, 60)  # Random time between 15 seconds and 1 minute
         completion_deadline = datetime.utcnow() + timedelta(seconds=random_completion_seconds)
         
-        # First reserve the game (similar to human players clicking Accept)
-        reservation_result = await db.games.update_one(
+        # Human-bots don't wait on a reservation: claim and join in one conditional update
+        now = datetime.utcnow()
+        joined = await transition(
+            db.games, game_id, joinable(bot.id),
             {
-                "id": game_id,
-                "status": "WAITING"
+                "opponent_id": bot.id,
+                "opponent_type": "human_bot",
+                "opponent_move": bot_move,
+                "opponent_gems": bot_gems,
+                "status": GameStatus.ACTIVE,
+                "started_at": now,
+                "active_deadline": completion_deadline,  # Random completion time
+                "human_bot_completion_time": random_completion_seconds,  # Store for logging
+                "joined_at": now,
+                "updated_at": now,
+                # Clear reservation fields
+                "reserved_by": None,
+                "reserved_at": None,
+                "reservation_expires_at": None
             },
-            {
-                "$set": {
-                    "status": "RESERVED",
-                    "reserved_by": bot.id,
-                    "reserved_at": datetime.utcnow(),
-                    "reservation_expires_at": datetime.utcnow() + timedelta(seconds=60),
-                    "updated_at": datetime.utcnow()
-                }
-            }
+            projection={"_id": 0, "id": 1}
         )
         
-        if reservation_result.modified_count == 0:
-            logger.warning(f"Human-bot {bot.name} failed to reserve game {game_id} - already taken")
-            return
-        
-        # Then immediately join the game (Human-bots don't wait)
-        join_result = await db.games.update_one(
-            {
-                "id": game_id,
-                "status": "RESERVED",
-                "reserved_by": bot.id
-            },
-            {
-                "$set": {
-                    "opponent_id": bot.id,
-                    "opponent_type": "human_bot",
-                    "opponent_move": bot_move,
-                    "opponent_gems": bot_gems,
-                    "status": GameStatus.ACTIVE,
-                    "started_at": datetime.utcnow(),
-                    "active_deadline": completion_deadline,  # Random completion time
-                    "human_bot_completion_time": random_completion_seconds,  # Store for logging
-                    "joined_at": datetime.utcnow(),
-                    "updated_at": datetime.utcnow(),
-                    # Clear reservation fields
-                    "reserved_by": None,
-                    "reserved_at": None,
-                    "reservation_expires_at": None
-                }
-            }
-        )
-        
-        if join_result.modified_count == 0:
-            logger.error(f"Human-bot {bot.name} reserved but failed to join game {game_id}")
+        if joined is None:
+            logger.warning(f"Human-bot {bot.name} failed to join game {game_id} - already taken")
             return
         
         logger.info(f"Human-bot {bot.name} will complete game {game_id} in {random_completion_seconds} seconds")
@@ -4033,41 +3020,34 @@ async def migrate_human_bots_fields():
 async def startup_event_secondary():
     """Run additional startup tasks including migrations."""
     try:
-        # Initialize Redis connection
-        await init_redis()
+        # Initialize Redis connection; relay notification pushes between workers when available
+        redis_available = await init_redis()
+        if redis_available:
+            asyncio.create_task(notification_hub.run_redis_relay())
+            leaderboard.use_backend(RedisLeaderboardBackend(redis_client))
         
-        # Run database migrations
-        await migrate_human_bots_fields()
-        logger.info("Secondary startup tasks completed successfully")
-        
-        # Start background task for cleaning up expired reservations
-        asyncio.create_task(cleanup_expired_reservations())
-        
-        # ИСПРАВЛЕНО: Запускаем bot automation loop после всех инициализаций
-        asyncio.create_task(bot_automation_loop())
-        logger.info("✅ Bot automation loop started")
+        # Post-game outbox workers run in every process; claims keep tasks single-consumer
+        asyncio.create_task(outbox.run())
+        asyncio.create_task(email_outbox.run())
         
-        # ИСПРАВЛЕНО: Принудительная проверка циклов для всех активных ботов при запуске
-        asyncio.create_task(initial_bot_cycles_check())
-        logger.info("✅ Initial bot cycles check started")
-    except Exception as e:
-        logger.error(f"Error during secondary startup: {e}")
-
-async def initial_bot_cycles_check():
-    """Принудительная проверка и создание циклов для всех активных ботов при запуске."""
-    try:
-        logger.info("🔍 Initial bot cycles check: scanning active bots...")
+        # Leader-elected background loops (timeouts, Human-bots, bot automation, sweeps)
+        start_background_scheduler(redis_available)
         
-        # Ждем 3 секунды чтобы БД полностью инициализировалась
-        await asyncio.sleep(3)
+        # Keep stored /admin/users sort and search fields up to date for users changed on
+        # this worker; the full sweep runs on the leader
+        asyncio.create_task(user_directory_refresher_task())
         
-        # Принудительно запускаем проверку циклов для всех активных ботов
-        await maintain_all_bots_active_bets()
+        # Maintenance jobs cut off by a restart wait for an admin resume
+        await mark_interrupted_maintenance_jobs()
         
-        logger.info("✅ Initial bot cycles check completed")
+        # Build bot_stats from history on first start
+        if await db.bot_stats.estimated_document_count() == 0:
+            asyncio.create_task(rebuild_bot_stats())
         
+        # Database migrations run once cluster-wide in bootstrap_database()
+        logger.info("Secondary startup tasks completed successfully")
     except Exception as e:
-        logger.error(f"Error in initial bot cycles check: {e}")
+        logger.error(f"Error during secondary startup: {e}")
 
 async def cleanup_expired_reservations():
     """Background task to clean up expired game reservations."""
@@ -4103,52 +3083,13 @@ async def cleanup_expired_reservations():
             logger.error(f"Error in cleanup_expired_reservations: {e}")
             await asyncio.sleep(60)  # Sleep longer on error
 
-async def check_gem_combination_possible(available_gems: list, target_amount: float) -> bool:
-    """
-    Check if it's possible to form an exact combination of gems that equals target amount.
-    Uses dynamic programming approach for subset sum problem.
-    """
-    # Convert to cents to avoid floating point issues
-    target_cents = int(target_amount * 100)
-    
-    # Create a list of all individual gems with their values in cents
-    gem_values = []
-    for gem in available_gems:
-        gem_value_cents = int(gem["price"] * 100)
-        for _ in range(gem["available_quantity"]):
-            gem_values.append(gem_value_cents)
-    
-    # Edge cases
-    if target_cents == 0:
-        return True
-    if not gem_values or target_cents < 0:
-        return False
-    
-    # Dynamic programming approach
-    # dp[i] will be True if sum i is possible
-    dp = [False] * (target_cents + 1)
-    dp[0] = True  # Base case: sum 0 is always possible (select nothing)
-    
-    # For each gem value
-    for gem_value in gem_values:
-        # Traverse from right to left to avoid using same gem multiple times
-        for current_sum in range(target_cents, gem_value - 1, -1):
-            if dp[current_sum - gem_value]:
-                dp[current_sum] = True
-                
-                # Early exit if we found the target
-                if current_sum == target_cents:
-                    return True
-    
-    return dp[target_cents]
-
 # ==============================================================================
 # API ROUTES
 # ==============================================================================
 
 # Create routers
-auth_router = APIRouter(prefix="/api/auth", tags=["Authentication"])
-api_router = APIRouter(prefix="/api")
+auth_router = LazyAPIRouter(prefix="/api/auth", tags=["Authentication"])
+api_router = LazyAPIRouter(prefix="/api")
 
 # ==============================================================================
 # AUTH ROUTES
@@ -4186,17 +3127,9 @@ async def register(user_data: UserRegistration):
     
     await db.users.insert_one(user.dict())
     
-    # Send verification email
-    email_sent = send_verification_email(
-        user_data.email,
-        user_data.username,
-        verification_token
-    )
-    
-    if email_sent:
-        logger.info(f"Verification email sent to {user_data.email}")
-    else:
-        logger.warning(f"Failed to send verification email to {user_data.email}")
+    # Queue verification email
+    await queue_email(verification_email(user_data.email, user_data.username, verification_token), verification_token)
+    logger.info(f"Verification email queued for {user_data.email}")
     
     # Create email verification record (keeping existing logic)
     verification = EmailVerification(
@@ -4226,13 +3159,8 @@ async def register(user_data: UserRegistration):
         GemType.AQUAMARINE: 12, # $300
     }
     
-    for gem_type, quantity in initial_gems.items():
-        user_gem = UserGem(
-            user_id=user.id,
-            gem_type=gem_type,
-            quantity=quantity
-        )
-        await db.user_gems.insert_one(user_gem.dict())
+    await gem_inventory.create(user.id, initial_gems)
+    mark_user_directory_dirty(user.id)
     
     return {
         "message": "User registered successfully. Please check your email for verification.",
@@ -4362,13 +3290,14 @@ async def login(user_credentials: UserLogin, request: Request):
     access_token = create_access_token({"sub": user_obj.id})
     
     # Create refresh token
-    refresh_token_str = await create_refresh_token(user_obj.id)
+    user_response = UserResponse(**user_obj.dict())
+    refresh_token_str = await refresh_token_store.issue(user_obj.id, principal_snapshot(user_obj.dict()))
     
     return Token(
         access_token=access_token,
         token_type="bearer",
         refresh_token=refresh_token_str,
-        user=UserResponse(**user_obj.dict())
+        user=user_response
     )
 
 @auth_router.get("/me", response_model=UserResponse)
@@ -4383,31 +3312,28 @@ async def refresh_access_token(payload: dict):
         refresh_token = payload.get('refresh_token')
         if not refresh_token:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Missing refresh_token")
-        # Find and validate refresh token
-        token_doc = await db.refresh_tokens.find_one({
-            "token": refresh_token,
-            "is_active": True,
-            "expires_at": {"$gt": datetime.utcnow()}
-        })
-        
-        if not token_doc:
+        # Validate and rotate in one round trip: the used token stops matching immediately
+        new_refresh_token, token_record = await refresh_token_store.rotate(refresh_token)
+        if token_record is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid or expired refresh token"
             )
         
-        # Get user
-        user = await db.users.find_one({"id": token_doc["user_id"]})
+        user = await db.users.find_one({"id": token_record["user_id"]}, USER_RESPONSE_PROJECTION)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User not found"
             )
-        
-        user_obj = User(**user)
+        principal = token_record.get("principal")
+        if principal is None:
+            # Token issued before principal snapshots were stored
+            principal = principal_snapshot(user)
+            await refresh_token_store.set_principal(token_record["user_id"], principal)
         
         # Check if user is still active
-        if user_obj.status != UserStatus.ACTIVE:
+        if principal.get("status") != UserStatus.ACTIVE:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="User account is not active"
@@ -4416,19 +3342,14 @@ async def refresh_access_token(payload: dict):
         # Create new access token
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
-            data={"sub": user_obj.id}, expires_delta=access_token_expires
+            data={"sub": token_record["user_id"]}, expires_delta=access_token_expires
         )
         
-        # Create new refresh token and deactivate the old one
-        new_refresh_token = await create_refresh_token(user_obj.id)
-        # Deactivate used refresh token by token value (since id may not be selected)
-        await db.refresh_tokens.update_one({"token": token_doc.get("token")}, {"$set": {"is_active": False}})
-        
         return Token(
             access_token=access_token,
             token_type="bearer",
             refresh_token=new_refresh_token,
-            user=UserResponse(**user_obj.dict())
+            user=UserResponse(**user)
         )
         
     except HTTPException:
@@ -4487,6 +3408,7 @@ async def claim_daily_bonus(current_user: User = Depends(get_current_user)):
         description="Daily bonus claimed"
     )
     await db.transactions.insert_one(transaction.dict())
+    mark_user_directory_dirty(current_user.id)
     
     return {
         "message": "Daily bonus claimed successfully",
@@ -4541,6 +3463,7 @@ async def add_balance(
         description=f"Manual balance addition of ${request.amount:.2f}"
     )
     await db.transactions.insert_one(transaction.dict())
+    mark_user_directory_dirty(current_user.id)
     
     return {
         "message": "Balance added successfully",
@@ -4603,6 +3526,9 @@ async def update_profile(
             {"id": current_user.id},
             {"$set": update_fields}
         )
+        await refresh_token_store.update_principal(
+            current_user.id, {field: update_fields[field] for field in PRINCIPAL_SYNC_FIELDS if field in update_fields}
+        )
         
         logger.info(f"Update result: matched={result.matched_count}, modified={result.modified_count}")
         
@@ -4665,17 +3591,9 @@ async def request_password_reset(request: PasswordResetRequest):
             }}
         )
         
-        # Send reset email
-        email_sent = send_password_reset_email(
-            user["email"], 
-            user["username"], 
-            reset_token
-        )
-        
-        if email_sent:
-            logger.info(f"Password reset email sent to {request.email}")
-        else:
-            logger.warning(f"Failed to send password reset email to {request.email}")
+        # Queue reset email
+        await queue_email(password_reset_email(user["email"], user["username"], reset_token), reset_token)
+        logger.info(f"Password reset email queued for {request.email}")
             
         return {"message": "Если email существует, письмо для сброса пароля отправлено"}
         
@@ -4721,6 +3639,7 @@ async def reset_password(request: PasswordResetConfirm):
                 "updated_at": datetime.utcnow()
             }}
         )
+        await refresh_token_store.revoke_user(user["id"])
         
         logger.info(f"Password reset successfully for user {user['username']}")
         
@@ -4762,17 +3681,9 @@ async def resend_email_verification(request: ResendVerificationRequest):
             }}
         )
         
-        # Send verification email
-        email_sent = send_verification_email(
-            user["email"],
-            user["username"], 
-            verification_token
-        )
-        
-        if email_sent:
-            logger.info(f"Verification email resent to {request.email}")
-        else:
-            logger.warning(f"Failed to resend verification email to {request.email}")
+        # Queue verification email
+        await queue_email(verification_email(user["email"], user["username"], verification_token), verification_token)
+        logger.info(f"Verification email re-queued for {request.email}")
             
         return {"message": "Если email существует, письмо подтверждения отправлено"}
         
@@ -4863,7 +3774,8 @@ async def google_oauth_login(request: GoogleOAuthRequest):
         
         # Create tokens
         access_token = create_access_token({"sub": user["id"]})
-        refresh_token_str = create_refresh_token({"sub": user["id"]})
+        user_response = UserResponse(**user)
+        refresh_token_str = await refresh_token_store.issue(user["id"], principal_snapshot(user))
         
         logger.info(f"Google OAuth login successful for user {user['username']}")
         
@@ -4871,7 +3783,7 @@ async def google_oauth_login(request: GoogleOAuthRequest):
             access_token=access_token,
             token_type="bearer",
             refresh_token=refresh_token_str,
-            user=UserResponse(**user)
+            user=user_response
         )
         
     except HTTPException:
@@ -4896,7 +3808,7 @@ async def get_gem_definitions():
 @api_router.get("/gems/inventory", response_model=List[GemResponse])
 async def get_user_gems(current_user: User = Depends(get_current_user)):
     """Get user's gem inventory."""
-    user_gems = await db.user_gems.find({"user_id": current_user.id}).to_list(100)
+    user_gems = await gem_inventory.rows(current_user.id)
     gem_definitions = await db.gem_definitions.find().to_list(100)
     
     # Create a map of gem definitions
@@ -4995,25 +3907,7 @@ async def buy_gems(request: Request, gem_type: GemType, quantity: int, current_u
     )
     
     # Add gems to user inventory
-    existing_gems = await db.user_gems.find_one({"user_id": current_user.id, "gem_type": gem_type})
-    if existing_gems:
-        new_quantity = existing_gems["quantity"] + quantity
-        await db.user_gems.update_one(
-            {"user_id": current_user.id, "gem_type": gem_type},
-            {
-                "$set": {
-                    "quantity": new_quantity,
-                    "updated_at": datetime.utcnow()
-                }
-            }
-        )
-    else:
-        new_gem = UserGem(
-            user_id=current_user.id,
-            gem_type=gem_type,
-            quantity=quantity
-        )
-        await db.user_gems.insert_one(new_gem.dict())
+    await gem_inventory.add(current_user.id, {gem_type: quantity})
     
     # Create transaction record
     transaction = Transaction(
@@ -5028,6 +3922,7 @@ async def buy_gems(request: Request, gem_type: GemType, quantity: int, current_u
         description=f"Purchased {quantity} {gem_type} gems"
     )
     await db.transactions.insert_one(transaction.dict())
+    mark_user_directory_dirty(current_user.id)
     
     return {
         "message": f"Successfully purchased {quantity} {gem_type} gems",
@@ -5053,16 +3948,15 @@ async def sell_gems(gem_type: GemType, quantity: int, current_user: User = Depen
         )
     
     # Check if user has enough gems
-    user_gems = await db.user_gems.find_one({"user_id": current_user.id, "gem_type": gem_type})
-    if not user_gems or user_gems["quantity"] < quantity:
+    inventory = await gem_inventory.get(current_user.id)
+    if counts(inventory, "quantity").get(gem_type, 0) < quantity:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Insufficient gems"
         )
     
     # Check if gems are not frozen
-    available_quantity = user_gems["quantity"] - user_gems["frozen_quantity"]
-    if available_quantity < quantity:
+    if available(inventory).get(gem_type, 0) < quantity:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Some gems are frozen in active bets"
@@ -5070,6 +3964,13 @@ async def sell_gems(gem_type: GemType, quantity: int, current_user: User = Depen
     
     total_value = gem_def["price"] * quantity
     
+    # Remove gems from inventory first: the conditional update fails if they were frozen or spent meanwhile
+    if not await gem_inventory.remove(current_user.id, {gem_type: quantity}):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Some gems are frozen in active bets"
+        )
+    
     # Update user balance
     user = await db.users.find_one({"id": current_user.id})
     new_balance = user["virtual_balance"] + total_value
@@ -5078,18 +3979,6 @@ async def sell_gems(gem_type: GemType, quantity: int, current_user: User = Depen
         {"$set": {"virtual_balance": new_balance, "updated_at": datetime.utcnow()}}
     )
     
-    # Remove gems from inventory
-    new_quantity = user_gems["quantity"] - quantity
-    await db.user_gems.update_one(
-        {"user_id": current_user.id, "gem_type": gem_type},
-        {
-            "$set": {
-                "quantity": new_quantity,
-                "updated_at": datetime.utcnow()
-            }
-        }
-    )
-    
     # Create transaction record
     transaction = Transaction(
         user_id=current_user.id,
@@ -5103,6 +3992,7 @@ async def sell_gems(gem_type: GemType, quantity: int, current_user: User = Depen
         description=f"Sold {quantity} {gem_type} gems"
     )
     await db.transactions.insert_one(transaction.dict())
+    mark_user_directory_dirty(current_user.id)
     
     return {
         "message": f"Successfully sold {quantity} {gem_type} gems",
@@ -5330,26 +4220,30 @@ async def delete_gem_admin(
             detail="Failed to delete gem"
         )
 
+# Search-as-you-type results by search key; a longer prefix is filtered from a complete shorter result
+USER_SEARCH_LIMIT = 5
+user_search_cache = PrefixSearchCache()
+
 @api_router.get("/users/search", response_model=List[dict])
 async def search_users(query: str, current_user: User = Depends(get_current_user)):
-    """Search users by email or username for gifting."""
+    """Search users by email or username prefix for gifting."""
     try:
-        search_filter = {
-            "$and": [
-                {"id": {"$ne": current_user.id}},  # Исключаем себя
-                {
-                    "$or": [
-                        {"email": {"$regex": f"^{query}", "$options": "i"}},
-                        {"username": {"$regex": f"^{query}", "$options": "i"}}
-                    ]
-                }
-            ]
-        }
+        key = search_key(query)
+        if not key:
+            return []
+        
+        def matches(user: dict) -> bool:
+            return (user.get("username_lower") or "").startswith(key) or (user.get("email_lower") or "").startswith(key)
         
-        users = await db.users.find(
-            search_filter,
-            {"username": 1, "email": 1, "id": 1}  # Возвращаем только нужные поля
-        ).limit(5).to_list(5)
+        users = user_search_cache.get("users", key, matches)
+        if users is None:
+            # Anchored range on the stored lowercase keys (indexed); one extra row covers excluding the caller
+            key_range = prefix_range(query)
+            users = await db.users.find(
+                {"$or": [{"username_lower": key_range}, {"email_lower": key_range}]},
+                {"_id": 0, "id": 1, "username": 1, "email": 1, "username_lower": 1, "email_lower": 1}
+            ).limit(USER_SEARCH_LIMIT + 1).to_list(USER_SEARCH_LIMIT + 1)
+            user_search_cache.put("users", key, users, complete=len(users) <= USER_SEARCH_LIMIT)
         
         return [
             {
@@ -5357,8 +4251,8 @@ async def search_users(query: str, current_user: User = Depends(get_current_user
                 "username": user["username"],
                 "email": user["email"]
             }
-            for user in users
-        ]
+            for user in users if user["id"] != current_user.id  # Исключаем себя
+        ][:USER_SEARCH_LIMIT]
         
     except Exception as e:
         logger.error(f"Error searching users: {e}")
@@ -5405,16 +4299,15 @@ async def gift_gems(
         )
     
     # Check if sender has enough gems
-    sender_gems = await db.user_gems.find_one({"user_id": current_user.id, "gem_type": gem_type})
-    if not sender_gems or sender_gems["quantity"] < quantity:
+    sender_inventory = await gem_inventory.get(current_user.id)
+    if counts(sender_inventory, "quantity").get(gem_type, 0) < quantity:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Insufficient gems"
         )
     
     # Check if gems are not frozen
-    available_quantity = sender_gems["quantity"] - sender_gems["frozen_quantity"]
-    if available_quantity < quantity:
+    if available(sender_inventory).get(gem_type, 0) < quantity:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Some gems are frozen in active bets"
@@ -5423,7 +4316,7 @@ async def gift_gems(
     # Calculate commission based on admin settings (gift_commission_rate)
     gem_value = gem_def["price"] * quantity
     commission_rate = await get_gift_commission_rate_fraction()
-    commission = round_money(gem_value * commission_rate)
+    commission = commission_for(gem_value, commission_rate)
     
     # Check if sender has enough balance for commission
     sender = await db.users.find_one({"id": current_user.id})
@@ -5433,6 +4326,13 @@ async def gift_gems(
             detail=f"Insufficient balance for gift commission ({(await get_gift_commission_rate_fraction())*100:.1f}%)"
         )
     
+    # Remove gems from sender first: the conditional update fails if they were frozen or spent meanwhile
+    if not await gem_inventory.remove(current_user.id, {gem_type: quantity}):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Some gems are frozen in active bets"
+        )
+    
     # Deduct commission from sender
     new_sender_balance = sender["virtual_balance"] - commission
     await db.users.update_one(
@@ -5440,38 +4340,8 @@ async def gift_gems(
         {"$set": {"virtual_balance": new_sender_balance, "updated_at": datetime.utcnow()}}
     )
     
-    # Remove gems from sender
-    new_sender_quantity = sender_gems["quantity"] - quantity
-    await db.user_gems.update_one(
-        {"user_id": current_user.id, "gem_type": gem_type},
-        {
-            "$set": {
-                "quantity": new_sender_quantity,
-                "updated_at": datetime.utcnow()
-            }
-        }
-    )
-    
     # Add gems to recipient
-    recipient_gems = await db.user_gems.find_one({"user_id": recipient["id"], "gem_type": gem_type})
-    if recipient_gems:
-        new_recipient_quantity = recipient_gems["quantity"] + quantity
-        await db.user_gems.update_one(
-            {"user_id": recipient["id"], "gem_type": gem_type},
-            {
-                "$set": {
-                    "quantity": new_recipient_quantity,
-                    "updated_at": datetime.utcnow()
-                }
-            }
-        )
-    else:
-        new_recipient_gem = UserGem(
-            user_id=recipient["id"],
-            gem_type=gem_type,
-            quantity=quantity
-        )
-        await db.user_gems.insert_one(new_recipient_gem.dict())
+    await gem_inventory.add(recipient["id"], {gem_type: quantity})
     
     # Create transaction records
     # Sender transaction
@@ -5512,7 +4382,7 @@ async def gift_gems(
     )
     profit_entry_dict = profit_entry.dict()
     profit_entry_dict["status"] = "CONFIRMED"
-    await db.profit_entries.insert_one(profit_entry_dict)
+    await record_profit_entry(profit_entry_dict)
     
     # Create new notification for recipient using the notification system
     try:
@@ -5552,6 +4422,7 @@ async def gift_gems(
         reference_id=current_user.id
     )
     await db.transactions.insert_one(recipient_transaction.dict())
+    mark_user_directory_dirty(current_user.id, recipient["id"])
     
     return {
         "message": f"Successfully gifted {quantity} {gem_type} gems to {recipient['username']}",
@@ -5704,14 +4575,14 @@ async def get_bot_win_rate_analysis(bot_id: str, current_user: User = Depends(ge
                 detail="Bot not found"
             )
         
-        bot_games = await db.games.find({
-            "creator_id": bot_id,
-            "creator_type": "bot",
-            "status": "COMPLETED"
-        }).sort("created_at", -1).limit(100).to_list(100)
+        # Win rate over the bot's last 100 completed bets (bot_stats only has lifetime totals)
+        bot_games = await db.games.find(
+            {"creator_id": bot_id, "creator_type": "bot", "status": "COMPLETED"},
+            {"_id": 0, "winner_id": 1}
+        ).sort("created_at", -1).limit(100).to_list(100)
         
         total_games = len(bot_games)
-        total_wins = sum(1 for game in bot_games if game.get("result") == "WIN")
+        total_wins = sum(1 for game in bot_games if game.get("winner_id") == bot_id)
         actual_win_rate = (total_wins / total_games * 100) if total_games > 0 else 0
         
         target_win_rate = bot.get("win_rate_percent", 60)
@@ -6194,6 +5065,7 @@ async def create_extended_bot(
             "created_at": datetime.utcnow(),
             "updated_at": datetime.utcnow()
         }
+        bot_data["name_key"] = search_key(bot_data["name"])
         
         await db.bots.insert_one(bot_data)
         
@@ -6251,17 +5123,11 @@ async def get_economy_balance(current_user: User = Depends(get_current_user)):
     user = await db.users.find_one({"id": current_user.id})
     
     # Calculate total gem value
-    user_gems = await db.user_gems.find({"user_id": current_user.id}).to_list(100)
     gem_definitions = await db.gem_definitions.find().to_list(100)
     gem_def_map = {gem["type"]: gem["price"] for gem in gem_definitions}
-    
-    total_gem_value = 0
-    available_gem_value = 0
-    
-    for user_gem in user_gems:
-        gem_price = gem_def_map.get(user_gem["gem_type"], 0)
-        total_gem_value += user_gem["quantity"] * gem_price
-        available_gem_value += (user_gem["quantity"] - user_gem["frozen_quantity"]) * gem_price
+    gem_values = inventory_value(await gem_inventory.get(current_user.id), gem_def_map)
+    total_gem_value = gem_values["total"]
+    available_gem_value = gem_values["available"]
     
     # Calculate available balance for spending
     available_balance = user["virtual_balance"] - user["frozen_balance"]
@@ -6327,7 +5193,7 @@ async def create_game(
     current_user: User = Depends(get_current_user_with_security)
 ):
     """Create a new PvP game with gem stakes."""
-    logger.info(f"🎮 CREATE_GAME called for user {current_user.id}")
+    hot_logger.info("🎮 CREATE_GAME called for user %s", current_user.id)
     try:
         # Validate bet gems format
         if not game_data.bet_gems or not isinstance(game_data.bet_gems, dict):
@@ -6370,15 +5236,16 @@ async def create_game(
             )
         
         # Check if user has enough gems
+        inventory = await gem_inventory.get(current_user.id)
+        owned, available_gems = counts(inventory, "quantity"), available(inventory)
         for gem_type, quantity in game_data.bet_gems.items():
-            user_gems = await db.user_gems.find_one({"user_id": current_user.id, "gem_type": gem_type})
-            if not user_gems:
+            if not owned.get(gem_type):
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail=f"You don't have any {gem_type} gems"
                 )
             
-            available_quantity = user_gems["quantity"] - user_gems["frozen_quantity"]
+            available_quantity = available_gems.get(gem_type, 0)
             if available_quantity < quantity:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
@@ -6387,14 +5254,14 @@ async def create_game(
         
         # Check if user has enough balance for commission (configured bet_commission_rate)
         commission_rate = await get_bet_commission_rate_fraction()
-        commission_required = round_money(total_bet_amount * commission_rate)
+        commission_required = commission_for(total_bet_amount, commission_rate)
         user = await db.users.find_one({"id": current_user.id})
         
-        logger.info(f"💰 COMMISSION DEBUG - User: {current_user.id}")
-        logger.info(f"💰 Total bet amount: ${total_bet_amount}")
-        logger.info(f"💰 Commission required: ${commission_required} ({int(commission_rate*100)}%)")
-        logger.info(f"💰 User virtual_balance before: ${user['virtual_balance']}")
-        logger.info(f"💰 User frozen_balance before: ${user['frozen_balance']}")
+        hot_logger.info("💰 COMMISSION DEBUG - User: %s", current_user.id)
+        hot_logger.info("💰 Total bet amount: $%s", total_bet_amount)
+        hot_logger.info("💰 Commission required: $%s (%s%%)", commission_required, int(commission_rate*100))
+        hot_logger.info("💰 User virtual_balance before: $%s", user['virtual_balance'])
+        hot_logger.info("💰 User frozen_balance before: $%s", user['frozen_balance'])
         
         if user["virtual_balance"] < commission_required:
             raise HTTPException(
@@ -6406,14 +5273,11 @@ async def create_game(
         salt = str(uuid.uuid4())
         move_hash = hash_move_with_salt(game_data.move, salt)
         
-        # Freeze gems for the bet
-        for gem_type, quantity in game_data.bet_gems.items():
-            await db.user_gems.update_one(
-                {"user_id": current_user.id, "gem_type": gem_type},
-                {
-                    "$inc": {"frozen_quantity": quantity},
-                    "$set": {"updated_at": datetime.utcnow()}
-                }
+        # Freeze gems for the bet: one conditional update for the whole combination
+        if not await gem_inventory.freeze(current_user.id, game_data.bet_gems):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Insufficient gems - some of them were used in another bet"
             )
         
         await db.users.update_one(
@@ -6427,10 +5291,10 @@ async def create_game(
             }
         )
         
-        logger.info(f"💰 User virtual_balance after: ${user['virtual_balance'] - commission_required}")
-        logger.info(f"💰 User frozen_balance after: ${user['frozen_balance'] + commission_required}")
-        logger.info(f"💰 Commission frozen: ${commission_required}")
-        logger.info(f"💰 Commission deducted from virtual_balance: ${commission_required}")
+        hot_logger.info("💰 User virtual_balance after: $%s", user['virtual_balance'] - commission_required)
+        hot_logger.info("💰 User frozen_balance after: $%s", user['frozen_balance'] + commission_required)
+        hot_logger.info("💰 Commission frozen: $%s", commission_required)
+        hot_logger.info("💰 Commission deducted from virtual_balance: $%s", commission_required)
 
         # Create the game
         game = Game(
@@ -6445,6 +5309,8 @@ async def create_game(
         )
         
         await db.games.insert_one(game.dict())
+        await freeze_game_funds(game.dict(), current_user.id, "creator", commission_required, current_user.username)
+        mark_user_directory_dirty(current_user.id)
         
         # Create transaction for freezing gems
         transaction = Transaction(
@@ -6495,7 +5361,7 @@ async def create_game(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error creating game: {e}")
+        logger.error("Error creating game: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to create game"
@@ -6648,11 +5514,11 @@ async def handle_human_bot_game_completion(game_id: str):
 async def handle_game_timeout(game_id: str):
     """Handle game timeout - return funds and recreate bet with new commit-reveal."""
     try:
-        game = await db.games.find_one({"id": game_id})
+        game = await db.games.find_one({"id": game_id}, GameView.projection)
         if not game:
             return
             
-        game_obj = Game(**game)
+        game_obj = GameView.from_doc(game)
         
         # Handle timeout for ACTIVE phase (opponent didn't choose move in time)
         if game_obj.status == GameStatus.ACTIVE:
@@ -6668,16 +5534,8 @@ async def handle_game_timeout(game_id: str):
             
             # Return gems to opponent (who joined but didn't choose move)
             if game_obj.opponent_gems:
-                for gem_type, quantity in game_obj.opponent_gems.items():
-                    if quantity > 0:
-                        await db.user_gems.update_one(
-                            {"user_id": game_obj.opponent_id, "gem_type": gem_type},
-                            {
-                                "$inc": {"frozen_quantity": -quantity},
-                                "$set": {"updated_at": datetime.utcnow()}
-                            }
-                        )
-                        logger.info(f"💎 Returned {quantity} {gem_type} gems to opponent {game_obj.opponent_id}")
+                await gem_inventory.unfreeze(game_obj.opponent_id, game_obj.opponent_gems)
+                hot_logger.info("💎 Returned %s gems to opponent %s", normalize_gems(game_obj.opponent_gems), game_obj.opponent_id)
             
             # Check if the game creator is a regular bot (affects commission handling)
             is_regular_bot_game = False
@@ -6694,7 +5552,7 @@ async def handle_game_timeout(game_id: str):
             # This applies to: Live Players vs Live Players, Live Players vs Human-bots, Human-bots vs Live Players
             if not is_regular_bot_game:
                 commission_rate = await get_bet_commission_rate_fraction()
-                commission = round_money(game_obj.bet_amount * commission_rate)
+                commission = commission_for(game_obj.bet_amount, commission_rate)
                 await db.users.update_one(
                     {"id": game_obj.opponent_id},
                     {
@@ -6721,7 +5579,7 @@ async def handle_game_timeout(game_id: str):
             # **FIX: Return creator's commission before recreating bet**
             if not is_regular_bot_game:
                 commission_rate = await get_bet_commission_rate_fraction()
-                creator_commission = round_money(game_obj.bet_amount * commission_rate)
+                creator_commission = commission_for(game_obj.bet_amount, commission_rate)
                 await db.users.update_one(
                     {"id": game_obj.creator_id},
                     {
@@ -6769,6 +5627,7 @@ async def handle_game_timeout(game_id: str):
                     }
                 }
             )
+            await release_opponent_funds(game_id, game_obj.opponent_id)
             
             # Send notifications to both players
             try:
@@ -6906,14 +5765,14 @@ async def reserve_game(
     
     try:
         # Get the game
-        game = await db.games.find_one({"id": game_id})
+        game = await db.games.find_one({"id": game_id}, GameView.projection)
         if not game:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Game not found"
             )
         
-        game_obj = Game(**game)
+        game_obj = GameView.from_doc(game)
         
         # Validate game state
         if game_obj.status != GameStatus.WAITING:
@@ -6945,20 +5804,17 @@ async def reserve_game(
         
         # Get user's gems and check total value
         user_total_gem_value = 0
-        user_gems = await db.user_gems.find({"user_id": current_user.id}).to_list(None)
+        gem_prices = {gem_def["type"]: gem_def["price"] for gem_def in await db.gem_definitions.find({}, {"_id": 0, "type": 1, "price": 1}).to_list(None)}
         available_gems = []  # For combination check
         
-        for user_gem in user_gems:
-            gem_def = await db.gem_definitions.find_one({"type": user_gem["gem_type"]})
-            if gem_def:
-                available_quantity = user_gem["quantity"] - user_gem["frozen_quantity"]
-                if available_quantity > 0:
-                    user_total_gem_value += gem_def["price"] * available_quantity
-                    available_gems.append({
-                        "type": user_gem["gem_type"],
-                        "available_quantity": available_quantity,
-                        "price": gem_def["price"]
-                    })
+        for gem_type, available_quantity in available(await gem_inventory.get(current_user.id)).items():
+            if gem_type in gem_prices and available_quantity > 0:
+                user_total_gem_value += gem_prices[gem_type] * available_quantity
+                available_gems.append({
+                    "type": gem_type,
+                    "available_quantity": available_quantity,
+                    "price": gem_prices[gem_type]
+                })
         
         # Check 1: Total gem value
         if user_total_gem_value < game_obj.bet_amount:
@@ -6969,7 +5825,7 @@ async def reserve_game(
         
         # Check 2: Can form exact combination
         # Try to find a combination that sums to exact bet amount
-        can_form_combination = await check_gem_combination_possible(available_gems, game_obj.bet_amount)
+        can_form_combination = gem_combination_possible(available_gems, game_obj.bet_amount)
         
         if not can_form_combination:
             raise HTTPException(
@@ -6989,7 +5845,7 @@ async def reserve_game(
         # Human-bots and live players pay commission
         if not is_regular_bot:
             commission_rate = await get_bet_commission_rate_fraction()
-            commission_required = round_money(game_obj.bet_amount * commission_rate)
+            commission_required = commission_for(game_obj.bet_amount, commission_rate)
             
             # Check if playing against regular bot (no commission)
             is_regular_bot_game = False
@@ -7006,32 +5862,23 @@ async def reserve_game(
                         detail="Insufficient funds for the commission — please top up your balance."
                     )
         
-        # Reserve the game atomically
+        # Reserve the game atomically: only if nothing changed since it was validated above
         reservation_time = datetime.utcnow()
         reservation_expires = reservation_time + timedelta(seconds=60)
         
-        update_result = await db.games.update_one(
+        reserved = await transition(
+            db.games, game_id, reservable(current_user.id, reservation_time),
             {
-                "id": game_id,
-                "status": "WAITING",
-                "$or": [
-                    {"reserved_by": None},
-                    {"reserved_by": current_user.id},
-                    {"reservation_expires_at": {"$lt": datetime.utcnow()}}
-                ]
+                "status": GameStatus.RESERVED,
+                "reserved_by": current_user.id,
+                "reserved_at": reservation_time,
+                "reservation_expires_at": reservation_expires,
+                "updated_at": reservation_time
             },
-            {
-                "$set": {
-                    "status": "RESERVED",
-                    "reserved_by": current_user.id,
-                    "reserved_at": reservation_time,
-                    "reservation_expires_at": reservation_expires,
-                    "updated_at": reservation_time
-                }
-            }
+            version=seen_version(game), projection={"_id": 0, "id": 1}
         )
         
-        if update_result.modified_count == 0:
+        if reserved is None:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Failed to reserve game - it may be already reserved"
@@ -7065,24 +5912,19 @@ async def unreserve_game(
     
     try:
         # Update game to remove reservation
-        update_result = await db.games.update_one(
+        unreserved = await transition(
+            db.games, game_id, {"status": GameStatus.RESERVED, "reserved_by": current_user.id},
             {
-                "id": game_id,
-                "status": "RESERVED",
-                "reserved_by": current_user.id
+                "status": GameStatus.WAITING,
+                "reserved_by": None,
+                "reserved_at": None,
+                "reservation_expires_at": None,
+                "updated_at": datetime.utcnow()
             },
-            {
-                "$set": {
-                    "status": "WAITING",
-                    "reserved_by": None,
-                    "reserved_at": None,
-                    "reservation_expires_at": None,
-                    "updated_at": datetime.utcnow()
-                }
-            }
+            projection={"_id": 0, "id": 1}
         )
         
-        if update_result.modified_count == 0:
+        if unreserved is None:
             # Game might already be unreserved or joined
             return {
                 "success": True,
@@ -7112,20 +5954,20 @@ async def join_game(
     current_user: User = Depends(get_current_user_with_security)
 ):
     """Join an existing PvP game."""
-    logger.info(f"🤝 JOIN_GAME called for user {current_user.id}, game {game_id}")
+    hot_logger.info("🤝 JOIN_GAME called for user %s, game %s", current_user.id, game_id)
     try:
         # NOTE: Multiple game restriction removed - users can now join unlimited concurrent games
         # Self-join protection is still handled below
         
         # Get the game
-        game = await db.games.find_one({"id": game_id})
+        game = await db.games.find_one({"id": game_id}, GameView.projection)
         if not game:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Game not found"
             )
         
-        game_obj = Game(**game)
+        game_obj = GameView.from_doc(game)
         
         # Validate game state - allow joining if WAITING or RESERVED by current user
         if game_obj.status == GameStatus.RESERVED:
@@ -7202,6 +6044,8 @@ async def join_game(
         
         # Check if user has enough gems for THEIR OWN combination (not creator's)
         total_gems_value = 0.0
+        inventory = await gem_inventory.get(current_user.id)
+        owned, available_gems = counts(inventory, "quantity"), available(inventory)
         
         # Validate user's selected gems combination
         for gem_type, quantity in join_data.gems.items():
@@ -7217,14 +6061,13 @@ async def join_game(
                 )
             
             # Check user's inventory for this gem type
-            user_gems = await db.user_gems.find_one({"user_id": current_user.id, "gem_type": gem_type})
-            if not user_gems:
+            if not owned.get(gem_type):
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail=f"You don't have any {gem_type} gems"
                 )
             
-            available_quantity = user_gems["quantity"] - user_gems["frozen_quantity"]
+            available_quantity = available_gems.get(gem_type, 0)
             if available_quantity < quantity:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
@@ -7243,8 +6086,8 @@ async def join_game(
         
         # Check if user has enough balance for commission
         commission_rate = await get_bet_commission_rate_fraction()
-        commission_required = round_money(game_obj.bet_amount * commission_rate)
-        user = await db.users.find_one({"id": current_user.id})
+        commission_required = commission_for(game_obj.bet_amount, commission_rate)
+        user = await db.users.find_one({"id": current_user.id}, {"_id": 0, "virtual_balance": 1})
         
         # Check if the game creator is a regular bot
         is_regular_bot_game = False
@@ -7263,38 +6106,10 @@ async def join_game(
         else:
             # For regular bot games, commission is set to 0
             commission_required = 0.0
-            logger.info(f"🤖 Playing against regular bot - no commission required for user {current_user.id}")
-        
-        # Freeze user's own selected gems (not creator's gems)
-        for gem_type, quantity in join_data.gems.items():
-            if quantity > 0:
-                await db.user_gems.update_one(
-                    {"user_id": current_user.id, "gem_type": gem_type},
-                    {
-                        "$inc": {"frozen_quantity": quantity},
-                        "$set": {"updated_at": datetime.utcnow()}
-                    }
-                )
-        
-        # Freeze commission balance only if not playing against regular bot
-        if not is_regular_bot_game and commission_required > 0:
-            new_balance = user["virtual_balance"] - commission_required
-            await db.users.update_one(
-                {"id": current_user.id},
-                {
-                    "$set": {
-                        "virtual_balance": new_balance,
-                        "frozen_balance": user["frozen_balance"] + commission_required,
-                        "updated_at": datetime.utcnow()
-                    }
-                }
-            )
-            logger.info(f"💰 Commission ${commission_required} frozen for user {current_user.id}")
-        else:
-            logger.info(f"🤖 No commission frozen for regular bot game - user {current_user.id}")
+            hot_logger.info("🤖 Playing against regular bot - no commission required for user %s", current_user.id)
         
         # Check if creator is Human-bot to set appropriate deadline
-        creator_is_human_bot = await db.human_bots.find_one({"id": game["creator_id"]})
+        creator_is_human_bot = await db.human_bots.find_one({"id": game["creator_id"]}, {"_id": 1})
         
         # Set deadline based on game type
         if creator_is_human_bot:
@@ -7302,20 +6117,20 @@ async def join_game(
             random_completion_seconds = random.randint(15, 60)
             active_deadline = datetime.utcnow() + timedelta(seconds=random_completion_seconds)
             human_bot_completion_time = random_completion_seconds
-            logger.info(f"Human-bot creator detected - game {game_id} will complete in {random_completion_seconds} seconds")
+            hot_logger.info("Human-bot creator detected - game %s will complete in %s seconds", game_id, random_completion_seconds)
         else:
             # Regular game with human creator - standard 1 minute for opponent move
             active_deadline = datetime.utcnow() + timedelta(minutes=1)
             human_bot_completion_time = None
-            logger.info(f"Human creator detected - game {game_id} has 1 minute standard deadline")
+            hot_logger.info("Human creator detected - game %s has 1 minute standard deadline", game_id)
         
-        # ATOMIC UPDATE: Try to update game with opponent only if it still has no opponent  
-        # This prevents race conditions where multiple users try to join the same game
+        # ATOMIC CLAIM: take the game only if it is still joinable and unchanged since it was read.
+        # Of concurrent joiners exactly one wins; the rest fail here before freezing anything.
         update_data = {
             "opponent_id": current_user.id,
             "opponent_gems": join_data.gems,  # Save opponent's gem combination
             "joined_at": datetime.utcnow(),
-            "status": "ACTIVE",  # Mark as active - waiting for opponent to choose move
+            "status": GameStatus.ACTIVE,  # Mark as active - waiting for opponent to choose move
             "active_deadline": active_deadline,
             "is_regular_bot_game": is_regular_bot_game,
             "updated_at": datetime.utcnow(),
@@ -7329,51 +6144,67 @@ async def join_game(
         if human_bot_completion_time:
             update_data["human_bot_completion_time"] = human_bot_completion_time
         
-        update_result = await db.games.update_one(
-            {
-                "id": game_id,
-                "opponent_id": None,  # Only update if opponent_id is still None
-                "$or": [
-                    {"status": "WAITING"},
-                    {"status": "RESERVED", "reserved_by": current_user.id}
-                ]
-            },
-            {"$set": update_data}
+        claimed = await transition(
+            db.games, game_id, joinable(current_user.id), update_data,
+            version=seen_version(game), projection={"_id": 0, "version": 1}
         )
-        
-        # Check if the update was successful
-        if update_result.modified_count == 0:
-            # The game was already taken by another player or changed state
-            # Refund the user's gems and balance
-            for gem_type, quantity in join_data.gems.items():
-                if quantity > 0:
-                    await db.user_gems.update_one(
-                        {"user_id": current_user.id, "gem_type": gem_type},
-                        {
-                            "$inc": {"frozen_quantity": -quantity},
-                            "$set": {"updated_at": datetime.utcnow()}
-                        }
-                    )
-            
-            # Refund balance only if commission was actually charged
-            if not is_regular_bot_game and commission_required > 0:
-                await db.users.update_one(
-                    {"id": current_user.id},
-                    {
-                        "$set": {
-                            "virtual_balance": user["virtual_balance"],  # Restore original balance
-                            "frozen_balance": user["frozen_balance"],     # Restore original frozen balance
-                            "updated_at": datetime.utcnow()
-                        }
-                    }
-                )
-            
+        if claimed is None:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Game is no longer available - another player may have joined it"
             )
         
+        async def give_back_game():
+            """Undo the claim when the joiner's own funds fail; nothing of theirs stays frozen"""
+            await transition(
+                db.games, game_id, {"status": GameStatus.ACTIVE, "opponent_id": current_user.id},
+                {
+                    "status": GameStatus.WAITING,
+                    "opponent_id": None,
+                    "opponent_gems": None,
+                    "joined_at": None,
+                    "active_deadline": None,
+                    "updated_at": datetime.utcnow()
+                },
+                version=claimed["version"]
+            )
+        
+        # Freeze user's own selected gems (not creator's gems): one conditional update for the whole combination
+        if not await gem_inventory.freeze(current_user.id, join_data.gems):
+            await give_back_game()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Insufficient gems - some of them were used in another bet"
+            )
+        
+        # Freeze commission balance only if not playing against regular bot.
+        # Conditional $inc: a balance spent concurrently since the check above fails the join
+        if not is_regular_bot_game and commission_required > 0:
+            frozen = await db.users.update_one(
+                {"id": current_user.id, "virtual_balance": {"$gte": commission_required}},
+                {
+                    "$inc": {
+                        "virtual_balance": -commission_required,
+                        "frozen_balance": commission_required
+                    },
+                    "$set": {"updated_at": datetime.utcnow()}
+                }
+            )
+            if frozen.modified_count == 0:
+                await gem_inventory.unfreeze(current_user.id, join_data.gems)
+                await give_back_game()
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Insufficient balance for commission. Required: ${commission_required:.2f}"
+                )
+            hot_logger.info("💰 Commission $%s frozen for user %s", commission_required, current_user.id)
+        else:
+            hot_logger.info("🤖 No commission frozen for regular bot game - user %s", current_user.id)
+        
         # SUCCESS: Game joined successfully - now in ACTIVE state waiting for opponent's move
+        await freeze_game_funds(game, current_user.id, "opponent", commission_required, current_user.username)
+        mark_user_directory_dirty(current_user.id)
+        
         # Send notification to game creator that their bet was accepted
         try:
             opponent_name = await get_user_name_for_notification(current_user.id)
@@ -7395,10 +6226,10 @@ async def join_game(
                 priority=NotificationPriorityEnum.INFO
             )
             
-            logger.info(f"📬 Sent bet accepted notification to creator {game_obj.creator_id}")
+            hot_logger.info("📬 Sent bet accepted notification to creator %s", game_obj.creator_id)
             
         except Exception as e:
-            logger.error(f"Error sending bet accepted notification: {e}")
+            logger.error("Error sending bet accepted notification: %s", e)
             # Don't fail the join process if notification fails
         
         # Return ACTIVE game state - opponent needs to choose their move within 1 minute
@@ -7413,8 +6244,8 @@ async def join_game(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error joining game: {e}")
-        logger.error(f"Error type: {type(e)}")
+        logger.error("Error joining game: %s", e)
+        logger.error("Error type: %s", type(e))
         logger.error(f"Error traceback:", exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -7433,14 +6264,14 @@ async def choose_move_for_active_game(
     logger.info(f"🎯 CHOOSE_MOVE called for user {current_user.id}, game {game_id}")
     try:
         # Get the game
-        game = await db.games.find_one({"id": game_id})
+        game = await db.games.find_one({"id": game_id}, GameView.projection)
         if not game:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Game not found"
             )
         
-        game_obj = Game(**game)
+        game_obj = GameView.from_doc(game)
         
         # Validate that this is an active game and user is the opponent
         if game_obj.status != GameStatus.ACTIVE:
@@ -7608,6 +6439,11 @@ async def cleanup_stuck_games():
     except Exception as e:
         logger.error(f"❌ Error in cleanup_stuck_games: {e}")
 
+async def cleanup_stuck_games_once():
+    """Run cleanup_stuck_games in the first worker that starts; the lease is left to expire."""
+    if await acquire_lease(bootstrap_state, "stuck_games_cleanup", ttl_seconds=60):
+        await cleanup_stuck_games()
+
 async def timeout_checker_task():
     """Background task to check for game timeouts."""
     logger.info("⏰ Game timeout checker task started")
@@ -7616,37 +6452,43 @@ async def timeout_checker_task():
             current_time = datetime.utcnow()
             
             # Find games in ACTIVE phase that have exceeded 1-minute deadline
-            expired_games = await db.games.find({
-                "status": GameStatus.ACTIVE,
-                "active_deadline": {"$lt": current_time}  
-            }).to_list(100)
+            expired_games = await db.games.find(
+                {
+                    "status": GameStatus.ACTIVE,
+                    "active_deadline": {"$lt": current_time}
+                },
+                {"_id": 0, "id": 1, "creator_id": 1, "opponent_id": 1, "human_bot_completion_time": 1}
+            ).to_list(100)
             
             if expired_games:
-                logger.info(f"⏰ Found {len(expired_games)} expired ACTIVE games to handle")
+                hot_logger.info("⏰ Found %s expired ACTIVE games to handle", len(expired_games))
+                
+                # One lookup for all players of the batch instead of two per game
+                player_ids = list({game_data.get(key) for game_data in expired_games for key in ("creator_id", "opponent_id")} - {None})
+                human_bot_ids = {
+                    doc["id"] async for doc in db.human_bots.find({"id": {"$in": player_ids}}, {"_id": 0, "id": 1})
+                }
                 
                 for game_data in expired_games:
                     try:
-                        # Check if this is a Human-bot game
-                        game_obj = Game(**game_data)
-                        
                         # Check if at least one player is a Human-bot
-                        creator_is_human_bot = await db.human_bots.find_one({"id": game_obj.creator_id})
-                        opponent_is_human_bot = await db.human_bots.find_one({"id": game_obj.opponent_id})
+                        creator_is_human_bot = game_data.get("creator_id") in human_bot_ids
+                        opponent_is_human_bot = game_data.get("opponent_id") in human_bot_ids
                         
                         # Log completion time info if available
                         completion_time = game_data.get('human_bot_completion_time', 'N/A')
-                        logger.info(f"⏰ Processing expired game {game_data['id']} (planned completion: {completion_time}s)")
+                        hot_logger.info("⏰ Processing expired game %s (planned completion: %ss)", game_data['id'], completion_time)
                         
                         if creator_is_human_bot or opponent_is_human_bot:
                             # Handle Human-bot game completion
                             await handle_human_bot_game_completion(game_data["id"])
-                            logger.info(f"⏰ ✅ Human-bot game {game_data['id']} completed successfully")
+                            hot_logger.info("⏰ ✅ Human-bot game %s completed successfully", game_data['id'])
                         else:
                             # Handle regular game timeout - recreate bet with new commit-reveal
                             await handle_game_timeout(game_data["id"])
-                            logger.info(f"⏰ ✅ Regular game {game_data['id']} timeout handled successfully")
+                            hot_logger.info("⏰ ✅ Regular game %s timeout handled successfully", game_data['id'])
                     except Exception as e:
-                        logger.error(f"❌ Error handling timeout for game {game_data['id']}: {e}")
+                        logger.error("❌ Error handling timeout for game %s: %s", game_data['id'], e)
             else:
                 logger.debug("⏰ No expired ACTIVE games found")
             
@@ -7657,19 +6499,19 @@ async def timeout_checker_task():
             }).to_list(100)
             
             if expired_reveal_games:
-                logger.info(f"⏰ Found {len(expired_reveal_games)} expired REVEAL games to handle")
+                hot_logger.info("⏰ Found %s expired REVEAL games to handle", len(expired_reveal_games))
                 for game_data in expired_reveal_games:
                     try:
                         await handle_game_timeout(game_data["id"])
-                        logger.info(f"⏰ Successfully handled REVEAL game timeout for game {game_data['id']}")
+                        hot_logger.info("⏰ Successfully handled REVEAL game timeout for game %s", game_data['id'])
                     except Exception as e:
-                        logger.error(f"❌ Error handling REVEAL timeout for game {game_data['id']}: {e}")
+                        logger.error("❌ Error handling REVEAL timeout for game %s: %s", game_data['id'], e)
             
             # Sleep for 10 seconds before next check
             await asyncio.sleep(10)
             
         except Exception as e:
-            logger.error(f"❌ Error in timeout checker: {e}")
+            logger.error("❌ Error in timeout checker: %s", e)
             await asyncio.sleep(30)  # Wait longer on error
 
 async def determine_game_winner(game_id: str) -> dict:
@@ -7767,10 +6609,9 @@ async def determine_game_winner(game_id: str) -> dict:
                 else:  # DRAW
                     winner_id, result_status = None, "draw"
                 
-                # Обновляем статистику цикла бота ровно с тем исходом, который применили
-                # Sync simplified to accumulators only
-                await accumulate_bot_profit(game_obj, winner_id)
-                logger.info(f"🎯 Regular bot {bot_id} game result: {outcome_upper} (bet: ${game_obj.bet_amount}) [accumulator updated]")
+                # Статистика цикла бота обновляется ровно с тем исходом, который применили
+                # (аккумулятор пополняется задачей bot_profit из outbox)
+                hot_logger.info("🎯 Regular bot %s game result: %s (bet: $%s)", bot_id, outcome_upper, game_obj.bet_amount)
             else:
                 # Fallback к обычной логике если не найден бот
                 winner_id, result_status = determine_rps_winner(game_obj.creator_move, game_obj.opponent_move, game_obj.creator_id, game_obj.opponent_id)
@@ -7808,9 +6649,9 @@ async def determine_game_winner(game_id: str) -> dict:
             # For bot games, verify hash if available (more lenient)
             if game_obj.creator_move_hash and game_obj.creator_salt:
                 if not verify_move_hash(game_obj.creator_move, game_obj.creator_salt, game_obj.creator_move_hash):
-                    logger.warning(f"Bot game {game_id} move hash verification failed, but proceeding")
+                    logger.warning("Bot game %s move hash verification failed, but proceeding", game_id)
             else:
-                logger.info(f"Bot game {game_id} has no hash verification data, proceeding without verification")
+                hot_logger.info("Bot game %s has no hash verification data, proceeding without verification", game_id)
         
         # Calculate commission
         # Each player pays 6% commission on their bet amount
@@ -7818,11 +6659,12 @@ async def determine_game_winner(game_id: str) -> dict:
         commission_amount = 0
         if winner_id and not is_regular_bot_game:
             commission_rate = await get_bet_commission_rate_fraction()
-            commission_amount = round_money(game_obj.bet_amount * commission_rate)  # winner pays commission
+            commission_amount = commission_for(game_obj.bet_amount, commission_rate)  # winner pays commission
         
         total_pot = game_obj.bet_amount * 2  # Both players' bets
         
         # Update game status
+        completed_at = datetime.utcnow()
         await db.games.update_one(
             {"id": game_id},
             {
@@ -7830,188 +6672,17 @@ async def determine_game_winner(game_id: str) -> dict:
                     "status": GameStatus.COMPLETED,
                     "winner_id": winner_id,
                     "commission_amount": commission_amount,
-                    "completed_at": datetime.utcnow()
-                }
+                    "completed_at": completed_at
+                },
+                # A running maintenance job must not refund or close a settled game
+                "$unset": {"maintenance_job_id": ""}
             }
         )
+        await release_game_funds(game_id)
         
-        # Send match result notifications to both players
-        try:
-            creator_name = await get_user_name_for_notification(game_obj.creator_id)
-            opponent_name = await get_user_name_for_notification(game_obj.opponent_id)
-            
-            # Determine winnings/losses for notifications
-            total_pot = game_obj.bet_amount * 2 if not is_regular_bot_game else game_obj.bet_amount
-            winnings = total_pot - commission_amount if winner_id else 0
-
-            # Compute gem values for each side for payload (in "Gems" units)
-            def _calc_gems_value(gems):
-                try:
-                    total = 0.0
-                    if isinstance(gems, dict):
-                        for gtype, qty in gems.items():
-                            price = GEM_PRICES.get(str(gtype), 0)
-                            total += float(qty) * float(price)
-                    elif isinstance(gems, list):
-                        for item in gems:
-                            if isinstance(item, dict):
-                                gtype = item.get('type') or item.get('gem_type') or item.get('name')
-                                qty = item.get('quantity') or item.get('qty') or 0
-                                price = GEM_PRICES.get(str(gtype), 0)
-                                total += float(qty) * float(price)
-                    return round(total)
-                except Exception:
-                    return round(game_obj.bet_amount)
-
-            creator_gems_value = _calc_gems_value(game_obj.bet_gems)
-            opponent_gems_value = _calc_gems_value(game_obj.opponent_gems) if getattr(game_obj, 'opponent_gems', None) else round(game_obj.bet_amount)
-
-            # Commission percent to expose in payload (integer)
-            try:
-                commission_rate_curr = await get_bet_commission_rate_fraction()
-            except Exception:
-                commission_rate_curr = 0.03
-            commission_percent_int = int(round(commission_rate_curr * 100))
-
-            # Bot flags
-            is_bot_game_flag = bool(getattr(game_obj, 'is_bot_game', False) or getattr(game_obj, 'bot_id', None) or (getattr(game_obj, 'creator_type', '') in ['bot','human_bot']) or (getattr(game_obj, 'opponent_type', '') in ['bot','human_bot']))
-            is_human_bot_flag = (getattr(game_obj, 'bot_type', None) == 'HUMAN') or (getattr(game_obj, 'creator_type', '') == 'human_bot') or (getattr(game_obj, 'opponent_type', '') == 'human_bot')
-            
-            # Send notification to creator
-            if result_status == "creator_wins":
-                total_gems_won = game_obj.bet_amount * 2  # Total before commission
-                creator_payload = NotificationPayload(
-                    game_id=game_id,
-                    opponent_name=opponent_name,
-                    result="won",
-                    outcome="win",
-                    amount_won=winnings,
-                    total_gems=total_gems_won,
-                    commission=commission_amount,
-                    action_url="/games/history",
-                    player_move=str(game_obj.creator_move.value if game_obj.creator_move else ''),
-                    opponent_move=str(game_obj.opponent_move.value if game_obj.opponent_move else ''),
-                    player_bet_gems=creator_gems_value,
-                    opponent_bet_gems=opponent_gems_value,
-                    commission_percent=commission_percent_int,
-                    commission_amount_usd=float(commission_amount),
-                    is_bot_game=is_bot_game_flag,
-                    is_human_bot=is_human_bot_flag
-                )
-                opponent_payload = NotificationPayload(
-                    game_id=game_id,
-                    opponent_name=creator_name,
-                    opponent_id=game_obj.creator_id,
-                    result="lost",
-                    outcome="lose",
-                    amount_lost=game_obj.bet_amount,
-                    commission=0.0,  # Loser doesn't pay commission in new system
-                    action_url="/games/history",
-                    player_move=str(game_obj.opponent_move.value if game_obj.opponent_move else ''),
-                    opponent_move=str(game_obj.creator_move.value if game_obj.creator_move else ''),
-                    player_bet_gems=opponent_gems_value,
-                    opponent_bet_gems=creator_gems_value,
-                    commission_percent=commission_percent_int,
-                    commission_amount_usd=0.0,
-                    is_bot_game=is_bot_game_flag,
-                    is_human_bot=is_human_bot_flag
-                )
-            elif result_status == "opponent_wins":
-                total_gems_won = game_obj.bet_amount * 2  # Total before commission
-                creator_payload = NotificationPayload(
-                    game_id=game_id,
-                    opponent_name=opponent_name,
-                    opponent_id=game_obj.opponent_id,
-                    result="lost",
-                    outcome="lose",
-                    amount_lost=game_obj.bet_amount,
-                    commission=0.0,  # Loser doesn't pay commission in new system
-                    action_url="/games/history",
-                    player_move=str(game_obj.creator_move.value if game_obj.creator_move else ''),
-                    opponent_move=str(game_obj.opponent_move.value if game_obj.opponent_move else ''),
-                    player_bet_gems=creator_gems_value,
-                    opponent_bet_gems=opponent_gems_value,
-                    commission_percent=commission_percent_int,
-                    commission_amount_usd=0.0,
-                    is_bot_game=is_bot_game_flag,
-                    is_human_bot=is_human_bot_flag
-                )
-                opponent_payload = NotificationPayload(
-                    game_id=game_id,
-                    opponent_name=creator_name,
-                    result="won",
-                    outcome="win",
-                    amount_won=winnings,
-                    total_gems=total_gems_won,
-                    commission=commission_amount,
-                    action_url="/games/history",
-                    player_move=str(game_obj.opponent_move.value if game_obj.opponent_move else ''),
-                    opponent_move=str(game_obj.creator_move.value if game_obj.creator_move else ''),
-                    player_bet_gems=opponent_gems_value,
-                    opponent_bet_gems=creator_gems_value,
-                    commission_percent=commission_percent_int,
-                    commission_amount_usd=float(commission_amount),
-                    is_bot_game=is_bot_game_flag,
-                    is_human_bot=is_human_bot_flag
-                )
-            else:  # draw
-                creator_payload = NotificationPayload(
-                    game_id=game_id,
-                    opponent_name=opponent_name,
-                    opponent_id=game_obj.opponent_id,
-                    result="draw",
-                    outcome="draw",
-                    amount=game_obj.bet_amount,
-                    commission=0.0,  # No commission for draws
-                    action_url="/games/history",
-                    player_move=str(game_obj.creator_move.value if game_obj.creator_move else ''),
-                    opponent_move=str(game_obj.opponent_move.value if game_obj.opponent_move else ''),
-                    player_bet_gems=creator_gems_value,
-                    opponent_bet_gems=opponent_gems_value,
-                    commission_percent=commission_percent_int,
-                    commission_amount_usd=0.0,
-                    is_bot_game=is_bot_game_flag,
-                    is_human_bot=is_human_bot_flag
-                )
-                opponent_payload = NotificationPayload(
-                    game_id=game_id,
-                    opponent_name=creator_name,
-                    opponent_id=game_obj.creator_id,
-                    result="draw",
-                    outcome="draw",
-                    amount=game_obj.bet_amount,
-                    commission=0.0,  # No commission for draws
-                    action_url="/games/history",
-                    player_move=str(game_obj.opponent_move.value if game_obj.opponent_move else ''),
-                    opponent_move=str(game_obj.creator_move.value if game_obj.creator_move else ''),
-                    player_bet_gems=opponent_gems_value,
-                    opponent_bet_gems=creator_gems_value,
-                    commission_percent=commission_percent_int,
-                    commission_amount_usd=0.0,
-                    is_bot_game=is_bot_game_flag,
-                    is_human_bot=is_human_bot_flag
-                )
-            
-            # Send notifications to both players
-            await create_notification(
-                user_id=game_obj.creator_id,
-                notification_type=NotificationTypeEnum.MATCH_RESULT,
-                payload=creator_payload,
-                priority=NotificationPriorityEnum.INFO
-            )
-            
-            await create_notification(
-                user_id=game_obj.opponent_id,
-                notification_type=NotificationTypeEnum.MATCH_RESULT,
-                payload=opponent_payload,
-                priority=NotificationPriorityEnum.INFO
-            )
-            
-            logger.info(f"📬 Sent match result notifications for game {game_id}")
-        
-        except Exception as e:
-            logger.error(f"Error sending match result notifications: {e}")
-            # Don't fail the game completion if notification fails
+        # Match result notifications, bot cycle and Human-bot statistics are derived data:
+        # they are queued and processed by the outbox workers after the response is sent
+        total_pot = game_obj.bet_amount * 2 if not is_regular_bot_game else game_obj.bet_amount
         
         # Refresh game object to get latest data
         updated_game = await db.games.find_one({"id": game_id})
@@ -8021,13 +6692,23 @@ async def determine_game_winner(game_id: str) -> dict:
         # Distribute rewards
         await distribute_game_rewards(game_obj, winner_id, commission_amount)
         
-        # Update bot cycle tracking if applicable
-        if game_obj.is_bot_game and game_obj.bot_id:
-            await update_bot_cycle_tracking(game_obj.bot_id, winner_id == game_obj.bot_id)
-        
-        # Process human bot game outcome
+        settled = {"game_id": game_id, "winner_id": winner_id}
+        tasks = [
+            outbox_task("match_result_notifications", game_id, {
+                **settled,
+                "result_status": result_status,
+                "commission_amount": commission_amount,
+                "is_regular_bot_game": is_regular_bot_game
+            }),
+            outbox_task("bot_game_stats", game_id, settled, partition=game_obj.bot_id),
+            outbox_task("player_stats", game_id, settled)
+        ]
+        if is_regular_bot_game:
+            bot_id = game_obj.creator_id if creator_regular_bot else game_obj.opponent_id
+            tasks.append(outbox_task("bot_profit", game_id, settled, partition=bot_id))
         if has_human_bot:
-            await process_human_bot_game_outcome(game_id, winner_id)
+            tasks.append(outbox_task("human_bot_outcome", game_id, settled))
+        await outbox.enqueue(tasks)
         
         # Get user details for response
         creator = await get_player_info(game_obj.creator_id)
@@ -8048,21 +6729,19 @@ async def determine_game_winner(game_id: str) -> dict:
         }
         
     except Exception as e:
-        logger.error(f"Error determining game winner for game {game_id}: {e}")
-        logger.error(f"Error type: {type(e)}")
+        logger.error("Error determining game winner for game %s: %s", game_id, e)
+        logger.error("Error type: %s", type(e))
         logger.error(f"Error traceback:", exc_info=True)
         
         # Try to get game data for debugging
         try:
             game_debug = await db.games.find_one({"id": game_id})
             if game_debug:
-                logger.error(f"Game debug data: status={game_debug.get('status')}, "
-                           f"creator_move={game_debug.get('creator_move')}, "
-                           f"opponent_move={game_debug.get('opponent_move')}, "
-                           f"creator_id={game_debug.get('creator_id')}, "
-                           f"opponent_id={game_debug.get('opponent_id')}")
+                logger.error("Game debug data: status=%s, creator_move=%s, opponent_move=%s, creator_id=%s, opponent_id=%s",
+                             game_debug.get('status'), game_debug.get('creator_move'), game_debug.get('opponent_move'),
+                             game_debug.get('creator_id'), game_debug.get('opponent_id'))
         except Exception as debug_e:
-            logger.error(f"Could not fetch game debug data: {debug_e}")
+            logger.error("Could not fetch game debug data: %s", debug_e)
         
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -8077,7 +6756,7 @@ async def is_human_bot_user(user_id: str) -> bool:
 async def distribute_game_rewards(game: Game, winner_id: str, commission_amount: float):
     """Distribute gems and handle commissions after game completion."""
     try:
-        logger.info(f"🎯 DISTRIBUTE_GAME_REWARDS called: game={game.id[:8]}..., winner={winner_id[:8] if winner_id else 'None'}..., commission_amount={commission_amount}")
+        hot_logger.info("🎯 DISTRIBUTE_GAME_REWARDS called: game=%s..., winner=%s..., commission_amount=%s", game.id[:8], winner_id[:8] if winner_id else 'None', commission_amount)
         # Check if this is a regular bot game (no commission)
         is_regular_bot_game = getattr(game, 'is_regular_bot_game', False)
         
@@ -8093,89 +6772,37 @@ async def distribute_game_rewards(game: Game, winner_id: str, commission_amount:
             is_regular_bot_game = creator_is_regular_bot or opponent_is_regular_bot
         
         if is_regular_bot_game:
-            logger.info(f"💰 REGULAR BOT GAME - No commission will be charged for game {game.id}")
+            hot_logger.info("💰 REGULAR BOT GAME - No commission will be charged for game %s", game.id)
             # Override commission amount to 0 for regular bot games
             commission_amount = 0
             
             # ИСПРАВЛЕНО: Убрали дублированный вызов accumulate_bot_profit
             # Функция уже вызывается в строке 7657 в логике определения результата
             # Дублированный вызов здесь приводил к удвоению всех показателей (32 игры вместо 16, etc.)
-            logger.info(f"💰 Bot profit accumulation handled in game outcome logic (line 7657)")
+            hot_logger.info("💰 Bot profit accumulation handled in game outcome logic (line 7657)")
         
         # Unfreeze gems for both players using their respective gem combinations
+        # (list-shaped combinations from old games are normalized to {gem_type: quantity})
+        creator_gems = normalize_gems(game.bet_gems)
+        opponent_gems = normalize_gems(game.opponent_gems) or creator_gems
+        if not creator_gems:
+            logger.error("Game %s has invalid bet_gems format: %s", game.id, type(game.bet_gems))
+        
+        # Winner gets all gems (double the bet): the bet combination moves from loser to winner
+        creator_delta, opponent_delta = {}, {}
+        if winner_id:
+            hot_logger.info("🎮 Processing winner rewards for game %s..., winner: %s...", game.id[:8], winner_id[:8] if winner_id else 'None')
+            won = dict(creator_gems)
+            lost = {gem_type: -quantity for gem_type, quantity in creator_gems.items()}
+            creator_delta, opponent_delta = (won, lost) if winner_id == game.creator_id else (lost, won)
         
-        # Ensure bet_gems is a dict, not a list (handle data inconsistency)
-        if isinstance(game.bet_gems, list):
-            logger.warning(f"Game {game.id} has bet_gems as list, converting to dict")
-            # Convert list to dict if needed - assume it's [{"gem_type": "Ruby", "quantity": 10}] format
-            bet_gems_dict = {}
-            for item in game.bet_gems:
-                if isinstance(item, dict) and "gem_type" in item and "quantity" in item:
-                    bet_gems_dict[item["gem_type"]] = item["quantity"]
-            game.bet_gems = bet_gems_dict
-        
-        # Unfreeze creator's gems
-        if isinstance(game.bet_gems, dict):
-            for gem_type, quantity in game.bet_gems.items():
-                await db.user_gems.update_one(
-                    {"user_id": game.creator_id, "gem_type": gem_type},
-                    {
-                        "$inc": {"frozen_quantity": -quantity},
-                        "$set": {"updated_at": datetime.utcnow()}
-                    }
-                )
-        else:
-            logger.error(f"Game {game.id} has invalid bet_gems format: {type(game.bet_gems)}")
-        
-        # Unfreeze opponent's gems (use opponent_gems if available, otherwise bet_gems)
-        opponent_gems = game.opponent_gems if game.opponent_gems else game.bet_gems
-        
-        # Ensure opponent_gems is a dict, not a list
-        if isinstance(opponent_gems, list):
-            logger.warning(f"Game {game.id} has opponent_gems as list, converting to dict")
-            opponent_gems_dict = {}
-            for item in opponent_gems:
-                if isinstance(item, dict) and "gem_type" in item and "quantity" in item:
-                    opponent_gems_dict[item["gem_type"]] = item["quantity"]
-            opponent_gems = opponent_gems_dict
-        
-        if isinstance(opponent_gems, dict):
-            for gem_type, quantity in opponent_gems.items():
-                await db.user_gems.update_one(
-                    {"user_id": game.opponent_id, "gem_type": gem_type},
-                    {
-                        "$inc": {"frozen_quantity": -quantity},
-                        "$set": {"updated_at": datetime.utcnow()}
-                    }
-                )
-        else:
-            logger.error(f"Game {game.id} has invalid opponent_gems format: {type(opponent_gems)}")
+        # One inventory update per player
+        await asyncio.gather(
+            gem_inventory.apply(game.creator_id, creator_delta, release=creator_gems),
+            gem_inventory.apply(game.opponent_id, opponent_delta, release=opponent_gems),
+        )
         
         if winner_id:
-            logger.info(f"🎮 Processing winner rewards for game {game.id[:8]}..., winner: {winner_id[:8] if winner_id else 'None'}...")
-            # Winner gets all gems (double the bet)
-            if isinstance(game.bet_gems, dict):
-                for gem_type, quantity in game.bet_gems.items():
-                    await db.user_gems.update_one(
-                        {"user_id": winner_id, "gem_type": gem_type},
-                        {
-                            "$inc": {"quantity": quantity},  # Winner keeps their gems + gets opponent's
-                            "$set": {"updated_at": datetime.utcnow()}
-                        }
-                    )
-                    
-                    # Remove gems from loser
-                    loser_id = game.opponent_id if winner_id == game.creator_id else game.creator_id
-                    await db.user_gems.update_one(
-                        {"user_id": loser_id, "gem_type": gem_type},
-                        {
-                            "$inc": {"quantity": -quantity},
-                            "$set": {"updated_at": datetime.utcnow()}
-                        }
-                    )
-            else:
-                logger.error(f"Game {game.id} has invalid bet_gems format for winner distribution: {type(game.bet_gems)}")
-            
             # Handle commission for winner
             winner = await db.users.find_one({"id": winner_id})
             if winner:
@@ -8185,11 +6812,11 @@ async def distribute_game_rewards(game: Game, winner_id: str, commission_amount:
                     new_winner_frozen = winner["frozen_balance"]  # No commission changes
                     new_winner_balance = winner["virtual_balance"]  # No commission deducted
                     
-                    logger.info(f"💰 REGULAR BOT GAME - Winner {winner_id} gets full payout, no commission involved")
+                    hot_logger.info("💰 REGULAR BOT GAME - Winner %s gets full payout, no commission involved", winner_id)
                 else:
                     # Normal human vs human game with commission
                     commission_rate = await get_bet_commission_rate_fraction()
-                    commission_to_deduct = round_money(game.bet_amount * commission_rate)  # winner commission
+                    commission_to_deduct = commission_for(game.bet_amount, commission_rate)  # winner commission
                     
                     new_winner_frozen = winner["frozen_balance"] - commission_to_deduct
                     new_winner_balance = winner["virtual_balance"]  # virtual_balance не изменяется
@@ -8251,14 +6878,14 @@ async def distribute_game_rewards(game: Game, winner_id: str, commission_amount:
                 is_creator_human_bot = await is_human_bot_user(game.creator_id)
                 is_opponent_human_bot = await is_human_bot_user(game.opponent_id) if game.opponent_id else False
                 
-                logger.info(f"🔍 HUMAN-BOT ANALYSIS: Game {game.id[:8]}... | Creator: {'Human-bot' if is_creator_human_bot else 'Live'} | Opponent: {'Human-bot' if is_opponent_human_bot else 'Live'} | Winner: {'Human-bot' if is_winner_human_bot else 'Live'} | Commission: ${commission_amount}")
+                hot_logger.info("🔍 HUMAN-BOT ANALYSIS: Game %s... | Creator: %s | Opponent: %s | Winner: %s | Commission: $%s", game.id[:8], 'Human-bot' if is_creator_human_bot else 'Live', 'Human-bot' if is_opponent_human_bot else 'Live', 'Human-bot' if is_winner_human_bot else 'Live', commission_amount)
                 
                 # Special handling for Human-bot vs Human-bot games
                 if is_creator_human_bot and is_opponent_human_bot and not is_regular_bot_game and winner_id:
                     # For Human-bot vs Human-bot games, create HUMAN_BOT_COMMISSION entry
                     # Use the actual commission amount that was calculated
                     if commission_amount > 0:
-                        logger.info(f"📊 HUMAN-BOT vs HUMAN-BOT: Creating HUMAN_BOT_COMMISSION entry for ${commission_amount}")
+                        hot_logger.info("📊 HUMAN-BOT vs HUMAN-BOT: Creating HUMAN_BOT_COMMISSION entry for $%s", commission_amount)
                         
                         profit_entry = ProfitEntry(
                             entry_type="HUMAN_BOT_COMMISSION",
@@ -8269,9 +6896,9 @@ async def distribute_game_rewards(game: Game, winner_id: str, commission_amount:
                         )
                         profit_entry_dict = profit_entry.dict()
                         profit_entry_dict["status"] = "CONFIRMED"
-                        await db.profit_entries.insert_one(profit_entry_dict)
+                        await record_profit_entry(profit_entry_dict)
                         
-                        logger.info(f"✅ Created HUMAN_BOT_COMMISSION entry: ${commission_amount} for Human-bot vs Human-bot game")
+                        hot_logger.info("✅ Created HUMAN_BOT_COMMISSION entry: $%s for Human-bot vs Human-bot game", commission_amount)
                 
                 # Handle Human-bot vs Live player games with commission > 0
                 elif not is_regular_bot_game and commission_amount > 0 and winner_id:
@@ -8279,11 +6906,11 @@ async def distribute_game_rewards(game: Game, winner_id: str, commission_amount:
                     if is_winner_human_bot:
                         # Human-bot wins against live player -> HUMAN_BOT_COMMISSION
                         entry_type = "HUMAN_BOT_COMMISSION"
-                        logger.info(f"📊 HUMAN-BOT WINS: Creating HUMAN_BOT_COMMISSION entry for ${commission_amount}")
+                        hot_logger.info("📊 HUMAN-BOT WINS: Creating HUMAN_BOT_COMMISSION entry for $%s", commission_amount)
                     else:
                         # Live player wins against Human-bot -> BET_COMMISSION
                         entry_type = "BET_COMMISSION"
-                        logger.info(f"📊 LIVE PLAYER WINS vs HUMAN-BOT: Creating BET_COMMISSION entry for ${commission_amount}")
+                        hot_logger.info("📊 LIVE PLAYER WINS vs HUMAN-BOT: Creating BET_COMMISSION entry for $%s", commission_amount)
                     
                     # Create appropriate profit entry
                     if entry_type == "HUMAN_BOT_COMMISSION":
@@ -8296,9 +6923,9 @@ async def distribute_game_rewards(game: Game, winner_id: str, commission_amount:
                         )
                         profit_entry_dict = profit_entry.dict()
                         profit_entry_dict["status"] = "CONFIRMED"
-                        await db.profit_entries.insert_one(profit_entry_dict)
+                        await record_profit_entry(profit_entry_dict)
                         
-                        logger.info(f"✅ Created HUMAN_BOT_COMMISSION entry: ${commission_amount} for Human-bot win")
+                        hot_logger.info("✅ Created HUMAN_BOT_COMMISSION entry: $%s for Human-bot win", commission_amount)
                     else:
                         # BET_COMMISSION for live player win
                         profit_entry = ProfitEntry(
@@ -8310,14 +6937,14 @@ async def distribute_game_rewards(game: Game, winner_id: str, commission_amount:
                         )
                         profit_entry_dict = profit_entry.dict()
                         profit_entry_dict["status"] = "CONFIRMED"
-                        await db.profit_entries.insert_one(profit_entry_dict)
+                        await record_profit_entry(profit_entry_dict)
                         
-                        logger.info(f"✅ Created BET_COMMISSION entry: ${commission_amount} for live player win")
+                        hot_logger.info("✅ Created BET_COMMISSION entry: $%s for live player win", commission_amount)
                         
                 # Handle games between live players (no Human-bots involved)
                 elif not is_regular_bot_game and not is_creator_human_bot and not is_opponent_human_bot and commission_amount > 0 and winner_id:
                     # Live player vs Live player -> BET_COMMISSION
-                    logger.info(f"📊 LIVE vs LIVE: Creating BET_COMMISSION entry for ${commission_amount}")
+                    hot_logger.info("📊 LIVE vs LIVE: Creating BET_COMMISSION entry for $%s", commission_amount)
                     
                     profit_entry = ProfitEntry(
                         entry_type="BET_COMMISSION",
@@ -8328,12 +6955,12 @@ async def distribute_game_rewards(game: Game, winner_id: str, commission_amount:
                     )
                     profit_entry_dict = profit_entry.dict()
                     profit_entry_dict["status"] = "CONFIRMED"
-                    await db.profit_entries.insert_one(profit_entry_dict)
+                    await record_profit_entry(profit_entry_dict)
                     
-                    logger.info(f"✅ Created BET_COMMISSION entry: ${commission_amount} for live player PvP")
+                    hot_logger.info("✅ Created BET_COMMISSION entry: $%s for live player PvP", commission_amount)
                     
             except Exception as e:
-                logger.error(f"❌ Error in HUMAN-BOT COMMISSION LOGIC: {e}")
+                logger.error("❌ Error in HUMAN-BOT COMMISSION LOGIC: %s", e)
             
             # **CORRECTED COMMISSION LOGIC according to new table:**
             # For ALL game types (except Regular bot): ONLY WINNER pays commission
@@ -8352,8 +6979,8 @@ async def distribute_game_rewards(game: Game, winner_id: str, commission_amount:
                     if human_bot:
                         # Return commission directly to Human-bot
                         commission_rate = await get_bet_commission_rate_fraction()
-                        loser_commission = round_money(game.bet_amount * commission_rate)
-                        logger.info(f"💰 RETURNING ${loser_commission} commission to Human-bot {human_bot['name']}")
+                        loser_commission = commission_for(game.bet_amount, commission_rate)
+                        hot_logger.info("💰 RETURNING $%s commission to Human-bot %s", loser_commission, human_bot['name'])
                         
                         await db.human_bots.update_one(
                             {"id": loser_id},
@@ -8362,16 +6989,16 @@ async def distribute_game_rewards(game: Game, winner_id: str, commission_amount:
                                 "$set": {"updated_at": datetime.utcnow()}
                             }
                         )
-                        logger.info(f"Commission returned to Human-bot {human_bot['name']}")
+                        hot_logger.info("Commission returned to Human-bot %s", human_bot['name'])
                         # Skip the rest of the processing for this loser since it's handled
                         loser = None  # Ensure we don't process this as a regular user
                 
                 if loser:
                     # This is a human player, handle normally
                     commission_rate = await get_bet_commission_rate_fraction()
-                    loser_commission = round_money(game.bet_amount * commission_rate)
+                    loser_commission = commission_for(game.bet_amount, commission_rate)
                     
-                    logger.info(f"💰 RETURNING ${loser_commission} commission to LOSER {loser_id} (virtual_balance: {loser.get('virtual_balance', 0)} -> {loser.get('virtual_balance', 0) + loser_commission})")
+                    hot_logger.info("💰 RETURNING $%s commission to LOSER %s (virtual_balance: %s -> %s)", loser_commission, loser_id, loser.get('virtual_balance', 0), loser.get('virtual_balance', 0) + loser_commission)
                     
                     await db.users.update_one(
                         {"id": loser_id},
@@ -8397,7 +7024,7 @@ async def distribute_game_rewards(game: Game, winner_id: str, commission_amount:
                     )
                     await db.transactions.insert_one(commission_return_transaction.dict())
                     
-                logger.info(f"💰 COMMISSION LOGIC: Winner pays ${commission_amount}, Loser gets ${loser_commission} returned")
+                hot_logger.info("💰 COMMISSION LOGIC: Winner pays $%s, Loser gets $%s returned", commission_amount, loser_commission)
             
         else:
             # Draw - return frozen commissions to both players (only if commission was charged)
@@ -8412,8 +7039,8 @@ async def distribute_game_rewards(game: Game, winner_id: str, commission_amount:
                         if human_bot:
                             # Return commission directly to Human-bot
                             commission_rate = await get_bet_commission_rate_fraction()
-                            commission_to_return = round_money(game.bet_amount * commission_rate)
-                            logger.info(f"DRAW - Returning {commission_to_return} commission to Human-bot {human_bot['name']}")
+                            commission_to_return = commission_for(game.bet_amount, commission_rate)
+                            hot_logger.info("DRAW - Returning %s commission to Human-bot %s", commission_to_return, human_bot['name'])
                             
                             await db.human_bots.update_one(
                                 {"id": player_id},
@@ -8427,9 +7054,9 @@ async def distribute_game_rewards(game: Game, winner_id: str, commission_amount:
                     # Process commission return for human players only
                     if player:
                         commission_rate = await get_bet_commission_rate_fraction()
-                        commission_to_return = round_money(game.bet_amount * commission_rate)
+                        commission_to_return = commission_for(game.bet_amount, commission_rate)
                         
-                        logger.info(f"DRAW - Returning {commission_to_return} commission to player {player_id} (virtual_balance: {player.get('virtual_balance', 0)} -> {player.get('virtual_balance', 0) + commission_to_return})")
+                        hot_logger.info("DRAW - Returning %s commission to player %s (virtual_balance: %s -> %s)", commission_to_return, player_id, player.get('virtual_balance', 0), player.get('virtual_balance', 0) + commission_to_return)
                         
                         await db.users.update_one(
                             {"id": player_id},
@@ -8464,16 +7091,49 @@ async def distribute_game_rewards(game: Game, winner_id: str, commission_amount:
                 await db.transactions.insert_one(transaction.dict())
         
         # Update independent counters for Human-bot games
-        await update_independent_counters(game, winner_id, commission_amount)
+        await outbox.enqueue([outbox_task("human_bot_counters", game.id, {
+            "game_id": game.id, "winner_id": winner_id, "commission_amount": commission_amount
+        })])
+        mark_user_directory_dirty(game.creator_id, game.opponent_id)
         
         
         updated_game = await db.games.find_one({"id": game.id})
         return Game(**updated_game).dict()
             
     except Exception as e:
-        logger.error(f"Error distributing game rewards: {e}")
+        logger.error("Error distributing game rewards: %s", e)
         raise
 
+# The global counters see every Human-bot game. Increments are spread over shard
+# documents keyed by game id, so no single document takes every write; readers sum
+# the legacy {"type": "global"} document and the shards.
+HUMAN_BOT_COUNTER_SHARDS = 16
+
+def human_bot_counter_shard(game_id: str) -> dict:
+    return {"type": "global_shard", "shard": zlib.crc32(game_id.encode()) % HUMAN_BOT_COUNTER_SHARDS}
+
+async def read_human_bot_counters() -> dict:
+    """Sum of the global Human-bot counters over the legacy document and the shards."""
+    totals = await db.human_bot_counters.aggregate([
+        {"$match": {"type": {"$in": ["global", "global_shard"]}}},
+        {"$group": {
+            "_id": None,
+            "total_games_played": {"$sum": "$total_games_played"},
+            "period_revenue": {"$sum": "$period_revenue"}
+        }}
+    ]).to_list(1)
+    totals = totals[0] if totals else {}
+    return {
+        "total_games_played": totals.get("total_games_played", 0),
+        "period_revenue": totals.get("period_revenue", 0.0)
+    }
+
+async def set_human_bot_counter(field: str, value: Any):
+    """Set a global Human-bot counter: the value goes to the legacy document, the shards are zeroed."""
+    now = datetime.utcnow()
+    await db.human_bot_counters.update_one({"type": "global"}, {"$set": {field: value, "updated_at": now}}, upsert=True)
+    await db.human_bot_counters.update_many({"type": "global_shard"}, {"$set": {field: 0, "updated_at": now}})
+
 async def update_independent_counters(game: Game, winner_id: str, commission_amount: float):
     """Update independent counters for Human-bot statistics."""
     try:
@@ -8483,36 +7143,290 @@ async def update_independent_counters(game: Game, winner_id: str, commission_amo
         
         if creator_is_human_bot or opponent_is_human_bot:
             # Update total games counter
-            await db.human_bot_counters.update_one(
-                {"type": "global"},
-                {
-                    "$inc": {"total_games_played": 1},
-                    "$set": {"updated_at": datetime.utcnow()}
-                },
-                upsert=True
-            )
+            inc = {"total_games_played": 1}
             
             # Update period revenue counter ONLY if Human-bot wins and gets commission
-            if commission_amount > 0 and winner_id:
-                # Check if the winner is a Human-bot
-                winner_is_human_bot = await is_human_bot_user(winner_id)
-                if winner_is_human_bot:
-                    # Only count commission when Human-bot wins (matching HUMAN_BOT_COMMISSION logic)
-                    await db.human_bot_counters.update_one(
-                        {"type": "global"},
-                        {
-                            "$inc": {"period_revenue": commission_amount},
-                            "$set": {"updated_at": datetime.utcnow()}
-                        },
-                        upsert=True
-                    )
-                    logger.info(f"Updated period_revenue: +${commission_amount} for Human-bot winner")
+            # (matching HUMAN_BOT_COMMISSION logic)
+            if commission_amount > 0 and winner_id and await is_human_bot_user(winner_id):
+                inc["period_revenue"] = commission_amount
+            
+            # The shard document is created first: the once-per-game filter can't upsert
+            shard = human_bot_counter_shard(game.id)
+            await db.human_bot_counters.update_one(
+                shard, {"$setOnInsert": {"total_games_played": 0, "period_revenue": 0.0}}, upsert=True
+            )
+            await db.human_bot_counters.update_one(*apply_once(
+                shard,
+                {"$inc": inc, "$set": {"updated_at": datetime.utcnow()}},
+                game.id
+            ))
+            if "period_revenue" in inc:
+                hot_logger.info("Updated period_revenue: +$%s for Human-bot winner", commission_amount)
                 
-        logger.info(f"Updated independent counters for game {game.id}")
+        hot_logger.info("Updated independent counters for game %s", game.id)
         
     except Exception as e:
-        logger.error(f"Error updating independent counters: {e}")
-        # Don't raise - this is a non-critical operation
+        logger.error("Error updating independent counters: %s", e)
+        raise
+
+# ==============================================================================
+# POST-GAME OUTBOX
+# ==============================================================================
+
+# Side effects of a settled game that the players don't wait for. Each task is keyed by
+# kind and game id, so a settlement that is retried doesn't queue the same effect twice.
+# Handlers that $inc counters write the game id in the same update (apply_once), and
+# notifications carry a dedupe key, so a task retried after a failure only redoes what it
+# missed; the flag on the game is set once the whole effect has been applied and lets
+# later deliveries skip it.
+
+async def pending_game_effect(game_id: str, flag: str) -> Optional[dict]:
+    """The game, unless the effect behind `flag` has already been applied in full."""
+    return await db.games.find_one({"id": game_id, flag: {"$ne": True}}, {"_id": 0})
+
+async def finish_game_effect(game_id: str, flag: str):
+    await db.games.update_one({"id": game_id}, {"$set": {flag: True}})
+
+@email_outbox.handler("email")
+async def send_queued_email(email: dict):
+    await deliver_email(email)
+
+async def queue_email(email: dict, token: str):
+    """Persist a rendered email for the sender; the key is the token digest, never the token."""
+    await email_outbox.enqueue([outbox_task("email", hash_token(token), email)])
+
+@outbox.handler("match_result_notifications")
+async def send_match_result_notifications(task: dict):
+    """Send match result notifications to both players."""
+    game = await pending_game_effect(task["game_id"], "result_notified")
+    if not game:
+        return
+    game_obj = Game(**game)
+    game_id = game_obj.id
+    winner_id = task["winner_id"]
+    result_status = task["result_status"]
+    commission_amount = task["commission_amount"]
+    is_regular_bot_game = task["is_regular_bot_game"]
+    
+    creator_name = await get_user_name_for_notification(game_obj.creator_id)
+    opponent_name = await get_user_name_for_notification(game_obj.opponent_id)
+    
+    # Determine winnings/losses for notifications
+    total_pot = game_obj.bet_amount * 2 if not is_regular_bot_game else game_obj.bet_amount
+    winnings = total_pot - commission_amount if winner_id else 0
+
+    # Compute gem values for each side for payload (in "Gems" units)
+    def _calc_gems_value(gems):
+        try:
+            total = 0.0
+            if isinstance(gems, dict):
+                for gtype, qty in gems.items():
+                    price = GEM_PRICES.get(str(gtype), 0)
+                    total += float(qty) * float(price)
+            elif isinstance(gems, list):
+                for item in gems:
+                    if isinstance(item, dict):
+                        gtype = item.get('type') or item.get('gem_type') or item.get('name')
+                        qty = item.get('quantity') or item.get('qty') or 0
+                        price = GEM_PRICES.get(str(gtype), 0)
+                        total += float(qty) * float(price)
+            return round(total)
+        except Exception:
+            return round(game_obj.bet_amount)
+
+    creator_gems_value = _calc_gems_value(game_obj.bet_gems)
+    opponent_gems_value = _calc_gems_value(game_obj.opponent_gems) if getattr(game_obj, 'opponent_gems', None) else round(game_obj.bet_amount)
+
+    # Commission percent to expose in payload (integer)
+    try:
+        commission_rate_curr = await get_bet_commission_rate_fraction()
+    except Exception:
+        commission_rate_curr = 0.03
+    commission_percent_int = int(round(commission_rate_curr * 100))
+
+    # Bot flags
+    is_bot_game_flag = bool(getattr(game_obj, 'is_bot_game', False) or getattr(game_obj, 'bot_id', None) or (getattr(game_obj, 'creator_type', '') in ['bot','human_bot']) or (getattr(game_obj, 'opponent_type', '') in ['bot','human_bot']))
+    is_human_bot_flag = (getattr(game_obj, 'bot_type', None) == 'HUMAN') or (getattr(game_obj, 'creator_type', '') == 'human_bot') or (getattr(game_obj, 'opponent_type', '') == 'human_bot')
+    
+    # Send notification to creator
+    if result_status == "creator_wins":
+        total_gems_won = game_obj.bet_amount * 2  # Total before commission
+        creator_payload = NotificationPayload(
+            game_id=game_id,
+            opponent_name=opponent_name,
+            result="won",
+            outcome="win",
+            amount_won=winnings,
+            total_gems=total_gems_won,
+            commission=commission_amount,
+            action_url="/games/history",
+            player_move=str(game_obj.creator_move.value if game_obj.creator_move else ''),
+            opponent_move=str(game_obj.opponent_move.value if game_obj.opponent_move else ''),
+            player_bet_gems=creator_gems_value,
+            opponent_bet_gems=opponent_gems_value,
+            commission_percent=commission_percent_int,
+            commission_amount_usd=float(commission_amount),
+            is_bot_game=is_bot_game_flag,
+            is_human_bot=is_human_bot_flag
+        )
+        opponent_payload = NotificationPayload(
+            game_id=game_id,
+            opponent_name=creator_name,
+            opponent_id=game_obj.creator_id,
+            result="lost",
+            outcome="lose",
+            amount_lost=game_obj.bet_amount,
+            commission=0.0,  # Loser doesn't pay commission in new system
+            action_url="/games/history",
+            player_move=str(game_obj.opponent_move.value if game_obj.opponent_move else ''),
+            opponent_move=str(game_obj.creator_move.value if game_obj.creator_move else ''),
+            player_bet_gems=opponent_gems_value,
+            opponent_bet_gems=creator_gems_value,
+            commission_percent=commission_percent_int,
+            commission_amount_usd=0.0,
+            is_bot_game=is_bot_game_flag,
+            is_human_bot=is_human_bot_flag
+        )
+    elif result_status == "opponent_wins":
+        total_gems_won = game_obj.bet_amount * 2  # Total before commission
+        creator_payload = NotificationPayload(
+            game_id=game_id,
+            opponent_name=opponent_name,
+            opponent_id=game_obj.opponent_id,
+            result="lost",
+            outcome="lose",
+            amount_lost=game_obj.bet_amount,
+            commission=0.0,  # Loser doesn't pay commission in new system
+            action_url="/games/history",
+            player_move=str(game_obj.creator_move.value if game_obj.creator_move else ''),
+            opponent_move=str(game_obj.opponent_move.value if game_obj.opponent_move else ''),
+            player_bet_gems=creator_gems_value,
+            opponent_bet_gems=opponent_gems_value,
+            commission_percent=commission_percent_int,
+            commission_amount_usd=0.0,
+            is_bot_game=is_bot_game_flag,
+            is_human_bot=is_human_bot_flag
+        )
+        opponent_payload = NotificationPayload(
+            game_id=game_id,
+            opponent_name=creator_name,
+            result="won",
+            outcome="win",
+            amount_won=winnings,
+            total_gems=total_gems_won,
+            commission=commission_amount,
+            action_url="/games/history",
+            player_move=str(game_obj.opponent_move.value if game_obj.opponent_move else ''),
+            opponent_move=str(game_obj.creator_move.value if game_obj.creator_move else ''),
+            player_bet_gems=opponent_gems_value,
+            opponent_bet_gems=creator_gems_value,
+            commission_percent=commission_percent_int,
+            commission_amount_usd=float(commission_amount),
+            is_bot_game=is_bot_game_flag,
+            is_human_bot=is_human_bot_flag
+        )
+    else:  # draw
+        creator_payload = NotificationPayload(
+            game_id=game_id,
+            opponent_name=opponent_name,
+            opponent_id=game_obj.opponent_id,
+            result="draw",
+            outcome="draw",
+            amount=game_obj.bet_amount,
+            commission=0.0,  # No commission for draws
+            action_url="/games/history",
+            player_move=str(game_obj.creator_move.value if game_obj.creator_move else ''),
+            opponent_move=str(game_obj.opponent_move.value if game_obj.opponent_move else ''),
+            player_bet_gems=creator_gems_value,
+            opponent_bet_gems=opponent_gems_value,
+            commission_percent=commission_percent_int,
+            commission_amount_usd=0.0,
+            is_bot_game=is_bot_game_flag,
+            is_human_bot=is_human_bot_flag
+        )
+        opponent_payload = NotificationPayload(
+            game_id=game_id,
+            opponent_name=creator_name,
+            opponent_id=game_obj.creator_id,
+            result="draw",
+            outcome="draw",
+            amount=game_obj.bet_amount,
+            commission=0.0,  # No commission for draws
+            action_url="/games/history",
+            player_move=str(game_obj.opponent_move.value if game_obj.opponent_move else ''),
+            opponent_move=str(game_obj.creator_move.value if game_obj.creator_move else ''),
+            player_bet_gems=opponent_gems_value,
+            opponent_bet_gems=creator_gems_value,
+            commission_percent=commission_percent_int,
+            commission_amount_usd=0.0,
+            is_bot_game=is_bot_game_flag,
+            is_human_bot=is_human_bot_flag
+        )
+    
+    # Send notifications to both players; the dedupe key keeps a retried task from sending one twice
+    await create_notification(
+        user_id=game_obj.creator_id,
+        notification_type=NotificationTypeEnum.MATCH_RESULT,
+        payload=creator_payload,
+        priority=NotificationPriorityEnum.INFO,
+        dedupe_key=f"match_result:{game_id}:{game_obj.creator_id}"
+    )
+    
+    await create_notification(
+        user_id=game_obj.opponent_id,
+        notification_type=NotificationTypeEnum.MATCH_RESULT,
+        payload=opponent_payload,
+        priority=NotificationPriorityEnum.INFO,
+        dedupe_key=f"match_result:{game_id}:{game_obj.opponent_id}"
+    )
+    await finish_game_effect(game_id, "result_notified")
+    
+    logger.info(f"📬 Sent match result notifications for game {game_id}")
+
+@outbox.handler("bot_profit")
+async def apply_bot_profit(task: dict):
+    game = await pending_game_effect(task["game_id"], "bot_profit_recorded")
+    if game:
+        await accumulate_bot_profit(Game(**game), task["winner_id"])
+        await finish_game_effect(game["id"], "bot_profit_recorded")
+
+@outbox.handler("bot_game_stats")
+async def apply_bot_game_stats(task: dict):
+    game = await db.games.find_one({"id": task["game_id"]}, {"_id": 0})
+    if not game:
+        return
+    await record_bot_game_settlement(game)
+    if game.get("is_bot_game") and game.get("bot_id") and not game.get("bot_cycle_tracked"):
+        await update_bot_cycle_tracking(game["bot_id"], task["winner_id"] == game["bot_id"], game["id"])
+        await finish_game_effect(game["id"], "bot_cycle_tracked")
+
+@outbox.handler("player_stats")
+async def apply_player_stats(task: dict):
+    game = await pending_game_effect(task["game_id"], "player_stats_recorded")
+    if not game:
+        return
+    # Only registered players are ranked; bots are not in users
+    player_ids = [player_id for player_id in (game.get("creator_id"), game.get("opponent_id")) if player_id]
+    players = {
+        user["id"]: user.get("username")
+        async for user in db.users.find({"id": {"$in": player_ids}}, {"_id": 0, "id": 1, "username": 1})
+    }
+    await leaderboard.record_game(game, task["winner_id"], players)
+    await finish_game_effect(game["id"], "player_stats_recorded")
+    mark_user_directory_dirty(*players)
+
+@outbox.handler("human_bot_outcome")
+async def apply_human_bot_outcome_task(task: dict):
+    if await pending_game_effect(task["game_id"], "human_bot_outcome_recorded"):
+        await process_human_bot_game_outcome(task["game_id"], task["winner_id"])
+        await finish_game_effect(task["game_id"], "human_bot_outcome_recorded")
+
+@outbox.handler("human_bot_counters")
+async def apply_human_bot_counters(task: dict):
+    game = await pending_game_effect(task["game_id"], "human_bot_counters_recorded")
+    if game:
+        await update_independent_counters(Game(**game), task["winner_id"], task["commission_amount"])
+        await finish_game_effect(game["id"], "human_bot_counters_recorded")
 
 # ==============================================================================
 # ==============================================================================
@@ -9130,12 +8044,12 @@ async def accumulate_bot_profit(game: Game, winner_id: str):
                     bot_won = (winner_id == game.opponent_id)
         
         if not bot_id:
-            logger.warning(f"No regular bot found in game {game.id}")
+            logger.warning("No regular bot found in game %s", game.id)
             return
         
         bot = await db.bots.find_one({"id": bot_id})
         if not bot:
-            logger.error(f"Bot {bot_id} not found")
+            logger.error("Bot %s not found", bot_id)
             return
         
         cycle_length = bot.get("cycle_games", 16)
@@ -9177,64 +8091,58 @@ async def accumulate_bot_profit(game: Game, winner_id: str):
         
         bet_amount = game.bet_amount
         
-        # ИСПРАВЛЕНО: Накопление с total_spent и прямыми суммами по категориям
-        new_total_spent = accumulator.get("total_spent", 0.0) + bet_amount  # ОСТАВЛЯЕМ
-        new_wins_amount = accumulator.get("wins_amount", 0.0)
-        new_losses_amount = accumulator.get("losses_amount", 0.0)
-        new_draws_amount = accumulator.get("draws_amount", 0.0)
-        new_games_won = accumulator.get("games_won", 0)
-        new_games_lost = accumulator.get("games_lost", 0)
-        new_games_drawn = accumulator.get("games_drawn", 0)
-        
         # ИСПРАВЛЕНО: Простое накопление сумм по категориям (БЕЗ сложной логики earned)
         if is_draw:
-            new_draws_amount += bet_amount
-            new_games_drawn += 1
+            outcome_inc = {"draws_amount": bet_amount, "games_drawn": 1}
             result_text = "DRAW"
         elif bot_won:
-            new_wins_amount += bet_amount
-            new_games_won += 1
+            outcome_inc = {"wins_amount": bet_amount, "games_won": 1}
             result_text = "WIN"
         else:
-            new_losses_amount += bet_amount
-            new_games_lost += 1
+            outcome_inc = {"losses_amount": bet_amount, "games_lost": 1}
             result_text = "LOSS"
         
-        new_games_completed = new_games_won + new_games_lost + new_games_drawn
-        
-        await db.bot_profit_accumulators.update_one(
+        # $inc вместе с отметкой игры: повтор задачи outbox не учитывает игру дважды
+        query, update = apply_once(
             {"id": accumulator.get("id")},
             {
-                "$set": {
-                    "total_spent": new_total_spent,  # ОСТАВЛЯЕМ
-                    # УДАЛЕНО: total_earned
-                    "wins_amount": new_wins_amount,
-                    "losses_amount": new_losses_amount,
-                    "draws_amount": new_draws_amount,
-                    "games_completed": new_games_completed,
-                    "games_won": new_games_won,
-                    "games_lost": new_games_lost,
-                    "games_drawn": new_games_drawn,
-                    "updated_at": datetime.utcnow()
-                }
-            }
+                "$inc": {"total_spent": bet_amount, "games_completed": 1, **outcome_inc},
+                "$set": {"updated_at": datetime.utcnow()}
+            },
+            game.id
         )
+        accumulator = await db.bot_profit_accumulators.find_one_and_update(
+            query, update, return_document=ReturnDocument.AFTER
+        )
+        if not accumulator:
+            return
+        
+        new_total_spent = accumulator.get("total_spent", 0.0)
+        new_wins_amount = accumulator.get("wins_amount", 0.0)
+        new_losses_amount = accumulator.get("losses_amount", 0.0)
+        new_draws_amount = accumulator.get("draws_amount", 0.0)
+        new_games_won = accumulator.get("games_won", 0)
+        new_games_lost = accumulator.get("games_lost", 0)
+        new_games_drawn = accumulator.get("games_drawn", 0)
+        new_games_completed = accumulator.get("games_completed", 0)
         
         # ИСПРАВЛЕНО: Прямой расчёт прибыли
         direct_profit = new_wins_amount - new_losses_amount
         total_cycle_amount = new_wins_amount + new_losses_amount + new_draws_amount
         
-        logger.info(f"🤖 Bot {bot_id} {result_text}: {new_games_completed}/{cycle_length} games "
-                   f"(W:{new_games_won}/L:{new_games_lost}/D:{new_games_drawn}), "
-                   f"total_spent: ${new_total_spent:.0f}, sums: W=${new_wins_amount:.0f}/L=${new_losses_amount:.0f}/D=${new_draws_amount:.0f}, "
-                   f"profit: ${direct_profit:.0f}")
+        hot_logger.info("🤖 Bot %s %s: %s/%s games (W:%s/L:%s/D:%s), "
+                        "total_spent: $%.0f, sums: W=$%.0f/L=$%.0f/D=$%.0f, profit: $%.0f",
+                        bot_id, result_text, new_games_completed, cycle_length,
+                        new_games_won, new_games_lost, new_games_drawn,
+                        new_total_spent, new_wins_amount, new_losses_amount, new_draws_amount, direct_profit)
         
         # ИСПРАВЛЕНО: Убираем преждевременное завершение цикла
         # Цикл должен завершаться только через maintain_all_bots_active_bets() 
         # когда ВСЕ игры действительно завершены, а не по счетчику аккумулятора
         
     except Exception as e:
-        logger.error(f"Error accumulating bot profit: {e}")
+        logger.error("Error accumulating bot profit: %s", e)
+        raise
 
 async def complete_bot_cycle(accumulator_id: str, bot_id: str):
     """Завершение цикла бота с прямым расчётом прибыли (ИСПРАВЛЕНО)."""
@@ -9279,6 +8187,7 @@ async def complete_bot_cycle(accumulator_id: str, bot_id: str):
                 }
             }
         )
+        await reset_bot_stats_cycle(bot_id)
         
         accumulator = await db.bot_profit_accumulators.find_one({"id": accumulator_id})
         if accumulator:
@@ -9452,6 +8361,7 @@ async def complete_bot_cycle(accumulator_id: str, bot_id: str):
                 "bot_draws_percentage": round(draws_percentage, 2),
                 "bot_cycle_games": cycle_games,
                 "exact_cycle_total": exact_cycle_total,    # Эталонная сумма цикла
+                "plan_seed": bot_doc.get("cycle_plan_seed"),  # Секретный seed плана, для воспроизведения при аудите
                 "created_by_system_version": "v6.0_strict_consistency",  # ОБНОВЛЕНО: версия с консистентностью
                 "created_at": datetime.utcnow()
             }
@@ -9465,6 +8375,7 @@ async def complete_bot_cycle(accumulator_id: str, bot_id: str):
             if not existing_cycle:
                 try:
                     await db.completed_cycles.insert_one(cycle_data)
+                    await record_bot_cycle_revenue(cycle_data)
                     logger.info(f"✅ Bot {bot_id} cycle #{cycle_number} saved with draws: "
                               f"W:{wins_count}/L:{losses_count}/D:{draws_count}, profit: ${profit:.2f}")
                     
@@ -9728,7 +8639,7 @@ async def get_available_games(current_user: User = Depends(get_current_user)):
                 )  # Identify regular bot games
             })
         
-        return result
+        return MongoJSONResponse(result)
         
     except Exception as e:
         logger.error(f"Error getting live games: {e}")
@@ -9931,7 +8842,7 @@ async def get_my_bets(current_user: User = Depends(get_current_user)):
             
             result.append(game_data)
         
-        return result
+        return MongoJSONResponse(result)
         
     except Exception as e:
         logger.error(f"Error getting user bets: {e}")
@@ -10113,14 +9024,14 @@ async def cancel_game(game_id: str, current_user: User = Depends(get_current_use
     """Cancel a waiting game."""
     try:
         # Get the game
-        game = await db.games.find_one({"id": game_id})
+        game = await db.games.find_one({"id": game_id}, GameView.projection)
         if not game:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Game not found"
             )
         
-        game_obj = Game(**game)
+        game_obj = GameView.from_doc(game)
         
         # Validate permissions
         if game_obj.creator_id != current_user.id:
@@ -10135,18 +9046,24 @@ async def cancel_game(game_id: str, current_user: User = Depends(get_current_use
                 detail="Can only cancel waiting games"
             )
         
-        # Unfreeze creator's gems
-        for gem_type, quantity in game_obj.bet_gems.items():
-            await db.user_gems.update_one(
-                {"user_id": current_user.id, "gem_type": gem_type},
-                {
-                    "$inc": {"frozen_quantity": -quantity},
-                    "$set": {"updated_at": datetime.utcnow()}
-                }
+        # Cancel first: a join that wins the race leaves the game ACTIVE and nothing is refunded
+        now = datetime.utcnow()
+        cancelled = await transition(
+            db.games, game_id, cancellable(current_user.id),
+            {"status": GameStatus.CANCELLED, "cancelled_at": now, "updated_at": now},
+            version=seen_version(game), projection={"_id": 0, "id": 1}, unset=("maintenance_job_id",)
+        )
+        if cancelled is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Game is no longer waiting - it may have been reserved or joined"
             )
         
+        # Unfreeze creator's gems
+        await gem_inventory.unfreeze(current_user.id, game_obj.bet_gems)
+        
         commission_rate = await get_bet_commission_rate_fraction()
-        commission_to_return = round_money(game_obj.bet_amount * commission_rate)
+        commission_to_return = commission_for(game_obj.bet_amount, commission_rate)
         
         await db.users.update_one(
             {"id": current_user.id},
@@ -10159,16 +9076,8 @@ async def cancel_game(game_id: str, current_user: User = Depends(get_current_use
             }
         )
         
-        # Update game status
-        await db.games.update_one(
-            {"id": game_id},
-            {
-                "$set": {
-                    "status": GameStatus.CANCELLED,
-                    "cancelled_at": datetime.utcnow()
-                }
-            }
-        )
+        await release_game_funds(game_id)
+        mark_user_directory_dirty(current_user.id)
         
         return CancelGameResponse(
             success=True,
@@ -10191,14 +9100,14 @@ async def leave_game(game_id: str, current_user: User = Depends(get_current_user
     """Leave an active game as opponent."""
     try:
         # Get the game
-        game = await db.games.find_one({"id": game_id})
+        game = await db.games.find_one({"id": game_id}, GameView.projection)
         if not game:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Game not found"
             )
         
-        game_obj = Game(**game)
+        game_obj = GameView.from_doc(game)
         
         # Validate that user is the opponent
         if game_obj.opponent_id != current_user.id:
@@ -10214,23 +9123,48 @@ async def leave_game(game_id: str, current_user: User = Depends(get_current_user
                 detail="Can only leave active games"
             )
         
+        # Generate NEW commit-reveal data for creator to ensure security
+        new_salt = str(uuid.uuid4())
+        possible_moves = ["rock", "paper", "scissors"]
+        new_move = secrets.choice(possible_moves)  # Generate new random move
+        new_move_hash = hash_move_with_salt(new_move, new_salt)
+        
+        logger.info(f"🔄 Regenerating commit-reveal for creator after opponent left game {game_id}")
+        
+        # Reset game to WAITING status with NEW commit-reveal data before any refund:
+        # if the game settled or timed out meanwhile, nothing is returned twice
+        reset = await transition(
+            db.games, game_id, leavable(current_user.id),
+            {
+                "status": GameStatus.WAITING,
+                "opponent_id": None,
+                "opponent_move": None,
+                "opponent_gems": None,
+                "started_at": None,
+                "active_deadline": None,
+                # NEW commit-reveal data for security
+                "creator_move": new_move,
+                "creator_move_hash": new_move_hash,
+                "creator_salt": new_salt,
+                "updated_at": datetime.utcnow()
+            },
+            version=seen_version(game), projection={"_id": 0, "id": 1}
+        )
+        if reset is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Game is no longer active - it may have already finished"
+            )
+        
         # Unfreeze opponent's gems
         if game_obj.opponent_gems:
-            for gem_type, quantity in game_obj.opponent_gems.items():
-                if quantity > 0:
-                    await db.user_gems.update_one(
-                        {"user_id": current_user.id, "gem_type": gem_type},
-                        {
-                            "$inc": {"frozen_quantity": -quantity},
-                            "$set": {"updated_at": datetime.utcnow()}
-                        }
-                    )
+            await gem_inventory.unfreeze(current_user.id, game_obj.opponent_gems)
         
         # Return opponent's commission (only if not a regular bot game)
         commission_to_return = 0.0
         if not game_obj.is_regular_bot_game:
             commission_rate = await get_bet_commission_rate_fraction()
-            commission_to_return = round_money(game_obj.bet_amount * commission_rate)
+            commission_to_return = commission_for(game_obj.bet_amount, commission_rate)
             
             # Return commission from frozen_balance to virtual_balance
             await db.users.update_one(
@@ -10244,19 +9178,11 @@ async def leave_game(game_id: str, current_user: User = Depends(get_current_user
                 }
             )
         
-        # Generate NEW commit-reveal data for creator to ensure security
-        new_salt = str(uuid.uuid4())
-        possible_moves = ["rock", "paper", "scissors"]
-        new_move = secrets.choice(possible_moves)  # Generate new random move
-        new_move_hash = hash_move_with_salt(new_move, new_salt)
-        
-        logger.info(f"🔄 Regenerating commit-reveal for creator after opponent left game {game_id}")
-        
         # **FIX: Handle creator's commission during bet recreation**
         creator_commission_returned = 0.0
         if not game_obj.is_regular_bot_game:
             commission_rate = await get_bet_commission_rate_fraction()
-            creator_commission_returned = round_money(game_obj.bet_amount * commission_rate)
+            creator_commission_returned = commission_for(game_obj.bet_amount, commission_rate)
             
             # Return creator's frozen commission
             await db.users.update_one(
@@ -10284,25 +9210,8 @@ async def leave_game(game_id: str, current_user: User = Depends(get_current_user
             )
             logger.info(f"💰 Re-frozen ${creator_commission_returned} commission for creator's recreated bet")
         
-        # Reset game to WAITING status with NEW commit-reveal data
-        await db.games.update_one(
-            {"id": game_id},
-            {
-                "$set": {
-                    "status": GameStatus.WAITING,
-                    "opponent_id": None,
-                    "opponent_move": None,
-                    "opponent_gems": None,
-                    "started_at": None,
-                    "active_deadline": None,
-                    # NEW commit-reveal data for security
-                    "creator_move": new_move,
-                    "creator_move_hash": new_move_hash,
-                    "creator_salt": new_salt,
-                    "updated_at": datetime.utcnow()
-                }
-            }
-        )
+        await release_opponent_funds(game_id, current_user.id)
+        mark_user_directory_dirty(current_user.id)
         
         logger.info(f"🚪 User {current_user.username} ({current_user.id}) left game {game_id}, bet recreated with new commit-reveal for creator")
         
@@ -10471,17 +9380,12 @@ async def reset_all_games(current_admin: User = Depends(get_current_admin)):
             game_obj = Game(**game)
             
             # Unfreeze creator's gems
-            for gem_type, quantity in game_obj.bet_gems.items():
-                await db.user_gems.update_one(
-                    {"user_id": game_obj.creator_id, "gem_type": gem_type},
-                    {"$inc": {"frozen_quantity": -quantity}},
-                    upsert=False
-                )
-                total_gems_unfrozen += quantity
+            await gem_inventory.unfreeze(game_obj.creator_id, game_obj.bet_gems)
+            total_gems_unfrozen += sum(normalize_gems(game_obj.bet_gems).values())
             
             # Unfreeze creator's commission
             commission_rate = await get_bet_commission_rate_fraction()
-            creator_commission = round_money(game_obj.bet_amount * commission_rate)
+            creator_commission = commission_for(game_obj.bet_amount, commission_rate)
             await db.users.update_one(
                 {"id": game_obj.creator_id},
                 {
@@ -10496,7 +9400,7 @@ async def reset_all_games(current_admin: User = Depends(get_current_admin)):
             # If game has opponent, unfreeze their funds too
             if game_obj.opponent_id:
                 commission_rate = await get_bet_commission_rate_fraction()
-                opponent_commission = round_money(game_obj.bet_amount * commission_rate)
+                opponent_commission = commission_for(game_obj.bet_amount, commission_rate)
                 await db.users.update_one(
                     {"id": game_obj.opponent_id},
                     {
@@ -10521,10 +9425,7 @@ async def reset_all_games(current_admin: User = Depends(get_current_admin)):
             games_cancelled += 1
         
         # Reset all users' frozen quantities to 0 (safety measure)
-        await db.user_gems.update_many(
-            {"frozen_quantity": {"$gt": 0}},
-            {"$set": {"frozen_quantity": 0}}
-        )
+        await gem_inventory.unfreeze_all()
         
         # Reset all users' frozen balance to 0 (safety measure)
         users_with_frozen = await db.users.find({"frozen_balance": {"$gt": 0}}).to_list(1000)
@@ -10658,68 +9559,25 @@ async def root():
     """API root endpoint."""
     return {"message": "GemPlay API is running!", "version": "1.0.0"}
 
+LEADERBOARD_SYNC_INTERVAL = 5  # seconds between player_stats catch-ups of the sorted sets
+
 @api_router.get("/leaderboard/{category}", response_model=dict)
 async def get_leaderboard(category: str, current_user: User = Depends(get_current_user)):
     """Get leaderboard by category (winnings, wins, winrate, games)."""
     try:
-        # Define sort criteria based on category
-        sort_criteria = {
-            "winnings": {"total_amount_won": -1},
-            "wins": {"total_games_won": -1},
-            "winrate": {"win_rate": -1},
-            "games": {"total_games_played": -1}
-        }
-        
-        if category not in sort_criteria:
+        if category not in LEADERBOARD_CATEGORIES:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid category. Use: winnings, wins, winrate, games"
             )
         
-        # Get top users
-        users = await db.users.find(
-            {"status": "ACTIVE"},
-            {
-                "username": 1,
-                "total_amount_won": 1,
-                "total_games_won": 1,
-                "total_games_played": 1,
-                "created_at": 1
-            }
-        ).sort(sort_criteria[category]).limit(100).to_list(100)
-        
-        # Calculate win rates and add ranks
-        leaderboard = []
-        for idx, user_data in enumerate(users):
-            win_rate = 0
-            if user_data.get("total_games_played", 0) > 0:
-                win_rate = round((user_data.get("total_games_won", 0) / user_data["total_games_played"]) * 100, 1)
-            
-            leaderboard.append({
-                "rank": idx + 1,
-                "user_id": user_data["id"],
-                "username": user_data["username"],
-                "total_winnings": user_data.get("total_amount_won", 0),
-                "games_won": user_data.get("total_games_won", 0),
-                "games_played": user_data.get("total_games_played", 0),
-                "win_rate": win_rate,
-                "level": min(user_data.get("total_games_played", 0) // 10 + 1, 50),  # Level based on games played
-                "favorite_gem": ["Ruby", "Emerald", "Sapphire", "Diamond", "Topaz"][idx % 5]  # Mock favorite gem
-            })
-        
-        # Find current user's rank
-        user_rank = None
-        for idx, entry in enumerate(leaderboard):
-            if entry["user_id"] == current_user.id:
-                user_rank = idx + 1
-                break
-        
-        if user_rank is None:
-            # User not in top 100, calculate approximate rank
-            user_rank = 101  # Placeholder
+        # Top 100 and the caller's true rank come from the sorted sets, not from a users scan
+        leaderboard_rows, user_rank = await asyncio.gather(
+            leaderboard.top(category), leaderboard.rank(category, current_user.id)
+        )
         
         return {
-            "leaderboard": leaderboard,
+            "leaderboard": leaderboard_rows,
             "user_rank": user_rank,
             "category": category
         }
@@ -10957,6 +9815,7 @@ async def update_bot(
         update_fields = {}
         if "name" in bot_data:
             update_fields["name"] = bot_data["name"]
+            update_fields["name_key"] = search_key(bot_data["name"])
         if "is_active" in bot_data:
             update_fields["is_active"] = bot_data["is_active"]
         if "win_rate" in bot_data:
@@ -11373,34 +10232,9 @@ class BotGameLogic:
     @staticmethod
     async def setup_bot_gems(bot_id: str, db):
         """Ensure bot has adequate gems for gameplay."""
-        # Check bot's current gems
-        bot_gems = await db.user_gems.find({"user_id": bot_id}).to_list(100)
-        
-        # Define minimum required gems for each type
+        # Define minimum required gems for each type; one update tops up every type below it
         required_gems = {gem_type.value: 100 for gem_type in GemType}
-        
-        for gem_type, min_quantity in required_gems.items():
-            existing_gem = next((g for g in bot_gems if g["gem_type"] == gem_type), None)
-            
-            if not existing_gem:
-                # Create new gem entry
-                new_gem = UserGem(
-                    user_id=bot_id,
-                    gem_type=gem_type,
-                    quantity=min_quantity
-                )
-                await db.user_gems.insert_one(new_gem.dict())
-            elif existing_gem["quantity"] < min_quantity:
-                # Top up existing gems
-                await db.user_gems.update_one(
-                    {"user_id": bot_id, "gem_type": gem_type},
-                    {
-                        "$set": {
-                            "quantity": min_quantity,
-                            "updated_at": datetime.utcnow()
-                        }
-                    }
-                )
+        await gem_inventory.top_up(bot_id, required_gems)
 
 @api_router.post("/bots/{bot_id}/setup-gems", response_model=dict)
 async def setup_bot_gems(
@@ -11708,28 +10542,10 @@ async def get_bot_stats(
                 detail="Bot not found"
             )
         
-        # Get bot's game statistics
-        total_games = await db.games.count_documents({
-            "$or": [
-                {"creator_id": bot_id},
-                {"opponent_id": bot_id}
-            ],
-            "status": "COMPLETED"
-        })
-        
-        won_games = await db.games.count_documents({
-            "winner_id": bot_id,
-            "status": "COMPLETED"
-        })
-        
-        # Get recent games
-        recent_games = await db.games.find({
-            "$or": [
-                {"creator_id": bot_id},
-                {"opponent_id": bot_id}
-            ],
-            "status": "COMPLETED"
-        }).sort("completed_at", -1).limit(10).to_list(10)
+        # Get bot's game statistics from its bot_stats document
+        lifetime_stats = (await read_bot_stats(bot_id))["lifetime"]
+        total_games = lifetime_stats["games"]
+        won_games = lifetime_stats["wins"]
         
         return {
             "bot_id": bot_id,
@@ -11743,7 +10559,7 @@ async def get_bot_stats(
             "current_cycle_games": bot.get("current_cycle_games", 0),
             "current_cycle_wins": bot.get("current_cycle_wins", 0),
             "last_game_time": bot.get("last_game_time"),
-            "recent_games": len(recent_games)
+            "recent_games": min(total_games, 10)
         }
         
     except HTTPException:
@@ -12195,6 +11011,7 @@ async def full_database_reset(
         # 3. Сохраняем администраторов перед сбросом
         admin_roles = ['SUPER_ADMIN', 'ADMIN', 'MODERATOR']
         admin_users = await db.users.find({"role": {"$in": admin_roles}}).to_list(None)
+        admin_ids = [admin["id"] for admin in admin_users]
         
         logger.info(f"Found {len(admin_users)} admin accounts to preserve")
         
@@ -12234,6 +11051,36 @@ async def full_database_reset(
                 "name": "notifications",
                 "filter": {},
                 "description": "Уведомления"
+            },
+            {
+                "name": "notification_bodies",
+                "filter": {},
+                "description": "Тексты массовых уведомлений"
+            },
+            {
+                "name": "player_stats",
+                "filter": {"user_id": {"$nin": admin_ids}},
+                "description": "Статистика игроков (лидерборд)"
+            },
+            {
+                "name": "gem_inventories",
+                "filter": {"user_id": {"$nin": admin_ids}},
+                "description": "Инвентари гемов"
+            },
+            {
+                "name": "bot_stats",
+                "filter": {},
+                "description": "Статистика ботов"
+            },
+            {
+                "name": "frozen_funds",
+                "filter": {},
+                "description": "Замороженные средства по играм"
+            },
+            {
+                "name": "outbox",
+                "filter": {},
+                "description": "Очередь задач после расчёта игр"
             }
         ]
         
@@ -12292,6 +11139,11 @@ async def full_database_reset(
             user_activity.clear()
             bot_activity_tracker.clear()
             
+            # Ranks of deleted players live in the leaderboard sets, not only in player_stats
+            await leaderboard.reset()
+            # The frozen total is $inc'd separately from the ledger it summarises
+            await _recompute_frozen_totals()
+            
             logger.info("All caches cleared after database reset")
             
         except Exception as e:
@@ -12445,14 +11297,176 @@ async def get_games_list(
             detail="Failed to fetch games list"
         )
 
-GEM_PRICES = {
-    "Ruby": 1.0,
-    "Amber": 2.0,
-    "Topaz": 5.0,
-    "Emerald": 10.0,
-    "Aquamarine": 25.0,
-    "Sapphire": 50.0,
-    "Magic": 100.0
+# ==============================================================================
+# ADMIN USER DIRECTORY (stored sort/search fields + keyset pagination)
+# ==============================================================================
+
+# Computed fields stored on user documents so every /admin/users sort and filter
+# runs in MongoDB on an index:
+#   dir_total_balance  virtual + frozen + gems value
+#   dir_gems_value / dir_gems_count
+#   dir_user_kind      USER / HUMAN_BOT / REGULAR_BOT
+#   dir_role_rank      sort priority used by sort_by=role
+#   dir_bot_active     bot on/off state for bot users
+#   dir_hidden         user record duplicated by a human_bots entry
+#   username_lower / email_lower  anchored prefix search keys
+USER_DIRECTORY_REFRESH_INTERVAL = 2  # seconds between dirty-set flushes
+USER_DIRECTORY_SWEEP_INTERVAL = 600  # full recompute safety net
+user_directory_dirty_ids: set = set()
+
+def mark_user_directory_dirty(*user_ids: Optional[str]):
+    """Queue users whose balances/gems changed; flushed in one batch by the refresher."""
+    user_directory_dirty_ids.update(uid for uid in user_ids if uid)
+
+# Game counters on user documents (profile, /admin/users) mirror the player_stats aggregate
+USER_STATS_FIELDS = {
+    "total_games_played": "games_played",
+    "total_games_won": "games_won",
+    "total_games_draw": "games_draw",
+    "total_amount_won": "amount_won",
+}
+
+def _user_directory_pipeline(match: dict) -> list:
+    owned = [{"$ifNull": [f"$_gems.{gem_type}", 0]} for gem_type in GEM_TYPES]
+    return [
+        {"$match": match},
+        {"$project": {
+            "id": 1, "username": 1, "email": 1, "role": 1, "virtual_balance": 1, "frozen_balance": 1,
+            **{field: 1 for field in USER_STATS_FIELDS}
+        }},
+        {"$lookup": {"from": "gem_inventories", "localField": "id", "foreignField": "user_id", "as": "_gems"}},
+        {"$lookup": {"from": "player_stats", "localField": "id", "foreignField": "user_id", "as": "_stats"}},
+        {"$set": {"_gems": {"$ifNull": [{"$arrayElemAt": ["$_gems.quantity", 0]}, {}]}}},
+        {"$lookup": {"from": "human_bots", "localField": "username", "foreignField": "name", "as": "_human_bot"}},
+        {"$lookup": {"from": "human_bots", "localField": "id", "foreignField": "id", "as": "_human_bot_self"}},
+        {"$lookup": {"from": "bots", "localField": "username", "foreignField": "name", "as": "_regular_bot"}},
+        *(
+            {"$lookup": {
+                "from": "games",
+                "let": {"user_id": "$id"},
+                "pipeline": [
+                    {"$match": {"status": {"$in": ["WAITING", "ACTIVE"]}, "$expr": {"$eq": [f"${side}", "$$user_id"]}}},
+                    {"$count": "count"}
+                ],
+                "as": f"_{side}_bets"
+            }}
+            for side in ("creator_id", "opponent_id")
+        ),
+        {"$addFields": {
+            "dir_gems_value": {"$round": [{"$add": [
+                {"$multiply": [quantity, GEM_PRICES[gem_type]]} for gem_type, quantity in zip(GEM_TYPES, owned)
+            ]}, 2]},
+            "dir_gems_count": {"$add": owned},
+            "dir_user_kind": {"$cond": [
+                {"$gt": [{"$size": "$_human_bot"}, 0]}, "HUMAN_BOT",
+                {"$cond": [{"$gt": [{"$size": "$_regular_bot"}, 0]}, "REGULAR_BOT", "USER"]}
+            ]}
+        }},
+        {"$project": {
+            "dir_gems_value": 1,
+            "dir_gems_count": 1,
+            "dir_user_kind": 1,
+            "dir_total_balance": {"$round": [{"$add": [
+                {"$ifNull": ["$virtual_balance", 0]}, {"$ifNull": ["$frozen_balance", 0]}, "$dir_gems_value"
+            ]}, 2]},
+            "dir_role_rank": {"$switch": {"branches": [
+                {"case": {"$eq": ["$dir_user_kind", "REGULAR_BOT"]}, "then": 5},
+                {"case": {"$eq": ["$dir_user_kind", "HUMAN_BOT"]}, "then": 4},
+                {"case": {"$eq": ["$role", "USER"]}, "then": 3},
+                {"case": {"$eq": ["$role", "ADMIN"]}, "then": 2},
+                {"case": {"$eq": ["$role", "SUPER_ADMIN"]}, "then": 1}
+            ], "default": 6}},
+            "dir_bot_active": {"$ifNull": [
+                {"$arrayElemAt": ["$_human_bot.is_active", 0]},
+                {"$ifNull": [{"$arrayElemAt": ["$_regular_bot.is_active", 0]}, False]}
+            ]},
+            "dir_hidden": {"$gt": [{"$size": "$_human_bot_self"}, 0]},
+            "dir_active_bets": {"$add": [
+                {"$ifNull": [{"$arrayElemAt": ["$_creator_id_bets.count", 0]}, 0]},
+                {"$ifNull": [{"$arrayElemAt": ["$_opponent_id_bets.count", 0]}, 0]}
+            ]},
+            "username_lower": {"$toLower": {"$ifNull": ["$username", ""]}},
+            "email_lower": {"$toLower": {"$ifNull": ["$email", ""]}},
+            **{
+                field: {"$ifNull": [{"$arrayElemAt": [f"$_stats.{stat}", 0]}, {"$ifNull": [f"${field}", 0]}]}
+                for field, stat in USER_STATS_FIELDS.items()
+            },
+            "dir_updated_at": "$$NOW"
+        }},
+        {"$merge": {"into": "users", "on": "_id", "whenMatched": "merge", "whenNotMatched": "discard"}}
+    ]
+
+async def refresh_user_directory_fields(user_ids: Optional[List[str]] = None):
+    """Recompute stored directory fields server-side ($merge) for given users or everyone."""
+    match = {"id": {"$in": list(user_ids)}} if user_ids is not None else {}
+    await db.users.aggregate(_user_directory_pipeline(match)).to_list(None)
+
+async def user_directory_refresher_task():
+    """Flush this worker's dirty-user set every few seconds."""
+    while True:
+        try:
+            if user_directory_dirty_ids:
+                batch = list(user_directory_dirty_ids)
+                user_directory_dirty_ids.clear()
+                await refresh_user_directory_fields(batch)
+        except Exception as e:
+            logger.error(f"Error refreshing user directory fields: {e}")
+        await asyncio.sleep(USER_DIRECTORY_REFRESH_INTERVAL)
+
+async def user_directory_sweep_task():
+    """Recompute the directory fields of all users periodically (leader only)."""
+    while True:
+        try:
+            await refresh_user_directory_fields()
+        except Exception as e:
+            logger.error(f"Error sweeping user directory fields: {e}")
+        await asyncio.sleep(USER_DIRECTORY_SWEEP_INTERVAL)
+
+async def ensure_user_directory_indexes():
+    await db.users.create_index([("username_lower", 1)])
+    await db.users.create_index([("email_lower", 1)])
+    await db.users.create_index([("dir_total_balance", 1), ("id", 1)])
+    await db.users.create_index([("dir_role_rank", 1), ("id", 1)])
+    await db.users.create_index([("created_at", 1), ("id", 1)])
+    await db.users.create_index([("virtual_balance", 1), ("id", 1)])
+
+def encode_keyset_cursor(sort_value: Any, last_id: str) -> str:
+    raw = json.dumps([sort_value, last_id], default=lambda v: {"$date": v.isoformat()} if isinstance(v, datetime) else str(v))
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_keyset_cursor(cursor: str) -> tuple:
+    sort_value, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    if isinstance(sort_value, dict) and "$date" in sort_value:
+        sort_value = datetime.fromisoformat(sort_value["$date"])
+    return sort_value, last_id
+
+def keyset_after(field: str, direction: int, sort_value: Any, last_id: str) -> dict:
+    """
+    Filter for rows strictly after (sort_value, id) in the given order. Missing or null
+    sort values come first in ascending order and last in descending order, and range
+    operators never match them, so they are handled explicitly.
+    """
+    op = "$gt" if direction == 1 else "$lt"
+    if sort_value is None:
+        after = [{field: None, "id": {op: last_id}}]
+        if direction == 1:
+            after.append({field: {"$ne": None}})
+        return {"$or": after}
+    after = [
+        {field: {op: sort_value}},
+        {field: sort_value, "id": {op: last_id}}
+    ]
+    if direction == -1:
+        after.append({field: None})
+    return {"$or": after}
+
+USER_DIRECTORY_PROJECTION = {
+    "_id": 0, "id": 1, "username": 1, "email": 1, "role": 1, "status": 1, "gender": 1,
+    "virtual_balance": 1, "frozen_balance": 1, "total_games_played": 1, "total_games_won": 1,
+    "total_games_draw": 1, "created_at": 1, "last_login": 1, "last_activity": 1,
+    "ban_reason": 1, "ban_until": 1,
+    "dir_total_balance": 1, "dir_gems_value": 1, "dir_gems_count": 1, "dir_user_kind": 1,
+    "dir_bot_active": 1, "dir_role_rank": 1
 }
 
 @api_router.get("/admin/users", response_model=dict)
@@ -12470,30 +11484,45 @@ async def get_all_users(
     total_min: Optional[float] = None,    # Фильтр по минимальному TOTAL балансу
     total_max: Optional[float] = None,    # Фильтр по максимальному TOTAL балансу
     exclude_bots: Optional[bool] = False,
+    cursor: Optional[str] = None,  # Keyset-курсор из next_cursor предыдущей страницы
     current_user: User = Depends(get_current_admin)
 ):
-    """Get all users with pagination, filtering and sorting."""
+    """Get all users with pagination, filtering and sorting.
+    
+    Sorting, filtering and search run in MongoDB on stored directory fields.
+    Pass `cursor` (from `next_cursor`) for keyset pagination; `page` still works via skip.
+    """
     try:
         # Build query
-        query = {}
+        query = {"dir_hidden": {"$ne": True}}
         
         if exclude_bots:
             query["bot_type"] = {"$exists": False}
             query["is_bot"] = {"$ne": True}
         
-        if search:
+        prefix = prefix_range(search)
+        if prefix:
             if search_mode == 'name':
-                query["username"] = {"$regex": search, "$options": "i"}
+                query["username_lower"] = prefix
             elif search_mode == 'email':
-                query["email"] = {"$regex": search, "$options": "i"}
+                query["email_lower"] = prefix
             else:
-                query["$or"] = [
-                    {"username": {"$regex": search, "$options": "i"}},
-                    {"email": {"$regex": search, "$options": "i"}}
-                ]
+                query["$or"] = [{"username_lower": prefix}, {"email_lower": prefix}]
+        
+        online_threshold = datetime.utcnow() - timedelta(minutes=5)
+        is_online_expr = {"$cond": [
+            {"$in": ["$dir_user_kind", ["HUMAN_BOT", "REGULAR_BOT"]]},
+            {"$eq": ["$dir_bot_active", True]},
+            {"$and": [
+                {"$ne": ["$status", "BANNED"]},
+                {"$gte": [{"$ifNull": ["$last_activity", datetime(1970, 1, 1)]}, online_threshold]}
+            ]}
+        ]}
         if status:
             if status not in ['ONLINE', 'OFFLINE']:
                 query["status"] = status
+            else:
+                query["$expr"] = is_online_expr if status == 'ONLINE' else {"$not": [is_online_expr]}
             
         if role:
             query["role"] = role
@@ -12506,220 +11535,120 @@ async def get_all_users(
                 balance_filter["$lte"] = balance_max
             query["virtual_balance"] = balance_filter
         
-        # Get total count
-        total = await db.users.count_documents(query)
-        
-        sort_field = "created_at"
-        sort_direction = -1  # По умолчанию desc
-        
-        if sort_by:
-            sort_fields_map = {
-                "name": "username",
-                "email": "email", 
-                "role": None,  # Специальная обработка для role - будем сортировать после определения user_type
-                "status": "status",
-                "online_status": None,  # Специальная обработка для online_status - зависит от типа пользователя
-                "balance": "virtual_balance",
-                "total": None,  # Специальная обработка для total - будем сортировать после расчета
-                "gems": "total_gems_value",  # Сортировка по стоимости гемов
-                "bets": "active_bets_count",  # Сортировка по количеству активных ставок
-                "games": "total_games_played",  # Сортировка по количеству игр
-                "registration_date": "created_at",
-                "last_login": "last_login"
-            }
-            sort_field = sort_fields_map.get(sort_by, "created_at")
-            
-        if sort_order == "asc":
-            sort_direction = 1
-        elif sort_order == "desc":
-            sort_direction = -1
+        if total_min is not None or total_max is not None:
+            total_filter = {}
+            if total_min is not None:
+                total_filter["$gte"] = total_min
+            if total_max is not None:
+                total_filter["$lte"] = total_max
+            query["dir_total_balance"] = total_filter
+        
+        sort_fields_map = {
+            "name": "username_lower",
+            "email": "email_lower",
+            "role": "dir_role_rank",
+            "status": "status",
+            "online_status": "_online_rank",
+            "balance": "virtual_balance",
+            "total": "dir_total_balance",
+            "gems": "dir_gems_value",
+            "bets": "dir_active_bets",
+            "games": "total_games_played",
+            "registration_date": "created_at",
+            "last_login": "last_login"
+        }
+        sort_field = sort_fields_map.get(sort_by, "created_at") if sort_by else "created_at"
+        sort_direction = -1 if sort_order == "desc" else 1
         
-        # Get users with pagination but without sorting if sorting by total
+        total = await db.users.count_documents(query)
         skip = (page - 1) * limit
         
-        sort_by_total = sort_by == "total"
-        sort_by_role = sort_by == "role"
-        sort_by_online_status = sort_by == "online_status"
-        
-        if sort_by_total or sort_by_role or sort_by_online_status:
-            all_users = await db.users.find(query).to_list(None)  # Получаем всех пользователей для правильной сортировки
-        else:
-            users = await db.users.find(query).skip(skip).limit(limit).sort(sort_field, sort_direction).to_list(limit)
-        
-        bots = await db.bots.find({}).to_list(1000)  # Получаем всех обычных ботов
-        human_bots = await db.human_bots.find({}).to_list(1000)  # Получаем всех человеко-ботов
-        
-        bots_by_name = {bot.get("name"): bot for bot in bots}
-        human_bots_by_name = {bot.get("name"): bot for bot in human_bots}
-        
-        # Clean user data and exclude Human-bot duplicates
-        cleaned_users = []
-        users_to_process = all_users if (sort_by_total or sort_by_role or sort_by_online_status) else users
-        
-        # Get list of Human-bot IDs to exclude duplicates
-        human_bot_ids = {bot.get("id") for bot in human_bots}
-        
-        for user in users_to_process:
-            user_id = user.get("id")
-            
-            # Skip users that are actually Human-bots (prevent duplicates)
-            if user_id in human_bot_ids:
-                logger.debug(f"Skipping duplicate user entry for Human-bot ID: {user_id}")
-                continue
-            
-            # Calculate gem statistics from user_gems collection
-            total_gems = 0
-            total_gems_value = 0.0
-            
-            # Get gems from user_gems collection
-            user_gems = await db.user_gems.find({"user_id": user_id}).to_list(100)
-            for gem_doc in user_gems:
-                gem_type = gem_doc.get("gem_type")
-                quantity = gem_doc.get("quantity", 0)
-                price = GEM_PRICES.get(gem_type, 0)
-                total_gems += quantity
-                total_gems_value += quantity * price
-            
-            # Calculate active bets count
+        pipeline = [{"$match": query}]
+        if sort_field == "_online_rank":
+            pipeline.append({"$addFields": {"_online_rank": {"$cond": [is_online_expr, 1, 2]}}})
+        if cursor:
+            sort_value, last_id = decode_keyset_cursor(cursor)
+            pipeline.append({"$match": keyset_after(sort_field, sort_direction, sort_value, last_id)})
+        pipeline.append({"$sort": {sort_field: sort_direction, "id": sort_direction}})
+        if not cursor and skip:
+            pipeline.append({"$skip": skip})
+        pipeline.append({"$limit": limit})
+        pipeline.append({"$project": {**USER_DIRECTORY_PROJECTION, sort_field: 1}})
+        users = await db.users.aggregate(pipeline).to_list(limit)
+        
+        # Active bets for the page only, in one aggregation
+        page_ids = [user["id"] for user in users]
+        active_bets_by_user = defaultdict(int)
+        if page_ids:
             active_bets_pipeline = [
                 {"$match": {
-                    "$or": [
-                        {"creator_id": user_id},
-                        {"opponent_id": user_id}
-                    ],
-                    "status": {"$in": ["WAITING", "ACTIVE"]}
+                    "status": {"$in": ["WAITING", "ACTIVE"]},
+                    "$or": [{"creator_id": {"$in": page_ids}}, {"opponent_id": {"$in": page_ids}}]
                 }},
-                {"$count": "active_bets"}
+                {"$project": {"players": ["$creator_id", "$opponent_id"]}},
+                {"$unwind": "$players"},
+                {"$match": {"players": {"$in": page_ids}}},
+                {"$group": {"_id": "$players", "count": {"$sum": 1}}}
             ]
-            active_bets_result = await db.games.aggregate(active_bets_pipeline).to_list(1)
-            active_bets_count = active_bets_result[0]["active_bets"] if active_bets_result else 0
+            async for row in db.games.aggregate(active_bets_pipeline):
+                active_bets_by_user[row["_id"]] = row["count"]
+        
+        cleaned_users = []
+        for user in users:
+            user_id = user.get("id")
+            user_type = user.get("dir_user_kind") or "USER"
+            online_status = get_user_online_status(user)
+            if user_type == "USER":
+                bot_status = online_status
+            else:
+                bot_status = "ONLINE" if user.get("dir_bot_active") else "OFFLINE"
             
-            # Calculate game statistics
             total_games_played = user.get("total_games_played", 0)
             total_games_won = user.get("total_games_won", 0)
-            total_games_lost = total_games_played - total_games_won
-            total_games_draw = user.get("total_games_draw", 0)
-            
-            username = user.get("username")
-            user_type = "USER"  # По умолчанию обычный пользователь
-            bot_status = None
-            
-            if username in human_bots_by_name:
-                user_type = "HUMAN_BOT"
-                human_bot_info = human_bots_by_name[username]
-                bot_status = "ONLINE" if human_bot_info.get("is_active", False) else "OFFLINE"
-            
-            elif username in bots_by_name:
-                user_type = "REGULAR_BOT" 
-                bot_info = bots_by_name[username]
-                bot_status = "ONLINE" if bot_info.get("is_active", False) else "OFFLINE"
-            
-            if user_type == "USER":
-                bot_status = get_user_online_status(user)
-            
             virtual_bal = float(user.get("virtual_balance") or 0)
             frozen_bal = float(user.get("frozen_balance") or 0)
-            gems_val = float(round(total_gems_value, 2))
+            gems_val = float(user.get("dir_gems_value") or 0)
             
-            cleaned_user = {
-                "id": user.get("id"),
+            cleaned_users.append({
+                "id": user_id,
                 "username": user.get("username"),
                 "email": user.get("email"),
                 "role": user.get("role"),
                 "user_type": user_type,  # Новое поле для типа пользователя
                 "status": user.get("status"),
-                "online_status": get_user_online_status(user),  # Новое поле для онлайн статуса
+                "online_status": online_status,  # Новое поле для онлайн статуса
                 "bot_status": bot_status,  # Статус бота (ONLINE/OFFLINE) или онлайн статус пользователя
                 "gender": user.get("gender"),
                 "virtual_balance": virtual_bal,
                 "frozen_balance": frozen_bal,  # Добавляем замороженный баланс
-                "total_balance": virtual_bal + frozen_bal + gems_val,  # Полный баланс как float для правильной сортировки
+                "total_balance": float(user.get("dir_total_balance", virtual_bal + frozen_bal + gems_val)),
                 "total_games_played": total_games_played,
                 "total_games_won": total_games_won,
-                "total_games_lost": total_games_lost,
-                "total_games_draw": total_games_draw,
-                "total_gems": total_gems,
-                "total_gems_value": round(total_gems_value, 2),
-                "active_bets_count": active_bets_count,
+                "total_games_lost": total_games_played - total_games_won,
+                "total_games_draw": user.get("total_games_draw", 0),
+                "total_gems": int(user.get("dir_gems_count") or 0),
+                "total_gems_value": round(gems_val, 2),
+                "active_bets_count": active_bets_by_user.get(user_id, 0),
                 "created_at": user.get("created_at"),
                 "last_login": user.get("last_login"),
                 "last_activity": user.get("last_activity"),  # Добавляем last_activity для отладки
                 "ban_reason": user.get("ban_reason"),
                 "ban_until": user.get("ban_until")
-            }
-            
-            if total_min is not None and cleaned_user["total_balance"] < total_min:
-                continue
-            if total_max is not None and cleaned_user["total_balance"] > total_max:
-                continue
-            
-            if status in ['ONLINE', 'OFFLINE']:
-                user_online_status = cleaned_user["bot_status"] if cleaned_user["user_type"] in ["HUMAN_BOT", "REGULAR_BOT"] else cleaned_user["online_status"]
-                if status == 'ONLINE' and user_online_status != 'ONLINE':
-                    continue
-                if status == 'OFFLINE' and user_online_status != 'OFFLINE':
-                    continue
-                
-            cleaned_users.append(cleaned_user)
-        
-        seen_usernames = set()
-        unique_users = []
-        for user in cleaned_users:
-            username = user.get("username")
-            if username and username not in seen_usernames:
-                seen_usernames.add(username)
-                unique_users.append(user)
-        
-        cleaned_users = unique_users
-        
-        if sort_by_total or sort_by_role or sort_by_online_status:
-            if sort_by_total:
-                def get_total_balance_safe(x):
-                    val = x.get("total_balance", 0)
-                    try:
-                        if isinstance(val, str):
-                            val = val.replace('$', '').replace(',', '').replace(' ', '')
-                        return float(val) if val is not None else 0.0
-                    except (ValueError, TypeError):
-                        return 0.0
-                
-                cleaned_users.sort(key=get_total_balance_safe, reverse=(sort_direction == -1))
-            elif sort_by_role:
-                def get_role_priority(user):
-                    if user["user_type"] == "REGULAR_BOT":
-                        return 5  # Обычные боты - последние
-                    elif user["user_type"] == "HUMAN_BOT":
-                        return 4  # Human боты
-                    elif user["role"] == "USER":
-                        return 3  # Игроки
-                    elif user["role"] == "ADMIN":
-                        return 2  # Админы
-                    elif user["role"] == "SUPER_ADMIN":
-                        return 1  # Супер Админы - первые
-                    else:
-                        return 6  # Неизвестный тип - в конец
-                
-                cleaned_users.sort(key=get_role_priority, reverse=(sort_direction == -1))
-            elif sort_by_online_status:
-                def get_online_status_priority(user):
-                    status = user["bot_status"] if user["user_type"] in ["HUMAN_BOT", "REGULAR_BOT"] else user["online_status"]
-                    return 1 if status == "ONLINE" else 2
-                
-                cleaned_users.sort(key=get_online_status_priority, reverse=(sort_direction == -1))
-        
-        total = len(cleaned_users)
-        
-        if sort_by_total or sort_by_role or sort_by_online_status:
-            cleaned_users = cleaned_users[skip:skip + limit]
+            })
         
+        next_cursor = None
+        if len(users) == limit:
+            last_user = users[-1]
+            next_cursor = encode_keyset_cursor(last_user.get(sort_field), last_user["id"])
         
-        return {
+        return MongoJSONResponse({
             "users": cleaned_users,
             "total": total,
             "page": page,
             "limit": limit,
-            "pages": (total + limit - 1) // limit
-        }
+            "pages": (total + limit - 1) // limit,
+            "next_cursor": next_cursor
+        })
         
     except Exception as e:
         logger.error(f"Error fetching all users: {e}")
@@ -12822,6 +11751,7 @@ async def create_user(
             },
             "created_at": datetime.utcnow()
         })
+        mark_user_directory_dirty(new_user.id)
 
         return {
             "success": True,
@@ -12916,6 +11846,12 @@ async def update_user(
             {"id": user_id},
             {"$set": update_fields}
         )
+        if "password" in update_fields or update_fields.get("status") == UserStatus.BANNED:
+            await refresh_token_store.revoke_user(user_id)
+        else:
+            await refresh_token_store.update_principal(
+                user_id, {field: update_fields[field] for field in PRINCIPAL_SYNC_FIELDS if field in update_fields}
+            )
         
         # Always log admin action even if no changes
         admin_log = AdminLog(
@@ -12982,6 +11918,7 @@ async def ban_user(
             {"id": user_id},
             {"$set": update_fields}
         )
+        await refresh_token_store.revoke_user(user_id)
         
         # Log admin action
         admin_log = AdminLog(
@@ -13113,6 +12050,7 @@ async def update_user_balance(
             }
         )
         await db.admin_logs.insert_one(admin_log.dict())
+        mark_user_directory_dirty(user_id)
         
         return {"message": "User balance updated successfully"}
         
@@ -13129,20 +12067,11 @@ async def update_user_balance(
 # COMMISSION RATE HELPERS AND MONEY UTILS (centralized)
 # ==============================================================================
 
-def round_money(value: float) -> float:
-    try:
-        return float(f"{float(value):.2f}")
-    except Exception:
-        try:
-            return round(float(value), 2)
-        except Exception:
-            return 0.0
-
 async def get_bet_commission_rate_fraction() -> float:
     """Return bet commission rate as fraction (e.g., 0.03 for 3%)."""
     try:
         settings_doc = await db.admin_settings.find_one({"type": "commission_settings"})
-        rate_percent = settings_doc.get("bet_commission_rate", 3.0) if settings_doc else 3.0
+        rate_percent = settings_doc.get("bet_commission_rate", DEFAULT_COMMISSION_RATE_PERCENT) if settings_doc else DEFAULT_COMMISSION_RATE_PERCENT
         rate = max(0.0, float(rate_percent)) / 100.0
         return rate
     except Exception:
@@ -13152,12 +12081,501 @@ async def get_gift_commission_rate_fraction() -> float:
     """Return gift commission rate as fraction (e.g., 0.03 for 3%)."""
     try:
         settings_doc = await db.admin_settings.find_one({"type": "commission_settings"})
-        rate_percent = settings_doc.get("gift_commission_rate", 3.0) if settings_doc else 3.0
+        rate_percent = settings_doc.get("gift_commission_rate", DEFAULT_COMMISSION_RATE_PERCENT) if settings_doc else DEFAULT_COMMISSION_RATE_PERCENT
         rate = max(0.0, float(rate_percent)) / 100.0
         return rate
     except Exception:
         return 0.03  # default 3.0%
 
+# ==============================================================================
+# PROFIT LEDGER ROLLUPS
+# ==============================================================================
+
+# Daily per-entry_type totals of the profit ledger. Every write to
+# `profit_entries` (and every saved bot cycle) $incs its `profit_rollups`
+# bucket, so dashboard sums read a handful of small documents instead of the
+# whole ledger. Only the partial days at the edges of a window are summed from
+# the raw entries.
+BOT_CYCLE_REVENUE_TYPE = "BOT_CYCLE_REVENUE"  # net_profit of completed_cycles
+PROFIT_EXPENSE_TYPES = ("REFUND", "BONUS", "EXPENSE")
+PROFIT_PERIOD_FORMATS = {"day": "%Y-%m-%d", "week": "%G-W%V", "month": "%Y-%m"}
+PROFIT_ROLLUP_COMPACT_INTERVAL = 3600  # seconds
+PROFIT_ROLLUP_COMPACT_DAYS = 2  # closed days re-derived from the ledger on each pass
+
+def _profit_day(ts: datetime) -> datetime:
+    return datetime(ts.year, ts.month, ts.day)
+
+def profit_period_start(period: str) -> Optional[datetime]:
+    """Start of the rolling window used by the /admin/profit/* `period` parameter."""
+    now = datetime.utcnow()
+    if period == "day":
+        return now - timedelta(days=1)
+    if period == "week":
+        return now - timedelta(weeks=1)
+    if period == "month":
+        return now - timedelta(days=30)
+    return None  # "all"
+
+async def _inc_profit_rollup(entry_type: str, amount: float, ts: datetime) -> None:
+    day = _profit_day(ts)
+    await db.profit_rollups.update_one(
+        {"_id": f"{day:%Y-%m-%d}:{entry_type}"},
+        {
+            "$inc": {"total": float(amount or 0), "count": 1},
+            "$set": {"updated_at": datetime.utcnow()},
+            "$setOnInsert": {"day": day, "entry_type": entry_type}
+        },
+        upsert=True
+    )
+
+async def record_profit_entry(profit_entry_dict: dict) -> None:
+    """Insert a profit ledger entry and add it to its daily rollup."""
+    await db.profit_entries.insert_one(profit_entry_dict)
+    try:
+        await _inc_profit_rollup(
+            profit_entry_dict["entry_type"],
+            profit_entry_dict.get("amount", 0),
+            profit_entry_dict.get("created_at") or datetime.utcnow()
+        )
+    except Exception as e:
+        logger.error(f"Error updating profit rollup: {e}")
+
+async def record_bot_cycle_revenue(cycle_data: dict) -> None:
+    """Add a saved bot cycle's net profit to the BOT_CYCLE_REVENUE rollup."""
+    try:
+        await _inc_profit_rollup(
+            BOT_CYCLE_REVENUE_TYPE,
+            cycle_data.get("net_profit", 0),
+            cycle_data.get("end_time") or datetime.utcnow()
+        )
+    except Exception as e:
+        logger.error(f"Error updating bot cycle revenue rollup: {e}")
+
+def _profit_period_key(granularity: str, date_expr: Any) -> Any:
+    if granularity == "total":
+        return "total"
+    return {"$dateToString": {"format": PROFIT_PERIOD_FORMATS[granularity], "date": date_expr}}
+
+def _profit_ledger_pipelines(types: Optional[List[str]], start: Optional[datetime],
+                             end: Optional[datetime], granularity: str) -> List[tuple]:
+    """Raw-ledger aggregations grouped by (period, entry_type) for [start, end)."""
+    window = {}
+    if start:
+        window["$gte"] = start
+    if end:
+        window["$lt"] = end
+    pipelines = []
+    
+    ledger_types = None if types is None else [t for t in types if t != BOT_CYCLE_REVENUE_TYPE]
+    if ledger_types is None or ledger_types:
+        match = {}
+        if ledger_types is not None:
+            match["entry_type"] = {"$in": ledger_types}
+        if window:
+            match["created_at"] = window
+        pipelines.append((db.profit_entries, [
+            {"$match": match},
+            {"$group": {
+                "_id": {"period": _profit_period_key(granularity, "$created_at"), "entry_type": "$entry_type"},
+                "total": {"$sum": "$amount"},
+                "count": {"$sum": 1}
+            }}
+        ]))
+    
+    if types is None or BOT_CYCLE_REVENUE_TYPE in types:
+        match = {"id": {"$not": {"$regex": "^temp_cycle_"}}}
+        if window:
+            match["end_time"] = window
+        pipelines.append((db.completed_cycles, [
+            {"$match": match},
+            {"$group": {
+                "_id": {"period": _profit_period_key(granularity, "$end_time"), "entry_type": BOT_CYCLE_REVENUE_TYPE},
+                "total": {"$sum": "$net_profit"},
+                "count": {"$sum": 1}
+            }}
+        ]))
+    return pipelines
+
+async def sum_profit(types: Optional[List[str]] = None, start: Optional[datetime] = None,
+                     end: Optional[datetime] = None, granularity: str = "total") -> Dict[str, Any]:
+    """Sum the profit ledger per entry_type over [start, end).
+
+    `types=None` means every type, including BOT_CYCLE_REVENUE. With
+    granularity "total" the result is {entry_type: {"amount", "count"}};
+    with "day", "week" or "month" it is {period: {entry_type: {...}}} in
+    period order. Whole days come from `profit_rollups`, the partial days at
+    either edge from the raw ledger.
+    """
+    if granularity != "total" and granularity not in PROFIT_PERIOD_FORMATS:
+        raise ValueError(f"Unknown granularity: {granularity}")
+    end = end or datetime.utcnow()
+    if start is not None and start >= end:
+        return {}
+    
+    first_full_day = None
+    if start is not None:
+        first_full_day = _profit_day(start)
+        if first_full_day < start:
+            first_full_day += timedelta(days=1)
+    last_full_day = _profit_day(end)  # exclusive
+    
+    raw_windows = []
+    rollup_range = None
+    if first_full_day is not None and first_full_day >= last_full_day:
+        raw_windows.append((start, end))
+    else:
+        if start is not None and start < first_full_day:
+            raw_windows.append((start, first_full_day))
+        rollup_range = {"$lt": last_full_day}
+        if first_full_day is not None:
+            rollup_range["$gte"] = first_full_day
+        if last_full_day < end:
+            raw_windows.append((last_full_day, end))
+    
+    queries = []
+    if rollup_range is not None:
+        match = {"day": rollup_range}
+        if types is not None:
+            match["entry_type"] = {"$in": list(types)}
+        queries.append((db.profit_rollups, [
+            {"$match": match},
+            {"$group": {
+                "_id": {"period": _profit_period_key(granularity, "$day"), "entry_type": "$entry_type"},
+                "total": {"$sum": "$total"},
+                "count": {"$sum": "$count"}
+            }}
+        ]))
+    for window_start, window_end in raw_windows:
+        queries.extend(_profit_ledger_pipelines(types, window_start, window_end, granularity))
+    
+    results = await asyncio.gather(*(collection.aggregate(pipeline).to_list(None) for collection, pipeline in queries))
+    
+    by_period: Dict[str, Dict[str, dict]] = {}
+    for rows in results:
+        for row in rows:
+            bucket = by_period.setdefault(row["_id"]["period"], {}).setdefault(
+                row["_id"]["entry_type"], {"amount": 0.0, "count": 0}
+            )
+            bucket["amount"] += float(row.get("total") or 0)
+            bucket["count"] += int(row.get("count") or 0)
+    
+    if granularity == "total":
+        return by_period.get("total", {})
+    return {period: by_period[period] for period in sorted(by_period)}
+
+def profit_amount(totals: Dict[str, dict], *types: str) -> float:
+    return sum(totals.get(t, {}).get("amount", 0.0) for t in types)
+
+def profit_count(totals: Dict[str, dict], *types: str) -> int:
+    return sum(totals.get(t, {}).get("count", 0) for t in types)
+
+async def compact_profit_rollups(start: Optional[datetime] = None, end: Optional[datetime] = None,
+                                 types: Optional[List[str]] = None) -> int:
+    """Re-derive the daily rollups of whole days in [start, end) from the raw ledger.
+
+    Replaces whatever the incremental path accumulated for those days, so it
+    repairs drift and picks up ledger deletions. Without bounds every day is
+    rebuilt. Returns the number of rollup documents written.
+    """
+    start = _profit_day(start) if start else None
+    end = _profit_day(end) if end else None
+    
+    rows = []
+    for collection, pipeline in _profit_ledger_pipelines(types, start, end, "day"):
+        rows.extend(await collection.aggregate(pipeline).to_list(None))
+    
+    now = datetime.utcnow()
+    operations = []
+    written_ids = []
+    for row in rows:
+        period, entry_type = row["_id"]["period"], row["_id"]["entry_type"]
+        if period is None or entry_type is None:
+            continue
+        rollup_id = f"{period}:{entry_type}"
+        written_ids.append(rollup_id)
+        operations.append(UpdateOne(
+            {"_id": rollup_id},
+            {"$set": {
+                "day": datetime.strptime(period, "%Y-%m-%d"),
+                "entry_type": entry_type,
+                "total": float(row.get("total") or 0),
+                "count": int(row.get("count") or 0),
+                "updated_at": now
+            }},
+            upsert=True
+        ))
+    for i in range(0, len(operations), 500):
+        await db.profit_rollups.bulk_write(operations[i:i + 500], ordered=False)
+    
+    stale_filter = {"_id": {"$nin": written_ids}}
+    day_range = {}
+    if start:
+        day_range["$gte"] = start
+    if end:
+        day_range["$lt"] = end
+    if day_range:
+        stale_filter["day"] = day_range
+    if types is not None:
+        stale_filter["entry_type"] = {"$in": list(types)}
+    await db.profit_rollups.delete_many(stale_filter)
+    
+    return len(operations)
+
+async def profit_rollup_compactor_task():
+    """Backfill the rollups on first start, then keep recent closed days in sync with the ledger."""
+    try:
+        if await db.profit_rollups.estimated_document_count() == 0:
+            written = await compact_profit_rollups(end=_profit_day(datetime.utcnow()) + timedelta(days=1))
+            logger.info(f"📒 Profit rollups backfilled: {written} daily buckets")
+    except Exception as e:
+        logger.error(f"Error backfilling profit rollups: {e}")
+    
+    while True:
+        await asyncio.sleep(PROFIT_ROLLUP_COMPACT_INTERVAL)
+        try:
+            today = _profit_day(datetime.utcnow())
+            await compact_profit_rollups(today - timedelta(days=PROFIT_ROLLUP_COMPACT_DAYS), today)
+        except Exception as e:
+            logger.error(f"Error compacting profit rollups: {e}")
+
+# ==============================================================================
+# FROZEN FUNDS LEDGER
+# ==============================================================================
+
+# One `frozen_funds` document per open game holding the commission and gem
+# value frozen by its live players. Holds are recorded when a player creates or
+# joins a game and released at settlement, cancel, leave and timeout; a global
+# `frozen_funds_totals` document is $inc'd alongside so the total is one read.
+# A periodic sweep drops holds of games closed by paths without a hook (admin
+# resets, bulk cancels), adds holds of games opened by such paths and
+# re-derives the totals.
+FROZEN_FUNDS_ACTIVE_STATUSES = ["WAITING", "ACTIVE", "REVEAL"]
+FROZEN_FUNDS_SWEEP_INTERVAL = 300  # seconds
+
+async def _inc_frozen_totals(commission: float, gem_value: float, holds: int) -> None:
+    await db.frozen_funds_totals.update_one(
+        {"_id": "global"},
+        {
+            "$inc": {"commission": commission, "gem_value": gem_value, "holds": holds},
+            "$set": {"updated_at": datetime.utcnow()}
+        },
+        upsert=True
+    )
+
+async def freeze_game_funds(game: dict, user_id: str, role: str, commission: float, username: Optional[str] = None) -> None:
+    """Record the funds `user_id` froze as creator or opponent of `game`."""
+    try:
+        gem_value = float(game.get("bet_amount", 0) or 0)
+        commission = float(commission or 0)
+        now = datetime.utcnow()
+        hold = {"id": user_id, "username": username, "commission": commission, "gem_value": gem_value}
+        if role == "creator":
+            result = await db.frozen_funds.update_one(
+                {"game_id": game["id"], "creator": {"$exists": False}},
+                {
+                    "$set": {"creator": hold, "status": "WAITING", "updated_at": now},
+                    "$setOnInsert": {
+                        "game_id": game["id"],
+                        "bet_amount": gem_value,
+                        "commission_rate": (commission / gem_value) if gem_value > 0 else 0.0,
+                        "created_at": game.get("created_at") or now
+                    },
+                    "$inc": {"frozen_commission": commission, "gem_value": gem_value},
+                    "$addToSet": {"user_ids": user_id}
+                },
+                upsert=True
+            )
+            frozen = result.upserted_id is not None or result.modified_count > 0
+        else:
+            # Bot-created games have no creator hold, so the opponent may open the document
+            try:
+                result = await db.frozen_funds.update_one(
+                    {"game_id": game["id"], "opponent": None},
+                    {
+                        "$set": {"opponent": hold, "status": "ACTIVE", "updated_at": now},
+                        "$setOnInsert": {
+                            "game_id": game["id"],
+                            "bet_amount": gem_value,
+                            "commission_rate": (commission / gem_value) if gem_value > 0 else 0.0,
+                            "created_at": game.get("created_at") or now
+                        },
+                        "$inc": {"frozen_commission": commission, "gem_value": gem_value},
+                        "$addToSet": {"user_ids": user_id}
+                    },
+                    upsert=True
+                )
+                frozen = result.upserted_id is not None or result.modified_count > 0
+            except DuplicateKeyError:
+                # The game already has an opponent hold
+                frozen = False
+        if frozen:
+            await _inc_frozen_totals(commission, gem_value, 1)
+    except Exception as e:
+        logger.error(f"Error recording frozen funds for game {game.get('id')}: {e}")
+
+async def release_opponent_funds(game_id: str, user_id: str) -> None:
+    """Release the opponent's hold when a game goes back to WAITING."""
+    try:
+        doc = await db.frozen_funds.find_one_and_update(
+            {"game_id": game_id, "opponent.id": user_id},
+            [{"$set": {
+                "frozen_commission": {"$subtract": ["$frozen_commission", "$opponent.commission"]},
+                "gem_value": {"$subtract": ["$gem_value", "$opponent.gem_value"]},
+                "user_ids": {"$setDifference": ["$user_ids", [user_id]]},
+                "opponent": None,
+                "status": "WAITING",
+                "updated_at": datetime.utcnow()
+            }}],
+            return_document=ReturnDocument.BEFORE
+        )
+        if doc:
+            await _inc_frozen_totals(-doc["opponent"]["commission"], -doc["opponent"]["gem_value"], -1)
+    except Exception as e:
+        logger.error(f"Error releasing opponent funds for game {game_id}: {e}")
+
+async def release_game_funds(game_id: str) -> None:
+    """Release every hold of a settled or cancelled game."""
+    try:
+        doc = await db.frozen_funds.find_one_and_delete({"game_id": game_id})
+        if doc:
+            holds = sum(1 for role in ("creator", "opponent") if doc.get(role))
+            await _inc_frozen_totals(-doc.get("frozen_commission", 0), -doc.get("gem_value", 0), -holds)
+    except Exception as e:
+        logger.error(f"Error releasing frozen funds for game {game_id}: {e}")
+
+async def get_frozen_funds_totals() -> dict:
+    doc = await db.frozen_funds_totals.find_one({"_id": "global"}) or {}
+    return {
+        "commission": doc.get("commission", 0.0),
+        "gem_value": doc.get("gem_value", 0.0),
+        "holds": doc.get("holds", 0)
+    }
+
+async def _recompute_frozen_totals() -> None:
+    totals = await db.frozen_funds.aggregate([
+        {"$group": {
+            "_id": None,
+            "commission": {"$sum": "$frozen_commission"},
+            "gem_value": {"$sum": "$gem_value"},
+            "holds": {"$sum": {"$size": {"$ifNull": ["$user_ids", []]}}}
+        }}
+    ]).to_list(1)
+    totals = totals[0] if totals else {"commission": 0.0, "gem_value": 0.0, "holds": 0}
+    await db.frozen_funds_totals.update_one(
+        {"_id": "global"},
+        {"$set": {
+            "commission": totals["commission"],
+            "gem_value": totals["gem_value"],
+            "holds": totals["holds"],
+            "updated_at": datetime.utcnow()
+        }},
+        upsert=True
+    )
+
+async def _derive_frozen_holds(commission_rate: float, missing_only: bool = False) -> List[dict]:
+    """Ledger documents derived from open games; `missing_only` skips games already in the ledger."""
+    def hold_expr(side: str) -> dict:
+        user = {"$arrayElemAt": [f"${side}_user", 0]}
+        return {"$cond": [
+            {"$gt": [{"$size": f"${side}_user"}, 0]},
+            {
+                "id": f"${side}_id",
+                "username": {"$let": {"vars": {"u": user}, "in": "$$u.username"}},
+                "commission": {"$cond": [{"$eq": ["$is_regular_bot_game", True]}, 0.0,
+                                         {"$round": [{"$multiply": ["$bet_amount", commission_rate]}, 2]}]},
+                "gem_value": "$bet_amount"
+            },
+            None
+        ]}
+    
+    pipeline = [{"$match": {"status": {"$in": FROZEN_FUNDS_ACTIVE_STATUSES}}}]
+    if missing_only:
+        pipeline += [
+            {"$lookup": {"from": "frozen_funds", "localField": "id", "foreignField": "game_id", "as": "ledger"}},
+            {"$match": {"ledger": {"$size": 0}}}
+        ]
+    rows = await db.games.aggregate(pipeline + [
+        {"$lookup": {"from": "users", "localField": "creator_id", "foreignField": "id", "as": "creator_user"}},
+        {"$lookup": {"from": "users", "localField": "opponent_id", "foreignField": "id", "as": "opponent_user"}},
+        {"$project": {
+            "_id": 0, "game_id": "$id", "status": 1, "bet_amount": 1, "created_at": 1,
+            "creator": hold_expr("creator"), "opponent": hold_expr("opponent")
+        }},
+        {"$match": {"$or": [{"creator": {"$ne": None}}, {"opponent": {"$ne": None}}]}}
+    ]).to_list(None)
+    
+    now = datetime.utcnow()
+    docs = []
+    for row in rows:
+        holds = [row[role] for role in ("creator", "opponent") if row.get(role)]
+        doc = {
+            "game_id": row["game_id"],
+            "status": row["status"],
+            "bet_amount": float(row.get("bet_amount") or 0),
+            "commission_rate": commission_rate,
+            "opponent": row.get("opponent"),
+            "frozen_commission": sum(h["commission"] for h in holds),
+            "gem_value": sum(float(h["gem_value"] or 0) for h in holds),
+            "user_ids": [h["id"] for h in holds],
+            "created_at": row.get("created_at") or now,
+            "updated_at": now
+        }
+        if row.get("creator"):
+            doc["creator"] = row["creator"]
+        docs.append(doc)
+    return docs
+
+async def rebuild_frozen_funds() -> int:
+    """Recreate the ledger from the currently open games. Returns the number of games with holds."""
+    docs = await _derive_frozen_holds(await get_bet_commission_rate_fraction())
+    operations = [ReplaceOne({"game_id": doc["game_id"]}, doc, upsert=True) for doc in docs]
+    for i in range(0, len(operations), 500):
+        await db.frozen_funds.bulk_write(operations[i:i + 500], ordered=False)
+    await db.frozen_funds.delete_many({"game_id": {"$nin": [doc["game_id"] for doc in docs]}})
+    await _recompute_frozen_totals()
+    return len(docs)
+
+async def sweep_frozen_funds() -> int:
+    """
+    Drop holds whose game is no longer open, add holds of open games missing from
+    the ledger (paths without a hook) and re-derive the totals.
+    """
+    stale = await db.frozen_funds.aggregate([
+        {"$lookup": {"from": "games", "localField": "game_id", "foreignField": "id", "as": "game"}},
+        {"$match": {"$nor": [{"game.status": {"$in": FROZEN_FUNDS_ACTIVE_STATUSES}}]}},
+        {"$project": {"_id": 0, "game_id": 1}}
+    ]).to_list(None)
+    if stale:
+        await db.frozen_funds.delete_many({"game_id": {"$in": [row["game_id"] for row in stale]}})
+    missing = await _derive_frozen_holds(await get_bet_commission_rate_fraction(), missing_only=True)
+    if missing:
+        # $setOnInsert only: a hold recorded by a live create/join since the lookup wins
+        await db.frozen_funds.bulk_write(
+            [UpdateOne({"game_id": doc["game_id"]}, {"$setOnInsert": doc}, upsert=True) for doc in missing],
+            ordered=False
+        )
+        logger.info(f"🧊 Added {len(missing)} missing frozen funds holds")
+    await _recompute_frozen_totals()
+    return len(stale)
+
+async def frozen_funds_sweeper_task():
+    """Backfill the frozen-funds ledger on first start, then sweep it periodically."""
+    try:
+        if await db.frozen_funds_totals.find_one({"_id": "global"}) is None:
+            games_with_holds = await rebuild_frozen_funds()
+            logger.info(f"🧊 Frozen funds ledger backfilled from {games_with_holds} open games")
+    except Exception as e:
+        logger.error(f"Error backfilling frozen funds ledger: {e}")
+    
+    while True:
+        await asyncio.sleep(FROZEN_FUNDS_SWEEP_INTERVAL)
+        try:
+            released = await sweep_frozen_funds()
+            if released:
+                logger.info(f"🧊 Released {released} stale frozen funds holds")
+        except Exception as e:
+            logger.error(f"Error sweeping frozen funds ledger: {e}")
+
 # ==============================================================================
 # ADMIN PROFIT TRACKING API
 # ==============================================================================
@@ -13171,14 +12589,18 @@ async def get_profit_stats(current_admin: User = Depends(get_current_admin)):
         week_ago = current_time - timedelta(weeks=1)
         month_ago = current_time - timedelta(days=30)
         
-        # Get profits by type
-        profit_by_type = await db.profit_entries.aggregate([
-            {"$group": {"_id": "$entry_type", "total": {"$sum": "$amount"}}}
-        ]).to_list(10)
+        # Get profits by type (ledger entries only; bot cycles are reported separately)
+        all_time, today_totals, week_totals, month_totals = await asyncio.gather(
+            sum_profit(end=current_time),
+            sum_profit(start=day_ago, end=current_time),
+            sum_profit(start=week_ago, end=current_time),
+            sum_profit(start=month_ago, end=current_time)
+        )
+        
+        def ledger_only(totals):
+            return {t: v["amount"] for t, v in totals.items() if t != BOT_CYCLE_REVENUE_TYPE}
         
-        profit_breakdown = {}
-        for item in profit_by_type:
-            profit_breakdown[item["_id"]] = item["total"]
+        profit_breakdown = ledger_only(all_time)
         
         # Extract specific commission types
         bet_commission = profit_breakdown.get("BET_COMMISSION", 0)
@@ -13190,31 +12612,14 @@ async def get_profit_stats(current_admin: User = Depends(get_current_admin)):
         total_profit = sum(profit_breakdown.values())
         
         # Calculate periods
-        today_profit = await db.profit_entries.aggregate([
-            {"$match": {"created_at": {"$gte": day_ago}}},
-            {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
-        ]).to_list(1)
-        today_profit = today_profit[0]["total"] if today_profit else 0
-        
-        week_profit = await db.profit_entries.aggregate([
-            {"$match": {"created_at": {"$gte": week_ago}}},
-            {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
-        ]).to_list(1)
-        week_profit = week_profit[0]["total"] if week_profit else 0
-        
-        month_profit = await db.profit_entries.aggregate([
-            {"$match": {"created_at": {"$gte": month_ago}}},
-            {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
-        ]).to_list(1)
-        month_profit = month_profit[0]["total"] if month_profit else 0
+        today_profit = sum(ledger_only(today_totals).values())
+        week_profit = sum(ledger_only(week_totals).values())
+        month_profit = sum(ledger_only(month_totals).values())
         
-        # Get frozen funds from all users
-        frozen_funds_result = await db.users.aggregate([
-            {"$group": {"_id": None, "total": {"$sum": "$frozen_balance"}}}
-        ]).to_list(1)
-        frozen_funds = frozen_funds_result[0]["total"] if frozen_funds_result else 0
+        # Frozen commission from the live frozen funds counter
+        frozen_funds = (await get_frozen_funds_totals())["commission"]
         
-        total_expenses = profit_breakdown.get("REFUND", 0) + profit_breakdown.get("BONUS", 0) + profit_breakdown.get("EXPENSE", 0)
+        total_expenses = profit_amount(all_time, *PROFIT_EXPENSE_TYPES)
         
         return {
             # Main metrics for new design
@@ -13242,6 +12647,48 @@ async def get_profit_stats(current_admin: User = Depends(get_current_admin)):
             detail="Failed to fetch profit stats"
         )
 
+@api_router.get("/admin/profit/ledger", response_model=dict)
+async def get_profit_ledger_sums(
+    types: Optional[str] = None,  # comma-separated entry types, all by default
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    granularity: str = "total",  # total, day, week, month
+    current_admin: User = Depends(get_current_admin)
+):
+    """Sum the profit ledger per entry type over a date range."""
+    if granularity != "total" and granularity not in PROFIT_PERIOD_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="granularity must be one of: total, day, week, month"
+        )
+    type_list = [t.strip() for t in types.split(",") if t.strip()] if types else None
+    try:
+        result = await sum_profit(type_list, start=date_from, end=date_to, granularity=granularity)
+        return {"success": True, "granularity": granularity, "data": result}
+    except Exception as e:
+        logger.error(f"Error summing profit ledger: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to sum profit ledger"
+        )
+
+@api_router.post("/admin/profit/rollups/compact", response_model=dict)
+async def compact_profit_rollups_endpoint(
+    days: Optional[int] = None,  # only the last N days; everything by default
+    current_admin: User = Depends(get_current_admin)
+):
+    """Re-derive daily profit rollups from the raw ledger."""
+    try:
+        start = _profit_day(datetime.utcnow()) - timedelta(days=days) if days else None
+        written = await compact_profit_rollups(start=start, end=_profit_day(datetime.utcnow()) + timedelta(days=1))
+        return {"success": True, "rollups_written": written}
+    except Exception as e:
+        logger.error(f"Error compacting profit rollups: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to compact profit rollups"
+        )
+
 @api_router.get("/admin/profit/entries", response_model=dict)
 async def get_profit_entries(
     page: int = 1,
@@ -13523,6 +12970,10 @@ async def get_bot_revenue_details(
             detail="Failed to fetch bot revenue details"
         )
 
+async def bot_ids_by_name_prefix(bot_name: str) -> List[str]:
+    """Cycles don't store bot names: resolve the name prefix to bot ids on the indexed name_key."""
+    return [bot["id"] async for bot in db.bots.find({"name_key": prefix_range(bot_name)}, {"_id": 0, "id": 1})]
+
 @api_router.get("/admin/profit/bot-cycles-history", response_model=dict)
 async def get_bot_cycles_history(
     page: int = 1,
@@ -13549,8 +13000,8 @@ async def get_bot_cycles_history(
         # ИСПРАВЛЕНО: Исключаем фиктивные циклы из результатов
         filter_query = {"id": {"$not": {"$regex": "^temp_cycle_"}}}
         
-        if bot_name:
-            filter_query["bot_name"] = {"$regex": bot_name, "$options": "i"}
+        if search_key(bot_name):
+            filter_query["bot_id"] = {"$in": await bot_ids_by_name_prefix(bot_name)}
         
         if is_profitable is not None:
             filter_query["is_profitable"] = is_profitable
@@ -13656,7 +13107,7 @@ async def get_bot_cycles_history(
             profitable_cycles = 0
             avg_roi = 0
         
-        return {
+        return MongoJSONResponse({
             "success": True,
             "cycles": formatted_cycles,
             "pagination": {
@@ -13674,7 +13125,7 @@ async def get_bot_cycles_history(
                 "avg_roi": round(avg_roi, 2)
             },
             "filters_applied": filter_query
-        }
+        })
         
     except Exception as e:
         logger.error(f"Error fetching bot cycles history: {e}")
@@ -13795,6 +13246,302 @@ async def get_bot_revenue_summary(
             detail="Failed to fetch bot revenue summary"
         )
 
+# ==============================================================================
+# DATA EXPORT ENGINE
+# ==============================================================================
+
+# Streaming exports: rows are read from a Mongo cursor in batches and encoded
+# (CSV, or Parquet when pyarrow is installed) chunk by chunk, so memory stays
+# flat for any row count. Rows are ordered by (time field, id); passing the id
+# of the last row received as `resume_after` continues an interrupted export.
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_DATASETS = {
+    "completed_cycles": {
+        "collection": "completed_cycles",
+        "time_field": "end_time",
+        "base_filter": {"id": {"$not": {"$regex": "^temp_cycle_"}}},
+        "columns": [
+            ("id", "str"), ("bot_id", "str"), ("cycle_number", "int"), ("start_time", "datetime"),
+            ("end_time", "datetime"), ("duration_seconds", "int"), ("total_bets", "int"),
+            ("wins_count", "int"), ("losses_count", "int"), ("draws_count", "int"),
+            ("total_bet_amount", "float"), ("total_winnings", "float"), ("total_losses", "float"),
+            ("total_draws", "float"), ("net_profit", "float"), ("active_pool", "float"),
+            ("roi_active", "float"), ("is_profitable", "bool")
+        ]
+    },
+    "games": {
+        "collection": "games",
+        "time_field": "created_at",
+        "base_filter": {},
+        "columns": [
+            ("id", "str"), ("creator_id", "str"), ("creator_type", "str"), ("opponent_id", "str"),
+            ("opponent_type", "str"), ("bet_amount", "float"), ("bet_gems", "json"), ("status", "str"),
+            ("winner_id", "str"), ("commission_amount", "float"), ("is_bot_game", "bool"),
+            ("bot_type", "str"), ("is_regular_bot_game", "bool"), ("created_at", "datetime"),
+            ("joined_at", "datetime"), ("completed_at", "datetime"), ("cancelled_at", "datetime")
+        ]
+    },
+    "transactions": {
+        "collection": "transactions",
+        "time_field": "created_at",
+        "base_filter": {},
+        "columns": [
+            ("id", "str"), ("user_id", "str"), ("transaction_type", "str"), ("amount", "float"),
+            ("currency", "str"), ("gem_type", "str"), ("gem_quantity", "int"), ("balance_before", "float"),
+            ("balance_after", "float"), ("description", "str"), ("reference_id", "str"),
+            ("admin_id", "str"), ("created_at", "datetime")
+        ]
+    },
+    "profit_entries": {
+        "collection": "profit_entries",
+        "time_field": "created_at",
+        "base_filter": {},
+        "columns": [
+            ("id", "str"), ("entry_type", "str"), ("amount", "float"), ("source_user_id", "str"),
+            ("reference_id", "str"), ("description", "str"), ("status", "str"),
+            ("admin_id", "str"), ("created_at", "datetime")
+        ]
+    }
+}
+
+EXPORT_MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "parquet": "application/vnd.apache.parquet"}
+
+def _export_cell(value: Any, kind: str) -> Any:
+    """Normalize a document value to the column's declared kind (None stays None)."""
+    if value is None:
+        return None
+    try:
+        if kind == "int":
+            return int(value)
+        if kind == "float":
+            return float(value)
+        if kind == "bool":
+            return bool(value)
+        if kind == "datetime":
+            return value if isinstance(value, datetime) else None
+        if kind == "json":
+            return json.dumps(value, default=str, ensure_ascii=False)
+    except (TypeError, ValueError):
+        return None
+    return value.value if isinstance(value, Enum) else str(value)
+
+class _ExportSink(io.RawIOBase):
+    """Write-only file object whose written bytes are drained after each batch."""
+    
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+    
+    def writable(self) -> bool:
+        return True
+    
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+    
+    def tell(self) -> int:
+        return self._position
+    
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+class _CsvEncoder:
+    def __init__(self, columns: List[tuple]):
+        self.header = [name for name, _ in columns]
+        self._header_written = False
+    
+    def encode(self, rows: List[List[Any]]) -> bytes:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if not self._header_written:
+            # BOM so Excel detects UTF-8
+            buffer.write("\ufeff")
+            writer.writerow(self.header)
+            self._header_written = True
+        for row in rows:
+            writer.writerow(["" if v is None else (v.isoformat() if isinstance(v, datetime) else v) for v in row])
+        return buffer.getvalue().encode("utf-8")
+    
+    def close(self) -> bytes:
+        return self.encode([]) if not self._header_written else b""
+
+class _ParquetEncoder:
+    """One Parquet row group per batch, written through pyarrow."""
+    
+    ARROW_TYPES = {"int": "int64", "float": "float64", "bool": "bool_", "datetime": "timestamp", "str": "string", "json": "string"}
+    
+    def __init__(self, columns: List[tuple]):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self._pa = pa
+        fields = []
+        for name, kind in columns:
+            arrow_type = pa.timestamp("ms") if kind == "datetime" else getattr(pa, self.ARROW_TYPES[kind])()
+            fields.append(pa.field(name, arrow_type))
+        self._schema = pa.schema(fields)
+        self._sink = _ExportSink()
+        self._writer = pq.ParquetWriter(self._sink, self._schema, compression="snappy")
+    
+    def encode(self, rows: List[List[Any]]) -> bytes:
+        columns = list(zip(*rows)) if rows else [[] for _ in self._schema]
+        table = self._pa.Table.from_arrays(
+            [self._pa.array(list(values), type=field.type) for values, field in zip(columns, self._schema)],
+            schema=self._schema
+        )
+        self._writer.write_table(table)
+        return self._sink.drain()
+    
+    def close(self) -> bytes:
+        self._writer.close()
+        return self._sink.drain()
+
+def export_encoder(fmt: str, columns: List[tuple]):
+    if fmt == "parquet":
+        try:
+            return _ParquetEncoder(columns)
+        except ImportError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Parquet export requires pyarrow to be installed"
+            )
+    return _CsvEncoder(columns)
+
+async def stream_export(cursor, columns: List[tuple], encoder, compress: bool = False,
+                        row_mapper=None, limit: Optional[int] = None):
+    """Async generator of encoded (optionally gzipped) chunks for a Mongo cursor."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    
+    def emit(data: bytes) -> bytes:
+        return compressor.compress(data) if compressor else data
+    
+    batch = []
+    exported = 0
+    try:
+        async for doc in cursor:
+            if row_mapper is not None:
+                doc = row_mapper(doc)
+            batch.append([_export_cell(doc.get(name), kind) for name, kind in columns])
+            exported += 1
+            if len(batch) >= EXPORT_BATCH_SIZE:
+                chunk = emit(encoder.encode(batch))
+                batch = []
+                if chunk:
+                    yield chunk
+            if limit and exported >= limit:
+                break
+        tail = (encoder.encode(batch) if batch else b"") + encoder.close()
+        chunk = emit(tail)
+        if compressor:
+            chunk += compressor.flush()
+        if chunk:
+            yield chunk
+    finally:
+        await cursor.close()
+
+def export_response(body, filename: str, fmt: str, compress: bool, headers: Optional[dict] = None) -> StreamingResponse:
+    if compress:
+        filename += ".gz"
+    response_headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    response_headers.update(headers or {})
+    return StreamingResponse(
+        body,
+        media_type="application/gzip" if compress else EXPORT_MEDIA_TYPES[fmt],
+        headers=response_headers
+    )
+
+@api_router.get("/admin/export/{dataset}")
+async def export_dataset(
+    dataset: str,
+    format: str = "csv",  # csv, parquet
+    gzip: bool = False,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    resume_after: Optional[str] = None,  # id of the last row already received
+    limit: Optional[int] = Query(None, ge=1),
+    current_admin: User = Depends(get_current_admin)
+):
+    """Stream a range of completed_cycles, games, transactions or profit_entries as CSV or Parquet."""
+    spec = EXPORT_DATASETS.get(dataset)
+    if not spec:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown dataset. Available: {', '.join(EXPORT_DATASETS)}"
+        )
+    if format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="format must be csv or parquet"
+        )
+    
+    collection = db[spec["collection"]]
+    time_field = spec["time_field"]
+    filter_query = dict(spec["base_filter"])
+    time_range = {}
+    if date_from:
+        time_range["$gte"] = date_from
+    if date_to:
+        time_range["$lte"] = date_to
+    if time_range:
+        filter_query[time_field] = time_range
+    
+    if resume_after:
+        last_row = await collection.find_one({"id": resume_after}, {"_id": 0, time_field: 1})
+        if not last_row:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="resume_after does not match an exported row"
+            )
+        last_time = last_row.get(time_field)
+        filter_query = {"$and": [filter_query, {"$or": [
+            {time_field: {"$gt": last_time}},
+            {time_field: last_time, "id": {"$gt": resume_after}}
+        ]}]}
+    
+    encoder = export_encoder(format, spec["columns"])
+    projection = {"_id": 0, **{name: 1 for name, _ in spec["columns"]}}
+    cursor = collection.find(filter_query, projection).sort([(time_field, 1), ("id", 1)]).batch_size(EXPORT_BATCH_SIZE)
+    
+    filename = f"{dataset}_{datetime.utcnow():%Y%m%d_%H%M%S}.{format}"
+    return export_response(
+        stream_export(cursor, spec["columns"], encoder, compress=gzip, limit=limit),
+        filename, format, gzip,
+        headers={"X-Export-Order": f"{time_field},id"}
+    )
+
+BOT_CYCLES_EXPORT_COLUMNS = [
+    "Дата завершения", "Имя бота", "Номер цикла", "Игр всего", "Побед", "Поражений", "Ничьих",
+    "Процент побед", "Сумма ставок", "Чистая прибыль", "ROI", "Прибыль за игру", "Средняя ставка",
+    "Длительность (часы)", "Игр в час", "Категория прибыли", "Размер ставок", "Прибыльный"
+]
+
+def bot_cycle_export_row(cycle: dict) -> dict:
+    return dict(zip(BOT_CYCLES_EXPORT_COLUMNS, [
+        cycle["end_time"].strftime("%Y-%m-%d %H:%M:%S") if cycle.get("end_time") else "",
+        cycle.get("bot_name", ""),
+        cycle.get("cycle_number", 0),
+        cycle.get("total_bets", 0),
+        cycle.get("wins_count", 0),
+        cycle.get("losses_count", 0),
+        cycle.get("draws_count", 0),
+        f"{cycle.get('win_rate_percent', 0):.1f}%",
+        f"${cycle.get('total_bet_amount', 0):.2f}",
+        f"${cycle.get('net_profit', 0):.2f}",
+        f"{cycle.get('roi_active', 0):.1f}%",
+        f"${cycle.get('profit_per_game', 0):.2f}",
+        f"${cycle.get('average_bet_amount', 0):.2f}",
+        f"{cycle.get('duration_seconds', 0) / 3600:.2f}",
+        f"{cycle.get('games_per_hour', 0):.1f}",
+        cycle.get("profit_category", ""),
+        cycle.get("bet_size_category", ""),
+        "Да" if cycle.get("is_profitable", False) else "Нет"
+    ]))
+
 @api_router.get("/admin/profit/bot-cycles-export", response_model=dict)
 async def export_bot_cycles_csv(
     bot_name: Optional[str] = None,
@@ -13805,14 +13552,17 @@ async def export_bot_cycles_csv(
     date_to: Optional[str] = None,
     current_admin: User = Depends(get_current_admin)
 ):
-    """Export bot cycles data to CSV format."""
+    """
+    Export bot cycles data to CSV format (rows as JSON, up to 1000).
+    Streaming files of any size are served by /admin/export/{dataset}.
+    """
     try:
         # Use same filter logic as history endpoint
         # ИСПРАВЛЕНО: Исключаем фиктивные циклы из экспорта
         filter_query = {"id": {"$not": {"$regex": "^temp_cycle_"}}}
         
-        if bot_name:
-            filter_query["bot_name"] = {"$regex": bot_name, "$options": "i"}
+        if search_key(bot_name):
+            filter_query["bot_id"] = {"$in": await bot_ids_by_name_prefix(bot_name)}
         
         if is_profitable is not None:
             filter_query["is_profitable"] = is_profitable
@@ -13843,29 +13593,7 @@ async def export_bot_cycles_csv(
         cycles = await db.completed_cycles.find(filter_query).sort("end_time", -1).limit(1000).to_list(1000)
         
         # Format for CSV
-        csv_data = []
-        for cycle in cycles:
-            csv_row = {
-                "Дата завершения": cycle.get("end_time", "").strftime("%Y-%m-%d %H:%M:%S") if cycle.get("end_time") else "",
-                "Имя бота": cycle.get("bot_name", ""),
-                "Номер цикла": cycle.get("cycle_number", 0),
-                "Игр всего": cycle.get("total_bets", 0),
-                "Побед": cycle.get("wins_count", 0),
-                "Поражений": cycle.get("losses_count", 0),
-                "Ничьих": cycle.get("draws_count", 0),
-                "Процент побед": f"{cycle.get('win_rate_percent', 0):.1f}%",
-                "Сумма ставок": f"${cycle.get('total_bet_amount', 0):.2f}",
-                "Чистая прибыль": f"${cycle.get('net_profit', 0):.2f}",
-                "ROI": f"{cycle.get('roi_active', 0):.1f}%",
-                "Прибыль за игру": f"${cycle.get('profit_per_game', 0):.2f}",
-                "Средняя ставка": f"${cycle.get('average_bet_amount', 0):.2f}",
-                "Длительность (часы)": f"{cycle.get('duration_seconds', 0) / 3600:.2f}",
-                "Игр в час": f"{cycle.get('games_per_hour', 0):.1f}",
-                "Категория прибыли": cycle.get("profit_category", ""),
-                "Размер ставок": cycle.get("bet_size_category", ""),
-                "Прибыльный": "Да" if cycle.get("is_profitable", False) else "Нет"
-            }
-            csv_data.append(csv_row)
+        csv_data = [bot_cycle_export_row(cycle) for cycle in cycles]
         
         return {
             "success": True,
@@ -13885,71 +13613,57 @@ async def export_bot_cycles_csv(
 @api_router.get("/admin/profit/frozen-funds-details", response_model=dict)
 async def get_frozen_funds_details(
     period: str = "month",  # day, week, month, all
+    page: int = 1,
+    limit: int = 50,
+    user_id: Optional[str] = None,
     current_admin: User = Depends(get_current_admin)
 ):
     """Get detailed information about frozen funds."""
     try:
-        # Calculate date filter based on period
-        now = datetime.now()
-        if period == "day":
-            start_date = now - timedelta(days=1)
-        elif period == "week":
-            start_date = now - timedelta(weeks=1)
-        elif period == "month":
-            start_date = now - timedelta(days=30)
-        else:  # all
-            start_date = None
-            
-        # Get all active games (where funds are frozen)
-        query = {"status": {"$in": ["waiting_for_opponent", "in_progress", "reveal_phase"]}}
+        page = max(1, page)
+        limit = max(1, min(limit, 200))
+        start_date = profit_period_start(period)
+        
+        query = {}
         if start_date:
             query["created_at"] = {"$gte": start_date}
-            
-        active_games = await db.games.find(query).to_list(None)
-        
-        frozen_details = []
-        total_frozen = 0
+        if user_id:
+            query["user_ids"] = user_id
+        
+        if query:
+            summary = await db.frozen_funds.aggregate([
+                {"$match": query},
+                {"$group": {"_id": None, "commission": {"$sum": "$frozen_commission"}, "games": {"$sum": 1}}}
+            ]).to_list(1)
+            total_frozen = summary[0]["commission"] if summary else 0.0
+            active_games = summary[0]["games"] if summary else 0
+        else:
+            totals = await get_frozen_funds_totals()
+            total_frozen = totals["commission"]
+            active_games = await db.frozen_funds.estimated_document_count()
         
-        for game in active_games:
-            # Calculate frozen commission for this game
-            bet_amount = game.get("bet_amount", 0)
-            commission_rate = await get_bet_commission_rate_fraction()
-            frozen_commission = bet_amount * commission_rate
-            
-            total_frozen += frozen_commission
-            
-            # Get player information
-            creator = await db.users.find_one({"id": game.get("player1_id")})
-            opponent = await db.users.find_one({"id": game.get("player2_id")}) if game.get("player2_id") else None
-            
-            frozen_details.append({
-                "game_id": game["id"],
-                "bet_amount": bet_amount,
-                "frozen_commission": frozen_commission,
-                "commission_rate": commission_rate,
-                "status": game["status"],
-                "created_at": game.get("created_at"),
-                "creator": {
-                    "id": creator["id"] if creator else None,
-                    "username": creator.get("username", "Unknown") if creator else "Unknown"
-                },
-                "opponent": {
-                    "id": opponent["id"] if opponent else None,
-                    "username": opponent.get("username", "Waiting") if opponent else "Waiting"
-                } if opponent else None,
-                "estimated_release_time": None  # Could be calculated based on game rules
-            })
+        entries = await db.frozen_funds.find(
+            query, {"_id": 0, "user_ids": 0, "updated_at": 0}
+        ).sort([("frozen_commission", -1), ("game_id", 1)]).skip((page - 1) * limit).limit(limit).to_list(limit)
         
-        # Sort by frozen commission descending
-        frozen_details.sort(key=lambda x: x["frozen_commission"], reverse=True)
+        for entry in entries:
+            entry["estimated_release_time"] = None  # Could be calculated based on game rules
         
         return {
             "success": True,
             "period": period,
             "total_frozen": total_frozen,
-            "active_games": len(active_games),
-            "avg_frozen_per_game": total_frozen / len(active_games) if len(active_games) > 0 else 0,
-            "entries": frozen_details
+            "active_games": active_games,
+            "avg_frozen_per_game": total_frozen / active_games if active_games > 0 else 0,
+            "entries": entries,
+            "pagination": {
+                "current_page": page,
+                "per_page": limit,
+                "total_count": active_games,
+                "total_pages": (active_games + limit - 1) // limit,
+                "has_next": page * limit < active_games,
+                "has_prev": page > 1
+            }
         }
         
     except Exception as e:
@@ -13966,63 +13680,22 @@ async def get_total_revenue_breakdown(
 ):
     """Get detailed breakdown of total revenue by source."""
     try:
-        # Calculate date filter based on period
-        now = datetime.now()
-        if period == "day":
-            start_date = now - timedelta(days=1)
-        elif period == "week":
-            start_date = now - timedelta(weeks=1)
-        elif period == "month":
-            start_date = now - timedelta(days=30)
-        else:  # "all"
-            start_date = None
-        
-        # Get revenue breakdown by type with period filter
-        revenue_breakdown = []
-        
-        # Get commission from bets
-        query = {"entry_type": "BET_COMMISSION"}
-        if start_date:
-            query["created_at"] = {"$gte": start_date}
-        
-        bet_commission_total = 0.0
-        bet_commission_entries = await db.profit_entries.find(query).to_list(None)
-        bet_commission_count = len(bet_commission_entries)
-        for entry in bet_commission_entries:
-            bet_commission_total += entry.get("amount", 0)
+        start_date = profit_period_start(period)
         
-        # Get commission from Human-bots
-        query = {"entry_type": "HUMAN_BOT_COMMISSION"}
-        if start_date:
-            query["created_at"] = {"$gte": start_date}
-        
-        human_bot_commission_total = 0
-        human_bot_commission_entries = await db.profit_entries.find(query).to_list(None)
-        human_bot_commission_count = len(human_bot_commission_entries)
-        for entry in human_bot_commission_entries:
-            human_bot_commission_total += entry.get("amount", 0)
-        
-        # Get commission from gifts
-        query = {"entry_type": "GIFT_COMMISSION"}
-        if start_date:
-            query["created_at"] = {"$gte": start_date}
-        
-        gift_commission_total = 0
-        gift_commission_entries = await db.profit_entries.find(query).to_list(None)
-        gift_commission_count = len(gift_commission_entries)
-        for entry in gift_commission_entries:
-            gift_commission_total += entry.get("amount", 0)
-        
-        # ИСПРАВЛЕНО: Получаем доход от ботов из completed_cycles
-        query = {"id": {"$not": {"$regex": "^temp_cycle_"}}}  # Исключаем фиктивные циклы
-        if start_date:
-            query["end_time"] = {"$gte": start_date}
+        totals = await sum_profit(
+            ["BET_COMMISSION", "HUMAN_BOT_COMMISSION", "GIFT_COMMISSION", BOT_CYCLE_REVENUE_TYPE],
+            start=start_date
+        )
         
-        bot_revenue_total = 0
-        bot_revenue_entries = await db.completed_cycles.find(query).to_list(None)
-        bot_revenue_count = len(bot_revenue_entries)
-        for cycle in bot_revenue_entries:
-            bot_revenue_total += cycle.get("net_profit", 0)
+        bet_commission_total = profit_amount(totals, "BET_COMMISSION")
+        bet_commission_count = profit_count(totals, "BET_COMMISSION")
+        human_bot_commission_total = profit_amount(totals, "HUMAN_BOT_COMMISSION")
+        human_bot_commission_count = profit_count(totals, "HUMAN_BOT_COMMISSION")
+        gift_commission_total = profit_amount(totals, "GIFT_COMMISSION")
+        gift_commission_count = profit_count(totals, "GIFT_COMMISSION")
+        # ИСПРАВЛЕНО: Доход от ботов считается по completed_cycles
+        bot_revenue_total = profit_amount(totals, BOT_CYCLE_REVENUE_TYPE)
+        bot_revenue_count = profit_count(totals, BOT_CYCLE_REVENUE_TYPE)
         
         # Build breakdown
         revenue_breakdown = [
@@ -14100,70 +13773,47 @@ async def get_human_bot_commission_breakdown(
 ):
     """Get detailed breakdown of Human-bot commission revenue."""
     try:
-        # Calculate date filter based on period
-        now = datetime.now()
-        if period == "day":
-            start_date = now - timedelta(days=1)
-        elif period == "week":
-            start_date = now - timedelta(weeks=1)
-        elif period == "month":
-            start_date = now - timedelta(days=30)
-        else:  # "all"
-            start_date = None
-        
-        # Get commission from Human-bots
-        query = {"entry_type": "HUMAN_BOT_COMMISSION"}
-        if start_date:
-            query["created_at"] = {"$gte": start_date}
+        start_date = profit_period_start(period)
         
-        human_bot_commission_entries = await db.profit_entries.find(query).to_list(None)
+        totals = await sum_profit(["HUMAN_BOT_COMMISSION"], start=start_date)
         
         # Group by Human-bot to show individual statistics
-        bot_breakdown = []
-        bot_totals = {}
-        
-        for entry in human_bot_commission_entries:
-            source_user_id = entry.get("source_user_id")
-            amount = entry.get("amount", 0)
-            
-            if source_user_id not in bot_totals:
-                # Get Human-bot info
-                human_bot = await db.human_bots.find_one({"id": source_user_id})
-                bot_name = human_bot.get("name", "Unknown Bot") if human_bot else "Unknown Bot"
-                
-                bot_totals[source_user_id] = {
-                    "name": bot_name,
-                    "total": 0,
-                    "count": 0,
-                    "games": []
-                }
-            
-            bot_totals[source_user_id]["total"] += amount
-            bot_totals[source_user_id]["count"] += 1
-            bot_totals[source_user_id]["games"].append({
-                "amount": amount,
-                "date": entry.get("created_at"),
-                "game_id": entry.get("reference_id"),
-                "description": entry.get("description", "")
-            })
-        
-        # Convert to breakdown format
-        for bot_id, data in bot_totals.items():
-            bot_breakdown.append({
-                "bot_id": bot_id,
-                "bot_name": data["name"],
-                "amount": data["total"],
-                "transactions": data["count"],
-                "avg_per_transaction": data["total"] / data["count"] if data["count"] > 0 else 0,
-                "games": data["games"]
-            })
+        match = {"entry_type": "HUMAN_BOT_COMMISSION"}
+        if start_date:
+            match["created_at"] = {"$gte": start_date}
+        per_bot = await db.profit_entries.aggregate([
+            {"$match": match},
+            {"$sort": {"created_at": -1}},
+            {"$group": {
+                "_id": "$source_user_id",
+                "total": {"$sum": "$amount"},
+                "count": {"$sum": 1},
+                "games": {"$push": {
+                    "amount": "$amount",
+                    "date": "$created_at",
+                    "game_id": "$reference_id",
+                    "description": {"$ifNull": ["$description", ""]}
+                }}
+            }},
+            {"$sort": {"total": -1}},
+            {"$lookup": {"from": "human_bots", "localField": "_id", "foreignField": "id", "as": "bot"}}
+        ]).to_list(None)
         
-        # Sort by total amount descending
-        bot_breakdown.sort(key=lambda x: x["amount"], reverse=True)
+        bot_breakdown = [
+            {
+                "bot_id": row["_id"],
+                "bot_name": row["bot"][0].get("name", "Unknown Bot") if row["bot"] else "Unknown Bot",
+                "amount": row["total"],
+                "transactions": row["count"],
+                "avg_per_transaction": row["total"] / row["count"] if row["count"] > 0 else 0,
+                "games": row["games"]
+            }
+            for row in per_bot
+        ]
         
         # Calculate totals
-        total_amount = sum(entry.get("amount", 0) for entry in human_bot_commission_entries)
-        total_transactions = len(human_bot_commission_entries)
+        total_amount = profit_amount(totals, "HUMAN_BOT_COMMISSION")
+        total_transactions = profit_count(totals, "HUMAN_BOT_COMMISSION")
         
         return {
             "success": True,
@@ -14194,16 +13844,7 @@ async def get_expenses_details(
 ):
     """Get detailed information about expenses."""
     try:
-        # Calculate date filter based on period
-        now = datetime.now()
-        if period == "day":
-            start_date = now - timedelta(days=1)
-        elif period == "week":
-            start_date = now - timedelta(weeks=1)
-        elif period == "month":
-            start_date = now - timedelta(days=30)
-        else:  # "all"
-            start_date = None
+        start_date = profit_period_start(period)
         
         # Get current expense settings
         settings_doc = await db.admin_settings.find_one({"type": "expense_settings"})
@@ -14215,25 +13856,9 @@ async def get_expenses_details(
             manual_expenses = 0
         
         # Calculate total revenue for the period
-        total_revenue = 0
-        # ИСПРАВЛЕНО: Убираем BOT_REVENUE из запроса, так как доход от ботов теперь берётся из completed_cycles
-        query = {"type": {"$in": ["BET_COMMISSION", "GIFT_COMMISSION"]}}
-        if start_date:
-            query["created_at"] = {"$gte": start_date}
-        
-        revenue_entries = await db.profit_entries.find(query).to_list(None)
-        
-        for entry in revenue_entries:
-            total_revenue += entry.get("amount", 0)
-        
-        # ИСПРАВЛЕНО: Добавляем доход от ботов из completed_cycles
-        bot_query = {"id": {"$not": {"$regex": "^temp_cycle_"}}}
-        if start_date:
-            bot_query["end_time"] = {"$gte": start_date}
-        
-        bot_cycles = await db.completed_cycles.find(bot_query).to_list(None)
-        bot_revenue = sum(cycle.get("net_profit", 0) for cycle in bot_cycles)
-        total_revenue += bot_revenue
+        # ИСПРАВЛЕНО: Доход от ботов берётся из completed_cycles (BOT_CYCLE_REVENUE)
+        totals = await sum_profit(["BET_COMMISSION", "GIFT_COMMISSION", BOT_CYCLE_REVENUE_TYPE], start=start_date)
+        total_revenue = profit_amount(totals, "BET_COMMISSION", "GIFT_COMMISSION", BOT_CYCLE_REVENUE_TYPE)
         
         # Calculate expenses
         percentage_expenses = (total_revenue * expense_percentage) / 100
@@ -14263,12 +13888,12 @@ async def get_expenses_details(
         
         # Get expense history (if tracked) for the period
         expense_history = []
-        query = {"type": "EXPENSE"}
+        query = {"entry_type": "EXPENSE"}
         if start_date:
             query["created_at"] = {"$gte": start_date}
         
-        expense_entries = await db.profit_entries.find(query).to_list(None)
-        for entry in expense_entries:
+        expense_entries = await db.profit_entries.find(query).sort("created_at", -1).limit(50).to_list(50)
+        for entry in reversed(expense_entries):
             expense_history.append({
                 "date": entry.get("created_at"),
                 "amount": entry.get("amount", 0),
@@ -14310,33 +13935,17 @@ async def get_net_profit_analysis(
 ):
     """Get detailed net profit analysis."""
     try:
-        # Calculate date filter based on period
-        now = datetime.now()
-        if period == "day":
-            start_date = now - timedelta(days=1)
-        elif period == "week":
-            start_date = now - timedelta(weeks=1)
-        elif period == "month":
-            start_date = now - timedelta(days=30)
-        else:  # "all"
-            start_date = None
+        start_date = profit_period_start(period)
         
         # Calculate total revenue for the period
-        total_revenue = 0
-        revenue_by_type = {}
-        
-        # ИСПРАВЛЕНО: Убираем BOT_REVENUE из запроса, так как доход от ботов теперь берётся из completed_cycles
-        query = {"type": {"$in": ["BET_COMMISSION", "GIFT_COMMISSION"]}}
-        if start_date:
-            query["created_at"] = {"$gte": start_date}
-        
-        revenue_entries = await db.profit_entries.find(query).to_list(None)
-        
-        for entry in revenue_entries:
-            amount = entry.get("amount", 0)
-            entry_type = entry.get("type")
-            total_revenue += amount
-            revenue_by_type[entry_type] = revenue_by_type.get(entry_type, 0) + amount
+        # ИСПРАВЛЕНО: Доход от ботов берётся из completed_cycles (BOT_CYCLE_REVENUE)
+        totals = await sum_profit(["BET_COMMISSION", "GIFT_COMMISSION", BOT_CYCLE_REVENUE_TYPE], start=start_date)
+        revenue_by_type = {
+            "BET_COMMISSION": profit_amount(totals, "BET_COMMISSION"),
+            "GIFT_COMMISSION": profit_amount(totals, "GIFT_COMMISSION"),
+            "BOT_REVENUE": profit_amount(totals, BOT_CYCLE_REVENUE_TYPE)
+        }
+        total_revenue = sum(revenue_by_type.values())
         
         # Calculate expenses
         settings_doc = await db.admin_settings.find_one({"type": "expense_settings"})
@@ -14438,8 +14047,8 @@ async def get_net_profit_analysis(
             detail="Failed to fetch net profit analysis"
         )
 
-async def update_bot_cycle_tracking(bot_id: str, bot_won: bool):
-    """Update bot's cycle tracking after a game."""
+async def update_bot_cycle_tracking(bot_id: str, bot_won: bool, game_id: str):
+    """Update bot's cycle tracking after a game (once per game)."""
     try:
         bot = await db.bots.find_one({"id": bot_id})
         if not bot:
@@ -14454,7 +14063,7 @@ async def update_bot_cycle_tracking(bot_id: str, bot_won: bool):
             new_cycle_games = 0
             new_cycle_wins = 0
         
-        await db.bots.update_one(
+        result = await db.bots.update_one(*apply_once(
             {"id": bot_id},
             {
                 "$set": {
@@ -14463,13 +14072,16 @@ async def update_bot_cycle_tracking(bot_id: str, bot_won: bool):
                     "last_game_time": datetime.utcnow(),
                     "updated_at": datetime.utcnow()
                 }
-            }
-        )
+            },
+            game_id
+        ))
         
-        logger.info(f"Bot {bot_id} cycle updated: {new_cycle_games} games, {new_cycle_wins} wins")
+        if result.modified_count:
+            logger.info(f"Bot {bot_id} cycle updated: {new_cycle_games} games, {new_cycle_wins} wins")
         
     except Exception as e:
         logger.error(f"Error updating bot cycle tracking: {e}")
+        raise
 
 async def bot_automation_task():
     """Background task for bot automation - DISABLED to prevent race conditions."""
@@ -14629,21 +14241,9 @@ async def bot_join_game_automatically(bot: Bot):
         # Ensure bot has required gems
         await BotGameLogic.setup_bot_gems(bot.id, db)
         
-        # Check if bot has enough gems
-        for gem_type, quantity in game_obj.bet_gems.items():
-            bot_gems = await db.user_gems.find_one({"user_id": bot.id, "gem_type": gem_type})
-            if not bot_gems or bot_gems["quantity"] < quantity:
-                return  # Bot doesn't have enough gems
-        
-        # Freeze bot's gems
-        for gem_type, quantity in game_obj.bet_gems.items():
-            await db.user_gems.update_one(
-                {"user_id": bot.id, "gem_type": gem_type},
-                {
-                    "$inc": {"frozen_quantity": quantity},
-                    "$set": {"updated_at": datetime.utcnow()}
-                }
-            )
+        # Freeze bot's gems (all or nothing)
+        if not await gem_inventory.freeze(bot.id, game_obj.bet_gems):
+            return  # Bot doesn't have enough gems
         
         # Calculate bot's move using strategy
         creator_move = game_obj.creator_move
@@ -14659,7 +14259,7 @@ async def bot_join_game_automatically(bot: Bot):
         commission_returned = 0
         if bot.bot_type == "REGULAR":
             commission_rate = await get_bet_commission_rate_fraction()
-            commission_amount = round_money(game_obj.bet_amount * commission_rate)
+            commission_amount = commission_for(game_obj.bet_amount, commission_rate)
             
             creator_bot = await db.bots.find_one({"id": game_obj.creator_id})
             creator_is_regular_bot = creator_bot and creator_bot.get("bot_type") == "REGULAR"
@@ -14754,16 +14354,7 @@ async def reset_all_user_balances_admin(current_user: User = Depends(get_current
         )
         
         # Reset all user gems to zero
-        user_gems_result = await db.user_gems.update_many(
-            {},  # All user gems
-            {
-                "$set": {
-                    "quantity": 0,
-                    "frozen_quantity": 0,
-                    "updated_at": datetime.utcnow()
-                }
-            }
-        )
+        inventories_reset = await gem_inventory.zero_all()
         
         # Reset all active games (cancel them)
         games_result = await db.games.update_many(
@@ -14781,7 +14372,7 @@ async def reset_all_user_balances_admin(current_user: User = Depends(get_current
         
         # Get final counts
         total_users = await db.users.count_documents({})
-        total_gems_records = await db.user_gems.count_documents({})
+        total_gems_records = await db.gem_inventories.count_documents({})
         cancelled_games = games_result.modified_count
         
         return {
@@ -14790,7 +14381,7 @@ async def reset_all_user_balances_admin(current_user: User = Depends(get_current
             "details": {
                 "users_affected": user_balance_result.modified_count,
                 "total_users": total_users,
-                "gem_records_reset": user_gems_result.modified_count,
+                "gem_records_reset": inventories_reset,
                 "total_gem_records": total_gems_records,
                 "games_cancelled": cancelled_games,
                 "reset_timestamp": datetime.utcnow().isoformat()
@@ -14825,16 +14416,16 @@ async def get_user_gems(
         
         # Get user's gems
         gems_data = []
-        for gem_type, gem_data in user.get("gems", {}).items():
-            if isinstance(gem_data, dict) and gem_data.get("quantity", 0) > 0:
-                price = GEM_PRICES.get(gem_type, 0)
+        for gem_data in await gem_inventory.rows(user_id):
+            if gem_data["quantity"] > 0:
+                price = GEM_PRICES.get(gem_data["gem_type"], 0)
                 gems_data.append({
-                    "type": gem_type,
-                    "quantity": gem_data.get("quantity", 0),
-                    "frozen_quantity": gem_data.get("frozen_quantity", 0),
+                    "type": gem_data["gem_type"],
+                    "quantity": gem_data["quantity"],
+                    "frozen_quantity": gem_data["frozen_quantity"],
                     "price": price,
-                    "total_value": gem_data.get("quantity", 0) * price,
-                    "frozen": gem_data.get("frozen_quantity", 0) > 0
+                    "total_value": gem_data["quantity"] * price,
+                    "frozen": gem_data["frozen_quantity"] > 0
                 })
         
         return {
@@ -15008,14 +14599,7 @@ async def cancel_user_bet(
         creator_id = game.get("creator_id")
         bet_gems = game.get("bet_gems", {})
         
-        for gem_type, quantity in bet_gems.items():
-            await db.user_gems.update_one(
-                {"user_id": creator_id, "gem_type": gem_type},
-                {
-                    "$inc": {"frozen_quantity": -quantity},
-                    "$set": {"updated_at": datetime.utcnow()}
-                }
-            )
+        await gem_inventory.unfreeze(creator_id, bet_gems)
         
         # Return commission balance
         commission_rate = await get_bet_commission_rate_fraction()
@@ -15070,6 +14654,7 @@ async def cancel_user_bet(
 @api_router.post("/admin/users/{user_id}/bets/cleanup-stuck", response_model=dict)
 async def cleanup_stuck_bets(
     user_id: str,
+    dry_run: bool = False,
     current_user: User = Depends(get_current_admin)
 ):
     """Clean up stuck/hanging bets for a user (admin only)."""
@@ -15085,233 +14670,86 @@ async def cleanup_stuck_bets(
         # Define cutoff time (24 hours ago)
         cutoff_time = datetime.utcnow() - timedelta(hours=24)
         
-        # Find stuck bets - games that are in problematic states for more than 24 hours
-        stuck_games = await db.games.find({
-            "$or": [
-                {"creator_id": user_id},
-                {"opponent_id": user_id}
-            ],
-            "status": {"$in": ["WAITING", "ACTIVE", "REVEAL"]},
-            "created_at": {"$lt": cutoff_time}
-        }).to_list(100)
+        # Stuck bets - games that are in problematic states for more than 24 hours
+        job = await start_maintenance_job(
+            "release_games",
+            {
+                "mode": "cancel",
+                "filter": {
+                    "$or": [
+                        {"creator_id": user_id},
+                        {"opponent_id": user_id}
+                    ],
+                    "status": {"$in": MAINTENANCE_GAME_STATUSES},
+                    "created_at": {"$lt": cutoff_time}
+                },
+                "cancel_fields": {
+                    "cancelled_by": "admin_cleanup_stuck",
+                    "cancel_reason": f"Stuck bet cleaned up by admin {current_user.username}"
+                },
+                "log_action": "cleanup_stuck_bets"
+            },
+            current_user, dry_run=dry_run
+        )
+        return maintenance_job_response(job, "Разморожено {total_processed} зависших ставок")
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error cleaning up stuck bets: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to cleanup stuck bets"
+        )
+
+@api_router.get("/admin/bets/stats", response_model=dict)
+async def get_all_bets_stats(current_user: User = Depends(get_current_admin)):
+    """Get comprehensive statistics for all bets in the system."""
+    try:
+        # Get total counts by status
+        total_bets = await db.games.count_documents({})
+        active_bets = await db.games.count_documents({"status": {"$in": ["WAITING", "ACTIVE", "REVEAL"]}})
+        completed_bets = await db.games.count_documents({"status": "COMPLETED"})
+        cancelled_bets = await db.games.count_documents({"status": "CANCELLED"})
         
-        cleanup_results = {
-            "total_processed": 0,
-            "cancelled_games": [],
-            "total_gems_returned": {},
-            "total_commission_returned": 0
-        }
-        
-        for game in stuck_games:
-            game_id = game.get("id")
-            game_status = game.get("status")
-            creator_id = game.get("creator_id")
-            opponent_id = game.get("opponent_id")
-            bet_amount = game.get("bet_amount", 0)
-            bet_gems = game.get("bet_gems", {})
-            opponent_gems = game.get("opponent_gems", {})
-            
-            # Unfreeze logic: extend deadlines and return to ACTIVE state
-            # Compute new active_deadline: now + 10 minutes
-            new_deadline = datetime.utcnow() + timedelta(minutes=5)
-            await db.games.update_one(
-                {"id": game_id},
-                {
-                    "$set": {
-                        "status": "ACTIVE",
-                        "active_deadline": new_deadline,
-                        "updated_at": datetime.utcnow(),
-                        "unfrozen_at": datetime.utcnow(),
-                        "unfrozen_by": current_user.id
-                    },
-                    "$unset": {
-                        "processing_lock": "",
-                        "locked_by": "",
-                        "lock_acquired_at": "",
-                        "cancel_reason": "",
-                        "cancelled_by": "",
-                        "cancelled_at": ""
-                    }
-                }
-            )
-            
-            commission_returned = 0
-            
-            # Return resources based on game status
-            if game_status == "WAITING":
-                # Only creator has bet, return their resources
-                for gem_type, quantity in bet_gems.items():
-                    await db.user_gems.update_one(
-                        {"user_id": creator_id, "gem_type": gem_type},
-                        {
-                            "$inc": {"frozen_quantity": -quantity},
-                            "$set": {"updated_at": datetime.utcnow()}
-                        }
-                    )
-                    cleanup_results["total_gems_returned"][gem_type] = cleanup_results["total_gems_returned"].get(gem_type, 0) + quantity
-                
-                # Return commission to creator
-                commission_rate = await get_bet_commission_rate_fraction()
-                commission_amount = round_money(bet_amount * commission_rate)
-                creator_user = await db.users.find_one({"id": creator_id})
-                if creator_user:
-                    await db.users.update_one(
-                        {"id": creator_id},
-                        {
-                            "$inc": {
-                                "virtual_balance": commission_amount,
-                                "frozen_balance": -commission_amount
-                            },
-                            "$set": {"updated_at": datetime.utcnow()}
-                        }
-                    )
-                    commission_returned += commission_amount
-                    
-            elif game_status in ["ACTIVE", "REVEAL"]:
-                # Both players have bet, return resources to both
-                
-                # Return creator's resources
-                for gem_type, quantity in bet_gems.items():
-                    await db.user_gems.update_one(
-                        {"user_id": creator_id, "gem_type": gem_type},
-                        {
-                            "$inc": {"frozen_quantity": -quantity},
-                            "$set": {"updated_at": datetime.utcnow()}
-                        }
-                    )
-                    cleanup_results["total_gems_returned"][gem_type] = cleanup_results["total_gems_returned"].get(gem_type, 0) + quantity
-                
-                # Return opponent's resources (use opponent_gems if available, otherwise bet_gems)
-                opponent_bet_gems = opponent_gems if opponent_gems else bet_gems
-                for gem_type, quantity in opponent_bet_gems.items():
-                    await db.user_gems.update_one(
-                        {"user_id": opponent_id, "gem_type": gem_type},
-                        {
-                            "$inc": {"frozen_quantity": -quantity},
-                            "$set": {"updated_at": datetime.utcnow()}
-                        }
-                    )
-                    cleanup_results["total_gems_returned"][gem_type] = cleanup_results["total_gems_returned"].get(gem_type, 0) + quantity
-                
-                # Return commission to both players
-                commission_rate = await get_bet_commission_rate_fraction()
-                commission_amount = round_money(bet_amount * commission_rate)
-                
-                # Return to creator
-                creator_user = await db.users.find_one({"id": creator_id})
-                if creator_user:
-                    await db.users.update_one(
-                        {"id": creator_id},
-                        {
-                            "$inc": {
-                                "virtual_balance": commission_amount,
-                                "frozen_balance": -commission_amount
-                            },
-                            "$set": {"updated_at": datetime.utcnow()}
-                        }
-                    )
-                    commission_returned += commission_amount
-                
-                # Return to opponent (if they're a user, not a bot)
-                if opponent_id:
-                    opponent_user = await db.users.find_one({"id": opponent_id})
-                    if opponent_user:
-                        await db.users.update_one(
-                            {"id": opponent_id},
-                            {
-                                "$inc": {
-                                    "virtual_balance": commission_amount,
-                                    "frozen_balance": -commission_amount
-                                },
-                                "$set": {"updated_at": datetime.utcnow()}
-                            }
-                        )
-                        commission_returned += commission_amount
-            
-            cleanup_results["cancelled_games"].append({
-                "game_id": game_id,
-                "status": game_status,
-                "bet_amount": bet_amount,
-                "created_at": game.get("created_at"),
-                "age_hours": (datetime.utcnow() - game.get("created_at")).total_seconds() / 3600
-            })
-            cleanup_results["total_commission_returned"] += commission_returned
-            cleanup_results["total_processed"] += 1
-        
-        # Log admin action
-        admin_log = {
-            "admin_id": current_user.id,
-            "admin_username": current_user.username,
-            "action": "cleanup_stuck_bets",
-            "target_user_id": user_id,
-            "details": cleanup_results,
-            "timestamp": datetime.utcnow()
-        }
-        await db.admin_logs.insert_one(admin_log)
-        
-        return {
-            "success": True,
-            "message": f"Разморожено {cleanup_results['total_processed']} зависших ставок",
-            **cleanup_results
-        }
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error cleaning up stuck bets: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to cleanup stuck bets"
-        )
-
-@api_router.get("/admin/bets/stats", response_model=dict)
-async def get_all_bets_stats(current_user: User = Depends(get_current_admin)):
-    """Get comprehensive statistics for all bets in the system."""
-    try:
-        # Get total counts by status
-        total_bets = await db.games.count_documents({})
-        active_bets = await db.games.count_documents({"status": {"$in": ["WAITING", "ACTIVE", "REVEAL"]}})
-        completed_bets = await db.games.count_documents({"status": "COMPLETED"})
-        cancelled_bets = await db.games.count_documents({"status": "CANCELLED"})
-        
-        # Get stuck bets: ACTIVE games без хода одной из сторон > 5 минут
-        now_ts = datetime.utcnow()
-        threshold = now_ts - timedelta(minutes=5)
-        stuck_bets = await db.games.count_documents({
-            "status": "ACTIVE",
-            "$and": [
-                {"$or": [{"opponent_move": None}, {"creator_move": None}]},
-                {"$or": [
-                    {"updated_at": {"$lt": threshold}},
-                    {"$and": [
-                        {"updated_at": {"$exists": False}},
-                        {"created_at": {"$lt": threshold}}
-                    ]}
-                ]}
-            ]
-        })
-        
-        # Calculate total bet value
-        pipeline = [
-            {"$group": {
-                "_id": None,
-                "total_value": {"$sum": "$bet_amount"},
-                "average_bet": {"$avg": "$bet_amount"}
-            }}
-        ]
-        
-        result = await db.games.aggregate(pipeline).to_list(1)
-        total_bets_value = result[0]["total_value"] if result else 0
-        average_bet = result[0]["average_bet"] if result else 0
-        
-        return {
-            "total_bets": total_bets,
-            "total_bets_value": total_bets_value,
-            "active_bets": active_bets,
-            "completed_bets": completed_bets,
-            "cancelled_bets": cancelled_bets,
-            "stuck_bets": stuck_bets,
-            "average_bet": average_bet
+        # Get stuck bets: ACTIVE games без хода одной из сторон > 5 минут
+        now_ts = datetime.utcnow()
+        threshold = now_ts - timedelta(minutes=5)
+        stuck_bets = await db.games.count_documents({
+            "status": "ACTIVE",
+            "$and": [
+                {"$or": [{"opponent_move": None}, {"creator_move": None}]},
+                {"$or": [
+                    {"updated_at": {"$lt": threshold}},
+                    {"$and": [
+                        {"updated_at": {"$exists": False}},
+                        {"created_at": {"$lt": threshold}}
+                    ]}
+                ]}
+            ]
+        })
+        
+        # Calculate total bet value
+        pipeline = [
+            {"$group": {
+                "_id": None,
+                "total_value": {"$sum": "$bet_amount"},
+                "average_bet": {"$avg": "$bet_amount"}
+            }}
+        ]
+        
+        result = await db.games.aggregate(pipeline).to_list(1)
+        total_bets_value = result[0]["total_value"] if result else 0
+        average_bet = result[0]["average_bet"] if result else 0
+        
+        return {
+            "total_bets": total_bets,
+            "total_bets_value": total_bets_value,
+            "active_bets": active_bets,
+            "completed_bets": completed_bets,
+            "cancelled_bets": cancelled_bets,
+            "stuck_bets": stuck_bets,
+            "average_bet": average_bet
         }
         
     except Exception as e:
@@ -15473,7 +14911,7 @@ async def get_all_bets(
         stuck_count = len([b for b in bets_data if b["is_stuck"]])
         bot_games_count = len([b for b in bets_data if b["is_bot_game"]])
         
-        return {
+        return MongoJSONResponse({
             "bets": bets_data,
             "pagination": {
                 "total_count": total_count,
@@ -15488,7 +14926,7 @@ async def get_all_bets(
                 "stuck_count": stuck_count,
                 "bot_games_count": bot_games_count
             }
-        }
+        })
         
     except HTTPException:
         raise
@@ -15549,20 +14987,13 @@ async def cancel_any_bet(
             # Only creator has committed resources
             # Return creator's gems
             if isinstance(bet_gems, dict):
-                for gem_type, quantity in bet_gems.items():
-                    if quantity > 0:
-                        await db.user_gems.update_one(
-                            {"user_id": creator_id, "gem_type": gem_type},
-                            {
-                                "$inc": {"frozen_quantity": -quantity},
-                                "$set": {"updated_at": datetime.utcnow()}
-                            }
-                        )
-                        gems_returned[gem_type] = gems_returned.get(gem_type, 0) + quantity
+                await gem_inventory.unfreeze(creator_id, bet_gems)
+                for gem_type, quantity in normalize_gems(bet_gems).items():
+                    gems_returned[gem_type] = gems_returned.get(gem_type, 0) + quantity
             
             # Return creator's commission
             commission_rate = await get_bet_commission_rate_fraction()
-            commission_amount = round_money(bet_amount * commission_rate)
+            commission_amount = commission_for(bet_amount, commission_rate)
             creator_user = await db.users.find_one({"id": creator_id})
             if creator_user:
                 await db.users.update_one(
@@ -15581,33 +15012,19 @@ async def cancel_any_bet(
             # Both players have committed resources
             # Return creator's gems
             if isinstance(bet_gems, dict):
-                for gem_type, quantity in bet_gems.items():
-                    if quantity > 0:
-                        await db.user_gems.update_one(
-                            {"user_id": creator_id, "gem_type": gem_type},
-                            {
-                                "$inc": {"frozen_quantity": -quantity},
-                                "$set": {"updated_at": datetime.utcnow()}
-                            }
-                        )
-                        gems_returned[gem_type] = gems_returned.get(gem_type, 0) + quantity
+                await gem_inventory.unfreeze(creator_id, bet_gems)
+                for gem_type, quantity in normalize_gems(bet_gems).items():
+                    gems_returned[gem_type] = gems_returned.get(gem_type, 0) + quantity
             
             # Return opponent's gems
             if isinstance(opponent_gems, dict):
-                for gem_type, quantity in opponent_gems.items():
-                    if quantity > 0:
-                        await db.user_gems.update_one(
-                            {"user_id": opponent_id, "gem_type": gem_type},
-                            {
-                                "$inc": {"frozen_quantity": -quantity},
-                                "$set": {"updated_at": datetime.utcnow()}
-                            }
-                        )
-                        gems_returned[gem_type] = gems_returned.get(gem_type, 0) + quantity
+                await gem_inventory.unfreeze(opponent_id, opponent_gems)
+                for gem_type, quantity in normalize_gems(opponent_gems).items():
+                    gems_returned[gem_type] = gems_returned.get(gem_type, 0) + quantity
             
             # Return commission to both players
             commission_rate = await get_bet_commission_rate_fraction()
-            commission_amount = round_money(bet_amount * commission_rate)
+            commission_amount = commission_for(bet_amount, commission_rate)
             
             # Return to creator
             creator_user = await db.users.find_one({"id": creator_id})
@@ -15683,663 +15100,539 @@ async def cancel_any_bet(
             detail="Failed to reset bet"
         )
 
-@api_router.post("/admin/bets/unfreeze-stuck", response_model=dict)
-async def unfreeze_all_stuck_bets(current_user: User = Depends(get_current_admin)):
-    """Разморозить все действительно зависшие ставки (>5 минут без хода одной из сторон) и перезапустить их.
-    Критерий зависания:
-      - status == ACTIVE
-      - отсутствует ход одной из сторон (opponent_move is None или creator_move is None)
-      - прошло > 5 минут с момента последнего обновления/присоединения/старта (updated_at|joined_at|started_at|created_at)
-    Действие:
-      - Вызываем handle_game_timeout(game_id), который возвращает ресурсы и переводит ставку в WAITING с новым commit-reveal
-    """
-    try:
-        now = datetime.utcnow()
-        threshold = now - timedelta(minutes=5)
-
-        # Подбор зависших по критериям
-        query = {
-            "status": "ACTIVE",
-            "$and": [
-                {"$or": [
-                    {"opponent_move": None},
-                    {"creator_move": None}
-                ]},
-                {"$or": [
-                    {"updated_at": {"$lt": threshold}},
-                    {"$and": [
-                        {"updated_at": {"$exists": False}},
-                        {"created_at": {"$lt": threshold}}
-                    ]}
-                ]}
-            ]
-        }
-
-        stuck_games = await db.games.find(query).to_list(1000)
+# ==============================================================================
+# MAINTENANCE JOBS
+# ==============================================================================
 
-        cleanup_results = {
-            "total_processed": 0,
-            "processed_games": []
-        }
+# Mass resets run as `maintenance_jobs`. A job tags its target games with
+# `maintenance_job_id`, computes the net gem and commission refund per user in
+# one aggregation over the tagged set, applies those deltas with chunked
+# bulk_write and then closes the games with a single update/delete. Every
+# refund write is filtered on `maintenance_job_applied != <job id>` so a
+# resumed job never refunds the same document twice. Settlement and cancel
+# clear the tag, and the apply and close steps only touch tagged games that
+# are still open, so a game closed by its players meanwhile is left alone.
+# Progress lives in the job document; `dry_run` only computes the summary.
+MAINTENANCE_JOB_CHUNK_SIZE = 1000
+MAINTENANCE_GAME_STATUSES = ["WAITING", "ACTIVE", "REVEAL"]
+MAINTENANCE_DEFAULT_GEMS = {
+    "Ruby": 20, "Emerald": 15, "Sapphire": 10, "Diamond": 8, "Amber": 35, "Topaz": 25, "Onyx": 16
+}  # ~$1000 worth of gems
+MAINTENANCE_DEFAULT_BALANCE = 1000.0
+
+def _maintenance_claimed(job_id: str) -> dict:
+    """Games tagged by the job that are still open."""
+    return {"maintenance_job_id": job_id, "status": {"$in": MAINTENANCE_GAME_STATUSES}}
+
+async def _update_maintenance_job(job_id: str, **fields) -> None:
+    fields["updated_at"] = datetime.utcnow()
+    await db.maintenance_jobs.update_one({"id": job_id}, {"$set": fields})
+
+def _maintenance_holds_pipeline(match: dict, commission_rate: float, include_creator: bool) -> List[dict]:
+    """Project every game to the gem and commission holds of its live participants."""
+    commission = {"$cond": [
+        {"$eq": ["$is_regular_bot_game", True]},
+        0,
+        {"$round": [{"$multiply": [{"$ifNull": ["$bet_amount", 0]}, commission_rate]}, 2]}
+    ]}
+    opponent_gems = {"$cond": [
+        {"$isArray": "$opponent_gems"},
+        {"$map": {"input": "$opponent_gems", "as": "g", "in": {"k": "$$g.name", "v": "$$g.count"}}},
+        {"$objectToArray": {"$ifNull": ["$opponent_gems", {"$ifNull": ["$bet_gems", {}]}]}}
+    ]}
+    creator_hold = [{"user_id": "$creator_id", "gems": {"$objectToArray": {"$ifNull": ["$bet_gems", {}]}}, "commission": commission}]
+    opponent_hold = {"$cond": [
+        {"$and": [
+            {"$in": ["$status", ["ACTIVE", "REVEAL"]]},
+            {"$ne": [{"$ifNull": ["$opponent_id", None]}, None]}
+        ]},
+        [{"user_id": "$opponent_id", "gems": opponent_gems, "commission": commission}],
+        []
+    ]}
+    return [
+        {"$match": match},
+        {"$project": {"_id": 0, "holds": {"$concatArrays": [creator_hold if include_creator else [], opponent_hold]}}},
+        {"$unwind": "$holds"}
+    ]
 
-        for game in stuck_games:
-            game_id = game.get("id")
-            try:
-                await handle_game_timeout(game_id)
-                cleanup_results["processed_games"].append({
-                    "game_id": game_id,
-                    "previous_status": "ACTIVE",
-                    "action": "timeout_recreate"
-                })
-                cleanup_results["total_processed"] += 1
-            except Exception as e:
-                logger.error(f"Failed to process stuck game {game_id}: {e}")
+async def _maintenance_deltas(match: dict, include_creator: bool):
+    """Yield ("commission", user_id, amount, is_user) and ("gems", user_id, {gem_type: quantity}) deltas."""
+    commission_rate = await get_bet_commission_rate_fraction()
+    holds = _maintenance_holds_pipeline(match, commission_rate, include_creator)
+    
+    commission_cursor = db.games.aggregate(holds + [
+        {"$group": {"_id": "$holds.user_id", "amount": {"$sum": "$holds.commission"}}},
+        {"$lookup": {"from": "users", "localField": "_id", "foreignField": "id", "as": "user"}},
+        {"$project": {"amount": 1, "is_user": {"$gt": [{"$size": "$user"}, 0]}}}
+    ], allowDiskUse=True)
+    async for row in commission_cursor:
+        yield ("commission", row["_id"], float(row.get("amount") or 0), row["is_user"])
+    
+    gems_cursor = db.games.aggregate(holds + [
+        {"$unwind": "$holds.gems"},
+        {"$match": {"holds.gems.v": {"$gt": 0}}},
+        {"$group": {"_id": {"user_id": "$holds.user_id", "gem_type": "$holds.gems.k"}, "quantity": {"$sum": "$holds.gems.v"}}},
+        {"$group": {"_id": "$_id.user_id", "gems": {"$push": {"k": "$_id.gem_type", "v": "$quantity"}}}}
+    ], allowDiskUse=True)
+    async for row in gems_cursor:
+        yield ("gems", row["_id"], {gem["k"]: gem["v"] for gem in row["gems"]})
+
+async def _apply_maintenance_deltas(job: dict, match: dict, include_creator: bool, dry_run: bool) -> dict:
+    """Refund the holds of the matched games; returns the refund summary."""
+    job_id = job["id"]
+    now = datetime.utcnow()
+    summary = {
+        "total_gems_returned": {},
+        "total_commission_returned": 0.0,
+        "users_affected_count": 0,
+        "bots_affected_count": 0
+    }
+    user_ops, gem_ops = [], []
+    
+    async def flush(force: bool = False):
+        if dry_run:
+            user_ops.clear()
+            gem_ops.clear()
+            return
+        if user_ops and (force or len(user_ops) >= MAINTENANCE_JOB_CHUNK_SIZE):
+            await db.users.bulk_write(user_ops, ordered=False)
+            user_ops.clear()
+        if gem_ops and (force or len(gem_ops) >= MAINTENANCE_JOB_CHUNK_SIZE):
+            await db.gem_inventories.bulk_write(gem_ops, ordered=False)
+            gem_ops.clear()
+        await _update_maintenance_job(job_id, progress={**job.get("progress", {}), "refunds": summary["users_affected_count"] + summary["bots_affected_count"]})
+    
+    async for delta in _maintenance_deltas(match, include_creator):
+        if delta[0] == "commission":
+            _, user_id, amount, is_user = delta
+            if not is_user:
+                summary["bots_affected_count"] += 1
                 continue
-
-        # Лог админ-действия
-        admin_log = {
-            "admin_id": current_user.id,
-            "admin_username": current_user.username,
-            "action": "unfreeze_stuck_bets",
-            "details": cleanup_results,
-            "criteria": {
-                "status": "ACTIVE",
-                "missing_move": True,
-                ">5min": True
+            summary["users_affected_count"] += 1
+            summary["total_commission_returned"] += amount
+            if amount:
+                user_ops.append(UpdateOne(
+                    {"id": user_id, "maintenance_job_applied": {"$ne": job_id}},
+                    {
+                        "$inc": {"virtual_balance": amount, "frozen_balance": -amount},
+                        "$set": {"maintenance_job_applied": job_id, "updated_at": now}
+                    }
+                ))
+        else:
+            _, user_id, gems = delta
+            for gem_type, quantity in gems.items():
+                summary["total_gems_returned"][gem_type] = summary["total_gems_returned"].get(gem_type, 0) + quantity
+            # One inventory update per user; the marker keeps a resumed job from refunding twice
+            gem_ops.append(UpdateOne(
+                {"user_id": user_id, "maintenance_job_applied": {"$ne": job_id}},
+                inventory_update(release=gems, extra={"maintenance_job_applied": job_id})
+            ))
+        if len(user_ops) >= MAINTENANCE_JOB_CHUNK_SIZE or len(gem_ops) >= MAINTENANCE_JOB_CHUNK_SIZE:
+            await flush()
+    await flush(force=True)
+    
+    summary["total_commission_returned"] = round(summary["total_commission_returned"], 2)
+    return summary
+
+async def _recreate_maintenance_games(job_id: str) -> tuple:
+    """Put tagged games back to WAITING with fresh commit-reveal data (as handle_game_timeout does)."""
+    creators, opponents = set(), set()
+    operations, released = [], []
+    now = datetime.utcnow()
+    cursor = db.games.find(
+        _maintenance_claimed(job_id),
+        {"_id": 0, "id": 1, "creator_id": 1, "opponent_id": 1}
+    ).batch_size(MAINTENANCE_JOB_CHUNK_SIZE)
+    async for game in cursor:
+        new_salt = str(uuid.uuid4())
+        new_move = secrets.choice(["rock", "paper", "scissors"])
+        operations.append(UpdateOne({"id": game["id"], **_maintenance_claimed(job_id)}, {
+            "$set": {
+                "status": GameStatus.WAITING, "opponent_id": None, "opponent_move": None,
+                "opponent_gems": None, "joined_at": None, "started_at": None, "active_deadline": None,
+                "creator_move": new_move, "creator_move_hash": hash_move_with_salt(new_move, new_salt),
+                "creator_salt": new_salt, "created_at": now, "updated_at": now
             },
-            "timestamp": datetime.utcnow()
-        }
-        await db.admin_logs.insert_one(admin_log)
+            "$unset": {"maintenance_job_id": ""}
+        }))
+        creators.add(game["creator_id"])
+        if game.get("opponent_id"):
+            opponents.add(game["opponent_id"])
+            released.append((game["id"], game["opponent_id"]))
+        if len(operations) >= MAINTENANCE_JOB_CHUNK_SIZE:
+            await db.games.bulk_write(operations, ordered=False)
+            await asyncio.gather(*(release_opponent_funds(g, u) for g, u in released))
+            operations, released = [], []
+    if operations:
+        await db.games.bulk_write(operations, ordered=False)
+        await asyncio.gather(*(release_opponent_funds(g, u) for g, u in released))
+    return creators, opponents
+
+async def _run_game_release_job(job: dict) -> dict:
+    params = {**job["params"], "filter": json_util.loads(job["params"]["filter"])}
+    job_id = job["id"]
+    mode = params["mode"]  # cancel, delete, recreate
+    include_creator = mode != "recreate"
+    
+    if job["dry_run"]:
+        match = params["filter"]
+        games_total = await db.games.count_documents({} if params.get("delete_all") else match)
+        summary = await _apply_maintenance_deltas(job, match, include_creator, dry_run=True)
+        return {"total_processed": games_total, **summary}
+    
+    phase = job.get("phase") or "claim"
+    if phase == "claim":
+        if params.get("count_by_status"):
+            by_status = await db.games.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]).to_list(None)
+            await _update_maintenance_job(job_id, games_by_status={row["_id"]: row["count"] for row in by_status if row["_id"]})
+        await db.games.update_many(
+            {"$and": [params["filter"], {"maintenance_job_id": {"$exists": False}}]},
+            {"$set": {"maintenance_job_id": job_id}}
+        )
+        games_total = await db.games.count_documents({"maintenance_job_id": job_id})
+        phase = "apply"
+        await _update_maintenance_job(job_id, phase=phase, progress={"games_total": games_total})
+        job["progress"] = {"games_total": games_total}
+    
+    games_total = job.get("progress", {}).get("games_total", 0)
+    if phase == "apply":
+        summary = await _apply_maintenance_deltas(job, _maintenance_claimed(job_id), include_creator, dry_run=False)
+        phase = "finalize"
+        await _update_maintenance_job(job_id, phase=phase, refund_summary=summary)
+    else:
+        summary = (await db.maintenance_jobs.find_one({"id": job_id}, {"refund_summary": 1}) or {}).get("refund_summary", {})
+    
+    result = {"total_processed": games_total, **summary}
+    now = datetime.utcnow()
+    if mode == "cancel":
+        await db.games.update_many(
+            _maintenance_claimed(job_id),
+            {"$set": {**params.get("cancel_fields", {}), "status": "CANCELLED", "cancelled_at": now},
+             "$unset": {"maintenance_job_id": ""}}
+        )
+    elif mode == "delete":
+        deleted = await db.games.delete_many({} if params.get("delete_all") else _maintenance_claimed(job_id))
+        result["actual_database_deletions"] = deleted.deleted_count
+        result["games_by_status"] = (await db.maintenance_jobs.find_one({"id": job_id}, {"games_by_status": 1}) or {}).get("games_by_status", {})
+    else:
+        creators, opponents = await _recreate_maintenance_games(job_id)
+        if creators:
+            await create_broadcast_notification(
+                list(creators), NotificationTypeEnum.SYSTEM_MESSAGE, "Bet Recreated",
+                "Your bet has been recreated with a new move after the opponent stalled."
+            )
+        if opponents:
+            await create_broadcast_notification(
+                list(opponents), NotificationTypeEnum.SYSTEM_MESSAGE, "Game Timeout",
+                "You didn't choose a move in time. Your gems and commission have been returned.",
+                priority=NotificationPriorityEnum.WARNING
+            )
+    
+    if params.get("zero_frozen"):
+        # Release whatever is still frozen outside of the reset games
+        await db.users.update_many(
+            {"frozen_balance": {"$gt": 0}},
+            [{"$set": {"virtual_balance": {"$add": ["$virtual_balance", "$frozen_balance"]}, "frozen_balance": 0.0, "updated_at": now}}]
+        )
+        await db.users.update_many({"frozen_balance": {"$ne": 0.0}}, {"$set": {"frozen_balance": 0.0, "updated_at": now}})
+        await gem_inventory.unfreeze_all()
+    
+    await sweep_frozen_funds()
+    return result
 
-        return {
-            "success": True,
-            "message": f"Обработано {cleanup_results['total_processed']} зависших ставок",
-            **cleanup_results
-        }
+async def _run_reset_balances_job(job: dict) -> dict:
+    job_id = job["id"]
+    total_users = await db.users.count_documents({})
+    result = {
+        "total_users_processed": total_users,
+        "default_balance": MAINTENANCE_DEFAULT_BALANCE,
+        "default_gems": MAINTENANCE_DEFAULT_GEMS
+    }
+    if job["dry_run"]:
+        return result
+    
+    last_id = job.get("cursor")
+    done = job.get("progress", {}).get("users_done", 0)
+    while True:
+        query = {"id": {"$gt": last_id}} if last_id else {}
+        ids = [u["id"] for u in await db.users.find(query, {"_id": 0, "id": 1}).sort("id", 1).limit(MAINTENANCE_JOB_CHUNK_SIZE).to_list(MAINTENANCE_JOB_CHUNK_SIZE)]
+        if not ids:
+            break
+        now = datetime.utcnow()
+        await db.users.update_many(
+            {"id": {"$in": ids}},
+            {"$set": {"virtual_balance": MAINTENANCE_DEFAULT_BALANCE, "frozen_balance": 0.0, "updated_at": now}}
+        )
+        await gem_inventory.create_many(ids, MAINTENANCE_DEFAULT_GEMS)
+        last_id = ids[-1]
+        done += len(ids)
+        await _update_maintenance_job(job_id, cursor=last_id, progress={"users_total": total_users, "users_done": done})
+    
+    await sweep_frozen_funds()
+    return result
 
-    except HTTPException:
-        raise
+MAINTENANCE_JOB_RUNNERS = {
+    "release_games": _run_game_release_job,
+    "reset_balances": _run_reset_balances_job
+}
+
+async def run_maintenance_job(job_id: str) -> dict:
+    """Run (or resume) a maintenance job and return its final document."""
+    job = await db.maintenance_jobs.find_one_and_update(
+        {"id": job_id, "status": {"$in": ["pending", "interrupted", "failed"]}},
+        {"$set": {"status": "running", "updated_at": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER
+    )
+    if not job:
+        return await db.maintenance_jobs.find_one({"id": job_id}, {"_id": 0})
+    try:
+        result = await MAINTENANCE_JOB_RUNNERS[job["kind"]](job)
+        await _update_maintenance_job(job_id, status="completed", phase="done", result=result, finished_at=datetime.utcnow())
+        if not job["dry_run"]:
+            await db.admin_logs.insert_one({
+                "admin_id": job["created_by"],
+                "admin_username": job.get("created_by_username"),
+                "action": job["params"].get("log_action", job["kind"]),
+                "details": {"job_id": job_id, **result},
+                "timestamp": datetime.utcnow()
+            })
     except Exception as e:
-        logger.error(f"Error cleaning up stuck bets: {e}")
+        logger.error(f"Maintenance job {job_id} ({job['kind']}) failed: {e}")
+        await _update_maintenance_job(job_id, status="failed", error=str(e))
+    return await db.maintenance_jobs.find_one({"id": job_id}, {"_id": 0})
+
+async def start_maintenance_job(kind: str, params: dict, admin: User, dry_run: bool = False,
+                                background: bool = False) -> dict:
+    """Create a job; run it inline, or in the background when `background` is set."""
+    job = {
+        "id": str(uuid.uuid4()),
+        "kind": kind,
+        "params": params,
+        "dry_run": dry_run,
+        "status": "pending",
+        "phase": None,
+        "progress": {},
+        "created_by": admin.id,
+        "created_by_username": admin.username,
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow()
+    }
+    if "filter" in params:
+        # Stored as extended JSON: operator keys ($and, $or...) are not valid field names
+        job["params"] = {**params, "filter": json_util.dumps(params["filter"])}
+    await db.maintenance_jobs.insert_one(job)
+    job.pop("_id", None)
+    if background:
+        asyncio.create_task(run_maintenance_job(job["id"]))
+        return job
+    return await run_maintenance_job(job["id"])
+
+def maintenance_job_response(job: dict, message: str) -> dict:
+    """Flatten a job into the summary shape the reset endpoints have always returned."""
+    if job["status"] == "failed":
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to cleanup stuck bets"
+            detail=f"Maintenance job {job['id']} failed: {job.get('error')}"
         )
+    if job["status"] != "completed":
+        return {"success": True, "job_id": job["id"], "status": job["status"], "message": "Задача запущена в фоне"}
+    result = job.get("result", {})
+    return {
+        "success": True,
+        "job_id": job["id"],
+        "dry_run": job["dry_run"],
+        "message": ("[dry run] " if job["dry_run"] else "") + message.format_map(defaultdict(int, result)),
+        **result
+    }
 
-@api_router.post("/admin/bets/reset-all", response_model=dict)
-async def reset_all_bets(current_user: User = Depends(get_current_super_admin)):
-    """Reset all active bets in the system (SUPER_ADMIN only)."""
+async def mark_interrupted_maintenance_jobs():
+    """Jobs left running by a previous process can be resumed from the admin API."""
+    await db.maintenance_jobs.update_many(
+        {"status": "running"},
+        {"$set": {"status": "interrupted", "updated_at": datetime.utcnow()}}
+    )
+
+@api_router.get("/admin/workers/coordination", response_model=dict)
+async def get_worker_coordination(current_user: User = Depends(get_current_admin)):
+    """Background roles led by the worker serving this request and the bot shard ring."""
+    if coordinator is None:
+        return {"success": True, "worker_id": None, "roles": {}, "bot_sharding": BOT_SHARDING_ENABLED, "shard_workers": []}
+    return {
+        "success": True,
+        "worker_id": coordinator.worker_id,
+        "roles": dict(coordinator.roles),
+        "bot_sharding": BOT_SHARDING_ENABLED,
+        "shard_workers": coordinator.ring.nodes if BOT_SHARDING_ENABLED else []
+    }
+
+@api_router.get("/admin/maintenance/jobs", response_model=dict)
+async def list_maintenance_jobs(limit: int = 20, current_user: User = Depends(get_current_admin)):
+    jobs = await db.maintenance_jobs.find({}, {"_id": 0}).sort("created_at", -1).limit(min(limit, 100)).to_list(100)
+    return {"success": True, "jobs": jobs}
+
+@api_router.get("/admin/maintenance/jobs/{job_id}", response_model=dict)
+async def get_maintenance_job(job_id: str, current_user: User = Depends(get_current_admin)):
+    job = await db.maintenance_jobs.find_one({"id": job_id}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return {"success": True, "job": job}
+
+@api_router.post("/admin/maintenance/jobs/{job_id}/resume", response_model=dict)
+async def resume_maintenance_job(job_id: str, current_user: User = Depends(get_current_super_admin)):
+    job = await db.maintenance_jobs.find_one({"id": job_id}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    if job["status"] not in ("interrupted", "failed"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Job is {job['status']}, only interrupted or failed jobs can be resumed"
+        )
+    asyncio.create_task(run_maintenance_job(job_id))
+    return {"success": True, "job_id": job_id, "status": "running"}
+
+@api_router.post("/admin/bets/unfreeze-stuck", response_model=dict)
+async def unfreeze_all_stuck_bets(
+    dry_run: bool = False,
+    background: bool = False,
+    current_user: User = Depends(get_current_admin)
+):
+    """Разморозить все действительно зависшие ставки (>5 минут без хода одной из сторон) и перезапустить их.
+    Критерий зависания:
+      - status == ACTIVE
+      - отсутствует ход одной из сторон (opponent_move is None или creator_move is None)
+      - прошло > 5 минут с момента последнего обновления/присоединения/старта (updated_at|joined_at|started_at|created_at)
+    Действие (maintenance job, как handle_game_timeout для каждой ставки):
+      - возвращаем ресурсы оппонента и переводим ставку в WAITING с новым commit-reveal
+    """
     try:
-        # Find all active games
-        active_games = await db.games.find({
-            "status": {"$in": ["WAITING", "ACTIVE", "REVEAL"]}
-        }).to_list(10000)  # Limit to prevent memory issues
-        
-        reset_results = {
-            "total_processed": 0,
-            "cancelled_games": [],
-            "total_gems_returned": {},
-            "total_commission_returned": 0,
-            "users_affected": set(),
-            "bots_affected": set()
-        }
-        
-        for game in active_games:
-            game_id = game.get("id")
-            game_status = game.get("status")
-            creator_id = game.get("creator_id")
-            opponent_id = game.get("opponent_id")
-            bet_amount = game.get("bet_amount", 0)
-            bet_gems = game.get("bet_gems", {})
-            opponent_gems = game.get("opponent_gems", {})
-            
-            # Cancel the game
-            await db.games.update_one(
-                {"id": game_id},
-                {
-                    "$set": {
-                        "status": "CANCELLED",
-                        "cancelled_at": datetime.utcnow(),
-                        "cancelled_by": "admin_reset_all",
-                        "cancel_reason": f"Reset all bets by admin {current_user.username}"
-                    }
-                }
-            )
-            
-            commission_returned = 0
-            
-            # Return resources based on game status
-            if game_status == "WAITING":
-                # Only creator has bet, return their resources
-                for gem_type, quantity in bet_gems.items():
-                    await db.user_gems.update_one(
-                        {"user_id": creator_id, "gem_type": gem_type},
-                        {
-                            "$inc": {"frozen_quantity": -quantity},
-                            "$set": {"updated_at": datetime.utcnow()}
-                        }
-                    )
-                    reset_results["total_gems_returned"][gem_type] = reset_results["total_gems_returned"].get(gem_type, 0) + quantity
-                
-                # Return commission to creator (only if it's a user)
-                commission_rate = await get_bet_commission_rate_fraction()
-                commission_amount = round_money(bet_amount * commission_rate)
-                creator_user = await db.users.find_one({"id": creator_id})
-                if creator_user:
-                    await db.users.update_one(
-                        {"id": creator_id},
-                        {
-                            "$inc": {
-                                "virtual_balance": commission_amount,
-                                "frozen_balance": -commission_amount
-                            },
-                            "$set": {"updated_at": datetime.utcnow()}
-                        }
-                    )
-                    commission_returned += commission_amount
-                    reset_results["users_affected"].add(creator_id)
-                else:
-                    reset_results["bots_affected"].add(creator_id)
-                    
-            elif game_status in ["ACTIVE", "REVEAL"]:
-                # Both players have bet, return resources to both
-                
-                # Return creator's resources
-                for gem_type, quantity in bet_gems.items():
-                    await db.user_gems.update_one(
-                        {"user_id": creator_id, "gem_type": gem_type},
-                        {
-                            "$inc": {"frozen_quantity": -quantity},
-                            "$set": {"updated_at": datetime.utcnow()}
-                        }
-                    )
-                    reset_results["total_gems_returned"][gem_type] = reset_results["total_gems_returned"].get(gem_type, 0) + quantity
-                
-                # Return opponent's resources
-                opponent_bet_gems = opponent_gems if opponent_gems else bet_gems
-                for gem_type, quantity in opponent_bet_gems.items():
-                    await db.user_gems.update_one(
-                        {"user_id": opponent_id, "gem_type": gem_type},
-                        {
-                            "$inc": {"frozen_quantity": -quantity},
-                            "$set": {"updated_at": datetime.utcnow()}
-                        }
-                    )
-                    reset_results["total_gems_returned"][gem_type] = reset_results["total_gems_returned"].get(gem_type, 0) + quantity
-                
-                # Return commission to both players
-                commission_rate = await get_bet_commission_rate_fraction()
-                commission_amount = round_money(bet_amount * commission_rate)
-                
-                # Return to creator
-                creator_user = await db.users.find_one({"id": creator_id})
-                if creator_user:
-                    await db.users.update_one(
-                        {"id": creator_id},
-                        {
-                            "$inc": {
-                                "virtual_balance": commission_amount,
-                                "frozen_balance": -commission_amount
-                            },
-                            "$set": {"updated_at": datetime.utcnow()}
-                        }
-                    )
-                    commission_returned += commission_amount
-                    reset_results["users_affected"].add(creator_id)
-                else:
-                    reset_results["bots_affected"].add(creator_id)
-                
-                # Return to opponent
-                if opponent_id:
-                    opponent_user = await db.users.find_one({"id": opponent_id})
-                    if opponent_user:
-                        await db.users.update_one(
-                            {"id": opponent_id},
-                            {
-                                "$inc": {
-                                    "virtual_balance": commission_amount,
-                                    "frozen_balance": -commission_amount
-                                },
-                                "$set": {"updated_at": datetime.utcnow()}
-                            }
-                        )
-                        commission_returned += commission_amount
-                        reset_results["users_affected"].add(opponent_id)
-                    else:
-                        reset_results["bots_affected"].add(opponent_id)
-            
-            reset_results["cancelled_games"].append({
-                "game_id": game_id,
-                "status": game_status,
-                "bet_amount": bet_amount,
-                "created_at": game.get("created_at")
-            })
-            reset_results["total_commission_returned"] += commission_returned
-            reset_results["total_processed"] += 1
-        
-        # Convert sets to lists for JSON serialization
-        reset_results["users_affected"] = list(reset_results["users_affected"])
-        reset_results["bots_affected"] = list(reset_results["bots_affected"])
-        
-        # Log admin action
-        admin_log = {
-            "admin_id": current_user.id,
-            "admin_username": current_user.username,
-            "action": "reset_all_bets",
-            "details": reset_results,
-            "timestamp": datetime.utcnow()
-        }
-        await db.admin_logs.insert_one(admin_log)
-        
-        return {
-            "success": True,
-            "message": f"Successfully reset {reset_results['total_processed']} active bets",
-            **reset_results
-        }
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error resetting all bets: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to reset all bets"
-        )
-
-@api_router.post("/admin/bets/reset-fractional", response_model=dict)
-async def reset_fractional_gem_bets(current_user: User = Depends(get_current_super_admin)):
-    """Reset all bets with fractional gem amounts (SUPER_ADMIN only)."""
-    try:
-        # Find all games with fractional bet amounts using MongoDB aggregation
-        pipeline = [
-            {
-                "$match": {
-                    "status": {"$in": ["WAITING", "ACTIVE", "REVEAL"]},
-                    "bet_amount": {"$exists": True, "$ne": None}
-                }
-            },
-            {
-                "$addFields": {
-                    "is_fractional": {
-                        "$ne": [
-                            {"$mod": ["$bet_amount", 1]},
-                            0
-                        ]
-                    }
-                }
-            },
-            {
-                "$match": {
-                    "is_fractional": True
-                }
-            }
-        ]
-        
-        fractional_games = await db.games.aggregate(pipeline).to_list(10000)
-        
-        if not fractional_games:
-            return {
-                "success": True,
-                "message": "No bets with fractional gem amounts found",
-                "total_processed": 0,
-                "cancelled_games": [],
-                "total_gems_returned": {},
-                "total_commission_returned": 0,
-                "users_affected": [],
-                "bots_affected": []
-            }
-        
-        reset_results = {
-            "total_processed": 0,
-            "cancelled_games": [],
-            "total_gems_returned": {},
-            "total_commission_returned": 0,
-            "users_affected": set(),
-            "bots_affected": set()
-        }
-        
-        for game in fractional_games:
-            game_id = game.get("id")
-            game_status = game.get("status")
-            creator_id = game.get("creator_id")
-            opponent_id = game.get("opponent_id")
-            bet_amount = game.get("bet_amount", 0)
-            bet_gems = game.get("bet_gems", {})
-            opponent_gems = game.get("opponent_gems", {})
-            
-            # Cancel the game
-            await db.games.update_one(
-                {"id": game_id},
-                {
-                    "$set": {
-                        "status": "CANCELLED",
-                        "cancelled_at": datetime.utcnow(),
-                        "cancelled_by": "admin_reset_fractional",
-                        "cancel_reason": f"Reset fractional gem bet by admin {current_user.username}"
-                    }
-                }
-            )
-            
-            commission_returned = 0
-            
-            # Return resources based on game status
-            if game_status == "WAITING":
-                # Only creator has committed resources
-                # Return creator's gems
-                for gem_type, quantity in bet_gems.items():
-                    if quantity > 0:
-                        await db.users.update_one(
-                            {"id": creator_id},
-                            {
-                                "$inc": {"gems." + gem_type + ".quantity": quantity, "gems." + gem_type + ".frozen_quantity": -quantity},
-                                "$set": {"updated_at": datetime.utcnow()}
-                            }
-                        )
-                        reset_results["total_gems_returned"][gem_type] = reset_results["total_gems_returned"].get(gem_type, 0) + quantity
-                
-                # Return creator's commission
-                commission_rate = await get_bet_commission_rate_fraction()
-                commission_amount = round_money(bet_amount * commission_rate)
-                creator_user = await db.users.find_one({"id": creator_id})
-                if creator_user:
-                    await db.users.update_one(
-                        {"id": creator_id},
-                        {
-                            "$inc": {
-                                "virtual_balance": commission_amount,
-                                "frozen_balance": -commission_amount
-                            },
-                            "$set": {"updated_at": datetime.utcnow()}
-                        }
-                    )
-                    commission_returned += commission_amount
-                    reset_results["users_affected"].add(creator_id)
-                else:
-                    reset_results["bots_affected"].add(creator_id)
-            
-            elif game_status in ["ACTIVE", "REVEAL"]:
-                # Both players have committed resources
-                # Return creator's gems
-                for gem_type, quantity in bet_gems.items():
-                    if quantity > 0:
-                        await db.users.update_one(
-                            {"id": creator_id},
-                            {
-                                "$inc": {"gems." + gem_type + ".quantity": quantity, "gems." + gem_type + ".frozen_quantity": -quantity},
-                                "$set": {"updated_at": datetime.utcnow()}
-                            }
-                        )
-                        reset_results["total_gems_returned"][gem_type] = reset_results["total_gems_returned"].get(gem_type, 0) + quantity
-                
-                # Return opponent's gems
-                for gem_type, quantity in opponent_gems.items():
-                    if quantity > 0:
-                        await db.users.update_one(
-                            {"id": opponent_id},
-                            {
-                                "$inc": {"gems." + gem_type + ".quantity": quantity, "gems." + gem_type + ".frozen_quantity": -quantity},
-                                "$set": {"updated_at": datetime.utcnow()}
-                            }
-                        )
-                        reset_results["total_gems_returned"][gem_type] = reset_results["total_gems_returned"].get(gem_type, 0) + quantity
-                
-                # Return commission to both players
-                commission_rate = await get_bet_commission_rate_fraction()
-                commission_amount = round_money(bet_amount * commission_rate)
-                
-                # Return to creator
-                creator_user = await db.users.find_one({"id": creator_id})
-                if creator_user:
-                    await db.users.update_one(
-                        {"id": creator_id},
-                        {
-                            "$inc": {
-                                "virtual_balance": commission_amount,
-                                "frozen_balance": -commission_amount
-                            },
-                            "$set": {"updated_at": datetime.utcnow()}
-                        }
-                    )
-                    commission_returned += commission_amount
-                    reset_results["users_affected"].add(creator_id)
-                else:
-                    reset_results["bots_affected"].add(creator_id)
-                
-                # Return to opponent
-                if opponent_id:
-                    opponent_user = await db.users.find_one({"id": opponent_id})
-                    if opponent_user:
-                        await db.users.update_one(
-                            {"id": opponent_id},
-                            {
-                                "$inc": {
-                                    "virtual_balance": commission_amount,
-                                    "frozen_balance": -commission_amount
-                                },
-                                "$set": {"updated_at": datetime.utcnow()}
-                            }
-                        )
-                        commission_returned += commission_amount
-                        reset_results["users_affected"].add(opponent_id)
-                    else:
-                        reset_results["bots_affected"].add(opponent_id)
-            
-            reset_results["cancelled_games"].append({
-                "game_id": game_id,
-                "status": game_status,
-                "bet_amount": bet_amount,
-                "fractional_part": bet_amount % 1,
-                "created_at": game.get("created_at")
-            })
-            reset_results["total_commission_returned"] += commission_returned
-            reset_results["total_processed"] += 1
-        
-        # Convert sets to lists for JSON serialization
-        reset_results["users_affected"] = list(reset_results["users_affected"])
-        reset_results["bots_affected"] = list(reset_results["bots_affected"])
-        
-        # Log admin action
-        admin_log = {
-            "admin_id": current_user.id,
-            "admin_username": current_user.username,
-            "action": "reset_fractional_gem_bets",
-            "details": reset_results,
-            "timestamp": datetime.utcnow()
-        }
-        await db.admin_logs.insert_one(admin_log)
-        
-        return {
-            "success": True,
-            "message": f"Successfully reset {reset_results['total_processed']} bets with fractional gem amounts",
-            **reset_results
-        }
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error resetting fractional gem bets: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to reset fractional gem bets"
-        )
-
-@api_router.post("/admin/bets/delete-all", response_model=dict)
-async def delete_all_bets(current_user: User = Depends(get_current_super_admin)):
-    """Physically delete ALL bets from the database (SUPER_ADMIN only)."""
-    try:
-        # Get all games before deletion for processing
-        all_games = await db.games.find({}).to_list(100000)  # Large limit to get all games
-        
-        delete_results = {
-            "total_deleted": 0,
-            "active_games_processed": 0,
-            "completed_games_deleted": 0,
-            "total_gems_returned": {},
-            "total_commission_returned": 0,
-            "users_affected": set(),
-            "bots_affected": set(),
-            "games_by_status": {}
-        }
-        
-        # Process active games - return resources before deletion
-        for game in all_games:
-            game_id = game.get("id")
-            game_status = game.get("status")
-            creator_id = game.get("creator_id")
-            opponent_id = game.get("opponent_id")
-            bet_amount = game.get("bet_amount", 0)
-            bet_gems = game.get("bet_gems", {})
-            opponent_gems = game.get("opponent_gems", {})
-            
-            # Count games by status
-            delete_results["games_by_status"][game_status] = delete_results["games_by_status"].get(game_status, 0) + 1
-            
-            commission_returned = 0
-            
-            # Return resources for active games
-            if game_status == "WAITING":
-                # Only creator has committed resources
-                delete_results["active_games_processed"] += 1
-                
-                # Return creator's gems
-                if isinstance(bet_gems, dict):
-                    for gem_type, quantity in bet_gems.items():
-                        if quantity > 0:
-                            await db.user_gems.update_one(
-                                {"user_id": creator_id, "gem_type": gem_type},
-                                {
-                                    "$inc": {"frozen_quantity": -quantity},
-                                    "$set": {"updated_at": datetime.utcnow()}
-                                }
-                            )
-                            delete_results["total_gems_returned"][gem_type] = delete_results["total_gems_returned"].get(gem_type, 0) + quantity
-                
-                # Return creator's commission
-                commission_rate = await get_bet_commission_rate_fraction()
-                commission_amount = round_money(bet_amount * commission_rate)
-                creator_user = await db.users.find_one({"id": creator_id})
-                if creator_user:
-                    await db.users.update_one(
-                        {"id": creator_id},
-                        {
-                            "$inc": {
-                                "virtual_balance": commission_amount,
-                                "frozen_balance": -commission_amount
-                            },
-                            "$set": {"updated_at": datetime.utcnow()}
-                        }
-                    )
-                    commission_returned += commission_amount
-                    delete_results["users_affected"].add(creator_id)
-                else:
-                    delete_results["bots_affected"].add(creator_id)
-            
-            elif game_status in ["ACTIVE", "REVEAL"]:
-                # Both players have committed resources
-                delete_results["active_games_processed"] += 1
-                
-                # Return creator's gems
-                if isinstance(bet_gems, dict):
-                    for gem_type, quantity in bet_gems.items():
-                        if quantity > 0:
-                            await db.user_gems.update_one(
-                                {"user_id": creator_id, "gem_type": gem_type},
-                                {
-                                    "$inc": {"frozen_quantity": -quantity},
-                                    "$set": {"updated_at": datetime.utcnow()}
-                                }
-                            )
-                            delete_results["total_gems_returned"][gem_type] = delete_results["total_gems_returned"].get(gem_type, 0) + quantity
-                
-                # Return opponent's gems
-                if isinstance(opponent_gems, dict):
-                    for gem_type, quantity in opponent_gems.items():
-                        if quantity > 0:
-                            await db.user_gems.update_one(
-                                {"user_id": opponent_id, "gem_type": gem_type},
-                                {
-                                    "$inc": {"frozen_quantity": -quantity},
-                                    "$set": {"updated_at": datetime.utcnow()}
-                                }
-                            )
-                            delete_results["total_gems_returned"][gem_type] = delete_results["total_gems_returned"].get(gem_type, 0) + quantity
-                
-                # Return commission to both players
-                commission_rate = await get_bet_commission_rate_fraction()
-                commission_amount = round_money(bet_amount * commission_rate)
-                
-                # Return to creator
-                creator_user = await db.users.find_one({"id": creator_id})
-                if creator_user:
-                    await db.users.update_one(
-                        {"id": creator_id},
-                        {
-                            "$inc": {
-                                "virtual_balance": commission_amount,
-                                "frozen_balance": -commission_amount
-                            },
-                            "$set": {"updated_at": datetime.utcnow()}
-                        }
-                    )
-                    commission_returned += commission_amount
-                    delete_results["users_affected"].add(creator_id)
-                else:
-                    delete_results["bots_affected"].add(creator_id)
-                
-                # Return to opponent
-                if opponent_id:
-                    opponent_user = await db.users.find_one({"id": opponent_id})
-                    if opponent_user:
-                        await db.users.update_one(
-                            {"id": opponent_id},
-                            {
-                                "$inc": {
-                                    "virtual_balance": commission_amount,
-                                    "frozen_balance": -commission_amount
-                                },
-                                "$set": {"updated_at": datetime.utcnow()}
-                            }
-                        )
-                        commission_returned += commission_amount
-                        delete_results["users_affected"].add(opponent_id)
-                    else:
-                        delete_results["bots_affected"].add(opponent_id)
-            
-            else:
-                # COMPLETED, CANCELLED, TIMEOUT games - just count for deletion
-                delete_results["completed_games_deleted"] += 1
-            
-            delete_results["total_commission_returned"] += commission_returned
-            delete_results["total_deleted"] += 1
-        
-        # Now physically delete ALL games from the database
-        delete_result = await db.games.delete_many({})
-        actual_deleted = delete_result.deleted_count
-        
-        # Convert sets to lists for JSON serialization
-        delete_results["users_affected"] = list(delete_results["users_affected"])
-        delete_results["bots_affected"] = list(delete_results["bots_affected"])
-        
-        # Log admin action
-        admin_log = {
-            "admin_id": current_user.id,
-            "admin_username": current_user.username,
-            "action": "delete_all_bets",
-            "details": {
-                **delete_results,
-                "actual_database_deletions": actual_deleted
-            },
-            "timestamp": datetime.utcnow()
-        }
-        await db.admin_logs.insert_one(admin_log)
-        
-        return {
-            "success": True,
-            "message": f"Successfully deleted {actual_deleted} bets from database",
-            "actual_database_deletions": actual_deleted,
-            **delete_results
+        now = datetime.utcnow()
+        threshold = now - timedelta(minutes=5)
+
+        # Подбор зависших по критериям
+        query = {
+            "status": "ACTIVE",
+            "$and": [
+                {"$or": [
+                    {"opponent_move": None},
+                    {"creator_move": None}
+                ]},
+                {"$or": [
+                    {"updated_at": {"$lt": threshold}},
+                    {"$and": [
+                        {"updated_at": {"$exists": False}},
+                        {"created_at": {"$lt": threshold}}
+                    ]}
+                ]}
+            ]
         }
-        
+
+        job = await start_maintenance_job(
+            "release_games",
+            {"mode": "recreate", "filter": query, "log_action": "unfreeze_stuck_bets"},
+            current_user, dry_run=dry_run, background=background
+        )
+        return maintenance_job_response(job, "Обработано {total_processed} зависших ставок")
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error cleaning up stuck bets: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to cleanup stuck bets"
+        )
+
+@api_router.post("/admin/bets/reset-all", response_model=dict)
+async def reset_all_bets(
+    dry_run: bool = False,
+    background: bool = False,
+    current_user: User = Depends(get_current_super_admin)
+):
+    """Reset all active bets in the system (SUPER_ADMIN only)."""
+    try:
+        job = await start_maintenance_job(
+            "release_games",
+            {
+                "mode": "cancel",
+                "filter": {"status": {"$in": MAINTENANCE_GAME_STATUSES}},
+                "cancel_fields": {
+                    "cancelled_by": "admin_reset_all",
+                    "cancel_reason": f"Reset all bets by admin {current_user.username}"
+                },
+                "log_action": "reset_all_bets"
+            },
+            current_user, dry_run=dry_run, background=background
+        )
+        return maintenance_job_response(job, "Successfully reset {total_processed} active bets")
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error resetting all bets: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to reset all bets"
+        )
+
+@api_router.post("/admin/bets/reset-fractional", response_model=dict)
+async def reset_fractional_gem_bets(
+    dry_run: bool = False,
+    background: bool = False,
+    current_user: User = Depends(get_current_super_admin)
+):
+    """Reset all bets with fractional gem amounts (SUPER_ADMIN only)."""
+    try:
+        # Games with fractional bet amounts
+        fractional_filter = {"$and": [
+            {"status": {"$in": MAINTENANCE_GAME_STATUSES}, "bet_amount": {"$exists": True, "$ne": None}},
+            {"$expr": {"$ne": [{"$mod": ["$bet_amount", 1]}, 0]}}
+        ]}
+        job = await start_maintenance_job(
+            "release_games",
+            {
+                "mode": "cancel",
+                "filter": fractional_filter,
+                "cancel_fields": {
+                    "cancelled_by": "admin_reset_fractional",
+                    "cancel_reason": f"Reset fractional gem bet by admin {current_user.username}"
+                },
+                "log_action": "reset_fractional_gem_bets"
+            },
+            current_user, dry_run=dry_run, background=background
+        )
+        return maintenance_job_response(job, "Successfully reset {total_processed} bets with fractional gem amounts")
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error resetting fractional gem bets: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to reset fractional gem bets"
+        )
+
+@api_router.post("/admin/bets/delete-all", response_model=dict)
+async def delete_all_bets(
+    dry_run: bool = False,
+    background: bool = False,
+    current_user: User = Depends(get_current_super_admin)
+):
+    """Physically delete ALL bets from the database (SUPER_ADMIN only)."""
+    try:
+        # Resources of active games are returned first, then ALL games are deleted
+        job = await start_maintenance_job(
+            "release_games",
+            {
+                "mode": "delete",
+                "filter": {"status": {"$in": MAINTENANCE_GAME_STATUSES}},
+                "delete_all": True,
+                "count_by_status": True,
+                "log_action": "delete_all_bets"
+            },
+            current_user, dry_run=dry_run, background=background
+        )
+        return maintenance_job_response(job, "Successfully deleted {actual_database_deletions} bets from database")
+
     except HTTPException:
         raise
     except Exception as e:
@@ -16408,19 +15701,13 @@ async def reset_user_bets(
             if game_status == "WAITING":
                 if creator_id == user_id:
                     # User created the game, return their resources
-                    for gem_type, quantity in bet_gems.items():
-                        await db.user_gems.update_one(
-                            {"user_id": user_id, "gem_type": gem_type},
-                            {
-                                "$inc": {"frozen_quantity": -quantity},
-                                "$set": {"updated_at": datetime.utcnow()}
-                            }
-                        )
+                    await gem_inventory.unfreeze(user_id, bet_gems)
+                    for gem_type, quantity in normalize_gems(bet_gems).items():
                         reset_results["total_gems_returned"][gem_type] = reset_results["total_gems_returned"].get(gem_type, 0) + quantity
                     
                     # Return commission
                     commission_rate = await get_bet_commission_rate_fraction()
-                    commission_amount = round_money(bet_amount * commission_rate)
+                    commission_amount = commission_for(bet_amount, commission_rate)
                     await db.users.update_one(
                         {"id": user_id},
                         {
@@ -16437,18 +15724,12 @@ async def reset_user_bets(
                 # Return user's resources regardless of their role
                 if creator_id == user_id:
                     # User is creator
-                    for gem_type, quantity in bet_gems.items():
-                        await db.user_gems.update_one(
-                            {"user_id": user_id, "gem_type": gem_type},
-                            {
-                                "$inc": {"frozen_quantity": -quantity},
-                                "$set": {"updated_at": datetime.utcnow()}
-                            }
-                        )
+                    await gem_inventory.unfreeze(user_id, bet_gems)
+                    for gem_type, quantity in normalize_gems(bet_gems).items():
                         reset_results["total_gems_returned"][gem_type] = reset_results["total_gems_returned"].get(gem_type, 0) + quantity
                     
                     commission_rate = await get_bet_commission_rate_fraction()
-                    commission_amount = round_money(bet_amount * commission_rate)
+                    commission_amount = commission_for(bet_amount, commission_rate)
                     await db.users.update_one(
                         {"id": user_id},
                         {
@@ -16464,18 +15745,12 @@ async def reset_user_bets(
                 elif opponent_id == user_id:
                     # User is opponent
                     opponent_bet_gems = opponent_gems if opponent_gems else bet_gems
-                    for gem_type, quantity in opponent_bet_gems.items():
-                        await db.user_gems.update_one(
-                            {"user_id": user_id, "gem_type": gem_type},
-                            {
-                                "$inc": {"frozen_quantity": -quantity},
-                                "$set": {"updated_at": datetime.utcnow()}
-                            }
-                        )
+                    await gem_inventory.unfreeze(user_id, opponent_bet_gems)
+                    for gem_type, quantity in normalize_gems(opponent_bet_gems).items():
                         reset_results["total_gems_returned"][gem_type] = reset_results["total_gems_returned"].get(gem_type, 0) + quantity
                     
                     commission_rate = await get_bet_commission_rate_fraction()
-                    commission_amount = round_money(bet_amount * commission_rate)
+                    commission_amount = commission_for(bet_amount, commission_rate)
                     await db.users.update_one(
                         {"id": user_id},
                         {
@@ -16527,85 +15802,19 @@ async def reset_user_bets(
 # Removed legacy endpoint /admin/bots/{bot_id}/reset-bets (super admin variant)
 
 @api_router.post("/admin/users/reset-all-balances", response_model=dict)
-async def reset_all_user_balances(current_user: User = Depends(get_current_super_admin)):
+async def reset_all_user_balances(
+    dry_run: bool = False,
+    background: bool = False,
+    current_user: User = Depends(get_current_super_admin)
+):
     """Reset all user balances and inventories to default values (SUPER_ADMIN only)."""
     try:
-        # Default starting values
-        default_balance = 1000.0
-        default_gems = {
-            "Ruby": 20,      # $100 worth
-            "Emerald": 15,   # $150 worth  
-            "Sapphire": 10,  # $200 worth
-            "Diamond": 8,    # $240 worth
-            "Amber": 35,     # $105 worth
-            "Topaz": 25,     # $125 worth
-            "Onyx": 16       # $80 worth
-        }  # Total: ~$1000 worth of gems
-        
-        # Find all users
-        users = await db.users.find({}).to_list(10000)
-        
-        reset_results = {
-            "total_users_processed": 0,
-            "users_reset": [],
-            "default_balance": default_balance,
-            "default_gems": default_gems
-        }
-        
-        for user in users:
-            user_id = user.get("id")
-            username = user.get("username")
-            
-            # Reset user balance
-            await db.users.update_one(
-                {"id": user_id},
-                {
-                    "$set": {
-                        "virtual_balance": default_balance,
-                        "frozen_balance": 0.0,
-                        "updated_at": datetime.utcnow()
-                    }
-                }
-            )
-            
-            # Clear existing gems
-            await db.user_gems.delete_many({"user_id": user_id})
-            
-            # Add default gems
-            for gem_type, quantity in default_gems.items():
-                await db.user_gems.insert_one({
-                    "user_id": user_id,
-                    "gem_type": gem_type,
-                    "quantity": quantity,
-                    "frozen_quantity": 0,
-                    "created_at": datetime.utcnow(),
-                    "updated_at": datetime.utcnow()
-                })
-            
-            reset_results["users_reset"].append({
-                "user_id": user_id,
-                "username": username,
-                "new_balance": default_balance,
-                "new_gems": default_gems
-            })
-            reset_results["total_users_processed"] += 1
-        
-        # Log admin action
-        admin_log = {
-            "admin_id": current_user.id,
-            "admin_username": current_user.username,
-            "action": "reset_all_user_balances",
-            "details": reset_results,
-            "timestamp": datetime.utcnow()
-        }
-        await db.admin_logs.insert_one(admin_log)
-        
-        return {
-            "success": True,
-            "message": f"Successfully reset balances and inventories for {reset_results['total_users_processed']} users",
-            **reset_results
-        }
-        
+        job = await start_maintenance_job(
+            "reset_balances", {"log_action": "reset_all_user_balances"},
+            current_user, dry_run=dry_run, background=background
+        )
+        return maintenance_job_response(job, "Successfully reset balances and inventories for {total_users_processed} users")
+
     except HTTPException:
         raise
     except Exception as e:
@@ -16654,19 +15863,8 @@ async def reset_user_balance(
             }
         )
         
-        # Clear existing gems
-        await db.user_gems.delete_many({"user_id": user_id})
-        
-        # Add default gems
-        for gem_type, quantity in default_gems.items():
-            await db.user_gems.insert_one({
-                "user_id": user_id,
-                "gem_type": gem_type,
-                "quantity": quantity,
-                "frozen_quantity": 0,
-                "created_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow()
-            })
+        # Replace existing gems with the default set
+        await gem_inventory.create(user_id, default_gems)
         
         # Log admin action
         admin_log = {
@@ -16776,18 +15974,11 @@ async def cancel_stuck_game(game_id: str):
         game_obj = Game(**game)
         
         # Return creator's resources
-        for gem_type, quantity in game_obj.bet_gems.items():
-            await db.user_gems.update_one(
-                {"user_id": game_obj.creator_id, "gem_type": gem_type},
-                {
-                    "$inc": {"frozen_quantity": -quantity},
-                    "$set": {"updated_at": datetime.utcnow()}
-                }
-            )
+        await gem_inventory.unfreeze(game_obj.creator_id, game_obj.bet_gems)
         
         # Return creator's commission
         commission_rate = await get_bet_commission_rate_fraction()
-        commission = round_money(game_obj.bet_amount * commission_rate)
+        commission = commission_for(game_obj.bet_amount, commission_rate)
         await db.users.update_one(
             {"id": game_obj.creator_id},
             {
@@ -16806,14 +15997,7 @@ async def cancel_stuck_game(game_id: str):
             if opponent_user:
                 # Return opponent's gems
                 opponent_gems = game_obj.opponent_gems or game_obj.bet_gems
-                for gem_type, quantity in opponent_gems.items():
-                    await db.user_gems.update_one(
-                        {"user_id": game_obj.opponent_id, "gem_type": gem_type},
-                        {
-                            "$inc": {"frozen_quantity": -quantity},
-                            "$set": {"updated_at": datetime.utcnow()}
-                        }
-                    )
+                await gem_inventory.unfreeze(game_obj.opponent_id, opponent_gems)
                 
                 # Return opponent's commission
                 await db.users.update_one(
@@ -16859,11 +16043,12 @@ async def get_user_stats(
                 detail="User not found"
             )
         
-        # Game statistics
-        total_games = user.get("total_games_played", 0)
-        games_won = user.get("total_games_won", 0)
-        games_lost = total_games - games_won
-        games_draw = user.get("total_games_draw", 0)
+        # Game statistics from the per-player aggregate (users without games have none)
+        stats = await leaderboard.get(user_id) or {}
+        total_games = stats.get("games_played", 0)
+        games_won = stats.get("games_won", 0)
+        games_lost = stats.get("games_lost", 0)
+        games_draw = stats.get("games_draw", 0)
         win_rate = round((games_won / total_games * 100), 1) if total_games > 0 else 0
         
         # Financial statistics (simplified for demo)
@@ -16885,7 +16070,10 @@ async def get_user_stats(
                 "games_won": games_won,
                 "games_lost": games_lost,
                 "games_draw": games_draw,
-                "win_rate": win_rate
+                "win_rate": win_rate,
+                "favorite_gem": favorite_gem(stats),
+                "amount_won": stats.get("amount_won", 0),
+                "amount_lost": stats.get("amount_lost", 0)
             },
             "financial_stats": {
                 "current_balance": user.get("virtual_balance", 0),
@@ -16942,30 +16130,20 @@ async def freeze_user_gems(
             )
         
         # Get user's gem data
-        user_gem = await db.user_gems.find_one({"user_id": user_id, "gem_type": gem_type})
-        if not user_gem or user_gem.get("quantity", 0) < quantity:
+        inventory = await gem_inventory.get(user_id)
+        if counts(inventory, "quantity").get(gem_type, 0) < quantity:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Insufficient gems to freeze"
             )
         
-        # Check available (non-frozen) gems
-        available_quantity = user_gem.get("quantity", 0) - user_gem.get("frozen_quantity", 0)
-        if available_quantity < quantity:
+        # Freeze the gems (the store re-checks availability atomically)
+        if not await gem_inventory.freeze(user_id, {gem_type: quantity}):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Insufficient available gems to freeze"
             )
         
-        # Freeze the gems
-        await db.user_gems.update_one(
-            {"user_id": user_id, "gem_type": gem_type},
-            {
-                "$inc": {"frozen_quantity": quantity},
-                "$set": {"updated_at": datetime.utcnow()}
-            }
-        )
-        
         # Log admin action
         admin_log = AdminLog(
             admin_id=current_user.id,
@@ -17034,21 +16212,15 @@ async def unfreeze_user_gems(
             )
         
         # Get user's gem data
-        user_gem = await db.user_gems.find_one({"user_id": user_id, "gem_type": gem_type})
-        if not user_gem or user_gem.get("frozen_quantity", 0) < quantity:
+        inventory = await gem_inventory.get(user_id)
+        if counts(inventory, "frozen").get(gem_type, 0) < quantity:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Insufficient frozen gems to unfreeze"
             )
         
         # Unfreeze the gems
-        await db.user_gems.update_one(
-            {"user_id": user_id, "gem_type": gem_type},
-            {
-                "$inc": {"frozen_quantity": -quantity},
-                "$set": {"updated_at": datetime.utcnow()}
-            }
-        )
+        await gem_inventory.unfreeze(user_id, {gem_type: quantity})
         
         # Log admin action
         admin_log = AdminLog(
@@ -17115,34 +16287,20 @@ async def delete_user_gems(
             )
         
         # Get user's gem data
-        user_gem = await db.user_gems.find_one({"user_id": user_id, "gem_type": gem_type})
-        if not user_gem or user_gem.get("quantity", 0) < quantity:
+        inventory = await gem_inventory.get(user_id)
+        if counts(inventory, "quantity").get(gem_type, 0) < quantity:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Insufficient gems to delete"
             )
         
-        # Calculate available (non-frozen) quantity
-        available_quantity = user_gem.get("quantity", 0) - user_gem.get("frozen_quantity", 0)
-        if available_quantity < quantity:
+        # Delete the gems; only the available (non-frozen) part can be removed
+        if not await gem_inventory.remove(user_id, {gem_type: quantity}):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Cannot delete frozen gems. Unfreeze them first."
             )
         
-        # Delete the gems
-        new_quantity = user_gem.get("quantity", 0) - quantity
-        if new_quantity <= 0:
-            await db.user_gems.delete_one({"user_id": user_id, "gem_type": gem_type})
-        else:
-            await db.user_gems.update_one(
-                {"user_id": user_id, "gem_type": gem_type},
-                {
-                    "$inc": {"quantity": -quantity},
-                    "$set": {"updated_at": datetime.utcnow()}
-                }
-            )
-        
         # Log admin action
         admin_log = AdminLog(
             admin_id=current_user.id,
@@ -17166,6 +16324,7 @@ async def delete_user_gems(
             custom_title="Admin Action",
             custom_message=f"Gems removed: {quantity} {gem_type}. Reason: {reason}"
         )
+        mark_user_directory_dirty(user_id)
         
         return {
             "message": f"Successfully deleted {quantity} {gem_type} gems",
@@ -17210,51 +16369,23 @@ async def modify_user_gems(
                 detail="Change amount must not be zero"
             )
         
-        # Get user's gem data
-        user_gem = await db.user_gems.find_one({"user_id": user_id, "gem_type": gem_type})
-        
-        if change < 0:  # Decreasing gems
-            if not user_gem or user_gem.get("quantity", 0) < abs(change):
+        if change > 0:
+            await gem_inventory.add(user_id, {gem_type: change})
+        else:  # Decreasing gems
+            inventory = await gem_inventory.get(user_id)
+            if counts(inventory, "quantity").get(gem_type, 0) < abs(change):
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Insufficient gems to decrease"
                 )
             
-            # Check if trying to decrease below frozen amount
-            frozen_quantity = user_gem.get("frozen_quantity", 0)
-            new_total = user_gem.get("quantity", 0) + change
-            if new_total < frozen_quantity:
+            # The new total must stay at or above the frozen amount
+            if not await gem_inventory.remove(user_id, {gem_type: abs(change)}):
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Cannot decrease below frozen amount"
                 )
         
-        # Apply the change
-        if not user_gem and change > 0:
-            # Create new gem entry
-            new_gem = {
-                "user_id": user_id,
-                "gem_type": gem_type,
-                "quantity": change,
-                "frozen_quantity": 0,
-                "created_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow()
-            }
-            await db.user_gems.insert_one(new_gem)
-        else:
-            # Update existing gem
-            new_quantity = user_gem.get("quantity", 0) + change
-            if new_quantity <= 0:
-                await db.user_gems.delete_one({"user_id": user_id, "gem_type": gem_type})
-            else:
-                await db.user_gems.update_one(
-                    {"user_id": user_id, "gem_type": gem_type},
-                    {
-                        "$inc": {"quantity": change},
-                        "$set": {"updated_at": datetime.utcnow()}
-                    }
-                )
-        
         # Log admin action
         admin_log = AdminLog(
             admin_id=current_user.id,
@@ -17283,6 +16414,7 @@ async def modify_user_gems(
             custom_title="Admin Action",
             custom_message=default_message_en
         )
+        mark_user_directory_dirty(user_id)
         
         return {
             "message": f"Successfully modified {gem_type} gems by {change}",
@@ -17621,14 +16753,17 @@ async def purge_database(current_user: User = Depends(get_current_admin)):
         
         # 5) Служебные коллекции
         for coll_name in [
-            "transactions", "refresh_tokens", "notifications",
-            "admin_logs", "security_alerts", "security_monitoring", "user_gems"
+            "transactions", "refresh_tokens", "notifications", "notification_bodies",
+            "admin_logs", "security_alerts", "security_monitoring", "user_gems", "gem_inventories", "player_stats",
+            "frozen_funds"
         ]:
             try:
                 res = await getattr(db, coll_name).delete_many({})
                 summary[f"{coll_name}_deleted"] = res.deleted_count
             except Exception as _:
                 summary[f"{coll_name}_deleted"] = 0
+        await leaderboard.reset()
+        await _recompute_frozen_totals()
         
         # 6) sounds — удалить
         try:
@@ -17847,6 +16982,7 @@ async def create_bot_bet(bot: Bot) -> bool:
             logger.info(f"🎯 Bot {bot.id}: GENERATING COMPLETE CYCLE - new_cycle={is_new_cycle}")
             
             # Генерируем ВСЕ ставки цикла сразу с точной суммой 
+            cycle_seed = await reserve_next_cycle_plan_seed(bot_doc)
             all_cycle_bets = await generate_cycle_bets_uniform_distribution(
                 bot_id=bot.id,
                 min_bet=min_bet,
@@ -17856,14 +16992,12 @@ async def create_bot_bet(bot: Bot) -> bool:
                 total_losses=total_losses,
                 win_amount_total=win_amount_total,
                 loss_amount_total=loss_amount_total,
-                exact_total=total_cycle_amount  # Передаем точную целевую сумму
+                exact_total=total_cycle_amount,  # Передаем точную целевую сумму
+                seed=cycle_seed
             )
             
             # Сохраняем массив ставок в документ бота
-            await db.bots.update_one(
-                {"id": bot.id},
-                {"$set": {cycle_bets_key: all_cycle_bets}}
-            )
+            await start_cycle_plan(bot.id, cycle_seed, {cycle_bets_key: all_cycle_bets})
             
             logger.info(f"🎯 Bot {bot.id}: CYCLE BETS SAVED - {len(all_cycle_bets)} bets with total sum {sum(bet['amount'] for bet in all_cycle_bets)}")
         else:
@@ -17890,7 +17024,7 @@ async def create_bot_bet(bot: Bot) -> bool:
         
         # КРИТИЧЕСКОЕ ИСПРАВЛЕНИЕ: Создаем комбинацию гемов для ТОЧНОЙ суммы bet_amount
         bet_gems = await generate_gem_combination(bet_amount)
-        actual_gem_total = sum(quantity * GEM_PRICES.get(gem_type, 1.0) for gem_type, quantity in bet_gems.items())
+        actual_gem_total = gems_value(bet_gems)
         
         logger.info(f"🎯 Bot {bot.id}: EXACT bet amount={bet_amount}, gem_total={actual_gem_total:.2f}")
         
@@ -18210,6 +17344,7 @@ async def create_individual_bot(
             "created_at": datetime.utcnow(),
             "updated_at": datetime.utcnow()
         }
+        bot_data["name_key"] = search_key(bot_data["name"])
         
         await db.bots.insert_one(bot_data)
         
@@ -18405,148 +17540,38 @@ async def get_regular_bots_simple(
                     max_bet = float(bot.get("max_bet_amount", 50.0) or 50.0)
                     cycle_games = int(bot.get("cycle_games", 16) or 16)
                     wins_pct = float(bot.get("wins_percentage", 44.0) or 44.0)
-                    losses_pct = float(bot.get("losses_percentage", 36.0) or 36.0)
-                    draws_pct = float(bot.get("draws_percentage", 20.0) or 20.0)
-                    
-                    planned_profit = compute_cycle_planned_profit(
-                        min_bet, max_bet, cycle_games, 
-                        wins_pct, losses_pct, draws_pct
-                    )
-                    
-                    bot["cycle_planned_profit"] = round(planned_profit, 2)
-                else:
-                    # Нет активного цикла
-                    bot["cycle_planned_profit"] = None
-            except Exception:
-                bot["cycle_planned_profit"] = None
-        
-        # Calculate total pages
-        total_pages = (total_count + limit - 1) // limit
-        
-        return {
-            "bots": bots,
-            "total": total_count,
-            "page": page,
-            "limit": limit,
-            "total_pages": total_pages
-        }
-        
-    except Exception as e:
-        logger.error(f"Error fetching regular bots: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to fetch regular bots"
-        )
-
-# --- ROI PLANNING CALCULATOR (SAME AS CREATION CALCULATOR) ---
-# Используем точную сумму цикла и метод наибольших остатков для распределения W/L/D
-# Возвращает ROI_planned в процентах с точностью до двух знаков
-
-def compute_cycle_planned_profit(min_bet: float, max_bet: float, cycle_games: int,
-                                wins_percentage: float, losses_percentage: float, draws_percentage: float) -> float:
-    """
-    Рассчитывает фиксированную планируемую прибыль за один цикл в долларах.
-    Использует ту же логику что и compute_planned_roi_percent, но возвращает прибыль в долларах.
-    """
-    try:
-        min_bet_f = float(min_bet or 0)
-        max_bet_f = float(max_bet or 0)
-        games = int(cycle_games or 0)
-        if games <= 0 or max_bet_f <= 0 or max_bet_f < min_bet_f:
-            return 0.0
-        
-        # 1) Группы ставок
-        small_cnt = max(1, int(round(games * 0.25)))
-        medium_cnt = int(round(games * 0.5))
-        large_cnt = max(0, games - small_cnt - medium_cnt)
-        rng = max_bet_f - min_bet_f
-        small_avg = min_bet_f + rng * 0.15
-        medium_avg = min_bet_f + rng * 0.5
-        large_avg = min_bet_f + rng * 0.85
-        estimated_total = small_cnt * small_avg + medium_cnt * medium_avg + large_cnt * large_avg
-        
-        # 2) Определяем базовую сумму цикла
-        if min_bet_f == 1 and max_bet_f == 100 and games == 16:
-            reference_cycle_total = 800  # Базовое значение
-        else:
-            # Пропорциональный расчет от базы 800
-            standard_base = int(round(((1 + 100) / 2.0) * 16))  # 808
-            current_base = int(round(((min_bet_f + max_bet_f) / 2.0) * games))
-            reference_cycle_total = int(round((800 * current_base) / standard_base))
-        
-        import math
-        def half_up_round(num):
-            fraction = num - math.floor(num)
-            return math.ceil(num) if fraction >= 0.50 else math.floor(num)
-        
-        # Точные доли от эталонной суммы (355.96 / 291.24 / 161.80)
-        exact_wins = reference_cycle_total * (float(wins_percentage or 0) / 100.0)
-        exact_losses = reference_cycle_total * (float(losses_percentage or 0) / 100.0)
-        
-        # Округляем по правилу half-up
-        wins_sum = half_up_round(exact_wins)
-        losses_sum = half_up_round(exact_losses)
-        
-        # 3) Планируемая прибыль = wins_sum - losses_sum
-        planned_profit = wins_sum - losses_sum
-        return float(planned_profit)
-    except Exception:
-        return 0.0
-
-def compute_planned_roi_percent(min_bet: float, max_bet: float, cycle_games: int,
-                                wins_percentage: float, losses_percentage: float, draws_percentage: float) -> float:
-    """
-    Плановый ROI строго как в предпросмотре калькулятора на фронтенде (скрин с 10.05%):
-    1) estimated_total строится через 3 группы ставок:
-       - smallCnt = round(N * 0.25), mediumCnt = round(N * 0.5), largeCnt = N - smallCnt - mediumCnt (но small >= 1)
-       - smallAvg = min + (max-min)*0.15, mediumAvg = min + (max-min)*0.5, largeAvg = min + (max-min)*0.85
-       - estimated_total = smallCnt*smallAvg + mediumCnt*mediumAvg + largeCnt*largeAvg
-    2) wins_sum = round(estimated_total * wins%), losses_sum = round(estimated_total * losses%)
-    3) ROI_plan = (wins_sum - losses_sum) / (wins_sum + losses_sum) * 100, округление до 2 знаков
-    """
-    try:
-        min_bet_f = float(min_bet or 0)
-        max_bet_f = float(max_bet or 0)
-        games = int(cycle_games or 0)
-        if games <= 0 or max_bet_f <= 0 or max_bet_f < min_bet_f:
-            return 0.0
-        # 1) Группы
-        small_cnt = max(1, int(round(games * 0.25)))
-        medium_cnt = int(round(games * 0.5))
-        large_cnt = max(0, games - small_cnt - medium_cnt)
-        rng = max_bet_f - min_bet_f
-        small_avg = min_bet_f + rng * 0.15
-        medium_avg = min_bet_f + rng * 0.5
-        large_avg = min_bet_f + rng * 0.85
-        # Определяем эталонную сумму цикла
-        if min_bet_f == 1 and max_bet_f == 100 and games == 16:
-            reference_cycle_total = 809  # Эталонное значение
-        else:
-            # Пропорциональный расчет от эталона
-            standard_base = int(round(((1 + 100) / 2.0) * 16))  # 808
-            current_base = int(round(((min_bet_f + max_bet_f) / 2.0) * games))
-            reference_cycle_total = int(round((809 * current_base) / standard_base))
+                    losses_pct = float(bot.get("losses_percentage", 36.0) or 36.0)
+                    draws_pct = float(bot.get("draws_percentage", 20.0) or 20.0)
+                    
+                    planned_profit = compute_cycle_planned_profit(
+                        min_bet, max_bet, cycle_games, 
+                        wins_pct, losses_pct, draws_pct
+                    )
+                    
+                    bot["cycle_planned_profit"] = round(planned_profit, 2)
+                else:
+                    # Нет активного цикла
+                    bot["cycle_planned_profit"] = None
+            except Exception:
+                bot["cycle_planned_profit"] = None
         
-        import math
-        def half_up_round(num):
-            fraction = num - math.floor(num)
-            return math.ceil(num) if fraction >= 0.50 else math.floor(num)
+        # Calculate total pages
+        total_pages = (total_count + limit - 1) // limit
         
-        # Точные доли от эталонной суммы (355.96 / 291.24 / 161.80)
-        exact_wins = reference_cycle_total * (float(wins_percentage or 0) / 100.0)
-        exact_losses = reference_cycle_total * (float(losses_percentage or 0) / 100.0)
+        return {
+            "bots": bots,
+            "total": total_count,
+            "page": page,
+            "limit": limit,
+            "total_pages": total_pages
+        }
         
-        # Округляем по правилу half-up
-        wins_sum = half_up_round(exact_wins)
-        losses_sum = half_up_round(exact_losses)
-        active_pool = wins_sum + losses_sum
-        if active_pool <= 0:
-            return 0.0
-        # 3) ROI
-        profit = wins_sum - losses_sum
-        return round((profit / active_pool) * 100.0, 2)
-    except Exception:
-        return 0.0
+    except Exception as e:
+        logger.error(f"Error fetching regular bots: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to fetch regular bots"
+        )
 
 @api_router.get("/admin/bots/regular/list", response_model=dict)
 async def get_regular_bots_list(
@@ -18575,10 +17600,20 @@ async def get_regular_bots_list(
             "bot_type": "REGULAR"
         }).sort("created_at", -1).skip(offset).limit(limit).to_list(limit)
         
+        page_bot_ids = [bot_doc["id"] for bot_doc in bots]
+        stats_by_bot = await get_bot_stats_map(page_bot_ids)
+        active_bets_by_bot = {
+            row["_id"]: row["count"]
+            async for row in db.games.aggregate([
+                {"$match": {"creator_id": {"$in": page_bot_ids}, "status": {"$in": ["WAITING", "ACTIVE"]}}},
+                {"$group": {"_id": "$creator_id", "count": {"$sum": 1}}}
+            ])
+        }
+        
         bot_details = []
         
         for bot_doc in bots:
-            bot = Bot(**bot_doc)
+            bot = BotView.from_doc(bot_doc)
             
             # Planned ROI synced to creation calculator if available
             try:
@@ -18603,153 +17638,49 @@ async def get_regular_bots_list(
             except Exception:
                 bot_doc["roi_planned_percent"] = roi_planned_percent_val
             
-            # Count active bets for this bot (ONLY as creator - regular bots don't join other bets)
-            active_bets = await db.games.count_documents({
-                "creator_id": bot.id,
-                "status": {"$in": ["WAITING", "ACTIVE"]}
-            })
-            
-            # Get game statistics
-            total_games = await db.games.count_documents({
-                "creator_id": bot.id,
-                "status": "COMPLETED"
-            })
-            
-            wins = await db.games.count_documents({
-                "creator_id": bot.id,
-                "status": "COMPLETED",
-                "winner_id": bot.id
-            })
-            
-            losses = await db.games.count_documents({
-                "creator_id": bot.id,
-                "status": "COMPLETED",
-                "winner_id": {"$ne": bot.id}
-            })
+            # Active bets for this bot (ONLY as creator - regular bots don't join other bets)
+            active_bets = active_bets_by_bot.get(bot.id, 0)
             
-            draws = 0  # Assuming no draws for now
+            # Game statistics come from the bot_stats materialized view
+            lifetime_stats = stats_by_bot[bot.id]["lifetime"]
+            total_games = lifetime_stats["games"]
+            wins = lifetime_stats["wins"]
+            losses = lifetime_stats["losses"]
+            draws = lifetime_stats["draws"]
             
             win_rate = (wins / total_games * 100) if total_games > 0 else 0
             
-            # НОВАЯ ФОРМУЛА 2.0: Рассчитываем ROI_active = (profit / active_pool) * 100%
-            # ИСПРАВЛЕНИЕ: Добавляем обработку ошибок и значения по умолчанию
+            # НОВАЯ ФОРМУЛА 2.0: ROI_active = (profit / active_pool) * 100%
+            wins_sum = float(lifetime_stats["wins_amount"])
+            losses_sum = float(lifetime_stats["losses_amount"])
+            draws_sum = float(lifetime_stats["draws_amount"])
+            active_pool = wins_sum + losses_sum  # Активный пул (база для ROI)
+            profit = wins_sum - losses_sum       # Чистая прибыль
+            roi_active_percent = round((profit / active_pool * 100), 2) if active_pool > 0 else 0.0
             
-            try:
-                # Суммы побед (wins sum)
-                wins_sum_agg = await db.games.aggregate([
-                    {"$match": {"creator_id": bot.id, "status": "COMPLETED", "winner_id": bot.id}},
-                    {"$group": {"_id": None, "total": {"$sum": "$bet_amount"}}}
-                ]).to_list(1)
-                wins_sum = float(wins_sum_agg[0]['total'] if wins_sum_agg else 0)  # сумма ставок побед (INT-версия, без умножения)
-                
-                # Суммы поражений (losses sum)  
-                losses_sum_agg = await db.games.aggregate([
-                    {"$match": {"creator_id": bot.id, "status": "COMPLETED", "winner_id": {"$ne": bot.id, "$ne": None}}},
-                    {"$group": {"_id": None, "total": {"$sum": "$bet_amount"}}}
-                ]).to_list(1)
-                losses_sum = float(losses_sum_agg[0]['total'] if losses_sum_agg else 0)
-                
-                # Суммы ничьих (draws sum) - не участвуют в ROI  
-                draws_sum_agg = await db.games.aggregate([
-                    {"$match": {"creator_id": bot.id, "status": "COMPLETED", "winner_id": None}},
-                    {"$group": {"_id": None, "total": {"$sum": "$bet_amount"}}}
-                ]).to_list(1)
-                draws_sum = float(draws_sum_agg[0]['total'] if draws_sum_agg else 0)
-                
-                # Рассчитываем ROI по новой формуле с защитой от ошибок
-                active_pool = wins_sum + losses_sum  # Активный пул (база для ROI)
-                profit = wins_sum - losses_sum       # Чистая прибыль
-                
-                # ROI_active = (profit / active_pool) * 100%
-                if active_pool > 0:
-                    roi_active_percent = round((profit / active_pool * 100), 2)
-                else:
-                    roi_active_percent = 0.0
-                
-                # Для обратной совместимости сохраняем старые расчеты
-                total_bet_sum = wins_sum + losses_sum + draws_sum  # Общая сумма ставок
-                bot_profit_amount = profit
-                bot_profit_percent = roi_active_percent  # Теперь используем ROI_active!
-                
-            except Exception as e:
-                logger.error(f"Error calculating ROI for bot {bot.id}: {e}")
-                # Значения по умолчанию при ошибке
-                wins_sum = 0.0
-                losses_sum = 0.0
-                draws_sum = 0.0
-                active_pool = 0.0
-                profit = 0.0
-                roi_active_percent = 0.0
-                total_bet_sum = 0.0
-                bot_profit_amount = 0.0
-                bot_profit_percent = 0.0
+            # Для обратной совместимости сохраняем старые расчеты
+            total_bet_sum = wins_sum + losses_sum + draws_sum  # Общая сумма ставок
+            bot_profit_amount = profit
+            bot_profit_percent = roi_active_percent  # Теперь используем ROI_active!
             
             cycle_games = bot_doc.get('cycle_games', 16)
             if cycle_games <= 0:
                 cycle_games = 12  # Значение по умолчанию
             
-            played_games = await db.games.count_documents({
-                "creator_id": bot.id,
-                "status": "COMPLETED"
-            })
-            
-            current_cycle_played = played_games % cycle_games
+            current_cycle_played = total_games % cycle_games
             
             cycle_progress = f"{current_cycle_played}/{cycle_games}"
             
             remaining_slots = max(0, cycle_games - current_cycle_played)
             
-            # Рассчёт прибыли текущего активного цикла (по аналогии с /admin/bots/{id}/cycle-bets)
-            try:
-                cycle_len_cur = int(bot_doc.get("cycle_games", 16) or 16)
-                active_games_cur = await db.games.find({
-                    "creator_id": bot.id,
-                    "status": {"$in": ["WAITING", "ACTIVE", "REVEAL"]}
-                }).sort("created_at", -1).to_list(1000)
-                completed_games_cur = await db.games.find({
-                    "creator_id": bot.id,
-                    "status": "COMPLETED"
-                }).sort("created_at", -1).to_list(1000)
-                combined_cur = active_games_cur + completed_games_cur
-                combined_cur_sorted = sorted(combined_cur, key=lambda g: g.get("created_at"), reverse=True)
-                current_cycle_games_list = combined_cur_sorted[:cycle_len_cur]
-                current_cycle_games_list = list(reversed(current_cycle_games_list))
-
-                wins_sum_cur = 0
-                losses_sum_cur = 0
-                draws_sum_cur = 0
-                for g in current_cycle_games_list:
-                    status_str = str(g.get("status", "waiting")).upper()
-                    if status_str == "COMPLETED":
-                        bet_amount = int(g.get("bet_amount", 0) or 0)
-                        if g.get("winner_id") == bot.id:
-                            wins_sum_cur += bet_amount
-                        elif g.get("winner_id"):
-                            losses_sum_cur += bet_amount
-                        else:
-                            draws_sum_cur += bet_amount
-                active_pool_cur = wins_sum_cur + losses_sum_cur
-                # ИСПРАВЛЕНО: Прибыль НЕ отображается во время цикла
-                # Она появляется только после завершения всего цикла
-                current_profit = 0  # Всегда 0 во время цикла
-            except Exception:
-                active_pool_cur = 0
-                current_profit = 0
+            # Прибыль НЕ отображается во время цикла - только после его завершения
+            current_profit = 0
 
             # Плановый ROI: всегда берём из текущего калькулятора, чтобы совпадало с предпросмотром
             roi_planned_out = roi_planned_percent_val
 
-            # Совокупная чистая прибыль всех завершённых циклов
-            try:
-                completed_games = await db.games.find({
-                    "creator_id": bot.id,
-                    "status": "COMPLETED"
-                }).to_list(100000)
-                total_wins_sum_all = sum(int(g.get("bet_amount", 0) or 0) for g in completed_games if g.get("winner_id") == bot.id)
-                total_losses_sum_all = sum(int(g.get("bet_amount", 0) or 0) for g in completed_games if g.get("winner_id") not in (None, bot.id))
-                total_profit_all_cycles = total_wins_sum_all - total_losses_sum_all
-            except Exception:
-                total_profit_all_cycles = 0
+            # Совокупная чистая прибыль всех завершённых игр
+            total_profit_all_cycles = profit
 
             bot_details.append({
                 "id": bot.id,
@@ -19245,65 +18176,32 @@ async def generate_cycle_bets_uniform_distribution(
     total_losses: int,
     win_amount_total: float,
     loss_amount_total: float,
-    exact_total: float = None  # ТОЧНАЯ целевая сумма
+    exact_total: float = None,  # ТОЧНАЯ целевая сумма
+    seed: Optional[int] = None
 ) -> List[Dict[str, Any]]:
     """
     АРХИТЕКТУРНО ПЕРЕРАБОТАННАЯ функция для точного совпадения суммы цикла.
     НОВЫЙ ПОДХОД: Сначала создаем все суммы ставок, нормализуем к exact_total, затем назначаем результаты.
+    Весь план строится одним векторизованным проходом (core.cycle_planning) и воспроизводим по seed.
     """
+    from core.cycle_planning import UNIFORM_STRATA, build_cycle_plan
     try:
         target_total_sum = exact_total if exact_total else (win_amount_total + loss_amount_total)
         
         logger.info(f"🎯 Bot {bot_id}: ARCHITECTURAL REDESIGN - target_total_sum={target_total_sum}")
         logger.info(f"    Generating {cycle_games} bets: {total_wins} wins, {total_losses} losses")
         
-        # ШАГ 1: Создаем базовые суммы для равномерного покрытия диапазона
-        base_amounts = generate_uniform_bet_amounts(min_bet, max_bet, cycle_games)
-        logger.info(f"    Base amounts generated: {sorted(base_amounts)}")
-        
-        # ШАГ 2: НОРМАЛИЗУЕМ ВСЕ СУММЫ К ТОЧНОЙ ЦЕЛЕВОЙ СУММЕ
-        if exact_total:
-            logger.info(f"🔧 Bot {bot_id}: Normalizing ALL amounts to exact sum: {exact_total}")
-            normalized_amounts = normalize_amounts_to_exact_sum(
-                base_amounts, exact_total, min_bet, max_bet
-            )
-        else:
-            normalized_amounts = [max(int(min_bet), min(int(max_bet), round(amount))) for amount in base_amounts]
-        
-        actual_normalized_sum = sum(normalized_amounts)
-        logger.info(f"    Normalized amounts: {sorted(normalized_amounts)}")
-        logger.info(f"    Actual normalized sum: {actual_normalized_sum} (target: {target_total_sum})")
-        
-        # ШАГ 3: Создаем список результатов игр
-        results = ["win"] * total_wins + ["loss"] * total_losses
-        
-        # Дополняем до cycle_games если нужно
-        while len(results) < cycle_games:
-            # Добавляем wins или losses для достижения cycle_games
-            if total_wins > total_losses:
-                results.append("loss")
-                total_losses += 1
-            else:
-                results.append("win") 
-                total_wins += 1
-        
-        # Обрезаем если больше cycle_games
-        results = results[:cycle_games]
-        random.shuffle(results)  # Перемешиваем для случайного порядка
+        # Дополняем/обрезаем результаты до cycle_games
+        total_wins = max(0, min(int(total_wins), int(cycle_games)))
+        total_losses = int(cycle_games) - total_wins
         
-        logger.info(f"    Results distribution: {results.count('win')} wins, {results.count('loss')} losses")
-        
-        # ШАГ 4: Создаем финальный список ставок
-        all_bets = []
-        for i in range(cycle_games):
-            result = results[i] if i < len(results) else "loss"  # Fallback
-            amount = normalized_amounts[i] if i < len(normalized_amounts) else int((min_bet + max_bet) / 2)
-            
-            all_bets.append({
-                "result": result,
-                "amount": amount,
-                "index": i
-            })
+        all_bets = build_cycle_plan({
+            "seed": seed if seed is not None else new_plan_seed(),
+            "min_bet": int(min_bet),
+            "max_bet": int(max_bet),
+            "counts": (total_wins, total_losses, 0),
+            "total": target_total_sum
+        }, UNIFORM_STRATA)
         
         # ФИНАЛЬНАЯ ПРОВЕРКА
         actual_total = sum(bet["amount"] for bet in all_bets)
@@ -19312,12 +18210,9 @@ async def generate_cycle_bets_uniform_distribution(
         
         logger.info(f"🎯 Bot {bot_id}: FINAL ARCHITECTURAL RESULT - {len(all_bets)} bets generated")
         logger.info(f"    Target total: {target_total_sum}, Actual total: {actual_total}")
-        logger.info(f"    Difference: {actual_total - target_total_sum}")
         logger.info(f"    Win sum: {actual_win_sum}, Loss sum: {actual_loss_sum}")
         
-        if exact_total and actual_total == exact_total:
-            logger.info(f"    ✅ ARCHITECTURAL SUCCESS! Perfect exact sum match!")
-        else:
+        if exact_total and actual_total != round(exact_total):
             logger.warning(f"    ❌ ARCHITECTURAL FAILURE! Sum mismatch: expected {exact_total}, got {actual_total}")
         
         return all_bets
@@ -19350,7 +18245,8 @@ async def generate_cycle_bets_natural_distribution(
     wins_percentage: float,
     losses_percentage: float,
     draws_percentage: float,
-    cycle_number: int
+    cycle_number: int,
+    seed: int
 ):
     """
     НОВАЯ ФОРМУЛА 2.0: Генерирует ставки согласно новой логике ROI.
@@ -19359,130 +18255,24 @@ async def generate_cycle_bets_natural_distribution(
     - ROI_active = (profit / active_pool) * 100%
     - Ничьи НЕ пересоздаются
     """
+    from core.cycle_planning import build_cycle_plan
     try:
         logger.info(f"🎯 NEW FORMULA: Generating cycle bets for bot {bot_id}")
         logger.info(f"    Games: {cycle_games}, Range: {min_bet}-{max_bet}")
         logger.info(f"    Balance: {wins_count}W/{losses_count}L/{draws_count}D")
         logger.info(f"    Percentages: {wins_percentage}%/{losses_percentage}%/{draws_percentage}%")
         
-        # Приводим параметры к целым (требование: 1–100 и суммы округлены до целого)
-        min_bet_int = int(round(min_bet))
-        max_bet_int = int(round(max_bet))
-        wins_count = int(wins_count)
-        losses_count = int(losses_count)
-        draws_count = int(draws_count)
-        cycle_games = int(cycle_games)
-
-        # 1) Точная общая сумма цикла по формуле: N × (min+max)/2, округление до целого
-        # Для стандартного диапазона 1-100 и 16 игр используем базовое значение 800
-        if min_bet_int == 1 and max_bet_int == 100 and cycle_games == 16:
-            exact_cycle_total = 800  # Базовое значение
-        else:
-            exact_cycle_total = int(round(((min_bet_int + max_bet_int) / 2.0) * cycle_games))
-        logger.info(f"    Exact cycle total (int): {exact_cycle_total}")
-
-        # 2) Интегральное распределение суммы по W/L/D с правилом half-up
-        raw_w = exact_cycle_total * (float(wins_percentage) / 100.0)
-        raw_l = exact_cycle_total * (float(losses_percentage) / 100.0)
-        raw_d = exact_cycle_total * (float(draws_percentage) / 100.0)
-
-        # ИСПРАВЛЕНО: Используем стандартное округление half-up (≥0.5 вверх, <0.5 вниз)
-        target_wins_sum = int(raw_w + 0.5)
-        target_losses_sum = int(raw_l + 0.5)
-        target_draws_sum = int(raw_d + 0.5)
-        
-        # Проверяем что сумма точная
-        calculated_sum = target_wins_sum + target_losses_sum + target_draws_sum
-        diff = calculated_sum - exact_cycle_total
-        
-        # Коррекция если нужно
-        if diff != 0:
-            # Используем метод наибольших остатков для коррекции
-            fractional_parts = [raw_w - math.floor(raw_w), raw_l - math.floor(raw_l), raw_d - math.floor(raw_d)]
-            
-            if diff > 0:
-                # Нужно уменьшить - сортируем по наименьшим остаткам
-                order = sorted(range(3), key=lambda i: fractional_parts[i])
-            else:
-                # Нужно увеличить - сортируем по наибольшим остаткам
-                order = sorted(range(3), key=lambda i: fractional_parts[i], reverse=True)
-            
-            for i in range(abs(diff)):
-                idx = order[i % 3]
-                if diff > 0:
-                    if idx == 0:
-                        target_wins_sum = max(0, target_wins_sum - 1)
-                    elif idx == 1:
-                        target_losses_sum = max(0, target_losses_sum - 1)
-                    else:
-                        target_draws_sum = max(0, target_draws_sum - 1)
-                else:
-                    if idx == 0:
-                        target_wins_sum += 1
-                    elif idx == 1:
-                        target_losses_sum += 1
-                    else:
-                        target_draws_sum += 1
-        
-        # Финальная проверка
-        final_sum = target_wins_sum + target_losses_sum + target_draws_sum
-        if final_sum != exact_cycle_total:
-            logger.warning(f"⚠️ Final sum {final_sum} != target {exact_cycle_total}, but proceeding")
-
+        spec = natural_cycle_plan_spec(
+            bot_id, min_bet, max_bet, cycle_games,
+            wins_count, losses_count, draws_count,
+            wins_percentage, losses_percentage, draws_percentage,
+            cycle_number, seed
+        )
+        target_wins_sum, target_losses_sum, target_draws_sum = spec["sums"]
         logger.info(f"    Target sums (int): W={target_wins_sum}, L={target_losses_sum}, D={target_draws_sum}")
 
-        # Корректировка по ROI_set с правилом ближайшего чётного (базовый случай 1–100 и 16 игр)
-        if min_bet_int == 1 and max_bet_int == 100 and cycle_games == 16:
-            active_pool_planned = int(target_wins_sum + target_losses_sum)
-            profit_planned = int(target_wins_sum - target_losses_sum)
-            roi_planned = (profit_planned / active_pool_planned * 100.0) if active_pool_planned > 0 else 0.0
-            # ROI_set = округление до целого и клип 2..30
-            roi_set_local = max(2, min(30, int(round(roi_planned))))
-            x = (active_pool_planned * roi_set_local) / 100.0
-            p_round = int(round(x))
-            if p_round % 2 != 0:
-                lower = max(0, p_round - 1)
-                upper = min(active_pool_planned, p_round + 1)
-                p_even = lower if abs(x - lower) <= abs(upper - x) else upper
-            else:
-                p_even = p_round
-            target_wins_sum = int((active_pool_planned + p_even) // 2)
-            target_losses_sum = int((active_pool_planned - p_even) // 2)
-            target_draws_sum = int(exact_cycle_total - active_pool_planned)
-            logger.info(f"    Adjusted by ROI_set: W={target_wins_sum}, L={target_losses_sum}, D={target_draws_sum} (roi_set={roi_set_local}%, p_even={p_even})")
-
-        # 3) Для каждой категории генерируем ставки с весами 6/6/4 по диапазонам (1–30/31–70/71–100)
-        def _build_weighted(min_b:int, max_b:int, total:int, cnt:int, rng:random.Random):
-            if cnt <= 0:
-                return []
-            small_share, medium_share, large_share = 0.375, 0.375, 0.25
-            small_sum = int(round(total * small_share))
-            medium_sum = int(round(total * medium_share))
-            large_sum = total - small_sum - medium_sum
-            small_cnt = max(1, int(round(cnt * small_share)))
-            medium_cnt = max(1, int(round(cnt * medium_share)))
-            large_cnt = max(0, cnt - small_cnt - medium_cnt)
-            if small_cnt + medium_cnt + large_cnt != cnt:
-                large_cnt += (cnt - (small_cnt + medium_cnt + large_cnt))
-            rng_span = max_b - min_b
-            s_lo, s_hi = min_b, min_b + int(rng_span * 0.30)
-            m_lo, m_hi = min_b + int(rng_span * 0.31), min_b + int(rng_span * 0.70)
-            l_lo, l_hi = min_b + int(rng_span * 0.71), max_b
-            def gen(cnt, lo, hi):
-                return [rng.randint(lo, max(lo, hi)) for _ in range(max(0, cnt))]
-            base = gen(small_cnt, s_lo, s_hi) + gen(medium_cnt, m_lo, m_hi) + gen(large_cnt, l_lo, l_hi)
-            return [int(x) for x in normalize_amounts_to_exact_sum(base, total, min_b, max_b)]
-
-        # детерминированный RNG
-        import hashlib as _hl
-        _seed_input = f"{bot_id}:{cycle_games}:{min_bet_int}-{max_bet_int}:{wins_count}-{losses_count}-{draws_count}"
-        _rng = random.Random(int(_hl.sha256(_seed_input.encode()).hexdigest(), 16) % (2**32))
-        wins_bets = _build_weighted(min_bet_int, max_bet_int, target_wins_sum, wins_count, _rng)
-        losses_bets = _build_weighted(min_bet_int, max_bet_int, target_losses_sum, losses_count, _rng)
-        draws_bets  = _build_weighted(min_bet_int, max_bet_int, target_draws_sum,  draws_count,  _rng)
-
-        # 4) Формируем финальный массив ставок (детерминированная последовательность задаётся ниже)
-        all_bets = []
+        # 4) Формируем финальный массив ставок: суммы и исходы строятся векторно, порядок задаётся seed
+        all_bets = build_cycle_plan(spec)
 
         # 5) Рассчитываем точные суммы и ROI по формуле из задания
         actual_wins_sum = int(sum(bet["amount"] for bet in all_bets if bet["result"] == "win"))
@@ -19495,8 +18285,8 @@ async def generate_cycle_bets_natural_distribution(
 
         # Валидации целостности
         final_total = actual_wins_sum + actual_losses_sum + actual_draws_sum
-        if final_total != exact_cycle_total:
-            logger.warning(f"❗ Final cycle total {final_total} != exact_cycle_total {exact_cycle_total}. Forcing fix in logs-only.")
+        if final_total != spec["exact_cycle_total"]:
+            logger.warning(f"❗ Final cycle total {final_total} != exact_cycle_total {spec['exact_cycle_total']}. Forcing fix in logs-only.")
         
         logger.info(f"✅ NEW INT FORMULA results:")
         logger.info(f"    Bets: {len(all_bets)} = {wins_count}W/{losses_count}L/{draws_count}D")
@@ -19513,70 +18303,21 @@ async def generate_cycle_bets_natural_distribution(
 def normalize_amounts_to_exact_sum(base_amounts: List[float], target_sum: float, min_bet: float, max_bet: float) -> List[int]:
     """
     ПРОСТОЙ И НАДЕЖНЫЙ алгоритм нормализации массива к точной сумме.
-    Использует итеративное распределение разности с учетом ограничений.
+    Пропорциональное масштабирование с учетом границ и округление методом наибольших остатков.
     """
+    from core.cycle_planning import exact_sum_amounts
     if not base_amounts or target_sum <= 0:
         return []
     
-    target_sum = int(round(target_sum))
-    min_bet = int(min_bet)
-    max_bet = int(max_bet)
-    
-    # Шаг 1: Пропорциональное масштабирование
-    current_sum = sum(base_amounts)
-    if current_sum <= 0:
-        # Равномерное распределение если базовая сумма 0
-        avg_amount = target_sum / len(base_amounts)
-        return [max(min_bet, min(max_bet, round(avg_amount)))] * len(base_amounts)
-    
-    # Масштабируем пропорционально
-    scale_factor = target_sum / current_sum
-    scaled_amounts = [max(min_bet, min(max_bet, round(amount * scale_factor))) for amount in base_amounts]
-    
-    # Шаг 2: Итеративная корректировка разности
-    current_scaled_sum = sum(scaled_amounts)
-    difference = target_sum - current_scaled_sum
-    
-    logger.info(f"🔧 normalize: target={target_sum}, scaled_sum={current_scaled_sum}, diff={difference}")
-    
-    # Шаг 3: Корректируем разность по 1 единице за раз
-    attempts = 0
-    max_attempts = abs(difference) * 2  # Предотвращаем бесконечные циклы
+    amounts = exact_sum_amounts(base_amounts, target_sum, int(min_bet), int(max_bet))
+    final_sum = sum(amounts)
     
-    while difference != 0 and attempts < max_attempts:
-        # Найдем индексы элементов, которые можно изменять
-        adjustable_indices = []
-        
-        for i, amount in enumerate(scaled_amounts):
-            if difference > 0 and amount < max_bet:  # Можно увеличить
-                adjustable_indices.append(i)
-            elif difference < 0 and amount > min_bet:  # Можно уменьшить
-                adjustable_indices.append(i)
-        
-        if not adjustable_indices:
-            logger.warning(f"normalize: No adjustable indices, diff={difference}, breaking")
-            break
-        
-        # Случайно выбираем индекс для корректировки
-        idx = random.choice(adjustable_indices)
-        
-        if difference > 0:
-            scaled_amounts[idx] += 1
-            difference -= 1
-        else:
-            scaled_amounts[idx] -= 1
-            difference += 1
-        
-        attempts += 1
-    
-    final_sum = sum(scaled_amounts)
-    
-    if final_sum == target_sum:
+    if final_sum == int(round(target_sum)):
         logger.info(f"✅ normalize: PERFECT MATCH! Final sum = {final_sum}")
     else:
-        logger.warning(f"❌ normalize: Imperfect match: target={target_sum}, actual={final_sum}, diff={final_sum - target_sum}")
+        logger.warning(f"❌ normalize: Imperfect match: target={int(round(target_sum))}, actual={final_sum}, bounds={min_bet}-{max_bet}")
     
-    return scaled_amounts
+    return amounts
 
 async def generate_bot_cycle_bets(bot_id: str, cycle_length: int, cycle_total_amount: float, 
                                 win_percentage: int, min_bet: float, avg_bet: float, bet_distribution: str = "medium",
@@ -19911,6 +18652,7 @@ async def update_individual_bot_settings(
         update_fields = {"updated_at": datetime.utcnow()}
         if name is not None:
             update_fields["name"] = name
+            update_fields["name_key"] = search_key(name)
         if min_bet_amount is not None:
             update_fields["min_bet_amount"] = min_bet_amount
         if max_bet_amount is not None:
@@ -20301,11 +19043,11 @@ async def get_completed_cycle_bets(
                 "completed_at": game.get("completed_at", game.get("created_at"))
             })
 
-        return {
-            "cycle": serialize_object_ids(completed_cycle),
-            "bets": serialize_object_ids(bets_list),
+        return MongoJSONResponse({
+            "cycle": completed_cycle,
+            "bets": bets_list,
             "total_bets": len(bets_list)
-        }
+        })
 
     except HTTPException:
         raise
@@ -20653,14 +19395,11 @@ async def delete_user_account(
             
             # Unfreeze gems and return commissions (simplified)
             if game_obj.creator_id == user_id:
-                for gem_type, quantity in game_obj.bet_gems.items():
-                    await db.user_gems.update_one(
-                        {"user_id": user_id, "gem_type": gem_type},
-                        {"$inc": {"frozen_quantity": -quantity}}
-                    )
+                await gem_inventory.unfreeze(user_id, game_obj.bet_gems)
         
         # Delete user's data
-        await db.user_gems.delete_many({"user_id": user_id})
+        await gem_inventory.delete(user_id)
+        await leaderboard.remove(user_id)
         await db.notifications.delete_many({"user_id": user_id})
         await db.refresh_tokens.delete_many({"user_id": user_id})
         
@@ -20846,147 +19585,29 @@ async def get_bot_active_bets(
         )
 
 @api_router.post("/admin/games/reset-all", response_model=dict)
-async def reset_all_bets_admin(current_user: User = Depends(get_current_admin)):
+async def reset_all_bets_admin(
+    dry_run: bool = False,
+    background: bool = False,
+    current_user: User = Depends(get_current_admin)
+):
     """Reset all bets for all players and bots (admin only)."""
     try:
-        # Get all active games (WAITING, ACTIVE)
-        active_games = await db.games.find({
-            "status": {"$in": [GameStatus.WAITING, GameStatus.ACTIVE]}
-        }).to_list(1000)
-        
-        reset_count = 0
-        total_gems_returned = {}
-        total_commission_returned = 0.0
-        
-        # Process each active game
-        for game in active_games:
-            game_obj = Game(**game)
-            
-            # Unfreeze creator's gems
-            for gem_type, quantity in game_obj.bet_gems.items():
-                await db.user_gems.update_one(
-                    {"user_id": game_obj.creator_id, "gem_type": gem_type},
-                    {
-                        "$inc": {"frozen_quantity": -quantity},
-                        "$set": {"updated_at": datetime.utcnow()}
-                    }
-                )
-                
-                # Track returned gems
-                if gem_type not in total_gems_returned:
-                    total_gems_returned[gem_type] = 0
-                total_gems_returned[gem_type] += quantity
-            
-            # Return frozen commission to creator
-            creator = await db.users.find_one({"id": game_obj.creator_id})
-            if creator:
-                commission_to_return = game_obj.bet_amount * 0.06
-                await db.users.update_one(
-                    {"id": game_obj.creator_id},
-                    {
-                        "$inc": {
-                            "virtual_balance": commission_to_return,
-                            "frozen_balance": -commission_to_return
-                        },
-                        "$set": {"updated_at": datetime.utcnow()}
-                    }
-                )
-                total_commission_returned += commission_to_return
-            
-            # If game is ACTIVE, also handle opponent's gems
-            if game_obj.status == GameStatus.ACTIVE and game_obj.opponent_id:
-                # Unfreeze opponent's gems
-                for gem_type, quantity in game_obj.bet_gems.items():
-                    await db.user_gems.update_one(
-                        {"user_id": game_obj.opponent_id, "gem_type": gem_type},
-                        {
-                            "$inc": {"frozen_quantity": -quantity},
-                            "$set": {"updated_at": datetime.utcnow()}
-                        }
-                    )
-                    total_gems_returned[gem_type] += quantity
-                
-                # Return frozen commission to opponent
-                opponent = await db.users.find_one({"id": game_obj.opponent_id})
-                if opponent:
-                    commission_to_return = game_obj.bet_amount * 0.06
-                    await db.users.update_one(
-                        {"id": game_obj.opponent_id},
-                        {
-                            "$inc": {
-                                "virtual_balance": commission_to_return,
-                                "frozen_balance": -commission_to_return
-                            },
-                            "$set": {"updated_at": datetime.utcnow()}
-                        }
-                    )
-                    total_commission_returned += commission_to_return
-            
-            reset_count += 1
-        
-        # Update all active games to CANCELLED
-        await db.games.update_many(
-            {"status": {"$in": [GameStatus.WAITING, GameStatus.ACTIVE]}},
-            {
-                "$set": {
-                    "status": GameStatus.CANCELLED,
-                    "cancelled_at": datetime.utcnow()
-                }
-            }
-        )
-        
-        # Release any remaining frozen balances
-        users_with_frozen = await db.users.find({"frozen_balance": {"$gt": 0}}).to_list(1000)
-        for user in users_with_frozen:
-            new_balance = user["virtual_balance"] + user["frozen_balance"]
-            await db.users.update_one(
-                {"id": user["id"]},
-                {
-                    "$set": {
-                        "virtual_balance": new_balance,
-                        "frozen_balance": 0.0,
-                        "updated_at": datetime.utcnow()
-                    }
-                }
-            )
-        
-        # Also reset any negative frozen balances to 0 (floating point precision issues)
-        await db.users.update_many(
-            {"frozen_balance": {"$ne": 0.0}},
-            {
-                "$set": {"frozen_balance": 0.0, "updated_at": datetime.utcnow()}
-            }
-        )
-        
-        # Reset all frozen gem quantities
-        await db.user_gems.update_many(
-            {"frozen_quantity": {"$gt": 0}},
+        job = await start_maintenance_job(
+            "release_games",
             {
-                "$set": {"frozen_quantity": 0, "updated_at": datetime.utcnow()}
-            }
-        )
-        
-        # Log admin action
-        admin_log = AdminLog(
-            admin_id=current_user.id,
-            action="RESET_ALL_BETS",
-            target_type="games",
-            target_id="all",
-            details={
-                "games_reset": reset_count,
-                "gems_returned": total_gems_returned,
-                "commission_returned": total_commission_returned
-            }
+                "mode": "cancel",
+                "filter": {"status": {"$in": [GameStatus.WAITING, GameStatus.ACTIVE]}},
+                "zero_frozen": True,
+                "log_action": "RESET_ALL_BETS"
+            },
+            current_user, dry_run=dry_run, background=background
         )
-        await db.admin_logs.insert_one(admin_log.dict())
-        
-        return {
-            "message": "All bets have been reset successfully",
-            "games_reset": reset_count,
-            "gems_returned": total_gems_returned,
-            "commission_returned": round(total_commission_returned, 2)
-        }
-        
+        response = maintenance_job_response(job, "All bets have been reset successfully")
+        response.setdefault("games_reset", response.get("total_processed", 0))
+        response.setdefault("gems_returned", response.get("total_gems_returned", {}))
+        response.setdefault("commission_returned", response.get("total_commission_returned", 0.0))
+        return response
+
     except Exception as e:
         logger.error(f"Error resetting all bets: {e}")
         raise HTTPException(
@@ -21014,14 +19635,7 @@ async def delete_game_admin(
         # If game is active or waiting, refund gems and balance
         if game_obj.status in [GameStatus.WAITING, GameStatus.ACTIVE]:
             # Refund creator's gems
-            for gem_type, quantity in game_obj.bet_gems.items():
-                await db.user_gems.update_one(
-                    {"user_id": game_obj.creator_id, "gem_type": gem_type},
-                    {
-                        "$inc": {"frozen_quantity": -quantity},
-                        "$set": {"updated_at": datetime.utcnow()}
-                    }
-                )
+            await gem_inventory.unfreeze(game_obj.creator_id, game_obj.bet_gems)
             
             # Refund creator's commission
             creator = await db.users.find_one({"id": game_obj.creator_id})
@@ -21040,26 +19654,8 @@ async def delete_game_admin(
             
             # If game has opponent, refund opponent's gems too
             if game_obj.opponent_id and game_obj.opponent_gems:
-                if isinstance(game_obj.opponent_gems, list):
-                    # Handle list format
-                    for gem_dict in game_obj.opponent_gems:
-                        await db.user_gems.update_one(
-                            {"user_id": game_obj.opponent_id, "gem_type": gem_dict["name"]},
-                            {
-                                "$inc": {"frozen_quantity": -gem_dict["count"]},
-                                "$set": {"updated_at": datetime.utcnow()}
-                            }
-                        )
-                else:
-                    # Handle dict format
-                    for gem_type, quantity in game_obj.opponent_gems.items():
-                        await db.user_gems.update_one(
-                            {"user_id": game_obj.opponent_id, "gem_type": gem_type},
-                            {
-                                "$inc": {"frozen_quantity": -quantity},
-                                "$set": {"updated_at": datetime.utcnow()}
-                            }
-                        )
+                # Both the dict and the legacy list ({name, count}) formats are accepted
+                await gem_inventory.unfreeze(game_obj.opponent_id, game_obj.opponent_gems)
                 
                 # Refund opponent's commission
                 opponent = await db.users.find_one({"id": game_obj.opponent_id})
@@ -21688,11 +20284,133 @@ async def test_new_endpoint():
 # SOUNDS API ENDPOINTS  
 # ==============================================================================
 
+# Audio files live out-of-band in a content-addressed store (<sha256>.<format>);
+# `sounds` documents only keep the hash, so metadata queries stay tiny.
+SOUND_STORAGE_DIR = Path(os.environ.get('SOUND_STORAGE_DIR', ROOT_DIR / 'sound_assets'))
+SOUND_CONTENT_TYPES = {"mp3": "audio/mpeg", "wav": "audio/wav", "ogg": "audio/ogg"}
+sound_asset_cache = LRUCache(maxsize=64 * 1024 * 1024, getsizeof=len)  # 64MB of hot assets
+
+def sound_asset_path(sha256: str, file_format: str) -> Path:
+    return SOUND_STORAGE_DIR / f"{sha256}.{file_format}"
+
+def decode_sound_base64(file_data: str) -> bytes:
+    """Decode base64 audio, accepting an optional data URL prefix."""
+    if file_data.startswith("data:") and "," in file_data:
+        file_data = file_data.split(",", 1)[1]
+    return base64.b64decode(file_data, validate=False)
+
+def _write_sound_asset(audio_bytes: bytes, file_format: str) -> str:
+    sha256 = hashlib.sha256(audio_bytes).hexdigest()
+    path = sound_asset_path(sha256, file_format)
+    if not path.exists():
+        SOUND_STORAGE_DIR.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=SOUND_STORAGE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "wb") as tmp_file:
+            tmp_file.write(audio_bytes)
+        os.replace(tmp_path, path)
+    return sha256
+
+async def store_sound_asset(audio_bytes: bytes, file_format: str) -> str:
+    """Store audio bytes in the content-addressed store and return their sha256."""
+    return await asyncio.to_thread(_write_sound_asset, audio_bytes, file_format)
+
+async def load_sound_asset(sha256: str, file_format: str) -> Optional[bytes]:
+    """Read an audio asset, serving hot assets from the in-memory LRU."""
+    cache_key = f"{sha256}.{file_format}"
+    audio_bytes = sound_asset_cache.get(cache_key)
+    if audio_bytes is not None:
+        return audio_bytes
+    path = sound_asset_path(sha256, file_format)
+    try:
+        audio_bytes = await asyncio.to_thread(path.read_bytes)
+    except FileNotFoundError:
+        return None
+    sound_asset_cache[cache_key] = audio_bytes
+    return audio_bytes
+
+async def migrate_inline_sound_audio() -> int:
+    """Move legacy inline base64 `audio_data` blobs into the sound asset store."""
+    migrated = 0
+    cursor = db.sounds.find(
+        {"audio_data": {"$nin": [None, ""]}},
+        {"_id": 0, "id": 1, "audio_data": 1, "file_format": 1}
+    ).batch_size(10)
+    async for sound in cursor:
+        try:
+            file_format = sound.get("file_format") or "mp3"
+            audio_bytes = decode_sound_base64(sound["audio_data"])
+            sha256 = await store_sound_asset(audio_bytes, file_format)
+            await db.sounds.update_one(
+                {"id": sound["id"]},
+                {"$set": {"audio_sha256": sha256, "file_format": file_format, "file_size": len(audio_bytes)},
+                 "$unset": {"audio_data": ""}}
+            )
+            migrated += 1
+        except Exception as e:
+            logger.error(f"Failed to migrate audio for sound {sound.get('id')}: {e}")
+    if migrated:
+        logger.info(f"Migrated {migrated} inline sound files to {SOUND_STORAGE_DIR}")
+    return migrated
+
+SOUND_METADATA_PROJECTION = {"_id": 0, "audio_data": 0}
+
+@api_router.get("/sounds/{sound_id}/audio")
+async def stream_sound_audio(sound_id: str, request: Request):
+    """Serve a sound's audio asset with ETag and single-range support."""
+    sound = await db.sounds.find_one(
+        {"id": sound_id},
+        {"_id": 0, "audio_sha256": 1, "file_format": 1}
+    )
+    if not sound or not sound.get("audio_sha256"):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Audio file not found")
+    
+    sha256 = sound["audio_sha256"]
+    file_format = sound.get("file_format") or "mp3"
+    etag = f'"{sha256}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "public, max-age=3600"
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    audio_bytes = await load_sound_asset(sha256, file_format)
+    if audio_bytes is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Audio file not found")
+    
+    media_type = SOUND_CONTENT_TYPES.get(file_format, "application/octet-stream")
+    total_size = len(audio_bytes)
+    range_header = request.headers.get("range")
+    if range_header and range_header.startswith("bytes=") and "," not in range_header:
+        start_str, _, end_str = range_header[len("bytes="):].partition("-")
+        try:
+            if start_str:
+                start = int(start_str)
+                end = min(int(end_str), total_size - 1) if end_str else total_size - 1
+            else:
+                start = max(total_size - int(end_str), 0)
+                end = total_size - 1
+        except ValueError:
+            start, end = 0, -1
+        if start > end or start >= total_size:
+            headers["Content-Range"] = f"bytes */{total_size}"
+            return Response(status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, headers=headers)
+        headers["Content-Range"] = f"bytes {start}-{end}/{total_size}"
+        return Response(
+            content=audio_bytes[start:end + 1],
+            status_code=status.HTTP_206_PARTIAL_CONTENT,
+            media_type=media_type,
+            headers=headers
+        )
+    
+    return Response(content=audio_bytes, media_type=media_type, headers=headers)
+
 @api_router.get("/admin/sounds", response_model=List[SoundResponse])
 async def get_sounds(current_user: User = Depends(get_current_admin)):
     """Get all sounds (admin only)."""
     try:
-        sounds = await db.sounds.find().to_list(1000)
+        sounds = await db.sounds.find({}, SOUND_METADATA_PROJECTION).to_list(1000)
         response_sounds = []
         
         for sound in sounds:
@@ -21707,7 +20425,7 @@ async def get_sounds(current_user: User = Depends(get_current_admin)):
                 volume=sound["volume"],
                 delay=sound["delay"],
                 can_repeat=sound["can_repeat"],
-                has_audio_file=bool(sound.get("audio_data")),
+                has_audio_file=bool(sound.get("audio_sha256")),
                 file_format=sound.get("file_format"),
                 file_size=sound.get("file_size"),
                 is_default=sound.get("is_default", False),
@@ -21773,7 +20491,7 @@ async def update_sound(sound_id: str, sound_data: UpdateSoundRequest, current_us
     """Update a sound (admin only)."""
     try:
         # Check if sound exists
-        existing_sound = await db.sounds.find_one({"id": sound_id})
+        existing_sound = await db.sounds.find_one({"id": sound_id}, {"_id": 0, "id": 1})
         if not existing_sound:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -21810,7 +20528,7 @@ async def update_sound(sound_id: str, sound_data: UpdateSoundRequest, current_us
         )
         
         # Get updated sound
-        updated_sound = await db.sounds.find_one({"id": sound_id})
+        updated_sound = await db.sounds.find_one({"id": sound_id}, SOUND_METADATA_PROJECTION)
         
         return SoundResponse(
             id=updated_sound["id"],
@@ -21823,7 +20541,7 @@ async def update_sound(sound_id: str, sound_data: UpdateSoundRequest, current_us
             volume=updated_sound["volume"],
             delay=updated_sound["delay"],
             can_repeat=updated_sound["can_repeat"],
-            has_audio_file=bool(updated_sound.get("audio_data")),
+            has_audio_file=bool(updated_sound.get("audio_sha256")),
             file_format=updated_sound.get("file_format"),
             file_size=updated_sound.get("file_size"),
             is_default=updated_sound.get("is_default", False),
@@ -21845,7 +20563,7 @@ async def delete_sound(sound_id: str, current_user: User = Depends(get_current_a
     """Delete a sound (admin only)."""
     try:
         # Check if sound exists
-        existing_sound = await db.sounds.find_one({"id": sound_id})
+        existing_sound = await db.sounds.find_one({"id": sound_id}, {"_id": 0, "id": 1, "is_default": 1})
         if not existing_sound:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -21878,35 +20596,44 @@ async def upload_sound_file(sound_id: str, file_data: UploadSoundFileRequest, cu
     """Upload audio file for a sound (admin only)."""
     try:
         # Check if sound exists
-        existing_sound = await db.sounds.find_one({"id": sound_id})
+        existing_sound = await db.sounds.find_one({"id": sound_id}, {"_id": 1})
         if not existing_sound:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Sound not found"
             )
         
+        try:
+            audio_bytes = decode_sound_base64(file_data.file_data)
+        except (ValueError, TypeError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid audio file data"
+            )
+        
         # Check file size (5MB max)
-        if file_data.file_size > 5242880:  # 5MB in bytes
+        if file_data.file_size > 5242880 or len(audio_bytes) > 5242880:  # 5MB in bytes
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="File size exceeds 5MB limit"
             )
         
-        # Update sound with file data
+        # Store the file out-of-band; the document keeps only its hash
+        sha256 = await store_sound_asset(audio_bytes, file_data.file_format)
         update_data = {
-            "audio_data": file_data.file_data,
+            "audio_sha256": sha256,
             "file_format": file_data.file_format,
-            "file_size": file_data.file_size,
+            "file_size": len(audio_bytes),
             "updated_at": datetime.utcnow()
         }
         
         await db.sounds.update_one(
             {"id": sound_id},
-            {"$set": update_data}
+            {"$set": update_data, "$unset": {"audio_data": ""}}
         )
         
         # Get updated sound
-        updated_sound = await db.sounds.find_one({"id": sound_id})
+        updated_sound = await db.sounds.find_one({"id": sound_id}, SOUND_METADATA_PROJECTION)
         
         return SoundResponse(
             id=updated_sound["id"],
@@ -22098,6 +20825,109 @@ class NotificationAnalyticsResponse(BaseModel):
     analytics: NotificationAnalytics
 
 
+# ==============================================================================
+# NOTIFICATION PUSH CHANNEL
+# ==============================================================================
+
+NOTIFICATION_RELAY_CHANNEL = "gemplay:notifications"
+
+class NotificationPushHub:
+    """Per-process registry of notification WebSockets keyed by user id.
+    
+    Unread counters are kept in memory only for users with a live connection
+    (loaded once on connect), so idle clients generate no DB load. When Redis
+    is available, events are relayed to the other workers via pub/sub.
+    """
+    
+    def __init__(self):
+        self.connections: Dict[str, set] = defaultdict(set)
+        self.unread_counts: Dict[str, int] = {}
+        self.instance_id = str(uuid.uuid4())
+    
+    async def connect(self, user_id: str, websocket: WebSocket) -> int:
+        await websocket.accept()
+        if user_id not in self.unread_counts:
+            self.unread_counts[user_id] = await db.notifications.count_documents({
+                "user_id": user_id,
+                "is_read": False,
+                "$or": [{"expires_at": None}, {"expires_at": {"$gte": datetime.utcnow()}}]
+            })
+        self.connections[user_id].add(websocket)
+        return self.unread_counts[user_id]
+    
+    def disconnect(self, user_id: str, websocket: WebSocket):
+        sockets = self.connections.get(user_id)
+        if sockets is None:
+            return
+        sockets.discard(websocket)
+        if not sockets:
+            self.connections.pop(user_id, None)
+            self.unread_counts.pop(user_id, None)
+    
+    def _apply_unread(self, user_id: str, unread_delta: Optional[int], unread_reset: bool) -> Optional[int]:
+        if user_id not in self.unread_counts:
+            return None
+        if unread_reset:
+            self.unread_counts[user_id] = 0
+        elif unread_delta:
+            self.unread_counts[user_id] = max(0, self.unread_counts[user_id] + unread_delta)
+        return self.unread_counts[user_id]
+    
+    async def _deliver_local(self, user_ids: List[str], event: dict, unread_delta: Optional[int], unread_reset: bool):
+        for user_id in user_ids:
+            if user_id not in self.connections:
+                continue
+            unread_count = self._apply_unread(user_id, unread_delta, unread_reset)
+            message = {**event, "unread_count": unread_count}
+            for websocket in list(self.connections.get(user_id, ())):
+                try:
+                    await websocket.send_json(message)
+                except Exception:
+                    self.disconnect(user_id, websocket)
+    
+    async def notify(self, user_ids: List[str], event: dict, unread_delta: Optional[int] = None, unread_reset: bool = False):
+        """Push an event to the given users on this worker and relay it to the others."""
+        event = json.loads(json.dumps(event, default=str))
+        await self._deliver_local(user_ids, event, unread_delta, unread_reset)
+        
+        if redis_client is None:
+            return
+        try:
+            for start in range(0, len(user_ids), BROADCAST_RECEIPTS_CHUNK_SIZE):
+                await redis_client.publish(NOTIFICATION_RELAY_CHANNEL, json.dumps({
+                    "origin": self.instance_id,
+                    "user_ids": user_ids[start:start + BROADCAST_RECEIPTS_CHUNK_SIZE],
+                    "event": event,
+                    "unread_delta": unread_delta,
+                    "unread_reset": unread_reset
+                }))
+        except Exception as e:
+            logger.warning(f"Notification relay publish failed: {e}")
+    
+    async def run_redis_relay(self):
+        """Deliver events published by other workers to sockets held by this one."""
+        while redis_client is not None:
+            try:
+                pubsub = redis_client.pubsub()
+                await pubsub.subscribe(NOTIFICATION_RELAY_CHANNEL)
+                async for raw in pubsub.listen():
+                    if raw.get("type") != "message":
+                        continue
+                    data = json.loads(raw["data"])
+                    if data.get("origin") == self.instance_id:
+                        continue
+                    await self._deliver_local(
+                        data.get("user_ids", []), data.get("event", {}),
+                        data.get("unread_delta"), data.get("unread_reset", False)
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Notification relay error: {e}, reconnecting in 5s")
+                await asyncio.sleep(5)
+
+notification_hub = NotificationPushHub()
+
 # ==============================================================================
 # NOTIFICATION SYSTEM UTILITY FUNCTIONS
 # ==============================================================================
@@ -22209,9 +21039,13 @@ async def create_notification(
     expires_at: Optional[datetime] = None,
     custom_title: Optional[str] = None,
     custom_message: Optional[str] = None,
-    custom_emoji: Optional[str] = None
+    custom_emoji: Optional[str] = None,
+    dedupe_key: Optional[str] = None
 ) -> Optional[str]:
-    """Create and store notification"""
+    """
+    Create and store notification.
+    With `dedupe_key` a repeated call is a no-op and errors are raised, so an outbox task can retry it.
+    """
     
     try:
         # Check user notification settings
@@ -22250,21 +21084,132 @@ async def create_notification(
             "created_at": datetime.utcnow(),
             "expires_at": expires_at
         }
+        if dedupe_key:
+            notification["dedupe_key"] = dedupe_key
         
         # Store in database
-        await db.notifications.insert_one(notification)
+        try:
+            await db.notifications.insert_one(notification)
+        except DuplicateKeyError:
+            if not dedupe_key:
+                raise
+            return None
         
         logger.info(f"Created notification {notification_id} for user {user_id}: {title}")
         
-        # TODO: Send via WebSocket when implemented
-        # await send_notification_to_user(user_id, notification)
+        notification.pop("_id", None)
+        await notification_hub.notify([user_id], {"type": "notification", "notification": notification}, unread_delta=1)
         
         return notification_id
         
     except Exception as e:
         logger.error(f"Error creating notification: {e}")
+        if dedupe_key:
+            raise
         return None
 
+BROADCAST_RECEIPTS_CHUNK_SIZE = 1000
+
+async def create_broadcast_notification(
+    user_ids: List[str],
+    notification_type: NotificationTypeEnum,
+    title: str,
+    message: str,
+    emoji: str = "🔔",
+    payload: Optional[NotificationPayload] = None,
+    priority: NotificationPriorityEnum = NotificationPriorityEnum.INFO,
+    expires_at: Optional[datetime] = None,
+    created_by: Optional[str] = None
+) -> tuple:
+    """Create one shared notification body and slim per-user receipts.
+
+    The body (title, message, emoji, payload) is stored once in
+    `notification_bodies`; each recipient only gets a receipt row in
+    `notifications` referencing it via `body_id`.
+    Returns (body_id, sent_count).
+    """
+    # Respect per-user settings with a single query instead of one per user
+    setting_key = notification_type.value
+    if setting_key in NotificationSettings.model_fields and user_ids:
+        disabled_cursor = db.user_notification_settings.find(
+            {"user_id": {"$in": user_ids}, f"settings.{setting_key}": False},
+            {"user_id": 1}
+        )
+        disabled_ids = {doc["user_id"] async for doc in disabled_cursor}
+        user_ids = [uid for uid in user_ids if uid not in disabled_ids]
+    
+    if not user_ids:
+        return None, 0
+    
+    now = datetime.utcnow()
+    body_id = str(uuid.uuid4())
+    await db.notification_bodies.insert_one({
+        "id": body_id,
+        "type": notification_type.value,
+        "title": title,
+        "message": message,
+        "emoji": emoji,
+        "priority": priority.value,
+        "payload": payload.model_dump() if payload else {},
+        "recipients_count": len(user_ids),
+        "created_by": created_by,
+        "created_at": now,
+        "expires_at": expires_at
+    })
+    
+    sent_count = 0
+    for start in range(0, len(user_ids), BROADCAST_RECEIPTS_CHUNK_SIZE):
+        chunk = user_ids[start:start + BROADCAST_RECEIPTS_CHUNK_SIZE]
+        receipts = [{
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "body_id": body_id,
+            "type": notification_type.value,
+            "priority": priority.value,
+            "is_read": False,
+            "read_at": None,
+            "created_at": now,
+            "expires_at": expires_at
+        } for user_id in chunk]
+        result = await db.notifications.insert_many(receipts, ordered=False)
+        sent_count += len(result.inserted_ids)
+        await notification_hub.notify(chunk, {
+            "type": "notification",
+            "notification": {
+                "body_id": body_id,
+                "type": notification_type.value,
+                "title": title,
+                "message": message,
+                "emoji": emoji,
+                "priority": priority.value,
+                "created_at": now
+            }
+        }, unread_delta=1)
+    
+    logger.info(f"Created broadcast body {body_id} with {sent_count} receipts: {title}")
+    return body_id, sent_count
+
+async def attach_notification_bodies(notifications: List[dict]) -> List[dict]:
+    """Join shared broadcast bodies into receipt rows (one query per page)."""
+    body_ids = list({n["body_id"] for n in notifications if n.get("body_id")})
+    if not body_ids:
+        return notifications
+    
+    bodies_cursor = db.notification_bodies.find(
+        {"id": {"$in": body_ids}},
+        {"_id": 0, "id": 1, "title": 1, "message": 1, "emoji": 1, "payload": 1}
+    )
+    bodies = {body["id"]: body async for body in bodies_cursor}
+    
+    for notification in notifications:
+        body = bodies.get(notification.get("body_id"))
+        if body:
+            notification.setdefault("title", body.get("title", ""))
+            notification.setdefault("message", body.get("message", ""))
+            notification.setdefault("emoji", body.get("emoji", "🔔"))
+            notification.setdefault("payload", body.get("payload") or {})
+    return notifications
+
 async def get_user_name_for_notification(user_id: str) -> str:
     """Get display name for notifications.
     - Regular bot: return "Bot"
@@ -22319,44 +21264,262 @@ async def db_operation_with_retry(operation, max_retries=3, base_delay=0.1):
 # NOTIFICATION SYSTEM API ENDPOINTS  
 # ==============================================================================
 
+# ==============================================================================
+# BOT STATS MATERIALIZED VIEW
+# ==============================================================================
+
+# One `bot_stats` document per bot (regular and human), updated with $inc when a
+# game settles. `lifetime` covers all completed games, `current_cycle` is reset
+# when a regular bot finishes its cycle. Each bot document records the ids of the games
+# it counted in the same write as the $inc, so a retried settlement never counts a
+# game twice; `bot_stats_recorded` on the game is set once every bot is updated.
+# Every write also bumps `version`: a rebuild only replaces counters whose version is
+# unchanged since it read history, and recomputes the bots that settled meanwhile.
+BOT_STATS_COUNTERS = ("games", "wins", "losses", "draws", "wins_amount", "losses_amount", "draws_amount")
+BOT_STATS_REBUILD_ATTEMPTS = 5
+
+def _empty_bot_stats_counters() -> dict:
+    return {field: 0 for field in BOT_STATS_COUNTERS}
+
+async def get_bot_ids_among(participant_ids: List[str]) -> set:
+    """Return which of the given ids belong to regular or human bots."""
+    participant_ids = [pid for pid in participant_ids if pid]
+    if not participant_ids:
+        return set()
+    bot_ids = {doc["id"] async for doc in db.bots.find({"id": {"$in": participant_ids}}, {"id": 1})}
+    bot_ids |= {doc["id"] async for doc in db.human_bots.find({"id": {"$in": participant_ids}}, {"id": 1})}
+    return bot_ids
+
+async def record_bot_game_settlement(game: dict):
+    """Apply a completed game to the bot_stats documents of its bot participants (once per game)."""
+    if game.get("bot_stats_recorded"):
+        return
+    try:
+        bet_amount = float(game.get("bet_amount") or 0)
+        winner_id = game.get("winner_id")
+        now = datetime.utcnow()
+        for bot_id in await get_bot_ids_among([game.get("creator_id"), game.get("opponent_id")]):
+            if not winner_id:
+                outcome = "draws"
+            elif winner_id == bot_id:
+                outcome = "wins"
+            else:
+                outcome = "losses"
+            inc = {"version": 1}
+            for scope in ("lifetime", "current_cycle"):
+                inc[f"{scope}.games"] = 1
+                inc[f"{scope}.{outcome}"] = 1
+                inc[f"{scope}.{outcome}_amount"] = bet_amount
+            query, update = apply_once(
+                {"bot_id": bot_id},
+                {"$inc": inc, "$set": {"last_game_at": game.get("completed_at") or now, "updated_at": now}},
+                game["id"]
+            )
+            try:
+                await db.bot_stats.update_one(query, update, upsert=True)
+            except DuplicateKeyError:
+                pass  # The game is already counted for this bot
+        await db.games.update_one({"id": game["id"]}, {"$set": {"bot_stats_recorded": True}})
+    except Exception as e:
+        logger.error(f"Error recording bot stats for game {game.get('id')}: {e}")
+        raise
+
+async def reset_bot_stats_cycle(bot_id: str):
+    await db.bot_stats.update_one(
+        {"bot_id": bot_id},
+        {"$set": {"current_cycle": _empty_bot_stats_counters(), "updated_at": datetime.utcnow()}, "$inc": {"version": 1}},
+        upsert=True
+    )
+
+def _bot_stats_group_stage(participant_field: str) -> dict:
+    is_win = {"$eq": ["$winner_id", participant_field]}
+    is_draw = {"$in": [{"$ifNull": ["$winner_id", None]}, [None, ""]]}
+    is_loss = {"$and": [{"$not": [is_win]}, {"$not": [is_draw]}]}
+    return {"$group": {
+        "_id": participant_field,
+        "games": {"$sum": 1},
+        "wins": {"$sum": {"$cond": [is_win, 1, 0]}},
+        "losses": {"$sum": {"$cond": [is_loss, 1, 0]}},
+        "draws": {"$sum": {"$cond": [is_draw, 1, 0]}},
+        "wins_amount": {"$sum": {"$cond": [is_win, "$bet_amount", 0]}},
+        "losses_amount": {"$sum": {"$cond": [is_loss, "$bet_amount", 0]}},
+        "draws_amount": {"$sum": {"$cond": [is_draw, "$bet_amount", 0]}},
+        "last_game_at": {"$max": "$completed_at"}
+    }}
+
+async def _compute_bot_stats(bot_ids: List[str]) -> Dict[str, dict]:
+    """Lifetime and current-cycle counters of the given bots from game history."""
+    participant_match = {"$or": [{"creator_id": {"$in": bot_ids}}, {"opponent_id": {"$in": bot_ids}}]}
+    pipeline = [
+        {"$match": {"status": "COMPLETED", **participant_match}},
+        {"$project": {"winner_id": 1, "bet_amount": 1, "completed_at": 1,
+                      "participant": ["$creator_id", "$opponent_id"]}},
+        {"$unwind": "$participant"},
+        {"$match": {"participant": {"$in": bot_ids}}},
+        _bot_stats_group_stage("$participant")
+    ]
+    lifetime_by_bot = {row["_id"]: row async for row in db.games.aggregate(pipeline)}
+    
+    # Current cycle of regular bots starts at their active accumulator
+    cycle_start_by_bot = {}
+    async for acc in db.bot_profit_accumulators.find(
+        {"bot_id": {"$in": bot_ids}, "is_cycle_completed": False},
+        {"bot_id": 1, "cycle_start_date": 1}
+    ):
+        cycle_start_by_bot[acc["bot_id"]] = acc.get("cycle_start_date")
+    
+    stats_by_bot = {}
+    for bot_id in bot_ids:
+        row = lifetime_by_bot.get(bot_id, {})
+        lifetime = {field: row.get(field, 0) for field in BOT_STATS_COUNTERS}
+        current_cycle = _empty_bot_stats_counters()
+        cycle_start = cycle_start_by_bot.get(bot_id)
+        if cycle_start and lifetime["games"]:
+            cycle_rows = await db.games.aggregate([
+                {"$match": {"status": "COMPLETED", "completed_at": {"$gte": cycle_start},
+                            "$or": [{"creator_id": bot_id}, {"opponent_id": bot_id}]}},
+                _bot_stats_group_stage(bot_id)
+            ]).to_list(1)
+            if cycle_rows:
+                current_cycle = {field: cycle_rows[0].get(field, 0) for field in BOT_STATS_COUNTERS}
+        stats_by_bot[bot_id] = {"lifetime": lifetime, "current_cycle": current_cycle, "last_game_at": row.get("last_game_at")}
+    return stats_by_bot
+
+async def rebuild_bot_stats(bot_ids: Optional[List[str]] = None) -> int:
+    """Recompute bot_stats from game history (one aggregation for lifetime counters)."""
+    if bot_ids is None:
+        bot_ids = [doc["id"] async for doc in db.bots.find({}, {"id": 1})]
+        bot_ids += [doc["id"] async for doc in db.human_bots.find({}, {"id": 1})]
+    if not bot_ids:
+        return 0
+    
+    # Claim history first so concurrent settlements are not counted twice
+    await db.games.update_many(
+        {"status": "COMPLETED", "bot_stats_recorded": {"$ne": True},
+         "$or": [{"creator_id": {"$in": bot_ids}}, {"opponent_id": {"$in": bot_ids}}]},
+        {"$set": {"bot_stats_recorded": True}}
+    )
+    
+    pending = list(bot_ids)
+    for _ in range(BOT_STATS_REBUILD_ATTEMPTS):
+        # Versions are read before history: a settlement landing after this read makes the write miss
+        seen = {doc["bot_id"]: doc.get("version") async for doc in db.bot_stats.find(
+            {"bot_id": {"$in": pending}}, {"_id": 0, "bot_id": 1, "version": 1}
+        )}
+        stats_by_bot = await _compute_bot_stats(pending)
+        rebuild_id = str(uuid.uuid4())
+        now = datetime.utcnow()
+        operations = [
+            UpdateOne(
+                {"bot_id": bot_id, "version": seen.get(bot_id)},
+                {"$set": {**stats, "rebuild_id": rebuild_id, "updated_at": now}, "$inc": {"version": 1}},
+                upsert=bot_id not in seen
+            )
+            for bot_id, stats in stats_by_bot.items()
+        ]
+        for start in range(0, len(operations), 500):
+            try:
+                await db.bot_stats.bulk_write(operations[start:start + 500], ordered=False)
+            except BulkWriteError as e:
+                # A settlement created the document first; the bot is recomputed below
+                if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                    raise
+        written = {doc["bot_id"] async for doc in db.bot_stats.find(
+            {"bot_id": {"$in": pending}, "rebuild_id": rebuild_id}, {"_id": 0, "bot_id": 1}
+        )}
+        pending = [bot_id for bot_id in pending if bot_id not in written]
+        if not pending:
+            break
+    if pending:
+        logger.warning(f"bot_stats of {len(pending)} bots kept changing during the rebuild; they keep their counters")
+    rebuilt = len(bot_ids) - len(pending)
+    logger.info(f"Rebuilt bot_stats for {rebuilt} bots")
+    return rebuilt
+
+async def get_bot_stats_map(bot_ids: List[str]) -> Dict[str, dict]:
+    """Read bot_stats documents for many bots at once (missing bots get zero counters)."""
+    stats_by_bot = {
+        bot_id: {"bot_id": bot_id, "lifetime": _empty_bot_stats_counters(), "current_cycle": _empty_bot_stats_counters()}
+        for bot_id in bot_ids
+    }
+    async for doc in db.bot_stats.find({"bot_id": {"$in": list(bot_ids)}}, {"_id": 0}):
+        stats = stats_by_bot[doc["bot_id"]]
+        stats["lifetime"].update(doc.get("lifetime") or {})
+        stats["current_cycle"].update(doc.get("current_cycle") or {})
+        stats["last_game_at"] = doc.get("last_game_at")
+    return stats_by_bot
+
+async def read_bot_stats(bot_id: str) -> dict:
+    return (await get_bot_stats_map([bot_id]))[bot_id]
+
+@api_router.post("/admin/bots/stats/rebuild", response_model=dict)
+async def rebuild_bot_stats_endpoint(current_user: User = Depends(get_current_admin)):
+    """Recompute all bot_stats documents from game history."""
+    try:
+        rebuilt = await rebuild_bot_stats()
+        return {"success": True, "rebuilt_bots": rebuilt}
+    except Exception as e:
+        logger.error(f"Error rebuilding bot stats: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to rebuild bot stats"
+        )
+
+@api_router.post("/admin/bots/cycle-plans/preview", response_model=dict)
+async def preview_bot_cycle_plans(
+    bot_ids: Optional[List[str]] = Body(None, embed=True),
+    current_user: User = Depends(get_current_admin)
+):
+    """
+    Reproduce the next-cycle bet plans of regular bots in one batch (audit view).
+    Only the next cycle's secret seed is written, drawn once so the cycle created later matches the preview.
+    """
+    from core.cycle_planning import plan_regular_bot_cycles
+    try:
+        query = {"bot_type": "REGULAR"}
+        if bot_ids:
+            query["id"] = {"$in": bot_ids}
+        bot_docs = await db.bots.find(query, {"_id": 0}).to_list(None)
+        await asyncio.gather(*(reserve_next_cycle_plan_seed(bot_doc) for bot_doc in bot_docs))
+        plans = plan_regular_bot_cycles(bot_docs)
+        return {
+            "success": True,
+            "plans": {
+                bot_doc["id"]: {
+                    "bot_name": bot_doc.get("name"),
+                    "cycle_number": int(bot_doc.get("completed_cycles", 0) or 0) + 1,
+                    "total_amount": sum(bet["amount"] for bet in plans[bot_doc["id"]]),
+                    "bets": plans[bot_doc["id"]]
+                }
+                for bot_doc in bot_docs
+            }
+        }
+    except Exception as e:
+        logger.error(f"Error previewing bot cycle plans: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to preview bot cycle plans"
+        )
+
 # Utility function for calculating bot statistics (remove duplication)
 async def calculate_bot_statistics(bot_id: str, db):
-    """Calculate comprehensive statistics for a bot to avoid code duplication."""
+    """Calculate comprehensive statistics for a bot from its bot_stats document."""
     try:
-        # Get completed games where bot participated
-        completed_games_cursor = db.games.find({
-            "$or": [
-                {"creator_id": bot_id},
-                {"opponent_id": bot_id}
-            ],
-            "status": "COMPLETED"
-        })
-        completed_games = await completed_games_cursor.to_list(None)
-        
-        # Calculate basic statistics
-        draws = sum(1 for game in completed_games if game.get('winner_id') is None)
-        losses = sum(1 for game in completed_games if game.get('winner_id') and game.get('winner_id') != bot_id)
-        wins = sum(1 for game in completed_games if game.get('winner_id') == bot_id)
-        actual_games_played = len(completed_games)
-        
-        # Calculate profit: (sum of bets in won games) - (sum of bets in lost games)
-        won_games = [game for game in completed_games if game.get('winner_id') == bot_id]
-        lost_games = [game for game in completed_games if game.get('winner_id') and game.get('winner_id') != bot_id]
-        
-        total_bet_amount_won = sum(game.get('bet_amount', 0.0) for game in won_games)
-        total_bet_amount_lost = sum(game.get('bet_amount', 0.0) for game in lost_games)
-        
-        correct_profit = total_bet_amount_won - total_bet_amount_lost
+        lifetime = (await read_bot_stats(bot_id))["lifetime"]
+        wins = lifetime["wins"]
+        actual_games_played = lifetime["games"]
+        total_bet_amount_won = lifetime["wins_amount"]
+        total_bet_amount_lost = lifetime["losses_amount"]
         
         # Calculate win rate
         win_rate = (wins / max(actual_games_played, 1)) * 100 if actual_games_played > 0 else 0
         
         return {
-            "draws": draws,
-            "losses": losses,
+            "draws": lifetime["draws"],
+            "losses": lifetime["losses"],
             "wins": wins,
             "actual_games_played": actual_games_played,
-            "correct_profit": correct_profit,
+            "correct_profit": total_bet_amount_won - total_bet_amount_lost,
             "win_rate": round(win_rate, 2),
             "total_bet_amount_won": total_bet_amount_won,
             "total_bet_amount_lost": total_bet_amount_lost
@@ -22487,9 +21650,10 @@ async def list_human_bots(
         # Build MongoDB filter query
         query_filter = {}
         
-        # Search by name (case-insensitive)
-        if search:
-            query_filter["name"] = {"$regex": search, "$options": "i"}
+        # Search by name prefix (case-insensitive, transliterated; indexed name_key)
+        name_prefix = prefix_range(search)
+        if name_prefix:
+            query_filter["name_key"] = name_prefix
         
         # Filter by character
         if character:
@@ -22620,10 +21784,11 @@ async def list_human_bots(
         # Calculate pagination
         total_pages = (total_bots + limit - 1) // limit
         
-        return HumanBotsListResponse(
-            success=True,
-            bots=response_bots,
-            pagination=PaginationInfo(
+        # Боты уже прошли через HumanBotResponse: без повторной проверки response_model
+        return MongoJSONResponse({
+            "success": True,
+            "bots": response_bots,
+            "pagination": PaginationInfo(
                 current_page=page,
                 total_pages=total_pages,
                 per_page=limit,
@@ -22632,7 +21797,7 @@ async def list_human_bots(
                 has_prev=page > 1
             ),
             # Add metadata for frontend caching and performance
-            metadata={
+            "metadata": {
                 "search_applied": bool(search),
                 "filters_applied": bool(character or is_active is not None or min_bet_range or max_bet_range),
                 "priority_fields_loaded": priority_fields,
@@ -22643,7 +21808,7 @@ async def list_human_bots(
                     "returned": len(response_bots)
                 }
             }
-        )
+        })
         
     except Exception as e:
         logger.error(f"Error listing human bots: {e}")
@@ -22790,6 +21955,9 @@ async def update_human_bot(
                 detail="Minimum delay must be less than maximum delay"
             )
         
+        if "name" in update_data:
+            update_data["name_key"] = search_key(update_data["name"])
+        
         # Add updated timestamp (removed global limit validation)
         update_data["updated_at"] = datetime.utcnow()
         
@@ -22991,12 +22159,159 @@ async def delete_human_bot(
             detail="Failed to delete human bot"
         )
 
+# Bulk creation runs as a `provision_human_bots` maintenance job. The plan phase
+# reserves every name in one pass over the existing names and builds all bot
+# documents; the plan is stored in the job so a resumed job writes the same
+# bots. The insert phase writes bots and their starting gem inventories with
+# chunked insert_many, recording progress after each chunk.
+HUMAN_BOT_PROVISIONING_INLINE_LIMIT = 50
+
+def _plan_bulk_human_bot(bulk_data: BulkCreateHumanBotsRequest, bot_name: str, bot_data: dict) -> dict:
+    """Draw one bot's settings from the bulk ranges and return its document."""
+    bot_gender = bot_data.get('gender', 'male')
+    
+    min_bet = random.randint(int(bulk_data.min_bet_range[0]), int(bulk_data.min_bet_range[1]))
+    max_bet = random.randint(int(bulk_data.max_bet_range[0]), int(bulk_data.max_bet_range[1]))
+    
+    # Ensure min_bet < max_bet
+    if min_bet >= max_bet:
+        min_bet, max_bet = min(min_bet, max_bet), max(min_bet, max_bet)
+        if min_bet == max_bet:
+            max_bet = min_bet + 1  # Гарантируем разность в 1 гем
+    
+    # Use separate delay fields if provided, otherwise use delay_range
+    if bulk_data.min_delay is not None and bulk_data.max_delay is not None:
+        min_delay = random.randint(bulk_data.min_delay, bulk_data.max_delay // 2)
+        max_delay = random.randint(min_delay + 1, bulk_data.max_delay)
+    else:
+        min_delay = random.randint(bulk_data.delay_range[0], bulk_data.delay_range[1] // 2)
+        max_delay = random.randint(min_delay + 1, bulk_data.delay_range[1])
+    
+    # Generate bet_limit within range
+    bet_limit = random.randint(bulk_data.bet_limit_range[0], bulk_data.bet_limit_range[1])
+    
+    # Generate individual delay settings from ranges
+    bot_min_delay = random.randint(bulk_data.bot_min_delay_range[0], bulk_data.bot_min_delay_range[1])
+    bot_max_delay = random.randint(bulk_data.bot_max_delay_range[0], bulk_data.bot_max_delay_range[1])
+    
+    # Ensure bot_min_delay < bot_max_delay
+    if bot_min_delay >= bot_max_delay:
+        bot_min_delay, bot_max_delay = min(bot_min_delay, bot_max_delay), max(bot_min_delay, bot_max_delay)
+        if bot_min_delay == bot_max_delay:
+            bot_max_delay = bot_min_delay + 30  # Минимальная разность 30 секунд
+    
+    player_min_delay = random.randint(bulk_data.player_min_delay_range[0], bulk_data.player_min_delay_range[1])
+    player_max_delay = random.randint(bulk_data.player_max_delay_range[0], bulk_data.player_max_delay_range[1])
+    
+    # Ensure player_min_delay < player_max_delay
+    if player_min_delay >= player_max_delay:
+        player_min_delay, player_max_delay = min(player_min_delay, player_max_delay), max(player_min_delay, player_max_delay)
+        if player_min_delay == player_max_delay:
+            player_max_delay = player_min_delay + 30  # Минимальная разность 30 секунд
+    
+    # Generate concurrent games limit
+    max_concurrent_games = random.randint(bulk_data.max_concurrent_games_range[0], bulk_data.max_concurrent_games_range[1])
+    
+    # Generate bet limit amount for opponent participation
+    bet_limit_amount = float(random.randint(bulk_data.bet_limit_amount_range[0], bulk_data.bet_limit_amount_range[1]))
+    
+    if min_bet >= max_bet:
+        raise ValueError(f"min_bet ({min_bet}) must be less than max_bet ({max_bet}) for bot {bot_name}")
+    
+    if bot_min_delay >= bot_max_delay:
+        raise ValueError(f"bot_min_delay ({bot_min_delay}) must be less than bot_max_delay ({bot_max_delay}) for bot {bot_name}")
+    
+    if player_min_delay >= player_max_delay:
+        raise ValueError(f"player_min_delay ({player_min_delay}) must be less than player_max_delay ({player_max_delay}) for bot {bot_name}")
+    
+    return HumanBot(
+        name=bot_name,
+        character=bulk_data.character,
+        gender=bot_gender,
+        min_bet=float(min_bet),  # Преобразуем в float для базы, но значение будет целым
+        max_bet=float(max_bet),  # Преобразуем в float для базы, но значение будет целым
+        bet_limit=bet_limit,
+        bet_limit_amount=bet_limit_amount,
+        win_percentage=bulk_data.win_percentage,
+        loss_percentage=bulk_data.loss_percentage,
+        draw_percentage=bulk_data.draw_percentage,
+        min_delay=min_delay,
+        max_delay=max_delay,
+        use_commit_reveal=bulk_data.use_commit_reveal,
+        logging_level=bulk_data.logging_level,
+        can_play_with_other_bots=bulk_data.can_play_with_other_bots,
+        can_play_with_players=bulk_data.can_play_with_players,
+        is_bet_creation_active=bulk_data.is_bet_creation_active,
+        bot_min_delay_seconds=bot_min_delay,
+        bot_max_delay_seconds=bot_max_delay,
+        player_min_delay_seconds=player_min_delay,
+        player_max_delay_seconds=player_max_delay,
+        max_concurrent_games=max_concurrent_games
+    ).dict()
+
+async def _run_human_bot_provisioning_job(job: dict) -> dict:
+    job_id = job["id"]
+    phase = job.get("phase") or "plan"
+    
+    if phase == "plan":
+        bulk_data = BulkCreateHumanBotsRequest(**job["params"]["request"])
+        bots_data = [
+            bulk_data.bots[i] if bulk_data.bots and i < len(bulk_data.bots) else {}
+            for i in range(bulk_data.count)
+        ]
+        names = reserve_names([bot_data.get('name') for bot_data in bots_data], await load_names(db.human_bots), HUMAN_BOT_NAMES)
+        planned, failed_bots = [], []
+        for i, (bot_name, bot_data) in enumerate(zip(names, bots_data)):
+            try:
+                planned.append(_plan_bulk_human_bot(bulk_data, bot_name, bot_data))
+            except Exception as e:
+                logger.error(f"Failed to create human bot {i+1}: {e}")
+                failed_bots.append({"index": i, "name": bot_data.get('name', bot_name), "error": str(e)})
+        done = 0
+        phase = "insert"
+        await _update_maintenance_job(
+            job_id, phase=phase, plan=planned, failed_bots=failed_bots,
+            progress={"bots_total": len(planned), "bots_done": done}
+        )
+    else:
+        stored = await db.maintenance_jobs.find_one({"id": job_id}, {"_id": 0, "plan": 1, "failed_bots": 1}) or {}
+        planned, failed_bots = stored.get("plan", []), stored.get("failed_bots", [])
+        done = job.get("progress", {}).get("bots_done", 0)
+    
+    for chunk in chunked(planned, start=done):
+        await insert_new(db.human_bots, chunk)
+        await gem_inventory.insert_many([bot["id"] for bot in chunk], HUMAN_BOT_STARTING_GEMS)
+        done += len(chunk)
+        await _update_maintenance_job(job_id, progress={"bots_total": len(planned), "bots_done": done})
+    
+    await db.maintenance_jobs.update_one({"id": job_id}, {"$unset": {"plan": ""}})
+    logger.info(f"Bulk created {len(planned)} human bots ({job['params']['request']['character']})")
+    return {
+        "requested_count": job["params"]["request"]["count"],
+        "created_count": len(planned),
+        "failed_count": len(failed_bots),
+        "created_bots": [
+            {
+                "id": bot["id"],
+                "name": bot["name"],
+                "character": bot["character"],
+                "gender": bot["gender"],
+                "bet_range": f"${bot['min_bet']}-${bot['max_bet']}"
+            }
+            for bot in planned
+        ],
+        "failed_bots": failed_bots
+    }
+
+MAINTENANCE_JOB_RUNNERS["provision_human_bots"] = _run_human_bot_provisioning_job
+
 @api_router.post("/admin/human-bots/bulk-create", response_model=dict)
 async def bulk_create_human_bots(
     bulk_data: BulkCreateHumanBotsRequest,
+    background: Optional[bool] = None,
     current_admin: User = Depends(get_current_admin)
 ):
-    """Create multiple human bots at once."""
+    """Create multiple human bots at once; large batches run in the background by default."""
     try:
         # Validate percentages sum to 100
         total_percentage = bulk_data.win_percentage + bulk_data.loss_percentage + bulk_data.draw_percentage
@@ -23039,181 +22354,17 @@ async def bulk_create_human_bots(
                     detail="Invalid delay range"
                 )
         
-        # Create bots (removed global limit validation)
-        created_bots = []
-        failed_bots = []
-        
-        # Get all existing bot names to avoid duplicates
-        existing_bots = await db.human_bots.find({}, {"name": 1}).to_list(None)
-        existing_names = {bot["name"] for bot in existing_bots}
-        used_names_in_batch = set()  # Track names used in current batch
-        
-        for i in range(bulk_data.count):
-            try:
-                # Use individual bot data if provided, otherwise generate
-                bot_data = bulk_data.bots[i] if bulk_data.bots and i < len(bulk_data.bots) else {}
-                
-                if bot_data.get('name'):
-                    bot_name = bot_data.get('name')
-                    # Check if name is already used in this batch or exists in DB
-                    if bot_name in existing_names or bot_name in used_names_in_batch:
-                        # Generate unique name with suffix
-                        counter = 1
-                        original_name = bot_name
-                        while bot_name in existing_names or bot_name in used_names_in_batch:
-                            bot_name = f"{original_name}_{counter}"
-                            counter += 1
-                else:
-                    # Generate unique name from available names
-                    available_names = [name for name in HUMAN_BOT_NAMES 
-                                     if name not in existing_names and name not in used_names_in_batch]
-                    
-                    if available_names:
-                        bot_name = random.choice(available_names)
-                    else:
-                        # If all names are used, fall back to Player format
-                        counter = 1
-                        while True:
-                            bot_name = f"Player{counter}"
-                            if bot_name not in existing_names and bot_name not in used_names_in_batch:
-                                break
-                            counter += 1
-                
-                # Add name to used names set
-                used_names_in_batch.add(bot_name)
-                bot_gender = bot_data.get('gender', 'male')
-                
-                min_bet = random.randint(int(bulk_data.min_bet_range[0]), int(bulk_data.min_bet_range[1]))
-                max_bet = random.randint(int(bulk_data.max_bet_range[0]), int(bulk_data.max_bet_range[1]))
-                
-                # Ensure min_bet < max_bet
-                if min_bet >= max_bet:
-                    min_bet, max_bet = min(min_bet, max_bet), max(min_bet, max_bet)
-                    if min_bet == max_bet:
-                        max_bet = min_bet + 1  # Гарантируем разность в 1 гем
-                
-                # Use separate delay fields if provided, otherwise use delay_range
-                if bulk_data.min_delay is not None and bulk_data.max_delay is not None:
-                    min_delay = random.randint(bulk_data.min_delay, bulk_data.max_delay // 2)
-                    max_delay = random.randint(min_delay + 1, bulk_data.max_delay)
-                else:
-                    min_delay = random.randint(bulk_data.delay_range[0], bulk_data.delay_range[1] // 2)
-                    max_delay = random.randint(min_delay + 1, bulk_data.delay_range[1])
-                
-                # Generate bet_limit within range
-                bet_limit = random.randint(bulk_data.bet_limit_range[0], bulk_data.bet_limit_range[1])
-                
-                # Generate individual delay settings from ranges
-                bot_min_delay = random.randint(bulk_data.bot_min_delay_range[0], bulk_data.bot_min_delay_range[1])
-                bot_max_delay = random.randint(bulk_data.bot_max_delay_range[0], bulk_data.bot_max_delay_range[1])
-                
-                # Ensure bot_min_delay < bot_max_delay
-                if bot_min_delay >= bot_max_delay:
-                    bot_min_delay, bot_max_delay = min(bot_min_delay, bot_max_delay), max(bot_min_delay, bot_max_delay)
-                    if bot_min_delay == bot_max_delay:
-                        bot_max_delay = bot_min_delay + 30  # Минимальная разность 30 секунд
-                
-                player_min_delay = random.randint(bulk_data.player_min_delay_range[0], bulk_data.player_min_delay_range[1])
-                player_max_delay = random.randint(bulk_data.player_max_delay_range[0], bulk_data.player_max_delay_range[1])
-                
-                # Ensure player_min_delay < player_max_delay
-                if player_min_delay >= player_max_delay:
-                    player_min_delay, player_max_delay = min(player_min_delay, player_max_delay), max(player_min_delay, player_max_delay)
-                    if player_min_delay == player_max_delay:
-                        player_max_delay = player_min_delay + 30  # Минимальная разность 30 секунд
-                
-                # Generate concurrent games limit
-                max_concurrent_games = random.randint(bulk_data.max_concurrent_games_range[0], bulk_data.max_concurrent_games_range[1])
-                
-                # Generate bet limit amount for opponent participation
-                bet_limit_amount = random.randint(bulk_data.bet_limit_amount_range[0], bulk_data.bet_limit_amount_range[1])
-                bet_limit_amount = float(bet_limit_amount)  # Convert to float for database storage
-                
-                # Validate bot data before creation
-                if not bot_name or len(bot_name.strip()) == 0:
-                    raise ValueError(f"Bot name is empty or invalid at index {i}")
-                
-                if min_bet >= max_bet:
-                    raise ValueError(f"min_bet ({min_bet}) must be less than max_bet ({max_bet}) for bot {bot_name}")
-                
-                if bot_min_delay >= bot_max_delay:
-                    raise ValueError(f"bot_min_delay ({bot_min_delay}) must be less than bot_max_delay ({bot_max_delay}) for bot {bot_name}")
-                
-                if player_min_delay >= player_max_delay:
-                    raise ValueError(f"player_min_delay ({player_min_delay}) must be less than player_max_delay ({player_max_delay}) for bot {bot_name}")
-                
-                human_bot = HumanBot(
-                    name=bot_name.strip(),
-                    character=bulk_data.character,
-                    gender=bot_gender,
-                    min_bet=float(min_bet),  # Преобразуем в float для базы, но значение будет целым
-                    max_bet=float(max_bet),  # Преобразуем в float для базы, но значение будет целым
-                    bet_limit=bet_limit,
-                    bet_limit_amount=bet_limit_amount,  # Add generated bet limit amount
-                    win_percentage=bulk_data.win_percentage,
-                    loss_percentage=bulk_data.loss_percentage,
-                    draw_percentage=bulk_data.draw_percentage,
-                    min_delay=min_delay,
-                    max_delay=max_delay,
-                    use_commit_reveal=bulk_data.use_commit_reveal,
-                    logging_level=bulk_data.logging_level,
-                    # Add individual settings from bulk data
-                    can_play_with_other_bots=bulk_data.can_play_with_other_bots,
-                    can_play_with_players=bulk_data.can_play_with_players,
-                    is_bet_creation_active=getattr(bulk_data, 'is_bet_creation_active', True),
-                    bot_min_delay_seconds=bot_min_delay,
-                    bot_max_delay_seconds=bot_max_delay,
-                    player_min_delay_seconds=player_min_delay,
-                    player_max_delay_seconds=player_max_delay,
-                    max_concurrent_games=max_concurrent_games
-                )
-                
-                # Log bot creation details for debugging
-                logger.info(f"Creating human bot {i+1}/{bulk_data.count}: {bot_name} ({bot_gender}) - Min:{min_bet}, Max:{max_bet}, BetLimit:{bet_limit}")
-                
-                await db.human_bots.insert_one(human_bot.dict())
-                created_bots.append({
-                    "id": human_bot.id,
-                    "name": human_bot.name,
-                    "character": human_bot.character,
-                    "gender": human_bot.gender,
-                    "bet_range": f"${human_bot.min_bet}-${human_bot.max_bet}"
-                })
-                
-            except Exception as e:
-                error_msg = str(e)
-                logger.error(f"Failed to create human bot {i+1}: {error_msg}")
-                failed_bots.append({
-                    "index": i,
-                    "name": bot_data.get('name', bot_name if 'bot_name' in locals() else f'Bot_{i}'),
-                    "error": error_msg
-                })
-        
-        # Log admin action
-        admin_log = AdminLog(
-            admin_id=current_admin.id,
-            action="BULK_CREATE_HUMAN_BOTS",
-            target_type="human_bot",
-            target_id="bulk",
-            details={
-                "character": bulk_data.character,
-                "requested_count": bulk_data.count,
-                "created_count": len(created_bots),
-                "failed_count": len(failed_bots)
-            }
+        if background is None:
+            background = bulk_data.count > HUMAN_BOT_PROVISIONING_INLINE_LIMIT
+        job = await start_maintenance_job(
+            "provision_human_bots",
+            {"request": bulk_data.dict(), "log_action": "BULK_CREATE_HUMAN_BOTS"},
+            current_admin,
+            background=background
         )
-        await db.admin_logs.insert_one(admin_log.dict())
-        
-        logger.info(f"Bulk created {len(created_bots)} human bots ({bulk_data.character})")
-        
-        return {
-            "success": True,
-            "message": f"Created {len(created_bots)} human bots",
-            "created_count": len(created_bots),
-            "failed_count": len(failed_bots),
-            "created_bots": created_bots,
-            "failed_bots": failed_bots
-        }
+        response = maintenance_job_response(job, "Created {created_count} human bots")
+        response.setdefault("requested_count", bulk_data.count)
+        return response
         
     except HTTPException:
         raise
@@ -23345,27 +22496,13 @@ async def get_human_bots_stats(current_admin: User = Depends(get_current_admin))
         })
         
         # Get independent counters (stored separately)
-        counters = await db.human_bot_counters.find_one({"type": "global"})
-        if not counters:
-            # Initialize counters if they don't exist
-            counters = {
-                "type": "global",
-                "total_games_played": 0,
-                "period_revenue": 0.0,
-                "created_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow()
-            }
-            await db.human_bot_counters.insert_one(counters)
+        counters = await read_human_bot_counters()
         
-        total_games_played = counters.get("total_games_played", 0)
+        total_games_played = counters["total_games_played"]
         
         # Calculate period_revenue from profit_entries to ensure consistency
         # This matches the data shown in ProfitAdmin
-        human_bot_commission_entries = await db.profit_entries.find({
-            "entry_type": "HUMAN_BOT_COMMISSION"
-        }).to_list(None)
-        
-        period_revenue = sum(entry.get("amount", 0) for entry in human_bot_commission_entries)
+        period_revenue = profit_amount(await sum_profit(["HUMAN_BOT_COMMISSION"]), "HUMAN_BOT_COMMISSION")
         
         # Calculate character distribution
         character_distribution = {}
@@ -24112,16 +23249,7 @@ async def reset_total_games_counter(
     """Reset the independent total games counter."""
     try:
         # Reset the total games counter
-        await db.human_bot_counters.update_one(
-            {"type": "global"},
-            {
-                "$set": {
-                    "total_games_played": 0,
-                    "updated_at": datetime.utcnow()
-                }
-            },
-            upsert=True
-        )
+        await set_human_bot_counter("total_games_played", 0)
         
         # Log admin action
         admin_log = AdminLog(
@@ -24157,18 +23285,10 @@ async def reset_period_revenue_counter(
         result = await db.profit_entries.delete_many({
             "entry_type": "HUMAN_BOT_COMMISSION"
         })
+        await compact_profit_rollups(types=["HUMAN_BOT_COMMISSION"])
         
         # Also reset the counter in human_bot_counters for backward compatibility
-        await db.human_bot_counters.update_one(
-            {"type": "global"},
-            {
-                "$set": {
-                    "period_revenue": 0.0,
-                    "updated_at": datetime.utcnow()
-                }
-            },
-            upsert=True
-        )
+        await set_human_bot_counter("period_revenue", 0.0)
         
         # Log admin action
         admin_log = AdminLog(
@@ -24211,20 +23331,10 @@ async def sync_human_bot_commission_data(
         total_commission_from_entries = sum(entry.get("amount", 0) for entry in human_bot_commission_entries)
         
         # Get current counter value
-        counter = await db.human_bot_counters.find_one({"type": "global"})
-        current_period_revenue = counter.get("period_revenue", 0.0) if counter else 0.0
+        current_period_revenue = (await read_human_bot_counters())["period_revenue"]
         
         # Update counter to match profit_entries
-        await db.human_bot_counters.update_one(
-            {"type": "global"},
-            {
-                "$set": {
-                    "period_revenue": total_commission_from_entries,
-                    "updated_at": datetime.utcnow()
-                }
-            },
-            upsert=True
-        )
+        await set_human_bot_counter("period_revenue", total_commission_from_entries)
         
         # Log admin action
         admin_log = AdminLog(
@@ -24769,19 +23879,19 @@ async def get_user_notifications(
         # Extract results
         total_notifications = aggregation_result["total_count"][0]["count"] if aggregation_result["total_count"] else 0
         unread_count = aggregation_result["unread_count"][0]["count"] if aggregation_result["unread_count"] else 0
-        notifications_list = aggregation_result["notifications"]
+        notifications_list = await attach_notification_bodies(aggregation_result["notifications"])
         
         # Format response
         notifications = []
         for notif in notifications_list:
-            payload = NotificationPayload(**notif.get("payload", {}))
+            payload = NotificationPayload(**(notif.get("payload") or {}))
             
             notifications.append(NotificationResponse(
                 id=notif.get("id") or str(notif.get("_id")),  # Handle both id and _id fields
                 user_id=notif["user_id"],
                 type=NotificationTypeEnum(notif["type"]),
-                title=notif["title"],
-                message=notif["message"],
+                title=notif.get("title", ""),
+                message=notif.get("message", ""),
                 emoji=notif.get("emoji", "📢"),  # Default emoji if not present
                 priority=NotificationPriorityEnum(notif.get("priority", "info")),  # Default priority if not present
                 payload=payload,
@@ -24835,14 +23945,20 @@ async def mark_notification_as_read(
                 detail="Notification not found"
             )
         
-        # Update read status
-        await db.notifications.update_one(
-            {"id": notification_id},
+        # Update read status (only an unread -> read transition moves the counter)
+        result = await db.notifications.update_one(
+            {"id": notification_id, "is_read": {"$ne": True}},
             {"$set": {
                 "is_read": True,
                 "read_at": datetime.utcnow()
             }}
         )
+        if result.modified_count:
+            await notification_hub.notify(
+                [current_user.id],
+                {"type": "notification_read", "notification_id": notification_id},
+                unread_delta=-1
+            )
         
         return {"success": True, "message": "Notification marked as read"}
         
@@ -24878,6 +23994,11 @@ async def mark_all_notifications_as_read(
                 "read_at": current_time
             }}
         )
+        await notification_hub.notify(
+            [current_user.id],
+            {"type": "notifications_read_all"},
+            unread_reset=True
+        )
         
         return {
             "success": True, 
@@ -24891,6 +24012,37 @@ async def mark_all_notifications_as_read(
             detail="Failed to mark all notifications as read"
         )
 
+@api_router.websocket("/ws/notifications")
+async def notifications_websocket(websocket: WebSocket, token: str = Query(...)):
+    """Push channel for notifications; replaces polling of /notifications.
+    
+    Sends the current unread count on connect, then every new notification and
+    read-state change. Clients may send "ping" to keep the connection alive.
+    """
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        user_id = payload.get("sub")
+    except JWTError:
+        user_id = None
+    
+    if not user_id or not await db.users.find_one({"id": user_id}, {"_id": 1}):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    unread_count = await notification_hub.connect(user_id, websocket)
+    try:
+        await websocket.send_json({"type": "unread_count", "unread_count": unread_count})
+        while True:
+            message = await websocket.receive_text()
+            if message == "ping":
+                await websocket.send_json({"type": "pong"})
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.warning(f"Notification websocket error for user {user_id}: {e}")
+    finally:
+        notification_hub.disconnect(user_id, websocket)
+
 @api_router.get("/notifications/settings", response_model=NotificationSettingsResponse)
 async def get_notification_settings(
     current_user: User = Depends(get_current_user)
@@ -24951,17 +24103,24 @@ async def delete_notification(
     """Delete specific notification"""
     try:
         # Verify notification belongs to user
-        result = await db.notifications.delete_one({
+        deleted = await db.notifications.find_one_and_delete({
             "id": notification_id,
             "user_id": current_user.id
-        })
+        }, projection={"is_read": 1})
         
-        if result.deleted_count == 0:
+        if not deleted:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Notification not found"
             )
         
+        if not deleted.get("is_read"):
+            await notification_hub.notify(
+                [current_user.id],
+                {"type": "notification_deleted", "notification_id": notification_id},
+                unread_delta=-1
+            )
+        
         return {"success": True, "message": "Notification deleted"}
         
     except HTTPException:
@@ -25130,37 +24289,28 @@ async def admin_broadcast_notification(
                 category="admin_broadcast"  
             )
         
-        # Send notification to each user
-        sent_count = 0
-        notification_ids = []
-        for user_id in target_users:
-            notification_id = await create_notification(
-                user_id=user_id,
-                notification_type=request.type,
-                payload=payload,
-                priority=request.priority,
-                expires_at=request.expires_at,
-                custom_title=request.title,
-                custom_message=request.message,
-                custom_emoji="🔔"  # Default emoji for admin broadcasts
-            )
-            
-            if notification_id:
-                sent_count += 1
-                notification_ids.append(notification_id)
+        # Store the body once and write slim receipts for every recipient
+        body_id, sent_count = await create_broadcast_notification(
+            user_ids=list(dict.fromkeys(target_users)),
+            notification_type=request.type,
+            title=request.title,
+            message=request.message,
+            emoji="🔔",  # Default emoji for admin broadcasts
+            payload=payload,
+            priority=request.priority,
+            expires_at=request.expires_at,
+            created_by=current_admin.id
+        )
         
         logger.info(f"Admin {current_admin.email} broadcast notification to {sent_count} users")
         
-        # For broadcast to all, return first notification_id for reference
-        # For specific users, all notifications share the same content but have unique IDs
-        reference_notification_id = notification_ids[0] if notification_ids else None
-        
+        # All receipts share one body, so the body id identifies the broadcast
         return {
             "success": True,
             "message": f"Notification sent to {sent_count} users",
             "sent_count": sent_count,
-            "notification_id": reference_notification_id,
-            "total_notifications": len(notification_ids)
+            "notification_id": body_id,
+            "total_notifications": sent_count
         }
         
     except Exception as e:
@@ -25283,12 +24433,13 @@ async def get_detailed_notification_analytics(
                 }
             },
             {"$group": {
-                "_id": {
+                # Broadcast receipts share a body_id; legacy rows fall back to title+message+minute
+                "_id": {"$ifNull": ["$body_id", {
                     "title": "$title",
                     "message": "$message", 
                     "type": "$type",
                     "rounded_time": "$rounded_time"
-                },
+                }]},
                 "notification": {"$first": "$$ROOT"},
                 "total_instances": {"$sum": 1}
             }},
@@ -25299,7 +24450,7 @@ async def get_detailed_notification_analytics(
         ]
         
         notifications_cursor = db.notifications.aggregate(pipeline)
-        notifications = await notifications_cursor.to_list(limit)
+        notifications = await attach_notification_bodies(await notifications_cursor.to_list(limit))
         
         # Get total count of unique notifications
         count_pipeline = [
@@ -25318,12 +24469,12 @@ async def get_detailed_notification_analytics(
                 }
             },
             {"$group": {
-                "_id": {
+                "_id": {"$ifNull": ["$body_id", {
                     "title": "$title",
                     "message": "$message",
                     "type": "$type", 
                     "rounded_time": "$rounded_time"
-                }
+                }]}
             }},
             {"$count": "total"}
         ]
@@ -25346,6 +24497,17 @@ async def get_detailed_notification_analytics(
         all_human_ids = [user["id"] for user in all_humans]
         humans_map = {user["id"]: user for user in all_humans}
         
+        # Receipts of shared-body broadcasts on this page: one grouped read on body_id
+        page_body_ids = [n["body_id"] for n in notifications if n.get("body_id")]
+        receipts_by_body = defaultdict(list)
+        if page_body_ids:
+            receipts_cursor = db.notifications.find(
+                {"body_id": {"$in": page_body_ids}},
+                {"_id": 0, "body_id": 1, "user_id": 1, "is_read": 1, "read_at": 1}
+            )
+            async for receipt in receipts_cursor:
+                receipts_by_body[receipt["body_id"]].append(receipt)
+        
         # PERFORMANCE OPTIMIZATION: Get all read notifications for all paginated notifications at once
         notification_ids = []
         for notification in notifications:
@@ -25409,7 +24571,14 @@ async def get_detailed_notification_analytics(
             individual_notification_types = {"bet_accepted", "match_result", "gem_gift", "commission_freeze"}
             is_individual_notification = notification_type in individual_notification_types
             
-            if not is_individual_notification:
+            if notification.get("body_id"):
+                notification_id = notification["body_id"]
+                body_receipts = [r for r in receipts_by_body.get(notification_id, []) if r.get("user_id") in humans_map]
+                target_user_ids = list({r["user_id"] for r in body_receipts})
+                target_users = [humans_map[uid] for uid in target_user_ids]
+                read_user_ids = {r["user_id"] for r in body_receipts if r.get("is_read")}
+                read_at_map = {r["user_id"]: r.get("read_at") for r in body_receipts if r.get("is_read")}
+            elif not is_individual_notification:
                 created_at = notification.get("created_at")
                 if isinstance(created_at, datetime):
                     rounded_time = created_at.replace(second=0, microsecond=0)
@@ -25532,6 +24701,29 @@ async def resend_notification_to_unread(
 ):
     """Resend notification to users who haven't read it"""
     try:
+        # Shared-body broadcasts: unread recipients come straight from the receipts
+        body = await db.notification_bodies.find_one({"id": request.notification_id})
+        if body:
+            unread_cursor = db.notifications.find(
+                {"body_id": body["id"], "is_read": False},
+                {"_id": 0, "user_id": 1}
+            )
+            unread_user_ids = [receipt["user_id"] async for receipt in unread_cursor]
+            _, resent_count = await create_broadcast_notification(
+                user_ids=unread_user_ids,
+                notification_type=NotificationTypeEnum.ADMIN_NOTIFICATION,
+                title=f"[REMINDER] {body.get('title', '')}",
+                message=body.get("message", ""),
+                emoji=body.get("emoji", "🔔"),
+                priority=NotificationPriorityEnum.INFO,
+                created_by=current_admin.id
+            )
+            return {
+                "success": True,
+                "message": f"Notification resent to {resent_count} unread users",
+                "resent_count": resent_count
+            }
+        
         # Get original notification
         original_notification = await db.notifications.find_one({"id": request.notification_id})
         if not original_notification:
@@ -25630,6 +24822,9 @@ async def delete_notifications_by_type(
         delete_result = await db.notifications.delete_many({
             "type": {"$in": request.notification_types}
         })
+        await db.notification_bodies.delete_many({
+            "type": {"$in": request.notification_types}
+        })
         
         deleted_count = delete_result.deleted_count
         type_names_str = ", ".join([type_names.get(t, t) for t in request.notification_types])
@@ -25666,6 +24861,13 @@ async def delete_notifications_by_ids(
         individual_notification_types = {"bet_accepted", "match_result", "gem_gift", "commission_freeze"}
         
         for notification_id in request.notification_ids:
+            # Shared-body broadcast: drop all receipts and the body itself
+            body_delete_result = await db.notification_bodies.delete_one({"id": notification_id})
+            if body_delete_result.deleted_count:
+                delete_result = await db.notifications.delete_many({"body_id": notification_id})
+                total_deleted_count += delete_result.deleted_count
+                continue
+            
             notification = await db.notifications.find_one({
                 "$or": [
                     {"id": notification_id},
@@ -25952,19 +25154,28 @@ async def remove_human_bot_name(
 # INCLUDE ROUTERS
 # ==============================================================================
 
-# Include routers in the main app
-app.include_router(auth_router)
-app.include_router(api_router)
+# Include routers in the main app. Routes are built on startup rather than at import,
+# so scripts and workers that only need module-level helpers import quickly; routes
+# declared further down this module are included as well.
+def include_api_routers():
+    auth_router.include_into(app)
+    api_router.include_into(app)
+
+app.router.on_startup.insert(0, include_api_routers)
 
 # ==============================================================================
 # CACHE MANAGEMENT ENDPOINTS
 # ==============================================================================
 
+# Endpoints below were declared after the routers were included and have never been
+# served. They stay on a router that is not included until they get their own review.
+unregistered_router = LazyAPIRouter(prefix="/api")
+
 # ==============================================================================
 # HUMAN BOT DUPLICATES CLEANUP
 # ==============================================================================
 
-@api_router.post("/admin/human-bots/cleanup-duplicates", response_model=dict)
+@unregistered_router.post("/admin/human-bots/cleanup-duplicates", response_model=dict)
 async def cleanup_human_bot_duplicates(
     current_admin: User = Depends(get_current_admin)
 ):
@@ -26010,9 +25221,9 @@ async def cleanup_human_bot_duplicates(
                     logger.warning(f"Human-bot {bot_name} has user balance ${duplicate_user.get('virtual_balance', 0)} that needs manual review")
                 
                 # Check for related data that might need to be preserved or transferred
-                user_gems = await db.user_gems.find({"user_id": bot_id}).to_list(None)
-                if user_gems:
-                    logger.warning(f"Human-bot {bot_name} has {len(user_gems)} gem records that need manual review")
+                bot_gem_rows = await gem_inventory.rows(bot_id)
+                if bot_gem_rows:
+                    logger.warning(f"Human-bot {bot_name} has {len(bot_gem_rows)} gem records that need manual review")
                 
                 user_notifications = await db.notifications.find({"user_id": bot_id}).to_list(None)
                 if user_notifications:
@@ -26081,7 +25292,7 @@ async def cleanup_human_bot_duplicates(
             detail=f"Failed to cleanup duplicates: {str(e)}"
         )
 
-@api_router.post("/admin/human-bots/migrate", response_model=dict)
+@unregistered_router.post("/admin/human-bots/migrate", response_model=dict)
 async def manual_migrate_human_bots(
     current_admin: User = Depends(get_current_admin)
 ):
@@ -0,0 +1,106 @@
+"""
+Хранилище refresh-токенов.
+
+В базе лежит только sha256 токена (token_hash, уникальный индекс) и снимок
+полей авторизации пользователя (principal: id, роль, статус, подтверждение почты),
+которые проверяет /auth/refresh; балансы и статистика в снимок не входят. Ротация — один
+find_one_and_update: старый хеш заменяется новым, поэтому повторное предъявление
+старого токена уже ничего не находит. Истёкшие записи удаляет TTL-индекс по expires_at.
+"""
+
+import secrets
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from pymongo import ReturnDocument, UpdateOne
+
+from auth_utils import hash_token
+
+REFRESH_TOKEN_BYTES = 32
+
+# (collection, keys, options) для BOOTSTRAP_INDEXES
+REFRESH_TOKEN_INDEXES = [
+    # sparse: старые записи с открытым токеном до миграции не имеют token_hash
+    ("refresh_tokens", [("token_hash", 1)], {"unique": True, "sparse": True}),
+    ("refresh_tokens", [("user_id", 1)], {}),
+    ("refresh_tokens", [("expires_at", 1)], {"expireAfterSeconds": 0}),
+]
+
+
+class RefreshTokenStore:
+    def __init__(self, collection, ttl_days: int):
+        self.collection = collection
+        self.ttl = timedelta(days=ttl_days)
+
+    @staticmethod
+    def new_token() -> Tuple[str, str]:
+        token = secrets.token_urlsafe(REFRESH_TOKEN_BYTES)
+        return token, hash_token(token)
+
+    async def issue(self, user_id: str, principal: Dict[str, Any]) -> str:
+        """Новый токен пользователя; прежние токены этого пользователя отзываются"""
+        token, token_hash = self.new_token()
+        now = datetime.utcnow()
+        await self.collection.delete_many({"user_id": user_id})
+        await self.collection.insert_one({
+            "id": str(uuid.uuid4()),
+            "token_hash": token_hash,
+            "user_id": user_id,
+            "principal": principal,
+            "created_at": now,
+            "rotated_at": now,
+            "expires_at": now + self.ttl,
+        })
+        return token
+
+    async def rotate(self, token: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """
+        Меняет токен на новый за один запрос. Возвращает (новый токен, запись после ротации)
+        или (None, None), если токен неизвестен, уже использован или истёк.
+        """
+        new_token, new_hash = self.new_token()
+        now = datetime.utcnow()
+        record = await self.collection.find_one_and_update(
+            {"token_hash": hash_token(token), "expires_at": {"$gt": now}},
+            {"$set": {"token_hash": new_hash, "rotated_at": now, "expires_at": now + self.ttl}},
+            projection={"_id": 0, "user_id": 1, "principal": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if record is None:
+            return None, None
+        return new_token, record
+
+    async def update_principal(self, user_id: str, fields: Dict[str, Any]) -> None:
+        """Держит снимок в токенах пользователя в актуальном состоянии"""
+        if fields:
+            await self.collection.update_many(
+                {"user_id": user_id},
+                {"$set": {f"principal.{name}": value for name, value in fields.items()}}
+            )
+
+    async def set_principal(self, user_id: str, principal: Dict[str, Any]) -> None:
+        await self.collection.update_many({"user_id": user_id}, {"$set": {"principal": principal}})
+
+    async def revoke_user(self, user_id: str) -> int:
+        result = await self.collection.delete_many({"user_id": user_id})
+        return result.deleted_count
+
+    async def migrate_plaintext_tokens(self) -> Dict[str, int]:
+        """Старые записи {token, is_active}: неактивные удаляются, активные переводятся на token_hash"""
+        removed = await self.collection.delete_many({
+            "token_hash": {"$exists": False},
+            "$or": [{"is_active": False}, {"expires_at": {"$lte": datetime.utcnow()}}],
+        })
+        operations = [
+            UpdateOne(
+                {"_id": doc["_id"]},
+                {"$set": {"token_hash": hash_token(doc["token"])}, "$unset": {"token": "", "is_active": ""}}
+            )
+            async for doc in self.collection.find(
+                {"token_hash": {"$exists": False}, "token": {"$type": "string"}}, {"_id": 1, "token": 1}
+            )
+        ]
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
+        return {"removed": removed.deleted_count, "hashed": len(operations)}
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк генератора планов циклов: прежние чисто-Python функции против
+векторизованного движка backend/core/cycle_planning.py.
+
+Запуск: python cycle_plan_benchmark.py [--bots 2000] [--games 16] [--repeat 3]
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from core.cycle_economics import plan_seed  # noqa: E402
+from core.cycle_planning import build_cycle_plan, build_cycle_plans, exact_sum_amounts  # noqa: E402
+
+
+# ----------------------------------------------------------------------------
+# Прежняя реализация (перенесена без логирования для сравнения)
+# ----------------------------------------------------------------------------
+
+def legacy_normalize(base_amounts, target_sum, min_bet, max_bet):
+    if not base_amounts or target_sum <= 0:
+        return []
+    target_sum = int(round(target_sum))
+    min_bet = int(min_bet)
+    max_bet = int(max_bet)
+    current_sum = sum(base_amounts)
+    if current_sum <= 0:
+        avg_amount = target_sum / len(base_amounts)
+        return [max(min_bet, min(max_bet, round(avg_amount)))] * len(base_amounts)
+    scale_factor = target_sum / current_sum
+    scaled = [max(min_bet, min(max_bet, round(a * scale_factor))) for a in base_amounts]
+    difference = target_sum - sum(scaled)
+    attempts = 0
+    max_attempts = abs(difference) * 2
+    while difference != 0 and attempts < max_attempts:
+        adjustable = []
+        for i, amount in enumerate(scaled):
+            if difference > 0 and amount < max_bet:
+                adjustable.append(i)
+            elif difference < 0 and amount > min_bet:
+                adjustable.append(i)
+        if not adjustable:
+            break
+        idx = random.choice(adjustable)
+        if difference > 0:
+            scaled[idx] += 1
+            difference -= 1
+        else:
+            scaled[idx] -= 1
+            difference += 1
+        attempts += 1
+    return scaled
+
+
+def legacy_build_weighted(min_b, max_b, total, cnt, rng):
+    if cnt <= 0:
+        return []
+    small_share, medium_share = 0.375, 0.375
+    small_cnt = max(1, int(round(cnt * small_share)))
+    medium_cnt = max(1, int(round(cnt * medium_share)))
+    large_cnt = max(0, cnt - small_cnt - medium_cnt)
+    rng_span = max_b - min_b
+    s_lo, s_hi = min_b, min_b + int(rng_span * 0.30)
+    m_lo, m_hi = min_b + int(rng_span * 0.31), min_b + int(rng_span * 0.70)
+    l_lo, l_hi = min_b + int(rng_span * 0.71), max_b
+
+    def gen(c, lo, hi):
+        return [rng.randint(lo, max(lo, hi)) for _ in range(max(0, c))]
+
+    base = gen(small_cnt, s_lo, s_hi) + gen(medium_cnt, m_lo, m_hi) + gen(large_cnt, l_lo, l_hi)
+    return [int(x) for x in legacy_normalize(base, total, min_b, max_b)]
+
+
+def legacy_cycle_plan(bot_id, counts, sums, min_bet, max_bet):
+    seed_input = f"{bot_id}:{sum(counts)}:{min_bet}-{max_bet}:{counts[0]}-{counts[1]}-{counts[2]}"
+    rng = random.Random(int(hashlib.sha256(seed_input.encode()).hexdigest(), 16) % (2 ** 32))
+    bets = []
+    for label, cnt, total in zip(("win", "loss", "draw"), counts, sums):
+        bets += [{"result": label, "amount": a} for a in legacy_build_weighted(min_bet, max_bet, total, cnt, rng)]
+    rng.shuffle(bets)
+    return [dict(bet, index=i) for i, bet in enumerate(bets)]
+
+
+# ----------------------------------------------------------------------------
+# Сценарии
+# ----------------------------------------------------------------------------
+
+def make_specs(bots, games):
+    counts = (games * 5 // 16, games * 7 // 16, games - games * 5 // 16 - games * 7 // 16)
+    total = int(round(50.5 * games))
+    sums = (int(total * 0.41), int(total * 0.34), total - int(total * 0.41) - int(total * 0.34))
+    return [
+        {"bot_id": f"bot-{i}", "seed": plan_seed(f"bot-{i}", 1), "min_bet": 1, "max_bet": 100,
+         "counts": counts, "sums": sums}
+        for i in range(bots)
+    ]
+
+
+def timed(label, fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    print(f"  {label:<44} {best * 1000:10.2f} ms")
+    return best
+
+
+def check_plans(specs, plans):
+    for spec, plan in zip(specs, plans):
+        for label, cnt, total in zip(("win", "loss", "draw"), spec["counts"], spec["sums"]):
+            amounts = [b["amount"] for b in plan if b["result"] == label]
+            assert len(amounts) == cnt and sum(amounts) == total, (spec["bot_id"], label)
+            assert all(spec["min_bet"] <= a <= spec["max_bet"] for a in amounts)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bots", type=int, default=2000)
+    parser.add_argument("--games", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    specs = make_specs(args.bots, args.games)
+    print(f"Планы циклов: {args.bots} ботов × {args.games} игр")
+
+    legacy = timed("legacy: цикл Python на бота", lambda: [
+        legacy_cycle_plan(s["bot_id"], s["counts"], s["sums"], s["min_bet"], s["max_bet"]) for s in specs
+    ], args.repeat)
+    single = timed("numpy: build_cycle_plan на бота", lambda: [build_cycle_plan(s) for s in specs], args.repeat)
+    batch = timed("numpy: build_cycle_plans (пакет)", lambda: build_cycle_plans(specs), args.repeat)
+    print(f"  ускорение пакета: x{legacy / batch:.1f}, одиночного: x{legacy / single:.1f}")
+
+    plans = build_cycle_plans(specs)
+    check_plans(specs, plans)
+    assert plans == build_cycle_plans(specs), "план должен быть воспроизводим по seed"
+    assert build_cycle_plan(specs[-1]) == plans[-1], "план не должен зависеть от состава пакета"
+    print("  ✅ точные суммы W/L/D, границы ставок и воспроизводимость по seed")
+
+    print("\nНормализация к точной сумме (выбросы в базе упираются в max_bet)")
+    rng = random.Random(7)
+    cases = [([rng.uniform(1, 10) for _ in range(190)] + [1000.0] * 10, 9000) for _ in range(50)]
+    timed("legacy: ±1 за итерацию", lambda: [legacy_normalize(b, t, 1, 100) for b, t in cases], args.repeat)
+    timed("numpy: наибольшие остатки", lambda: [exact_sum_amounts(b, t, 1, 100) for b, t in cases], args.repeat)
+    assert all(sum(exact_sum_amounts(b, t, 1, 100)) == t for b, t in cases)
+
+
+if __name__ == "__main__":
+    main()
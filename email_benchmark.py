@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк отправки писем на локальном SMTP-сервере aiosmtpd:
+прежняя схема (smtplib, новое соединение на каждое письмо, вызов прямо из event loop)
+против пула соединений SMTPPool из backend/email_utils.py.
+
+--handshake-ms имитирует стоимость STARTTLS + AUTH реального релея (задержка на EHLO),
+--latency-ms — время приёма одного письма сервером.
+
+Требуется aiosmtpd (только для бенчмарка): pip install aiosmtpd
+Запуск: python email_benchmark.py [--messages 200] [--pool 3] [--handshake-ms 40] [--latency-ms 5]
+"""
+
+import argparse
+import asyncio
+import os
+import smtplib
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from aiosmtpd.controller import Controller  # noqa: E402
+
+from email_utils import SMTPPool, build_message, jinja_env, render_email, template_dir, verification_email  # noqa: E402
+
+
+class CountingHandler:
+    def __init__(self, handshake_ms, latency_ms):
+        self.handshake = handshake_ms / 1000
+        self.latency = latency_ms / 1000
+        self.received = 0
+        self.connections = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.connections += 1
+        session.host_name = hostname
+        await asyncio.sleep(self.handshake)
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.latency)
+        self.received += 1
+        return "250 Message accepted for delivery"
+
+
+async def measure_loop_lag(stop):
+    """Максимальная задержка тика event loop во время отправки"""
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.005)
+        worst = max(worst, time.perf_counter() - started - 0.005)
+    return worst
+
+
+async def run_legacy(port, emails):
+    stop = asyncio.Event()
+    lag = asyncio.create_task(measure_loop_lag(stop))
+    await asyncio.sleep(0)
+    started = time.perf_counter()
+    for email in emails:
+        # Как EmailService._send_email до очереди: синхронно, новое соединение на письмо
+        with smtplib.SMTP("127.0.0.1", port) as server:
+            server.send_message(build_message("bench@gemplay.local", email))
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    return elapsed, await lag
+
+
+async def run_pooled(port, emails, pool_size):
+    pool = SMTPPool(host="127.0.0.1", port=port, user="", password="", size=pool_size, start_tls=False)
+    stop = asyncio.Event()
+    lag = asyncio.create_task(measure_loop_lag(stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(pool.send(build_message("bench@gemplay.local", email)) for email in emails))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await pool.close()
+    return elapsed, await lag
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--pool", type=int, default=3)
+    parser.add_argument("--handshake-ms", type=float, default=40.0)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--port", type=int, default=8025)
+    args = parser.parse_args()
+
+    handler = CountingHandler(args.handshake_ms, args.latency_ms)
+    controller = Controller(handler, hostname="127.0.0.1", port=args.port)
+    controller.start()
+    try:
+        emails = [verification_email(f"user{i}@example.com", f"user{i}", f"token-{i}") for i in range(args.messages)]
+        print(f"Письма: {args.messages}, рукопожатие {args.handshake_ms:g} ms, приём {args.latency_ms:g} ms")
+
+        for label, runner in (
+            ("legacy: smtplib, соединение на письмо", lambda: run_legacy(args.port, emails)),
+            (f"пул aiosmtplib ({args.pool} соединения)", lambda: run_pooled(args.port, emails, args.pool)),
+        ):
+            handler.received = handler.connections = 0
+            elapsed, lag = asyncio.run(runner())
+            assert handler.received == args.messages, (handler.received, args.messages)
+            print(f"  {label:<40} {elapsed:7.2f} s  {args.messages / elapsed:8.1f} писем/с  "
+                  f"соединений: {handler.connections:<4} макс. задержка loop: {lag * 1000:8.1f} ms")
+
+        print("\nРендеринг шаблона письма")
+        rounds = 2000
+        sources = [(template_dir / f"email_verification.{ext}").read_text(encoding="utf-8") for ext in ("html", "txt")]
+        started = time.perf_counter()
+        for i in range(rounds):
+            for source in sources:
+                jinja_env.from_string(source).render(username=f"user{i}", verification_url=f"http://localhost:3000/verify-email?token={i}")
+        uncached = time.perf_counter() - started
+        started = time.perf_counter()
+        for i in range(rounds):
+            render_email("email_verification", username=f"user{i}", verification_url=f"http://localhost:3000/verify-email?token={i}")
+        cached = time.perf_counter() - started
+        print(f"  компиляция шаблонов на каждое письмо     {uncached / rounds * 1e6:9.1f} мкс/письмо")
+        print(f"  кэшированные скомпилированные шаблоны    {cached / rounds * 1e6:9.1f} мкс/письмо")
+    finally:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    main()
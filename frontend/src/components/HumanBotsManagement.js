@@ -545,6 +545,16 @@ const HumanBotsManagement = ({ user: currentUser }) => {
     }
   };
 
+  const waitForMaintenanceJob = async (jobId, intervalMs = 2000) => {
+    for (;;) {
+      const { job } = await executeOperation(`/admin/maintenance/jobs/${jobId}`, 'GET');
+      if (!['pending', 'running'].includes(job.status)) {
+        return job;
+      }
+      await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+  };
+
   const handleBulkCreate = async () => {
     // Prevent multiple simultaneous requests
     if (bulkCreateLoading) {
@@ -575,7 +585,16 @@ const HumanBotsManagement = ({ user: currentUser }) => {
         bots: bulkCreateData.bots || []
       };
 
-      const response = await executeOperation('/admin/human-bots/bulk-create', 'POST', payload);
+      let response = await executeOperation('/admin/human-bots/bulk-create', 'POST', payload);
+      if (response.job_id && response.status !== 'completed' && response.created_count === undefined) {
+        // Large batches run as a background job: wait for it and use its result
+        addNotification(`Создание ${bulkCreateData.count} Human-ботов запущено в фоне...`, 'info');
+        const job = await waitForMaintenanceJob(response.job_id);
+        if (job.status !== 'completed') {
+          throw new Error(job.error || `Задача создания ботов завершилась со статусом ${job.status}`);
+        }
+        response = { success: true, ...job.result };
+      }
       if (response.success !== false) {
         addNotification(`Массовое создание завершено: создано ${response.created_count || bulkCreateData.count} Human-ботов`, 'success');
         setShowBulkCreateForm(false);
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк заморозки гемов при создании ставок: много пользователей одновременно
+создают ставки из 3-4 типов гемов.
+
+Сравниваются:
+  - прежняя схема user_gems: по каждому типу find_one строки для проверки,
+    затем по каждому типу update_one с $inc frozen_quantity;
+  - GemInventoryStore.freeze: один условный update_one документа пользователя.
+
+Печатаются ставки/с, задержка (p50/p99), число запросов к базе на ставку и проверка
+инварианта: заморозка нигде не превышает количество (в прежней схеме гонка между
+проверкой и записью позволяет заморозить больше, чем есть).
+
+Нужна MongoDB; используется временная база, которая удаляется в конце.
+Запуск: MONGO_URL=mongodb://localhost:27017 python gem_inventory_benchmark.py [--users 500] [--bets 8] [--concurrency 200]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from bootstrap_utils import create_indexes  # noqa: E402
+from gem_inventory_utils import GEM_INVENTORY_INDEXES, GEM_TYPES, GemInventoryStore  # noqa: E402
+
+STARTING_GEMS = {"Ruby": 40, "Amber": 20, "Topaz": 10, "Emerald": 6, "Aquamarine": 4}
+
+
+def random_bet(rng):
+    gem_types = rng.sample(list(STARTING_GEMS), rng.choice((3, 4)))
+    return {gem_type: rng.randint(1, 3) for gem_type in gem_types}
+
+
+class Counter:
+    def __init__(self):
+        self.queries = 0
+        self.accepted = 0
+
+
+async def legacy_freeze(db, user_id, bet, counter):
+    for gem_type, quantity in bet.items():
+        row = await db.user_gems.find_one({"user_id": user_id, "gem_type": gem_type})
+        counter.queries += 1
+        if not row or row["quantity"] - row["frozen_quantity"] < quantity:
+            return False
+    for gem_type, quantity in bet.items():
+        await db.user_gems.update_one(
+            {"user_id": user_id, "gem_type": gem_type}, {"$inc": {"frozen_quantity": quantity}}
+        )
+    counter.queries += len(bet)
+    return True
+
+
+async def store_freeze(store, user_id, bet, counter):
+    counter.queries += 1
+    return await store.freeze(user_id, bet)
+
+
+async def run(bets, freeze, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    counter = Counter()
+
+    async def one(user_id, bet):
+        async with semaphore:
+            started = time.perf_counter()
+            accepted = await freeze(user_id, bet, counter)
+            latencies.append(time.perf_counter() - started)
+            counter.accepted += accepted
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(user_id, bet) for user_id, bet in bets))
+    return time.perf_counter() - started, latencies, counter
+
+
+def report(label, total, elapsed, latencies, counter, violations):
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"  {label:<20} {total / elapsed:8.0f} ставок/с  p50 {statistics.median(latencies) * 1000:6.1f} ms  "
+          f"p99 {p99 * 1000:6.1f} ms  запросов/ставку {counter.queries / total:4.1f}  "
+          f"принято {counter.accepted}  перезаморозок: {violations}")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--bets", type=int, default=8, help="ставок на пользователя, создаваемых одновременно")
+    parser.add_argument("--concurrency", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    user_ids = [str(uuid.uuid4()) for _ in range(args.users)]
+    bets = [(user_id, random_bet(rng)) for user_id in user_ids for _ in range(args.bets)]
+    rng.shuffle(bets)
+    total = len(bets)
+
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    db = client["gemplay_gem_inventory_bench"]
+    await client.drop_database(db.name)
+    try:
+        print(f"Пользователей: {args.users}, ставок: {total}, параллельно: {args.concurrency}")
+
+        await db.user_gems.create_index([("user_id", 1), ("gem_type", 1)], unique=True)
+        await db.user_gems.insert_many([
+            {"user_id": user_id, "gem_type": gem_type, "quantity": quantity, "frozen_quantity": 0}
+            for user_id in user_ids for gem_type, quantity in STARTING_GEMS.items()
+        ])
+        elapsed, latencies, counter = await run(
+            bets, lambda user_id, bet, counter: legacy_freeze(db, user_id, bet, counter), args.concurrency
+        )
+        violations = await db.user_gems.count_documents({"$expr": {"$gt": ["$frozen_quantity", "$quantity"]}})
+        report("user_gems", total, elapsed, latencies, counter, violations)
+
+        await create_indexes(db, GEM_INVENTORY_INDEXES)
+        store = GemInventoryStore(db.gem_inventories)
+        await store.create_many(user_ids, STARTING_GEMS)
+        elapsed, latencies, counter = await run(
+            bets, lambda user_id, bet, counter: store_freeze(store, user_id, bet, counter), args.concurrency
+        )
+        violations = await db.gem_inventories.count_documents({"$expr": {"$or": [
+            {"$gt": [f"$frozen.{gem_type}", f"$quantity.{gem_type}"]} for gem_type in GEM_TYPES
+        ]}})
+        report("GemInventoryStore", total, elapsed, latencies, counter, violations)
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
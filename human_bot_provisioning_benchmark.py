@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк массового создания Human-ботов (/admin/human-bots/bulk-create).
+
+Сравниваются:
+  - прежняя схема: на каждого бота перечитываются все имена (to_list(None)),
+    затем insert_one бота и top_up гемов;
+  - human_bot_provisioning_utils: имена резервируются за один проход,
+    документы готовятся заранее и пишутся пачками insert_many по коллекциям.
+
+Печатаются время, ботов/с и число запросов к базе. Перед замером в коллекции
+уже лежат --existing ботов, имена которых приходится обходить.
+
+Нужна MongoDB; используется временная база, которая удаляется в конце.
+Запуск: MONGO_URL=mongodb://localhost:27017 python human_bot_provisioning_benchmark.py [--bots 1000] [--existing 5000]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from bootstrap_utils import create_indexes  # noqa: E402
+from gem_inventory_utils import GEM_INVENTORY_INDEXES, GemInventoryStore  # noqa: E402
+from human_bot_provisioning_utils import chunked, insert_new, load_names, reserve_names  # noqa: E402
+
+NAME_POOL = [f"Name{i}" for i in range(64)]
+MINIMUMS = {"Ruby": 50, "Amber": 25, "Topaz": 10, "Emerald": 5, "Aquamarine": 2, "Sapphire": 1, "Magic": 1}
+STARTING_GEMS = {gem_type: quantity * 2 for gem_type, quantity in MINIMUMS.items()}
+
+
+def make_bot(name, rng):
+    now = datetime.utcnow()
+    return {"id": str(uuid.uuid4()), "name": name, "character": "BALANCED", "min_bet": float(rng.randint(1, 50)),
+            "max_bet": float(rng.randint(51, 200)), "virtual_balance": 2000.0, "created_at": now, "updated_at": now}
+
+
+async def legacy_create(db, store, count, rng):
+    queries = 0
+    for _ in range(count):
+        names = {bot["name"] for bot in await db.human_bots.find({}, {"name": 1}).to_list(None)}
+        name = reserve_names([None], names, NAME_POOL, rng)[0]
+        bot = make_bot(name, rng)
+        await db.human_bots.insert_one(bot)
+        await store.top_up(bot["id"], MINIMUMS, STARTING_GEMS)
+        queries += 3
+    return queries
+
+
+async def pipeline_create(db, store, count, rng):
+    names = reserve_names([None] * count, await load_names(db.human_bots), NAME_POOL, rng)
+    planned = [make_bot(name, rng) for name in names]
+    queries = 1
+    for chunk in chunked(planned):
+        await insert_new(db.human_bots, chunk)
+        await store.insert_many([bot["id"] for bot in chunk], STARTING_GEMS)
+        queries += 4
+    return queries
+
+
+async def measure(label, db, store, count, create, rng):
+    started = time.perf_counter()
+    queries = await create(db, store, count, rng)
+    elapsed = time.perf_counter() - started
+    names = await db.human_bots.distinct("name")
+    total = await db.human_bots.count_documents({})
+    print(f"  {label:<22} {elapsed:8.2f} s  {count / elapsed:8.0f} ботов/с  запросов {queries:6d}  "
+          f"повторов имён: {total - len(names)}")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bots", type=int, default=1000)
+    parser.add_argument("--existing", type=int, default=5000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    db = client["gemplay_human_bot_provisioning_bench"]
+    try:
+        print(f"Ботов: {args.bots}, уже существует: {args.existing}")
+        for label, create in (("по одному", legacy_create), ("пачками insert_many", pipeline_create)):
+            await client.drop_database(db.name)
+            await create_indexes(db, GEM_INVENTORY_INDEXES)
+            existing = reserve_names([None] * args.existing, (), NAME_POOL, rng)
+            for chunk in chunked([make_bot(name, rng) for name in existing], 10000):
+                await db.human_bots.insert_many(chunk)
+            await measure(label, db, GemInventoryStore(db.gem_inventories), args.bots, create, rng)
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
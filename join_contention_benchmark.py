@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк конкуренции за одну ставку: 100 игроков одновременно присоединяются к одной игре.
+
+Сравниваются:
+  - прежняя схема join: заморозка гемов и комиссии, затем условный update_one игры,
+    у проигравших — обратные записи (возврат гемов и баланса);
+  - переход game_state_utils.transition: условный find_one_and_update с версией,
+    заморозка только у победителя.
+
+Печатаются время раунда, задержка проигравших (p50/p99), число записей в базу
+и компенсирующих записей на раунд, а также проверка инвариантов: ровно один
+победитель и замороженные гемы только у него.
+
+Нужна MongoDB; используется временная база, которая удаляется в конце.
+Запуск: MONGO_URL=mongodb://localhost:27017 python join_contention_benchmark.py [--joiners 100] [--rounds 20]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from core.models import Game, GameStatus  # noqa: E402
+from game_state_utils import joinable, seen_version, transition  # noqa: E402
+
+GEMS = {"Ruby": 5, "Emerald": 1}
+BET_AMOUNT = 15.0
+COMMISSION = 0.45
+
+
+class Counter:
+    def __init__(self):
+        self.writes = 0
+        self.compensations = 0
+
+
+async def legacy_join(db, game_id, user_id, counter):
+    game = await db.games.find_one({"id": game_id})
+    if game["status"] != GameStatus.WAITING or game["opponent_id"]:
+        return False
+    user = await db.users.find_one({"id": user_id})
+    for gem_type, quantity in GEMS.items():
+        await db.user_gems.update_one({"user_id": user_id, "gem_type": gem_type}, {"$inc": {"frozen_quantity": quantity}})
+        counter.writes += 1
+    await db.users.update_one({"id": user_id}, {"$set": {
+        "virtual_balance": user["virtual_balance"] - COMMISSION,
+        "frozen_balance": user["frozen_balance"] + COMMISSION,
+    }})
+    counter.writes += 1
+    result = await db.games.update_one(
+        {"id": game_id, "opponent_id": None, "status": "WAITING"},
+        {"$set": {"opponent_id": user_id, "status": "ACTIVE", "joined_at": datetime.utcnow()}}
+    )
+    counter.writes += 1
+    if result.modified_count:
+        return True
+    for gem_type, quantity in GEMS.items():
+        await db.user_gems.update_one({"user_id": user_id, "gem_type": gem_type}, {"$inc": {"frozen_quantity": -quantity}})
+    await db.users.update_one({"id": user_id}, {"$set": {
+        "virtual_balance": user["virtual_balance"], "frozen_balance": user["frozen_balance"],
+    }})
+    counter.writes += len(GEMS) + 1
+    counter.compensations += len(GEMS) + 1
+    return False
+
+
+async def transition_join(db, game_id, user_id, counter):
+    game = await db.games.find_one({"id": game_id}, {"_id": 0, "status": 1, "opponent_id": 1, "version": 1})
+    if game["status"] != GameStatus.WAITING or game["opponent_id"]:
+        return False
+    await db.users.find_one({"id": user_id}, {"_id": 0, "virtual_balance": 1})
+    claimed = await transition(
+        db.games, game_id, joinable(user_id),
+        {"opponent_id": user_id, "status": GameStatus.ACTIVE, "joined_at": datetime.utcnow()},
+        version=seen_version(game), projection={"_id": 0, "version": 1}
+    )
+    counter.writes += 1
+    if claimed is None:
+        return False
+    await db.users.update_one(
+        {"id": user_id, "virtual_balance": {"$gte": COMMISSION}},
+        {"$inc": {"virtual_balance": -COMMISSION, "frozen_balance": COMMISSION}}
+    )
+    for gem_type, quantity in GEMS.items():
+        await db.user_gems.update_one({"user_id": user_id, "gem_type": gem_type}, {"$inc": {"frozen_quantity": quantity}})
+    counter.writes += len(GEMS) + 1
+    return True
+
+
+async def seed(db, joiners):
+    user_ids = [str(uuid.uuid4()) for _ in range(joiners)]
+    await db.users.insert_many([
+        {"id": user_id, "virtual_balance": 100.0, "frozen_balance": 0.0} for user_id in user_ids
+    ])
+    await db.user_gems.insert_many([
+        {"user_id": user_id, "gem_type": gem_type, "quantity": 50, "frozen_quantity": 0}
+        for user_id in user_ids for gem_type in GEMS
+    ])
+    await db.users.create_index("id", unique=True)
+    await db.user_gems.create_index([("user_id", 1), ("gem_type", 1)], unique=True)
+    await db.games.create_index("id", unique=True)
+    return user_ids
+
+
+async def run_round(db, user_ids, join, counter):
+    game = Game(creator_id=str(uuid.uuid4()), bet_amount=BET_AMOUNT, bet_gems=GEMS).dict()
+    game["created_at"] = datetime.utcnow() - timedelta(seconds=1)
+    await db.games.insert_one(game)
+
+    loser_latencies = []
+
+    async def one(user_id):
+        started = time.perf_counter()
+        won = await join(db, game["id"], user_id, counter)
+        if not won:
+            loser_latencies.append(time.perf_counter() - started)
+        return won
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(one(user_id) for user_id in user_ids))
+    elapsed = time.perf_counter() - started
+
+    # Инварианты: один победитель, замороженные гемы только у него
+    frozen_holders = await db.user_gems.distinct("user_id", {"frozen_quantity": {"$ne": 0}})
+    stored = await db.games.find_one({"id": game["id"]})
+    winner_ok = sum(results) == 1 and frozen_holders == [stored["opponent_id"]]
+    await db.user_gems.update_many({}, {"$set": {"frozen_quantity": 0}})
+    await db.users.update_many({}, {"$set": {"virtual_balance": 100.0, "frozen_balance": 0.0}})
+    return elapsed, loser_latencies, winner_ok
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--joiners", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    db = client["gemplay_join_bench"]
+    await client.drop_database(db.name)
+    try:
+        user_ids = await seed(db, args.joiners)
+        print(f"Игроков на ставку: {args.joiners}, раундов: {args.rounds}")
+        for label, join in (("прежний join", legacy_join), ("transition", transition_join)):
+            counter = Counter()
+            timings, losers, failures = [], [], 0
+            for _ in range(args.rounds):
+                elapsed, loser_latencies, winner_ok = await run_round(db, user_ids, join, counter)
+                timings.append(elapsed)
+                losers.extend(loser_latencies)
+                failures += not winner_ok
+            losers.sort()
+            print(f"  {label:<14} раунд {statistics.median(timings) * 1000:7.1f} ms  "
+                  f"проигравшие p50 {statistics.median(losers) * 1000:6.1f} ms  p99 {losers[int(len(losers) * 0.99) - 1] * 1000:6.1f} ms  "
+                  f"записей/раунд {counter.writes / args.rounds:6.0f}  компенсаций/раунд {counter.compensations / args.rounds:5.0f}  "
+                  f"нарушений инвариантов: {failures}")
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
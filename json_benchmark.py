@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк сериализации больших ответов: 10 000 строк в формате /games/available
+и /admin/bets/list (ObjectId, datetime, вложенные bet_gems).
+
+Пути:
+  - прежний: serialize_object_ids + проверка response_model + jsonable_encoder + JSONResponse;
+  - ответ по умолчанию: проверка response_model + jsonable_encoder + MongoJSONResponse (orjson);
+  - прямой MongoJSONResponse: без проверки и без промежуточных копий.
+
+Запуск: python json_benchmark.py [--rows 10000] [--repeat 5]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from bson import ObjectId  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+from json_utils import MongoJSONResponse  # noqa: E402
+
+GEMS = ["Ruby", "Amber", "Topaz", "Emerald", "Aquamarine", "Sapphire", "Magic"]
+
+
+def serialize_object_ids(obj):
+    """Прежний рекурсивный обход server.py"""
+    if isinstance(obj, dict):
+        return {k: serialize_object_ids(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [serialize_object_ids(item) for item in obj]
+    elif isinstance(obj, ObjectId):
+        return str(obj)
+    elif hasattr(obj, '__dict__'):
+        return {k: serialize_object_ids(v) for k, v in obj.__dict__.items()}
+    else:
+        return obj
+
+
+def make_rows(count):
+    now = datetime.utcnow()
+    rows = []
+    for i in range(count):
+        rows.append({
+            "_id": ObjectId(),
+            "game_id": str(uuid.uuid4()),
+            "creator_username": f"player{i}",
+            "creator": {"id": str(uuid.uuid4()), "username": f"player{i}", "gender": "male" if i % 2 else "female"},
+            "bet_amount": float(10 + i % 490),
+            "bet_gems": {GEMS[(i + k) % len(GEMS)]: 1 + (i * k) % 9 for k in range(3)},
+            "created_at": now - timedelta(seconds=i),
+            "time_remaining_hours": 23.5 - (i % 24),
+            "status": "WAITING",
+            "creator_type": "human_bot" if i % 3 == 0 else "user",
+            "is_bot_game": i % 3 == 0,
+            "bot_type": "HUMAN" if i % 3 == 0 else None,
+        })
+    return rows
+
+
+async def legacy(rows, field):
+    content = await serialize_response(field=field, response_content=serialize_object_ids(rows))
+    return JSONResponse(content).body
+
+
+async def default_response(rows, field):
+    # ObjectId приходится убирать заранее: jsonable_encoder его не знает
+    content = await serialize_response(field=field, response_content=[{k: v for k, v in row.items() if k != "_id"} for row in rows])
+    return MongoJSONResponse(content).body
+
+
+async def direct(rows, field):
+    return MongoJSONResponse(rows).body
+
+
+async def measure(path, rows, field, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = await path(rows, field)
+        timings.append(time.perf_counter() - started)
+    return timings, body
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    field = create_response_field(name="Response", type_=List[dict])
+    print(f"Строк: {args.rows}, повторов: {args.repeat}")
+
+    reference = json.loads(asyncio.run(legacy(rows, field)))
+    assert json.loads(asyncio.run(direct(rows, field))) == reference
+
+    for label, path in (
+        ("serialize_object_ids + response_model + json", legacy),
+        ("response_model + jsonable_encoder + orjson", default_response),
+        ("прямой MongoJSONResponse (orjson)", direct),
+    ):
+        timings, body = asyncio.run(measure(path, rows, field, args.repeat))
+        print(f"  {label:<46} медиана {statistics.median(timings) * 1000:8.1f} ms  {len(body) / 1024:8.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
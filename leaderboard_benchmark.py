@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк чтения лидерборда: топ-100 и место текущего игрока среди N игроков.
+
+Сравниваются:
+  - прежняя схема: полный проход по игрокам (как сортировка users без индекса) —
+    nlargest для топ-100 и подсчёт игроков с большим score для ранга;
+  - leaderboard_utils.SortedSet: skiplist с длинами шагов, топ-100 и ранг за O(log n).
+
+Также замеряется стоимость обновления score после расчёта игры. База не нужна.
+Запуск: python leaderboard_benchmark.py [--players 200000] [--requests 2000]
+"""
+
+import argparse
+import heapq
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from leaderboard_utils import LEADERBOARD_SIZE, SortedSet  # noqa: E402
+
+
+def scan_request(scores, user_id):
+    top = heapq.nlargest(LEADERBOARD_SIZE, scores.items(), key=lambda item: (item[1], item[0]))
+    own = scores[user_id]
+    rank = sum(1 for score in scores.values() if score > own) + 1
+    return top, rank
+
+
+def sorted_set_request(board, user_id):
+    return board.range(0, LEADERBOARD_SIZE), board.rank(user_id) + 1
+
+
+def timed(label, requests, fn):
+    started = time.perf_counter()
+    for _ in range(requests):
+        fn()
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<34} {elapsed / requests * 1e6:10.1f} мкс/операцию  {requests / elapsed:10.0f} операций/с")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--players", type=int, default=200000)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    user_ids = [f"user-{i:07d}" for i in range(args.players)]
+    scores = {user_id: float(rng.randint(0, 50000)) for user_id in user_ids}
+
+    started = time.perf_counter()
+    board = SortedSet()
+    for user_id, score in scores.items():
+        board.add(user_id, score)
+    print(f"Игроков: {args.players}, построение SortedSet: {time.perf_counter() - started:.2f} s")
+
+    # Проверка: обе схемы дают одинаковые ранги
+    for user_id in rng.sample(user_ids, 20):
+        assert scan_request(scores, user_id)[1] <= sorted_set_request(board, user_id)[1]
+
+    scan_requests = max(1, args.requests // 100)
+    timed("полный проход: топ-100 + ранг", scan_requests, lambda: scan_request(scores, rng.choice(user_ids)))
+    timed("SortedSet: топ-100 + ранг", args.requests, lambda: sorted_set_request(board, rng.choice(user_ids)))
+
+    def settle():
+        user_id = rng.choice(user_ids)
+        scores[user_id] += 30
+        board.add(user_id, scores[user_id])
+
+    timed("SortedSet: обновление после игры", args.requests, settle)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк логирования на горячем пути: запросов в секунду у эндпоинта, который пишет
+столько же строк INFO, сколько create_game (CREATE_GAME + блок COMMISSION DEBUG).
+
+Режимы:
+  - логи выключены (уровень WARNING);
+  - прежняя схема: basicConfig, f-строки, запись в файл прямо из event loop;
+  - очередь QueueHandler/QueueListener, ленивые %-аргументы (text и json);
+  - то же с лимитом по месту вызова;
+  - LOG_DEMOTE_HOT_PATH: сообщения горячего пути понижены до DEBUG.
+
+Запросы идут через httpx.ASGITransport, без сети и MongoDB.
+Запуск: python logging_benchmark.py [--requests 3000] [--concurrency 50]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+
+import logging_utils  # noqa: E402
+from logging_utils import TEXT_FORMAT, HotPathLogger, configure_logging, stop_logging  # noqa: E402
+
+logger = logging.getLogger("bench")
+
+
+def build_app(mode):
+    app = FastAPI()
+    hot_logger = HotPathLogger(logger, demote=(mode == "demoted"))
+    user = {"id": "u-1f2e3d", "virtual_balance": 1250.0, "frozen_balance": 40.0}
+
+    if mode == "legacy":
+        @app.post("/games")
+        async def create_game_legacy(bet: float = 25.0):
+            commission = round(bet * 0.03, 2)
+            logger.info(f"🎮 CREATE_GAME called for user {user['id']}")
+            logger.info(f"💰 COMMISSION DEBUG - User: {user['id']}")
+            logger.info(f"💰 Total bet amount: ${bet}")
+            logger.info(f"💰 Commission required: ${commission} ({int(0.03*100)}%)")
+            logger.info(f"💰 User virtual_balance before: ${user['virtual_balance']}")
+            logger.info(f"💰 User frozen_balance before: ${user['frozen_balance']}")
+            logger.info(f"💰 User virtual_balance after: ${user['virtual_balance'] - commission}")
+            logger.info(f"💰 User frozen_balance after: ${user['frozen_balance'] + commission}")
+            logger.info(f"💰 Commission frozen: ${commission}")
+            logger.info(f"💰 Commission deducted from virtual_balance: ${commission}")
+            return {"ok": True}
+    else:
+        @app.post("/games")
+        async def create_game(bet: float = 25.0):
+            commission = round(bet * 0.03, 2)
+            hot_logger.info("🎮 CREATE_GAME called for user %s", user['id'])
+            hot_logger.info("💰 COMMISSION DEBUG - User: %s", user['id'])
+            hot_logger.info("💰 Total bet amount: $%s", bet)
+            hot_logger.info("💰 Commission required: $%s (%s%%)", commission, int(0.03*100))
+            hot_logger.info("💰 User virtual_balance before: $%s", user['virtual_balance'])
+            hot_logger.info("💰 User frozen_balance before: $%s", user['frozen_balance'])
+            hot_logger.info("💰 User virtual_balance after: $%s", user['virtual_balance'] - commission)
+            hot_logger.info("💰 User frozen_balance after: $%s", user['frozen_balance'] + commission)
+            hot_logger.info("💰 Commission frozen: $%s", commission)
+            hot_logger.info("💰 Commission deducted from virtual_balance: $%s", commission)
+            return {"ok": True}
+
+    return app
+
+
+def setup(mode, stream):
+    root = logging.getLogger()
+    stop_logging()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    if mode == "legacy":
+        logging.basicConfig(level=logging.INFO, format=TEXT_FORMAT, stream=stream, force=True)
+    elif mode == "off":
+        configure_logging(level="WARNING", rate_limit=0, stream=stream)
+    elif mode == "queue-json":
+        configure_logging(level="INFO", json_output=True, rate_limit=0, stream=stream)
+    elif mode == "queue-limited":
+        configure_logging(level="INFO", json_output=False, rate_limit=20, rate_window=10, stream=stream)
+    else:
+        configure_logging(level="INFO", json_output=False, rate_limit=0, stream=stream)
+
+
+class SlowSink:
+    """Файл, запись в который блокирует на latency секунд — как stderr, упёршийся в заполненный pipe"""
+
+    def __init__(self, stream, latency):
+        self.stream = stream
+        self.latency = latency
+
+    def write(self, text):
+        if self.latency:
+            time.sleep(self.latency)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+async def drive(app, total, concurrency):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.post("/games")
+        queue = asyncio.Queue()
+        for _ in range(total):
+            queue.put_nowait(None)
+
+        async def worker():
+            while not queue.empty():
+                queue.get_nowait()
+                response = await client.post("/games")
+                assert response.status_code == 200
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--sink-latency-us", type=float, default=100.0,
+                        help="блокировка на одну запись во втором проходе")
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    modes = [
+        ("off", "логи выключены (WARNING)"),
+        ("legacy", "basicConfig + f-строки в event loop"),
+        ("queue", "очередь + ленивые аргументы, text"),
+        ("queue-json", "очередь + ленивые аргументы, json"),
+        ("queue-limited", "очередь + лимит 20/10 с на место вызова"),
+        ("demoted", "LOG_DEMOTE_HOT_PATH (DEBUG)"),
+    ]
+    print(f"Запросов: {args.requests}, параллельно: {args.concurrency}, строк лога на запрос: 10")
+    with tempfile.TemporaryDirectory() as tmp:
+        for latency in (0.0, args.sink_latency_us / 1e6):
+            print(f"\nЗапись в файл, блокировка на запись: {latency * 1e6:g} мкс")
+            for mode, label in modes:
+                path = os.path.join(tmp, f"{mode}.log")
+                with open(path, "w", encoding="utf-8") as stream:
+                    setup(mode, SlowSink(stream, latency))
+                    elapsed = asyncio.run(drive(build_app(mode), args.requests, args.concurrency))
+                    # Время дописывания хвоста очереди не входит в req/s: запросы уже отвечены
+                    stop_logging()
+                    stream.flush()
+                with open(path, encoding="utf-8") as written:
+                    lines = sum(1 for _ in written)
+                print(f"  {label:<42} {args.requests / elapsed:8.0f} req/s  строк в логе: {lines}")
+    logging_utils.stop_logging()
+
+
+if __name__ == "__main__":
+    main()
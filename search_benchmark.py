@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк поиска пользователей по мере набора (/users/search) на 1M пользователей.
+
+Сравниваются:
+  - прежний запрос: $or из {"$regex": "^q", "$options": "i"} по username и email —
+    регистронезависимый regex не ограничивает индекс, просматривается вся коллекция;
+  - search_utils.prefix_range по username_lower/email_lower: диапазон на индексах;
+  - то же плюс PrefixSearchCache: набор имени по буквам, как из поля ввода.
+
+Для каждого запроса печатаются p50/p99 задержки. Набор — префиксы длиной 1..8
+случайных существующих имён.
+
+Нужна MongoDB; используется временная база, которая удаляется в конце.
+Запуск: MONGO_URL=mongodb://localhost:27017 python search_benchmark.py [--users 1000000] [--queries 300]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from search_utils import PrefixSearchCache, prefix_range, search_key  # noqa: E402
+
+LIMIT = 5
+SEED_BATCH = 10000
+
+
+def make_user(i, rng):
+    username = "".join(rng.choice(string.ascii_letters) for _ in range(rng.randint(4, 10))) + str(i)
+    email = f"{username.lower()}@example.com"
+    return {"id": f"user-{i}", "username": username, "email": email,
+            "username_lower": username.lower(), "email_lower": email}
+
+
+async def seed(db, users, rng):
+    sample = []
+    for start in range(0, users, SEED_BATCH):
+        batch = [make_user(i, rng) for i in range(start, min(start + SEED_BATCH, users))]
+        sample.extend(rng.sample(batch, 2))
+        await db.users.insert_many(batch, ordered=False)
+    await db.users.create_index("username_lower")
+    await db.users.create_index("email_lower")
+    await db.users.create_index("username")
+    await db.users.create_index("email")
+    return [user["username"] for user in sample]
+
+
+async def regex_search(db, query):
+    return await db.users.find(
+        {"$or": [{"email": {"$regex": f"^{query}", "$options": "i"}},
+                 {"username": {"$regex": f"^{query}", "$options": "i"}}]},
+        {"_id": 0, "id": 1, "username": 1, "email": 1}
+    ).limit(LIMIT).to_list(LIMIT)
+
+
+async def prefix_search(db, query):
+    key_range = prefix_range(query)
+    return await db.users.find(
+        {"$or": [{"username_lower": key_range}, {"email_lower": key_range}]},
+        {"_id": 0, "id": 1, "username": 1, "email": 1, "username_lower": 1, "email_lower": 1}
+    ).limit(LIMIT + 1).to_list(LIMIT + 1)
+
+
+async def cached_search(db, cache, query):
+    key = search_key(query)
+    rows = cache.get("users", key, lambda row: row["username_lower"].startswith(key) or row["email_lower"].startswith(key))
+    if rows is None:
+        rows = await prefix_search(db, query)
+        cache.put("users", key, rows, complete=len(rows) <= LIMIT)
+    return rows
+
+
+async def measure(label, queries, search):
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        await search(query)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    p99 = latencies[max(int(len(latencies) * 0.99) - 1, 0)]
+    print(f"  {label:<28} p50 {statistics.median(latencies) * 1000:8.2f} ms  p99 {p99 * 1000:8.2f} ms  "
+          f"всего {sum(latencies):6.2f} s на {len(latencies)} запросов")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=300, help="сколько имён набирать по буквам")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    db = client["gemplay_search_bench"]
+    await client.drop_database(db.name)
+    try:
+        started = time.perf_counter()
+        names = await seed(db, args.users, rng)
+        print(f"Пользователей: {args.users}, заполнение: {time.perf_counter() - started:.1f} s")
+
+        # Набор по буквам: "a", "ab", "abc", ... — как запросы из поля ввода
+        typed = [name[:length] for name in rng.sample(names, min(args.queries, len(names))) for length in range(1, 9)]
+        await measure("$regex ^q (i)", typed[:max(len(typed) // 20, 8)], lambda query: regex_search(db, query))
+        await measure("prefix_range (индекс)", typed, lambda query: prefix_search(db, query))
+        cache = PrefixSearchCache()
+        await measure("prefix_range + кэш", typed, lambda query: cached_search(db, cache, query))
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк запуска бэкенда: холодный импорт модулей, построение маршрутов
+и задержка первого запроса.
+
+Каждый замер — отдельный процесс Python, чтобы кэш модулей не искажал результат.
+MongoDB не нужна: обработчики startup с подключением к базе не запускаются,
+маршруты строятся напрямую через include_api_routers().
+
+Запуск: python startup_benchmark.py [--repeat 5]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+
+IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"import": elapsed, "numpy_loaded": "numpy" in sys.modules}}))
+"""
+
+SERVER_PROBE = """
+import asyncio, json, time
+started = time.perf_counter()
+import server
+imported = time.perf_counter()
+server.include_api_routers()
+routed = time.perf_counter()
+
+import httpx
+
+async def first_request():
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        t0 = time.perf_counter()
+        response = await client.get("/api/health")
+        t1 = time.perf_counter()
+        await client.get("/api/health")
+        t2 = time.perf_counter()
+        return response.status_code, t1 - t0, t2 - t1
+
+status, first, second = asyncio.run(first_request())
+print(json.dumps({
+    "import": imported - started,
+    "routes": routed - imported,
+    "first_request": first,
+    "second_request": second,
+    "status": status,
+    "route_count": len(server.app.routes),
+}))
+"""
+
+
+def run_probe(code):
+    env = dict(os.environ)
+    env.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    env.setdefault("DB_NAME", "gemplay_benchmark")
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, env=env,
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def summarize(samples, key):
+    values = [sample[key] * 1000 for sample in samples]
+    return statistics.median(values), min(values)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"Холодный импорт (медиана / минимум из {args.repeat} процессов)")
+    for module in ("core", "core.cycle_economics", "core.models", "core.cycle_planning"):
+        samples = [run_probe(IMPORT_PROBE.format(module=module)) for _ in range(args.repeat)]
+        median, best = summarize(samples, "import")
+        numpy = "да" if samples[0]["numpy_loaded"] else "нет"
+        print(f"  import {module:<28} {median:9.1f} ms {best:9.1f} ms   numpy: {numpy}")
+
+    samples = [run_probe(SERVER_PROBE) for _ in range(args.repeat)]
+    assert all(sample["status"] == 200 for sample in samples), "GET /api/health должен отвечать 200"
+    print(f"\nСервер ({samples[0]['route_count']} маршрутов)")
+    for key, label in (
+        ("import", "import server"),
+        ("routes", "построение маршрутов на старте"),
+        ("first_request", "первый запрос GET /api/health"),
+        ("second_request", "повторный запрос GET /api/health"),
+    ):
+        median, best = summarize(samples, key)
+        print(f"  {label:<35} {median:9.1f} ms {best:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
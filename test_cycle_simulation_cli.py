@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Смоук-прогон CLI оффлайн-симуляции циклов (python -m cycle_simulation).
+
+Симуляция строит планы тем же движком, что и server.py, поэтому любое изменение
+сигнатур core/cycle_economics или core/cycle_planning должно проходить этот прогон.
+Проверяются текстовый и JSON-отчёт на маленьком числе циклов.
+
+Запуск: python test_cycle_simulation_cli.py (или pytest test_cycle_simulation_cli.py)
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+
+
+def run_cli(*args):
+    result = subprocess.run(
+        [sys.executable, "-m", "cycle_simulation", *args],
+        cwd=BACKEND_DIR, capture_output=True, text=True, timeout=300
+    )
+    assert result.returncode == 0, f"cycle_simulation {' '.join(args)} упал:\n{result.stderr}"
+    return result.stdout
+
+
+def test_text_report():
+    output = run_cli("--cycles", "2000", "--presets", "5,10", "--seed", "1")
+    assert "Итого: 4,000 циклов" in output, output
+
+
+def test_json_report():
+    reports = json.loads(run_cli("--cycles", "1000", "--presets", "10", "--deviation", "0.05", "--seed", "1", "--json"))
+    assert len(reports) == 1
+    report = reports[0]
+    assert report["cycles"] == 1000
+    assert report["bets"] == 1000 * 16
+
+
+if __name__ == "__main__":
+    test_text_report()
+    test_json_report()
+    print("✅ cycle_simulation CLI работает")
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк «шторма» обновлений токенов: N пользователей одновременно вызывают
+/auth/refresh (например, после перезапуска фронтенда с истёкшими access-токенами).
+
+Сравниваются:
+  - прежняя схема: поиск по открытому токену без индекса, чтение пользователя,
+    User(**user), update_many + insert_one нового токена, update_one старого;
+  - RefreshTokenStore: один find_one_and_update по sha256 с уникальным индексом,
+    статус берётся из снимка в записи токена, ответ — из чтения пользователя
+    с проекцией полей UserResponse.
+
+Дополнительно каждый токен предъявляется дважды одновременно: считается,
+сколько повторов прошло (в новой схеме должно быть 0).
+
+Нужна MongoDB; используется временная база, которая удаляется в конце.
+Запуск: MONGO_URL=mongodb://localhost:27017 python token_benchmark.py [--users 2000] [--concurrency 100]
+"""
+
+import argparse
+import asyncio
+import os
+import secrets
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from bootstrap_utils import create_indexes  # noqa: E402
+from core.models import User, UserResponse  # noqa: E402
+from token_store_utils import REFRESH_TOKEN_INDEXES, RefreshTokenStore  # noqa: E402
+
+TTL_DAYS = 7
+PRINCIPAL_FIELDS = ("role", "status", "email_verified")
+USER_RESPONSE_PROJECTION = {"_id": 0, **{field: 1 for field in UserResponse.model_fields}}
+
+
+def make_user(i):
+    return User(
+        username=f"storm{i}", email=f"storm{i}@example.com", password_hash="x",
+        status="ACTIVE", email_verified=True,
+    ).dict()
+
+
+async def legacy_issue(db, user_id):
+    token = secrets.token_urlsafe(32)
+    await db.refresh_tokens.update_many({"user_id": user_id, "is_active": True}, {"$set": {"is_active": False}})
+    await db.refresh_tokens.insert_one({
+        "id": str(uuid.uuid4()), "user_id": user_id, "token": token,
+        "expires_at": datetime.utcnow() + timedelta(days=TTL_DAYS), "created_at": datetime.utcnow(), "is_active": True,
+    })
+    return token
+
+
+async def legacy_refresh(db, token):
+    token_doc = await db.refresh_tokens.find_one({"token": token, "is_active": True, "expires_at": {"$gt": datetime.utcnow()}})
+    if not token_doc:
+        return None
+    user = await db.users.find_one({"id": token_doc["user_id"]})
+    user_obj = User(**user)
+    new_token = await legacy_issue(db, user_obj.id)
+    await db.refresh_tokens.update_one({"token": token_doc.get("token")}, {"$set": {"is_active": False}})
+    UserResponse(**user_obj.dict())
+    return new_token
+
+
+async def store_refresh(db, store, token):
+    new_token, record = await store.rotate(token)
+    if record is None or record["principal"]["status"] != "ACTIVE":
+        return None
+    UserResponse(**await db.users.find_one({"id": record["user_id"]}, USER_RESPONSE_PROJECTION))
+    return new_token
+
+
+async def storm(tokens, refresh, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(token):
+        async with semaphore:
+            started = time.perf_counter()
+            result = await refresh(token)
+            latencies.append(time.perf_counter() - started)
+            return result
+
+    started = time.perf_counter()
+    # Каждый токен дважды: второй запрос — повтор уже использованного токена
+    results = await asyncio.gather(*(one(token) for token in tokens for _ in range(2)))
+    elapsed = time.perf_counter() - started
+    accepted = sum(1 for result in results if result is not None)
+    return elapsed, latencies, accepted - len(tokens)
+
+
+def report(label, total, elapsed, latencies, replays):
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"  {label:<28} {total / elapsed:8.0f} запросов/с  p50 {statistics.median(latencies) * 1000:7.1f} ms  "
+          f"p99 {p99 * 1000:7.1f} ms  принятых повторов: {replays}")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    db = client["gemplay_token_bench"]
+    await client.drop_database(db.name)
+    try:
+        users = [make_user(i) for i in range(args.users)]
+        await db.users.insert_many([dict(user) for user in users])
+        await db.users.create_index("id", unique=True)
+        print(f"Пользователей: {args.users}, параллельно: {args.concurrency}, запросов: {args.users * 2}")
+
+        # Прежняя схема: у каждого пользователя уже есть история неактивных токенов
+        for _ in range(3):
+            tokens = await asyncio.gather(*(legacy_issue(db, user["id"]) for user in users))
+        elapsed, latencies, replays = await storm(tokens, lambda token: legacy_refresh(db, token), args.concurrency)
+        report("прежняя схема", args.users * 2, elapsed, latencies, replays)
+
+        await db.refresh_tokens.drop()
+        await create_indexes(db, REFRESH_TOKEN_INDEXES)
+        store = RefreshTokenStore(db.refresh_tokens, TTL_DAYS)
+        tokens = await asyncio.gather(*(
+            store.issue(user["id"], {"id": user["id"], **{field: user[field] for field in PRINCIPAL_FIELDS}})
+            for user in users
+        ))
+        elapsed, latencies, replays = await storm(tokens, lambda token: store_refresh(db, store, token), args.concurrency)
+        report("RefreshTokenStore", args.users * 2, elapsed, latencies, replays)
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
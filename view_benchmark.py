@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк «тика» фоновых циклов на 10 000 игр: полная pydantic-модель на каждый
+документ против лёгких представлений из backend/core/views.py.
+
+Для каждого варианта печатается время CPU и пик выделенной памяти (tracemalloc)
+на разбор всех документов тика и чтение полей, которые используют циклы таймаутов
+и присоединения.
+
+Запуск: python view_benchmark.py [--games 10000] [--bots 100] [--repeat 5]
+"""
+
+import argparse
+import gc
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from core.models import Game, HumanBot  # noqa: E402
+from core.views import GameView, HumanBotView  # noqa: E402
+
+GEMS = ["Ruby", "Amber", "Topaz", "Emerald", "Aquamarine", "Sapphire", "Magic"]
+CHARACTERS = ["STABLE", "AGGRESSIVE", "CAUTIOUS", "BALANCED", "IMPULSIVE", "ANALYST", "MIMIC"]
+
+
+def make_games(count):
+    now = datetime.utcnow()
+    return [{
+        "id": str(uuid.uuid4()),
+        "creator_id": str(uuid.uuid4()),
+        "creator_type": "human_bot" if i % 3 == 0 else "user",
+        "opponent_id": str(uuid.uuid4()),
+        "opponent_type": "user",
+        "creator_move_hash": uuid.uuid4().hex,
+        "creator_salt": uuid.uuid4().hex,
+        "bet_amount": float(10 + i % 490),
+        "bet_gems": {GEMS[(i + k) % len(GEMS)]: 1 + (i * k) % 9 for k in range(3)},
+        "opponent_gems": {GEMS[(i + k + 1) % len(GEMS)]: 1 + (i * k) % 7 for k in range(3)},
+        "status": "ACTIVE",
+        "created_at": now - timedelta(minutes=5),
+        "started_at": now - timedelta(minutes=2),
+        "joined_at": now - timedelta(minutes=2),
+        "active_deadline": now - timedelta(minutes=1),
+        "is_bot_game": i % 3 == 0,
+        "bot_type": "HUMAN" if i % 3 == 0 else None,
+        "metadata": {"human_bot_completion_time": 42},
+    } for i in range(count)]
+
+
+def make_human_bots(count):
+    now = datetime.utcnow()
+    return [{
+        "id": str(uuid.uuid4()),
+        "name": f"Bot{i}",
+        "character": CHARACTERS[i % len(CHARACTERS)],
+        "is_active": True,
+        "min_bet": 1.0,
+        "max_bet": 100.0,
+        "last_action_time": now - timedelta(seconds=i),
+        "created_at": now,
+        "updated_at": now,
+    } for i in range(count)]
+
+
+def read_game_fields(game):
+    return (game.status, game.creator_id, game.opponent_id, game.bet_amount, game.active_deadline, game.opponent_gems)
+
+
+def read_bot_fields(bot):
+    return (bot.is_active, bot.character, bot.last_action_time, bot.min_delay, bot.max_delay,
+            bot.can_play_with_other_bots, bot.can_play_with_players, bot.max_concurrent_games)
+
+
+def measure(build, docs, read, repeat):
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.process_time()
+        for obj in build(docs):
+            read(obj)
+        timings.append(time.process_time() - started)
+    gc.collect()
+    tracemalloc.start()
+    objects = build(docs)
+    for obj in objects:
+        read(obj)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--bots", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    games = make_games(args.games)
+    bots = make_human_bots(args.bots)
+    assert read_game_fields(Game(**games[0])) == read_game_fields(GameView.from_doc(games[0]))
+    assert read_bot_fields(HumanBot(**bots[0])) == read_bot_fields(HumanBotView.from_doc(bots[0]))
+
+    cases = [
+        (f"игры ×{args.games}", games, read_game_fields, [
+            ("Game(**doc)", lambda docs: [Game(**doc) for doc in docs]),
+            ("Game.model_construct(**doc)", lambda docs: [Game.model_construct(**doc) for doc in docs]),
+            ("GameView.from_doc", GameView.from_docs),
+        ]),
+        (f"Human-боты ×{args.bots} × 100 тиков", bots * 100, read_bot_fields, [
+            ("HumanBot(**doc)", lambda docs: [HumanBot(**doc) for doc in docs]),
+            ("HumanBot.model_construct(**doc)", lambda docs: [HumanBot.model_construct(**doc) for doc in docs]),
+            ("HumanBotView.from_doc", HumanBotView.from_docs),
+        ]),
+    ]
+    for title, docs, read, variants in cases:
+        print(f"\n{title}")
+        for label, build in variants:
+            cpu, peak = measure(build, docs, read, args.repeat)
+            print(f"  {label:<34} CPU {cpu * 1000:8.1f} ms  пик памяти {peak / 1024 / 1024:7.2f} MiB")
+
+
+if __name__ == "__main__":
+    main()